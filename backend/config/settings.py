@@ -30,6 +30,10 @@ class Settings(BaseSettings):
 
     # Permisos
     PERMISSION_ADMINS: List[str] = ["mvalladares@riofuturo.cl", "frios@riofuturo.cl"]
+
+    # Hilos de fondo del lifespan (barrido de sesiones, snapshots, tipos de cambio).
+    # Los tests lo desactivan para no llamar servicios externos ni escribir backend/data.
+    BACKGROUND_TASKS: bool = True
     
     model_config = SettingsConfigDict(
         env_file=str(ENV_FILE),
@@ -18,8 +18,13 @@ from backend.routers import (
     rendimiento, compras, automatizaciones, comercial,
     flujo_caja, reconciliacion, odf_reconciliation,
     aprobaciones_fletes, etiquetas, proformas, cartera,
-    provider_portal
+    provider_portal, reportes
 )
+from backend.services.currency_service import CurrencyService
+from backend.services.monitor_produccion_service import start_snapshot_scheduler, stop_snapshot_scheduler
+from backend.services.provider_portal_service import start_snapshot_materializer, stop_snapshot_materializer
+from backend.services.report_jobs import start_report_workers, stop_report_workers
+from backend.services.session_service import SessionService
 
 logger = logging.getLogger(__name__)
 
@@ -27,7 +32,19 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     """Gestiona el ciclo de vida de la aplicación."""
     logger.info("Iniciando aplicación...")
+    if settings.BACKGROUND_TASKS:
+        SessionService.start_background_sweep()
+        start_snapshot_materializer()
+        CurrencyService.start_prefetch()
+        start_snapshot_scheduler()
+    start_report_workers()
     yield
+    stop_report_workers()
+    if settings.BACKGROUND_TASKS:
+        stop_snapshot_scheduler()
+        CurrencyService.stop_prefetch()
+        stop_snapshot_materializer()
+        SessionService.stop_background_sweep()
     logger.info("Cerrando aplicación...")
 
 # Crear aplicación
@@ -90,6 +107,7 @@ app.include_router(etiquetas.router)
 app.include_router(proformas.router)
 app.include_router(cartera.router)
 app.include_router(provider_portal.router)
+app.include_router(reportes.router)
 
 @app.get("/")
 async def root():
@@ -1,16 +1,18 @@
 """
 Router de Bandejas - Movimientos y stock de bandejas
 """
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from typing import Optional
 
 from backend.services.bandejas_service import BandejasService
+from backend.utils.columnar import arrow_or_json
 
 router = APIRouter(prefix="/api/v1/bandejas", tags=["bandejas"])
 
 
 @router.get("/movimientos-entrada")
 async def get_movimientos_entrada(
+    request: Request,
     username: str = Query(..., description="Usuario Odoo"),
     password: str = Query(..., description="API Key Odoo"),
     fecha_desde: Optional[str] = Query(None, description="Fecha desde (YYYY-MM-DD)"),
@@ -23,13 +25,14 @@ async def get_movimientos_entrada(
     try:
         service = BandejasService(username=username, password=password)
         data = service.get_movimientos_entrada(fecha_desde=fecha_desde, offset=offset, limit=limit)
-        return {"data": data.to_dict(orient='records') if not data.empty else []}
+        return arrow_or_json(request, {"data": data}, tabla="data")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/movimientos-salida")
 async def get_movimientos_salida(
+    request: Request,
     username: str = Query(..., description="Usuario Odoo"),
     password: str = Query(..., description="API Key Odoo"),
     fecha_desde: Optional[str] = Query(None, description="Fecha desde (YYYY-MM-DD)"),
@@ -42,13 +45,14 @@ async def get_movimientos_salida(
     try:
         service = BandejasService(username=username, password=password)
         data = service.get_movimientos_salida(fecha_desde=fecha_desde, offset=offset, limit=limit)
-        return {"data": data.to_dict(orient='records') if not data.empty else []}
+        return arrow_or_json(request, {"data": data}, tabla="data")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/stock")
 async def get_stock_bandejas(
+    request: Request,
     username: str = Query(..., description="Usuario Odoo"),
     password: str = Query(..., description="API Key Odoo")
 ):
@@ -58,13 +62,14 @@ async def get_stock_bandejas(
     try:
         service = BandejasService(username=username, password=password)
         data = service.get_stock()
-        return {"data": data.to_dict(orient='records') if not data.empty else []}
+        return arrow_or_json(request, {"data": data}, tabla="data")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/resumen-productor")
 async def get_resumen_por_productor(
+    request: Request,
     username: str = Query(..., description="Usuario Odoo"),
     password: str = Query(..., description="API Key Odoo"),
     anio: Optional[int] = Query(None, description="Filtrar por año"),
@@ -76,6 +81,30 @@ async def get_resumen_por_productor(
     try:
         service = BandejasService(username=username, password=password)
         data = service.get_resumen_por_productor(anio=anio, mes=mes)
-        return {"data": data.to_dict(orient='records') if not data.empty else []}
+        return arrow_or_json(request, {"data": data}, tabla="data")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/saldos-productor")
+async def get_saldos_productor(
+    request: Request,
+    username: str = Query(..., description="Usuario Odoo"),
+    password: str = Query(..., description="API Key Odoo"),
+    periodo: str = Query("mes", description="Granularidad: mes o anio"),
+    fecha_desde: Optional[str] = Query(None, description="Primer período a retornar (YYYY-MM-DD)"),
+    fecha_hasta: Optional[str] = Query(None, description="Último período a retornar (YYYY-MM-DD)"),
+    productor: Optional[str] = Query(None, description="Nombre del productor")
+):
+    """
+    Saldo acumulado de bandejas en cada productor por período (historia completa).
+    """
+    try:
+        service = BandejasService(username=username, password=password)
+        data = service.get_saldos_productor(periodo=periodo, fecha_desde=fecha_desde,
+                                            fecha_hasta=fecha_hasta, productor=productor)
+        return arrow_or_json(request, {"data": data}, tabla="data")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -2,9 +2,10 @@
 Router de Relación Comercial
 Endpoints para el Dashboard de Clientes
 """
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from typing import Optional, List, Dict, Any
 from ..services.comercial_service import ComercialService
+from ..utils.columnar import arrow_or_json
 
 router = APIRouter(
     prefix="/comercial",
@@ -13,6 +14,7 @@ router = APIRouter(
 
 @router.get("/data")
 async def get_comercial_data(
+    request: Request,
     username: str = Query(..., description="Usuario Odoo"),
     password: str = Query(..., description="Contraseña Odoo"),
     anio: Optional[List[int]] = Query(None),
@@ -34,7 +36,7 @@ async def get_comercial_data(
         if especie: filters['especie'] = especie
         
         data = service.get_relacion_comercial_data(filters if filters else None)
-        return data
+        return arrow_or_json(request, data, tabla="raw_data")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -2,7 +2,7 @@
 Router de Pedidos de Venta - Seguimiento de producción por pedido
 """
 from fastapi import APIRouter, HTTPException, Query
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel
 
 from backend.services.containers import ContainersService
@@ -23,11 +23,14 @@ async def get_containers(
     start_date: Optional[str] = Query(None, description="Fecha inicio (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="Fecha fin (YYYY-MM-DD)"),
     partner_id: Optional[int] = Query(None, description="ID del cliente"),
-    state: Optional[str] = Query(None, description="Estado del pedido")
+    state: Optional[str] = Query(None, description="Estado del pedido"),
+    limit: Optional[int] = Query(None, description="Máximo de pedidos a retornar"),
+    offset: int = Query(0, description="Pedidos a saltar (paginación)")
 ):
     """
     Obtiene lista de pedidos de venta con su avance de producción.
-    Busca desde fabricaciones que tienen PO asociada (x_studio_po_asociada_1).
+    Busca desde fabricaciones que tienen PO asociada (x_studio_po_asociada_1),
+    servidas desde el read model de avance (filtros y paginación en memoria).
     """
     try:
         service = ContainersService(username=username, password=password)
@@ -35,7 +38,9 @@ async def get_containers(
             start_date=start_date,
             end_date=end_date,
             partner_id=partner_id,
-            state=state
+            state=state,
+            limit=limit,
+            offset=offset
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -102,17 +107,26 @@ async def get_sankey_data(
     password: str = Query(..., description="API Key Odoo"),
     start_date: Optional[str] = Query(None, description="Fecha inicio (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="Fecha fin (YYYY-MM-DD)"),
+    grain: str = Query("process", description="Grano: pallet, lot, process, sala, producer, customer"),
+    max_nodes: int = Query(80, description="Máximo de nodos (el resto se agrupa en 'Otros')"),
+    expand: Optional[List[str]] = Query(None, description="Tokens detail.drill de los nodos a abrir"),
 ):
     """
     Obtiene datos para diagrama Sankey de trazabilidad basado en stock.move.line.
-    Muestra IN → Proceso (reference) → OUT → Cliente (ventas).
+    Muestra IN → Proceso (reference) → OUT → Cliente (ventas), agregado en el
+    servidor al grano pedido y con cantidad de nodos acotada.
     """
     try:
         service = ContainersService(username=username, password=password)
         return service.get_sankey_data(
             start_date=start_date,
             end_date=end_date,
+            grain=grain,
+            max_nodes=max_nodes,
+            expand=expand,
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1042,4 +1042,189 @@ async def marcar_oc_facturada(
         raise
     except Exception as e:
         logger.error(f"Error marcando facturada OC {oc_id}: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ============================================================================
+# ESCENARIOS WHAT-IF (recalculo incremental)
+# ============================================================================
+
+from uuid import uuid4
+from backend.services.flujo_caja.escenario import (
+    EscenarioFlujo, guardar_escenario, obtener_escenario, eliminar_escenario
+)
+from backend.services.flujo_caja.helpers import migrar_codigo_antiguo
+
+
+class WhatIfDistribucionRequest(DistribucionOCRequest):
+    """Distribución a simular sobre un escenario."""
+    persistir: bool = False
+
+
+def _get_escenario_or_404(escenario_id: str) -> EscenarioFlujo:
+    escenario = obtener_escenario(escenario_id)
+    if escenario is None:
+        raise HTTPException(status_code=404, detail=f"Escenario {escenario_id} no existe o expiró")
+    return escenario
+
+
+@router.post("/what-if/iniciar")
+async def iniciar_escenario_what_if(
+    fecha_inicio: str,
+    fecha_fin: str,
+    username: str,
+    password: str,
+    company_id: Optional[int] = None,
+    agrupacion: str = 'mensual',
+    incluir_proyecciones: Optional[bool] = False,
+    escenario_id: Optional[str] = None
+):
+    """
+    Calcula el flujo completo y lo registra como base de hechos de un escenario.
+    
+    Las ediciones posteriores (/what-if/{escenario_id}/...) se aplican como
+    deltas sobre esta base y retornan solo las celdas modificadas.
+    
+    Returns:
+        {"escenario_id": str, "version": int, "flujo": <resultado de /mensual>}
+    """
+    try:
+        service = FlujoCajaService(username=username, password=password)
+        resultado = service.get_flujo_mensualizado(
+            fecha_inicio=fecha_inicio,
+            fecha_fin=fecha_fin,
+            company_id=company_id,
+            agrupacion=agrupacion,
+            incluir_proyecciones=incluir_proyecciones
+        )
+        escenario_id = escenario_id or uuid4().hex
+        escenario = EscenarioFlujo(resultado, agrupacion=agrupacion, incluir_proyecciones=incluir_proyecciones)
+        guardar_escenario(escenario_id, escenario)
+        return {"escenario_id": escenario_id, "version": escenario.version, "flujo": resultado}
+    except Exception as e:
+        logger.error(f"Error iniciando escenario what-if: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/what-if/{escenario_id}/efectivo-inicial")
+async def what_if_efectivo_inicial(
+    escenario_id: str,
+    valor: float,
+    persistir: bool = False,
+    username: Optional[str] = None
+):
+    """
+    Simula un nuevo efectivo inicial. Solo cambia la cadena de efectivo por período.
+    
+    Si persistir=True también se guarda como configuración global (igual que
+    POST /config/efectivo-inicial).
+    """
+    escenario = _get_escenario_or_404(escenario_id)
+    if persistir:
+        await set_efectivo_inicial_config(valor=valor, usar_personalizado=True, username=username)
+    celdas = escenario.aplicar_efectivo_inicial(valor)
+    return {"escenario_id": escenario_id, "version": escenario.version, "celdas": celdas}
+
+
+@router.post("/what-if/{escenario_id}/distribucion")
+async def what_if_distribucion(
+    escenario_id: str,
+    request: WhatIfDistribucionRequest,
+    username: str = "",
+    password: str = ""
+):
+    """
+    Simula la distribución de una OC. Solo cambia 1.2.1 en los períodos afectados.
+    
+    La proyección previa y la nueva se derivan en el servidor con las mismas
+    reglas de calcular_pagos_proveedores (monto pendiente de la OC, exclusión
+    si la distribución difiere más de 1% del pendiente, rango del escenario).
+    Retorna en proyeccion las cuotas que efectivamente entran al flujo
+    (vacío si la distribución queda excluida por reajuste).
+    """
+    escenario = _get_escenario_or_404(escenario_id)
+    try:
+        calc = FlujoCajaService(username=username, password=password).real_proyectado_calc
+        oc = calc.leer_oc(request.oc_id)
+        if oc is None:
+            raise HTTPException(status_code=404, detail=f"OC {request.oc_id} no existe o no está confirmada")
+        
+        guardada = distribuciones_oc_service.obtener_distribucion(request.oc_id)
+        anteriores = calc.proyeccion_oc(
+            oc, oc["monto_pendiente"], guardada["distribuciones"] if guardada else None,
+            escenario.fecha_inicio, escenario.fecha_fin
+        )
+        
+        nuevas = [d.model_dump() for d in request.distribuciones]
+        proyeccion = calc.proyeccion_oc(
+            oc, oc["monto_pendiente"], nuevas, escenario.fecha_inicio, escenario.fecha_fin
+        )
+        if request.persistir:
+            distribuciones_oc_service.crear_o_actualizar_distribucion(
+                oc_id=request.oc_id,
+                oc_name=request.oc_name,
+                proveedor=request.proveedor,
+                monto_total=request.monto_total,
+                distribuciones=nuevas,
+                proveedor_id=request.proveedor_id,
+                created_by=request.created_by
+            )
+        
+        celdas = escenario.aplicar_distribucion(
+            request.oc_id, anteriores, proyeccion, categoria=oc["categoria"], proveedor=oc["proveedor"]
+        )
+        return {
+            "escenario_id": escenario_id,
+            "version": escenario.version,
+            "proyeccion": proyeccion,
+            "celdas": celdas
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error simulando distribución OC {request.oc_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/what-if/{escenario_id}/mapeo-cuenta")
+async def what_if_mapeo_cuenta(
+    escenario_id: str,
+    codigo: str,
+    categoria: str,
+    nombre: str = "",
+    persistir: bool = False,
+    username: str = "",
+    password: str = ""
+):
+    """
+    Simula la reclasificación de una cuenta contable a otro concepto.
+    
+    Si la cuenta no está en la base del escenario (p.ej. fuera del top 15 del
+    concepto) retorna requiere_recalculo=True y el cliente debe reiniciar el escenario.
+    """
+    escenario = _get_escenario_or_404(escenario_id)
+    try:
+        service = FlujoCajaService(username=username, password=password)
+        if persistir and not service.guardar_mapeo_cuenta(codigo, categoria, nombre):
+            raise HTTPException(status_code=500, detail="Error guardando mapeo")
+        
+        concepto_destino = migrar_codigo_antiguo(categoria, service._migracion_codigos)
+        celdas = escenario.aplicar_reclasificacion(codigo, concepto_destino)
+        return {
+            "escenario_id": escenario_id,
+            "version": escenario.version,
+            "requiere_recalculo": celdas is None,
+            "celdas": celdas or []
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error simulando mapeo de cuenta {codigo}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/what-if/{escenario_id}")
+async def eliminar_escenario_what_if(escenario_id: str):
+    """Descarta la base de hechos de un escenario."""
+    return {"success": eliminar_escenario(escenario_id)}
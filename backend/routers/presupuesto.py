@@ -6,6 +6,7 @@ import pandas as pd
 
 from backend.services.presupuesto_service import (
     DATA_DIR,
+    compilar_presupuesto,
     get_presupuesto,
     comparar_real_vs_ppto
 )
@@ -33,16 +34,18 @@ async def upload_presupuesto(
     filepath = DATA_DIR / filename
     filepath.write_bytes(contents)
 
-    excel_file = pd.ExcelFile(BytesIO(contents))
-    hojas = excel_file.sheet_names
-    df_preview = pd.read_excel(BytesIO(contents), sheet_name=0, nrows=5)
+    with pd.ExcelFile(BytesIO(contents)) as excel_file:
+        hojas = excel_file.sheet_names
+        df_preview = excel_file.parse(sheet_name=0, nrows=5)
 
     return {
         "message": f"Archivo de presupuesto {anio} subido correctamente",
         "filename": filename,
         "hojas_disponibles": hojas,
         "columnas": list(df_preview.columns),
-        "filas_ejemplo": len(df_preview)
+        "filas_ejemplo": len(df_preview),
+        # Compila a Parquet ahora para que la primera consulta no lea el xlsx
+        "compilado": compilar_presupuesto(anio) if anio in (2025, 2026) else None
     }
 
 
@@ -244,7 +244,11 @@ async def obtener_snapshots(
     username: str = Query(..., description="Usuario Odoo"),
     password: str = Query(..., description="API Key Odoo"),
     fecha: Optional[str] = Query(None, description="Filtrar por fecha"),
-    limit: int = Query(50, description="Límite de resultados")
+    limit: int = Query(50, description="Límite de resultados"),
+    planta: Optional[str] = Query(None, description="Filtrar por planta"),
+    fecha_inicio: Optional[str] = Query(None, description="Inicio del rango (YYYY-MM-DD)"),
+    fecha_fin: Optional[str] = Query(None, description="Fin del rango (YYYY-MM-DD)"),
+    incluir_detalle: bool = Query(True, description="Incluir detalle de procesos")
 ):
     """
     Obtiene snapshots guardados.
@@ -252,7 +256,29 @@ async def obtener_snapshots(
     try:
         from backend.services.monitor_produccion_service import MonitorProduccionService
         service = MonitorProduccionService(username=username, password=password)
-        return service.obtener_snapshots(fecha, limit)
+        return service.obtener_snapshots(fecha, limit, planta, fecha_inicio, fecha_fin, incluir_detalle)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/monitor/snapshots/evolucion")
+async def get_evolucion_snapshots(
+    username: str = Query(..., description="Usuario Odoo"),
+    password: str = Query(..., description="API Key Odoo"),
+    fecha_inicio: str = Query(..., description="Fecha inicio (YYYY-MM-DD)"),
+    fecha_fin: str = Query(..., description="Fecha fin (YYYY-MM-DD)"),
+    planta: Optional[str] = Query(None, description="Planta (vacío = Todas)"),
+    grano: str = Query("hora", description="Granularidad: hora o dia")
+):
+    """
+    Evolución del avance según los snapshots registrados.
+    """
+    try:
+        from backend.services.monitor_produccion_service import MonitorProduccionService
+        service = MonitorProduccionService(username=username, password=password)
+        return service.get_evolucion_snapshots(fecha_inicio, fecha_fin, planta, grano)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -299,16 +325,28 @@ async def download_monitor_report_pdf(data: dict):
         from fastapi.responses import StreamingResponse
         import io
 
-        pdf_bytes = generate_monitor_report_pdf(
-            fecha_inicio=data.get('fecha_inicio', ''),
-            fecha_fin=data.get('fecha_fin', ''),
-            planta=data.get('planta', 'Todas'),
-            sala=data.get('sala', 'Todas'),
-            procesos_pendientes=data.get('procesos_pendientes', []),
-            procesos_cerrados=data.get('procesos_cerrados', []),
-            evolucion=data.get('evolucion', []),
-            totales=data.get('totales', {})
-        )
+        if data.get('username') and data.get('password'):
+            # Reporte armado en el servidor desde la línea de tiempo del monitor
+            from backend.services.monitor_produccion_service import MonitorProduccionService
+            service = MonitorProduccionService(username=data['username'], password=data['password'])
+            pdf_bytes = generate_monitor_report_pdf(**service.get_datos_reporte(
+                data.get('fecha_inicio', ''),
+                data.get('fecha_fin', ''),
+                data.get('planta'),
+                data.get('sala'),
+                data.get('producto')
+            ))
+        else:
+            pdf_bytes = generate_monitor_report_pdf(
+                fecha_inicio=data.get('fecha_inicio', ''),
+                fecha_fin=data.get('fecha_fin', ''),
+                planta=data.get('planta', 'Todas'),
+                sala=data.get('sala', 'Todas'),
+                procesos_pendientes=data.get('procesos_pendientes', []),
+                procesos_cerrados=data.get('procesos_cerrados', []),
+                evolucion=data.get('evolucion', []),
+                totales=data.get('totales', {})
+            )
         
         return StreamingResponse(
             io.BytesIO(pdf_bytes),
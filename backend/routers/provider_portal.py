@@ -5,10 +5,11 @@ from datetime import date, timedelta
 import os
 from typing import Optional
 
-from fastapi import APIRouter, Header, HTTPException, Query, Response
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
+from backend.services.blob_cache_service import BlobRef, thumbnail
 from backend.services.provider_portal_service import (
     ProviderPortalAuthService,
     ProviderPortalDataService,
@@ -39,6 +40,73 @@ def _get_session(authorization: Optional[str] = Header(None), token: Optional[st
     return access_token, session
 
 
+BLOB_CHUNK_SIZE = 64 * 1024
+
+
+def _parse_range(range_header: Optional[str], size: int) -> Optional[tuple]:
+    """
+    Parsea un header Range de un solo tramo ("bytes=a-b", "bytes=a-", "bytes=-n").
+    None = sin rango (respuesta completa); (None, None) = rango no satisfacible.
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    start_str, _, end_str = range_header[6:].strip().partition("-")
+    try:
+        if start_str:
+            start = int(start_str)
+            end = min(int(end_str), size - 1) if end_str else size - 1
+        else:
+            start = max(size - int(end_str), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        return (None, None)
+    return start, end
+
+
+def _iter_file(path, start: int, end: int):
+    with open(path, "rb") as handler:
+        handler.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = handler.read(min(BLOB_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _blob_response(request: Request, ref: BlobRef, thumb: Optional[int] = None) -> Response:
+    """Sirve un binario cacheado con ETag (304), Range (206) y streaming por bloques."""
+    if thumb:
+        ref = thumbnail(ref, thumb)
+    headers = {
+        "ETag": ref.etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=86400",
+        "Content-Disposition": f"inline; filename={ref.name}",
+        # Sin GZip: los binarios ya vienen comprimidos y Range/Content-Length son sobre los bytes originales
+        "Content-Encoding": "identity",
+    }
+    if ref.etag in (request.headers.get("if-none-match") or ""):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = _parse_range(request.headers.get("range"), ref.size)
+    if byte_range is None:
+        headers["Content-Length"] = str(ref.size)
+        return StreamingResponse(_iter_file(ref.path, 0, ref.size - 1), media_type=ref.mimetype, headers=headers)
+
+    start, end = byte_range
+    if start is None:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{ref.size}"})
+    headers["Content-Range"] = f"bytes {start}-{end}/{ref.size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        _iter_file(ref.path, start, end), status_code=206, media_type=ref.mimetype, headers=headers
+    )
+
+
 @router.post("/login")
 async def provider_login(request: ProviderLoginRequest, response: Response):
     try:
@@ -142,18 +210,16 @@ async def provider_dashboard(
 @router.get("/attachments/{attachment_id}")
 async def provider_attachment(
     attachment_id: int,
+    request: Request,
+    thumb: Optional[int] = Query(None, description="Lado de la miniatura en px (solo imágenes)"),
     authorization: Optional[str] = Header(None),
     token: Optional[str] = Query(None),
 ):
     _, session = _get_session(authorization, token)
     try:
         service = ProviderPortalDataService(provider_session=session)
-        content, meta = service.get_attachment_content(int(session["partner_id"]), attachment_id)
-        return StreamingResponse(
-            iter([content]),
-            media_type=meta["mimetype"],
-            headers={"Content-Disposition": f"inline; filename={meta['name']}"},
-        )
+        ref = service.get_attachment_content(int(session["partner_id"]), attachment_id)
+        return _blob_response(request, ref, thumb)
     except ValueError as exc:
         raise HTTPException(status_code=403, detail=str(exc))
     except Exception as exc:
@@ -164,18 +230,16 @@ async def provider_attachment(
 async def provider_qc_photo(
     qc_id: int,
     field_name: str,
+    request: Request,
+    thumb: Optional[int] = Query(None, description="Lado de la miniatura en px (solo imágenes)"),
     authorization: Optional[str] = Header(None),
     token: Optional[str] = Query(None),
 ):
     _, session = _get_session(authorization, token)
     try:
         service = ProviderPortalDataService(provider_session=session)
-        content, meta = service.get_quality_check_binary(int(session["partner_id"]), qc_id, field_name)
-        return StreamingResponse(
-            iter([content]),
-            media_type=meta["mimetype"],
-            headers={"Content-Disposition": f"inline; filename={meta['name']}"},
-        )
+        ref = service.get_quality_check_binary(int(session["partner_id"]), qc_id, field_name)
+        return _blob_response(request, ref, thumb)
     except ValueError as exc:
         raise HTTPException(status_code=403, detail=str(exc))
     except Exception as exc:
@@ -185,18 +249,15 @@ async def provider_qc_photo(
 @router.get("/documents/{move_id}/pdf")
 async def provider_document_pdf(
     move_id: int,
+    request: Request,
     authorization: Optional[str] = Header(None),
     token: Optional[str] = Query(None),
 ):
     _, session = _get_session(authorization, token)
     try:
         service = ProviderPortalDataService(provider_session=session)
-        content, meta = service.get_document_pdf(int(session["partner_id"]), move_id)
-        return StreamingResponse(
-            iter([content]),
-            media_type=meta["mimetype"],
-            headers={"Content-Disposition": f"inline; filename={meta['name']}"},
-        )
+        ref = service.get_document_pdf(int(session["partner_id"]), move_id)
+        return _blob_response(request, ref)
     except ValueError as exc:
         raise HTTPException(status_code=403, detail=str(exc))
     except Exception as exc:
@@ -1,11 +1,13 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from typing import Optional, List
 
 from backend.services.recepcion_service import get_recepciones_mp, validar_recepciones, get_recepciones_pallets, get_ocs_mp_sin_factura, get_recepciones_mp_facturacion
 from backend.services.recepciones_gestion_service import RecepcionesGestionService
 from backend.services.report_service import generate_recepcion_report_pdf
-from backend.services.excel_service import generate_recepciones_excel
+from backend.services.excel_service import iter_recepciones_excel
+from backend.services.xlsx_stream import XLSX_MEDIA_TYPE
 from backend.cache import get_cache
+from backend.utils.columnar import arrow_or_json
 from fastapi.responses import StreamingResponse
 from io import BytesIO
 import os
@@ -34,6 +36,7 @@ def _technical_odoo_credentials():
 
 @router.get("/")
 async def get_recepciones(
+    request: Request,
     username: str = Query(..., description="Usuario Odoo"),
     password: str = Query(..., description="API Key Odoo"),
     fecha_inicio: str = Query(..., description="Fecha inicio (YYYY-MM-DD)"),
@@ -55,13 +58,13 @@ async def get_recepciones(
     
     try:
         data = get_recepciones_mp(username, password, fecha_inicio, fecha_fin, productor_id, solo_hechas, origen, estados)
-        return data
+        return arrow_or_json(request, data)
     except Exception as e:
         if _is_stock_move_access_error(e):
             tech_user, tech_pass = _technical_odoo_credentials()
             if tech_user and tech_pass:
                 data = get_recepciones_mp(tech_user, tech_pass, fecha_inicio, fecha_fin, productor_id, solo_hechas, origen, estados)
-                return data
+                return arrow_or_json(request, data)
         import traceback
         error_trace = traceback.format_exc()
         print(f"[ERROR] Error en get_recepciones: {str(e)}")
@@ -123,16 +126,16 @@ async def get_recepciones_report_xlsx(
 ):
     """Genera y entrega un Excel (.xlsx) con detalle de recepciones y productos desglosados."""
     try:
-        xlsx_bytes = generate_recepciones_excel(
+        # Los datos se consultan aquí; el archivo se escribe mientras se descarga
+        xlsx_stream = iter_recepciones_excel(
             username, password, fecha_inicio, fecha_fin, 
             include_prev_week, include_month_accum, solo_hechas=solo_hechas,
             filter_tipo_fruta=tipo_fruta, filter_clasificacion=clasificacion,
             filter_manejo=manejo, filter_productor=productor,
             filter_origen=origen
         )
-        buf = BytesIO(xlsx_bytes)
         filename = f"informe_recepciones_{fecha_inicio}_a_{fecha_fin}.xlsx"
-        return StreamingResponse(buf, media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', headers={
+        return StreamingResponse(xlsx_stream, media_type=XLSX_MEDIA_TYPE, headers={
             'Content-Disposition': f'attachment; filename="{filename}"'
         })
     except Exception as e:
@@ -433,43 +436,26 @@ async def get_recepciones_pallets_excel(
     """
     Genera un archivo Excel con el detalle de cada pallet (una fila por pallet).
     """
-    from fastapi.responses import StreamingResponse
-    from io import BytesIO
-    from backend.services.excel_service import generate_pallets_excel
+    from backend.services.excel_service import iter_pallets_excel
 
+    headers = {
+        "Content-Disposition": f"attachment; filename=detalle_pallets_{fecha_inicio}_{fecha_fin}.xlsx"
+    }
     try:
-        xlsx_bytes = generate_pallets_excel(
+        xlsx_stream = iter_pallets_excel(
             username, password, fecha_inicio, fecha_fin,
             manejo, tipo_fruta, origen, variedad
         )
-        
-        buffer = BytesIO(xlsx_bytes)
-        buffer.seek(0)
-        
-        return StreamingResponse(
-            buffer,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={
-                "Content-Disposition": f"attachment; filename=detalle_pallets_{fecha_inicio}_{fecha_fin}.xlsx"
-            }
-        )
+        return StreamingResponse(xlsx_stream, media_type=XLSX_MEDIA_TYPE, headers=headers)
     except Exception as e:
         if _is_stock_move_access_error(e):
             tech_user, tech_pass = _technical_odoo_credentials()
             if tech_user and tech_pass:
-                xlsx_bytes = generate_pallets_excel(
+                xlsx_stream = iter_pallets_excel(
                     tech_user, tech_pass, fecha_inicio, fecha_fin,
                     manejo, tipo_fruta, origen, variedad
                 )
-                buffer = BytesIO(xlsx_bytes)
-                buffer.seek(0)
-                return StreamingResponse(
-                    buffer,
-                    media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    headers={
-                        "Content-Disposition": f"attachment; filename=detalle_pallets_{fecha_inicio}_{fecha_fin}.xlsx"
-                    }
-                )
+                return StreamingResponse(xlsx_stream, media_type=XLSX_MEDIA_TYPE, headers=headers)
         import traceback
         error_trace = traceback.format_exc()
         print(f"[ERROR] Error generando Excel de pallets: {str(e)}")
@@ -3,7 +3,7 @@ Router de Rendimiento Productivo
 Incluye trazabilidad inversa y endpoints para el módulo de Producción
 Nuevos análisis: Compras, Ventas, Producción, Inventario, Stock Teórico Anual
 """
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from typing import List
 
 from backend.services.rendimiento_service import RendimientoService
@@ -13,6 +13,7 @@ from backend.services.analisis_produccion_service import AnalisisProduccionServi
 from backend.services.analisis_inventario_service import AnalisisInventarioService
 from backend.services.analisis_stock_teorico_service import AnalisisStockTeoricoService
 from shared.odoo_client import OdooClient
+from backend.utils.columnar import arrow_or_json
 
 router = APIRouter(prefix="/api/v1/rendimiento", tags=["rendimiento"])
 
@@ -78,6 +79,7 @@ async def get_trazabilidad_pallets(
 
 @router.get("/dashboard")
 async def get_dashboard_completo(
+    request: Request,
     username: str = Query(..., description="Usuario Odoo"),
     password: str = Query(..., description="API Key Odoo"),
     fecha_inicio: str = Query(..., description="Fecha inicio (YYYY-MM-DD)"),
@@ -92,10 +94,14 @@ async def get_dashboard_completo(
     - consolidado: Datos por fruta/manejo
     - salas: Productividad por sala
     - mos: Lista de MOs con rendimiento
+
+    Con `Accept: application/vnd.apache.arrow.stream` la tabla `mos` viaja
+    en Arrow IPC y el resto en la metadata del stream.
     """
     try:
         service = RendimientoService(username=username, password=password)
-        return service.get_dashboard_completo(fecha_inicio, fecha_fin, solo_terminadas=solo_terminadas)
+        data = service.get_dashboard_completo(fecha_inicio, fecha_fin, solo_terminadas=solo_terminadas)
+        return arrow_or_json(request, data, tabla="mos")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -140,6 +146,76 @@ async def get_overview(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _parse_filtros_rollup(sala, turno, especie, planta, sala_tipo, periodo, producto=None) -> dict:
+    """
+    Arma el dict de filtros del cubo desde listas separadas por coma.
+    Los productos llegan como parámetro repetido (sus nombres pueden tener comas).
+    """
+    crudos = {'sala': sala, 'turno': turno, 'especie': especie,
+              'planta': planta, 'sala_tipo': sala_tipo, 'periodo': periodo}
+    filtros = {d: [v.strip() for v in valor.split(',') if v.strip()] for d, valor in crudos.items() if valor}
+    if producto:
+        filtros['producto'] = list(producto)
+    return filtros
+
+
+@router.get("/rollup")
+async def get_rollup_kg_linea(
+    username: str = Query(..., description="Usuario Odoo"),
+    password: str = Query(..., description="API Key Odoo"),
+    fecha_inicio: str = Query(..., description="Fecha inicio (YYYY-MM-DD)"),
+    fecha_fin: str = Query(..., description="Fecha fin (YYYY-MM-DD)"),
+    grano: str = Query("dia", pattern="^(dia|semana)$", description="Grano del período"),
+    agrupar_por: str = Query("periodo,sala", description="Dimensiones separadas por coma"),
+    sala: str = Query(None), turno: str = Query(None), especie: str = Query(None),
+    planta: str = Query(None), sala_tipo: str = Query(None), periodo: str = Query(None),
+    producto: List[str] = Query(None, description="Tipo de proceso (repetible)"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(500, ge=1, le=5000)
+):
+    """
+    USADO POR PRODUCCIÓN (KG por Línea): cubo pre-agregado periodo × sala × turno × especie × planta × producto.
+    
+    Se calcula una vez por rango (caché 3 min) y se re-agrupa/filtra en el servidor,
+    evitando enviar todas las MOs al frontend. Filtros: valores separados por coma.
+    """
+    try:
+        service = RendimientoService(username=username, password=password)
+        return service.get_rollup_kg_linea(
+            fecha_inicio, fecha_fin, grano=grano,
+            agrupar_por=[d.strip() for d in agrupar_por.split(',') if d.strip()],
+            filtros=_parse_filtros_rollup(sala, turno, especie, planta, sala_tipo, periodo, producto),
+            page=page, page_size=page_size
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/rollup/mos")
+async def get_rollup_mos(
+    username: str = Query(..., description="Usuario Odoo"),
+    password: str = Query(..., description="API Key Odoo"),
+    fecha_inicio: str = Query(..., description="Fecha inicio (YYYY-MM-DD)"),
+    fecha_fin: str = Query(..., description="Fecha fin (YYYY-MM-DD)"),
+    grano: str = Query("dia", pattern="^(dia|semana)$", description="Grano del período"),
+    sala: str = Query(None), turno: str = Query(None), especie: str = Query(None),
+    planta: str = Query(None), sala_tipo: str = Query(None), periodo: str = Query(None),
+    producto: List[str] = Query(None, description="Tipo de proceso (repetible)"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(100, ge=1, le=1000)
+):
+    """Drill-down: MOs de las celdas del cubo que cumplen los filtros, paginadas."""
+    try:
+        service = RendimientoService(username=username, password=password)
+        return service.get_rollup_mos(
+            fecha_inicio, fecha_fin, grano=grano,
+            filtros=_parse_filtros_rollup(sala, turno, especie, planta, sala_tipo, periodo, producto),
+            page=page, page_size=page_size
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ====================================================================
 # NUEVOS ENDPOINTS - ANÁLISIS SEPARADOS
 # ====================================================================
@@ -0,0 +1,59 @@
+"""
+Router de trabajos de reportes en segundo plano: enviar, consultar/esperar y descargar.
+"""
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import FileResponse
+
+router = APIRouter(prefix="/api/v1/reportes", tags=["reportes"])
+
+
+@router.post("/jobs")
+async def enviar_reporte(data: dict):
+    """
+    Encola un reporte. Body: {"tipo", "username", "password", "params": {...}, "forzar": false}.
+    Parámetros idénticos reutilizan el trabajo en curso o el archivo ya generado.
+    """
+    from backend.services import report_jobs
+
+    if not data.get('tipo') or not data.get('username') or not data.get('password'):
+        raise HTTPException(status_code=400, detail="tipo, username y password son obligatorios")
+    try:
+        return report_jobs.enviar(
+            data['tipo'], data['username'], data['password'],
+            data.get('params') or {}, forzar=bool(data.get('forzar'))
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except report_jobs.ColaLlenaError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/jobs/{job_id}")
+def estado_reporte(
+    job_id: str,
+    esperar: float = Query(0, ge=0, le=30, description="Segundos a esperar si el reporte aún no termina"),
+):
+    """Estado y progreso del trabajo. Con esperar > 0 responde apenas termina (long polling)."""
+    from backend.services import report_jobs
+
+    job = report_jobs.esperar(job_id, esperar) if esperar else report_jobs.estado(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Reporte no encontrado o expirado")
+    return job
+
+
+@router.get("/jobs/{job_id}/descarga")
+async def descargar_reporte(job_id: str):
+    """Entrega el archivo generado (409 si todavía no está listo)."""
+    from backend.services import report_jobs
+
+    resultado = report_jobs.artefacto(job_id)
+    if resultado is None:
+        job = report_jobs.estado(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Reporte no encontrado o expirado")
+        raise HTTPException(status_code=409, detail=f"Reporte en estado '{job['estado']}'")
+    path, filename, media_type = resultado
+    return FileResponse(path, media_type=media_type, filename=filename)
@@ -7,6 +7,8 @@ from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 import os
 
+from backend.services.excel_compilado import compilar
+
 # Ruta del archivo Excel de abastecimiento - buscar en múltiples ubicaciones
 def _get_excel_path():
     """Busca el Excel en múltiples ubicaciones posibles."""
@@ -62,24 +64,54 @@ def _get_week_start_date(week_num: int) -> datetime:
     return base_date + timedelta(weeks=weeks_offset)
 
 
-# Cache para evitar recargar el Excel en cada petición
-from functools import lru_cache
-import time
+# Subir al cambiar la normalización o las vistas (fuerza recompilar el Excel)
+VERSION_COMPILADO = 1
 
-_cache_timestamp = 0
-_cache_ttl = 300  # 5 minutos en segundos
-_cached_df = None
 
-def _get_cached_proyecciones():
-    """Obtiene proyecciones con cache de 5 minutos."""
-    global _cache_timestamp, _cached_df
-    current_time = time.time()
-    
-    if _cached_df is None or (current_time - _cache_timestamp) > _cache_ttl:
-        _cached_df = _load_proyecciones_from_excel()
-        _cache_timestamp = current_time
-    
-    return _cached_df
+def _compilar_proyecciones(path) -> Dict[str, pd.DataFrame]:
+    """Base larga (productor/planta/especie/semana) y vista semanal pre-agregada."""
+    df_long = _load_proyecciones_from_excel()
+    precio = pd.to_numeric(df_long['precio'], errors='coerce')
+    semanal = (
+        df_long.assign(
+            gasto_proyectado=df_long['kg_proyectados'] * precio.fillna(0),
+            precio_x_kg=precio * df_long['kg_proyectados'],
+        )
+        .groupby(['planta', 'especie_manejo', 'semana', 'fecha_semana'], dropna=False)
+        .agg(kg_proyectados=('kg_proyectados', 'sum'),
+             gasto_proyectado=('gasto_proyectado', 'sum'),
+             precio_x_kg=('precio_x_kg', 'sum'))
+        .reset_index()
+    )
+    return {'proyecciones': df_long, 'semanal': semanal}
+
+
+def _tablas_proyecciones() -> Dict[str, pd.DataFrame]:
+    """
+    Tablas compiladas del Excel de abastecimiento. El xlsx solo se vuelve a
+    leer cuando cambia el archivo (mtime / tamaño), no por TTL.
+    """
+    if not os.path.exists(ABASTECIMIENTO_EXCEL_PATH):
+        raise FileNotFoundError(f"No se encontró el archivo de abastecimiento: {ABASTECIMIENTO_EXCEL_PATH}")
+    return compilar('abastecimiento_proyecciones', ABASTECIMIENTO_EXCEL_PATH,
+                    _compilar_proyecciones, version=VERSION_COMPILADO)
+
+
+def _filtrar(df: pd.DataFrame, planta: Optional[List[str]] = None,
+             especie: Optional[List[str]] = None) -> pd.DataFrame:
+    if planta:
+        planta_upper = [p.upper() for p in planta]
+        df = df[df['planta'].isin(planta_upper)]
+    if especie:
+        # Filtrar por especie_manejo (formato normalizado)
+        df = df[df['especie_manejo'].isin(especie)]
+    return df
+
+
+def _orden_temporada(grouped: pd.DataFrame) -> pd.DataFrame:
+    """Ordena por semana de temporada (47-52 primero, luego 1-17)."""
+    orden = grouped['semana'].where(grouped['semana'] >= 47, grouped['semana'] + 100)
+    return grouped.assign(_orden=orden).sort_values('_orden', kind='stable').drop(columns=['_orden'])
 
 
 def _load_proyecciones_from_excel() -> pd.DataFrame:
@@ -193,10 +225,10 @@ def _load_proyecciones_from_excel() -> pd.DataFrame:
 
 def load_proyecciones_consolidado() -> pd.DataFrame:
     """
-    Carga los datos de proyección consolidados del Excel (con cache).
-    El cache se renueva cada 5 minutos.
+    Carga los datos de proyección consolidados del Excel (compilados a Parquet,
+    se recompilan solo si el archivo cambió).
     """
-    return _get_cached_proyecciones().copy()
+    return _tablas_proyecciones()['proyecciones'].copy()
 
 def get_proyecciones_por_semana(
     planta: Optional[List[str]] = None,
@@ -225,44 +257,28 @@ def get_proyecciones_por_semana(
         elif not isinstance(especie, list):
             especie = list(especie) if especie else []
     
-    df = load_proyecciones_consolidado()
-    
-    # Aplicar filtros
-    if planta:
-        planta_upper = [p.upper() for p in planta]
-        df = df[df['planta'].isin(planta_upper)]
-    
-    if especie:
-        # Filtrar por especie_manejo (formato normalizado)
-        df = df[df['especie_manejo'].isin(especie)]
-    
-    # Calcular gasto proyectado por fila (kg × precio)
-    df['precio'] = pd.to_numeric(df['precio'], errors='coerce').fillna(0)
-    df['gasto_proyectado'] = df['kg_proyectados'] * df['precio']
-    
+    # Vista semanal pre-agregada (planta / especie_manejo / semana)
+    df = _filtrar(_tablas_proyecciones()['semanal'], planta, especie)
+
     # Agrupar por semana
     grouped = df.groupby(['semana', 'fecha_semana']).agg({
         'kg_proyectados': 'sum',
         'gasto_proyectado': 'sum'
     }).reset_index()
-    
-    # Ordenar por semana (47-52 primero, luego 1-17)
-    def sort_key(x):
-        return x if x >= 47 else x + 100
-    
-    grouped['sort_key'] = grouped['semana'].apply(sort_key)
-    grouped = grouped.sort_values('sort_key').drop(columns=['sort_key'])
-    
-    result = []
-    for _, row in grouped.iterrows():
-        result.append({
-            'semana': int(row['semana']),
-            'fecha_semana': row['fecha_semana'].strftime('%Y-%m-%d'),
-            'kg_proyectados': float(row['kg_proyectados']),
-            'gasto_proyectado': float(row['gasto_proyectado'])
-        })
-    
-    return result
+    grouped = _orden_temporada(grouped)
+
+    return [
+        {
+            'semana': int(semana),
+            'fecha_semana': pd.Timestamp(fecha).strftime('%Y-%m-%d'),
+            'kg_proyectados': float(kg),
+            'gasto_proyectado': float(gasto)
+        }
+        for semana, fecha, kg, gasto in zip(
+            grouped['semana'], grouped['fecha_semana'],
+            grouped['kg_proyectados'], grouped['gasto_proyectado']
+        )
+    ]
 
 
 def get_proyecciones_detalle(
@@ -285,34 +301,20 @@ def get_proyecciones_detalle(
         elif not isinstance(planta, list):
             planta = list(planta) if planta else []
     
-    df = load_proyecciones_consolidado()
-    
-    # Aplicar filtros
-    if planta:
-        planta_upper = [p.upper() for p in planta]
-        df = df[df['planta'].isin(planta_upper)]
-    
+    df = _filtrar(_tablas_proyecciones()['semanal'], planta)
+
     # Agrupar por semana y especie_manejo (NO por productor)
     grouped = df.groupby(['semana', 'especie_manejo']).agg({
         'kg_proyectados': 'sum'
     }).reset_index()
-    
-    # Ordenar por semana
-    def sort_key(x):
-        return x if x >= 47 else x + 100
-    
-    grouped['sort_key'] = grouped['semana'].apply(sort_key)
-    grouped = grouped.sort_values('sort_key').drop(columns=['sort_key'])
-    
-    result = []
-    for _, row in grouped.iterrows():
-        result.append({
-            'semana': int(row['semana']),
-            'especie_manejo': row['especie_manejo'],
-            'kg_proyectados': float(row['kg_proyectados'])
-        })
-    
-    return result
+    grouped = _orden_temporada(grouped)
+
+    return [
+        {'semana': int(semana), 'especie_manejo': especie_manejo, 'kg_proyectados': float(kg)}
+        for semana, especie_manejo, kg in zip(
+            grouped['semana'], grouped['especie_manejo'], grouped['kg_proyectados']
+        )
+    ]
 
 
 def get_proyecciones_por_especie(
@@ -350,14 +352,14 @@ def get_proyecciones_por_especie(
 
 def get_especies_disponibles() -> List[str]:
     """Retorna lista de especies normalizadas (especie + manejo) disponibles en el Excel."""
-    df = load_proyecciones_consolidado()
+    df = _tablas_proyecciones()['semanal']
     return sorted(df['especie_manejo'].dropna().unique().tolist())
 
 
 def get_semanas_disponibles() -> List[int]:
     """Retorna lista de semanas disponibles en el Excel."""
-    df = load_proyecciones_consolidado()
-    semanas = df['semana'].unique().tolist()
+    df = _tablas_proyecciones()['semanal']
+    semanas = [int(s) for s in df['semana'].unique().tolist()]
     # Ordenar: 47-52 primero, luego 1-17
     semanas_ordenadas = sorted([s for s in semanas if s >= 47]) + sorted([s for s in semanas if s < 47])
     return semanas_ordenadas
@@ -387,29 +389,16 @@ def get_precios_por_especie(
         elif not isinstance(especie, list):
             especie = list(especie) if especie else []
     
-    df = load_proyecciones_consolidado()
-    
-    # Aplicar filtros
-    if planta:
-        planta_upper = [p.upper() for p in planta]
-        df = df[df['planta'].isin(planta_upper)]
-    
-    if especie:
-        df = df[df['especie_manejo'].isin(especie)]
-    
-    # Convertir precio a float, reemplazar 0 por NaN para promediar mejor
-    df['precio'] = pd.to_numeric(df['precio'], errors='coerce')
-    
-    # Agrupar por especie_manejo (incluye tipo fruta + manejo) y obtener precio promedio (ponderado por kg)
-    # Precio = suma(precio * kg) / suma(kg)
-    df['precio_x_kg'] = df['precio'] * df['kg_proyectados']
-    
+    # precio_x_kg = suma(precio * kg) ya viene pre-agregado en la vista semanal
+    df = _filtrar(_tablas_proyecciones()['semanal'], planta, especie)
+
     # Agrupar por especie_manejo para tener precios específicos por manejo
+    # Precio = suma(precio * kg) / suma(kg)
     grouped = df.groupby('especie_manejo').agg({
         'kg_proyectados': 'sum',
         'precio_x_kg': 'sum'
     }).reset_index()
-    
+
     grouped['precio_promedio'] = grouped.apply(
         lambda row: row['precio_x_kg'] / row['kg_proyectados'] if row['kg_proyectados'] > 0 else 0,
         axis=1
@@ -1,9 +1,24 @@
 """
 Servicio para análisis de stock teórico anual
 Calcula: Compras - Ventas - Merma proyectada por año, tipo de fruta y manejo
+
+Los agregados de compras/ventas por temporada se guardan en stock_teorico_store:
+las temporadas cerradas se calculan una sola vez, la temporada en curso se
+parte por mes y solo el tramo abierto se vuelve a consultar. Las particiones
+que faltan se consultan en paralelo (un cliente Odoo por hilo).
 """
-from typing import List, Dict, Optional
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Optional, Tuple
+
+from backend.cache import get_cache
+from backend.services import stock_teorico_store
+from backend.services.producto_dimension_service import get_productos
+from shared.odoo_client import OdooClient
+
+
+MAX_HILOS_PARTICIONES = 4
+TTL_PARTICION_ABIERTA = 600  # segundos; tramo de la temporada en curso
 
 
 class AnalisisStockTeoricoService:
@@ -87,7 +102,8 @@ class AnalisisStockTeoricoService:
         merma_total_kg = 0
         merma_total_base = 0
         
-        # Procesar cada temporada
+        # Rango de cada temporada
+        rangos = {}
         for anio in sorted(anios):
             # Temporada comienza en noviembre del año anterior
             fecha_desde = f"{anio - 1}-11-01"
@@ -106,11 +122,13 @@ class AnalisisStockTeoricoService:
                 # Temporadas futuras: hasta el corte
                 fecha_hasta = fecha_corte_completa
             
-            # Obtener compras
-            compras = self._get_compras_por_tipo_manejo(fecha_desde, fecha_hasta)
-            
-            # Obtener ventas
-            ventas = self._get_ventas_por_tipo_manejo(fecha_desde, fecha_hasta)
+            rangos[anio] = (fecha_desde, fecha_hasta)
+        
+        # Compras y ventas agregadas de todas las temporadas (lo que falta se consulta en paralelo)
+        agregados = self._get_agregados_rangos(list(rangos.values()))
+        
+        for anio, (fecha_desde, fecha_hasta) in rangos.items():
+            compras, ventas = agregados[(fecha_desde, fecha_hasta)]
             
             # Calcular merma real (diferencia entre compras y ventas)
             # Asumimos: Compras - Ventas = Stock + Merma
@@ -149,6 +167,107 @@ class AnalisisStockTeoricoService:
             'por_anio': resultados_por_anio
         }
     
+    def _particiones(self, fecha_desde: str, fecha_hasta: str) -> List[Tuple[str, str]]:
+        """
+        Parte el rango para el store: un rango cerrado es una sola partición;
+        uno abierto se parte por mes (los meses cerrados quedan guardados).
+        Lo que empieza después de hoy no tiene facturas y se omite.
+        """
+        hoy = date.today()
+        if fecha_desde > hoy.isoformat():
+            return []
+        if stock_teorico_store.es_cerrado(fecha_hasta, hoy):
+            return [(fecha_desde, fecha_hasta)]
+        
+        particiones = []
+        inicio = datetime.strptime(fecha_desde, "%Y-%m-%d").date()
+        while inicio.isoformat() <= min(fecha_hasta, hoy.isoformat()):
+            siguiente = (inicio.replace(day=1) + timedelta(days=32)).replace(day=1)
+            fin = min((siguiente - timedelta(days=1)).isoformat(), fecha_hasta)
+            particiones.append((inicio.isoformat(), fin))
+            inicio = siguiente
+        return particiones
+    
+    def _get_agregados_rangos(self, rangos: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Tuple[List[Dict], List[Dict]]]:
+        """
+        Compras y ventas agregadas por tipo/manejo de cada rango (desde, hasta).
+        
+        Cada rango se arma con sus particiones: las cerradas salen del store y
+        las abiertas del caché en memoria; las que faltan se consultan a Odoo en
+        paralelo y se guardan. Las listas de varias particiones se concatenan
+        (_consolidar_datos suma por tipo/manejo).
+        """
+        cache = get_cache()
+        particiones_por_rango = {rango: self._particiones(*rango) for rango in rangos}
+        
+        agregados = {}
+        faltantes = []
+        for particion in sorted({p for ps in particiones_por_rango.values() for p in ps}):
+            if stock_teorico_store.es_cerrado(particion[1]):
+                guardado = stock_teorico_store.obtener(*particion)
+                if guardado is not None:
+                    agregados[particion] = (guardado['compras'], guardado['ventas'])
+                    continue
+            else:
+                cached = cache.get(cache._make_key('stock_teorico_particion', *particion))
+                if cached is not None:
+                    agregados[particion] = cached
+                    continue
+            faltantes.append(particion)
+        
+        if faltantes:
+            inicio = datetime.now()
+            for particion, resultado in zip(faltantes, self._consultar_particiones(faltantes)):
+                agregados[particion] = resultado
+                if stock_teorico_store.es_cerrado(particion[1]):
+                    stock_teorico_store.guardar(particion[0], particion[1], *resultado)
+                else:
+                    cache.set(cache._make_key('stock_teorico_particion', *particion), resultado,
+                              ttl=TTL_PARTICION_ABIERTA)
+            segundos = (datetime.now() - inicio).total_seconds()
+            print(f"[StockTeorico] {len(faltantes)} particiones consultadas a Odoo en {segundos:.1f}s")
+        
+        resultado = {}
+        for rango, particiones in particiones_por_rango.items():
+            compras, ventas = [], []
+            for particion in particiones:
+                compras.extend(agregados[particion][0])
+                ventas.extend(agregados[particion][1])
+            resultado[rango] = (compras, ventas)
+        return resultado
+    
+    def _consultar_particiones(self, particiones: List[Tuple[str, str]]) -> List[Tuple[List[Dict], List[Dict]]]:
+        """Compras y ventas de cada partición; con más de una, en hilos con su propio cliente Odoo."""
+        if len(particiones) == 1:
+            desde, hasta = particiones[0]
+            return [(self._get_compras_por_tipo_manejo(desde, hasta),
+                     self._get_ventas_por_tipo_manejo(desde, hasta))]
+        
+        def consultar(particion: Tuple[str, str]) -> Tuple[List[Dict], List[Dict]]:
+            # xmlrpc no es thread-safe: cada hilo usa su propia conexión
+            odoo = OdooClient(username=self.odoo.username, password=self.odoo.password,
+                              url=self.odoo.url, db=self.odoo.db)
+            servicio = AnalisisStockTeoricoService(odoo)
+            return (servicio._get_compras_por_tipo_manejo(*particion),
+                    servicio._get_ventas_por_tipo_manejo(*particion))
+        
+        with ThreadPoolExecutor(max_workers=min(MAX_HILOS_PARTICIONES, len(particiones))) as executor:
+            return list(executor.map(consultar, particiones))
+    
+    def _mapear_productos(self, prod_ids: List[int]) -> Dict[int, Dict]:
+        """Tipo de fruta, manejo, nombre y categoría por producto (dimensión de productos)."""
+        productos_map = {}
+        for prod_id, p in get_productos(self.odoo, prod_ids).items():
+            if not p.get('tmpl_id'):
+                continue
+            productos_map[prod_id] = {
+                'tipo_fruta': p['especie'] or 'Sin tipo',
+                'manejo': p['manejo'] or 'Sin manejo',
+                'nombre': p['name'],
+                'categoria': p['categ']
+            }
+        return productos_map
+    
     def _get_compras_por_tipo_manejo(self, fecha_desde: str, fecha_hasta: str) -> List[Dict]:
         """
         Obtiene compras agrupadas por tipo de fruta y manejo.
@@ -207,107 +326,10 @@ class AnalisisStockTeoricoService:
         if not lineas:
             return []
         
-        # Obtener product.product
+        # Productos desde la dimensión compartida (incluye archivados: se leen por ID)
         prod_ids = list(set([l.get('product_id', [None])[0] for l in lineas if l.get('product_id')]))
-        
-        print(f"[DEBUG COMPRAS] IDs de productos únicos en líneas: {len(prod_ids)}")
-        
-        # IMPORTANTE: Usar execute_kw con active_test=False para incluir productos archivados
-        productos = self.odoo.models.execute_kw(
-            self.odoo.db, self.odoo.uid, self.odoo.password,
-            'product.product', 'read',
-            [prod_ids, ['id', 'product_tmpl_id', 'categ_id']],
-            {'context': {'active_test': False}}
-        )
-        
-        print(f"[DEBUG COMPRAS] Productos encontrados en Odoo: {len(productos)}")
-        
-        # Obtener templates únicos
-        template_ids = set()
-        product_to_template = {}
-        
-        for prod in productos:
-            prod_id = prod['id']
-            tmpl = prod.get('product_tmpl_id')
-            if tmpl:
-                tmpl_id = tmpl[0] if isinstance(tmpl, (list, tuple)) else tmpl
-                template_ids.add(tmpl_id)
-                product_to_template[prod_id] = {
-                    'tmpl_id': tmpl_id,
-                    'categ': prod.get('categ_id', [None, ''])
-                }
-        
-        print(f"[DEBUG COMPRAS] Templates únicos: {len(template_ids)}")
-        
-        # Obtener templates con campos tipo y manejo (incluir archivados)
-        template_map = {}
-        if template_ids:
-            # IMPORTANTE: active_test=False para incluir templates archivados
-            templates = self.odoo.models.execute_kw(
-                self.odoo.db, self.odoo.uid, self.odoo.password,
-                'product.template', 'read',
-                [list(template_ids), ['id', 'name', 'x_studio_sub_categora', 'x_studio_categora_tipo_de_manejo']],
-                {'context': {'active_test': False}}
-            )
-            
-            print(f"[DEBUG COMPRAS] Templates obtenidos: {len(templates)}")
-            
-            for tmpl in templates:
-                # Parsear tipo de fruta - MEJORADO
-                tipo = tmpl.get('x_studio_sub_categora')
-                if tipo:
-                    if isinstance(tipo, (list, tuple)) and len(tipo) > 1:
-                        tipo_str = tipo[1]
-                    elif isinstance(tipo, str):
-                        tipo_str = tipo
-                    elif isinstance(tipo, (list, tuple)) and len(tipo) == 1:
-                        tipo_str = str(tipo[0])
-                    else:
-                        tipo_str = None
-                else:
-                    tipo_str = None
-                
-                # Parsear manejo - MEJORADO
-                manejo = tmpl.get('x_studio_categora_tipo_de_manejo')
-                if manejo:
-                    if isinstance(manejo, (list, tuple)) and len(tipo) > 1:
-                        manejo_str = manejo[1]
-                    elif isinstance(manejo, str):
-                        manejo_str = manejo
-                    elif isinstance(manejo, (list, tuple)) and len(manejo) == 1:
-                        manejo_str = str(manejo[0])
-                    else:
-                        manejo_str = None
-                else:
-                    manejo_str = None
-                
-                template_map[tmpl['id']] = {
-                    'nombre': tmpl.get('name', ''),
-                    'tipo_fruta': tipo_str,
-                    'manejo': manejo_str,
-                    'tiene_ambos': bool(tipo_str and manejo_str)
-                }
-        
-        # Mapear productos - TODOS los productos (ya filtrados por PRODUCTOS y account codes)
-        productos_map = {}
-        productos_incluidos = 0
-        
-        for prod_id, prod_data in product_to_template.items():
-            tmpl_id = prod_data['tmpl_id']
-            categ = prod_data['categ']
-            categ_name = categ[1] if isinstance(categ, (list, tuple)) else str(categ)
-            
-            if tmpl_id in template_map:
-                tmpl_info = template_map[tmpl_id]
-                
-                # Incluir TODOS los productos que llegaron aquí (ya filtrados por cuenta contable)
-                productos_map[prod_id] = {
-                    'tipo_fruta': tmpl_info['tipo_fruta'] or 'Sin tipo',
-                    'manejo': tmpl_info['manejo'] or 'Sin manejo',
-                    'nombre': tmpl_info['nombre'],
-                    'categoria': categ_name
-                }
-                productos_incluidos += 1
+        productos_map = self._mapear_productos(prod_ids)
+        productos_incluidos = len(productos_map)
         
         print(f"[DEBUG COMPRAS] Productos incluidos: {productos_incluidos}")
         print(f"[DEBUG COMPRAS] Productos mapeados: {len(productos_map)}")
@@ -381,105 +403,10 @@ class AnalisisStockTeoricoService:
         if not lineas:
             return []
         
-        # Obtener product.product
+        # Productos desde la dimensión compartida (incluye archivados: se leen por ID)
         prod_ids = list(set([l.get('product_id', [None])[0] for l in lineas if l.get('product_id')]))
-        
-        # IMPORTANTE: Usar execute_kw con active_test=False para incluir productos archivados
-        productos = self.odoo.models.execute_kw(
-            self.odoo.db, self.odoo.uid, self.odoo.password,
-            'product.product', 'read',
-            [prod_ids, ['id', 'product_tmpl_id', 'categ_id']],
-            {'context': {'active_test': False}}
-        )
-        
-        print(f"[DEBUG VENTAS] Productos únicos: {len(productos)}")
-        
-        # Obtener templates únicos
-        template_ids = set()
-        product_to_template = {}
-        
-        for prod in productos:
-            prod_id = prod['id']
-            tmpl = prod.get('product_tmpl_id')
-            if tmpl:
-                tmpl_id = tmpl[0] if isinstance(tmpl, (list, tuple)) else tmpl
-                template_ids.add(tmpl_id)
-                product_to_template[prod_id] = {
-                    'tmpl_id': tmpl_id,
-                    'categ': prod.get('categ_id', [None, ''])
-                }
-        
-        print(f"[DEBUG VENTAS] Templates únicos: {len(template_ids)}")
-        
-        # Obtener templates con campos tipo y manejo (incluir archivados)
-        template_map = {}
-        if template_ids:
-            # IMPORTANTE: active_test=False para incluir templates archivados
-            templates = self.odoo.models.execute_kw(
-                self.odoo.db, self.odoo.uid, self.odoo.password,
-                'product.template', 'read',
-                [list(template_ids), ['id', 'name', 'x_studio_sub_categora', 'x_studio_categora_tipo_de_manejo']],
-                {'context': {'active_test': False}}
-            )
-            
-            print(f"[DEBUG VENTAS] Templates obtenidos: {len(templates)}")
-            
-            for tmpl in templates:
-                # Parsear tipo de fruta - MEJORADO
-                tipo = tmpl.get('x_studio_sub_categora')
-                if tipo:
-                    if isinstance(tipo, (list, tuple)) and len(tipo) > 1:
-                        tipo_str = tipo[1]
-                    elif isinstance(tipo, str):
-                        tipo_str = tipo
-                    elif isinstance(tipo, (list, tuple)) and len(tipo) == 1:
-                        tipo_str = str(tipo[0])
-                    else:
-                        tipo_str = None
-                else:
-                    tipo_str = None
-                
-                # Parsear manejo - MEJORADO
-                manejo = tmpl.get('x_studio_categora_tipo_de_manejo')
-                if manejo:
-                    if isinstance(manejo, (list, tuple)) and len(manejo) > 1:
-                        manejo_str = manejo[1]
-                    elif isinstance(manejo, str):
-                        manejo_str = manejo
-                    elif isinstance(manejo, (list, tuple)) and len(manejo) == 1:
-                        manejo_str = str(manejo[0])
-                    else:
-                        manejo_str = None
-                else:
-                    manejo_str = None
-                
-                template_map[tmpl['id']] = {
-                    'nombre': tmpl.get('name', ''),
-                    'tipo_fruta': tipo_str,
-                    'manejo': manejo_str,
-                    'tiene_ambos': bool(tipo_str and manejo_str)
-                }
-        
-        # Mapear productos - TODOS los productos (ya filtrados por PRODUCTOS y account codes)
-        productos_map = {}
-        productos_incluidos = 0
-        
-        for prod_id, prod_data in product_to_template.items():
-            tmpl_id = prod_data['tmpl_id']
-            categ = prod_data['categ']
-            categ_name = categ[1] if isinstance(categ, (list, tuple)) else str(categ)
-            
-            if tmpl_id in template_map:
-                tmpl_info = template_map[tmpl_id]
-                
-                # Incluir TODOS los productos que llegaron aquí (ya filtrados por cuenta contable)
-                productos_map[prod_id] = {
-                    'tipo_fruta': tmpl_info['tipo_fruta'] or 'Sin tipo',
-                    'manejo': tmpl_info['manejo'] or 'Sin manejo',
-                    'nombre': tmpl_info['nombre'],
-                    'categoria': categ_name
-                }
-                productos_incluidos += 1
+        productos_map = self._mapear_productos(prod_ids)
+        productos_incluidos = len(productos_map)
         
         print(f"[DEBUG VENTAS] Productos incluidos: {productos_incluidos}")
         print(f"[DEBUG VENTAS] Productos mapeados: {len(productos_map)}")
@@ -792,13 +719,9 @@ class AnalisisStockTeoricoService:
             fecha_hasta_2 = datetime.now().strftime("%Y-%m-%d")
         
         # Obtener datos de ambos años
-        compras_1 = self._get_compras_por_tipo_manejo(fecha_desde_1, fecha_hasta_1)
-        ventas_1 = self._get_ventas_por_tipo_manejo(fecha_desde_1, fecha_hasta_1)
-        datos_1 = self._consolidar_datos(compras_1, ventas_1)
-        
-        compras_2 = self._get_compras_por_tipo_manejo(fecha_desde_2, fecha_hasta_2)
-        ventas_2 = self._get_ventas_por_tipo_manejo(fecha_desde_2, fecha_hasta_2)
-        datos_2 = self._consolidar_datos(compras_2, ventas_2)
+        agregados = self._get_agregados_rangos([(fecha_desde_1, fecha_hasta_1), (fecha_desde_2, fecha_hasta_2)])
+        datos_1 = self._consolidar_datos(*agregados[(fecha_desde_1, fecha_hasta_1)])
+        datos_2 = self._consolidar_datos(*agregados[(fecha_desde_2, fecha_hasta_2)])
         
         # Crear índice por tipo+manejo
         map_1 = {f"{d['tipo_fruta']}||{d['manejo']}": d for d in datos_1}
@@ -0,0 +1,258 @@
+"""
+Libro de movimientos de bandejas (ledger), compartido por todo el proceso.
+
+Antes cada request de bandejas buscaba stock.move con search + read paginado
+por offset (cada página más lenta que la anterior) y, para no demorar, solo
+miraba los últimos 6 meses: los saldos por productor de temporadas anteriores
+no se podían calcular.
+
+Aquí se guardan las tablas crudas normalizadas:
+
+- movimientos: stock.move de productos de la categoría bandejas (hechos o reservados)
+- pickings: origen, nombre y productor de cada picking referenciado
+- productos: código y nombre de cada producto bandeja
+
+La primera vez se cargan completas paginando por id (keyset: id > último id,
+sin offset). Después, como máximo cada REFRESCO_SEGUNDOS, solo se releen los
+registros con write_date >= la marca de cada modelo, y cada
+RECONCILIACION_SEGUNDOS se comparan los IDs vigentes para descartar
+movimientos borrados. Las tablas y marcas se persisten en
+backend/data/bandejas_ledger/ (Parquet) y se recargan al reiniciar. El ciclo
+(paginación, marcas, refresco y persistencia) es el de read_model_incremental.
+
+El ledger (un registro por movimiento, con cantidad efectiva y si cuenta como
+entrada desde productor y/o salida a productor) se arma una vez por versión de
+los datos; las consultas de historia completa y los saldos por productor se
+responden localmente sobre ese DataFrame.
+
+Uso:
+    from backend.services import bandejas_ledger_store as ledger_store
+    df = ledger_store.get_ledger(self.odoo)
+"""
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+
+import pandas as pd
+
+from backend.services.read_model_incremental import ReadModelIncremental
+from shared.constants import CATEGORIAS
+
+
+REFRESCO_SEGUNDOS = 60
+RECONCILIACION_SEGUNDOS = 3600
+TAMANO_PAGINA = 5000
+TAMANO_LOTE = 1000
+
+STORE_DIR = Path(__file__).parent.parent / "data" / "bandejas_ledger"
+
+CATEG_ID = CATEGORIAS['bandejas_productor']  # 107
+ESTADOS = ['done', 'assigned']
+PICKING_TYPE_EXPEDICIONES = 2  # RF/OUT
+
+MOVE_FIELDS = ['date', 'picking_id', 'picking_type_id', 'product_id', 'product_uom_qty',
+               'quantity_done', 'state', 'write_date']
+PICKING_FIELDS = ['name', 'origin', 'partner_id', 'write_date']
+PRODUCT_FIELDS = ['display_name', 'default_code', 'write_date']
+
+COLUMNAS_LEDGER = [
+    'id', 'date', 'product_id', 'product_name', 'default_code', 'picking_name', 'origin',
+    'partner_name', 'state', 'qty', 'entrada', 'salida',
+]
+
+_store = ReadModelIncremental(
+    'BandejasLedger',
+    tablas=['movimientos', 'pickings', 'productos'],
+    modelos=['stock.move', 'stock.picking', 'product.product'],
+    store_dir=STORE_DIR, refresco_segundos=REFRESCO_SEGUNDOS,
+    reconciliacion_segundos=RECONCILIACION_SEGUNDOS, tamano_pagina=TAMANO_PAGINA, tamano_lote=TAMANO_LOTE,
+)
+_tablas = _store.tablas
+_ensamblado: Dict[str, Any] = {'version': -1, 'df': None}
+
+
+# ==================== NORMALIZACIÓN ====================
+
+def _m2o_id(valor: Any) -> int:
+    return int(valor[0]) if isinstance(valor, (list, tuple)) and valor else 0
+
+
+def _m2o_nombre(valor: Any, defecto: str = '') -> str:
+    return str(valor[1]) if isinstance(valor, (list, tuple)) and len(valor) > 1 else defecto
+
+
+def _fila_movimiento(m: Dict) -> Dict:
+    return {
+        'date': str(m.get('date') or ''),
+        'picking_id': _m2o_id(m.get('picking_id')),
+        'picking_type_id': _m2o_id(m.get('picking_type_id')),
+        'product_id': _m2o_id(m.get('product_id')),
+        'product_name': _m2o_nombre(m.get('product_id')),
+        'product_uom_qty': float(m.get('product_uom_qty') or 0),
+        'quantity_done': float(m.get('quantity_done') or 0),
+        'state': m.get('state') or '',
+    }
+
+
+def _fila_picking(p: Dict) -> Dict:
+    return {
+        'name': str(p.get('name') or ''),
+        'origin': str(p.get('origin') or ''),
+        'partner_name': _m2o_nombre(p.get('partner_id'), 'Unknown'),
+    }
+
+
+def _fila_producto(p: Dict) -> Dict:
+    return {
+        'display_name': str(p.get('display_name') or ''),
+        'default_code': str(p.get('default_code') or ''),
+    }
+
+
+# ==================== LECTURA DESDE ODOO ====================
+
+def _dominio_movimientos(product_ids: Iterable[int]) -> List:
+    return [('product_id', 'in', sorted(product_ids)), ('state', 'in', ESTADOS)]
+
+
+def _cargar_productos(odoo) -> set:
+    """Productos bandeja vigentes; retorna los que no estaban en el store."""
+    productos = odoo.search_read('product.product', [('categ_id', '=', CATEG_ID)], PRODUCT_FIELDS)
+    nuevos = {p['id'] for p in productos} - set(_tablas['productos'])
+    _tablas['productos'].clear()
+    _tablas['productos'].update((p['id'], _fila_producto(p)) for p in productos)
+    _store.marcar('product.product', productos)
+    return nuevos
+
+
+def _cargar_movimientos(odoo, alcance: List) -> set:
+    """(Re)carga los movimientos elegibles del alcance y retorna sus IDs."""
+    if not _tablas['productos']:
+        return set()
+    movimientos = _store.paginar(odoo, 'stock.move', _dominio_movimientos(_tablas['productos']) + alcance, MOVE_FIELDS)
+    for m in movimientos:
+        _tablas['movimientos'][m['id']] = _fila_movimiento(m)
+    _store.marcar('stock.move', movimientos)
+    return {m['id'] for m in movimientos}
+
+
+def _cargar_pickings(odoo, picking_ids: Iterable[int]) -> None:
+    for lote in _store.por_lotes(picking_ids):
+        pickings = odoo.read('stock.picking', lote, PICKING_FIELDS)
+        for p in pickings:
+            _tablas['pickings'][p['id']] = _fila_picking(p)
+        _store.marcar('stock.picking', pickings)
+
+
+def _completar_pickings(odoo) -> None:
+    referenciados = {m['picking_id'] for m in _tablas['movimientos'].values() if m['picking_id']}
+    _cargar_pickings(odoo, referenciados - set(_tablas['pickings']))
+
+
+def _carga_inicial(odoo) -> None:
+    inicio = time.time()
+    _cargar_productos(odoo)
+    _cargar_movimientos(odoo, [])
+    _completar_pickings(odoo)
+    print(f"[BandejasLedger] Carga inicial: {len(_tablas['movimientos'])} movimientos, "
+          f"{len(_tablas['pickings'])} pickings en {time.time() - inicio:.1f}s")
+
+
+def _aplicar_deltas(odoo) -> bool:
+    """Aplica cambios por write_date (>= marca: las reescrituras son idempotentes)."""
+    cambios = 0
+
+    # Productos nuevos en la categoría: se trae toda su historia
+    nuevos = _cargar_productos(odoo)
+    if nuevos:
+        cambios += len(_cargar_movimientos(odoo, [('product_id', 'in', sorted(nuevos))]))
+
+    # Movimientos modificados (cantidad hecha, estado): los que dejaron de ser elegibles salen
+    if _tablas['productos']:
+        modificados = _store.cambiados(odoo, 'stock.move', [('product_id', 'in', sorted(_tablas['productos']))])
+        for lote in _store.por_lotes(modificados):
+            antes = {i: _tablas['movimientos'].get(i) for i in lote}
+            vigentes = _cargar_movimientos(odoo, [('id', 'in', lote)])
+            for move_id in set(lote) - vigentes:
+                _tablas['movimientos'].pop(move_id, None)
+            # La marca es inclusiva (>=): solo cuenta lo que de verdad cambió
+            cambios += sum(1 for i in lote if _tablas['movimientos'].get(i) != antes[i])
+
+    # Pickings conocidos con origen o productor modificados
+    pickings = _store.conocidos_cambiados(odoo, 'stock.picking', _tablas['pickings'])
+    if pickings:
+        antes = {i: _tablas['pickings'].get(i) for i in pickings}
+        _cargar_pickings(odoo, pickings)
+        cambios += sum(1 for i in pickings if _tablas['pickings'].get(i) != antes[i])
+
+    conocidos = len(_tablas['pickings'])
+    _completar_pickings(odoo)
+    return cambios > 0 or len(_tablas['pickings']) != conocidos
+
+
+def _reconciliar(odoo) -> bool:
+    """Descarta movimientos borrados e incorpora los que faltan comparando IDs vigentes."""
+    if not _tablas['productos']:
+        return False
+    vigentes = set(odoo.search('stock.move', _dominio_movimientos(_tablas['productos'])))
+    sobrantes = _store.descartar_ausentes('movimientos', vigentes)
+    faltantes = vigentes - set(_tablas['movimientos'])
+    for lote in _store.por_lotes(faltantes):
+        _cargar_movimientos(odoo, [('id', 'in', lote)])
+    if faltantes:
+        _completar_pickings(odoo)
+    return bool(sobrantes or faltantes)
+
+
+# ==================== API ====================
+
+def refrescar(odoo, forzar: bool = False) -> None:
+    """
+    Carga el store (de disco o, si no hay, desde Odoo) y luego aplica deltas
+    como máximo cada REFRESCO_SEGUNDOS.
+    """
+    _store.refrescar(odoo, _carga_inicial, _aplicar_deltas, _reconciliar, forzar=forzar)
+
+
+def _ensamblar() -> pd.DataFrame:
+    """Un registro por movimiento con cantidad efectiva, productor y clasificación entrada/salida."""
+    movs = pd.DataFrame.from_dict(_tablas['movimientos'], orient='index')
+    if movs.empty:
+        return pd.DataFrame(columns=COLUMNAS_LEDGER).astype({'qty': float, 'entrada': bool, 'salida': bool})
+    movs.index.name = 'id'
+    movs = movs.reset_index()
+    pickings = pd.DataFrame.from_dict(_tablas['pickings'], orient='index',
+                                      columns=['name', 'origin', 'partner_name'])
+    productos = pd.DataFrame.from_dict(_tablas['productos'], orient='index',
+                                       columns=['display_name', 'default_code'])
+    df = movs.join(pickings, on='picking_id').join(productos, on='product_id')
+    df['picking_name'] = df['name'].fillna('')
+    df['origin'] = df['origin'].fillna('')
+    df['partner_name'] = df['partner_name'].fillna('Unknown')
+    df['default_code'] = df['default_code'].fillna('')
+
+    # Cantidad efectiva: la hecha o, si un movimiento hecho no la registra, la demandada
+    usar_demanda = (df['quantity_done'] == 0) & (df['state'] == 'done')
+    df['qty'] = df['product_uom_qty'].where(usar_demanda, df['quantity_done'])
+
+    # Entradas desde productor: origen de compra (P / OC); antes de 2025 también los 'Retorno'
+    origen = df['origin']
+    valida = origen.str.startswith('P') | origen.str.startswith('OC')
+    valida |= (df['date'] < '2025-01-01') & origen.str.startswith('Retorno')
+    df['entrada'] = valida & (df['qty'] > 0)
+    df['salida'] = (df['picking_type_id'] == PICKING_TYPE_EXPEDICIONES) & (df['qty'] > 0)
+    return df[COLUMNAS_LEDGER].sort_values(['date', 'id'], ascending=False, kind='stable').reset_index(drop=True)
+
+
+def get_ledger(odoo) -> pd.DataFrame:
+    """Ledger completo (refresca antes). Compartido: copiar antes de modificar."""
+    refrescar(odoo)
+    with _store.lock:
+        if _ensamblado['version'] != _store.version or _ensamblado['df'] is None:
+            _ensamblado['df'] = _ensamblar()
+            _ensamblado['version'] = _store.version
+        return _ensamblado['df']
+
+
+def get_stats() -> Dict:
+    return _store.get_stats()
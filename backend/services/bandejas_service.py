@@ -1,6 +1,10 @@
 """
 Servicio de Bandejas - Lógica de negocio para movimientos y stock de bandejas
 Migrado desde el dashboard original de bandejas
+
+Los movimientos salen del ledger local (bandejas_ledger_store), sincronizado
+en forma incremental desde Odoo: las consultas de historia completa y los
+saldos por productor no vuelven a consultar stock.move.
 """
 from typing import Optional, Dict, List, Any
 from datetime import datetime
@@ -8,6 +12,7 @@ import pandas as pd
 
 from shared.odoo_client import OdooClient
 from shared.constants import CATEGORIAS
+from backend.services import bandejas_ledger_store as ledger_store
 
 
 class BandejasService:
@@ -29,157 +34,52 @@ class BandejasService:
     def get_movimientos_entrada(self, fecha_desde: Optional[str] = None, offset: int = 0, limit: int = 5000) -> pd.DataFrame:
         """
         Obtiene los movimientos de entrada de bandejas (recepción de productores).
-        Basado en stock.move con filtros específicos.
-        OPTIMIZADO: Límite reducido a 5,000 y fecha por defecto de 6 meses.
+        Solo movimientos cuyo picking viene de una compra (P / OC), más recientes primero.
         
         Args:
-            fecha_desde: Fecha desde (YYYY-MM-DD)
+            fecha_desde: Fecha desde (YYYY-MM-DD); sin fecha, toda la historia
             offset: Número de registros a omitir
             limit: Máximo de registros a retornar
         """
-        product_ids = self._get_product_ids()
-        if not product_ids:
-            return pd.DataFrame()
-        
-        # Si no se especifica fecha, usar últimos 6 meses por defecto
-        if not fecha_desde:
-            from datetime import datetime, timedelta
-            fecha_desde = (datetime.now() - timedelta(days=180)).strftime('%Y-%m-%d')
-        
-        domain = [
-            ['product_id', 'in', product_ids],
-            ['state', 'in', ['done', 'assigned']],
-            ['date', '>=', fecha_desde]  # Siempre filtrar por fecha
-        ]
-        
-        # Buscar movimientos con límite y offset parametrizables
-        move_ids = self.odoo.search('stock.move', domain, limit=limit, offset=offset, order='date desc')
-        moves = self.odoo.read('stock.move', move_ids, 
-                              ['date', 'picking_id', 'product_id', 'product_uom_qty', 'quantity_done', 'state'])
-        
-        if not moves:
-            return pd.DataFrame()
-        
-        # Obtener detalles de pickings y productos
-        picking_ids = list(set([m['picking_id'][0] for m in moves if m.get('picking_id')]))
-        product_ids_in_moves = list(set([m['product_id'][0] for m in moves if m.get('product_id')]))
-        
-        # Mapear pickings
-        picking_map = {}
-        if picking_ids:
-            pickings = self.odoo.read('stock.picking', picking_ids, ['origin', 'partner_id'])
-            for p in pickings:
-                p_data = {'origin': p['origin'] or '', 'partner_name': 'Unknown'}
-                if p.get('partner_id'):
-                    p_data['partner_name'] = p['partner_id'][1]
-                picking_map[p['id']] = p_data
-        
-        # Mapear códigos de producto
-        product_code_map = {}
-        if product_ids_in_moves:
-            products = self.odoo.read('product.product', product_ids_in_moves, ['default_code'])
-            for p in products:
-                product_code_map[p['id']] = p.get('default_code', '')
-        
-        # Procesar movimientos
-        final_moves = []
-        for move in moves:
-            picking_id = move['picking_id'][0] if move.get('picking_id') else None
-            p_data = picking_map.get(picking_id, {'origin': '', 'partner_name': 'Unknown'})
-            origin = p_data['origin']
-            
-            # Filtrar por origen válido (P = Purchase, OC = Order)
-            is_valid = origin.startswith('P') or origin.startswith('OC')
-            if not is_valid:
-                if move['date'] < '2025-01-01' and origin.startswith('Retorno'):
-                    is_valid = True
-            
-            if not is_valid:
-                continue
-            
-            qty = move['quantity_done']
-            if qty == 0 and move['state'] == 'done':
-                qty = move['product_uom_qty']
-            
-            if qty > 0:
-                final_moves.append({
-                    'date_order': move['date'],
-                    'product_name': move['product_id'][1] if move.get('product_id') else '',
-                    'default_code': product_code_map.get(move['product_id'][0], '') if move.get('product_id') else '',
-                    'order_name': origin,
-                    'partner_name': p_data['partner_name'],
-                    'qty_received': qty
-                })
-        
-        return pd.DataFrame(final_moves)
+        df = self._ledger(fecha_desde)
+        df = df[df['entrada']].iloc[offset:offset + limit]
+        return pd.DataFrame({
+            'date_order': df['date'],
+            'product_name': df['product_name'],
+            'default_code': df['default_code'],
+            'order_name': df['origin'],
+            'partner_name': df['partner_name'],
+            'qty_received': df['qty'],
+        }).reset_index(drop=True)
     
-    def get_movimientos_salida(self, fecha_desde: Optional[str] = None) -> pd.DataFrame:
+    def get_movimientos_salida(self, fecha_desde: Optional[str] = None, offset: int = 0, limit: int = 5000) -> pd.DataFrame:
         """
         Obtiene los movimientos de salida de bandejas (despacho a productores).
-        Filtrado por picking_type_id = 2 (RF/OUT - Expediciones).
-        OPTIMIZADO: Límite reducido a 5,000 y fecha por defecto de 6 meses.
-        """
-        product_ids = self._get_product_ids()
-        if not product_ids:
-            return pd.DataFrame()
-        
-        # Si no se especifica fecha, usar últimos 6 meses por defecto
-        if not fecha_desde:
-            from datetime import datetime, timedelta
-            fecha_desde = (datetime.now() - timedelta(days=180)).strftime('%Y-%m-%d')
-        
-        domain = [
-            ['picking_type_id', '=', 2],  # Expediciones
-            ['product_id', 'in', product_ids],
-            ['state', 'in', ['done', 'assigned']],
-            ['date', '>=', fecha_desde]  # Siempre filtrar por fecha
-        ]
-        
-        move_ids = self.odoo.search('stock.move', domain, limit=limit, offset=offset, order='date desc')
-        moves = self.odoo.read('stock.move', move_ids,
-                              ['date', 'picking_id', 'product_id', 'product_uom_qty', 'quantity_done', 'state'])
-        
-        if not moves:
-            return pd.DataFrame()
-        
-        # Obtener detalles
-        picking_ids = list(set([m['picking_id'][0] for m in moves if m.get('picking_id')]))
-        product_ids_in_moves = list(set([m['product_id'][0] for m in moves if m.get('product_id')]))
+        Filtrado por picking_type_id = 2 (RF/OUT - Expediciones), más recientes primero.
         
-        picking_map = {}
-        if picking_ids:
-            pickings = self.odoo.read('stock.picking', picking_ids, ['partner_id', 'name'])
-            for p in pickings:
-                p_name = p['partner_id'][1] if p.get('partner_id') else 'Unknown'
-                picking_map[p['id']] = {'partner_name': p_name, 'picking_name': p['name']}
-        
-        product_code_map = {}
-        if product_ids_in_moves:
-            products = self.odoo.read('product.product', product_ids_in_moves, ['default_code'])
-            for p in products:
-                product_code_map[p['id']] = p.get('default_code', '')
-        
-        final_moves = []
-        for move in moves:
-            picking_id = move['picking_id'][0] if move.get('picking_id') else None
-            p_data = picking_map.get(picking_id, {'partner_name': 'Unknown', 'picking_name': ''})
-            
-            qty = move['quantity_done']
-            if qty == 0 and move['state'] == 'done':
-                qty = move['product_uom_qty']
-            
-            if qty > 0:
-                final_moves.append({
-                    'date': move['date'],
-                    'product_name': move['product_id'][1] if move.get('product_id') else '',
-                    'default_code': product_code_map.get(move['product_id'][0], '') if move.get('product_id') else '',
-                    'picking_name': p_data['picking_name'],
-                    'partner_name': p_data['partner_name'],
-                    'state': move['state'],
-                    'qty_sent': qty
-                })
-        
-        return pd.DataFrame(final_moves)
+        Args:
+            fecha_desde: Fecha desde (YYYY-MM-DD); sin fecha, toda la historia
+            offset: Número de registros a omitir
+            limit: Máximo de registros a retornar
+        """
+        df = self._ledger(fecha_desde)
+        df = df[df['salida']].iloc[offset:offset + limit]
+        return pd.DataFrame({
+            'date': df['date'],
+            'product_name': df['product_name'],
+            'default_code': df['default_code'],
+            'picking_name': df['picking_name'],
+            'partner_name': df['partner_name'],
+            'state': df['state'],
+            'qty_sent': df['qty'],
+        }).reset_index(drop=True)
+    
+    def _ledger(self, fecha_desde: Optional[str] = None) -> pd.DataFrame:
+        """Ledger de movimientos (más recientes primero), opcionalmente desde una fecha."""
+        df = ledger_store.get_ledger(self.odoo)
+        if fecha_desde:
+            df = df[df['date'] >= fecha_desde]
+        return df
     
     def get_stock(self) -> pd.DataFrame:
         """
@@ -226,42 +126,55 @@ class BandejasService:
     
     def get_resumen_por_productor(self, anio: Optional[int] = None, mes: Optional[int] = None) -> pd.DataFrame:
         """
-        Obtiene el resumen de bandejas por productor.
+        Obtiene el resumen de bandejas por productor (despachadas hechas,
+        recepcionadas y saldo en productor) sobre toda la historia o el año/mes indicado.
         """
-        df_in = self.get_movimientos_entrada()
-        df_out = self.get_movimientos_salida()
-        
-        # Filtrar por fecha si se especifica
-        if not df_in.empty:
-            df_in['date_order'] = pd.to_datetime(df_in['date_order'])
-            if anio:
-                df_in = df_in[df_in['date_order'].dt.year == anio]
-            if mes:
-                df_in = df_in[df_in['date_order'].dt.month == mes]
-        
-        if not df_out.empty:
-            df_out['date'] = pd.to_datetime(df_out['date'])
-            if anio:
-                df_out = df_out[df_out['date'].dt.year == anio]
-            if mes:
-                df_out = df_out[df_out['date'].dt.month == mes]
-        
-        # Agrupar por productor
-        df_in_grouped = pd.DataFrame(columns=['partner_name', 'recepcionadas'])
-        df_out_grouped = pd.DataFrame(columns=['partner_name', 'despachadas'])
-        
-        if not df_in.empty:
-            df_in_grouped = df_in.groupby('partner_name')['qty_received'].sum().reset_index()
-            df_in_grouped.columns = ['partner_name', 'recepcionadas']
+        df = self._movimientos_productor()
+        if anio:
+            df = df[df['fecha'].dt.year == anio]
+        if mes:
+            df = df[df['fecha'].dt.month == mes]
         
-        if not df_out.empty:
-            df_out_done = df_out[df_out['state'] == 'done']
-            if not df_out_done.empty:
-                df_out_grouped = df_out_done.groupby('partner_name')['qty_sent'].sum().reset_index()
-                df_out_grouped.columns = ['partner_name', 'despachadas']
-        
-        # Merge
-        df_merged = pd.merge(df_in_grouped, df_out_grouped, on='partner_name', how='outer').fillna(0)
+        df_merged = df.groupby('partner_name')[['recepcionadas', 'despachadas']].sum().reset_index()
         df_merged['en_productor'] = df_merged['despachadas'] - df_merged['recepcionadas']
+        return df_merged[['partner_name', 'recepcionadas', 'despachadas', 'en_productor']]
+    
+    def get_saldos_productor(self, periodo: str = 'mes', fecha_desde: Optional[str] = None,
+                             fecha_hasta: Optional[str] = None, productor: Optional[str] = None) -> pd.DataFrame:
+        """
+        Saldo de bandejas en cada productor período a período (suma acumulada
+        de despachadas - recepcionadas desde el inicio de la historia).
         
-        return df_merged
+        Args:
+            periodo: 'mes' (YYYY-MM) o 'anio' (YYYY)
+            fecha_desde / fecha_hasta: rango de períodos a retornar (YYYY-MM-DD);
+                el saldo inicial considera siempre todos los movimientos anteriores
+            productor: nombre exacto del productor (opcional)
+        """
+        if periodo not in ('mes', 'anio'):
+            raise ValueError("periodo debe ser 'mes' o 'anio'")
+        df = self._movimientos_productor()
+        if productor:
+            df = df[df['partner_name'] == productor]
+        if fecha_hasta:
+            df = df[df['fecha'] < pd.Timestamp(fecha_hasta) + pd.Timedelta(days=1)]
+        
+        formato = '%Y-%m' if periodo == 'mes' else '%Y'
+        df = df.assign(periodo=df['fecha'].dt.strftime(formato))
+        saldos = df.groupby(['partner_name', 'periodo'])[['despachadas', 'recepcionadas']].sum().reset_index()
+        saldos['neto'] = saldos['despachadas'] - saldos['recepcionadas']
+        saldos['saldo'] = saldos.groupby('partner_name')['neto'].cumsum()
+        if fecha_desde:
+            saldos = saldos[saldos['periodo'] >= pd.Timestamp(fecha_desde).strftime(formato)]
+        return saldos.reset_index(drop=True)
+    
+    def _movimientos_productor(self) -> pd.DataFrame:
+        """Movimientos con productor: recepcionadas (entradas) y despachadas (salidas hechas)."""
+        df = ledger_store.get_ledger(self.odoo)
+        df = df[df['entrada'] | (df['salida'] & (df['state'] == 'done'))]
+        return pd.DataFrame({
+            'fecha': pd.to_datetime(df['date']),
+            'partner_name': df['partner_name'],
+            'recepcionadas': df['qty'].where(df['entrada'], 0.0),
+            'despachadas': df['qty'].where(df['salida'] & (df['state'] == 'done'), 0.0),
+        })
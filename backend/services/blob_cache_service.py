@@ -0,0 +1,189 @@
+"""
+Caché en disco de binarios (fotos QC, adjuntos, PDFs) direccionado por contenido.
+
+Cada binario se guarda una sola vez bajo su sha256 (objects/ab/abcdef...) y un
+índice SQLite mapea la clave de origen en Odoo (p.ej. "ir.attachment:<checksum>"
+o "quality.check:<id>:<campo>:<write_date>") al hash. Así el contenido solo se
+descarga de Odoo la primera vez que se pide, y las miniaturas se generan una vez
+por hash y tamaño.
+
+Uso:
+    from backend.services.blob_cache_service import get_or_fetch, thumbnail
+    ref = get_or_fetch("ir.attachment:abc123", lambda: (contenido, {"name": ..., "mimetype": ...}))
+    ref.path  # archivo local listo para streaming
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    from PIL import Image
+    PIL_DISPONIBLE = True
+except ImportError:  # Pillow no instalado: se sirven las imágenes originales
+    Image = None
+    PIL_DISPONIBLE = False
+
+
+BLOB_CACHE_DIR = Path(__file__).parent.parent / "data" / "blob_cache"
+THUMBNAIL_SIZES = (160, 320, 640)
+
+_db_lock = threading.Lock()
+_schema_initialized = False
+
+
+@dataclass(frozen=True)
+class BlobRef:
+    """Binario cacheado en disco."""
+    sha256: str
+    path: Path
+    name: str
+    mimetype: str
+    size: int
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.sha256}"'
+
+
+def _get_connection() -> sqlite3.Connection:
+    conn = sqlite3.connect(BLOB_CACHE_DIR / "index.db", timeout=15)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _ensure_db() -> None:
+    global _schema_initialized
+    if _schema_initialized:
+        return
+    with _db_lock:
+        if _schema_initialized:
+            return
+        (BLOB_CACHE_DIR / "objects").mkdir(parents=True, exist_ok=True)
+        (BLOB_CACHE_DIR / "thumbs").mkdir(parents=True, exist_ok=True)
+        conn = _get_connection()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS blob_index (
+                    source_key TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL,
+                    name TEXT,
+                    mimetype TEXT,
+                    size INTEGER,
+                    created_at TEXT
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_blob_index_sha ON blob_index(sha256)")
+            conn.commit()
+        finally:
+            conn.close()
+        _schema_initialized = True
+
+
+def _object_path(sha256: str) -> Path:
+    return BLOB_CACHE_DIR / "objects" / sha256[:2] / sha256
+
+
+def _write_atomic(path: Path, content: bytes) -> None:
+    """Escribe en un temporal y renombra (lectores concurrentes nunca ven archivos a medias)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "wb") as handler:
+            handler.write(content)
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def lookup(source_key: str) -> Optional[BlobRef]:
+    """Retorna el binario cacheado para la clave de origen (None si no está o se borró del disco)."""
+    _ensure_db()
+    conn = _get_connection()
+    try:
+        row = conn.execute("SELECT * FROM blob_index WHERE source_key = ?", (source_key,)).fetchone()
+    finally:
+        conn.close()
+    if not row:
+        return None
+    path = _object_path(row["sha256"])
+    if not path.exists():
+        return None
+    return BlobRef(row["sha256"], path, row["name"] or "", row["mimetype"] or "application/octet-stream", row["size"] or 0)
+
+
+def put(source_key: str, content: bytes, name: str, mimetype: str) -> BlobRef:
+    """Guarda el contenido (deduplicado por sha256) y lo asocia a la clave de origen."""
+    _ensure_db()
+    sha256 = hashlib.sha256(content).hexdigest()
+    path = _object_path(sha256)
+    if not path.exists():
+        _write_atomic(path, content)
+    conn = _get_connection()
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO blob_index (source_key, sha256, name, mimetype, size, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (source_key, sha256, name, mimetype, len(content), datetime.now().isoformat()),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return BlobRef(sha256, path, name, mimetype, len(content))
+
+
+def get_or_fetch(source_key: str, fetcher: Callable[[], Tuple[bytes, Dict[str, Any]]]) -> BlobRef:
+    """
+    Read-through: retorna el binario cacheado o lo descarga con `fetcher`.
+
+    Args:
+        source_key: Clave estable del binario en el origen (incluye checksum o write_date)
+        fetcher: Función que retorna (contenido, {"name", "mimetype"})
+    """
+    ref = lookup(source_key)
+    if ref is not None:
+        return ref
+    content, meta = fetcher()
+    return put(
+        source_key,
+        content,
+        meta.get("name") or "archivo",
+        meta.get("mimetype") or "application/octet-stream",
+    )
+
+
+def thumbnail(ref: BlobRef, size: int) -> BlobRef:
+    """
+    Miniatura JPEG del binario (generada una vez por hash y tamaño).
+    Si no es imagen o Pillow no está disponible, retorna el original.
+    """
+    if not PIL_DISPONIBLE or not ref.mimetype.startswith("image/"):
+        return ref
+    size = min(THUMBNAIL_SIZES, key=lambda s: abs(s - size))
+    thumb_sha = f"{ref.sha256}_{size}"
+    path = BLOB_CACHE_DIR / "thumbs" / f"{thumb_sha}.jpg"
+    if not path.exists():
+        try:
+            with Image.open(ref.path) as image:
+                image.thumbnail((size, size))
+                fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp_", suffix=".jpg")
+                os.close(fd)
+                image.convert("RGB").save(tmp, "JPEG", quality=80, optimize=True)
+                os.replace(tmp, path)
+        except Exception as e:
+            print(f"[BlobCache] No se pudo generar miniatura de {ref.sha256}: {e}")
+            return ref
+    stem = ref.name.rsplit(".", 1)[0] if "." in ref.name else ref.name
+    return BlobRef(thumb_sha, path, f"{stem}_thumb.jpg", "image/jpeg", path.stat().st_size)
@@ -0,0 +1,552 @@
+"""
+Tabla de hechos de ventas (Relación Comercial), compartida por todo el proceso.
+
+Antes cada request creaba un ComercialService nuevo, así que su caché de
+instancia nunca servía y cada carga bajaba de nuevo hasta 50k líneas de
+factura, 10k legacy y 10k de pedidos, más los mapas de partners, movimientos,
+productos y variedades.
+
+Aquí se guardan las tablas crudas normalizadas (una fila por registro de Odoo):
+
+- líneas de factura (account.move.line, con y sin producto)
+- movimientos (account.move + referencias SII para notas de crédito)
+- partners (país y categoría)
+- líneas de pedido (sale.order.line) y pedidos (sale.order)
+
+La primera vez se cargan completas (paginadas por id, sin topes). Después,
+como máximo cada REFRESCO_SEGUNDOS, solo se releen los registros con
+write_date >= la marca de cada modelo; cada RECONCILIACION_SEGUNDOS se
+comparan los IDs vigentes para descartar o incorporar líneas que cambiaron
+de elegibilidad sin tocar su write_date. Las tablas y marcas se persisten en
+backend/data/comercial_hechos/ (Parquet) y se recargan al reiniciar. El ciclo
+(paginación, marcas, refresco y persistencia) es el de read_model_incremental.
+
+La tabla de hechos (un registro por línea, con anulaciones SII, conversión de
+moneda y clasificación de producto) se arma en forma vectorizada desde las
+tablas crudas y se reutiliza hasta que cambian los datos.
+
+Uso:
+    from backend.services import comercial_hechos_store as hechos_store
+    hechos_store.refrescar(self.odoo)
+    df = hechos_store.get_hechos(self.odoo)
+"""
+import time
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from backend.services.currency_service import CurrencyService
+from backend.services.producto_dimension_service import get_productos, clasificar_comercial, producto_texto
+from backend.services.read_model_incremental import ReadModelIncremental
+
+
+REFRESCO_SEGUNDOS = 60
+RECONCILIACION_SEGUNDOS = 3600
+ENSAMBLE_SEGUNDOS = 300  # la clasificación de productos puede cambiar sin deltas de ventas
+TAMANO_PAGINA = 5000
+TAMANO_LOTE = 1000
+
+STORE_DIR = Path(__file__).parent.parent / "data" / "comercial_hechos"
+
+TAGS_PRODUCTO = [18, 19, 20, 25, 21]  # Excluye 41 (Servicio)
+CUENTAS_INGRESO = [132, 133, 581, 1741, 1857]
+CUENTAS_LEGACY = [132, 133]  # Solo cuentas de ingresos principales
+TIPOS_FACTURA = ['out_invoice', 'out_refund']
+
+DOMAIN_FACTURAS = [
+    ('move_id.move_type', 'in', TIPOS_FACTURA),
+    ('move_id.payment_state', '!=', 'reversed'),
+    ('account_id', 'in', CUENTAS_INGRESO),
+    ('product_id.product_tag_ids', 'in', TAGS_PRODUCTO),
+    ('parent_state', '=', 'posted'),
+    ('display_type', 'not in', ['line_section', 'line_note']),
+    ('product_id', '!=', False)
+]
+# Líneas SIN producto pero con cuenta de ingresos (facturas antiguas 2023)
+DOMAIN_FACTURAS_LEGACY = [
+    ('move_id.move_type', 'in', TIPOS_FACTURA),
+    ('move_id.payment_state', '!=', 'reversed'),
+    ('account_id', 'in', CUENTAS_LEGACY),
+    ('parent_state', '=', 'posted'),
+    ('display_type', '=', 'product'),  # Solo líneas de producto (no payment_term)
+    ('product_id', '=', False),
+    ('quantity', '>', 0)
+]
+# Comprometido: pedidos no cerrados ('done' ya facturados)
+DOMAIN_PEDIDOS = [
+    ('state', 'in', ['draft', 'sent', 'sale']),
+    ('display_type', 'not in', ['line_section', 'line_note']),
+    ('product_id', '!=', False),
+    ('product_id.product_tag_ids', 'in', TAGS_PRODUCTO)
+]
+
+FACTURA_FIELDS = ['product_id', 'partner_id', 'date', 'quantity', 'move_id', 'balance',
+                  'move_name', 'credit', 'name', 'write_date']
+MOVE_FIELDS = ['invoice_incoterm_id', 'sii_pais_destino_id', 'move_type', 'name', 'write_date']
+PARTNER_FIELDS = ['country_id', 'x_studio_categora_de_contacto', 'write_date']
+PEDIDO_LINEA_FIELDS = ['product_id', 'order_partner_id', 'price_subtotal', 'product_uom_qty',
+                       'qty_invoiced', 'order_id', 'write_date']
+PEDIDO_FIELDS = ['date_order', 'incoterm', 'currency_id', 'write_date']
+
+COLUMNAS_HECHOS = [
+    'tipo', 'cliente', 'anio', 'mes', 'trimestre', 'manejo', 'programa', 'especie',
+    'variedad', 'temporada', 'incoterm', 'pais', 'categoria_cliente', 'kilos', 'monto',
+    'date', 'documento', 'doc_origen', 'ref_code'
+]
+
+# Tablas crudas: id -> fila normalizada (escalares, aptas para Parquet)
+_store = ReadModelIncremental(
+    'ComercialHechos',
+    tablas=['facturas', 'movimientos', 'partners', 'pedido_lineas', 'pedidos'],
+    modelos=['account.move.line', 'account.move', 'res.partner', 'sale.order.line', 'sale.order'],
+    store_dir=STORE_DIR, refresco_segundos=REFRESCO_SEGUNDOS,
+    reconciliacion_segundos=RECONCILIACION_SEGUNDOS, tamano_pagina=TAMANO_PAGINA, tamano_lote=TAMANO_LOTE,
+)
+_tablas = _store.tablas
+_ensamblado: Dict[str, Any] = {'version': -1, 'creado': 0.0, 'df': None}
+
+
+# ==================== NORMALIZACIÓN ====================
+
+def _m2o_id(valor: Any) -> int:
+    return int(valor[0]) if isinstance(valor, (list, tuple)) and valor else 0
+
+
+def _m2o_nombre(valor: Any, defecto: str = '') -> str:
+    return str(valor[1]) if isinstance(valor, (list, tuple)) and len(valor) > 1 else defecto
+
+
+def _fila_factura(l: Dict) -> Dict:
+    return {
+        'move_id': _m2o_id(l.get('move_id')),
+        'partner_id': _m2o_id(l.get('partner_id')),
+        'cliente': _m2o_nombre(l.get('partner_id'), 'Desconocido'),
+        'product_id': _m2o_id(l.get('product_id')),
+        'product_name': _m2o_nombre(l.get('product_id')),
+        'descripcion': str(l.get('name') or ''),
+        'date': str(l.get('date') or '')[:10],
+        'quantity': float(l.get('quantity') or 0),
+        'credit': float(l.get('credit') or 0),
+        'balance': float(l.get('balance') or 0),
+        'move_name': str(l.get('move_name') or ''),
+    }
+
+
+def _fila_movimiento(m: Dict) -> Dict:
+    return {
+        'move_type': m.get('move_type') or 'out_invoice',
+        'move_name': str(m.get('name') or ''),
+        'incoterm': _m2o_nombre(m.get('invoice_incoterm_id'), 'N/A'),
+        'destino_real': _m2o_nombre(m.get('sii_pais_destino_id')),
+        'reference_doc_code': '',
+        'origin_doc_number': '',
+    }
+
+
+def _fila_partner(p: Dict) -> Dict:
+    return {
+        'pais': _m2o_nombre(p.get('country_id'), 'Desconocido'),
+        'categoria': p.get('x_studio_categora_de_contacto') or 'Sin Categoría',
+    }
+
+
+def _fila_pedido_linea(l: Dict) -> Dict:
+    return {
+        'order_id': _m2o_id(l.get('order_id')),
+        'documento': _m2o_nombre(l.get('order_id'), 'S/N'),
+        'partner_id': _m2o_id(l.get('order_partner_id')),
+        'cliente': _m2o_nombre(l.get('order_partner_id'), 'Descon.'),
+        'product_id': _m2o_id(l.get('product_id')),
+        'product_name': _m2o_nombre(l.get('product_id')),
+        'price_subtotal': float(l.get('price_subtotal') or 0),
+        'product_uom_qty': float(l.get('product_uom_qty') or 0),
+        'qty_invoiced': float(l.get('qty_invoiced') or 0),
+    }
+
+
+def _fila_pedido(s: Dict) -> Dict:
+    return {
+        'fecha': str(s.get('date_order') or '')[:10],
+        'incoterm': _m2o_nombre(s.get('incoterm'), 'N/A'),
+        'currency_name': _m2o_nombre(s.get('currency_id'), 'CLP'),
+    }
+
+
+# ==================== LECTURA DESDE ODOO ====================
+
+def _cargar_facturas(odoo, alcance: Optional[List] = None) -> set:
+    """
+    (Re)carga las líneas de factura elegibles dentro del alcance (todas si no
+    se indica) y retorna sus IDs.
+    """
+    alcance = alcance or []
+    lineas = _store.paginar(odoo, 'account.move.line', DOMAIN_FACTURAS + alcance, FACTURA_FIELDS)
+    lineas += _store.paginar(odoo, 'account.move.line', DOMAIN_FACTURAS_LEGACY + alcance, FACTURA_FIELDS)
+    for l in lineas:
+        _tablas['facturas'][l['id']] = _fila_factura(l)
+    _store.marcar('account.move.line', lineas)
+    return {l['id'] for l in lineas}
+
+
+def _cargar_movimientos(odoo, move_ids: Iterable[int]) -> None:
+    """Movimientos y sus referencias SII (códigos de anulación de NC)."""
+    for lote in _store.por_lotes(move_ids):
+        movimientos = odoo.read('account.move', lote, MOVE_FIELDS)
+        for m in movimientos:
+            _tablas['movimientos'][m['id']] = _fila_movimiento(m)
+        _store.marcar('account.move', movimientos)
+        try:
+            referencias = odoo.search_read(
+                'l10n_cl.account.invoice.reference',
+                [('move_id', 'in', lote)],
+                ['move_id', 'reference_doc_code', 'origin_doc_number']
+            )
+        except Exception as e:
+            print(f"[ComercialHechos] No se pudo consultar referencias SII: {e}")
+            continue
+        for ref in referencias:
+            mov = _tablas['movimientos'].get(_m2o_id(ref.get('move_id')) or ref.get('move_id'))
+            if mov is not None:
+                ref_code = ref.get('reference_doc_code')
+                mov['reference_doc_code'] = str(ref_code) if ref_code else ''
+                mov['origin_doc_number'] = ref.get('origin_doc_number') or ''
+
+
+def _cargar_partners(odoo, partner_ids: Iterable[int]) -> None:
+    for lote in _store.por_lotes(partner_ids):
+        partners = odoo.read('res.partner', lote, PARTNER_FIELDS)
+        for p in partners:
+            _tablas['partners'][p['id']] = _fila_partner(p)
+        _store.marcar('res.partner', partners)
+
+
+def _cargar_pedido_lineas(odoo, alcance: Optional[List] = None) -> set:
+    lineas = _store.paginar(odoo, 'sale.order.line', DOMAIN_PEDIDOS + (alcance or []), PEDIDO_LINEA_FIELDS)
+    for l in lineas:
+        _tablas['pedido_lineas'][l['id']] = _fila_pedido_linea(l)
+    _store.marcar('sale.order.line', lineas)
+    return {l['id'] for l in lineas}
+
+
+def _cargar_pedidos(odoo, sale_ids: Iterable[int]) -> None:
+    for lote in _store.por_lotes(sale_ids):
+        pedidos = odoo.read('sale.order', lote, PEDIDO_FIELDS)
+        for s in pedidos:
+            _tablas['pedidos'][s['id']] = _fila_pedido(s)
+        _store.marcar('sale.order', pedidos)
+
+
+def _completar_dimensiones(odoo) -> None:
+    """Carga movimientos, partners y pedidos referenciados que aún no están."""
+    movimientos = {f['move_id'] for f in _tablas['facturas'].values() if f['move_id']}
+    partners = {f['partner_id'] for f in _tablas['facturas'].values() if f['partner_id']}
+    partners |= {l['partner_id'] for l in _tablas['pedido_lineas'].values() if l['partner_id']}
+    pedidos = {l['order_id'] for l in _tablas['pedido_lineas'].values() if l['order_id']}
+    _cargar_movimientos(odoo, movimientos - set(_tablas['movimientos']))
+    _cargar_partners(odoo, partners - set(_tablas['partners']))
+    _cargar_pedidos(odoo, pedidos - set(_tablas['pedidos']))
+
+
+def _carga_inicial(odoo) -> None:
+    inicio = time.time()
+    _cargar_facturas(odoo)
+    _cargar_pedido_lineas(odoo)
+    _completar_dimensiones(odoo)
+    print(f"[ComercialHechos] Carga inicial: {len(_tablas['facturas'])} líneas de factura, "
+          f"{len(_tablas['pedido_lineas'])} líneas de pedido en {time.time() - inicio:.1f}s")
+
+
+def _recargar_facturas(odoo, alcance: List, candidatas: Iterable[int]) -> int:
+    """Relee las líneas del alcance; las candidatas que ya no son elegibles salen."""
+    vigentes = _cargar_facturas(odoo, alcance)
+    for line_id in set(candidatas) - vigentes:
+        _tablas['facturas'].pop(line_id, None)
+    return len(vigentes)
+
+
+def _recargar_pedido_lineas(odoo, alcance: List, candidatas: Iterable[int]) -> int:
+    vigentes = _cargar_pedido_lineas(odoo, alcance)
+    for line_id in set(candidatas) - vigentes:
+        _tablas['pedido_lineas'].pop(line_id, None)
+    return len(vigentes)
+
+
+def _aplicar_deltas(odoo) -> bool:
+    """Aplica cambios por write_date (>= marca: las reescrituras son idempotentes)."""
+    cambios = 0
+
+    # Movimientos modificados (p.ej. publicados, revertidos, con nueva referencia SII):
+    # se releen y se reevalúan todas sus líneas
+    movs = _store.cambiados(odoo, 'account.move', [('move_type', 'in', TIPOS_FACTURA)])
+    if movs:
+        _cargar_movimientos(odoo, movs)
+        for lote in _store.por_lotes(movs):
+            en_lote = set(lote)
+            candidatas = [i for i, f in _tablas['facturas'].items() if f['move_id'] in en_lote]
+            cambios += _recargar_facturas(odoo, [('move_id', 'in', lote)], candidatas)
+
+    # Líneas de factura modificadas
+    lineas = _store.cambiados(odoo, 'account.move.line', [('move_id.move_type', 'in', TIPOS_FACTURA),
+                                                          ('account_id', 'in', CUENTAS_INGRESO)])
+    for lote in _store.por_lotes(lineas):
+        cambios += _recargar_facturas(odoo, [('id', 'in', lote)], lote)
+
+    # Pedidos modificados: se reevalúan todas sus líneas
+    pedidos = _store.cambiados(odoo, 'sale.order', [])
+    if pedidos:
+        _cargar_pedidos(odoo, pedidos)
+        for lote in _store.por_lotes(pedidos):
+            en_lote = set(lote)
+            candidatas = [i for i, l in _tablas['pedido_lineas'].items() if l['order_id'] in en_lote]
+            cambios += _recargar_pedido_lineas(odoo, [('order_id', 'in', lote)], candidatas)
+
+    # Líneas de pedido modificadas (qty_invoiced, estado, precio)
+    lineas = _store.cambiados(odoo, 'sale.order.line', [])
+    for lote in _store.por_lotes(lineas):
+        cambios += _recargar_pedido_lineas(odoo, [('id', 'in', lote)], lote)
+
+    # Partners conocidos con país o categoría modificados
+    partners = _store.conocidos_cambiados(odoo, 'res.partner', _tablas['partners'])
+    if partners:
+        _cargar_partners(odoo, partners)
+        cambios += len(partners)
+
+    _completar_dimensiones(odoo)
+    return cambios > 0
+
+
+def _reconciliar(odoo) -> bool:
+    """
+    Compara los IDs elegibles en Odoo con los del store: descarta líneas
+    borradas o que dejaron de cumplir el dominio e incorpora las nuevas.
+    """
+    cambios = False
+    for tabla, dominios, recargar in (
+        ('facturas', [DOMAIN_FACTURAS, DOMAIN_FACTURAS_LEGACY], _recargar_facturas),
+        ('pedido_lineas', [DOMAIN_PEDIDOS], _recargar_pedido_lineas),
+    ):
+        model = 'account.move.line' if tabla == 'facturas' else 'sale.order.line'
+        vigentes = set()
+        for dominio in dominios:
+            vigentes.update(odoo.search(model, dominio))
+        sobrantes = _store.descartar_ausentes(tabla, vigentes)
+        faltantes = vigentes - set(_tablas[tabla])
+        for lote in _store.por_lotes(faltantes):
+            recargar(odoo, [('id', 'in', lote)], [])
+        cambios = cambios or bool(sobrantes or faltantes)
+    if cambios:
+        _completar_dimensiones(odoo)
+    return cambios
+
+
+# ==================== API ====================
+
+def refrescar(odoo, forzar: bool = False) -> None:
+    """
+    Carga el store (de disco o, si no hay, desde Odoo) y luego aplica deltas
+    como máximo cada REFRESCO_SEGUNDOS.
+    """
+    _store.refrescar(odoo, _carga_inicial, _aplicar_deltas, _reconciliar, forzar=forzar)
+
+
+def _df(nombre: str) -> pd.DataFrame:
+    df = pd.DataFrame.from_dict(_tablas[nombre], orient='index')
+    df.index.name = 'id'
+    return df
+
+
+def _doc_key(nombres: pd.Series) -> pd.Series:
+    """Clave normalizada 'PREFIJO_NUMERO' (sin ceros a la izquierda) de un nombre de documento."""
+    partes = nombres.fillna('').str.split(' ')
+    tiene = nombres.fillna('').str.contains(' ', regex=False)
+    clave = partes.str[0] + '_' + partes.str[-1].str.lstrip('0')
+    return clave.where(tiene, '')
+
+
+def _docs_anulados(movs: pd.DataFrame) -> set:
+    """NC con código SII 1 (anula) y los documentos que anulan."""
+    if movs.empty:
+        return set()
+    nc = movs[(movs['reference_doc_code'] == '1') & movs['move_name'].str.contains(' ', regex=False)]
+    anulados = set(_doc_key(nc['move_name']))
+    pref = nc['move_name'].str.split(' ').str[0]
+    origen = nc['origin_doc_number'].fillna('').astype(str).str.lstrip('0')
+    destino = np.where(pref.str.contains('NCXE', regex=False), 'FCXE', 'FAC')
+    anulados |= {f"{p}_{o}" for p, o in zip(destino, origen) if o}
+    return anulados
+
+
+def _clasificar_legacy(desc: str, anio: int) -> tuple:
+    """Líneas legacy (2023) sin producto: clasificación por descripción."""
+    desc = desc.upper()
+    if any(x in desc for x in ["FB ", "FB-", " FB", "FRAMBUESA", "RASPBERRY", "RASPBERRIES"]):
+        especie = "Frambuesa"
+    elif any(x in desc for x in ["AR ", "AR-", " AR", "ARÁNDANO", "BLUEBERRY", "BLUEBERRIES"]):
+        especie = "Arándano"
+    elif any(x in desc for x in ["CE ", "CE-", " CE", "CEREZA", "CHERRY", "CHERRIES"]):
+        especie = "Cereza"
+    elif any(x in desc for x in ["MORA", "BLACKBERRY", "BLACKBERRIES"]):
+        especie = "Mora"
+    elif any(x in desc for x in ["FRUTILLA", "STRAWBERRY", "STRAWBERRIES"]):
+        especie = "Frutilla"
+    else:
+        especie = "Arándano"  # Default fallback
+    manejo = "Orgánico" if any(x in desc for x in ["ORG", "ORGANIC", "ORGÁNICO"]) else "Convencional"
+    # Default para exportación legacy
+    return especie, manejo, "S/V", f"{anio}-{anio+1}", "Granel"
+
+
+def _clasificar_producto(prod_id: int, prod_name: str, product_map: Dict[int, Dict], anio: int) -> tuple:
+    """Especie, manejo, variedad, temporada y programa (precalculados en la dimensión de productos)."""
+    p = product_map.get(prod_id, {})
+    clasificacion = p.get('comercial')
+    if clasificacion is None or prod_name != p.get('display_name'):
+        # Nombre distinto al de la dimensión (o producto no encontrado): clasificar por el nombre de la línea
+        clasificacion = clasificar_comercial(
+            prod_name, producto_texto(p.get('x_studio_sub_categora')), p.get('categ', ''),
+            p.get('x_studio_categora_tipo_de_manejo'), p.get('product_tag_ids', [])
+        )
+    variedad = (p.get('variedad_principal') or None) if p.get('x_studio_categora_variedad') else "S/V"
+    temporada = p.get('x_studio_selection_field_7qfiv') or f"{anio}-{anio+1}"
+    return clasificacion['especie'], clasificacion['manejo'], variedad, temporada, clasificacion['programa']
+
+
+def _clasificar(df: pd.DataFrame, product_map: Dict[int, Dict]) -> pd.DataFrame:
+    """
+    Agrega especie/manejo/variedad/temporada/programa clasificando una sola vez
+    cada combinación distinta de (producto, nombre, descripción legacy, año).
+    """
+    claves = ['product_id', 'product_name', 'descripcion', 'anio']
+    combos = df[claves].drop_duplicates()
+    valores = [
+        _clasificar_producto(pid, nombre, product_map, anio) if pid
+        else _clasificar_legacy(desc, anio)
+        for pid, nombre, desc, anio in combos.itertuples(index=False)
+    ]
+    clasif = pd.DataFrame(valores, columns=['especie', 'manejo', 'variedad', 'temporada', 'programa'],
+                          index=combos.index)
+    return df.merge(pd.concat([combos, clasif], axis=1), on=claves, how='left')
+
+
+def _periodo(df: pd.DataFrame, fechas: pd.Series) -> None:
+    df['date'] = fechas
+    df['anio'] = fechas.str[:4].astype(int)
+    df['mes'] = fechas.str[5:7].astype(int)
+    df['trimestre'] = 'Q' + ((df['mes'] - 1) // 3 + 1).astype(str)
+
+
+def _ensamblar_facturas(partners: pd.DataFrame) -> pd.DataFrame:
+    lineas = _df('facturas')
+    if lineas.empty:
+        return pd.DataFrame(columns=COLUMNAS_HECHOS)
+    movs = _df('movimientos')
+    if movs.empty:
+        movs = pd.DataFrame(columns=['move_type', 'move_name', 'incoterm', 'destino_real',
+                                     'reference_doc_code', 'origin_doc_number'])
+    df = lineas.join(movs.add_prefix('mov_'), on='move_id')
+    df = df.join(partners.add_prefix('partner_'), on='partner_id')
+
+    es_nc = df['mov_move_type'].fillna('out_invoice') == 'out_refund'
+    ref_code = df['mov_reference_doc_code'].fillna('')
+    nombre_doc = df['move_name'].where(df['move_name'] != '', df['mov_move_name'].fillna(''))
+    anulado = _doc_key(nombre_doc).isin(_docs_anulados(movs))
+
+    # Kilos con signo según 'credit'; anulaciones SII y NC que no son código 1 -> 0
+    raw_qty = df['quantity'].abs()
+    qty = raw_qty.where(df['credit'] >= 0, -raw_qty)
+    monto = -df['balance']
+    cero = anulado | (es_nc & (ref_code != '1'))
+    qty = qty.where(~(es_nc & ~anulado & (qty > 0)), -raw_qty)
+    df['kilos'] = qty.where(~cero, 0.0)
+    df['monto'] = monto.where(~cero, 0.0)
+
+    _periodo(df, df['date'])
+    df['tipo'] = np.where(es_nc, 'Nota de Crédito', 'Factura')
+    df['incoterm'] = df['mov_incoterm'].fillna('N/A')
+    destino = df['mov_destino_real'].fillna('')
+    df['pais'] = destino.where(destino != '', df['partner_pais'].fillna('Desconocido'))
+    df['categoria_cliente'] = df['partner_categoria'].fillna('Sin Categoría')
+    df['documento'] = df['move_name'].where(df['move_name'] != '', 'N/A')
+    df['doc_origen'] = df['mov_origin_doc_number'].fillna('')  # Factura referenciada por la NC
+    df['ref_code'] = ref_code  # Código SII (1, 2, 3)
+    return df.sort_values('date', ascending=False, kind='stable')
+
+
+def _ensamblar_pedidos(partners: pd.DataFrame) -> pd.DataFrame:
+    lineas = _df('pedido_lineas')
+    if lineas.empty:
+        return pd.DataFrame(columns=COLUMNAS_HECHOS)
+    # Solo lo PENDIENTE de facturar
+    pendiente = (lineas['product_uom_qty'] - lineas['qty_invoiced']).clip(lower=0)
+    lineas = lineas[pendiente > 0].copy()
+    if lineas.empty:
+        return pd.DataFrame(columns=COLUMNAS_HECHOS)
+    pendiente = pendiente[lineas.index]
+
+    pedidos = _df('pedidos')
+    if pedidos.empty:
+        pedidos = pd.DataFrame(columns=['fecha', 'incoterm', 'currency_name'])
+    df = lineas.join(pedidos.add_prefix('ped_'), on='order_id')
+    df = df.join(partners.add_prefix('partner_'), on='partner_id')
+
+    # Monto proporcional a lo pendiente, en CLP a la fecha del pedido
+    ordenado = df['product_uom_qty']
+    monto_pendiente = (df['price_subtotal'] / ordenado.where(ordenado > 0)).fillna(0) * pendiente
+    fechas = df['ped_fecha'].fillna('')
+    fechas = fechas.where(fechas != '', date.today().isoformat())
+    monedas = np.where(df['ped_currency_name'] == 'USD', 'USD', 'CLP')
+    df['monto'] = CurrencyService.convert_to_clp(monto_pendiente.to_numpy(), monedas, fechas.tolist())
+    df['kilos'] = pendiente
+
+    _periodo(df, fechas)
+    df['descripcion'] = ''
+    df['tipo'] = 'Comprometido'
+    df['incoterm'] = df['ped_incoterm'].fillna('N/A')
+    df['pais'] = df['partner_pais'].where(df['partner_id'] > 0, 'Descon.').fillna('Descon.')
+    df['categoria_cliente'] = df['partner_categoria'].where(df['partner_id'] > 0, 'S/C').fillna('S/C')
+    df['doc_origen'] = ''
+    df['ref_code'] = ''
+    return df
+
+
+def get_hechos(odoo) -> pd.DataFrame:
+    """
+    Tabla de hechos de ventas (facturas, NC y comprometido) con las columnas de
+    COLUMNAS_HECHOS. Se reutiliza mientras no cambien los datos.
+    """
+    with _store.lock:
+        ahora = time.time()
+        if _ensamblado['version'] == _store.version and ahora - _ensamblado['creado'] < ENSAMBLE_SEGUNDOS:
+            return _ensamblado['df']
+
+        partners = _df('partners')
+        if partners.empty:
+            partners = pd.DataFrame(columns=['pais', 'categoria'])
+        facturas = _ensamblar_facturas(partners)
+        pedidos = _ensamblar_pedidos(partners)
+        partes = [p for p in (facturas, pedidos) if not p.empty]
+        if not partes:
+            df = pd.DataFrame(columns=COLUMNAS_HECHOS)
+        else:
+            df = pd.concat(partes, ignore_index=True)
+            product_map = get_productos(odoo, df['product_id'].unique().tolist())
+            df = _clasificar(df, product_map)
+            # Excluir servicios (no son productos físicos)
+            df = df[df['especie'] != "SERVICIOS"][COLUMNAS_HECHOS].reset_index(drop=True)
+
+        _ensamblado.update(version=_store.version, creado=ahora, df=df)
+        return df
+
+
+def invalidar() -> None:
+    """Descarta el store en memoria y en disco; la próxima consulta recarga desde Odoo."""
+    with _store.lock:
+        _store.invalidar()
+        _ensamblado.update(version=-1, creado=0.0, df=None)
+
+
+def get_stats() -> Dict[str, Any]:
+    return _store.get_stats()
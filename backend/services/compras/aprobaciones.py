@@ -0,0 +1,186 @@
+"""
+Índice de aprobaciones de Órdenes de Compra.
+
+get_ordenes_compra juntaba todos los message_ids de las POs y leía los
+mail.message completos (con el HTML del body, limit=2000) para buscar "aprob"
+en Python: en meses con mucho movimiento bajaba megas de chatter y, pasado el
+límite, las aprobaciones restantes simplemente no aparecían.
+
+Aquí el filtro se hace en Odoo: solo se piden los mensajes de la PO cuyo body
+contiene "aprob" o que registran la aprobación en el tracking (el estado sale
+de "Para aprobar" a uno que no es cancelado; el paso a "Para aprobar" es la
+solicitud, no la aprobación), y solo los campos id, res_id y author_id (sin
+body), paginando por id hasta el final.
+
+El resultado (nombres de quienes aprobaron) se guarda por PO en una tabla
+SQLite junto con una firma de la PO: write_date + cantidad de mensajes.
+Publicar un mensaje en el chatter no siempre cambia el write_date, por eso la
+firma incluye también el largo de message_ids. Mientras la firma no cambie la
+PO se responde desde el índice sin consultar mail.message.
+
+Uso:
+    from backend.services.compras import aprobaciones
+    aprobados = aprobaciones.get_aprobadores(self.odoo, pos)  # {po_id: set(nombres)}
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Set
+
+
+STORE_DB = Path(__file__).parent.parent.parent / "data" / "compras_aprobaciones.db"
+
+TAMANO_PAGINA = 2000
+TAMANO_LOTE = 500
+PATRON_APROBACION = 'aprob'
+PATRON_CANCELADO = 'cancel'
+# Sube cuando cambia el criterio de aprobación: invalida las entradas ya indexadas
+FORMATO_INDICE = 2
+
+_db_lock = threading.Lock()
+_schema_initialized = False
+
+
+def _get_connection() -> sqlite3.Connection:
+    return sqlite3.connect(STORE_DB, timeout=30)
+
+
+def _ensure_db() -> None:
+    global _schema_initialized
+    if _schema_initialized:
+        return
+    with _db_lock:
+        if _schema_initialized:
+            return
+        STORE_DB.parent.mkdir(parents=True, exist_ok=True)
+        conn = _get_connection()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS aprobaciones_po (
+                    po_id INTEGER PRIMARY KEY,
+                    firma TEXT NOT NULL,
+                    aprobadores TEXT NOT NULL,
+                    actualizado TEXT NOT NULL
+                )
+                """
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        _schema_initialized = True
+
+
+def firma_po(po: Dict) -> str:
+    """Firma que invalida la entrada del índice: write_date + cantidad de mensajes (y formato)."""
+    return f"{FORMATO_INDICE}|{po.get('write_date') or ''}|{len(po.get('message_ids') or [])}"
+
+
+def _por_lotes(ids: Iterable[int]) -> Iterable[List[int]]:
+    ids = sorted(ids)
+    for i in range(0, len(ids), TAMANO_LOTE):
+        yield ids[i:i + TAMANO_LOTE]
+
+
+def _leer_indice(po_ids: List[int]) -> Dict[int, Dict]:
+    _ensure_db()
+    guardado = {}
+    conn = _get_connection()
+    try:
+        for lote in _por_lotes(po_ids):
+            marcas = ",".join("?" * len(lote))
+            filas = conn.execute(
+                f"SELECT po_id, firma, aprobadores FROM aprobaciones_po WHERE po_id IN ({marcas})",
+                lote,
+            ).fetchall()
+            for po_id, firma, aprobadores in filas:
+                guardado[po_id] = {'firma': firma, 'aprobadores': set(json.loads(aprobadores))}
+    finally:
+        conn.close()
+    return guardado
+
+
+def _guardar_indice(entradas: Dict[int, Dict]) -> None:
+    if not entradas:
+        return
+    _ensure_db()
+    ahora = datetime.now().isoformat(timespec="seconds")
+    with _db_lock:
+        conn = _get_connection()
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO aprobaciones_po (po_id, firma, aprobadores, actualizado) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (po_id, e['firma'], json.dumps(sorted(e['aprobadores']), ensure_ascii=False), ahora)
+                    for po_id, e in entradas.items()
+                ],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def _leer_aprobaciones(odoo, po_ids: List[int]) -> Dict[int, Set[str]]:
+    """Autores de los mensajes de aprobación de las POs, paginando por id (keyset)."""
+    aprobadores = {pid: set() for pid in po_ids}
+    for lote in _por_lotes(po_ids):
+        domain = [
+            ['model', '=', 'purchase.order'],
+            ['res_id', 'in', lote],
+            '|',
+            ['body', 'ilike', PATRON_APROBACION],
+            '&', '&',
+            ['tracking_value_ids.field.name', '=', 'state'],
+            ['tracking_value_ids.old_value_char', 'ilike', PATRON_APROBACION],
+            ['tracking_value_ids.new_value_char', 'not ilike', PATRON_CANCELADO],
+        ]
+        last_id = 0
+        while True:
+            page = odoo.search_read(
+                'mail.message',
+                domain + [['id', '>', last_id]],
+                ['id', 'res_id', 'author_id'],
+                limit=TAMANO_PAGINA,
+                order='id asc'
+            )
+            for m in page:
+                author = m.get('author_id')
+                uname = author[1] if isinstance(author, (list, tuple)) and len(author) > 1 else ''
+                if uname and m.get('res_id') in aprobadores:
+                    aprobadores[m['res_id']].add(uname)
+            if len(page) < TAMANO_PAGINA:
+                break
+            last_id = page[-1]['id']
+    return aprobadores
+
+
+def get_aprobadores(odoo, pos: List[Dict]) -> Dict[int, Set[str]]:
+    """
+    Nombres de quienes aprobaron cada PO ({po_id: set(nombres)}).
+
+    Las POs deben traer write_date y message_ids. Solo se consulta Odoo por las
+    POs nuevas o cuya firma cambió desde la última vez.
+    """
+    firmas = {po['id']: firma_po(po) for po in pos}
+    if not firmas:
+        return {}
+
+    guardado = _leer_indice(list(firmas))
+    vigentes = {pid: e['aprobadores'] for pid, e in guardado.items() if e['firma'] == firmas[pid]}
+    pendientes = [pid for pid in firmas if pid not in vigentes]
+
+    if pendientes:
+        leidos = _leer_aprobaciones(odoo, pendientes)
+        _guardar_indice({pid: {'firma': firmas[pid], 'aprobadores': leidos[pid]} for pid in pendientes})
+        vigentes.update(leidos)
+        print(f"[ComprasAprobaciones] {len(pendientes)} POs actualizadas, "
+              f"{len(firmas) - len(pendientes)} desde el índice")
+
+    return vigentes
+
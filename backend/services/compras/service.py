@@ -15,6 +15,7 @@ from backend.services.currency_service import CurrencyService
 from backend.cache import get_cache
 
 from .helpers import clean_record, compute_receive_status, compute_approval_status
+from . import aprobaciones
 
 
 class ComprasService:
@@ -61,7 +62,8 @@ class ComprasService:
             'purchase.order',
             domain,
             ['id', 'name', 'partner_id', 'company_id', 'amount_total', 
-             'state', 'date_order', 'message_ids', 'activity_ids', 'currency_id', 'create_uid'],
+             'state', 'date_order', 'message_ids', 'activity_ids', 'currency_id', 'create_uid',
+             'write_date'],
             limit=500,
             order='date_order desc'
         )
@@ -120,49 +122,38 @@ class ComprasService:
                     'subtotal': round(subtotal, 0)
                 })
         
-        # === Batch 3: Mensajes y actividades (para aprobaciones) ===
-        msg_ids_all = set()
-        act_ids_all = set()
+        # === Batch 4: Aprobaciones (índice por PO, sin bodies de mensajes) ===
+        approved_by_po = {}
+        try:
+            approved_by_po = aprobaciones.get_aprobadores(self.odoo, pos)
+        except Exception as e:
+            print(f"[Compras] Error leyendo aprobaciones: {e}")
         
+        # === Batch 5: Actividades (para pendientes) ===
+        act_ids_all = set()
         for po in pos:
-            msg_ids_all.update(po.get('message_ids', []))
             act_ids_all.update(po.get('activity_ids', []))
         
-        # Leer mensajes (para detectar aprobaciones)
-        messages_by_po = {}
-        if msg_ids_all:
-            try:
-                msgs = self.odoo.search_read(
-                    'mail.message',
-                    [['id', 'in', list(msg_ids_all)]],
-                    ['id', 'res_id', 'author_id', 'body'],
-                    limit=2000
-                )
-                for m in msgs:
-                    po_id = m.get('res_id')
-                    if po_id:
-                        messages_by_po.setdefault(po_id, []).append(m)
-            except Exception:
-                pass
-        
-        # Leer actividades (para pendientes)
         activities_by_po = {}
         user_ids = set()
         if act_ids_all:
             try:
-                acts = self.odoo.search_read(
-                    'mail.activity',
-                    [['id', 'in', list(act_ids_all)]],
-                    ['id', 'res_id', 'user_id', 'state'],
-                    limit=1000
-                )
-                for a in acts:
-                    po_id = a.get('res_id')
-                    if po_id:
-                        activities_by_po.setdefault(po_id, []).append(a)
-                    if a.get('user_id'):
-                        uid = a['user_id'][0] if isinstance(a['user_id'], (list, tuple)) else a['user_id']
-                        user_ids.add(uid)
+                act_ids_all = sorted(act_ids_all)
+                for i in range(0, len(act_ids_all), 1000):
+                    lote = act_ids_all[i:i + 1000]
+                    acts = self.odoo.search_read(
+                        'mail.activity',
+                        [['id', 'in', lote]],
+                        ['id', 'res_id', 'user_id', 'state'],
+                        limit=len(lote)
+                    )
+                    for a in acts:
+                        po_id = a.get('res_id')
+                        if po_id:
+                            activities_by_po.setdefault(po_id, []).append(a)
+                        if a.get('user_id'):
+                            uid = a['user_id'][0] if isinstance(a['user_id'], (list, tuple)) else a['user_id']
+                            user_ids.add(uid)
             except Exception:
                 pass
         
@@ -217,16 +208,8 @@ class ComprasService:
             if isinstance(company_name, (list, tuple)):
                 company_name = company_name[1] if len(company_name) > 1 else ''
             
-            # Detectar aprobados por mensajes
-            approved_set = set()
-            for m in messages_by_po.get(po_id, []):
-                body = (m.get('body') or '').replace('&nbsp;', ' ').lower()
-                if 'aprob' in body:
-                    author = m.get('author_id')
-                    if author:
-                        uname = author[1] if isinstance(author, (list, tuple)) else str(author)
-                        if uname:
-                            approved_set.add(uname)
+            # Aprobados según el índice de aprobaciones
+            approved_set = set(approved_by_po.get(po_id, ()))
             
             # Detectar pendientes por actividades
             pending_set = set()
@@ -0,0 +1,338 @@
+"""
+Read model de avance de pedidos de venta (containers), indexado por sale.order.
+
+Un único estado process-wide con:
+
+- fabricaciones con PO asociada (mrp.production), ya normalizadas
+- pedidos de venta (sale.order) referenciados por esas fabricaciones o pedidos
+  por las proyecciones/detalle
+- líneas de venta (sale.order.line) por pedido
+
+La primera consulta carga todo una vez (paginado por id, sin el tope de 1000
+fabricaciones). Después, como máximo cada REFRESCO_SEGUNDOS, se leen solo los
+registros con write_date posterior a la última marca de cada modelo. Cada
+RECONCILIACION_SEGUNDOS se comparan los IDs vigentes para descartar registros
+borrados (unlink no deja write_date). El ciclo (paginación, marcas y
+refresco) es el de read_model_incremental; este store vive solo en memoria.
+
+Listado, resumen, clientes, calendario y detalle se arman desde este estado;
+los filtros y la paginación se hacen en memoria.
+
+Uso:
+    from backend.services.containers import progress_store
+    progress_store.refrescar(self.odoo)
+    producciones = progress_store.producciones_por_venta(start_date, end_date)
+"""
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from backend.services.read_model_incremental import ReadModelIncremental
+from backend.utils import clean_record
+
+from .constants import get_state_display
+
+
+REFRESCO_SEGUNDOS = 60
+RECONCILIACION_SEGUNDOS = 3600
+TAMANO_PAGINA = 2000
+TAMANO_LOTE = 500
+
+PROD_FIELDS = [
+    "name", "product_id", "product_qty", "qty_produced",
+    "state", "date_planned_start", "date_start", "date_finished",
+    "user_id", "x_studio_po_asociada", "x_studio_po_cliente_1",
+    "x_studio_kg_totales_po", "x_studio_kg_consumidos_po",
+    "x_studio_kg_disponibles_po", "x_studio_sala_de_proceso",
+    "x_studio_clientes", "write_date"
+]
+FALLBACK_PROD_FIELDS = [f for f in PROD_FIELDS if f != "x_studio_clientes"]
+
+SALE_FIELDS = [
+    "name", "partner_id", "date_order", "commitment_date",
+    "state", "amount_total", "currency_id", "origin",
+    "user_id", "order_line", "validity_date", "write_date"
+]
+FALLBACK_SALE_FIELDS = [f for f in SALE_FIELDS if f != "validity_date"]
+
+LINE_FIELDS = [
+    "order_id", "product_id", "name", "product_uom_qty",
+    "product_uom", "price_unit", "price_subtotal",
+    "qty_delivered", "qty_invoiced", "write_date"
+]
+
+_store = ReadModelIncremental(
+    'ContainersProgress',
+    tablas=['producciones', 'ventas', 'lineas'],
+    modelos=['mrp.production', 'sale.order', 'sale.order.line'],
+    refresco_segundos=REFRESCO_SEGUNDOS, reconciliacion_segundos=RECONCILIACION_SEGUNDOS,
+    tamano_pagina=TAMANO_PAGINA, tamano_lote=TAMANO_LOTE,
+)
+_producciones: Dict[int, Dict] = _store.tablas['producciones']  # prod_id -> fabricación normalizada (incluye sale_name)
+_ventas: Dict[int, Dict] = _store.tablas['ventas']  # sale_id -> sale.order crudo
+_lineas: Dict[int, Dict[int, Dict]] = _store.tablas['lineas']  # sale_id -> {line_id: línea limpia}
+_ventas_por_nombre: Dict[str, int] = {}
+# Campos leídos de cada modelo (None: aún no se sabe si el servidor tiene los campos Studio)
+_campos: Dict[str, Optional[List[str]]] = {"prod_fields": None, "sale_fields": None}
+
+
+# ==================== LECTURA DESDE ODOO ====================
+
+def _leer(odoo, model: str, domain: List, clave: str, campos: List[str], fallback: List[str]) -> List[Dict]:
+    """Lee con campos Studio opcionales; si el servidor no los tiene, recuerda el fallback."""
+    if _campos[clave] is None:
+        try:
+            registros = _store.paginar(odoo, model, domain, campos)
+            _campos[clave] = campos
+            return registros
+        except Exception as e:
+            print(f"[ContainersProgress] {model} sin campos extra: {e}")
+            _campos[clave] = fallback
+    return _store.paginar(odoo, model, domain, _campos[clave])
+
+
+def _nombre_venta(po_asociada: Any) -> str:
+    # x_studio_po_asociada contiene el NAME del sale.order (ej: "S00830"), no el ID
+    if not po_asociada:
+        return ""
+    return po_asociada.strip() if isinstance(po_asociada, str) else str(po_asociada)
+
+
+def _registrar_produccion(p: Dict) -> None:
+    sale_name = _nombre_venta(p.get("x_studio_po_asociada"))
+    if not sale_name:
+        _producciones.pop(p["id"], None)
+        return
+
+    product = p.get("product_id")
+    user = p.get("user_id")
+    sala = p.get("x_studio_sala_de_proceso")
+    cliente = p.get("x_studio_clientes")
+    qty_produced = p.get("qty_produced", 0) or 0
+    _producciones[p["id"]] = {
+        "id": p["id"],
+        "sale_name": sale_name,
+        "name": p.get("name", ""),
+        "product_name": product[1] if isinstance(product, (list, tuple)) else "N/A",
+        "product_qty": p.get("product_qty", 0) or 0,
+        "qty_produced": qty_produced,
+        "kg_producidos": qty_produced,
+        "state": p.get("state", ""),
+        "state_display": get_state_display(p.get("state", "")),
+        "date_planned_start": p.get("date_planned_start", ""),
+        "date_start": p.get("date_start", ""),
+        "date_finished": p.get("date_finished", ""),
+        "user_name": user[1] if isinstance(user, (list, tuple)) else "N/A",
+        "po_cliente": p.get("x_studio_po_cliente_1", ""),
+        "kg_totales_po": p.get("x_studio_kg_totales_po", 0),
+        "kg_consumidos_po": p.get("x_studio_kg_consumidos_po", 0),
+        "kg_disponibles_po": p.get("x_studio_kg_disponibles_po", 0),
+        "sala_proceso": sala[1] if isinstance(sala, (list, tuple)) else "N/A",
+        "cliente": cliente[1] if isinstance(cliente, (list, tuple)) else "N/A",
+    }
+
+
+def _registrar_venta(s: Dict) -> None:
+    anterior = _ventas.get(s["id"])
+    if anterior and anterior.get("name") != s.get("name"):
+        _ventas_por_nombre.pop(anterior.get("name"), None)
+    _ventas[s["id"]] = s
+    if s.get("name"):
+        _ventas_por_nombre[s["name"]] = s["id"]
+
+
+def _quitar_venta(sale_id: int) -> None:
+    venta = _ventas.pop(sale_id, None)
+    if venta:
+        _ventas_por_nombre.pop(venta.get("name"), None)
+    _lineas.pop(sale_id, None)
+
+
+def _registrar_linea(l: Dict) -> None:
+    order = l.get("order_id")
+    sale_id = order[0] if isinstance(order, (list, tuple)) else order
+    if not sale_id:
+        return
+    linea = clean_record(l)
+    linea.pop("write_date", None)
+    _lineas.setdefault(sale_id, {})[l["id"]] = linea
+
+
+def _cargar_lineas(odoo, sale_ids: List[int]) -> None:
+    """Reemplaza completas las líneas de los pedidos indicados."""
+    for lote in _store.por_lotes(sale_ids):
+        lineas = _store.paginar(odoo, "sale.order.line", [("order_id", "in", lote)], LINE_FIELDS)
+        for sale_id in lote:
+            _lineas[sale_id] = {}
+        for l in lineas:
+            _registrar_linea(l)
+        _store.marcar("sale.order.line", lineas)
+
+
+def _cargar_ventas(odoo, domain_campo: str, valores: List) -> None:
+    """Carga pedidos (por name o id) y todas sus líneas."""
+    cargadas = []
+    for lote in _store.por_lotes(valores):
+        ventas = _leer(odoo, "sale.order", [(domain_campo, "in", lote)],
+                       "sale_fields", SALE_FIELDS, FALLBACK_SALE_FIELDS)
+        for s in ventas:
+            _registrar_venta(s)
+            cargadas.append(s["id"])
+        _store.marcar("sale.order", ventas)
+    if cargadas:
+        _cargar_lineas(odoo, cargadas)
+
+
+def _cargar_producciones(odoo, domain: List) -> List[Dict]:
+    """Lee fabricaciones y registra las que tienen (o tenían) PO asociada."""
+    prods = _leer(odoo, "mrp.production", domain, "prod_fields", PROD_FIELDS, FALLBACK_PROD_FIELDS)
+    for p in prods:
+        if p.get("x_studio_po_asociada") or p["id"] in _producciones:
+            _registrar_produccion(p)
+    _store.marcar("mrp.production", prods)
+    return prods
+
+
+def _nombres_sin_venta() -> List[str]:
+    nombres = {p["sale_name"] for p in _producciones.values()}
+    return sorted(n for n in nombres if n not in _ventas_por_nombre)
+
+
+def _carga_inicial(odoo) -> None:
+    inicio = time.time()
+    _ventas_por_nombre.clear()
+    _cargar_producciones(odoo, [("x_studio_po_asociada", "!=", False)])
+    _cargar_ventas(odoo, "name", _nombres_sin_venta())
+    print(f"[ContainersProgress] Carga inicial: {len(_producciones)} fabricaciones, "
+          f"{len(_ventas)} pedidos en {time.time() - inicio:.1f}s")
+
+
+def _aplicar_deltas(odoo) -> bool:
+    """Aplica cambios por write_date (>= marca: las reescrituras son idempotentes)."""
+    marcas = _store.marcas
+
+    prods = _cargar_producciones(odoo, [("write_date", ">=", marcas["mrp.production"])])
+
+    sale_ids = sorted(_ventas)
+    cambiadas = []
+    for lote in _store.por_lotes(sale_ids):
+        ventas = _leer(odoo, "sale.order", [("write_date", ">=", marcas["sale.order"]), ("id", "in", lote)],
+                       "sale_fields", SALE_FIELDS, FALLBACK_SALE_FIELDS)
+        for s in ventas:
+            _registrar_venta(s)
+            cambiadas.append(s["id"])
+        _store.marcar("sale.order", ventas)
+    # Un pedido modificado puede haber perdido líneas: se releen completas
+    if cambiadas:
+        _cargar_lineas(odoo, cambiadas)
+
+    restantes = set(sale_ids) - set(cambiadas)
+    lineas_cambiadas = 0
+    for lote in _store.por_lotes(restantes):
+        lineas = _store.paginar(odoo, "sale.order.line",
+                                [("write_date", ">=", marcas["sale.order.line"]), ("order_id", "in", lote)],
+                                LINE_FIELDS)
+        for l in lineas:
+            _registrar_linea(l)
+        _store.marcar("sale.order.line", lineas)
+        lineas_cambiadas += len(lineas)
+
+    nuevos = _nombres_sin_venta()
+    if nuevos:
+        _cargar_ventas(odoo, "name", nuevos)
+    if prods or cambiadas or nuevos:
+        print(f"[ContainersProgress] Deltas: {len(prods)} fabricaciones, {len(cambiadas)} pedidos, "
+              f"{len(nuevos)} pedidos nuevos")
+    return bool(prods or cambiadas or nuevos or lineas_cambiadas)
+
+
+def _reconciliar(odoo) -> bool:
+    """Descarta fabricaciones y pedidos borrados en Odoo e incorpora fabricaciones faltantes."""
+    vigentes = set(odoo.search("mrp.production", [("x_studio_po_asociada", "!=", False)]))
+    sobrantes = _store.descartar_ausentes("producciones", vigentes)
+    faltantes = vigentes - set(_producciones)
+    for lote in _store.por_lotes(faltantes):
+        _cargar_producciones(odoo, [("id", "in", lote)])
+
+    sale_ids = sorted(_ventas)
+    existentes = set()
+    for lote in _store.por_lotes(sale_ids):
+        existentes.update(odoo.search("sale.order", [("id", "in", lote)]))
+    borradas = [sid for sid in sale_ids if sid not in existentes]
+    for sale_id in borradas:
+        _quitar_venta(sale_id)
+
+    nuevos = _nombres_sin_venta()
+    if nuevos:
+        _cargar_ventas(odoo, "name", nuevos)
+    return bool(sobrantes or faltantes or borradas or nuevos)
+
+
+# ==================== API ====================
+
+def refrescar(odoo, forzar: bool = False) -> None:
+    """Carga el read model la primera vez y luego aplica deltas (como máximo cada REFRESCO_SEGUNDOS)."""
+    _store.refrescar(odoo, _carga_inicial, _aplicar_deltas, _reconciliar, forzar=forzar)
+
+
+def asegurar_ventas(odoo, sale_ids: Iterable[int]) -> None:
+    """Incorpora al read model pedidos que aún no están (p.ej. proyecciones sin fabricaciones)."""
+    with _store.lock:
+        faltantes = sorted({sid for sid in sale_ids if sid and sid not in _ventas})
+        if faltantes:
+            _cargar_ventas(odoo, "id", faltantes)
+
+
+def producciones_por_venta(start_date: Optional[str] = None,
+                           end_date: Optional[str] = None) -> Dict[str, List[Dict]]:
+    """Fabricaciones agrupadas por nombre de pedido, filtradas por date_planned_start."""
+    agrupadas: Dict[str, List[Dict]] = {}
+    with _store.lock:
+        prods = list(_producciones.values())
+    prods.sort(key=lambda p: p.get("date_planned_start") or "", reverse=True)
+    for p in prods:
+        fecha = p.get("date_planned_start") or ""
+        if start_date and fecha < start_date:
+            continue
+        if end_date and fecha > end_date:
+            continue
+        agrupadas.setdefault(p["sale_name"], []).append(p)
+    return agrupadas
+
+
+def get_venta(sale_id: int) -> Optional[Dict]:
+    with _store.lock:
+        return _ventas.get(sale_id)
+
+
+def get_venta_por_nombre(sale_name: str) -> Optional[Dict]:
+    with _store.lock:
+        sale_id = _ventas_por_nombre.get(sale_name)
+        return _ventas.get(sale_id) if sale_id else None
+
+
+def get_lineas(sale_id: int) -> List[Dict]:
+    """Líneas del pedido en el orden de order_line."""
+    with _store.lock:
+        venta = _ventas.get(sale_id) or {}
+        por_id = _lineas.get(sale_id, {})
+        orden = [lid for lid in (venta.get("order_line") or []) if lid in por_id]
+        orden += sorted(lid for lid in por_id if lid not in set(orden))
+        return [dict(por_id[lid]) for lid in orden]
+
+
+def invalidar() -> None:
+    """Descarta el read model completo (se recarga en la siguiente consulta)."""
+    with _store.lock:
+        _store.invalidar()
+        _ventas_por_nombre.clear()
+
+
+def get_stats() -> Dict:
+    with _store.lock:
+        return {
+            "fabricaciones": len(_producciones),
+            "pedidos": len(_ventas),
+            "lineas": sum(len(l) for l in _lineas.values()),
+            "marcas": dict(_store.marcas),
+            "cargado": _store.estado["cargado"],
+        }
@@ -0,0 +1,438 @@
+"""
+Motor Sankey con nivel de detalle (LOD) para trazabilidad de pallets.
+
+El servicio arma una sola vez el grafo base de flujos al nivel más fino
+(proveedor → pallet/lote → proceso → pallet/lote → cliente) y este módulo lo
+proyecta al grano pedido:
+
+- pallet:   proveedor → pallet → proceso → pallet → cliente
+- lot:      proveedor → lote → proceso → lote → cliente
+- process:  proveedor → proceso → cliente (pallets contraídos)
+- sala:     proveedor → sala → cliente
+- producer: proveedor → sala (a dónde va la fruta de cada productor)
+- customer: sala → cliente (de dónde sale lo que compra cada cliente)
+
+Los nodos que el grano no muestra se contraen repartiendo sus salidas entre sus
+entradas en proporción a los kg, así el volumen se conserva. Después se limita
+la cantidad de nodos por tipo (los flujos chicos van a "Otros") y cada nodo
+agregado lleva un token `drill` que, enviado en `expand`, lo abre un nivel.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+GRAINS = {
+    "pallet": ("SUPP", "PKG", "PROC", "CUST"),
+    "lot": ("SUPP", "LOT", "PROC", "CUST"),
+    "process": ("SUPP", "PROC", "CUST"),
+    "sala": ("SUPP", "SALA", "CUST"),
+    "producer": ("SUPP", "SALA"),
+    "customer": ("SALA", "CUST"),
+}
+DEFAULT_GRAIN = "process"
+DEFAULT_MAX_NODES = 80
+MIN_MAX_NODES = 10
+MAX_MAX_NODES = 300
+MIN_SHARE = 0.002  # Nodos bajo el 0,2% del flujo de su tipo van a "Otros"
+MAX_OTROS_POR_TIPO = 2  # "Otros" por tipo (bandas de columnas: entrada / salida)
+
+PREVIO = ("PREVIO",)
+
+_TIPOS = {
+    "SUPP": ("🏭", "#9b59b6", "rgba(155, 89, 182, 0.5)", "supplier", "proveedores"),
+    "PKG": ("📦", "#f39c12", "rgba(243, 156, 18, 0.5)", "pallet", "pallets"),
+    "LOT": ("🏷️", "#e67e22", "rgba(230, 126, 34, 0.5)", "lot", "lotes"),
+    "PROC": ("🔴", "#e74c3c", "rgba(46, 204, 113, 0.5)", "process", "procesos"),
+    "SALA": ("⚙️", "#c0392b", "rgba(46, 204, 113, 0.5)", "sala", "salas"),
+    "CUST": ("🔵", "#3498db", "rgba(52, 152, 219, 0.5)", "customer", "clientes"),
+    "PREVIO": ("📦", "#95a5a6", "rgba(149, 165, 166, 0.5)", "stock_previo", "stock previo"),
+    "OTROS": ("➕", "#bdc3c7", "rgba(189, 195, 199, 0.5)", "otros", "otros"),
+}
+
+
+# ==================== PROYECCIÓN AL GRANO ====================
+
+def _tipo(key: str) -> str:
+    return key.split(":", 1)[0]
+
+
+def _clave_visible(nodo: Tuple, grain: str, base: Dict, expand: set,
+                   pallets_abiertos: set) -> Optional[str]:
+    """Clave del nodo visible al que pertenece un nodo base (None = se contrae)."""
+    stages = GRAINS[grain]
+    tipo = nodo[0]
+    if tipo in ("SUPP", "CUST"):
+        return f"{tipo}:{nodo[1]}" if tipo in stages else None
+    if tipo == "PREVIO":
+        return "PREVIO"
+    if tipo == "PKG":
+        pkg_id, lot_id = nodo[1], nodo[2]
+        if grain == "pallet" or pkg_id in pallets_abiertos:
+            return f"PKG:{pkg_id}"
+        if grain == "lot":
+            if lot_id is None or f"LOT:{lot_id}" in expand:
+                return f"PKG:{pkg_id}"
+            return f"LOT:{lot_id}"
+        return None
+    if tipo == "PROC":
+        ref = nodo[1]
+        if "PROC" in stages:
+            return f"PROC:{ref}"
+        sala = base["procesos"].get(ref, {}).get("sala") or "Sin sala"
+        if f"SALA:{sala}" in expand:
+            return f"PROC:{ref}"
+        return f"SALA:{sala}"
+    return None
+
+
+def _contraer(edges: Dict[Tuple, float], contraer: Iterable[Tuple]) -> Dict[Tuple, float]:
+    """
+    Elimina nodos pasantes conectando cada entrada con cada salida.
+    El flujo a→b resultante es salida(b) * entrada(a) / entrada_total, así que
+    las salidas se conservan. Un pallet sin entradas en el rango (stock previo)
+    se conecta al nodo PREVIO para no perder su volumen.
+    """
+    out_adj: Dict[Tuple, Dict[Tuple, float]] = {}
+    in_adj: Dict[Tuple, Dict[Tuple, float]] = {}
+    for (a, b), q in edges.items():
+        out_adj.setdefault(a, {})[b] = q
+        in_adj.setdefault(b, {})[a] = q
+
+    def add(a, b, q):
+        if a == b or q <= 0:
+            return
+        out_adj.setdefault(a, {})
+        out_adj[a][b] = out_adj[a].get(b, 0) + q
+        in_adj.setdefault(b, {})
+        in_adj[b][a] = in_adj[b].get(a, 0) + q
+
+    for n in contraer:
+        ins = in_adj.pop(n, {})
+        outs = out_adj.pop(n, {})
+        for a in ins:
+            out_adj.get(a, {}).pop(n, None)
+        for b in outs:
+            in_adj.get(b, {}).pop(n, None)
+        if not outs:
+            continue
+        total_out = sum(outs.values())
+        if not ins:
+            if n[0] != "PKG":
+                continue
+            ins = {PREVIO: total_out}
+        total_in = sum(ins.values())
+        if total_in <= 0:
+            continue
+        for a, qa in ins.items():
+            for b, qb in outs.items():
+                add(a, b, qb * qa / total_in)
+
+    return {(a, b): q for a, targets in out_adj.items() for b, q in targets.items() if q > 0}
+
+
+def _romper_ciclos(edges: Dict[Tuple[str, str], float]) -> Dict[Tuple[str, str], float]:
+    """
+    El Sankey requiere un grafo acíclico; al agregar (p.ej. sala A → sala B → sala A)
+    pueden aparecer ciclos. Se descartan los arcos de retorno de un DFS que recorre
+    primero los arcos más pesados.
+    """
+    adj: Dict[str, List[Tuple[float, str]]] = {}
+    nodos = set()
+    for (a, b), q in edges.items():
+        adj.setdefault(a, []).append((q, b))
+        nodos.update((a, b))
+    for vecinos in adj.values():
+        vecinos.sort(reverse=True)
+
+    estado: Dict[str, int] = {}  # 1 = en pila, 2 = terminado
+    retorno = set()
+    for raiz in sorted(nodos):
+        if raiz in estado:
+            continue
+        estado[raiz] = 1
+        pila = [(raiz, iter(adj.get(raiz, [])))]
+        while pila:
+            nodo, vecinos = pila[-1]
+            siguiente = next(vecinos, None)
+            if siguiente is None:
+                estado[nodo] = 2
+                pila.pop()
+                continue
+            _, destino = siguiente
+            if estado.get(destino) == 1:
+                retorno.add((nodo, destino))
+            elif destino not in estado:
+                estado[destino] = 1
+                pila.append((destino, iter(adj.get(destino, []))))
+    return {k: q for k, q in edges.items() if k not in retorno}
+
+
+def _presupuestos(por_tipo: Dict[str, List[str]], max_nodes: int,
+                  expand: set) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """
+    Reparte max_nodes entre tipos (llenado por agua: los tipos chicos toman lo que
+    necesitan y el resto se reparte). Un tipo que no cabe en su cupo reserva hasta
+    MAX_OTROS_POR_TIPO espacios para sus "Otros", así visibles + "Otros" no pasan
+    de max_nodes. Un tipo con "Otros" expandido recibe además max_nodes // 2 nodos
+    extra.
+
+    Returns:
+        (nodos visibles por tipo, cantidad máxima de "Otros" por tipo)
+    """
+    presupuesto: Dict[str, int] = {}
+    cupo_otros: Dict[str, int] = {}
+    restante = max_nodes
+    pendientes = sorted(por_tipo, key=lambda t: len(por_tipo[t]))
+    for i, tipo in enumerate(pendientes):
+        cantidad = len(por_tipo[tipo])
+        cupo = max(restante // (len(pendientes) - i), 1)
+        if cantidad <= cupo:
+            # Si igual aparece un "Otros" (nodos bajo MIN_SHARE) reemplaza a
+            # nodos de este mismo tipo, no suma al total
+            presupuesto[tipo] = cantidad
+            cupo_otros[tipo] = MAX_OTROS_POR_TIPO
+            restante -= cantidad
+        else:
+            cupo_otros[tipo] = max(min(MAX_OTROS_POR_TIPO, cupo - 1), 1)
+            presupuesto[tipo] = cupo - cupo_otros[tipo]
+            restante -= cupo
+        if f"OTROS:{tipo}" in expand:
+            presupuesto[tipo] = min(presupuesto[tipo] + max_nodes // 2, cantidad)
+    return presupuesto, cupo_otros
+
+
+def _profundidades(nodos: Iterable[str], edges: Dict[Tuple[str, str], float]) -> Dict[str, int]:
+    """Columna de cada nodo: largo del camino más largo desde un origen (grafo acíclico)."""
+    entradas: Dict[str, int] = {n: 0 for n in nodos}
+    salida: Dict[str, List[str]] = {}
+    for a, b in edges:
+        salida.setdefault(a, []).append(b)
+        entradas[b] += 1
+    profundidad = {n: 0 for n in entradas}
+    cola = [n for n, grado in entradas.items() if grado == 0]
+    while cola:
+        n = cola.pop()
+        for m in salida.get(n, []):
+            profundidad[m] = max(profundidad[m], profundidad[n] + 1)
+            entradas[m] -= 1
+            if entradas[m] == 0:
+                cola.append(m)
+    return profundidad
+
+
+def _bandas(resto: List[str], columna: Dict[str, int], cantidad: int) -> Dict[str, int]:
+    """
+    Reparte los nodos de un "Otros" en `cantidad` bandas de columnas contiguas con
+    una cantidad parecida de nodos (una columna nunca se parte entre dos bandas).
+    """
+    por_columna: Dict[int, int] = {}
+    for n in resto:
+        por_columna[columna[n]] = por_columna.get(columna[n], 0) + 1
+    banda_columna: Dict[int, int] = {}
+    acumulado = 0
+    for col in sorted(por_columna):
+        banda_columna[col] = min(acumulado * cantidad // len(resto), cantidad - 1)
+        acumulado += por_columna[col]
+    return {n: banda_columna[columna[n]] for n in resto}
+
+
+def _colapsar(edges: Dict[Tuple[str, str], float], max_nodes: int,
+              expand: set) -> Tuple[Dict[Tuple[str, str], float], Dict[str, List[str]]]:
+    """
+    Agrupa los nodos chicos o que exceden el presupuesto en "OTROS:<tipo>:<banda>".
+    Cada tipo tiene a lo sumo MAX_OTROS_POR_TIPO bandas de columnas contiguas, para
+    que p.ej. los pallets de entrada y de salida de un proceso no caigan en el mismo
+    "Otros" y formen un ciclo. En cadenas más largas que eso un "Otros" puede quedar
+    en un ciclo; lo resuelve el _romper_ciclos posterior.
+    """
+    flujo_in: Dict[str, float] = {}
+    flujo_out: Dict[str, float] = {}
+    for (a, b), q in edges.items():
+        flujo_out[a] = flujo_out.get(a, 0) + q
+        flujo_in[b] = flujo_in.get(b, 0) + q
+    nodos = set(flujo_in) | set(flujo_out)
+    peso = {n: max(flujo_in.get(n, 0), flujo_out.get(n, 0)) for n in nodos}
+    columna = _profundidades(nodos, edges)
+
+    por_tipo: Dict[str, List[str]] = {}
+    for n in sorted(nodos, key=lambda n: (-peso[n], n)):
+        por_tipo.setdefault(_tipo(n), []).append(n)
+
+    presupuesto, cupo_otros = _presupuestos(por_tipo, max_nodes, expand)
+    grupo: Dict[str, str] = {}
+    otros: Dict[str, List[str]] = {}
+    for tipo, miembros in por_tipo.items():
+        expandido = f"OTROS:{tipo}" in expand
+        total = sum(peso[n] for n in miembros)
+        visibles = [
+            n for n in miembros[:presupuesto[tipo]]
+            if expandido or peso[n] >= MIN_SHARE * total
+        ]
+        resto = miembros[len(visibles):]
+        if len(resto) < 2:  # "Otros" con un solo nodo no ahorra nada
+            visibles, resto = miembros, []
+        for n in visibles:
+            grupo[n] = n
+        if not resto:
+            continue
+        # Nunca más bandas que la mitad del resto: cada "Otros" reemplaza al menos dos nodos
+        cantidad = max(min(cupo_otros[tipo], len({columna[n] for n in resto}), len(resto) // 2), 1)
+        for n, banda in _bandas(resto, columna, cantidad).items():
+            grupo[n] = f"OTROS:{tipo}:{banda}"
+            otros.setdefault(grupo[n], []).append(n)
+
+    colapsados: Dict[Tuple[str, str], float] = {}
+    for (a, b), q in edges.items():
+        ga, gb = grupo[a], grupo[b]
+        if ga != gb:
+            colapsados[(ga, gb)] = colapsados.get((ga, gb), 0) + q
+    return colapsados, otros
+
+
+# ==================== NODOS Y LAYOUT ====================
+
+def _detalle(key: str, base: Dict, grain: str, miembros: Dict[str, List[str]],
+             procesos_por_sala: Dict[str, int], peso: float) -> Tuple[str, Dict]:
+    """Etiqueta y detalle (incluye token de drill-down si el nodo se puede abrir)."""
+    tipo, _, ident = key.partition(":")
+    icono = _TIPOS[tipo][0]
+    detalle: Dict = {"type": _TIPOS[tipo][3], "qty": round(peso, 2)}
+
+    if tipo == "SUPP":
+        nombre = base["proveedores"].get(int(ident), "Proveedor")
+        detalle["id"] = int(ident)
+    elif tipo == "CUST":
+        nombre = base["clientes"].get(int(ident), "Cliente")
+        detalle["id"] = int(ident)
+    elif tipo == "PKG":
+        pallet = base["pallets"].get(int(ident), {})
+        nombre = pallet.get("name") or ident
+        detalle["id"] = int(ident)
+        detalle["products"] = ", ".join(f"{p}: {q:.0f}kg" for p, q in pallet.get("products", {}).items())
+    elif tipo == "LOT":
+        nombre = base["lotes"].get(int(ident), ident)
+        detalle.update({"id": int(ident), "drill": key})
+    elif tipo == "PROC":
+        info = base["procesos"].get(ident, {})
+        nombre = ident
+        detalle.update({"ref": ident, "date": info.get("date", ""), "sala": info.get("sala") or ""})
+        if grain == "process":
+            detalle["drill"] = key
+    elif tipo == "SALA":
+        nombre = ident
+        detalle.update({"name": ident, "procesos": procesos_por_sala.get(ident, 0), "drill": key})
+    elif tipo == "PREVIO":
+        nombre = "Stock previo al rango"
+    else:
+        tipo_otros = ident.split(":", 1)[0]
+        cantidad = len(miembros.get(key, []))
+        nombre = f"Otros {_TIPOS[tipo_otros][4]} ({cantidad})"
+        detalle.update({"tipo": _TIPOS[tipo_otros][3], "count": cantidad, "drill": f"OTROS:{tipo_otros}"})
+    return f"{icono} {nombre}", detalle
+
+
+def _layout(nodos: List[str], edges: Dict[Tuple[str, str], float],
+            peso: Dict[str, float]) -> Dict[str, Tuple[float, float]]:
+    """Posición x por profundidad (camino más largo desde un origen) e y por peso dentro de la columna."""
+    profundidad = _profundidades(nodos, edges)
+
+    max_prof = max(profundidad.values(), default=0) or 1
+    columnas: Dict[int, List[str]] = {}
+    for n in nodos:
+        columnas.setdefault(profundidad[n], []).append(n)
+    posiciones = {}
+    for prof, columna in columnas.items():
+        columna.sort(key=lambda n: (-peso.get(n, 0), n))
+        x = 0.05 + 0.9 * prof / max_prof
+        for i, n in enumerate(columna):
+            posiciones[n] = (round(x, 4), round((i + 1) / (len(columna) + 1), 4))
+    return posiciones
+
+
+# ==================== API ====================
+
+def build_sankey(base: Dict, grain: str = DEFAULT_GRAIN, max_nodes: int = DEFAULT_MAX_NODES,
+                 expand: Optional[Iterable[str]] = None) -> Dict:
+    """
+    Proyecta el grafo base al grano pedido con una cantidad acotada de nodos.
+
+    Args:
+        base: Grafo base de ContainersService._get_sankey_base
+        grain: pallet | lot | process | sala | producer | customer
+        max_nodes: Máximo aproximado de nodos (se acota entre MIN_MAX_NODES y MAX_MAX_NODES)
+        expand: Tokens `drill` de los nodos a abrir
+
+    Returns:
+        Dict con nodes/links en formato Plotly Sankey (compatible con nivo_sankey) y meta.
+    """
+    if grain not in GRAINS:
+        raise ValueError(f"Grano inválido: {grain}. Opciones: {', '.join(GRAINS)}")
+    max_nodes = max(MIN_MAX_NODES, min(int(max_nodes or DEFAULT_MAX_NODES), MAX_MAX_NODES))
+    expand = {token for token in (expand or []) if token}
+
+    # Pallets que se muestran individualmente por abrir su proceso (grano process)
+    pallets_abiertos = set()
+    for (a, b) in base["edges"]:
+        for proc, pallet in ((a, b), (b, a)):
+            if proc[0] == "PROC" and pallet[0] == "PKG" and f"PROC:{proc[1]}" in expand:
+                pallets_abiertos.add(pallet[1])
+
+    nodos_base = {n for edge in base["edges"] for n in edge}
+    visible = {n: _clave_visible(n, grain, base, expand, pallets_abiertos) for n in nodos_base}
+    contraidos = _contraer(base["edges"], [n for n in nodos_base if visible[n] is None])
+    visible[PREVIO] = "PREVIO"
+
+    edges: Dict[Tuple[str, str], float] = {}
+    procesos_por_sala: Dict[str, set] = {}
+    for (a, b), q in contraidos.items():
+        va, vb = visible[a], visible[b]
+        for n, v in ((a, va), (b, vb)):
+            if n[0] == "PROC" and v.startswith("SALA:"):
+                procesos_por_sala.setdefault(v[5:], set()).add(n[1])
+        if va != vb:
+            edges[(va, vb)] = edges.get((va, vb), 0) + q
+
+    nodos_totales = len({n for edge in edges for n in edge})
+    edges, otros = _colapsar(_romper_ciclos(edges), max_nodes, expand)
+    edges = _romper_ciclos(edges)
+
+    peso: Dict[str, float] = {}
+    flujo_in: Dict[str, float] = {}
+    for (a, b), q in edges.items():
+        peso[a] = peso.get(a, 0) + q
+        flujo_in[b] = flujo_in.get(b, 0) + q
+    for n, q in flujo_in.items():
+        peso[n] = max(peso.get(n, 0), q)
+
+    orden = sorted(peso, key=lambda n: (list(_TIPOS).index(_tipo(n)), -peso[n], n))
+    posiciones = _layout(orden, edges, peso)
+    cantidad_sala = {sala: len(refs) for sala, refs in procesos_por_sala.items()}
+    nodes = []
+    indice = {}
+    for key in orden:
+        label, detalle = _detalle(key, base, grain, otros, cantidad_sala, peso[key])
+        x, y = posiciones[key]
+        indice[key] = len(nodes)
+        nodes.append({"label": label, "color": _TIPOS[_tipo(key)][1], "detail": detalle, "x": x, "y": y})
+
+    links = [
+        {
+            "source": indice[a],
+            "target": indice[b],
+            "value": round(q, 2),
+            "color": _TIPOS[_tipo(a)][2],
+        }
+        for (a, b), q in sorted(edges.items(), key=lambda item: -item[1])
+    ]
+
+    return {
+        "nodes": nodes,
+        "links": links,
+        "meta": {
+            "grain": grain,
+            "max_nodes": max_nodes,
+            "expand": sorted(expand),
+            "move_lines": base.get("move_lines", 0),
+            "nodos_sin_colapsar": nodos_totales,
+            "nodos_colapsados": sum(len(m) for m in otros.values()),
+        },
+    }
@@ -6,10 +6,11 @@ REFACTORIZADO: Constantes, helpers y Sankey extraídos a módulos separados.
 """
 from typing import List, Dict, Optional
 from shared.odoo_client import OdooClient
-from backend.utils import clean_record, get_name_from_relation, get_state_display
+from backend.utils import clean_record, get_name_from_relation
 from backend.services.currency_service import CurrencyService
+from backend.cache import get_cache
 
-from .constants import get_state_display as local_get_state_display
+from . import progress_store, sankey
 from .helpers import (
     build_pallet_products, 
     build_container_detail, 
@@ -21,16 +22,21 @@ from .helpers import (
 class ContainersService:
     """Servicio para operaciones de Pedidos de Venta y seguimiento de fabricación"""
 
+    SANKEY_PAGE_SIZE = 5000  # stock.move.line por página (paginado por id)
+    SANKEY_BASE_TTL = 300  # Grafo base del Sankey por rango de fechas
+
     def __init__(self, username: str = None, password: str = None):
         self.odoo = OdooClient(username=username, password=password)
+        self._cache = get_cache()
     
-    def _convert_to_clp(self, amount: float, currency_id: any) -> float:
+    def _convert_to_clp(self, amount: float, currency_id: any, fecha: Optional[str] = None) -> float:
         """
-        Convierte el monto a CLP si está en USD.
+        Convierte el monto a CLP si está en USD, al tipo de cambio de la fecha del documento.
         
         Args:
             amount: Monto a convertir
             currency_id: Puede ser tuple (id, name) o dict con 'name'
+            fecha: Fecha del documento (hoy si no se indica)
             
         Returns:
             float: Monto en CLP
@@ -47,268 +53,115 @@ class ContainersService:
         
         # Si es USD, convertir a CLP
         if currency_name and "USD" in currency_name.upper():
-            return CurrencyService.convert_usd_to_clp(amount)
+            return CurrencyService.convert_usd_to_clp(amount, fecha)
         
         # Si es CLP o cualquier otra, retornar el monto original
         return amount
 
+    def _build_container(self, sale: Dict, productions: List[Dict]) -> Dict:
+        """Arma la fila de un pedido de venta con su avance desde el read model."""
+        sale_id = sale["id"]
+        
+        # Obtener partner name ANTES de clean_record
+        partner = sale.get("partner_id")
+        partner_name = partner[1] if partner and isinstance(partner, (list, tuple)) and len(partner) > 1 else "N/A"
+        
+        sale_clean = clean_record(sale)
+        lines_data = progress_store.get_lineas(sale_id)
+        
+        # KG totales del pedido (suma de líneas)
+        kg_total = sum([l.get("product_uom_qty", 0) or 0 for l in lines_data])
+        
+        # KG por producto (agrupado)
+        kg_por_producto = {}
+        for line in lines_data:
+            prod = line.get("product_id", {})
+            prod_name = prod.get("name", "N/A") if isinstance(prod, dict) else "N/A"
+            kg_por_producto[prod_name] = kg_por_producto.get(prod_name, 0) + (line.get("product_uom_qty", 0) or 0)
+        
+        kg_producidos = sum([p.get("qty_produced", 0) or 0 for p in productions])
+        kg_disponibles = kg_total - kg_producidos
+        avance_pct = (kg_producidos / kg_total * 100) if kg_total > 0 else 0
+        
+        # Producto principal
+        producto_principal = "N/A"
+        if lines_data:
+            prod = lines_data[0].get("product_id")
+            if isinstance(prod, dict):
+                producto_principal = prod.get("name", "N/A")
+        
+        # Convertir monto a CLP si es necesario
+        currency_id = sale_clean.get("currency_id", {})
+        amount_original = sale_clean.get("amount_total", 0)
+        amount_clp = self._convert_to_clp(amount_original, currency_id, sale_clean.get("date_order"))
+        
+        return {
+            "id": sale_id,
+            "name": sale_clean.get("name", ""),
+            "partner_id": sale_clean.get("partner_id", {}),
+            "partner_name": partner_name,
+            # partner_id es el cliente en sale.order
+            "client_name": partner_name,
+            "date_order": sale_clean.get("date_order", ""),
+            "commitment_date": sale_clean.get("commitment_date", ""),
+            "validity_date": sale_clean.get("validity_date", ""),
+            "state": sale_clean.get("state", ""),
+            "origin": sale_clean.get("origin", ""),
+            "currency_id": currency_id,
+            "amount_total": amount_clp,  # Monto convertido a CLP
+            "amount_original": amount_original,  # Monto original
+            "user_id": sale_clean.get("user_id", {}),
+            "producto_principal": producto_principal,
+            "kg_total": kg_total,
+            "kg_producidos": kg_producidos,
+            "kg_disponibles": kg_disponibles,
+            "kg_por_producto": kg_por_producto,
+            "avance_pct": round(avance_pct, 2),
+            "num_fabricaciones": len(productions),
+            "lines": lines_data,
+            "productions": [{k: v for k, v in p.items() if k != "sale_name"} for p in productions]
+        }
+
     def get_containers(self, 
                        start_date: Optional[str] = None, 
                        end_date: Optional[str] = None,
                        partner_id: Optional[int] = None,
-                       state: Optional[str] = None) -> List[Dict]:
+                       state: Optional[str] = None,
+                       limit: Optional[int] = None,
+                       offset: int = 0) -> List[Dict]:
         """
         Obtiene lista de pedidos de venta con su avance de producción.
-        OPTIMIZADO: Busca desde fabricaciones que tienen x_studio_po_asociada
+        Se sirve desde el read model de avance (progress_store): las fabricaciones
+        con x_studio_po_asociada se filtran por date_planned_start y se agrupan
+        por pedido localmente; Odoo solo se consulta por deltas de write_date.
         """
-        # PASO 1: Buscar TODAS las fabricaciones que tienen una PO asociada
-        prod_domain = [("x_studio_po_asociada", "!=", False)]
-        if start_date:
-            prod_domain.append(("date_planned_start", ">=", start_date))
-        if end_date:
-            prod_domain.append(("date_planned_start", "<=", end_date))
-        
-        prod_fields = [
-            "name", "product_id", "product_qty", "qty_produced",
-            "state", "date_planned_start", "date_start", "date_finished",
-            "user_id", "x_studio_po_asociada", "x_studio_po_cliente_1",
-            "x_studio_kg_totales_po", "x_studio_kg_consumidos_po",
-            "x_studio_kg_disponibles_po", "x_studio_sala_de_proceso",
-            "x_studio_clientes"
-        ]
-        fallback_prod_fields = [
-            "name", "product_id", "product_qty", "qty_produced",
-            "state", "date_planned_start", "date_start", "date_finished",
-            "user_id", "x_studio_po_asociada", "x_studio_po_cliente_1",
-            "x_studio_kg_totales_po", "x_studio_kg_consumidos_po",
-            "x_studio_kg_disponibles_po", "x_studio_sala_de_proceso"
-        ]
-        
         try:
-            prod_ids = self.odoo.search(
-                "mrp.production",
-                prod_domain,
-                limit=1000,
-                order="date_planned_start desc"
-            )
-            
-            print(f"[CONTAINERS] Domain: {prod_domain}")
-            print(f"[CONTAINERS] Found {len(prod_ids)} productions with PO asociada")
-            
-            if not prod_ids:
-                print("[CONTAINERS] No productions found, returning empty list")
-                return []
-            
-            try:
-                prods_raw = self.odoo.read("mrp.production", prod_ids, prod_fields)
-            except Exception as e:
-                print(f"Error fetching productions with extra fields: {e}")
-                prods_raw = self.odoo.read("mrp.production", prod_ids, fallback_prod_fields)
+            progress_store.refrescar(self.odoo)
         except Exception as e:
             print(f"Error fetching productions: {e}")
             return []
         
-        # PASO 2: Agrupar fabricaciones por sale.order (PO asociada)
-        sales_map = {}  # sale_name -> {info, productions: []}
-        sale_names_to_fetch = set()
+        productions_by_sale = progress_store.producciones_por_venta(start_date, end_date)
+        print(f"[CONTAINERS] {sum(len(p) for p in productions_by_sale.values())} productions with PO asociada "
+              f"({start_date} - {end_date})")
         
-        for p in prods_raw:
-            po_asociada = p.get("x_studio_po_asociada")
-            if not po_asociada:
+        sales = []
+        for sale_name, productions in productions_by_sale.items():
+            sale = progress_store.get_venta_por_nombre(sale_name)
+            if not sale:
                 continue
-            
-            # x_studio_po_asociada contiene el NAME del sale.order (ej: "S00830"), no el ID
-            sale_name = po_asociada.strip() if isinstance(po_asociada, str) else str(po_asociada)
-            if not sale_name:
+            if partner_id:
+                partner = sale.get("partner_id")
+                if not (isinstance(partner, (list, tuple)) and partner and partner[0] == partner_id):
+                    continue
+            if state and sale.get("state") != state:
                 continue
-                
-            sale_names_to_fetch.add(sale_name)
-            
-            if sale_name not in sales_map:
-                sales_map[sale_name] = {
-                    "productions": [],
-                    "kg_producidos_total": 0
-                }
-            
-            qty_produced = p.get("qty_produced", 0) or 0
-            
-            # Obtener nombres
-            product = p.get("product_id")
-            product_name = product[1] if isinstance(product, (list, tuple)) else "N/A"
-            
-            user = p.get("user_id")
-            user_name = user[1] if isinstance(user, (list, tuple)) else "N/A"
-            
-            sala = p.get("x_studio_sala_de_proceso")
-            sala_name = sala[1] if isinstance(sala, (list, tuple)) else "N/A"
-
-            cliente = p.get("x_studio_clientes")
-            cliente_name = cliente[1] if isinstance(cliente, (list, tuple)) else "N/A"
-            
-            sales_map[sale_name]["productions"].append({
-                "id": p["id"],
-                "name": p.get("name", ""),
-                "product_name": product_name,
-                "product_qty": p.get("product_qty", 0) or 0,
-                "qty_produced": qty_produced,
-                "kg_producidos": qty_produced,
-                "state": p.get("state", ""),
-                "state_display": local_get_state_display(p.get("state", "")),
-                "date_planned_start": p.get("date_planned_start", ""),
-                "date_start": p.get("date_start", ""),
-                "date_finished": p.get("date_finished", ""),
-                "user_name": user_name,
-                "po_cliente": p.get("x_studio_po_cliente_1", ""),
-                "kg_totales_po": p.get("x_studio_kg_totales_po", 0),
-                "kg_consumidos_po": p.get("x_studio_kg_consumidos_po", 0),
-                "kg_disponibles_po": p.get("x_studio_kg_disponibles_po", 0),
-                "sala_proceso": sala_name,
-                "cliente": cliente_name
-            })
-            
-            sales_map[sale_name]["kg_producidos_total"] += qty_produced
+            sales.append((sale, productions))
         
-        if not sale_names_to_fetch:
-            return []
-        
-        # PASO 3: Obtener datos de las ventas (sale.order) en UNA sola llamada
-        sale_fields = [
-            "name", "partner_id", "date_order", "commitment_date",
-            "state", "amount_total", "currency_id", "origin",
-            "user_id", "order_line", "validity_date"
-        ]
-        fallback_sale_fields = [
-            "name", "partner_id", "date_order", "commitment_date",
-            "state", "amount_total", "currency_id", "origin",
-            "user_id", "order_line"
-        ]
-        
-        sale_domain = [("name", "in", list(sale_names_to_fetch))]
-        if partner_id:
-            sale_domain.append(("partner_id", "=", partner_id))
-        if state:
-            sale_domain.append(("state", "=", state))
-        
-        try:
-            filtered_sale_ids = self.odoo.search("sale.order", sale_domain)
-            
-            if not filtered_sale_ids:
-                return []
-            
-            try:
-                sales_raw = self.odoo.read("sale.order", filtered_sale_ids, sale_fields)
-            except Exception as e:
-                print(f"Error fetching sales with extra fields: {e}")
-                sales_raw = self.odoo.read("sale.order", filtered_sale_ids, fallback_sale_fields)
-        except Exception as e:
-            print(f"Error fetching sales: {e}")
-            return []
-        
-        # PASO 4: Obtener líneas de venta en UNA sola llamada
-        all_line_ids = []
-        for s in sales_raw:
-            all_line_ids.extend(s.get("order_line", []))
-        
-        lines_map = {}  # sale_id -> [lines]
-        if all_line_ids:
-            try:
-                lines_raw = self.odoo.read(
-                    "sale.order.line",
-                    all_line_ids,
-                    ["order_id", "product_id", "name", "product_uom_qty", 
-                     "product_uom", "price_unit", "price_subtotal", 
-                     "qty_delivered", "qty_invoiced"]
-                )
-                for l in lines_raw:
-                    order_id = l.get("order_id")
-                    if order_id:
-                        oid = order_id[0] if isinstance(order_id, (list, tuple)) else order_id
-                        if oid not in lines_map:
-                            lines_map[oid] = []
-                        lines_map[oid].append(clean_record(l))
-            except Exception as e:
-                print(f"Error fetching lines: {e}")
-        
-        # PASO 5: Construir resultado final
-        containers = []
-        
-        for sale in sales_raw:
-            sale_id = sale["id"]
-            sale_name = sale.get("name", "")
-            
-            # Obtener partner name ANTES de clean_record
-            partner = sale.get("partner_id")
-            partner_name = partner[1] if partner and isinstance(partner, (list, tuple)) and len(partner) > 1 else "N/A"
-            
-            sale_clean = clean_record(sale)
-            
-            # Líneas de este pedido
-            lines_data = lines_map.get(sale_id, [])
-            
-            # KG totales del pedido (suma de líneas)
-            kg_total = sum([l.get("product_uom_qty", 0) or 0 for l in lines_data])
-            
-            # KG por producto (agrupado)
-            kg_por_producto = {}
-            for line in lines_data:
-                prod = line.get("product_id", {})
-                prod_name = prod.get("name", "N/A") if isinstance(prod, dict) else "N/A"
-                kg = line.get("product_uom_qty", 0) or 0
-                if prod_name in kg_por_producto:
-                    kg_por_producto[prod_name] += kg
-                else:
-                    kg_por_producto[prod_name] = kg
-            
-            # Producciones y KG producidos - BUSCAR POR NAME no por ID
-            sale_info = sales_map.get(sale_name, {"productions": [], "kg_producidos_total": 0})
-            productions = sale_info["productions"]
-            kg_producidos = sale_info["kg_producidos_total"]
-            
-            kg_disponibles = kg_total - kg_producidos
-            avance_pct = (kg_producidos / kg_total * 100) if kg_total > 0 else 0
-            
-            # Producto principal
-            producto_principal = "N/A"
-            if lines_data:
-                prod = lines_data[0].get("product_id")
-                if isinstance(prod, dict):
-                    producto_principal = prod.get("name", "N/A")
-            
-            # partner_id es el cliente en sale.order
-            client_name = partner_name
-            
-            # Convertir monto a CLP si es necesario
-            currency_id = sale_clean.get("currency_id", {})
-            amount_original = sale_clean.get("amount_total", 0)
-            amount_clp = self._convert_to_clp(amount_original, currency_id)
-
-            containers.append({
-                "id": sale_id,
-                "name": sale_clean.get("name", ""),
-                "partner_id": sale_clean.get("partner_id", {}),
-                "partner_name": partner_name,
-                "client_name": client_name,
-                "date_order": sale_clean.get("date_order", ""),
-                "commitment_date": sale_clean.get("commitment_date", ""),
-                "validity_date": sale_clean.get("validity_date", ""),
-                "state": sale_clean.get("state", ""),
-                "origin": sale_clean.get("origin", ""),
-                "currency_id": currency_id,
-                "amount_total": amount_clp,  # Monto convertido a CLP
-                "amount_original": amount_original,  # Monto original
-                "user_id": sale_clean.get("user_id", {}),
-                "producto_principal": producto_principal,
-                "kg_total": kg_total,
-                "kg_producidos": kg_producidos,
-                "kg_disponibles": kg_disponibles,
-                "kg_por_producto": kg_por_producto,
-                "avance_pct": round(avance_pct, 2),
-                "num_fabricaciones": len(productions),
-                "lines": lines_data,
-                "productions": productions
-            })
-        
-        return containers
+        # Orden estable: pedidos con la fabricación planificada más reciente primero
+        sales.sort(key=lambda item: item[1][0].get("date_planned_start") or "", reverse=True)
+        end = offset + limit if limit else None
+        return [self._build_container(sale, productions) for sale, productions in sales[offset:end]]
 
     def get_proyecciones(self, 
                         start_date: Optional[str] = None, 
@@ -319,6 +172,8 @@ class ContainersService:
         Obtiene pedidos de venta para proyección futura.
         Busca directamente en sale.order por commitment_date, 
         sin requerir que tengan fabricaciones creadas.
+        Solo los IDs salen de Odoo; pedidos, líneas y fabricaciones se leen del
+        read model (los pedidos que faltan se incorporan una vez).
         """
         # PASO 1: Buscar sale.order por fecha de compromiso
         sale_domain = []
@@ -339,17 +194,6 @@ class ContainersService:
         if state:
             sale_domain.append(("state", "=", state))
         
-        sale_fields = [
-            "name", "partner_id", "date_order", "commitment_date",
-            "state", "amount_total", "currency_id", "origin",
-            "user_id", "order_line", "validity_date"
-        ]
-        fallback_sale_fields = [
-            "name", "partner_id", "date_order", "commitment_date",
-            "state", "amount_total", "currency_id", "origin",
-            "user_id", "order_line"
-        ]
-        
         try:
             sale_ids = self.odoo.search(
                 "sale.order",
@@ -364,351 +208,60 @@ class ContainersService:
             if not sale_ids:
                 return []
             
-            try:
-                sales_raw = self.odoo.read("sale.order", sale_ids, sale_fields)
-            except Exception as e:
-                print(f"Error fetching sales with extra fields: {e}")
-                sales_raw = self.odoo.read("sale.order", sale_ids, fallback_sale_fields)
+            progress_store.refrescar(self.odoo)
+            progress_store.asegurar_ventas(self.odoo, sale_ids)
         except Exception as e:
             print(f"Error fetching sales for proyecciones: {e}")
             return []
         
-        # PASO 2: Obtener líneas de venta
-        all_line_ids = []
-        for s in sales_raw:
-            all_line_ids.extend(s.get("order_line", []))
-        
-        lines_map = {}
-        if all_line_ids:
-            try:
-                lines_raw = self.odoo.read(
-                    "sale.order.line",
-                    all_line_ids,
-                    ["order_id", "product_id", "name", "product_uom_qty", 
-                     "product_uom", "price_unit", "price_subtotal", 
-                     "qty_delivered", "qty_invoiced"]
-                )
-                for l in lines_raw:
-                    order_id = l.get("order_id")
-                    if order_id:
-                        oid = order_id[0] if isinstance(order_id, (list, tuple)) else order_id
-                        if oid not in lines_map:
-                            lines_map[oid] = []
-                        lines_map[oid].append(clean_record(l))
-            except Exception as e:
-                print(f"Error fetching lines: {e}")
-        
-        # PASO 3: Buscar fabricaciones existentes para estos pedidos (si las hay)
-        sale_names = [s.get("name") for s in sales_raw if s.get("name")]
-        productions_map = {}  # sale_name -> [productions]
-        
-        if sale_names:
-            try:
-                prod_domain = [("x_studio_po_asociada", "in", sale_names)]
-                prod_fields = [
-                    "name", "product_id", "product_qty", "qty_produced",
-                    "state", "date_planned_start", "x_studio_po_asociada"
-                ]
-                
-                prod_ids = self.odoo.search("mrp.production", prod_domain)
-                if prod_ids:
-                    prods_raw = self.odoo.read("mrp.production", prod_ids, prod_fields)
-                    
-                    for p in prods_raw:
-                        po_asociada = p.get("x_studio_po_asociada", "").strip()
-                        if not po_asociada:
-                            continue
-                        
-                        if po_asociada not in productions_map:
-                            productions_map[po_asociada] = []
-                        
-                        product = p.get("product_id")
-                        product_name = product[1] if isinstance(product, (list, tuple)) else "N/A"
-                        
-                        productions_map[po_asociada].append({
-                            "id": p["id"],
-                            "name": p.get("name", ""),
-                            "product_name": product_name,
-                            "product_qty": p.get("product_qty", 0) or 0,
-                            "qty_produced": p.get("qty_produced", 0) or 0,
-                            "state": p.get("state", ""),
-                            "state_display": local_get_state_display(p.get("state", "")),
-                            "date_planned_start": p.get("date_planned_start", "")
-                        })
-            except Exception as e:
-                print(f"Error fetching productions for proyecciones: {e}")
+        # PASO 2: Fabricaciones existentes de estos pedidos (si las hay), sin filtro de fecha
+        productions_map = progress_store.producciones_por_venta()
         
-        # PASO 4: Construir resultado
+        # PASO 3: Construir resultado
         proyecciones = []
-        
-        for sale in sales_raw:
-            sale_id = sale["id"]
-            sale_name = sale.get("name", "")
-            
-            # Partner name
-            partner = sale.get("partner_id")
-            partner_name = partner[1] if partner and isinstance(partner, (list, tuple)) and len(partner) > 1 else "N/A"
-            
-            sale_clean = clean_record(sale)
-            
-            # Líneas
-            lines_data = lines_map.get(sale_id, [])
-            
-            # KG totales
-            kg_total = sum([l.get("product_uom_qty", 0) or 0 for l in lines_data])
-            
-            # KG por producto
-            kg_por_producto = {}
-            for line in lines_data:
-                prod = line.get("product_id", {})
-                prod_name = prod.get("name", "N/A") if isinstance(prod, dict) else "N/A"
-                kg = line.get("product_uom_qty", 0) or 0
-                if prod_name in kg_por_producto:
-                    kg_por_producto[prod_name] += kg
-                else:
-                    kg_por_producto[prod_name] = kg
-            
-            # Producciones (si existen)
-            productions = productions_map.get(sale_name, [])
-            kg_producidos = sum([p.get("qty_produced", 0) for p in productions])
-            
-            kg_disponibles = kg_total - kg_producidos
-            avance_pct = (kg_producidos / kg_total * 100) if kg_total > 0 else 0
-            
-            # Producto principal
-            producto_principal = "N/A"
-            if lines_data:
-                prod = lines_data[0].get("product_id")
-                if isinstance(prod, dict):
-                    producto_principal = prod.get("name", "N/A")
-            
-            # Convertir monto a CLP
-            currency_id = sale_clean.get("currency_id", {})
-            amount_original = sale_clean.get("amount_total", 0)
-            amount_clp = self._convert_to_clp(amount_original, currency_id)
-            
-            proyecciones.append({
-                "id": sale_id,
-                "name": sale_clean.get("name", ""),
-                "partner_id": sale_clean.get("partner_id", {}),
-                "partner_name": partner_name,
-                "date_order": sale_clean.get("date_order", ""),
-                "commitment_date": sale_clean.get("commitment_date", ""),
-                "validity_date": sale_clean.get("validity_date", ""),
-                "state": sale_clean.get("state", ""),
-                "origin": sale_clean.get("origin", ""),
-                "currency_id": currency_id,
-                "amount_total": amount_clp,
-                "amount_original": amount_original,
-                "user_id": sale_clean.get("user_id", {}),
-                "producto_principal": producto_principal,
-                "kg_total": kg_total,
-                "kg_producidos": kg_producidos,
-                "kg_disponibles": kg_disponibles,
-                "kg_por_producto": kg_por_producto,
-                "avance_pct": round(avance_pct, 2),
-                "num_fabricaciones": len(productions),
-                "lineas": lines_data,  # Cambié de "lines" a "lineas" para consistencia
-                "productions": productions
-            })
+        for sale_id in sale_ids:
+            sale = progress_store.get_venta(sale_id)
+            if not sale:
+                continue
+            row = self._build_container(sale, productions_map.get(sale.get("name", ""), []))
+            row["lineas"] = row.pop("lines")  # Cambié de "lines" a "lineas" para consistencia
+            proyecciones.append(row)
         
         return proyecciones
 
     def get_container_detail(self, sale_id: int) -> Dict:
         """
-        Obtiene el detalle completo de un container/venta específico.
-        OPTIMIZADO: Usa consultas paralelas para producciones y venta.
+        Obtiene el detalle completo de un container/venta específico desde el read model.
         """
-        # Primero buscar el sale.order por ID para obtener su nombre
         try:
-            sale_data = self.odoo.read("sale.order", [sale_id], ["name"])
-            if not sale_data:
-                return {}
-            sale_name = sale_data[0].get("name", "")
+            progress_store.refrescar(self.odoo)
+            progress_store.asegurar_ventas(self.odoo, [sale_id])
         except Exception as e:
-            print(f"Error getting sale.order name: {e}")
+            print(f"Error getting sale.order: {e}")
             return {}
         
-        prod_domain = [("x_studio_po_asociada", "=", sale_name)]
-        
-        prod_fields = [
-            "name", "product_id", "product_qty", "qty_produced",
-            "state", "date_planned_start", "date_start", "date_finished",
-            "user_id", "x_studio_po_cliente_1", "x_studio_kg_totales_po",
-            "x_studio_kg_consumidos_po", "x_studio_kg_disponibles_po",
-            "x_studio_sala_de_proceso"
-        ]
-        
-        sale_fields = [
-            "name", "partner_id", "date_order", "commitment_date",
-            "state", "amount_total", "currency_id", "origin", "order_line"
-        ]
-        
-        # OPTIMIZADO: Ejecutar búsqueda de producciones y lectura de venta en paralelo
-        try:
-            results = self.odoo.parallel_search_read([
-                {
-                    "model": "mrp.production",
-                    "domain": prod_domain,
-                    "fields": prod_fields
-                },
-                {
-                    "model": "sale.order",
-                    "domain": [("id", "=", sale_id)],
-                    "fields": sale_fields
-                }
-            ])
-            prods_raw = results[0]
-            sales_raw = results[1]
-        except Exception as e:
-            print(f"Error parallel query: {e}")
-            # Fallback a consultas secuenciales
-            try:
-                prod_ids = self.odoo.search("mrp.production", prod_domain)
-                prods_raw = self.odoo.read("mrp.production", prod_ids, prod_fields) if prod_ids else []
-                sales_raw = self.odoo.read("sale.order", [sale_id], sale_fields)
-            except Exception as e2:
-                print(f"Error fallback: {e2}")
-                return {}
-        
-        if not sales_raw:
+        sale = progress_store.get_venta(sale_id)
+        if not sale:
             return {}
-        sale = sales_raw[0]
-        
-        productions = []
-        kg_producidos = 0
-        
-        for p in prods_raw:
-            qty = p.get("qty_produced", 0) or 0
-            kg_producidos += qty
-            
-            product = p.get("product_id")
-            product_name = product[1] if isinstance(product, (list, tuple)) else "N/A"
-            
-            user = p.get("user_id")
-            user_name = user[1] if isinstance(user, (list, tuple)) else "N/A"
-            
-            sala = p.get("x_studio_sala_de_proceso")
-            sala_name = sala[1] if isinstance(sala, (list, tuple)) else "N/A"
-            
-            productions.append({
-                "id": p["id"],
-                "name": p.get("name", ""),
-                "product_name": product_name,
-                "product_qty": p.get("product_qty", 0) or 0,
-                "qty_produced": qty,
-                "kg_producidos": qty,
-                "state": p.get("state", ""),
-                "state_display": get_state_display(p.get("state", "")),
-                "date_planned_start": p.get("date_planned_start", ""),
-                "date_start": p.get("date_start", ""),
-                "date_finished": p.get("date_finished", ""),
-                "user_name": user_name,
-                "sala_proceso": sala_name
-            })
-        
-        sale_clean = clean_record(sale)
-        
-        partner = sale.get("partner_id")
-        partner_name = partner[1] if isinstance(partner, (list, tuple)) else "N/A"
-        
-        # Líneas
-        line_ids = sale.get("order_line", [])
-        lines_data = []
-        kg_total = 0
-        
-        if line_ids:
-            try:
-                lines_raw = self.odoo.read(
-                    "sale.order.line",
-                    line_ids,
-                    ["product_id", "name", "product_uom_qty", "product_uom",
-                     "price_unit", "price_subtotal", "qty_delivered"]
-                )
-                lines_data = [clean_record(l) for l in lines_raw]
-                kg_total = sum([l.get("product_uom_qty", 0) or 0 for l in lines_data])
-            except Exception as e:
-                print(f"Error lines: {e}")
-        
-        avance_pct = (kg_producidos / kg_total * 100) if kg_total > 0 else 0
-        
-        producto_principal = "N/A"
-        if lines_data:
-            prod = lines_data[0].get("product_id")
-            if isinstance(prod, dict):
-                producto_principal = prod.get("name", "N/A")
-        
-        # Convertir monto a CLP si es necesario
-        currency_id = sale_clean.get("currency_id", {})
-        amount_original = sale_clean.get("amount_total", 0)
-        amount_clp = self._convert_to_clp(amount_original, currency_id)
-        
-        return {
-            "id": sale_id,
-            "name": sale_clean.get("name", ""),
-            "partner_name": partner_name,
-            "date_order": sale_clean.get("date_order", ""),
-            "commitment_date": sale_clean.get("commitment_date", ""),
-            "state": sale_clean.get("state", ""),
-            "origin": sale_clean.get("origin", ""),
-            "currency_id": currency_id,
-            "amount_total": amount_clp,  # Monto convertido a CLP
-            "amount_original": amount_original,  # Monto original
-            "producto_principal": producto_principal,
-            "kg_total": kg_total,
-            "kg_producidos": kg_producidos,
-            "kg_disponibles": kg_total - kg_producidos,
-            "avance_pct": round(avance_pct, 2),
-            "num_fabricaciones": len(productions),
-            "lines": lines_data,
-            "productions": productions
-        }
+        productions = progress_store.producciones_por_venta().get(sale.get("name", ""), [])
+        return self._build_container(sale, productions)
 
     def get_partners_with_orders(self) -> List[Dict]:
         """Obtiene lista de clientes que tienen pedidos con fabricaciones"""
         try:
-            prod_domain = [("x_studio_po_asociada", "!=", False)]
-            prod_ids = self.odoo.search("mrp.production", prod_domain, limit=500)
-            
-            if not prod_ids:
-                return []
-            
-            prods = self.odoo.read("mrp.production", prod_ids, ["x_studio_po_asociada"])
-            
-            # x_studio_po_asociada contiene nombres (strings), no IDs
-            sale_names = list(set([
-                p["x_studio_po_asociada"].strip()
-                for p in prods 
-                if p.get("x_studio_po_asociada") and isinstance(p.get("x_studio_po_asociada"), str) and p.get("x_studio_po_asociada").strip()
-            ]))
-            
-            if not sale_names:
-                return []
-            
-            # Buscar sale.order por nombre
-            sale_ids = self.odoo.search("sale.order", [("name", "in", sale_names)])
-            
-            if not sale_ids:
-                return []
-            
-            sales = self.odoo.read("sale.order", sale_ids, ["partner_id"])
-            
-            partner_ids = list(set([
-                s["partner_id"][0] 
-                for s in sales 
-                if s.get("partner_id")
-            ]))
-            
-            if not partner_ids:
-                return []
-            
-            partners = self.odoo.read("res.partner", partner_ids, ["id", "name"])
-            
-            return sorted([{"id": p["id"], "name": p["name"]} for p in partners], key=lambda x: x["name"])
-            
+            progress_store.refrescar(self.odoo)
         except Exception as e:
             print(f"Error fetching partners: {e}")
             return []
+        
+        partners = {}
+        for sale_name in progress_store.producciones_por_venta():
+            sale = progress_store.get_venta_por_nombre(sale_name)
+            partner = (sale or {}).get("partner_id")
+            if isinstance(partner, (list, tuple)) and len(partner) > 1:
+                partners[partner[0]] = partner[1]
+        
+        return sorted([{"id": pid, "name": name} for pid, name in partners.items()], key=lambda x: x["name"])
 
     def get_containers_summary(self) -> Dict:
         """Obtiene resumen global de pedidos de venta para KPIs"""
@@ -733,20 +286,59 @@ class ContainersService:
         }
     
     def get_sankey_data(self, start_date: Optional[str] = None,
-                       end_date: Optional[str] = None) -> Dict:
+                       end_date: Optional[str] = None,
+                       grain: str = sankey.DEFAULT_GRAIN,
+                       max_nodes: int = sankey.DEFAULT_MAX_NODES,
+                       expand: Optional[List[str]] = None) -> Dict:
         """
-        Genera datos para diagrama Sankey de trazabilidad completa.
+        Genera datos para diagrama Sankey de trazabilidad con nivel de detalle.
         
-        Flujo visual:
-        PALLET_A → PROCESO_1 → PALLET_B → PROCESO_2 → PALLET_C → CLIENTE
+        Flujo completo (grano pallet):
+        PROVEEDOR → PALLET_A → PROCESO_1 → PALLET_B → PROCESO_2 → PALLET_C → CLIENTE
         
-        Lógica simplificada:
-        - Cada pallet es un nodo único
-        - Cada proceso (reference) es un nodo único
-        - Conexiones se derivan directamente de los movimientos
+        Los flujos se agregan en el servidor al grano pedido (pallet, lot, process,
+        sala, producer, customer), los nodos chicos se agrupan en "Otros" y cada
+        nodo agregado trae un token `detail.drill` para abrirlo vía `expand`.
+        Ver backend/services/containers/sankey.py.
         """
+        base = self._get_sankey_base(start_date, end_date)
+        if not base["edges"]:
+            return {"nodes": [], "links": []}
+        data = sankey.build_sankey(base, grain=grain, max_nodes=max_nodes, expand=expand)
+        print(f"Generados {len(data['nodes'])} nodos y {len(data['links'])} links "
+              f"(grano {grain}, {data['meta']['nodos_sin_colapsar']} sin colapsar)")
+        return data
+
+    def _fetch_sankey_move_lines(self, domain: List, fields: List[str]) -> List[Dict]:
+        """Lee todas las stock.move.line del dominio paginando por id (sin truncar)."""
+        move_lines = []
+        last_id = 0
+        while True:
+            page = self.odoo.search_read(
+                "stock.move.line",
+                domain + [("id", ">", last_id)],
+                fields,
+                limit=self.SANKEY_PAGE_SIZE,
+                order="id asc"
+            )
+            move_lines.extend(page)
+            if len(page) < self.SANKEY_PAGE_SIZE:
+                return move_lines
+            last_id = page[-1]["id"]
+
+    def _get_sankey_base(self, start_date: Optional[str], end_date: Optional[str]) -> Dict:
+        """
+        Grafo base de flujos al nivel más fino, cacheado por rango de fechas para
+        que cambiar de grano o abrir nodos no vuelva a consultar Odoo.
+
+        Nodos: ("SUPP", partner), ("PKG", package, lot), ("PROC", reference), ("CUST", partner).
+        """
+        cache_key = self._cache._make_key("containers_sankey_base", start_date, end_date)
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         print(f"Generando Sankey data...")
-        
         PARTNER_VENDORS_LOCATION_ID = 4
         VIRTUAL_LOCATION_IDS = self._get_virtual_location_ids()
         
@@ -769,35 +361,33 @@ class ContainersService:
             "location_dest_id", "date", "picking_id"
         ]
         
+        base = {
+            "edges": {},
+            "proveedores": {},
+            "clientes": {},
+            "pallets": {},  # pkg_id -> {name, products}
+            "lotes": {},  # lot_id -> name
+            "procesos": {},  # ref -> {date, sala}
+            "move_lines": 0,
+        }
         try:
-            move_lines = self.odoo.search_read(
-                "stock.move.line",
-                domain,
-                fields,
-                limit=10000,
-                order="date asc"
-            )
+            move_lines = self._fetch_sankey_move_lines(domain, fields)
         except Exception as e:
             print(f"Error fetching move lines: {e}")
-            return {"nodes": [], "links": []}
-        
-        if not move_lines:
-            return {"nodes": [], "links": []}
+            return base
         
+        base["move_lines"] = len(move_lines)
         print(f"Encontrados {len(move_lines)} movimientos")
         
-        # Estructuras de datos
-        pallets = {}  # pkg_id -> {name, qty, products}
-        processes = {}  # ref -> {date, is_reception, supplier_id, supplier_name}
-        suppliers = {}  # supplier_id -> name
-        customers = {}  # customer_id -> name
+        edges = base["edges"]
+        pallets = base["pallets"]
         
-        # Links: (source_type, source_id, target_type, target_id) -> qty
-        link_data = {}
+        def register_pallet(pid, pname, pqty, product):
+            pallet = pallets.setdefault(pid, {"name": pname or str(pid), "products": {}})
+            pallet["products"][product] = pallet["products"].get(product, 0) + pqty
         
-        reception_picking_ids = set()
-        sale_picking_ids = set()
-        sale_pallet_pickings = {}  # pkg_id -> picking_id
+        def add_link(source, target, q):
+            edges[(source, target)] = edges.get((source, target), 0) + q
         
         for ml in move_lines:
             loc_rel = ml.get("location_id")
@@ -809,7 +399,6 @@ class ContainersService:
             result_rel = ml.get("result_package_id")
             ref = ml.get("reference") or "Sin Referencia"
             qty = ml.get("qty_done", 0) or 0
-            date = ml.get("date", "")
             
             prod_rel = ml.get("product_id")
             prod_name = prod_rel[1] if isinstance(prod_rel, (list, tuple)) and len(prod_rel) > 1 else "N/A"
@@ -820,239 +409,86 @@ class ContainersService:
             result_id = result_rel[0] if isinstance(result_rel, (list, tuple)) else result_rel
             result_name = result_rel[1] if isinstance(result_rel, (list, tuple)) and len(result_rel) > 1 else None
             
+            lot_rel = ml.get("lot_id")
+            lot_id = lot_rel[0] if isinstance(lot_rel, (list, tuple)) and lot_rel else None
+            if lot_id:
+                base["lotes"][lot_id] = get_name_from_relation(lot_rel)
+            
             picking_rel = ml.get("picking_id")
             picking_id = picking_rel[0] if isinstance(picking_rel, (list, tuple)) else picking_rel
             
-            # Helper para registrar pallet
-            def register_pallet(pid, pname, pqty, product):
-                if pid not in pallets:
-                    pallets[pid] = {"name": pname or str(pid), "qty": 0, "products": {}}
-                pallets[pid]["qty"] += pqty
-                if product not in pallets[pid]["products"]:
-                    pallets[pid]["products"][product] = 0
-                pallets[pid]["products"][product] += pqty
-            
-            # Helper para agregar link
-            def add_link(st, sid, tt, tid, q):
-                key = (st, sid, tt, tid)
-                if key not in link_data:
-                    link_data[key] = 0
-                link_data[key] += q
-            
-            # Registrar proceso
-            if ref not in processes:
-                processes[ref] = {"date": date, "is_reception": False, "picking_id": picking_id}
-            
             # CASO 1: RECEPCIÓN (viene de proveedor)
             if loc_id == PARTNER_VENDORS_LOCATION_ID:
                 target_pkg = result_id or pkg_id
-                target_name = result_name or pkg_name
-                if target_pkg:
-                    register_pallet(target_pkg, target_name, qty, prod_name)
-                    processes[ref]["is_reception"] = True
-                    processes[ref]["picking_id"] = picking_id
-                    reception_picking_ids.add(picking_id)
-                    # Link: SUPPLIER → PALLET (se resolverá después)
-                    add_link("RECV", ref, "PALLET", target_pkg, qty)
+                if target_pkg and picking_id:
+                    register_pallet(target_pkg, result_name or pkg_name, qty, prod_name)
+                    # Link: RECEPCIÓN → PALLET (se resuelve a proveedor después)
+                    add_link(("RECV", picking_id), ("PKG", target_pkg, lot_id), qty)
             
             # CASO 2: ENTRADA A PROCESO (pallet → ubicación virtual)
             elif pkg_id and loc_dest_id in VIRTUAL_LOCATION_IDS:
                 register_pallet(pkg_id, pkg_name, qty, prod_name)
-                # Link: PALLET → PROCESO
-                add_link("PALLET", pkg_id, "PROCESS", ref, qty)
+                base["procesos"].setdefault(ref, {"date": ml.get("date", ""), "sala": None})
+                add_link(("PKG", pkg_id, lot_id), ("PROC", ref), qty)
             
             # CASO 3: SALIDA DE PROCESO (result_package sale de ubicación virtual)
             if result_id and loc_id in VIRTUAL_LOCATION_IDS:
                 register_pallet(result_id, result_name, qty, prod_name)
-                # Link: PROCESO → PALLET
-                add_link("PROCESS", ref, "PALLET", result_id, qty)
+                base["procesos"].setdefault(ref, {"date": ml.get("date", ""), "sala": None})
+                add_link(("PROC", ref), ("PKG", result_id, lot_id), qty)
             
             # CASO 4: VENTA (va hacia cliente)
             if loc_dest_id == PARTNER_VENDORS_LOCATION_ID and loc_id != PARTNER_VENDORS_LOCATION_ID:
                 target_pkg = result_id or pkg_id
                 if target_pkg and picking_id:
-                    sale_pallet_pickings[target_pkg] = picking_id
-                    sale_picking_ids.add(picking_id)
+                    add_link(("PKG", target_pkg, lot_id), ("SALE", picking_id), qty)
         
-        # Paso 2: Resolver proveedores y clientes
-        all_picking_ids = reception_picking_ids | sale_picking_ids
-        if all_picking_ids:
-            try:
-                pickings = self.odoo.read(
-                    "stock.picking",
-                    list(all_picking_ids),
-                    ["id", "partner_id"]
-                )
-                pickings_by_id = {p["id"]: p for p in pickings}
-                
-                # Proveedores
-                for ref, info in processes.items():
-                    if info.get("is_reception") and info.get("picking_id"):
-                        picking = pickings_by_id.get(info["picking_id"], {})
-                        partner_rel = picking.get("partner_id")
-                        if partner_rel:
-                            sid = partner_rel[0] if isinstance(partner_rel, (list, tuple)) else partner_rel
-                            sname = partner_rel[1] if isinstance(partner_rel, (list, tuple)) and len(partner_rel) > 1 else "Proveedor"
-                            suppliers[sid] = sname
-                            info["supplier_id"] = sid
-                
-                # Clientes
-                for pkg_id, picking_id in sale_pallet_pickings.items():
-                    picking = pickings_by_id.get(picking_id, {})
+        # Paso 2: Resolver proveedores y clientes desde los pickings
+        picking_ids = sorted({n[1] for edge in edges for n in edge if n[0] in ("RECV", "SALE")})
+        picking_partner = {}
+        try:
+            for i in range(0, len(picking_ids), 1000):
+                for picking in self.odoo.read("stock.picking", picking_ids[i:i + 1000], ["id", "partner_id"]):
                     partner_rel = picking.get("partner_id")
-                    if partner_rel:
-                        cid = partner_rel[0] if isinstance(partner_rel, (list, tuple)) else partner_rel
-                        cname = partner_rel[1] if isinstance(partner_rel, (list, tuple)) and len(partner_rel) > 1 else "Cliente"
-                        customers[cid] = cname
-                        # Link: PALLET → CUSTOMER
-                        add_link("PALLET", pkg_id, "CUSTOMER", cid, pallets.get(pkg_id, {}).get("qty", 1))
-            except Exception as e:
-                print(f"Error fetching pickings: {e}")
-        
-        # Paso 3: Construir nodos
-        nodes = []
-        node_index = {}
-        
-        def add_node(nid, label, color, detail):
-            if nid not in node_index:
-                node_index[nid] = len(nodes)
-                nodes.append({"label": label, "color": color, "detail": detail, "x": None, "y": None})
-            return node_index[nid]
-        
-        # Nodos de proveedores
-        for sid, sname in suppliers.items():
-            add_node(f"SUPP:{sid}", f"🏭 {sname}", "#9b59b6", {"type": "supplier", "id": sid})
-        
-        # Nodos de pallets
-        for pid, pinfo in pallets.items():
-            prods = ", ".join([f"{p}: {q:.0f}kg" for p, q in pinfo["products"].items()])
-            add_node(f"PKG:{pid}", f"📦 {pinfo['name']}", "#f39c12", {"type": "pallet", "id": pid, "qty": pinfo["qty"], "products": prods})
-        
-        # Nodos de procesos (solo los que no son recepciones puras)
-        for ref, pinfo in processes.items():
-            if not pinfo.get("is_reception"):
-                add_node(f"PROC:{ref}", f"🔴 {ref}", "#e74c3c", {"type": "process", "ref": ref, "date": pinfo["date"]})
-        
-        # Nodos de clientes
-        for cid, cname in customers.items():
-            add_node(f"CUST:{cid}", f"🔵 {cname}", "#3498db", {"type": "customer", "id": cid})
-        
-        # Paso 4: Construir links
-        links = []
-        
-        for (st, sid, tt, tid), qty in link_data.items():
-            source_nid = None
-            target_nid = None
-            color = "rgba(200, 200, 200, 0.5)"
-            
-            if st == "RECV":
-                # Recepción: buscar proveedor
-                pinfo = processes.get(sid, {})
-                supplier_id = pinfo.get("supplier_id")
-                if supplier_id:
-                    source_nid = f"SUPP:{supplier_id}"
-                    color = "rgba(155, 89, 182, 0.5)"
-            elif st == "PALLET":
-                source_nid = f"PKG:{sid}"
-                color = "rgba(243, 156, 18, 0.5)"
-            elif st == "PROCESS":
-                source_nid = f"PROC:{sid}"
-                color = "rgba(46, 204, 113, 0.5)"
-            
-            if tt == "PALLET":
-                target_nid = f"PKG:{tid}"
-            elif tt == "PROCESS":
-                target_nid = f"PROC:{tid}"
-            elif tt == "CUSTOMER":
-                target_nid = f"CUST:{tid}"
-                color = "rgba(52, 152, 219, 0.5)"
-            
-            if source_nid and target_nid and source_nid in node_index and target_nid in node_index:
-                links.append({
-                    "source": node_index[source_nid],
-                    "target": node_index[target_nid],
-                    "value": qty or 1,
-                    "color": color
-                })
-        
-        # Paso 5: Layout simple por capas
-        # Capa 0: Proveedores
-        # Capa 1: Pallets de recepción  
-        # Capa 2-N: Procesos y sus pallets de salida
-        # Capa final: Clientes
-        
-        supp_nodes = [nid for nid in node_index if nid.startswith("SUPP:")]
-        cust_nodes = [nid for nid in node_index if nid.startswith("CUST:")]
-        proc_nodes = [nid for nid in node_index if nid.startswith("PROC:")]
-        pkg_nodes = [nid for nid in node_index if nid.startswith("PKG:")]
-        
-        def set_pos(nid, x, y):
-            if nid in node_index:
-                nodes[node_index[nid]]["x"] = x
-                nodes[node_index[nid]]["y"] = y
-        
-        # Proveedores: x=0.05
-        for i, nid in enumerate(supp_nodes):
-            y = (i + 1) / (len(supp_nodes) + 1)
-            set_pos(nid, 0.05, y)
-        
-        # Clientes: x=0.95
-        for i, nid in enumerate(cust_nodes):
-            y = (i + 1) / (len(cust_nodes) + 1)
-            set_pos(nid, 0.95, y)
+                    if isinstance(partner_rel, (list, tuple)) and partner_rel:
+                        picking_partner[picking["id"]] = (partner_rel[0], get_name_from_relation(partner_rel))
+        except Exception as e:
+            print(f"Error fetching pickings: {e}")
         
-        # Procesos ordenados por fecha: x entre 0.3 y 0.7
-        proc_sorted = sorted(proc_nodes, key=lambda n: processes.get(n.replace("PROC:", ""), {}).get("date", ""))
-        for i, nid in enumerate(proc_sorted):
-            x = 0.3 + (0.4 * i / max(len(proc_sorted) - 1, 1)) if len(proc_sorted) > 1 else 0.5
-            y = (i + 1) / (len(proc_sorted) + 1)
-            set_pos(nid, x, y)
+        resueltos = {}
+        for (source, target), q in edges.items():
+            if source[0] == "RECV":
+                partner = picking_partner.get(source[1])
+                if not partner:
+                    continue
+                base["proveedores"][partner[0]] = partner[1]
+                source = ("SUPP", partner[0])
+            if target[0] == "SALE":
+                partner = picking_partner.get(target[1])
+                if not partner:
+                    continue
+                base["clientes"][partner[0]] = partner[1]
+                target = ("CUST", partner[0])
+            resueltos[(source, target)] = resueltos.get((source, target), 0) + q
+        base["edges"] = resueltos
         
-        # Pallets: posicionar según conexiones
-        for nid in pkg_nodes:
-            pid = int(nid.replace("PKG:", ""))
-            idx = node_index[nid]
-            
-            # Encontrar nodos conectados
-            connected_x = []
-            connected_y = []
-            is_input = False  # entra a un proceso
-            is_output = False  # sale de un proceso
-            
-            for link in links:
-                if link["source"] == idx:
-                    target_nid = [k for k, v in node_index.items() if v == link["target"]][0]
-                    if target_nid.startswith("PROC:"):
-                        is_input = True
-                    if nodes[link["target"]]["x"]:
-                        connected_x.append(nodes[link["target"]]["x"])
-                        connected_y.append(nodes[link["target"]]["y"])
-                if link["target"] == idx:
-                    source_nid = [k for k, v in node_index.items() if v == link["source"]][0]
-                    if source_nid.startswith("PROC:"):
-                        is_output = True
-                    if nodes[link["source"]]["x"]:
-                        connected_x.append(nodes[link["source"]]["x"])
-                        connected_y.append(nodes[link["source"]]["y"])
-            
-            if connected_x:
-                avg_x = sum(connected_x) / len(connected_x)
-                avg_y = sum(connected_y) / len(connected_y)
-                
-                # Ajustar x: antes del proceso si es input, después si es output
-                if is_input and not is_output:
-                    x = avg_x - 0.1
-                elif is_output and not is_input:
-                    x = avg_x + 0.1
-                else:
-                    x = avg_x
-                
-                set_pos(nid, max(0.1, min(0.9, x)), avg_y)
-            else:
-                set_pos(nid, 0.15, 0.5)
+        # Paso 3: Sala de proceso de cada fabricación (para granos sala/producer/customer)
+        refs = sorted(base["procesos"])
+        try:
+            for i in range(0, len(refs), 1000):
+                for prod in self.odoo.search_read(
+                    "mrp.production",
+                    [("name", "in", refs[i:i + 1000])],
+                    ["name", "x_studio_sala_de_proceso"]
+                ):
+                    sala = prod.get("x_studio_sala_de_proceso")
+                    if isinstance(sala, (list, tuple)) and len(sala) > 1 and prod.get("name") in base["procesos"]:
+                        base["procesos"][prod["name"]]["sala"] = sala[1]
+        except Exception as e:
+            print(f"Error fetching salas de proceso: {e}")
         
-        print(f"Generados {len(nodes)} nodos y {len(links)} links")
-        return {"nodes": nodes, "links": links}
+        self._cache.set(cache_key, base, ttl=self.SANKEY_BASE_TTL)
+        return base
     
     def _get_virtual_location_ids(self) -> set:
         """Obtiene IDs de ubicaciones virtuales/producción."""
@@ -1158,7 +594,7 @@ class ContainersService:
                              limit: int = 100,
                              partner_id: Optional[int] = None) -> List[Dict]:
         """Lista productores disponibles (desde pallets IN) para un rango/cliente."""
-        containers = self.get_containers(start_date, end_date, partner_id=partner_id)[:limit]
+        containers = self.get_containers(start_date, end_date, partner_id=partner_id, limit=limit)
 
         production_ids: List[int] = []
         for container in containers:
@@ -1461,16 +897,14 @@ class ContainersService:
 
         # Buscar move lines por lote
         try:
-            move_lines = self.odoo.search_read(
-                "stock.move.line",
-                [["lot_id", "in", list(set(lot_ids))]],
-                ["lot_id", "picking_id", "location_id", "date"],
-                limit=5000,
-                order="date asc"
+            move_lines = self._fetch_sankey_move_lines(
+                [("lot_id", "in", list(set(lot_ids)))],
+                ["id", "lot_id", "picking_id", "location_id", "date"]
             )
         except Exception as e:
             print(f"Error fetching move lines for lots: {e}")
             return {}
+        move_lines.sort(key=lambda ml: ml.get("date") or "")
 
         # Elegir, por lote, el primer movimiento que venga desde vendor/proveedor
         lot_to_picking: Dict[int, int] = {}
@@ -1,263 +1,455 @@
 """
-Servicio de Tipos de Cambio - Conversión USD/UF a CLP
-Utiliza tipo de cambio oficial BCCh (Dólar observado y UF) vía mindicador.cl con caché.
+Servicio de Tipos de Cambio - Conversión USD/UF/EUR a CLP
+Utiliza tipo de cambio oficial BCCh (Dólar observado, UF y Euro) vía mindicador.cl.
+
+Las series diarias se guardan en una tabla local (SQLite) y se mantienen en
+memoria como arreglos ordenados por fecha, así que:
+
+- get_rate(moneda, fecha) es una búsqueda binaria (último valor publicado a esa fecha)
+- convert_to_clp convierte arreglos completos de montos por fecha de documento
+- ninguna conversión hace llamadas HTTP: un hilo de fondo (start_prefetch) trae
+  los años faltantes y refresca el año en curso
 """
+import sqlite3
+import threading
 import time
+from bisect import bisect_right
+from datetime import date, datetime, timezone, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
 import requests
-from typing import Optional
-from datetime import datetime, timezone, timedelta
+
+
+FechaLike = Union[str, date, datetime, None]
+
+
+def _a_fecha(valor: FechaLike) -> Optional[date]:
+    """Normaliza 'YYYY-MM-DD[ HH:MM:SS]', date o datetime a date."""
+    if valor is None or valor is False or valor == "":
+        return None
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    try:
+        return date.fromisoformat(str(valor)[:10])
+    except ValueError:
+        return None
+
+
+def _hoy_chile() -> date:
+    # Fecha actual en Chile (UTC-3/UTC-4 aproximado para comparación de día)
+    return datetime.now(timezone(timedelta(hours=-3))).date()
+
+
+class MindicadorSource:
+    """Fuente de series diarias por año desde mindicador.cl (serie pública BCCh)."""
+
+    BASE_URL = "https://mindicador.cl/api"
+    TIMEOUT = 15
+
+    def __call__(self, indicador: str, anio: int) -> List[Tuple[date, float]]:
+        response = requests.get(f"{self.BASE_URL}/{indicador}/{anio}", timeout=self.TIMEOUT)
+        response.raise_for_status()
+        data = response.json()
+        serie = data.get("serie", []) if isinstance(data, dict) else []
+        return parse_serie(serie)
+
+
+def parse_serie(serie: Iterable[Dict]) -> List[Tuple[date, float]]:
+    """Convierte la serie de mindicador ([{fecha, valor}]) a [(date, valor)]."""
+    puntos = []
+    for item in serie:
+        fecha_str = item.get("fecha", "")
+        valor = item.get("valor")
+        if not fecha_str or valor is None:
+            continue
+        try:
+            fecha_item = datetime.fromisoformat(fecha_str.replace("Z", "+00:00")).date()
+        except Exception:
+            continue
+        if float(valor) > 0:
+            puntos.append((fecha_item, float(valor)))
+    return puntos
 
 
 class CurrencyService:
     """
-    Servicio para obtener tipos de cambio USD/UF → CLP.
-    
+    Servicio para obtener tipos de cambio USD/UF/EUR → CLP.
+
     Características:
-    - Usa Dólar observado y UF oficial BCCh (serie pública de mindicador.cl)
-    - Prioriza tasa del día actual (hora Chile)
-    - Si hoy no está publicado (feriado/no hábil), usa último dato disponible
-    - Caché en memoria por 1 hora para evitar llamadas excesivas
-    - Fallback a valor por defecto si la API falla
+    - Usa Dólar observado, UF y Euro oficiales BCCh (serie pública de mindicador.cl)
+    - Tabla diaria persistida en backend/data/currency_rates.db
+    - Si la fecha pedida no está publicada (feriado/no hábil), usa el último dato anterior
+    - Las conversiones nunca esperan a la API: sin datos locales se usa el valor
+      de fallback y se pide la descarga en segundo plano
     """
-    
-    # Caché de clase (compartido entre instancias)
-    _cache_rate: Optional[float] = None
-    _cache_time: Optional[float] = None
-    _cache_uf_rate: Optional[float] = None
-    _cache_uf_time: Optional[float] = None
-    _cache_ttl: int = 3600  # 1 hora de caché
-    
-    # Valor de fallback si la API falla
+
+    # Moneda -> indicador en mindicador.cl
+    INDICADORES: Dict[str, str] = {"USD": "dolar", "UF": "uf", "EUR": "euro"}
+
+    # Valor de fallback si no hay datos locales
     FALLBACK_RATE: float = 950.0
     FALLBACK_UF_RATE: float = 38500.0  # Aprox valor UF marzo 2026
-    
-    # URLs serie pública del dólar observado y UF (fuente BCCh)
-    API_URL: str = "https://mindicador.cl/api/dolar"
-    API_UF_URL: str = "https://mindicador.cl/api/uf"
-    
+    FALLBACK_EUR_RATE: float = 1030.0
+
+    DB_PATH: Path = Path(__file__).parent.parent / "data" / "currency_rates.db"
+    PREFETCH_YEARS: int = 4  # Año en curso + 3 anteriores
+    PREFETCH_INTERVAL_SECONDS: int = 3600
+
+    _source = MindicadorSource()
+    _series: Dict[str, Tuple[List[int], np.ndarray]] = {}  # moneda -> (ordinales, valores)
+    _loaded: bool = False
+    _lock = threading.RLock()
+    _prefetch_thread: Optional[threading.Thread] = None
+    _prefetch_stop = threading.Event()
+    _prefetch_wakeup = threading.Event()
+    _last_prefetch: Optional[float] = None
+
+    # ==================== TABLA LOCAL ====================
+
+    @classmethod
+    def _get_connection(cls) -> sqlite3.Connection:
+        cls.DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(cls.DB_PATH, timeout=15)
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS currency_rates (
+                moneda TEXT NOT NULL,
+                fecha TEXT NOT NULL,
+                valor REAL NOT NULL,
+                PRIMARY KEY (moneda, fecha)
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS currency_years (
+                moneda TEXT NOT NULL,
+                anio INTEGER NOT NULL,
+                fetched_at TEXT NOT NULL,
+                PRIMARY KEY (moneda, anio)
+            )
+            """
+        )
+        return conn
+
+    @classmethod
+    def _load(cls) -> None:
+        """Carga la tabla local a memoria (una vez por proceso)."""
+        with cls._lock:
+            if cls._loaded:
+                return
+            conn = cls._get_connection()
+            try:
+                rows = conn.execute(
+                    "SELECT moneda, fecha, valor FROM currency_rates ORDER BY moneda, fecha"
+                ).fetchall()
+            finally:
+                conn.close()
+            por_moneda: Dict[str, List[Tuple[date, float]]] = {}
+            for moneda, fecha, valor in rows:
+                por_moneda.setdefault(moneda, []).append((date.fromisoformat(fecha), valor))
+            cls._series = {}
+            for moneda, puntos in por_moneda.items():
+                cls._set_serie(moneda, puntos)
+            cls._loaded = True
+
+    @classmethod
+    def _set_serie(cls, moneda: str, puntos: List[Tuple[date, float]]) -> None:
+        puntos = sorted(puntos)
+        cls._series[moneda] = (
+            [p[0].toordinal() for p in puntos],
+            np.array([p[1] for p in puntos], dtype=float),
+        )
+
+    @classmethod
+    def store_rates(cls, moneda: str, puntos: List[Tuple[date, float]], anio: Optional[int] = None) -> int:
+        """Guarda puntos (fecha, valor) en la tabla local y actualiza la serie en memoria."""
+        moneda = moneda.upper()
+        conn = cls._get_connection()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO currency_rates (moneda, fecha, valor) VALUES (?, ?, ?)",
+                    [(moneda, f.isoformat(), float(v)) for f, v in puntos],
+                )
+                if anio is not None:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO currency_years (moneda, anio, fetched_at) VALUES (?, ?, ?)",
+                        (moneda, int(anio), datetime.now().isoformat()),
+                    )
+        finally:
+            conn.close()
+        with cls._lock:
+            cls._load()
+            ordinales, valores = cls._series.get(moneda, ([], np.array([])))
+            existentes = {date.fromordinal(o): float(v) for o, v in zip(ordinales, valores)}
+            existentes.update(puntos)
+            cls._set_serie(moneda, list(existentes.items()))
+        return len(puntos)
+
+    @classmethod
+    def _anios_completos(cls) -> Dict[str, set]:
+        """Años ya descargados y cerrados (fetched después de terminar el año)."""
+        conn = cls._get_connection()
+        try:
+            rows = conn.execute("SELECT moneda, anio, fetched_at FROM currency_years").fetchall()
+        finally:
+            conn.close()
+        completos: Dict[str, set] = {}
+        for moneda, anio, fetched_at in rows:
+            if fetched_at[:4] > str(anio):
+                completos.setdefault(moneda, set()).add(anio)
+        return completos
+
+    # ==================== PREFETCH ====================
+
+    @classmethod
+    def set_source(cls, source) -> None:
+        """Reemplaza la fuente de series: callable(indicador, anio) -> [(date, valor)]."""
+        cls._source = source
+
+    @classmethod
+    def prefetch(cls, years: Optional[Iterable[int]] = None) -> Dict[str, int]:
+        """
+        Descarga (sincrónicamente) los años faltantes y el año en curso.
+        Lo usa el hilo de fondo; no llamar desde un request.
+        """
+        cls._load()
+        hoy = _hoy_chile()
+        if years is None:
+            years = range(hoy.year - cls.PREFETCH_YEARS + 1, hoy.year + 1)
+        completos = cls._anios_completos()
+        resultado: Dict[str, int] = {}
+        for moneda, indicador in cls.INDICADORES.items():
+            for anio in years:
+                if anio in completos.get(moneda, set()):
+                    continue
+                try:
+                    puntos = cls._source(indicador, anio)
+                except Exception as e:
+                    print(f"[CurrencyService] Error descargando {indicador} {anio}: {e}")
+                    continue
+                if puntos:
+                    resultado[moneda] = resultado.get(moneda, 0) + cls.store_rates(moneda, puntos, anio)
+        cls._last_prefetch = time.time()
+        return resultado
+
+    @classmethod
+    def _prefetch_loop(cls) -> None:
+        while not cls._prefetch_stop.is_set():
+            try:
+                cls.prefetch()
+            except Exception as e:
+                print(f"[CurrencyService] Error en prefetch: {e}")
+            cls._prefetch_wakeup.wait(cls.PREFETCH_INTERVAL_SECONDS)
+            cls._prefetch_wakeup.clear()
+
+    @classmethod
+    def start_prefetch(cls) -> None:
+        """Inicia el hilo que mantiene la tabla de tipos de cambio al día."""
+        if cls._prefetch_thread and cls._prefetch_thread.is_alive():
+            return
+        cls._prefetch_stop.clear()
+        cls._prefetch_thread = threading.Thread(target=cls._prefetch_loop, name="currency-prefetch", daemon=True)
+        cls._prefetch_thread.start()
+
+    @classmethod
+    def stop_prefetch(cls) -> None:
+        cls._prefetch_stop.set()
+        cls._prefetch_wakeup.set()
+
+    @classmethod
+    def _request_prefetch(cls) -> None:
+        """Pide una descarga en segundo plano (sin bloquear al llamador)."""
+        if cls._prefetch_thread and cls._prefetch_thread.is_alive():
+            cls._prefetch_wakeup.set()
+        else:
+            cls.start_prefetch()
+
+    # ==================== CONSULTA ====================
+
+    @classmethod
+    def _fallback(cls, moneda: str) -> float:
+        return {"USD": cls.FALLBACK_RATE, "UF": cls.FALLBACK_UF_RATE, "CLF": cls.FALLBACK_UF_RATE,
+                "EUR": cls.FALLBACK_EUR_RATE}.get(moneda, 1.0)
+
+    @classmethod
+    def get_rate(cls, moneda: str, fecha: FechaLike = None) -> float:
+        """
+        CLP por 1 unidad de la moneda a la fecha (hoy si no se indica).
+        Usa el último valor publicado a esa fecha; sin datos locales, el fallback.
+
+        Ejemplo:
+            >>> CurrencyService.get_rate("USD", "2025-03-14")  # 946.9
+        """
+        moneda = (moneda or "").upper()
+        if moneda == "CLF":
+            moneda = "UF"
+        if moneda in ("", "CLP"):
+            return 1.0
+        cls._load()
+        dia = _a_fecha(fecha) or _hoy_chile()
+        ordinales, valores = cls._series.get(moneda, ([], None))
+        if not ordinales:
+            if moneda in cls.INDICADORES:
+                cls._request_prefetch()
+            return cls._fallback(moneda)
+        idx = bisect_right(ordinales, dia.toordinal()) - 1
+        if idx < 0:
+            # Fecha anterior a la serie local: el primer valor conocido
+            return float(valores[0])
+        return float(valores[idx])
+
+    @classmethod
+    def get_rates(cls, moneda: str, fechas: Iterable[FechaLike]) -> np.ndarray:
+        """Tipos de cambio para un arreglo de fechas (búsqueda vectorizada)."""
+        moneda = (moneda or "").upper()
+        if moneda == "CLF":
+            moneda = "UF"
+        hoy = _hoy_chile().toordinal()
+        dias = np.array([(_a_fecha(f).toordinal() if _a_fecha(f) else hoy) for f in fechas], dtype=np.int64)
+        if moneda in ("", "CLP"):
+            return np.ones(len(dias))
+        cls._load()
+        ordinales, valores = cls._series.get(moneda, ([], None))
+        if not ordinales:
+            if moneda in cls.INDICADORES:
+                cls._request_prefetch()
+            return np.full(len(dias), cls._fallback(moneda))
+        idx = np.searchsorted(np.asarray(ordinales, dtype=np.int64), dias, side="right") - 1
+        return valores[np.clip(idx, 0, None)]
+
+    @classmethod
+    def convert_to_clp(cls, amounts: Iterable[float], monedas: Union[str, Iterable[str]],
+                       fechas: Iterable[FechaLike]) -> np.ndarray:
+        """
+        Convierte un arreglo de montos a CLP según moneda y fecha de documento.
+
+        Args:
+            amounts: Montos
+            monedas: Una moneda para todos ("USD") o una por monto
+            fechas: Fecha de documento por monto (str/date/datetime; None = hoy)
+
+        Returns:
+            np.ndarray con los montos en CLP
+        """
+        amounts = np.asarray(list(amounts), dtype=float)
+        fechas = list(fechas)
+        if isinstance(monedas, str):
+            return amounts * cls.get_rates(monedas, fechas)
+        monedas = np.array([(m or "CLP").upper() for m in monedas])
+        tasas = np.ones(len(amounts))
+        for moneda in np.unique(monedas):
+            mask = monedas == moneda
+            tasas[mask] = cls.get_rates(moneda, [f for f, m in zip(fechas, mask) if m])
+        return amounts * tasas
+
+    # ==================== API COMPATIBLE ====================
+
     @classmethod
-    def get_usd_to_clp_rate(cls) -> float:
+    def get_usd_to_clp_rate(cls, fecha: FechaLike = None) -> float:
         """
         Obtiene el tipo de cambio USD → CLP.
-        
+
         Returns:
             float: Tipo de cambio (cuántos CLP por 1 USD)
-        
+
         Ejemplo:
             >>> rate = CurrencyService.get_usd_to_clp_rate()
             >>> print(rate)  # 922.29
         """
-        # Verificar si hay caché válido
-        if cls._cache_rate is not None and cls._cache_time is not None:
-            elapsed = time.time() - cls._cache_time
-            if elapsed < cls._cache_ttl:
-                return cls._cache_rate
-        
-        # Consultar serie oficial
-        try:
-            response = requests.get(cls.API_URL, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            serie = data.get('serie', []) if isinstance(data, dict) else []
-
-            if not serie:
-                print("[CurrencyService] Serie de dólar vacía, usando fallback")
-                return cls.FALLBACK_RATE
-
-            # Fecha actual en Chile (UTC-3/UTC-4 aproximado para comparación de día)
-            chile_tz = timezone(timedelta(hours=-3))
-            hoy_chile = datetime.now(chile_tz).date()
-
-            # Buscar valor del día actual
-            rate = None
-            for item in serie:
-                fecha_str = item.get('fecha', '')
-                valor = item.get('valor')
-                if not fecha_str or valor is None:
-                    continue
-                try:
-                    fecha_item = datetime.fromisoformat(fecha_str.replace('Z', '+00:00')).date()
-                except Exception:
-                    continue
+        return cls.get_rate("USD", fecha)
 
-                if fecha_item == hoy_chile:
-                    rate = float(valor)
-                    break
-
-            # Si hoy no está disponible (feriado/no hábil), usar el último disponible
-            if rate is None:
-                primer = serie[0] if serie else {}
-                valor_ultimo = primer.get('valor')
-                if valor_ultimo is not None:
-                    rate = float(valor_ultimo)
-                    print(f"[CurrencyService] Tasa de hoy no disponible, usando último valor BCCh: {rate}")
-
-            if rate and rate > 0:
-                # Guardar en caché
-                cls._cache_rate = rate
-                cls._cache_time = time.time()
-                return cls._cache_rate
-            else:
-                # Tasa no encontrada, usar fallback
-                return cls.FALLBACK_RATE
-                
-        except Exception as e:
-            # Error en la API, usar fallback
-            print(f"[CurrencyService] Error obteniendo tipo de cambio: {e}")
-            return cls.FALLBACK_RATE
-    
     @classmethod
-    def convert_usd_to_clp(cls, amount_usd: float) -> float:
+    def convert_usd_to_clp(cls, amount_usd: float, fecha: FechaLike = None) -> float:
         """
         Convierte un monto de USD a CLP.
-        
+
         Args:
             amount_usd: Monto en dólares estadounidenses
-            
+            fecha: Fecha del documento (hoy si no se indica)
+
         Returns:
             float: Monto equivalente en pesos chilenos
         """
-        rate = cls.get_usd_to_clp_rate()
-        return amount_usd * rate
-    
+        return amount_usd * cls.get_rate("USD", fecha)
+
     @classmethod
-    def convert_clp_to_usd(cls, amount_clp: float) -> float:
+    def convert_clp_to_usd(cls, amount_clp: float, fecha: FechaLike = None) -> float:
         """
         Convierte un monto de CLP a USD.
-        
+
         Args:
             amount_clp: Monto en pesos chilenos
-            
+            fecha: Fecha del documento (hoy si no se indica)
+
         Returns:
             float: Monto equivalente en dólares estadounidenses
         """
-        rate = cls.get_usd_to_clp_rate()
+        rate = cls.get_rate("USD", fecha)
         if rate == 0:
             return 0
         return amount_clp / rate
-    
+
     @classmethod
-    def get_uf_to_clp_rate(cls) -> float:
+    def get_uf_to_clp_rate(cls, fecha: FechaLike = None) -> float:
         """
         Obtiene el tipo de cambio UF → CLP.
-        
+
         Returns:
             float: Tipo de cambio (cuántos CLP por 1 UF)
-        
+
         Ejemplo:
             >>> rate = CurrencyService.get_uf_to_clp_rate()
             >>> print(rate)  # 38500.12
         """
-        # Verificar si hay caché válido
-        if cls._cache_uf_rate is not None and cls._cache_uf_time is not None:
-            elapsed = time.time() - cls._cache_uf_time
-            if elapsed < cls._cache_ttl:
-                return cls._cache_uf_rate
-        
-        # Consultar serie oficial
-        try:
-            response = requests.get(cls.API_UF_URL, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            serie = data.get('serie', []) if isinstance(data, dict) else []
-
-            if not serie:
-                print("[CurrencyService] Serie de UF vacía, usando fallback")
-                return cls.FALLBACK_UF_RATE
-
-            # Fecha actual en Chile (UTC-3/UTC-4 aproximado para comparación de día)
-            chile_tz = timezone(timedelta(hours=-3))
-            hoy_chile = datetime.now(chile_tz).date()
-
-            # Buscar valor del día actual
-            rate = None
-            for item in serie:
-                fecha_str = item.get('fecha', '')
-                valor = item.get('valor')
-                if not fecha_str or valor is None:
-                    continue
-                try:
-                    fecha_item = datetime.fromisoformat(fecha_str.replace('Z', '+00:00')).date()
-                except Exception:
-                    continue
+        return cls.get_rate("UF", fecha)
 
-                if fecha_item == hoy_chile:
-                    rate = float(valor)
-                    break
-
-            # Si hoy no está disponible (feriado/no hábil), usar el último disponible
-            if rate is None:
-                primer = serie[0] if serie else {}
-                valor_ultimo = primer.get('valor')
-                if valor_ultimo is not None:
-                    rate = float(valor_ultimo)
-                    print(f"[CurrencyService] Tasa UF de hoy no disponible, usando último valor BCCh: {rate}")
-
-            if rate and rate > 0:
-                # Guardar en caché
-                cls._cache_uf_rate = rate
-                cls._cache_uf_time = time.time()
-                return cls._cache_uf_rate
-            else:
-                # Tasa no encontrada, usar fallback
-                return cls.FALLBACK_UF_RATE
-                
-        except Exception as e:
-            # Error en la API, usar fallback
-            print(f"[CurrencyService] Error obteniendo tipo de cambio UF: {e}")
-            return cls.FALLBACK_UF_RATE
-    
     @classmethod
-    def convert_uf_to_clp(cls, amount_uf: float) -> float:
+    def convert_uf_to_clp(cls, amount_uf: float, fecha: FechaLike = None) -> float:
         """
         Convierte un monto de UF a CLP.
-        
+
         Args:
             amount_uf: Monto en Unidades de Fomento (CLF)
-            
+            fecha: Fecha del documento (hoy si no se indica)
+
         Returns:
             float: Monto equivalente en pesos chilenos
         """
-        rate = cls.get_uf_to_clp_rate()
-        return amount_uf * rate
-    
+        return amount_uf * cls.get_rate("UF", fecha)
+
     @classmethod
     def clear_cache(cls):
-        """Limpia el caché de tipos de cambio (USD y UF)."""
-        cls._cache_rate = None
-        cls._cache_time = None
-        cls._cache_uf_rate = None
-        cls._cache_uf_time = None
-    
+        """Descarta las series en memoria (se recargan desde la tabla local)."""
+        with cls._lock:
+            cls._series = {}
+            cls._loaded = False
+
     @classmethod
     def get_cache_info(cls) -> dict:
         """
-        Retorna información sobre el estado del caché.
-        
+        Retorna información sobre las series locales.
+
         Returns:
-            dict con 'usd_rate', 'uf_rate', 'age_seconds', 'is_valid'
+            dict con tasa actual, rango de fechas y puntos por moneda
         """
+        cls._load()
         result = {
-            'usd_rate': None,
-            'uf_rate': None,
-            'usd_age_seconds': None,
-            'uf_age_seconds': None,
-            'usd_is_valid': False,
-            'uf_is_valid': False
+            'usd_rate': cls.get_rate("USD"),
+            'uf_rate': cls.get_rate("UF"),
+            'eur_rate': cls.get_rate("EUR"),
+            'last_prefetch_age_seconds': round(time.time() - cls._last_prefetch, 1) if cls._last_prefetch else None,
+            'series': {},
         }
-        
-        if cls._cache_rate is not None and cls._cache_time is not None:
-            age = time.time() - cls._cache_time
-            result['usd_rate'] = cls._cache_rate
-            result['usd_age_seconds'] = round(age, 1)
-            result['usd_is_valid'] = age < cls._cache_ttl
-        
-        if cls._cache_uf_rate is not None and cls._cache_uf_time is not None:
-            age = time.time() - cls._cache_uf_time
-            result['uf_rate'] = cls._cache_uf_rate
-            result['uf_age_seconds'] = round(age, 1)
-            result['uf_is_valid'] = age < cls._cache_ttl
-        
+        for moneda, (ordinales, _) in cls._series.items():
+            result['series'][moneda] = {
+                'desde': date.fromordinal(ordinales[0]).isoformat() if ordinales else None,
+                'hasta': date.fromordinal(ordinales[-1]).isoformat() if ordinales else None,
+                'puntos': len(ordinales),
+            }
         return result
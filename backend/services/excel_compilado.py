@@ -0,0 +1,168 @@
+"""
+Compilación de fuentes Excel (presupuesto, abastecimiento) a Parquet.
+
+Los Excel de planificación cambian pocas veces por temporada, pero se
+parseaban en cada request (o cada vez que vencía un TTL). Aquí cada fuente se
+compila una vez por versión del archivo:
+
+- la firma es (ruta, mtime, tamaño, versión del compilador, formato del
+  tipado); mientras el archivo no cambie no se vuelve a abrir el xlsx
+- el compilador de cada fuente retorna varias tablas: la base tipada y las
+  vistas pre-agregadas (mensual, semanal) que usan los endpoints
+- las tablas se guardan como Parquet en backend/data/excel_compilado/<fuente>/
+  y se mantienen en memoria; tras un reinicio se leen del Parquet
+
+Uso:
+    tablas = compilar("presupuesto_2025", path, _compilar_ppto, version=1)
+    tablas["mensual"]  # DataFrame (solo lectura: copiar antes de modificar)
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Callable, Dict, Tuple, Union
+
+import pandas as pd
+
+
+COMPILADOS_DIR = Path(__file__).parent.parent / "data" / "excel_compilado"
+# Sube cuando cambia _tipar: lo compilado con el tipado anterior se recompila
+FORMATO_TIPADO = 2
+
+Compilador = Callable[[Path], Dict[str, pd.DataFrame]]
+
+_lock = threading.RLock()
+# fuente -> (firma, tablas)
+_memoria: Dict[str, Tuple[str, Dict[str, pd.DataFrame]]] = {}
+
+
+def _firma(path: Path, version: int) -> str:
+    stat = os.stat(path)
+    clave = f"{path.resolve()}|{stat.st_mtime_ns}|{stat.st_size}|{version}|{FORMATO_TIPADO}"
+    return hashlib.sha1(clave.encode("utf-8")).hexdigest()[:16]
+
+
+def _tipar(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Deja el DataFrame serializable a Parquet: nombres de columna como texto y
+    columnas object con tipos mezclados convertidas a número (p.ej. enteros y
+    decimales, o números escritos como texto) o a fecha (fechas y fechas como
+    texto). Solo si alguna celda no se puede convertir la columna queda como
+    str (p.ej. códigos numéricos mezclados con códigos de texto).
+    """
+    df = df.copy()
+    df.columns = [str(c) for c in df.columns]
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        no_nulos = df[col].dropna()
+        if no_nulos.empty:
+            continue
+        tipos = set(no_nulos.map(type))
+        if tipos <= {str}:
+            continue
+
+        numeros = pd.to_numeric(no_nulos, errors="coerce")
+        if numeros.notna().all():
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+            # Códigos enteros (p.ej. cuentas) siguen siendo enteros: astype(str) no agrega ".0"
+            if (numeros % 1 == 0).all():
+                df[col] = df[col].astype("Int64")
+            continue
+        # Enteros como fecha serían epoch: solo se intenta con fechas y texto
+        if all(issubclass(t, (str, date)) for t in tipos):
+            fechas = pd.to_datetime(no_nulos, errors="coerce", format="mixed")
+            if fechas.notna().all():
+                df[col] = pd.to_datetime(df[col], errors="coerce", format="mixed")
+                continue
+        df[col] = df[col].map(lambda v: v if v is None or (isinstance(v, float) and pd.isna(v)) else str(v))
+    return df
+
+
+def _leer_disco(directorio: Path) -> Dict[str, pd.DataFrame] | None:
+    meta_path = directorio / "meta.json"
+    if not meta_path.exists():
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return {t: pd.read_parquet(directorio / f"{t}.parquet") for t in meta["tablas"]}
+    except Exception as e:
+        print(f"[ExcelCompilado] No se pudo leer {directorio}: {e}")
+        return None
+
+
+def _escribir_disco(directorio: Path, path: Path, tablas: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+    tmp = directorio.with_name(directorio.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    tipadas = {}
+    for nombre, df in tablas.items():
+        tipadas[nombre] = _tipar(df)
+        tipadas[nombre].to_parquet(tmp / f"{nombre}.parquet", index=False)
+    stat = os.stat(path)
+    with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "origen": str(path),
+            "mtime": stat.st_mtime,
+            "tamano": stat.st_size,
+            "tablas": sorted(tablas),
+            "compilado": datetime.now().isoformat(),
+        }, f, ensure_ascii=False, indent=2)
+    shutil.rmtree(directorio, ignore_errors=True)
+    os.replace(tmp, directorio)
+    # Versiones anteriores de la misma fuente ya no sirven
+    for otro in directorio.parent.iterdir():
+        if otro != directorio and otro.is_dir():
+            shutil.rmtree(otro, ignore_errors=True)
+    return tipadas
+
+
+def compilar(fuente: str, path: Union[str, Path], compilador: Compilador,
+             version: int = 1) -> Dict[str, pd.DataFrame]:
+    """
+    Tablas compiladas de la fuente. Solo ejecuta el compilador (que abre el
+    xlsx) si el archivo cambió desde la última compilación o no hay Parquet.
+    Propaga FileNotFoundError si el Excel no existe.
+    """
+    path = Path(path)
+    firma = _firma(path, version)
+
+    en_memoria = _memoria.get(fuente)
+    if en_memoria and en_memoria[0] == firma:
+        return en_memoria[1]
+
+    with _lock:
+        en_memoria = _memoria.get(fuente)
+        if en_memoria and en_memoria[0] == firma:
+            return en_memoria[1]
+
+        directorio = COMPILADOS_DIR / fuente / firma
+        tablas = _leer_disco(directorio)
+        if tablas is None:
+            inicio = datetime.now()
+            tablas = compilador(path)
+            try:
+                tablas = _escribir_disco(directorio, path, tablas)
+            except Exception as e:
+                # Sin Parquet se sigue sirviendo desde memoria
+                print(f"[ExcelCompilado] No se pudo guardar {fuente}: {e}")
+            segundos = (datetime.now() - inicio).total_seconds()
+            print(f"[ExcelCompilado] {fuente} compilado desde {path.name} en {segundos:.1f}s")
+        _memoria[fuente] = (firma, tablas)
+        return tablas
+
+
+def invalidar(fuente: str | None = None) -> None:
+    """Descarta lo compilado (una fuente o todas); se recompila en el próximo uso."""
+    with _lock:
+        fuentes = [fuente] if fuente else list(_memoria)
+        for f in fuentes:
+            _memoria.pop(f, None)
+        objetivo = COMPILADOS_DIR / fuente if fuente else COMPILADOS_DIR
+        shutil.rmtree(objetivo, ignore_errors=True)
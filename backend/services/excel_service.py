@@ -1,13 +1,9 @@
-from io import BytesIO
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional
 from datetime import datetime, date, timedelta
-import os
-
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, numbers
-from openpyxl.utils import get_column_letter
 
 from backend.services.recepcion_service import get_recepciones_mp
+from backend.services.report.cube import get_cubo, clave_dataset
+from backend.services.xlsx_stream import Columna, Hoja, stream_xlsx
 
 
 # --- Funciones de formateo chileno ---
@@ -51,33 +47,40 @@ def fmt_dinero(valor, decimales=0):
 MAX_DAYS_FETCH = 180
 
 
-def _auto_fit_columns(ws):
-    """Adjust column widths based on max length in each column."""
-    for col in ws.columns:
-        max_length = 0
-        col_letter = get_column_letter(col[0].column)
-        for cell in col:
-            try:
-                v = str(cell.value) if cell.value is not None else ""
-            except Exception:
-                v = ""
-            if len(v) > max_length:
-                max_length = len(v)
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[col_letter].width = adjusted_width
-
-
-def generate_recepciones_excel(username: str, password: str, fecha_inicio: str, fecha_fin: str,
-                               include_prev_week: bool = False, include_month_accum: bool = False,
-                               solo_hechas: bool = True,
-                               filter_tipo_fruta: List[str] = None,
-                               filter_clasificacion: List[str] = None,
-                               filter_manejo: List[str] = None,
-                               filter_productor: List[str] = None,
-                               filter_origen: List[str] = None) -> bytes:
-    """Genera un Excel con detalle de recepciones y productos desglosados.
-
-    Retorna bytes del archivo .xlsx listo para enviar por StreamingResponse.
+RECEPCIONES_COLUMNAS = [
+    Columna('Albarán'), Columna('Fecha'), Columna('Productor'), Columna('Tipo Fruta'),
+    Columna('Planta/Origen'), Columna('OC Asociada'), Columna('Guía Despacho'),
+    Columna('Producto'), Columna('Categoría'), Columna('Manejo'),
+    Columna('Bandejas (unidades)', '#,##0'), Columna('Kg Hechos', '#,##0.00'), Columna('UOM'),
+    Columna('Costo Unitario', '[$$-en-US]#,##0.00'), Columna('Costo Total', '[$$-en-US]#,##0'),
+    Columna('Clasificación'), Columna('% IQF'), Columna('% Block'),
+]
+
+RESUMEN_COLUMNAS = [
+    Columna('Tipo Fruta'), Columna('Kg', '#,##0.00'), Columna('Costo Total', '[$$-en-US]#,##0'),
+    Columna('Costo Promedio/kg', '[$$-en-US]#,##0.00'), Columna('# Recepciones', '#,##0'),
+]
+
+PALLETS_COLUMNAS = [
+    Columna("Fecha"), Columna("Planta/Origen"), Columna("Albarán"), Columna("Productor"),
+    Columna("Guía Despacho"), Columna("Pallet ID"), Columna("Producto"), Columna("Manejo"),
+    Columna("Tipo Fruta"), Columna("Variedad"), Columna("Kg", '#,##0.00'),
+]
+
+
+def iter_recepciones_excel(username: str, password: str, fecha_inicio: str, fecha_fin: str,
+                           include_prev_week: bool = False, include_month_accum: bool = False,
+                           solo_hechas: bool = True,
+                           filter_tipo_fruta: List[str] = None,
+                           filter_clasificacion: List[str] = None,
+                           filter_manejo: List[str] = None,
+                           filter_productor: List[str] = None,
+                           filter_origen: List[str] = None) -> Iterator[bytes]:
+    """Excel con detalle de recepciones y productos desglosados, en trozos de bytes.
+
+    Las recepciones se consultan antes de retornar (los errores de Odoo salen
+    aquí y no a mitad de la descarga); las filas se escriben a medida que el
+    cliente consume el generador.
     """
     # parse dates
     f_inicio = datetime.strptime(fecha_inicio, '%Y-%m-%d').date()
@@ -150,189 +153,95 @@ def generate_recepciones_excel(username: str, password: str, fecha_inicio: str,
         
         recepciones_main.append(r)
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Detalle'
-
-    headers = [
-        'Albarán', 'Fecha', 'Productor', 'Tipo Fruta', 'Planta/Origen', 'OC Asociada', 'Guía Despacho',
-        'Producto', 'Categoría', 'Manejo', 'Bandejas (unidades)', 'Kg Hechos', 'UOM',
-        'Costo Unitario', 'Costo Total', 'Clasificación', '% IQF', '% Block'
-    ]
-    ws.append(headers)
-    header_font = Font(bold=True)
-    for c_idx, h in enumerate(headers, start=1):
-        cell = ws.cell(row=1, column=c_idx)
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-
-    # Fill detalle rows
-    for r in recepciones_main:
-        albaran = r.get('albaran', '')
-        fecha = fmt_fecha(r.get('fecha', ''))
-        productor = r.get('productor', '')
-        tipo_fruta = r.get('tipo_fruta', '')
-        origen = r.get('origen', 'RFP')  # Ya viene con override aplicado desde recepcion_service
-        guia = r.get('guia_despacho', '')
-        calific = r.get('calific_final', '')
-        pct_iqf = r.get('total_iqf', 0) or 0
-        pct_block = r.get('total_block', 0) or 0
-
-        productos = r.get('productos', []) or []
-        oc_asociada = r.get('oc_asociada', '')
-        if not productos:
-            # Solo agregar si hay kg recepcionados
-            kg_rec = r.get('kg_recepcionados', 0) or 0
-            # Solo si pasa filtros de producto vacíos (o se asume válido si no hay productos pero pasó el filtro de recepción)
-            # Como filtramos recepciones_main antes, si estamos aquí es porque la recepción es válida
-            # Pero si hay filtro estricto de tipo fruta y la recepción no tiene productos, ¿qué hacemos?
-            # Asumimos que si filter_tipo_fruta está activo, requerimos match explicito.
-            if kg_rec > 0 and not filter_tipo_fruta and not filter_manejo:
-                 ws.append([albaran, fecha, productor, tipo_fruta, origen, oc_asociada, guia, '', '', '', '', kg_rec, '', '', '', calific, pct_iqf, pct_block])
-        else:
+    def _filas_detalle():
+        for r in recepciones_main:
+            albaran = r.get('albaran', '')
+            fecha = fmt_fecha(r.get('fecha', ''))
+            productor = r.get('productor', '')
+            tipo_fruta = r.get('tipo_fruta', '')
+            origen = r.get('origen', 'RFP')  # Ya viene con override aplicado desde recepcion_service
+            guia = r.get('guia_despacho', '')
+            calific = r.get('calific_final', '')
+            pct_iqf = r.get('total_iqf', 0) or 0
+            pct_block = r.get('total_block', 0) or 0
+
+            productos = r.get('productos', []) or []
+            oc_asociada = r.get('oc_asociada', '')
+            if not productos:
+                # Solo agregar si hay kg recepcionados
+                kg_rec = r.get('kg_recepcionados', 0) or 0
+                # Si hay filtro estricto de tipo fruta o manejo, se requiere match explícito de producto
+                if kg_rec > 0 and not filter_tipo_fruta and not filter_manejo:
+                    yield [albaran, fecha, productor, tipo_fruta, origen, oc_asociada, guia, '', '', '', '', kg_rec, '', '', '', calific, pct_iqf, pct_block]
+                continue
+
             for p in productos:
                 kg_hechos = p.get('Kg Hechos', 0) or 0
                 # Ignorar productos con 0 kg
                 if kg_hechos <= 0:
                     continue
-                
+
                 # Usar TipoFruta del producto, fallback a tipo_fruta de la recepción
                 tipo_fruta_prod = (p.get('TipoFruta') or tipo_fruta or '').strip()
                 manejo = (p.get('Manejo') or '').strip()
-                
+
                 # --- FILTROS DE PRODUCTO ---
                 if filter_tipo_fruta and tipo_fruta_prod not in filter_tipo_fruta:
                     continue
                 if filter_manejo and manejo not in filter_manejo:
                     continue
                 # ---------------------------
-                    
-                prod_name = p.get('Producto', '')
+
                 categoria = p.get('Categoria', '')
-                uom = p.get('UOM', '')
-                costo_unit = p.get('Costo Unitario', 0) or 0
-                costo_total = p.get('Costo Total', 0) or 0
                 bandejas_units = kg_hechos if (categoria or '').upper() == 'BANDEJAS' else ''
-                
-                ws.append([
-                    albaran, fecha, productor, tipo_fruta_prod, origen, oc_asociada, guia,
-                    prod_name, categoria, manejo, bandejas_units, kg_hechos, uom,
-                    costo_unit, costo_total, calific, pct_iqf, pct_block
-                ])
-
-    # Apply number formats for numeric columns
-    # Find indices
-    col_map = {h: i + 1 for i, h in enumerate(headers)}
-    kg_col = col_map['Kg Hechos']
-    costo_unit_col = col_map['Costo Unitario']
-    costo_total_col = col_map['Costo Total']
-    bandejas_col = col_map['Bandejas (unidades)']
-
-    for row in ws.iter_rows(min_row=2, min_col=1, max_col=len(headers)):
-        # kg
-        row[kg_col - 1].number_format = '#,##0.00'
-        # cost
-        row[costo_unit_col - 1].number_format = '[$$-en-US]#,##0.00'
-        row[costo_total_col - 1].number_format = '[$$-en-US]#,##0'
-        # bandejas as integer
-        if row[bandejas_col - 1].value != '':
-            try:
-                row[bandejas_col - 1].number_format = '#,##0'
-            except Exception:
-                pass
-
-    # Freeze header and enable filter
-    ws.auto_filter.ref = ws.dimensions
-    ws.freeze_panes = 'A2'
-    _auto_fit_columns(ws)
-
-    # Summary sheet
-    summary = wb.create_sheet('Resumen')
-    summary_headers = ['Tipo Fruta', 'Kg', 'Costo Total', 'Costo Promedio/kg', '# Recepciones']
-    summary.append(summary_headers)
-    for c_idx, h in enumerate(summary_headers, start=1):
-        cell = summary.cell(row=1, column=c_idx)
-        cell.font = header_font
-
-    # Aggregate by tipo_fruta del PRODUCTO (no de la recepción)
-    agrup = {}
-    for r in recepciones_main:
-        # Nota: recepciones_main ya tiene filtros de Productor y Clasificación aplicados
-        tipo_fruta_rec = (r.get('tipo_fruta') or '').strip()
-        
-        # Verificar si la recepción tiene productos válidos después de filtros (para conteo de recepciones)
-        # Esto es complejo porque una recepción puede tener mix de productos validos e invalidos.
-        # Contaremos recepción si al menos un producto contribuyó al resumen de ese tipo.
-        
-        products_contrib = set() # Tipos de fruta a los que esta recepción contribuyó
-        
-        for p in r.get('productos', []) or []:
-            cat = (p.get('Categoria') or '').upper()
-            if cat == 'BANDEJAS':
-                # skip bandejas from kg/costo of fruta
-                continue
-            
-            kg = p.get('Kg Hechos', 0) or 0
-            if kg <= 0:
-                continue
-                
-            # Usar TipoFruta del producto, fallback a tipo_fruta de la recepción
-            tipo = (p.get('TipoFruta') or tipo_fruta_rec or '').strip()
-            manejo = (p.get('Manejo') or '').strip()
-            
-            # --- FILTROS DE PRODUCTO ---
-            if filter_tipo_fruta and tipo not in filter_tipo_fruta:
-                continue
-            if filter_manejo and manejo not in filter_manejo:
-                continue
-            # ---------------------------
-            
-            if not tipo:
-                tipo = 'SIN_TIPO'
-            
-            if tipo not in agrup:
-                agrup[tipo] = {'kg': 0.0, 'costo': 0.0, 'recepciones_ids': set()}
-            
-            agrup[tipo]['kg'] += kg
-            agrup[tipo]['costo'] += p.get('Costo Total', 0) or 0
-            agrup[tipo]['recepciones_ids'].add(r.get('name')) # Usar nombre o ID único para contar
-
-    for tipo, vals in sorted(agrup.items(), key=lambda x: x[0]):
-        kg = vals['kg']
-        costo = vals['costo']
-        n_recep = len(vals['recepciones_ids'])
-        costo_prom = (costo / kg) if kg > 0 else None
-        summary.append([tipo, kg, costo, costo_prom if costo_prom is not None else '', n_recep])
-
-    # Format summary numeric columns
-    for row in summary.iter_rows(min_row=2, min_col=1, max_col=5):
-        row[1].number_format = '#,##0.00'  # Kg
-        row[2].number_format = '[$$-en-US]#,##0'  # costo total
-        try:
-            row[3].number_format = '[$$-en-US]#,##0.00'
-        except Exception:
-            pass
-        row[4].number_format = '#,##0' # N recepciones
-
-    _auto_fit_columns(summary)
 
-    # Save to bytes
-    buf = BytesIO()
-    wb.save(buf)
-    buf.seek(0)
-    data = buf.getvalue()
-    buf.close()
-    return data
+                yield [
+                    albaran, fecha, productor, tipo_fruta_prod, origen, oc_asociada, guia,
+                    p.get('Producto', ''), categoria, manejo, bandejas_units, kg_hechos, p.get('UOM', ''),
+                    p.get('Costo Unitario', 0) or 0, p.get('Costo Total', 0) or 0, calific, pct_iqf, pct_block
+                ]
+
+    def _filas_resumen():
+        # Agrupado por tipo_fruta del PRODUCTO (no de la recepción), desde el cubo del conjunto filtrado
+        clave = clave_dataset(
+            fecha_inicio, fecha_fin, solo_hechas, origen=filter_origen, productor=filter_productor,
+            clasificacion=filter_clasificacion, tipo_fruta=filter_tipo_fruta, manejo=filter_manejo
+        )
+        for fila in get_cubo(recepciones_main, clave).resumen_por_tipo(filter_tipo_fruta, filter_manejo):
+            costo_prom = fila['costo_prom'] if fila['costo_prom'] is not None else ''
+            yield [fila['tipo_fruta'], fila['kg'], fila['costo'], costo_prom, fila['n_recepciones']]
+
+    return stream_xlsx([
+        Hoja('Detalle', RECEPCIONES_COLUMNAS, _filas_detalle()),
+        Hoja('Resumen', RESUMEN_COLUMNAS, _filas_resumen(), autofiltro=False, congelar_encabezado=False),
+    ])
 
 
-def generate_pallets_excel(username: str, password: str, fecha_inicio: str, fecha_fin: str,
-                            manejo_filtros: Optional[List[str]] = None,
-                            tipo_fruta_filtros: Optional[List[str]] = None,
-                            origen_filtros: Optional[List[str]] = None,
-                            variedad_filtros: Optional[List[str]] = None) -> bytes:
+def generate_recepciones_excel(username: str, password: str, fecha_inicio: str, fecha_fin: str,
+                               include_prev_week: bool = False, include_month_accum: bool = False,
+                               solo_hechas: bool = True,
+                               filter_tipo_fruta: List[str] = None,
+                               filter_clasificacion: List[str] = None,
+                               filter_manejo: List[str] = None,
+                               filter_productor: List[str] = None,
+                               filter_origen: List[str] = None) -> bytes:
+    """Genera el Excel de recepciones completo en memoria (ver iter_recepciones_excel)."""
+    return b"".join(iter_recepciones_excel(
+        username, password, fecha_inicio, fecha_fin, include_prev_week, include_month_accum,
+        solo_hechas=solo_hechas, filter_tipo_fruta=filter_tipo_fruta,
+        filter_clasificacion=filter_clasificacion, filter_manejo=filter_manejo,
+        filter_productor=filter_productor, filter_origen=filter_origen
+    ))
+
+
+def iter_pallets_excel(username: str, password: str, fecha_inicio: str, fecha_fin: str,
+                       manejo_filtros: Optional[List[str]] = None,
+                       tipo_fruta_filtros: Optional[List[str]] = None,
+                       origen_filtros: Optional[List[str]] = None,
+                       variedad_filtros: Optional[List[str]] = None) -> Iterator[bytes]:
     """
-    Genera un Excel con el detalle de cada pallet (uno por fila).
-    
+    Excel con el detalle de cada pallet (uno por fila), en trozos de bytes.
+
     Args:
         username: Usuario Odoo
         password: Contraseña Odoo
@@ -341,39 +250,20 @@ def generate_pallets_excel(username: str, password: str, fecha_inicio: str, fech
         manejo_filtros: Lista de manejos a filtrar (opcional)
         tipo_fruta_filtros: Lista de tipos de fruta a filtrar (opcional)
         origen_filtros: Lista de orígenes a filtrar (RFP, VILKUN, SAN JOSE) (opcional)
-    
+
     Returns:
-        bytes: Archivo Excel en formato bytes
+        Iterator[bytes]: Archivo Excel para StreamingResponse
     """
     from backend.services.recepcion_service import get_recepciones_pallets_detailed
-    
-    # Obtener datos detallados (un pallet por fila)
+
+    # Obtener datos detallados (un pallet por fila) antes de empezar a escribir
     pallets_detail = get_recepciones_pallets_detailed(
-        username, password, fecha_inicio, fecha_fin, 
+        username, password, fecha_inicio, fecha_fin,
         manejo_filtros, tipo_fruta_filtros, origen_filtros, variedad_filtros
     )
-    
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Detalle de Pallets"
-    
-    # Encabezados
-    headers = [
-        "Fecha", "Planta/Origen", "Albarán", "Productor", "Guía Despacho", 
-        "Pallet ID", "Producto", "Manejo", "Tipo Fruta", "Variedad", "Kg"
-    ]
-    ws.append(headers)
-    
-    # Formato de encabezados
-    header_font = Font(bold=True)
-    for c_idx, h in enumerate(headers, start=1):
-        cell = ws.cell(row=1, column=c_idx)
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-    
-    # Agregar datos
-    for p in pallets_detail:
-        ws.append([
+
+    filas = (
+        [
             p.get("fecha", ""),
             p.get("origen", ""),
             p.get("albaran", ""),
@@ -385,22 +275,19 @@ def generate_pallets_excel(username: str, password: str, fecha_inicio: str, fech
             p.get("tipo_fruta", ""),
             p.get("variedad", ""),
             p.get("kg", 0)
-        ])
-    
-    # Formatear columna de Kg
-    kg_col_idx = headers.index("Kg") + 1
-    for row in ws.iter_rows(min_row=2, min_col=kg_col_idx, max_col=kg_col_idx):
-        row[0].number_format = '#,##0.00'
-    
-    # Aplicar autofiltro y congelar paneles
-    ws.auto_filter.ref = ws.dimensions
-    ws.freeze_panes = 'A2'
-    _auto_fit_columns(ws)
-    
-    # Guardar a bytes
-    buf = BytesIO()
-    wb.save(buf)
-    buf.seek(0)
-    data = buf.getvalue()
-    buf.close()
-    return data
+        ]
+        for p in pallets_detail
+    )
+    return stream_xlsx([Hoja("Detalle de Pallets", PALLETS_COLUMNAS, filas)])
+
+
+def generate_pallets_excel(username: str, password: str, fecha_inicio: str, fecha_fin: str,
+                            manejo_filtros: Optional[List[str]] = None,
+                            tipo_fruta_filtros: Optional[List[str]] = None,
+                            origen_filtros: Optional[List[str]] = None,
+                            variedad_filtros: Optional[List[str]] = None) -> bytes:
+    """Genera el Excel de pallets completo en memoria (ver iter_pallets_excel)."""
+    return b"".join(iter_pallets_excel(
+        username, password, fecha_inicio, fecha_fin,
+        manejo_filtros, tipo_fruta_filtros, origen_filtros, variedad_filtros
+    ))
@@ -10,6 +10,7 @@ from .validador import ValidadorFlujo
 from .agregador import AgregadorFlujo
 from .proyeccion import ProyeccionFlujo
 from .real_proyectado import RealProyectadoCalculator
+from .escenario import EscenarioFlujo
 
 __all__ = [
     'ClasificadorCuentas',
@@ -17,6 +18,7 @@ __all__ = [
     'ValidadorFlujo',
     'AgregadorFlujo',
     'ProyeccionFlujo',
-    'RealProyectadoCalculator'
+    'RealProyectadoCalculator',
+    'EscenarioFlujo'
 ]
 
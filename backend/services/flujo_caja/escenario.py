@@ -0,0 +1,334 @@
+"""
+Módulo de escenarios what-if para Flujo de Caja.
+
+Mantiene por sesión la última base de hechos calculada por
+FlujoCajaService.get_flujo_mensualizado() y aplica sobre ella ediciones
+(efectivo inicial, distribuciones de OC, reclasificación de cuentas) como
+deltas sobre los conceptos y períodos afectados.
+
+Cada operación retorna solo las celdas modificadas:
+- concepto: montos_por_mes de un concepto
+- cuenta: montos_por_mes de una cuenta/estado dentro de un concepto
+- etiqueta: montos_por_mes de un nivel anidado de la cuenta (IFRS 3 → categoría
+  → proveedor), identificado por su ruta de nombres
+- subtotal: subtotal_por_mes de una actividad
+- efectivo: efectivo_por_mes (inicial/variacion/final) de un período
+- conciliacion: totales de conciliación
+"""
+import copy
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from backend.cache import OdooCache
+
+from .constants import CATEGORIA_NEUTRAL
+from .real_proyectado import RealProyectadoCalculator
+
+
+ACTIVIDADES = ["OPERACION", "INVERSION", "FINANCIAMIENTO"]
+
+# Las proyecciones de OCs se agregan en 1.2.1 bajo el estado "proyectadas_compras"
+# (ver RealProyectadoCalculator.calcular_pagos_proveedores)
+CONCEPTO_PAGOS_PROVEEDORES = "1.2.1"
+CODIGO_PROYECTADAS_COMPRAS = "proyectadas_compras"
+
+
+class EscenarioFlujo:
+    """Base de hechos de un flujo mensualizado sobre la que se aplican deltas."""
+
+    def __init__(self, resultado: Dict, agrupacion: str = 'mensual', incluir_proyecciones: bool = False):
+        """
+        Args:
+            resultado: Resultado de get_flujo_mensualizado()
+            agrupacion: 'mensual' o 'semanal'
+            incluir_proyecciones: Flag con que se calculó la base (se reutiliza al recalcular)
+        """
+        self.resultado = copy.deepcopy(resultado)
+        self.agrupacion = agrupacion
+        self.incluir_proyecciones = bool(incluir_proyecciones)
+        # Proyección simulada vigente por OC ({oc_id: [{fecha, monto}]}): una vez
+        # editada en el escenario, la base ya no refleja la distribución guardada
+        self.proyecciones_oc: Dict[int, List[Dict]] = {}
+        self.meses = list(self.resultado.get("meses", []))
+        self.fecha_inicio = self.resultado.get("periodo", {}).get("inicio", "")
+        self.fecha_fin = self.resultado.get("periodo", {}).get("fin", "")
+        self.version = 0
+        self._lock = threading.RLock()
+        self._indice_conceptos: Dict[str, Tuple[str, Dict]] = {}
+        for act_key in ACTIVIDADES:
+            actividad = self.resultado.get("actividades", {}).get(act_key, {})
+            for concepto in actividad.get("conceptos", []):
+                self._indice_conceptos[concepto.get("id")] = (act_key, concepto)
+
+    # ==================== HELPERS ====================
+
+    def _fecha_a_periodo(self, fecha: str) -> Optional[str]:
+        """Convierte una fecha YYYY-MM-DD al período de la base (None si queda fuera)."""
+        if not fecha or not (self.fecha_inicio <= fecha[:10] <= self.fecha_fin):
+            return None
+        if self.agrupacion == 'semanal':
+            try:
+                iso = datetime.strptime(fecha[:10], '%Y-%m-%d').isocalendar()
+            except ValueError:
+                return None
+            periodo = f"{iso[0]}-W{iso[1]:02d}"
+        else:
+            periodo = fecha[:7]
+        return periodo if periodo in self.meses else None
+
+    def _montos_por_periodo(self, items: List[Dict], signo: float = 1.0) -> Dict[str, float]:
+        """Agrupa una lista [{fecha, monto}] por período."""
+        montos = defaultdict(float)
+        for item in items or []:
+            periodo = self._fecha_a_periodo(str(item.get("fecha") or ""))
+            monto = float(item.get("monto") or 0)
+            if periodo and monto:
+                montos[periodo] += signo * monto
+        return montos
+
+    @staticmethod
+    def _buscar_cuenta(concepto: Dict, codigo: str) -> Optional[Dict]:
+        for cuenta in concepto.get("cuentas", []):
+            if str(cuenta.get("codigo")) == str(codigo):
+                return cuenta
+        return None
+
+    @staticmethod
+    def ruta_etiquetas_oc(categoria: str, proveedor: str) -> List[Tuple[str, str]]:
+        """Niveles (nombre, tipo) bajo "proyectadas_compras" donde calcular_pagos_proveedores deja una OC."""
+        return [
+            (RealProyectadoCalculator.IFRS3_OCS, "ifrs3"),
+            (f"📁 {categoria}", "categoria"),
+            (proveedor[:50], "proveedor"),
+        ]
+
+    def _aplicar_deltas_etiquetas(self, concepto_id: str, codigo: str, ruta: List[Tuple[str, str]],
+                                  por_periodo: Dict[str, float]) -> List[Dict]:
+        """Aplica el delta en cada nivel de la ruta de etiquetas de una cuenta, creando los que falten."""
+        if not por_periodo or concepto_id not in self._indice_conceptos:
+            return []
+        cuenta = self._buscar_cuenta(self._indice_conceptos[concepto_id][1], codigo)
+        if cuenta is None:
+            return []
+
+        celdas = []
+        hermanos = cuenta.setdefault("etiquetas", [])
+        recorrido = []
+        for nivel, (nombre, tipo) in enumerate(ruta):
+            nodo = next((e for e in hermanos if e.get("nombre") == nombre), None)
+            if nodo is None:
+                nodo = {"nombre": nombre, "monto": 0.0, "montos_por_mes": {}, "tipo": tipo,
+                        "nivel": 3 + nivel, "activo": True}
+                hermanos.append(nodo)
+            recorrido.append(nombre)
+            montos = nodo.setdefault("montos_por_mes", {})
+            for periodo, delta in por_periodo.items():
+                montos[periodo] = round(montos.get(periodo, 0) + delta, 0)
+                celdas.append({
+                    "tipo": "etiqueta", "concepto_id": concepto_id, "cuenta": codigo,
+                    "ruta": list(recorrido), "periodo": periodo, "valor": montos[periodo]
+                })
+            nodo["monto"] = round(sum(montos.values()), 0)
+            if nivel < len(ruta) - 1:
+                hermanos = nodo.setdefault("sub_etiquetas", [])
+        return celdas
+
+    # ==================== PROPAGACIÓN ====================
+
+    def _aplicar_deltas(self, deltas: Dict[str, Dict[str, float]],
+                        deltas_cuentas: Dict[Tuple[str, str], Dict[str, float]] = None) -> List[Dict]:
+        """
+        Aplica deltas {concepto_id: {periodo: delta}} y propaga a subtotales y efectivo.
+
+        Solo recorre los conceptos y períodos afectados; el efectivo se
+        recalcula desde el primer período modificado en adelante.
+        """
+        celdas = []
+        deltas_actividad: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+
+        for concepto_id, por_periodo in deltas.items():
+            if concepto_id not in self._indice_conceptos:
+                continue
+            act_key, concepto = self._indice_conceptos[concepto_id]
+            montos = concepto.setdefault("montos_por_mes", {})
+            for periodo, delta in por_periodo.items():
+                if not delta:
+                    continue
+                montos[periodo] = round(montos.get(periodo, 0) + delta, 0)
+                deltas_actividad[act_key][periodo] += delta
+                celdas.append({"tipo": "concepto", "id": concepto_id, "periodo": periodo, "valor": montos[periodo]})
+            concepto["total"] = round(sum(montos.values()), 0)
+
+        for (concepto_id, codigo), por_periodo in (deltas_cuentas or {}).items():
+            if concepto_id not in self._indice_conceptos:
+                continue
+            cuenta = self._buscar_cuenta(self._indice_conceptos[concepto_id][1], codigo)
+            if cuenta is None:
+                continue
+            montos = cuenta.setdefault("montos_por_mes", {})
+            for periodo, delta in por_periodo.items():
+                if not delta:
+                    continue
+                montos[periodo] = round(montos.get(periodo, 0) + delta, 0)
+                celdas.append({
+                    "tipo": "cuenta", "concepto_id": concepto_id, "id": codigo,
+                    "periodo": periodo, "valor": montos[periodo]
+                })
+            cuenta["monto"] = round(sum(montos.values()), 0)
+
+        primer_periodo = None
+        for act_key, por_periodo in deltas_actividad.items():
+            actividad = self.resultado["actividades"][act_key]
+            subtotales = actividad.setdefault("subtotal_por_mes", {})
+            for periodo, delta in por_periodo.items():
+                subtotales[periodo] = round(subtotales.get(periodo, 0) + delta, 0)
+                celdas.append({"tipo": "subtotal", "id": act_key, "periodo": periodo, "valor": subtotales[periodo]})
+                if primer_periodo is None or self.meses.index(periodo) < self.meses.index(primer_periodo):
+                    primer_periodo = periodo
+            actividad["subtotal"] = round(sum(subtotales.values()), 0)
+
+        if primer_periodo is not None:
+            celdas.extend(self._recalcular_efectivo(desde=primer_periodo))
+        if celdas:
+            self.version += 1
+        return celdas
+
+    def _recalcular_efectivo(self, desde: str = None, efectivo_inicial: float = None) -> List[Dict]:
+        """Recalcula efectivo_por_mes desde un período (o desde el inicio)."""
+        efectivo_por_mes = self.resultado.setdefault("efectivo_por_mes", {})
+        conciliacion = self.resultado.setdefault("conciliacion", {})
+        inicio = self.meses.index(desde) if desde in self.meses else 0
+
+        if inicio == 0:
+            acumulado = efectivo_inicial if efectivo_inicial is not None else conciliacion.get("efectivo_inicial", 0)
+        else:
+            acumulado = efectivo_por_mes.get(self.meses[inicio - 1], {}).get("final", 0)
+
+        celdas = []
+        for periodo in self.meses[inicio:]:
+            variacion = sum(
+                self.resultado["actividades"].get(act, {}).get("subtotal_por_mes", {}).get(periodo, 0)
+                for act in ACTIVIDADES
+            )
+            celda = {
+                "inicial": round(acumulado, 0),
+                "variacion": round(variacion, 0),
+                "final": round(acumulado + variacion, 0)
+            }
+            if efectivo_por_mes.get(periodo) != celda:
+                efectivo_por_mes[periodo] = celda
+                celdas.append({"tipo": "efectivo", "periodo": periodo, **celda})
+            acumulado += variacion
+
+        conciliacion["efectivo_final"] = round(acumulado, 0)
+        conciliacion["variacion_neta"] = round(
+            sum(self.resultado["actividades"].get(a, {}).get("subtotal", 0) for a in ACTIVIDADES), 0
+        )
+        celdas.append({
+            "tipo": "conciliacion",
+            "efectivo_inicial": conciliacion.get("efectivo_inicial", 0),
+            "efectivo_final": conciliacion["efectivo_final"],
+            "variacion_neta": conciliacion["variacion_neta"]
+        })
+        return celdas
+
+    # ==================== OPERACIONES WHAT-IF ====================
+
+    def aplicar_efectivo_inicial(self, valor: float) -> List[Dict]:
+        """Cambia el efectivo inicial; solo se recalcula la cadena de efectivo."""
+        with self._lock:
+            conciliacion = self.resultado.setdefault("conciliacion", {})
+            conciliacion["efectivo_inicial"] = round(valor, 0)
+            conciliacion["efectivo_inicial_personalizado"] = True
+            self.version += 1
+            return self._recalcular_efectivo(efectivo_inicial=valor)
+
+    def aplicar_distribucion(self, oc_id: int, anteriores: List[Dict], nuevas: List[Dict],
+                             categoria: str, proveedor: str) -> List[Dict]:
+        """
+        Reemplaza la proyección de una OC en 1.2.1 (concepto, estado y niveles anidados).
+
+        Args:
+            oc_id: OC editada
+            anteriores: [{fecha, monto}] con que la base proyectó la OC
+                (RealProyectadoCalculator.proyeccion_oc sobre la distribución guardada).
+                Si la OC ya se editó en este escenario se usa la proyección simulada.
+            nuevas: [{fecha, monto}] efectivos de la nueva distribución (mismas reglas)
+            categoria, proveedor: Categoría de contacto y nombre del proveedor de la OC
+
+        Los montos son positivos; las OCs son salidas de caja (signo negativo).
+        """
+        with self._lock:
+            anteriores = self.proyecciones_oc.get(oc_id, anteriores)
+            delta = self._montos_por_periodo(anteriores, signo=1.0)
+            for periodo, monto in self._montos_por_periodo(nuevas, signo=-1.0).items():
+                delta[periodo] += monto
+            delta = {p: v for p, v in delta.items() if v}
+            self.proyecciones_oc[oc_id] = list(nuevas)
+
+            celdas = self._aplicar_deltas_etiquetas(
+                CONCEPTO_PAGOS_PROVEEDORES, CODIGO_PROYECTADAS_COMPRAS,
+                self.ruta_etiquetas_oc(categoria, proveedor), delta
+            )
+            celdas.extend(self._aplicar_deltas(
+                {CONCEPTO_PAGOS_PROVEEDORES: delta},
+                {(CONCEPTO_PAGOS_PROVEEDORES, CODIGO_PROYECTADAS_COMPRAS): delta}
+            ))
+            return celdas
+
+    def aplicar_reclasificacion(self, codigo_cuenta: str, concepto_destino: Optional[str]) -> Optional[List[Dict]]:
+        """
+        Mueve una cuenta contable de su concepto actual a concepto_destino.
+
+        Returns:
+            Celdas modificadas, o None si la cuenta no está en la base
+            (p.ej. fuera del top de cuentas por concepto) y se requiere recalcular.
+        """
+        with self._lock:
+            return self._reclasificar(codigo_cuenta, concepto_destino)
+
+    def _reclasificar(self, codigo_cuenta: str, concepto_destino: Optional[str]) -> Optional[List[Dict]]:
+        for concepto_id, (act_key, concepto) in self._indice_conceptos.items():
+            cuenta = self._buscar_cuenta(concepto, codigo_cuenta)
+            if cuenta is None or cuenta.get("es_cuenta_cxc") or cuenta.get("es_cuenta_cxp"):
+                continue
+            if concepto_id == concepto_destino:
+                return []
+
+            excluida = not concepto_destino or concepto_destino == CATEGORIA_NEUTRAL
+            if not excluida and concepto_destino not in self._indice_conceptos:
+                return None
+
+            montos = cuenta.get("montos_por_mes", {})
+            deltas = {concepto_id: {p: -v for p, v in montos.items() if v}}
+
+            concepto["cuentas"] = [c for c in concepto["cuentas"] if c is not cuenta]
+            if not excluida:
+                self._indice_conceptos[concepto_destino][1].setdefault("cuentas", []).append(cuenta)
+                deltas[concepto_destino] = {p: v for p, v in montos.items() if v}
+
+            celdas = self._aplicar_deltas(deltas)
+            celdas.append({"tipo": "cuenta_movida", "id": codigo_cuenta, "desde": concepto_id, "hacia": concepto_destino})
+            return celdas
+        return None
+
+
+# Escenarios por sesión (process-wide). TTL de 1 hora desde el último cálculo completo.
+_escenarios = OdooCache(default_ttl=3600)
+
+
+def guardar_escenario(escenario_id: str, escenario: EscenarioFlujo) -> None:
+    """Registra la base de hechos de una sesión."""
+    _escenarios.set(f"flujo_escenario:{escenario_id}", escenario)
+
+
+def obtener_escenario(escenario_id: str) -> Optional[EscenarioFlujo]:
+    """Retorna la base de hechos de una sesión o None si expiró."""
+    return _escenarios.get(f"flujo_escenario:{escenario_id}")
+
+
+def eliminar_escenario(escenario_id: str) -> bool:
+    """Descarta la base de hechos de una sesión."""
+    return _escenarios.invalidate(f"flujo_escenario:{escenario_id}")
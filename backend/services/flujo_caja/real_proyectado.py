@@ -15,7 +15,7 @@ ESTRUCTURA JERÁRQUICA (igual que 1.1.1):
 - Nivel 2: Cuenta/Estado de pago (Facturas Pagadas, Parcialmente Pagadas, etc.)
 - Nivel 3: Etiquetas/Proveedores individuales
 """
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 from collections import defaultdict
 from datetime import datetime, timedelta
 import json
@@ -48,6 +48,17 @@ class RealProyectadoCalculator:
         'not_paid': '❌'
     }
 
+    # Proyección de OCs (Módulo Compras)
+    CAMPOS_OC = [
+        'id', 'name', 'partner_id', 'amount_total', 'date_order',
+        'date_planned', 'date_approve', 'payment_term_id',
+        'invoice_ids', 'invoice_status', 'currency_id',
+        'x_studio_fecha_de'  # Campo personalizado: Fecha de Pago
+    ]
+    TOLERANCIA_OC_FACTURADA = 100  # Pendiente (CLP) bajo el cual la OC se considera facturada
+    TOLERANCIA_REAJUSTE_OC = 0.01  # Diferencia máxima entre distribución guardada y pendiente
+    IFRS3_OCS = 'Sin IFRS 3'  # Las OCs no tienen cuenta contable: nivel IFRS 3 por defecto
+
     @staticmethod
     def _texto_orden_alfabetico(valor: str) -> str:
         """Normaliza texto para orden alfabético estable (sin acentos/símbolos)."""
@@ -117,6 +128,155 @@ class RealProyectadoCalculator:
                 self._cuenta_iva_id = None
         return self._cuenta_iva_id
     
+    # ==================== PROYECCIÓN DE OCs ====================
+
+    @staticmethod
+    def _monto_oc_clp(monto: float, currency_data) -> float:
+        """Convierte USD/UF a CLP para OCs y sus facturas (CLF mal etiquetado: > 100000 ya es CLP)."""
+        currency_name = currency_data[1] if isinstance(currency_data, (list, tuple)) and len(currency_data) > 1 else ''
+        currency_upper = str(currency_name).upper()
+        if 'USD' in currency_upper:
+            return CurrencyService.convert_usd_to_clp(monto)
+        if ('UF' in currency_upper or 'CLF' in currency_upper) and monto <= 100000:
+            return CurrencyService.convert_uf_to_clp(monto)
+        return monto
+
+    @staticmethod
+    def _fecha_valida(valor) -> Optional[str]:
+        """'YYYY-MM-DD' si el valor es una fecha válida, None si no."""
+        if not valor:
+            return None
+        fecha = str(valor)[:10]
+        try:
+            datetime.strptime(fecha, '%Y-%m-%d')
+        except ValueError:
+            return None
+        return fecha
+
+    @staticmethod
+    def _categoria_partner(partner: Dict) -> str:
+        categoria = partner.get('x_studio_categora_de_contacto', False)
+        if categoria and isinstance(categoria, (list, tuple)):
+            return categoria[1]
+        if not categoria or categoria == 'False':
+            return 'Sin Categoría'
+        return categoria
+
+    def monto_pendiente_oc(self, oc: Dict, facturas_por_id: Dict[int, Dict]) -> float:
+        """Monto de la OC aún sin facturar (CLP); las facturas canceladas no cuentan."""
+        amount_total = self._monto_oc_clp(float(oc.get('amount_total') or 0.0), oc.get('currency_id'))
+        monto_facturado = 0.0
+        for inv_id in oc.get('invoice_ids') or []:
+            factura = facturas_por_id.get(inv_id)
+            if factura and factura.get('state') != 'cancel':
+                monto_facturado += self._monto_oc_clp(float(factura.get('amount_total') or 0), factura.get('currency_id'))
+        return amount_total - monto_facturado
+
+    @classmethod
+    def proyeccion_oc(cls, oc: Dict, monto_pendiente: float, distribucion: Optional[List[Dict]],
+                      fecha_inicio: str, fecha_fin: str) -> List[Dict]:
+        """
+        [{fecha, monto}] (montos positivos) con que una OC entra a 1.2.1 en el rango.
+
+        - Pendiente bajo TOLERANCIA_OC_FACTURADA: la OC ya está facturada.
+        - Con distribución manual: sus cuotas, salvo que el pendiente difiera más
+          de TOLERANCIA_REAJUSTE_OC del total distribuido (no se muestra hasta reajustar).
+        - Sin distribución: todo el pendiente en x_studio_fecha_de (fallback date_planned).
+        """
+        if monto_pendiente < cls.TOLERANCIA_OC_FACTURADA:
+            return []
+
+        if distribucion is not None:
+            monto_guardado = sum(float(d.get('monto', 0)) for d in distribucion)
+            if monto_guardado > 0 and abs(monto_pendiente - monto_guardado) / monto_guardado > cls.TOLERANCIA_REAJUSTE_OC:
+                return []
+            cuotas = [(cls._fecha_valida(d.get('fecha')), float(d.get('monto', 0))) for d in distribucion]
+        else:
+            fecha = cls._fecha_valida(oc.get('x_studio_fecha_de')) or cls._fecha_valida(oc.get('date_planned'))
+            cuotas = [(fecha, monto_pendiente)]
+
+        return [
+            {'fecha': fecha, 'monto': monto}
+            for fecha, monto in cuotas
+            if fecha and monto and fecha_inicio <= fecha <= fecha_fin
+        ]
+
+    def leer_oc(self, oc_id: int) -> Optional[Dict]:
+        """
+        Una OC confirmada con lo necesario para proyectarla igual que
+        calcular_pagos_proveedores: monto_pendiente (CLP), categoria y proveedor.
+        """
+        ocs = self.odoo.search_read(
+            'purchase.order',
+            [['id', '=', oc_id], ['state', '=', 'purchase']],
+            self.CAMPOS_OC,
+            limit=1
+        )
+        if not ocs:
+            return None
+        oc = ocs[0]
+
+        invoice_ids = oc.get('invoice_ids') or []
+        facturas_por_id = {}
+        if invoice_ids:
+            facturas = self.odoo.search_read(
+                'account.move',
+                [['id', 'in', invoice_ids]],
+                ['id', 'amount_total', 'currency_id', 'state'],
+                limit=len(invoice_ids)
+            )
+            facturas_por_id = {f['id']: f for f in facturas}
+
+        partner_data = oc.get('partner_id')
+        partner_id = partner_data[0] if isinstance(partner_data, (list, tuple)) and len(partner_data) > 0 else 0
+        partner_name = partner_data[1] if isinstance(partner_data, (list, tuple)) and len(partner_data) > 1 else 'Sin proveedor'
+        categoria = 'Sin Categoría'
+        if partner_id:
+            partners = self.odoo.search_read(
+                'res.partner', [['id', '=', partner_id]], ['id', 'x_studio_categora_de_contacto'], limit=1
+            )
+            if partners:
+                categoria = self._categoria_partner(partners[0])
+
+        return {
+            **oc,
+            'monto_pendiente': self.monto_pendiente_oc(oc, facturas_por_id),
+            'categoria': categoria,
+            'proveedor': partner_name
+        }
+
+    def _acumular_proyeccion_oc(self, estado: Dict, categoria_nombre: str, partner_name: str,
+                                periodo: str, monto: float) -> None:
+        """Suma una cuota de OC en estado → IFRS 3 → categoría → proveedor."""
+        estado['monto'] += monto
+        estado['montos_por_mes'][periodo] += monto
+
+        ifrs3_entry = estado['ifrs3'].setdefault(self.IFRS3_OCS, {
+            'nombre': self.IFRS3_OCS,
+            'monto': 0.0,
+            'montos_por_mes': defaultdict(float),
+            'categorias': {}
+        })
+        ifrs3_entry['monto'] += monto
+        ifrs3_entry['montos_por_mes'][periodo] += monto
+
+        categoria = ifrs3_entry['categorias'].setdefault(categoria_nombre, {
+            'nombre': categoria_nombre,
+            'monto': 0.0,
+            'montos_por_mes': defaultdict(float),
+            'proveedores': {}
+        })
+        categoria['monto'] += monto
+        categoria['montos_por_mes'][periodo] += monto
+
+        proveedor_data = categoria['proveedores'].setdefault(partner_name, {
+            'nombre': partner_name[:50],
+            'monto': 0.0,
+            'montos_por_mes': defaultdict(float)
+        })
+        proveedor_data['monto'] += monto
+        proveedor_data['montos_por_mes'][periodo] += monto
+
     def calcular_pagos_proveedores(self, fecha_inicio: str, fecha_fin: str, meses_lista: List[str] = None) -> Dict:
         """
         Calcula REAL y PROYECTADO para 1.2.1 - Pagos a proveedores.
@@ -526,18 +686,11 @@ class RealProyectadoCalculator:
 
             # PASO 4: Agregar proyecciones desde Módulo Compras (purchase.order)
             # Incluir OCs con facturas parciales también
-            campos_oc = [
-                'id', 'name', 'partner_id', 'amount_total', 'date_order',
-                'date_planned', 'date_approve', 'payment_term_id',
-                'invoice_ids', 'invoice_status', 'currency_id',
-                'x_studio_fecha_de'  # Campo personalizado: Fecha de Pago
-            ]
-
             # Buscar TODAS las OCs confirmadas (con o sin facturas)
             ocs_compra = self.odoo.search_read(
                 'purchase.order',
                 [['state', '=', 'purchase']],
-                campos_oc,
+                self.CAMPOS_OC,
                 limit=10000
             )
             
@@ -633,51 +786,11 @@ class RealProyectadoCalculator:
             ocs_a_eliminar = []
 
             for oc in ocs_compra:
-                invoice_ids = oc.get('invoice_ids') or []
-                
                 oc_id = oc.get('id')
-                amount_total = float(oc.get('amount_total') or 0.0)
+                monto_pendiente = self.monto_pendiente_oc(oc, facturas_por_id)
                 
-                # Convertir moneda si es necesario (USD o UF -> CLP)
-                currency_data = oc.get('currency_id')
-                currency_name = currency_data[1] if isinstance(currency_data, (list, tuple)) and len(currency_data) > 1 else ''
-                if currency_name:
-                    currency_upper = str(currency_name).upper()
-                    if 'USD' in currency_upper:
-                        amount_total = CurrencyService.convert_usd_to_clp(amount_total)
-                    elif 'UF' in currency_upper or 'CLF' in currency_upper:
-                        # CLF mal etiquetado: si monto > 100000, asumir CLP
-                        if amount_total > 100000:
-                            pass  # Ya es CLP
-                        else:
-                            amount_total = CurrencyService.convert_uf_to_clp(amount_total)
-                    
-                # Calcular monto facturado de esta OC
-                monto_facturado = 0.0
-                for inv_id in invoice_ids:
-                    factura = facturas_por_id.get(inv_id)
-                    if factura and factura.get('state') != 'cancel':
-                        inv_amount = float(factura.get('amount_total') or 0)
-                        inv_currency = factura.get('currency_id')
-                        inv_currency_name = inv_currency[1] if isinstance(inv_currency, (list, tuple)) and len(inv_currency) > 1 else ''
-                        
-                        if inv_currency_name:
-                            inv_currency_upper = str(inv_currency_name).upper()
-                            if 'USD' in inv_currency_upper:
-                                inv_amount = CurrencyService.convert_usd_to_clp(inv_amount)
-                            elif 'UF' in inv_currency_upper or 'CLF' in inv_currency_upper:
-                                if inv_amount > 100000:
-                                    pass
-                                else:
-                                    inv_amount = CurrencyService.convert_uf_to_clp(inv_amount)
-                        
-                        monto_facturado += inv_amount
-                
-                # Calcular monto pendiente
-                monto_pendiente = amount_total - monto_facturado
-                
-                # Si está totalmente facturado (tolerancia de $100), marcar para eliminar distribución
-                if monto_pendiente < 100:
+                # Si está totalmente facturado, marcar para eliminar distribución
+                if monto_pendiente < self.TOLERANCIA_OC_FACTURADA:
                     if oc_id in distribuciones_manuales:
                         ocs_a_eliminar.append(oc_id)
                     continue  # No proyectar esta OC
@@ -686,133 +799,23 @@ class RealProyectadoCalculator:
                 partner_id = partner_data[0] if isinstance(partner_data, (list, tuple)) and len(partner_data) > 0 else 0
                 partner_name = partner_data[1] if isinstance(partner_data, (list, tuple)) and len(partner_data) > 1 else 'Sin proveedor'
                 partner_info = partners_info.get(partner_id, {'name': partner_name, 'categoria': 'Sin Categoría'})
-                categoria_nombre = partner_info['categoria']
 
-                # Verificar si existe distribución manual para esta OC
-                if oc_id in distribuciones_manuales:
-                    # Usar distribución manual: múltiples fechas/montos
-                    # Verificar si requiere reajuste (monto cambió más del 1%)
-                    monto_distribucion_guardada = sum(float(d.get('monto', 0)) for d in distribuciones_manuales[oc_id])
-                    
-                    if monto_distribucion_guardada > 0:
-                        diferencia_pct = abs(monto_pendiente - monto_distribucion_guardada) / monto_distribucion_guardada
-                        if diferencia_pct > 0.01:
-                            # Monto cambió más del 1% - NO mostrar en FC hasta que se reajuste
-                            continue
-                    
-                    for dist in distribuciones_manuales[oc_id]:
-                        fecha_dist = dist.get('fecha', '')
-                        monto_dist = float(dist.get('monto', 0))  # Usar monto exacto guardado
-                        
-                        if not fecha_dist or monto_dist == 0:
-                            continue
-                        
-                        try:
-                            fecha_dist_dt = datetime.strptime(fecha_dist, '%Y-%m-%d').date()
-                        except Exception:
-                            continue
-                        
-                        if fecha_dist_dt < fecha_inicio_dt or fecha_dist_dt > fecha_fin_dt:
-                            continue
-                        
-                        periodo_proyectado = self._fecha_a_periodo(fecha_dist, meses_lista)
-                        if not periodo_proyectado:
-                            continue
-                        
-                        monto_proyectado = -monto_dist  # Negativo porque es salida de caja
-                        
-                        proyectado_total += monto_proyectado
-                        proyectado_por_periodo[periodo_proyectado] += monto_proyectado
-                        
-                        estado = estados['PROYECTADAS_COMPRAS']
-                        estado['monto'] += monto_proyectado
-                        estado['montos_por_mes'][periodo_proyectado] += monto_proyectado
-                        
-                        if categoria_nombre not in estado['categorias']:
-                            estado['categorias'][categoria_nombre] = {
-                                'nombre': categoria_nombre,
-                                'monto': 0.0,
-                                'montos_por_mes': defaultdict(float),
-                                'proveedores': {}
-                            }
-                        
-                        categoria = estado['categorias'][categoria_nombre]
-                        categoria['monto'] += monto_proyectado
-                        categoria['montos_por_mes'][periodo_proyectado] += monto_proyectado
-                        
-                        if partner_name not in categoria['proveedores']:
-                            categoria['proveedores'][partner_name] = {
-                                'nombre': partner_name[:50],
-                                'monto': 0.0,
-                                'montos_por_mes': defaultdict(float)
-                            }
-                        
-                        proveedor_data = categoria['proveedores'][partner_name]
-                        proveedor_data['monto'] += monto_proyectado
-                        proveedor_data['montos_por_mes'][periodo_proyectado] += monto_proyectado
-                else:
-                    # Lógica original: usar una sola fecha para todo el monto PENDIENTE
-                    # PRIORIDAD: x_studio_fecha_de (Fecha de Pago), fallback a date_planned
-                    fecha_pago = oc.get('x_studio_fecha_de')
-                    if fecha_pago:
-                        fecha_proyectada = str(fecha_pago)[:10]
-                        try:
-                            fecha_proyectada_dt = datetime.strptime(fecha_proyectada, '%Y-%m-%d').date()
-                        except Exception:
-                            fecha_pago = None  # Fecha inválida, intentar con date_planned
-                    
-                    if not fecha_pago:
-                        # Fallback: usar date_planned
-                        date_planned = oc.get('date_planned')
-                        if date_planned:
-                            fecha_proyectada = str(date_planned)[:10]
-                            try:
-                                fecha_proyectada_dt = datetime.strptime(fecha_proyectada, '%Y-%m-%d').date()
-                            except Exception:
-                                continue  # Si ambas fechas inválidas, omitir OC
-                        else:
-                            continue  # Sin fecha válida, omitir OC
-
-                    if fecha_proyectada_dt < fecha_inicio_dt or fecha_proyectada_dt > fecha_fin_dt:
-                        continue
-
-                    periodo_proyectado = self._fecha_a_periodo(fecha_proyectada, meses_lista)
+                # Distribución manual (múltiples fechas/montos) o pendiente completo en la fecha de pago
+                cuotas = self.proyeccion_oc(
+                    oc, monto_pendiente, distribuciones_manuales.get(oc_id), fecha_inicio, fecha_fin
+                )
+                for cuota in cuotas:
+                    periodo_proyectado = self._fecha_a_periodo(cuota['fecha'], meses_lista)
                     if not periodo_proyectado:
                         continue
 
-                    monto_proyectado = -monto_pendiente  # Usar monto PENDIENTE, no total
-                    if monto_proyectado == 0:
-                        continue
-
+                    monto_proyectado = -cuota['monto']  # Negativo porque es salida de caja
                     proyectado_total += monto_proyectado
                     proyectado_por_periodo[periodo_proyectado] += monto_proyectado
-
-                    estado = estados['PROYECTADAS_COMPRAS']
-                    estado['monto'] += monto_proyectado
-                    estado['montos_por_mes'][periodo_proyectado] += monto_proyectado
-
-                    if categoria_nombre not in estado['categorias']:
-                        estado['categorias'][categoria_nombre] = {
-                            'nombre': categoria_nombre,
-                            'monto': 0.0,
-                            'montos_por_mes': defaultdict(float),
-                            'proveedores': {}
-                        }
-
-                    categoria = estado['categorias'][categoria_nombre]
-                    categoria['monto'] += monto_proyectado
-                    categoria['montos_por_mes'][periodo_proyectado] += monto_proyectado
-
-                    if partner_name not in categoria['proveedores']:
-                        categoria['proveedores'][partner_name] = {
-                            'nombre': partner_name[:50],
-                            'monto': 0.0,
-                            'montos_por_mes': defaultdict(float)
-                        }
-
-                    proveedor_data = categoria['proveedores'][partner_name]
-                    proveedor_data['monto'] += monto_proyectado
-                    proveedor_data['montos_por_mes'][periodo_proyectado] += monto_proyectado
+                    self._acumular_proyeccion_oc(
+                        estados['PROYECTADAS_COMPRAS'], partner_info['categoria'], partner_name,
+                        periodo_proyectado, monto_proyectado
+                    )
             
             # Auto-eliminar distribuciones de OCs totalmente facturadas
             if ocs_a_eliminar:
@@ -2,17 +2,13 @@
 Servicio de Monitor de Producción Diario
 Almacena y gestiona snapshots de procesos para tracking de avance
 """
-import json
-import os
-import logging
-from datetime import datetime, date, timedelta
+import threading
+from datetime import datetime, date
 from typing import Dict, List, Optional, Any
-from pathlib import Path
 
 from shared.odoo_client import OdooClient
-from backend.utils import clean_record
-
-logger = logging.getLogger(__name__)
+from backend.services import monitor_snapshot_store as snapshot_store
+from backend.services import monitor_timeline
 
 
 class MonitorProduccionService:
@@ -21,7 +17,8 @@ class MonitorProduccionService:
     Almacena snapshots para tracking histórico de avance.
     """
     
-    SNAPSHOTS_DIR = Path(__file__).parent.parent / "data" / "monitor_snapshots"
+    # Plantas con snapshot propio en el registro programado
+    PLANTAS = ["RIO FUTURO", "VILKUN", "SAN JOSE"]
     
     # Lista negra de procesos a excluir (no existen en Odoo o son inválidos)
     PROCESOS_EXCLUIDOS = ['MOCS/L01007']
@@ -42,8 +39,6 @@ class MonitorProduccionService:
     
     def __init__(self, username: str = None, password: str = None):
         self.odoo = OdooClient(username=username, password=password)
-        # Crear directorio de snapshots si no existe
-        self.SNAPSHOTS_DIR.mkdir(parents=True, exist_ok=True)
     
     def get_procesos_activos(self, fecha: str, planta: Optional[str] = None,
                              sala: Optional[str] = None, 
@@ -60,41 +55,9 @@ class MonitorProduccionService:
         Returns:
             Dict con procesos activos, estadísticas y metadata
         """
-        # Construir dominio base: TODOS los procesos no cerrados ni cancelados
-        domain = [
-            ['state', 'not in', ['done', 'cancel']]
-        ]
-        
-        # Filtro por sala
-        if sala and sala != "Todas":
-            domain.append(['x_studio_sala_de_proceso', 'ilike', sala])
-        
-        # Filtro por producto
-        if producto and producto != "Todos":
-            domain.append(['product_id', 'ilike', producto])
-        
-        ordenes = self.odoo.search_read(
-            'mrp.production',
-            domain,
-            ['name', 'product_id', 'product_qty', 'qty_produced', 'state', 
-             'date_start', 'date_finished', 'date_planned_start', 'user_id',
-             'x_studio_sala_de_proceso', 'x_studio_inicio_de_proceso',
-             'x_studio_termino_de_proceso', 'x_studio_dotacin'],
-            limit=1000,
-            order='x_studio_inicio_de_proceso desc'
-        )
-        
-        procesos = [clean_record(o) for o in ordenes]
-        
-        # Excluir procesos de la lista negra
-        procesos = [p for p in procesos if p.get('name') not in self.PROCESOS_EXCLUIDOS]
-        
-        # Filtrar solo productos permitidos
-        procesos = [p for p in procesos if self._es_producto_permitido(p)]
-        
-        # Aplicar filtro de planta
-        if planta and planta != "Todas":
-            procesos = self._filtrar_por_planta(procesos, planta)
+        # Foto actual de procesos no cerrados ni cancelados (compartida por todas las vistas)
+        procesos = monitor_timeline.get_procesos_activos(self.odoo, self.PROCESOS_EXCLUIDOS)
+        procesos = self._aplicar_filtros(procesos, planta, sala, producto)
         
         # Calcular estadísticas
         stats = self._calcular_estadisticas(procesos)
@@ -116,7 +79,7 @@ class MonitorProduccionService:
                                    producto: Optional[str] = None) -> Dict[str, Any]:
         """
         Obtiene procesos que se cerraron (pasaron a done) en un rango de fechas.
-        Usa x_studio_termino_de_proceso como campo principal, fallback a date_finished.
+        Usa date_finished (cuándo se cerró el proceso en Odoo).
         
         Args:
             fecha: Fecha inicio en formato YYYY-MM-DD
@@ -131,71 +94,13 @@ class MonitorProduccionService:
         # Usar fecha_fin si se proporciona, sino usar fecha
         fecha_hasta = fecha_fin or fecha
         
-        # Buscar procesos done y filtrar por fecha en Python
-        domain = [
-            ['state', '=', 'done'],
-            '|',
-            ['x_studio_termino_de_proceso', '>=', fecha],
-            ['date_finished', '>=', fecha]
+        # Cerrados por día de cierre en Odoo (date_finished), desde la línea de tiempo
+        procesos = [
+            p
+            for dia in monitor_timeline.get_timeline(self.odoo, fecha, fecha_hasta, self.PROCESOS_EXCLUIDOS)
+            for p in dia["cerrados"]
         ]
-        
-        if sala and sala != "Todas":
-            domain.append(['x_studio_sala_de_proceso', 'ilike', sala])
-        
-        # Filtro por producto
-        if producto and producto != "Todos":
-            domain.append(['product_id', 'ilike', producto])
-        
-        ordenes_raw = self.odoo.search_read(
-            'mrp.production',
-            domain,
-            ['name', 'product_id', 'product_qty', 'qty_produced', 'state', 
-             'date_start', 'date_finished', 'date_planned_start', 'user_id',
-             'x_studio_sala_de_proceso', 'x_studio_inicio_de_proceso',
-             'x_studio_termino_de_proceso'],
-            limit=500,
-            order='x_studio_termino_de_proceso asc'
-        )
-        
-        ordenes_raw = [clean_record(o) for o in ordenes_raw]
-        
-        logger.info(f"[CERRADOS] Fecha: {fecha} a {fecha_hasta}, Procesos raw de Odoo: {len(ordenes_raw)}")
-        for p in ordenes_raw[:5]:
-            logger.info(f"  - {p.get('name')}: termino={p.get('x_studio_termino_de_proceso')}, finished={p.get('date_finished')}")
-        
-        # Filtrar en Python: usar date_finished (cuándo se cerró en Odoo)
-        fecha_hasta_dt = datetime.strptime(fecha_hasta + ' 23:59:59', '%Y-%m-%d %H:%M:%S')
-        fecha_desde_dt = datetime.strptime(fecha, '%Y-%m-%d')
-        procesos = []
-        for p in ordenes_raw:
-            # Usar date_finished para reflejar cuándo se cerró el proceso en el sistema
-            fecha_termino = p.get('date_finished')
-            if not fecha_termino:
-                continue
-            if fecha_termino:
-                try:
-                    if 'T' in str(fecha_termino):
-                        ft = datetime.fromisoformat(str(fecha_termino).replace('Z', '+00:00').split('+')[0])
-                    else:
-                        ft = datetime.strptime(str(fecha_termino)[:19], '%Y-%m-%d %H:%M:%S')
-                    
-                    if fecha_desde_dt <= ft <= fecha_hasta_dt:
-                        procesos.append(p)
-                    else:
-                        logger.debug(f"  Descartado {p.get('name')}: ft={ft} fuera de rango {fecha_desde_dt} - {fecha_hasta_dt}")
-                except Exception as e:
-                    logger.warning(f"  Error parseando fecha para {p.get('name')}: {fecha_termino} - {e}")
-        
-        logger.info(f"[CERRADOS] Procesos filtrados: {len(procesos)}")
-        
-        # Excluir procesos de la lista negra
-        procesos = [p for p in procesos if p.get('name') not in self.PROCESOS_EXCLUIDOS]
-        
-        # Filtrar solo productos permitidos
-        procesos = [p for p in procesos if self._es_producto_permitido(p)]
-        
-        if planta and planta != "Todas":
-            procesos = self._filtrar_por_planta(procesos, planta)
+        procesos = self._aplicar_filtros(procesos, planta, sala, producto)
         
         stats = self._calcular_estadisticas(procesos)
         
@@ -224,134 +129,28 @@ class MonitorProduccionService:
         """
         evolucion = []
         
-        # Obtener todos los procesos creados en el rango (usando x_studio_inicio_de_proceso)
-        domain_creados = [
-            ['state', '!=', 'cancel'],
-            '|',
-            '&', ['x_studio_inicio_de_proceso', '>=', fecha_inicio],
-                 ['x_studio_inicio_de_proceso', '<=', fecha_fin + ' 23:59:59'],
-            '&', ['x_studio_inicio_de_proceso', '=', False],
-            '&', ['date_planned_start', '>=', fecha_inicio],
-                 ['date_planned_start', '<=', fecha_fin + ' 23:59:59']
-        ]
-        
-        if sala and sala != "Todas":
-            domain_creados.append(['x_studio_sala_de_proceso', 'ilike', sala])
-        
-        # Filtro por producto
-        if producto and producto != "Todos":
-            domain_creados.append(['product_id', 'ilike', producto])
-        
-        procesos_creados = self.odoo.search_read(
-            'mrp.production',
-            domain_creados,
-            ['name', 'product_id', 'product_qty', 'qty_produced', 'state',
-             'date_planned_start', 'date_finished', 'x_studio_sala_de_proceso',
-             'x_studio_inicio_de_proceso', 'x_studio_termino_de_proceso'],
-            limit=2000,
-            order='x_studio_inicio_de_proceso asc'
-        )
-        
-        procesos_creados = [clean_record(o) for o in procesos_creados]
-        
-        # Excluir procesos de la lista negra
-        procesos_creados = [p for p in procesos_creados if p.get('name') not in self.PROCESOS_EXCLUIDOS]
-        
-        # Filtrar solo productos permitidos
-        procesos_creados = [p for p in procesos_creados if self._es_producto_permitido(p)]
-        
-        if planta and planta != "Todas":
-            procesos_creados = self._filtrar_por_planta(procesos_creados, planta)
-        
-        # Obtener procesos cerrados en el rango
-        # Buscar todos los done y filtrar en Python por fecha de término
-        domain_cerrados = [
-            ['state', '=', 'done'],
-            '|',
-            ['x_studio_termino_de_proceso', '>=', fecha_inicio],
-            ['date_finished', '>=', fecha_inicio]
-        ]
-        
-        if sala and sala != "Todas":
-            domain_cerrados.append(['x_studio_sala_de_proceso', 'ilike', sala])
-        
-        # Filtro por producto en cerrados también
-        if producto and producto != "Todos":
-            domain_cerrados.append(['product_id', 'ilike', producto])
-        
-        procesos_cerrados_raw = self.odoo.search_read(
-            'mrp.production',
-            domain_cerrados,
-            ['name', 'product_id', 'product_qty', 'qty_produced', 'state',
-             'date_finished', 'x_studio_sala_de_proceso',
-             'x_studio_inicio_de_proceso', 'x_studio_termino_de_proceso'],
-            limit=2000,
-            order='x_studio_termino_de_proceso asc'
-        )
-        
-        procesos_cerrados_raw = [clean_record(o) for o in procesos_cerrados_raw]
-        
-        # Filtrar en Python: usar date_finished (cuándo se cerró en Odoo)
-        fecha_fin_dt = datetime.strptime(fecha_fin + ' 23:59:59', '%Y-%m-%d %H:%M:%S')
-        procesos_cerrados = []
-        for p in procesos_cerrados_raw:
-            # Usar date_finished para reflejar cuándo se cerró el proceso
-            fecha_termino = p.get('date_finished')
-            if not fecha_termino:
-                continue
-            if fecha_termino:
-                # Parsear fecha
-                try:
-                    if 'T' in str(fecha_termino):
-                        ft = datetime.fromisoformat(str(fecha_termino).replace('Z', '+00:00').split('+')[0])
-                    else:
-                        ft = datetime.strptime(str(fecha_termino)[:19], '%Y-%m-%d %H:%M:%S')
-                    
-                    fecha_inicio_dt = datetime.strptime(fecha_inicio, '%Y-%m-%d')
-                    if fecha_inicio_dt <= ft <= fecha_fin_dt:
-                        procesos_cerrados.append(p)
-                except:
-                    pass
-        
-        # Excluir procesos de la lista negra
-        procesos_cerrados = [p for p in procesos_cerrados if p.get('name') not in self.PROCESOS_EXCLUIDOS]
-        
-        # Filtrar solo productos permitidos
-        procesos_cerrados = [p for p in procesos_cerrados if self._es_producto_permitido(p)]
-        
-        if planta and planta != "Todas":
-            procesos_cerrados = self._filtrar_por_planta(procesos_cerrados, planta)
-        
-        # Agrupar por día
-        fecha_actual = datetime.strptime(fecha_inicio, '%Y-%m-%d').date()
-        fecha_final = datetime.strptime(fecha_fin, '%Y-%m-%d').date()
-        
-        while fecha_actual <= fecha_final:
-            fecha_str = fecha_actual.strftime('%Y-%m-%d')
+        for dia in monitor_timeline.get_timeline(self.odoo, fecha_inicio, fecha_fin, self.PROCESOS_EXCLUIDOS):
+            # Creados: grupos de read_group por sala/producto/estado (inicio de proceso)
+            creados_dia = self._aplicar_filtros(dia["creados"], planta, sala, producto)
+            # Cerrados: procesos con date_finished en el día (cuándo se cerró en Odoo)
+            cerrados_dia = self._aplicar_filtros(dia["cerrados"], planta, sala, producto)
             
-            # Contar creados del día (usar x_studio_inicio_de_proceso o date_planned_start)
-            creados_dia = [p for p in procesos_creados 
-                          if (p.get('x_studio_inicio_de_proceso', '') or p.get('date_planned_start', '') or '').startswith(fecha_str)]
-            
-            # Contar cerrados del día (usar date_finished - cuándo se cerró en Odoo)
-            cerrados_dia = [p for p in procesos_cerrados 
-                           if (p.get('date_finished', '') or '').startswith(fecha_str)]
+            procesos_creados = sum(g.get('procesos', 0) for g in creados_dia)
+            procesos_cerrados = len(cerrados_dia)
             
             # Calcular kg
-            kg_creados = sum(p.get('product_qty', 0) or 0 for p in creados_dia)
+            kg_creados = sum(g.get('product_qty', 0) or 0 for g in creados_dia)
             kg_cerrados = sum(p.get('qty_produced', 0) or 0 for p in cerrados_dia)
             
             evolucion.append({
-                "fecha": fecha_str,
-                "fecha_display": fecha_actual.strftime('%d/%m'),
-                "procesos_creados": len(creados_dia),
-                "procesos_cerrados": len(cerrados_dia),
+                "fecha": dia["fecha"],
+                "fecha_display": date.fromisoformat(dia["fecha"]).strftime('%d/%m'),
+                "procesos_creados": procesos_creados,
+                "procesos_cerrados": procesos_cerrados,
                 "kg_programados": kg_creados,
                 "kg_producidos": kg_cerrados,
-                "pendientes_acumulados": len(creados_dia) - len(cerrados_dia)
+                "pendientes_acumulados": procesos_creados - procesos_cerrados
             })
-            
-            fecha_actual += timedelta(days=1)
         
         # Calcular totales
         totales = {
@@ -368,6 +167,40 @@ class MonitorProduccionService:
             "fecha_fin": fecha_fin
         }
     
+    def get_datos_reporte(self, fecha_inicio: str, fecha_fin: str,
+                          planta: Optional[str] = None,
+                          sala: Optional[str] = None,
+                          producto: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Datos del reporte PDF del monitor, derivados de la misma línea de tiempo
+        que las vistas (argumentos de generate_monitor_report_pdf).
+        """
+        activos = self.get_procesos_activos(fecha_fin, planta, sala, producto)
+        cerrados = self.get_procesos_cerrados_dia(fecha_inicio, planta, sala, fecha_fin, producto)
+        evolucion = self.get_evolucion_rango(fecha_inicio, fecha_fin, planta, sala, producto)
+        return {
+            "fecha_inicio": fecha_inicio,
+            "fecha_fin": fecha_fin,
+            "planta": planta or "Todas",
+            "sala": sala or "Todas",
+            "procesos_pendientes": activos["procesos"],
+            "procesos_cerrados": cerrados["procesos"],
+            "evolucion": evolucion["evolucion"],
+            "totales": evolucion["totales"]
+        }
+    
+    def _armar_snapshot(self, fecha: str, planta: Optional[str],
+                        activos: List[Dict], cerrados: List[Dict]) -> Dict[str, Any]:
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "fecha": fecha,
+            "planta": planta or "Todas",
+            "procesos_activos": self._calcular_estadisticas(activos),
+            "procesos_cerrados": self._calcular_estadisticas(cerrados),
+            "detalle_activos": activos,
+            "detalle_cerrados": cerrados
+        }
+    
     def guardar_snapshot(self, fecha: str, planta: Optional[str] = None) -> Dict[str, Any]:
         """
         Guarda un snapshot del estado actual de procesos para una fecha.
@@ -383,62 +216,84 @@ class MonitorProduccionService:
         activos = self.get_procesos_activos(fecha, planta)
         cerrados = self.get_procesos_cerrados_dia(fecha, planta)
         
-        snapshot = {
-            "timestamp": datetime.now().isoformat(),
-            "fecha": fecha,
-            "planta": planta or "Todas",
-            "procesos_activos": activos["estadisticas"],
-            "procesos_cerrados": cerrados["estadisticas"],
-            "detalle_activos": activos["procesos"],
-            "detalle_cerrados": cerrados["procesos"]
-        }
-        
-        # Guardar en archivo JSON
-        filename = f"snapshot_{fecha}_{planta or 'todas'}_{datetime.now().strftime('%H%M%S')}.json"
-        filepath = self.SNAPSHOTS_DIR / filename
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(snapshot, f, ensure_ascii=False, indent=2, default=str)
+        snapshot = self._armar_snapshot(fecha, planta, activos["procesos"], cerrados["procesos"])
+        snapshot_id = snapshot_store.guardar(snapshot, origen="manual")
         
         return {
             "success": True,
-            "filename": filename,
-            "filepath": str(filepath),
+            "id": snapshot_id,
             "snapshot": snapshot
         }
     
+    def guardar_snapshots_programados(self, fecha: Optional[str] = None) -> int:
+        """
+        Registra un snapshot por planta (y uno consolidado) con una sola
+        consulta de activos y cerrados; el filtro por planta se aplica local.
+        """
+        fecha = fecha or date.today().isoformat()
+        activos = self.get_procesos_activos(fecha)["procesos"]
+        cerrados = self.get_procesos_cerrados_dia(fecha)["procesos"]
+        
+        snapshots = [self._armar_snapshot(fecha, None, activos, cerrados)]
+        for planta in self.PLANTAS:
+            snapshots.append(self._armar_snapshot(
+                fecha, planta,
+                self._filtrar_por_planta(activos, planta),
+                self._filtrar_por_planta(cerrados, planta)
+            ))
+        return snapshot_store.guardar_lote(snapshots, origen="programado")
+    
     def obtener_snapshots(self, fecha: Optional[str] = None, 
-                          limit: int = 50) -> List[Dict[str, Any]]:
+                          limit: int = 50,
+                          planta: Optional[str] = None,
+                          fecha_inicio: Optional[str] = None,
+                          fecha_fin: Optional[str] = None,
+                          incluir_detalle: bool = True) -> List[Dict[str, Any]]:
         """
-        Obtiene snapshots guardados.
+        Obtiene snapshots guardados (más recientes primero).
         
         Args:
             fecha: Filtrar por fecha específica (opcional)
             limit: Límite de resultados
+            planta: Filtrar por planta (opcional)
+            fecha_inicio: Inicio del rango YYYY-MM-DD (si no se da fecha)
+            fecha_fin: Fin del rango YYYY-MM-DD (si no se da fecha)
+            incluir_detalle: Incluir el detalle de procesos de cada snapshot
         
         Returns:
             Lista de snapshots
         """
-        snapshots = []
+        return snapshot_store.consultar(
+            fecha_desde=fecha or fecha_inicio,
+            fecha_hasta=fecha or fecha_fin,
+            planta=planta,
+            limit=limit,
+            incluir_detalle=incluir_detalle
+        )
+    
+    def get_evolucion_snapshots(self, fecha_inicio: str, fecha_fin: str,
+                                planta: Optional[str] = None,
+                                grano: str = "hora") -> Dict[str, Any]:
+        """
+        Evolución del avance según los snapshots registrados (último por hora o día).
         
-        # Listar archivos JSON
-        for filepath in sorted(self.SNAPSHOTS_DIR.glob("snapshot_*.json"), reverse=True):
-            if len(snapshots) >= limit:
-                break
-            
-            # Filtrar por fecha si se especifica
-            if fecha and fecha not in filepath.name:
-                continue
-            
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    data["_filename"] = filepath.name
-                    snapshots.append(data)
-            except Exception as e:
-                continue
-        
-        return snapshots
+        Args:
+            fecha_inicio: Fecha inicio YYYY-MM-DD
+            fecha_fin: Fecha fin YYYY-MM-DD
+            planta: Planta (None = Todas)
+            grano: 'hora' o 'dia'
+        
+        Returns:
+            Dict con la serie por periodo
+        """
+        serie = snapshot_store.evolucion(fecha_inicio, fecha_fin, planta or "Todas", grano)
+        return {
+            "evolucion": serie,
+            "fecha_inicio": fecha_inicio,
+            "fecha_fin": fecha_fin,
+            "planta": planta or "Todas",
+            "grano": grano
+        }
     
     def get_salas_disponibles(self) -> List[str]:
         """Obtiene la lista de salas de proceso disponibles."""
@@ -469,6 +324,31 @@ class MonitorProduccionService:
         except Exception:
             return []
     
+    def _aplicar_filtros(self, procesos: List[Dict], planta: Optional[str] = None,
+                         sala: Optional[str] = None,
+                         producto: Optional[str] = None) -> List[Dict]:
+        """
+        Filtros del monitor sobre procesos o grupos de la línea de tiempo:
+        productos permitidos, sala y producto exactos ("Sala 1" no incluye
+        "Sala 10"; el producto por nombre o id) y planta.
+        """
+        procesos = [p for p in procesos if self._es_producto_permitido(p)]
+        
+        if sala and sala != "Todas":
+            sala_n = self._normalizar(sala)
+            procesos = [p for p in procesos
+                        if self._normalizar(p.get('x_studio_sala_de_proceso')) == sala_n]
+        
+        if producto and producto != "Todos":
+            producto_n = self._normalizar(producto)
+            procesos = [p for p in procesos
+                        if producto_n in (self._normalizar(self._nombre_producto(p)),
+                                          str(self._id_producto(p)))]
+        
+        if planta and planta != "Todas":
+            procesos = self._filtrar_por_planta(procesos, planta)
+        return procesos
+    
     def _filtrar_por_planta(self, procesos: List[Dict], planta: str) -> List[Dict]:
         """
         Filtra procesos por planta basándose en la SALA de proceso.
@@ -529,19 +409,32 @@ class MonitorProduccionService:
             "por_sala": salas
         }
     
-    def _es_producto_permitido(self, proceso: Dict) -> bool:
-        """Verifica si el proceso tiene un producto permitido."""
+    def _nombre_producto(self, proceso: Dict) -> str:
+        """Nombre del producto de un proceso (many2one como lista o dict)."""
         producto = proceso.get('product_id')
-        if not producto:
-            return False
-        
-        # Obtener el nombre del producto
-        nombre_producto = None
         if isinstance(producto, (list, tuple)) and len(producto) > 1:
-            nombre_producto = producto[1]
-        elif isinstance(producto, dict):
-            nombre_producto = producto.get('name', '')
-        
+            return producto[1] or ''
+        if isinstance(producto, dict):
+            return producto.get('name', '') or ''
+        return ''
+    
+    def _id_producto(self, proceso: Dict) -> Optional[int]:
+        """ID del producto de un proceso (many2one como lista o dict)."""
+        producto = proceso.get('product_id')
+        if isinstance(producto, (list, tuple)) and producto:
+            return producto[0]
+        if isinstance(producto, dict):
+            return producto.get('id')
+        return None
+    
+    @staticmethod
+    def _normalizar(valor: Any) -> str:
+        """Texto comparable de una sala o producto (sin espacios extremos ni mayúsculas)."""
+        return str(valor or '').strip().casefold()
+    
+    def _es_producto_permitido(self, proceso: Dict) -> bool:
+        """Verifica si el proceso tiene un producto permitido."""
+        nombre_producto = self._nombre_producto(proceso)
         if not nombre_producto:
             return False
         
@@ -561,55 +454,13 @@ class MonitorProduccionService:
         Returns:
             Dict con datos por línea y resumen general
         """
-        # Buscar procesos terminados en el rango
-        domain = [
-            ['state', '=', 'done'],
-            '|',
-            ['x_studio_termino_de_proceso', '>=', fecha_inicio],
-            ['date_finished', '>=', fecha_inicio]
+        # Procesos terminados en el rango (misma línea de tiempo que el monitor)
+        procesos = [
+            p
+            for dia in monitor_timeline.get_timeline(self.odoo, fecha_inicio, fecha_fin, self.PROCESOS_EXCLUIDOS)
+            for p in dia["cerrados"]
         ]
-        
-        procesos_raw = self.odoo.search_read(
-            'mrp.production',
-            domain,
-            ['name', 'product_id', 'product_qty', 'qty_produced', 'state',
-             'date_start', 'date_finished', 'x_studio_sala_de_proceso',
-             'x_studio_inicio_de_proceso', 'x_studio_termino_de_proceso'],
-            limit=2000,
-            order='x_studio_termino_de_proceso desc'
-        )
-        
-        procesos_raw = [clean_record(o) for o in procesos_raw]
-        
-        # Filtrar por fecha fin
-        fecha_fin_dt = datetime.strptime(fecha_fin + ' 23:59:59', '%Y-%m-%d %H:%M:%S')
-        fecha_inicio_dt = datetime.strptime(fecha_inicio, '%Y-%m-%d')
-        
-        procesos = []
-        for p in procesos_raw:
-            fecha_termino = p.get('date_finished') or p.get('x_studio_termino_de_proceso')
-            if not fecha_termino:
-                continue
-            try:
-                if 'T' in str(fecha_termino):
-                    ft = datetime.fromisoformat(str(fecha_termino).replace('Z', '+00:00').split('+')[0])
-                else:
-                    ft = datetime.strptime(str(fecha_termino)[:19], '%Y-%m-%d %H:%M:%S')
-                
-                if fecha_inicio_dt <= ft <= fecha_fin_dt:
-                    procesos.append(p)
-            except:
-                pass
-        
-        # Excluir procesos de la lista negra
-        procesos = [p for p in procesos if p.get('name') not in self.PROCESOS_EXCLUIDOS]
-        
-        # Filtrar solo productos permitidos
-        procesos = [p for p in procesos if self._es_producto_permitido(p)]
-        
-        # Filtrar por planta
-        if planta and planta != "Todas":
-            procesos = self._filtrar_por_planta(procesos, planta)
+        procesos = self._aplicar_filtros(procesos, planta)
         
         # Agrupar por sala y calcular KG/Hora
         salas_data = {}
@@ -695,3 +546,39 @@ class MonitorProduccionService:
                 "fecha_fin": fecha_fin
             }
         }
+
+
+# ============ REGISTRO PROGRAMADO DE SNAPSHOTS (HILO DE FONDO) ============
+
+SNAPSHOT_INTERVAL_SECONDS = 3600
+
+_scheduler_stop = threading.Event()
+_scheduler_thread: Optional[threading.Thread] = None
+
+
+def _scheduler_loop() -> None:
+    """Registra snapshots de todas las plantas cada SNAPSHOT_INTERVAL_SECONDS."""
+    while not _scheduler_stop.is_set():
+        try:
+            # Credenciales técnicas del entorno (ODOO_USER / ODOO_PASSWORD)
+            service = MonitorProduccionService()
+            total = service.guardar_snapshots_programados()
+            print(f"[MonitorSnapshots] Registrados {total} snapshots programados")
+        except Exception as exc:
+            print(f"[MonitorSnapshots] Error registrando snapshots programados: {exc}")
+        if _scheduler_stop.wait(SNAPSHOT_INTERVAL_SECONDS):
+            return
+
+
+def start_snapshot_scheduler() -> None:
+    """Inicia el hilo que registra snapshots del monitor periódicamente."""
+    global _scheduler_thread
+    if _scheduler_thread and _scheduler_thread.is_alive():
+        return
+    _scheduler_stop.clear()
+    _scheduler_thread = threading.Thread(target=_scheduler_loop, name="monitor-snapshots", daemon=True)
+    _scheduler_thread.start()
+
+
+def stop_snapshot_scheduler() -> None:
+    _scheduler_stop.set()
@@ -0,0 +1,267 @@
+"""
+Store de snapshots del monitor de producción.
+
+Antes cada snapshot era un JSON indentado en data/monitor_snapshots y el
+historial se armaba globbeando el directorio y parseando archivo por archivo.
+Aquí los snapshots se agregan (append-only) a una tabla SQLite indexada por
+(fecha, planta, timestamp):
+
+- las estadísticas principales van en columnas, así los rangos y la evolución
+  se calculan en SQL sin tocar el detalle
+- el detalle de procesos (activos y cerrados) va como JSON compacto en una
+  columna aparte y solo se parsea cuando se pide
+
+Los JSON legacy del directorio se importan una sola vez al crear la tabla.
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+SNAPSHOT_DB = Path(__file__).parent.parent / "data" / "monitor_snapshots.db"
+LEGACY_DIR = Path(__file__).parent.parent / "data" / "monitor_snapshots"
+
+# Granularidad de la serie de evolución -> largo del prefijo de timestamp ISO
+GRANOS = {"hora": 13, "dia": 10}
+
+_db_lock = threading.Lock()
+_schema_initialized = False
+
+
+def _get_connection() -> sqlite3.Connection:
+    conn = sqlite3.connect(SNAPSHOT_DB, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _ensure_db() -> None:
+    global _schema_initialized
+    if _schema_initialized:
+        return
+    with _db_lock:
+        if _schema_initialized:
+            return
+        SNAPSHOT_DB.parent.mkdir(parents=True, exist_ok=True)
+        conn = _get_connection()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS monitor_snapshots (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    fecha TEXT NOT NULL,
+                    planta TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    origen TEXT NOT NULL DEFAULT 'manual',
+                    activos_total INTEGER NOT NULL DEFAULT 0,
+                    activos_kg_programados REAL NOT NULL DEFAULT 0,
+                    activos_kg_producidos REAL NOT NULL DEFAULT 0,
+                    activos_kg_pendientes REAL NOT NULL DEFAULT 0,
+                    activos_avance REAL NOT NULL DEFAULT 0,
+                    cerrados_total INTEGER NOT NULL DEFAULT 0,
+                    cerrados_kg_programados REAL NOT NULL DEFAULT 0,
+                    cerrados_kg_producidos REAL NOT NULL DEFAULT 0,
+                    estadisticas TEXT NOT NULL,
+                    detalle TEXT
+                );
+
+                CREATE INDEX IF NOT EXISTS idx_monitor_snapshots_fecha_planta_ts
+                    ON monitor_snapshots(fecha, planta, timestamp);
+                CREATE INDEX IF NOT EXISTS idx_monitor_snapshots_planta_ts
+                    ON monitor_snapshots(planta, timestamp);
+                """
+            )
+            conn.commit()
+            vacia = conn.execute("SELECT 1 FROM monitor_snapshots LIMIT 1").fetchone() is None
+        finally:
+            conn.close()
+        if vacia:
+            _importar_legacy()
+        _schema_initialized = True
+
+
+def _fila(snapshot: Dict[str, Any], origen: str) -> tuple:
+    activos = snapshot.get("procesos_activos") or {}
+    cerrados = snapshot.get("procesos_cerrados") or {}
+    estadisticas = {"procesos_activos": activos, "procesos_cerrados": cerrados}
+    detalle = {
+        "detalle_activos": snapshot.get("detalle_activos") or [],
+        "detalle_cerrados": snapshot.get("detalle_cerrados") or [],
+    }
+    return (
+        str(snapshot.get("fecha") or ""),
+        str(snapshot.get("planta") or "Todas"),
+        str(snapshot.get("timestamp") or datetime.now().isoformat()),
+        origen,
+        int(activos.get("total_procesos") or 0),
+        float(activos.get("kg_programados") or 0),
+        float(activos.get("kg_producidos") or 0),
+        float(activos.get("kg_pendientes") or 0),
+        float(activos.get("avance_porcentaje") or 0),
+        int(cerrados.get("total_procesos") or 0),
+        float(cerrados.get("kg_programados") or 0),
+        float(cerrados.get("kg_producidos") or 0),
+        json.dumps(estadisticas, ensure_ascii=False, separators=(",", ":"), default=str),
+        json.dumps(detalle, ensure_ascii=False, separators=(",", ":"), default=str),
+    )
+
+
+_INSERT = (
+    "INSERT INTO monitor_snapshots (fecha, planta, timestamp, origen, "
+    "activos_total, activos_kg_programados, activos_kg_producidos, activos_kg_pendientes, activos_avance, "
+    "cerrados_total, cerrados_kg_programados, cerrados_kg_producidos, estadisticas, detalle) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def _importar_legacy() -> None:
+    """Importa los snapshot_*.json del directorio antiguo (solo con la tabla vacía)."""
+    if not LEGACY_DIR.is_dir():
+        return
+    filas = []
+    for filepath in sorted(LEGACY_DIR.glob("snapshot_*.json")):
+        try:
+            with open(filepath, "r", encoding="utf-8") as f:
+                filas.append(_fila(json.load(f), "legacy"))
+        except Exception as e:
+            print(f"[MonitorSnapshots] No se pudo importar {filepath.name}: {e}")
+    if not filas:
+        return
+    conn = _get_connection()
+    try:
+        with conn:
+            conn.executemany(_INSERT, filas)
+    finally:
+        conn.close()
+    print(f"[MonitorSnapshots] Importados {len(filas)} snapshots JSON legacy")
+
+
+def guardar(snapshot: Dict[str, Any], origen: str = "manual") -> int:
+    """Agrega un snapshot y retorna su id."""
+    _ensure_db()
+    conn = _get_connection()
+    try:
+        with conn:
+            cursor = conn.execute(_INSERT, _fila(snapshot, origen))
+        return int(cursor.lastrowid)
+    finally:
+        conn.close()
+
+
+def guardar_lote(snapshots: List[Dict[str, Any]], origen: str = "programado") -> int:
+    """Agrega varios snapshots en una sola transacción."""
+    if not snapshots:
+        return 0
+    _ensure_db()
+    conn = _get_connection()
+    try:
+        with conn:
+            conn.executemany(_INSERT, [_fila(s, origen) for s in snapshots])
+    finally:
+        conn.close()
+    return len(snapshots)
+
+
+def _filtros(fecha_desde: Optional[str], fecha_hasta: Optional[str],
+             planta: Optional[str]) -> tuple:
+    where, params = [], []
+    if fecha_desde:
+        where.append("fecha >= ?")
+        params.append(fecha_desde)
+    if fecha_hasta:
+        where.append("fecha <= ?")
+        params.append(fecha_hasta)
+    if planta:
+        where.append("planta = ?")
+        params.append(planta)
+    return (" WHERE " + " AND ".join(where)) if where else "", params
+
+
+def consultar(fecha_desde: Optional[str] = None, fecha_hasta: Optional[str] = None,
+              planta: Optional[str] = None, limit: int = 50,
+              incluir_detalle: bool = True) -> List[Dict[str, Any]]:
+    """
+    Snapshots en el rango de fechas (más recientes primero), con el mismo
+    formato que guardaba el monitor en JSON.
+    """
+    _ensure_db()
+    where, params = _filtros(fecha_desde, fecha_hasta, planta)
+    columnas = "id, fecha, planta, timestamp, origen, estadisticas" + (", detalle" if incluir_detalle else "")
+    conn = _get_connection()
+    try:
+        rows = conn.execute(
+            f"SELECT {columnas} FROM monitor_snapshots{where} ORDER BY timestamp DESC, id DESC LIMIT ?",
+            (*params, int(limit)),
+        ).fetchall()
+    finally:
+        conn.close()
+
+    snapshots = []
+    for row in rows:
+        snapshot = {
+            "id": row["id"],
+            "timestamp": row["timestamp"],
+            "fecha": row["fecha"],
+            "planta": row["planta"],
+            "origen": row["origen"],
+            **json.loads(row["estadisticas"]),
+        }
+        if incluir_detalle:
+            snapshot.update(json.loads(row["detalle"] or "{}"))
+        snapshots.append(snapshot)
+    return snapshots
+
+
+def evolucion(fecha_desde: str, fecha_hasta: str, planta: str = "Todas",
+              grano: str = "hora") -> List[Dict[str, Any]]:
+    """
+    Serie de avance calculada en SQL: por cada hora (o día) se toma el último
+    snapshot del periodo. avance_kg es la variación de kg producidos de los
+    procesos activos respecto al periodo anterior.
+    """
+    if grano not in GRANOS:
+        raise ValueError(f"grano debe ser uno de {sorted(GRANOS)}")
+    _ensure_db()
+    where, params = _filtros(fecha_desde, fecha_hasta, planta)
+    conn = _get_connection()
+    try:
+        rows = conn.execute(
+            f"""
+            SELECT periodo, timestamp, activos_total, activos_kg_programados, activos_kg_producidos,
+                   activos_kg_pendientes, activos_avance, cerrados_total, cerrados_kg_producidos,
+                   activos_kg_producidos - LAG(activos_kg_producidos, 1, activos_kg_producidos)
+                       OVER (ORDER BY periodo) AS avance_kg,
+                   snapshots
+            FROM (
+                SELECT substr(timestamp, 1, ?) AS periodo, timestamp,
+                       activos_total, activos_kg_programados, activos_kg_producidos,
+                       activos_kg_pendientes, activos_avance, cerrados_total, cerrados_kg_producidos,
+                       ROW_NUMBER() OVER (PARTITION BY substr(timestamp, 1, ?) ORDER BY timestamp DESC, id DESC) AS rn,
+                       COUNT(*) OVER (PARTITION BY substr(timestamp, 1, ?)) AS snapshots
+                FROM monitor_snapshots{where}
+            )
+            WHERE rn = 1
+            ORDER BY periodo
+            """,
+            (GRANOS[grano], GRANOS[grano], GRANOS[grano], *params),
+        ).fetchall()
+    finally:
+        conn.close()
+    return [dict(row) for row in rows]
+
+
+def get_stats() -> Dict[str, Any]:
+    _ensure_db()
+    conn = _get_connection()
+    try:
+        row = conn.execute(
+            "SELECT COUNT(*) AS total, MIN(timestamp) AS desde, MAX(timestamp) AS hasta FROM monitor_snapshots"
+        ).fetchone()
+    finally:
+        conn.close()
+    return dict(row)
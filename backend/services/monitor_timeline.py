@@ -0,0 +1,229 @@
+"""
+Línea de tiempo de eventos de producción (mrp.production) para el monitor diario.
+
+Todas las vistas del monitor (activos, cerrados, evolución, KG/hora por línea
+y el reporte PDF) se derivan de aquí, en vez de que cada una consulte Odoo
+por su cuenta sobre las mismas fechas:
+
+- creados: read_group en servidor por día de inicio / sala / producto / estado
+  (inicio = x_studio_inicio_de_proceso, o date_planned_start si no tiene)
+- cerrados: procesos done por día de date_finished (registros livianos, porque
+  KG/hora necesita la duración de cada proceso)
+- activos: procesos no cerrados ni cancelados (foto actual, TTL corto)
+
+Cada día se cachea por separado junto con su firma: por serie, la cantidad de
+procesos y el último write_date del día (un read_group liviano por serie,
+cacheado TTL_FIRMAS). Un día pasado no es inmutable: un proceso que cambia de
+estado, de sala o de día, o que se cancela, cambia la firma de los días
+involucrados y solo esos días se vuelven a consultar, con una llamada por serie
+para el tramo que los cubre.
+
+Los filtros (planta, sala, producto, productos permitidos) se aplican en el
+servicio sobre estos datos; aquí solo se excluye la lista negra de procesos.
+"""
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+from backend.cache import get_cache
+from backend.utils import clean_record
+
+
+TTL_DIA = 86400  # el día se revalida con su firma, el TTL solo acota la memoria
+TTL_FIRMAS = 60
+TTL_ACTIVOS = 60
+
+PROCESO_FIELDS = [
+    'name', 'product_id', 'product_qty', 'qty_produced', 'state',
+    'date_start', 'date_finished', 'date_planned_start', 'user_id',
+    'x_studio_sala_de_proceso', 'x_studio_inicio_de_proceso',
+    'x_studio_termino_de_proceso'
+]
+ACTIVO_FIELDS = PROCESO_FIELDS + ['x_studio_dotacin']
+
+GRUPO_KEYS = ['x_studio_sala_de_proceso', 'product_id', 'state']
+# Los dominios y los cerrados (date_finished[:10]) son UTC: los grupos ':day' también
+CONTEXTO_UTC = {'context': {'tz': 'UTC'}}
+
+
+def _dias(fecha_inicio: str, fecha_fin: str) -> List[str]:
+    ini = date.fromisoformat(fecha_inicio[:10])
+    fin = date.fromisoformat(fecha_fin[:10])
+    return [(ini + timedelta(days=i)).isoformat() for i in range((fin - ini).days + 1)]
+
+
+def _dia_de_grupo(grupo: Dict[str, Any], campo: str) -> Optional[str]:
+    """
+    Día (YYYY-MM-DD) de un grupo 'campo:day' de read_group. La etiqueta del
+    grupo depende del idioma del usuario, así que se usa el rango del grupo.
+    """
+    rango = (grupo.get('__range') or {}).get(f'{campo}:day')
+    if rango and rango.get('from'):
+        return str(rango['from'])[:10]
+    for termino in grupo.get('__domain') or []:
+        if isinstance(termino, (list, tuple)) and len(termino) == 3 \
+                and termino[0] == campo and termino[1] == '>=':
+            return str(termino[2])[:10]
+    return None
+
+
+def _series_creados(desde: str, hasta: str, excluidos: List[str]) -> List[tuple]:
+    """(campo de día, dominio) de cada serie de creados: inicio de proceso o, si no tiene, fecha planificada."""
+    hasta_ts = hasta + ' 23:59:59'
+    base = [['state', '!=', 'cancel'], ['name', 'not in', excluidos]]
+    return [
+        ('x_studio_inicio_de_proceso', base + [
+            ['x_studio_inicio_de_proceso', '>=', desde],
+            ['x_studio_inicio_de_proceso', '<=', hasta_ts],
+        ]),
+        ('date_planned_start', base + [
+            ['x_studio_inicio_de_proceso', '=', False],
+            ['date_planned_start', '>=', desde],
+            ['date_planned_start', '<=', hasta_ts],
+        ]),
+    ]
+
+
+def _dominio_cerrados(desde: str, hasta: str, excluidos: List[str]) -> List:
+    return [
+        ['state', '=', 'done'],
+        ['name', 'not in', excluidos],
+        ['date_finished', '>=', desde],
+        ['date_finished', '<=', hasta + ' 23:59:59'],
+    ]
+
+
+def _creados_por_dia(odoo, desde: str, hasta: str, excluidos: List[str]) -> Dict[str, List[Dict]]:
+    """Procesos creados agrupados en servidor por día / sala / producto / estado."""
+    por_dia: Dict[str, List[Dict]] = {}
+    for campo, dominio in _series_creados(desde, hasta, excluidos):
+        grupos = odoo.execute(
+            'mrp.production', 'read_group',
+            dominio,
+            ['product_qty:sum'],
+            [f'{campo}:day'] + GRUPO_KEYS,
+            lazy=False,
+            **CONTEXTO_UTC
+        )
+        for g in grupos:
+            dia = _dia_de_grupo(g, campo)
+            if not dia:
+                continue
+            por_dia.setdefault(dia, []).append({
+                'x_studio_sala_de_proceso': g.get('x_studio_sala_de_proceso') or False,
+                'product_id': g.get('product_id') or False,
+                'state': g.get('state'),
+                'procesos': g.get('__count', 0) or 0,
+                'product_qty': g.get('product_qty', 0) or 0,
+            })
+    return por_dia
+
+
+def _cerrados_por_dia(odoo, desde: str, hasta: str, excluidos: List[str]) -> Dict[str, List[Dict]]:
+    """Procesos done por día de cierre en Odoo (date_finished)."""
+    procesos = odoo.search_read(
+        'mrp.production',
+        _dominio_cerrados(desde, hasta, excluidos),
+        PROCESO_FIELDS,
+        order='date_finished asc'
+    )
+    por_dia: Dict[str, List[Dict]] = {}
+    for p in procesos:
+        p = clean_record(p)
+        dia = str(p.get('date_finished') or '')[:10]
+        if dia:
+            por_dia.setdefault(dia, []).append(p)
+    return por_dia
+
+
+def _firmas_por_dia(odoo, desde: str, hasta: str, excluidos: List[str]) -> Dict[str, str]:
+    """
+    Firma de cada día del rango: "cantidad@último write_date" de cada serie.
+    Los días sin procesos no aparecen (firma vacía).
+    """
+    consultas = _series_creados(desde, hasta, excluidos)
+    consultas.append(('date_finished', _dominio_cerrados(desde, hasta, excluidos)))
+    partes: Dict[str, List[str]] = {}
+    for i, (campo, dominio) in enumerate(consultas):
+        grupos = odoo.execute(
+            'mrp.production', 'read_group',
+            dominio,
+            ['write_date:max'],
+            [f'{campo}:day'],
+            lazy=False,
+            **CONTEXTO_UTC
+        )
+        for g in grupos:
+            dia = _dia_de_grupo(g, campo)
+            if dia:
+                partes.setdefault(dia, [''] * len(consultas))[i] = f"{g.get('__count', 0)}@{g.get('write_date') or ''}"
+    return {dia: '|'.join(p) for dia, p in partes.items()}
+
+
+def get_timeline(odoo, fecha_inicio: str, fecha_fin: str,
+                 excluidos: List[str]) -> List[Dict[str, Any]]:
+    """
+    Eventos por día del rango: [{"fecha", "creados": [grupos], "cerrados": [procesos]}].
+
+    Solo consulta Odoo por el tramo de días sin caché o cuya firma cambió.
+    """
+    cache = get_cache()
+    dias = _dias(fecha_inicio, fecha_fin)
+
+    firmas_key = cache._make_key('monitor_timeline_firmas', fecha_inicio[:10], fecha_fin[:10], *excluidos)
+    firmas = cache.get(firmas_key)
+    if firmas is None:
+        firmas = _firmas_por_dia(odoo, dias[0], dias[-1], excluidos)
+        cache.set(firmas_key, firmas, ttl=TTL_FIRMAS)
+
+    timeline: Dict[str, Dict[str, Any]] = {}
+    faltantes = []
+    for dia in dias:
+        cached = cache.get(cache._make_key('monitor_timeline', dia, *excluidos))
+        if cached is not None and cached['firma'] == firmas.get(dia, ''):
+            timeline[dia] = cached['evento']
+        else:
+            faltantes.append(dia)
+
+    if faltantes:
+        desde, hasta = faltantes[0], faltantes[-1]
+        creados = _creados_por_dia(odoo, desde, hasta, excluidos)
+        cerrados = _cerrados_por_dia(odoo, desde, hasta, excluidos)
+        for dia in _dias(desde, hasta):
+            evento = {
+                'fecha': dia,
+                'creados': creados.get(dia, []),
+                'cerrados': cerrados.get(dia, []),
+            }
+            timeline[dia] = evento
+            cache.set(
+                cache._make_key('monitor_timeline', dia, *excluidos),
+                {'firma': firmas.get(dia, ''), 'evento': evento},
+                ttl=TTL_DIA
+            )
+        print(f"[MonitorTimeline] {len(faltantes)} días consultados a Odoo ({desde} a {hasta})")
+
+    return [timeline[dia] for dia in dias]
+
+
+def get_procesos_activos(odoo, excluidos: List[str]) -> List[Dict[str, Any]]:
+    """Procesos no cerrados ni cancelados (foto actual, cacheada TTL_ACTIVOS)."""
+    cache = get_cache()
+    key = cache._make_key('monitor_timeline_activos', *excluidos)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    ordenes = odoo.search_read(
+        'mrp.production',
+        [['state', 'not in', ['done', 'cancel']], ['name', 'not in', excluidos]],
+        ACTIVO_FIELDS,
+        order='x_studio_inicio_de_proceso desc'
+    )
+    procesos = [clean_record(o) for o in ordenes]
+    cache.set(key, procesos, ttl=TTL_ACTIVOS)
+    return procesos
+
+
+def invalidar() -> int:
+    """Descarta la línea de tiempo cacheada (p.ej. tras corregir procesos en Odoo)."""
+    cache = get_cache()
+    return cache.invalidate_prefix('monitor_timeline')
@@ -21,6 +21,15 @@ ALGORITMO:
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 import re
+import time
+
+
+TAMANO_LOTE = 500
+
+CAMPOS_KG = ['x_studio_kg_totales_po', 'x_studio_kg_consumidos_po', 'x_studio_kg_disponibles_po']
+CAMPOS_ODF = ['id', 'name', 'x_studio_po_asociada', 'product_id', 'state'] + CAMPOS_KG
+CAMPOS_MOVE = ['id', 'product_id', 'product_uom_qty', 'quantity_done', 'state']
+CAMPOS_SO_LINE = ['id', 'order_id', 'product_id', 'product_uom_qty', 'qty_delivered']
 
 
 class ODFReconciliationService:
@@ -109,10 +118,13 @@ class ODFReconciliationService:
         so_lines = self.odoo.search_read(
             'sale.order.line',
             [['order_id', 'in', so_ids]],
-            ['id', 'order_id', 'product_id', 'product_uom_qty', 'qty_delivered']
+            CAMPOS_SO_LINE
         )
         
-        # Agrupar por producto
+        return self._agrupar_lineas_so(so_lines, so_by_id)
+    
+    def _agrupar_lineas_so(self, so_lines: List[Dict], so_by_id: Dict[int, Dict]) -> Dict[int, Dict]:
+        """Agrupa líneas de SO por producto (estructura de get_so_lines)."""
         productos_dict = {}
         
         for line in so_lines:
@@ -170,9 +182,13 @@ class ODFReconciliationService:
                 ['production_id', '=', odf_id],
                 ['location_dest_id.usage', '=', 'internal']
             ],
-            ['id', 'product_id', 'product_uom_qty', 'quantity_done', 'state']
+            CAMPOS_MOVE
         )
         
+        return self._agrupar_subproductos(finished_moves)
+    
+    def _agrupar_subproductos(self, finished_moves: List[Dict]) -> Dict[int, Dict]:
+        """Agrupa los moves terminados por producto (estructura de get_subproductos_odf)."""
         subproductos = {}
         
         for move in finished_moves:
@@ -200,86 +216,31 @@ class ODFReconciliationService:
         
         return subproductos
     
+    
     # ========================================
     # RECONCILIACIÓN Y CÁLCULO
     # ========================================
     
-    def reconciliar_odf(self, odf_id: int, dry_run: bool = False) -> Dict:
+    def _calcular_reconciliacion(
+        self,
+        odf: Dict,
+        productos_so: Dict[int, Dict],
+        subproductos: Dict[int, Dict]
+    ) -> Tuple[Dict, Optional[Dict]]:
         """
-        Reconcilia una ODF con sus Sale Orders asociadas.
-        Calcula KG totales, consumidos y disponibles.
-        
-        Args:
-            odf_id: ID de la ODF
-            dry_run: Si True, solo calcula sin escribir a Odoo
+        Calcula la reconciliación de una ODF en memoria, sin escribir.
         
         Returns:
-            {
-                'odf_id': int,
-                'odf_name': str,
-                'pos_asociadas': [...],
-                'kg_totales_po': float,
-                'kg_consumidos_po': float,
-                'kg_disponibles_po': float,
-                'desglose_productos': [...],
-                'actualizado': bool
-            }
+            (resultado, vals): vals son los campos x_studio_kg_* a escribir en la
+            ODF, o None si no hay nada que escribir (ODF sin SO y sin KG).
         """
-        # 1. Leer ODF
-        odf = self.odoo.search_read(
-            'mrp.production',
-            [['id', '=', odf_id]],
-            ['id', 'name', 'x_studio_po_asociada', 'product_id', 'state']
-        )
-        
-        if not odf:
-            raise ValueError(f"ODF {odf_id} no encontrada")
-        
-        odf = odf[0]
-        
-        # 2. Parsear POs asociadas
-        po_asociada_str = odf.get('x_studio_po_asociada')
-        so_names = self.parse_pos_asociadas(po_asociada_str)
+        odf_id = odf['id']
+        so_names = self.parse_pos_asociadas(odf.get('x_studio_po_asociada'))
         
         # VALIDACIÓN DE INCONSISTENCIAS: Si no hay SO pero tiene KG, limpiar
         if not so_names:
-            # Verificar si tiene valores inconsistentes (KG > 0 sin SO)
-            kg_totales_actual = odf.get('x_studio_kg_totales_po', 0) or 0
-            kg_consumidos_actual = odf.get('x_studio_kg_consumidos_po', 0) or 0
-            kg_disponibles_actual = odf.get('x_studio_kg_disponibles_po', 0) or 0
-            
-            tiene_inconsistencia = (kg_totales_actual != 0 or 
-                                   kg_consumidos_actual != 0 or 
-                                   kg_disponibles_actual != 0)
-            
-            if tiene_inconsistencia and not dry_run:
-                # Limpiar inconsistencia: poner todos los campos en 0
-                try:
-                    self.odoo.models.execute_kw(
-                        self.odoo.db, self.odoo.uid, self.odoo.password,
-                        'mrp.production', 'write',
-                        [[odf_id], {
-                            'x_studio_kg_totales_po': 0,
-                            'x_studio_kg_consumidos_po': 0,
-                            'x_studio_kg_disponibles_po': 0
-                        }]
-                    )
-                    return {
-                        'odf_id': odf_id,
-                        'odf_name': odf.get('name'),
-                        'pos_asociadas': [],
-                        'kg_totales_po': 0,
-                        'kg_consumidos_po': 0,
-                        'kg_disponibles_po': 0,
-                        'desglose_productos': [],
-                        'actualizado': True,
-                        'accion': 'limpieza_inconsistencia',
-                        'mensaje': 'Limpiado: ODF sin SO asociada tenía KG registrados'
-                    }
-                except Exception as e:
-                    print(f"Error limpiando inconsistencia: {e}")
-            
-            return {
+            tiene_inconsistencia = any((odf.get(campo) or 0) != 0 for campo in CAMPOS_KG)
+            resultado = {
                 'odf_id': odf_id,
                 'odf_name': odf.get('name'),
                 'pos_asociadas': [],
@@ -287,18 +248,13 @@ class ODFReconciliationService:
                 'kg_consumidos_po': 0,
                 'kg_disponibles_po': 0,
                 'desglose_productos': [],
-                'actualizado': tiene_inconsistencia and not dry_run,
+                'actualizado': False,
                 'accion': 'limpieza_inconsistencia' if tiene_inconsistencia else 'sin_so',
-                'mensaje': 'No hay SO asociada' + (' - Inconsistencia limpiada' if (tiene_inconsistencia and not dry_run) else '')
+                'mensaje': 'No hay SO asociada'
             }
+            return resultado, ({campo: 0 for campo in CAMPOS_KG} if tiene_inconsistencia else None)
         
-        # 3. Leer líneas de las SOs
-        productos_so = self.get_so_lines(so_names)
-        
-        # 4. Leer subproductos de la ODF
-        subproductos = self.get_subproductos_odf(odf_id)
-        
-        # 5. Reconciliar: match productos
+        # Reconciliar: match productos
         kg_totales = 0
         kg_consumidos = 0
         desglose = []
@@ -333,24 +289,7 @@ class ODFReconciliationService:
         
         kg_disponibles = kg_totales - kg_consumidos
         
-        # 6. Escribir a Odoo (si no es dry_run)
-        actualizado = False
-        if not dry_run:
-            try:
-                self.odoo.models.execute_kw(
-                    self.odoo.db, self.odoo.uid, self.odoo.password,
-                    'mrp.production', 'write',
-                    [[odf_id], {
-                        'x_studio_kg_totales_po': kg_totales,
-                        'x_studio_kg_consumidos_po': kg_consumidos,
-                        'x_studio_kg_disponibles_po': kg_disponibles
-                    }]
-                )
-                actualizado = True
-            except Exception as e:
-                print(f"Error escribiendo a Odoo: {e}")
-        
-        return {
+        resultado = {
             'odf_id': odf_id,
             'odf_name': odf.get('name'),
             'pos_asociadas': so_names,
@@ -358,14 +297,202 @@ class ODFReconciliationService:
             'kg_consumidos_po': round(kg_consumidos, 2),
             'kg_disponibles_po': round(kg_disponibles, 2),
             'desglose_productos': desglose,
-            'actualizado': actualizado,
+            'actualizado': False,
             'timestamp': datetime.now()
         }
+        vals = {
+            'x_studio_kg_totales_po': kg_totales,
+            'x_studio_kg_consumidos_po': kg_consumidos,
+            'x_studio_kg_disponibles_po': kg_disponibles
+        }
+        return resultado, vals
+    
+    def _escribir_agrupado(self, escrituras: Dict[int, Dict]) -> Tuple[set, int]:
+        """
+        Escribe los campos x_studio_kg_* agrupando las ODFs con los mismos valores
+        en un solo write (en lotes de TAMANO_LOTE). Si un write agrupado falla se
+        reintenta ODF por ODF para aislar la que falla.
+        
+        Returns:
+            (ids escritos, cantidad de llamadas write)
+        """
+        grupos: Dict[Tuple, List[int]] = {}
+        for odf_id, vals in escrituras.items():
+            grupos.setdefault(tuple(sorted(vals.items())), []).append(odf_id)
+        
+        escritos = set()
+        llamadas = 0
+        for clave, ids in grupos.items():
+            vals = dict(clave)
+            for i in range(0, len(ids), TAMANO_LOTE):
+                lote = ids[i:i + TAMANO_LOTE]
+                llamadas += 1
+                try:
+                    self.odoo.write('mrp.production', lote, vals)
+                    escritos.update(lote)
+                    continue
+                except Exception as e:
+                    if len(lote) == 1:
+                        print(f"Error escribiendo a Odoo: {e}")
+                        continue
+                for odf_id in lote:
+                    llamadas += 1
+                    try:
+                        self.odoo.write('mrp.production', [odf_id], vals)
+                        escritos.add(odf_id)
+                    except Exception as e:
+                        print(f"Error escribiendo a Odoo (ODF {odf_id}): {e}")
+        return escritos, llamadas
+    
+    @staticmethod
+    def _marcar_escrito(resultado: Dict) -> None:
+        resultado['actualizado'] = True
+        if resultado.get('accion') == 'limpieza_inconsistencia':
+            resultado['mensaje'] = 'Limpiado: ODF sin SO asociada tenía KG registrados'
+    
+    def reconciliar_odf(self, odf_id: int, dry_run: bool = False) -> Dict:
+        """
+        Reconcilia una ODF con sus Sale Orders asociadas.
+        Calcula KG totales, consumidos y disponibles.
+        
+        Args:
+            odf_id: ID de la ODF
+            dry_run: Si True, solo calcula sin escribir a Odoo
+        
+        Returns:
+            {
+                'odf_id': int,
+                'odf_name': str,
+                'pos_asociadas': [...],
+                'kg_totales_po': float,
+                'kg_consumidos_po': float,
+                'kg_disponibles_po': float,
+                'desglose_productos': [...],
+                'actualizado': bool
+            }
+        """
+        # 1. Leer ODF
+        odf = self.odoo.search_read(
+            'mrp.production',
+            [['id', '=', odf_id]],
+            CAMPOS_ODF
+        )
+        
+        if not odf:
+            raise ValueError(f"ODF {odf_id} no encontrada")
+        
+        odf = odf[0]
+        
+        # 2. Leer líneas de las SOs y subproductos de la ODF
+        so_names = self.parse_pos_asociadas(odf.get('x_studio_po_asociada'))
+        productos_so = self.get_so_lines(so_names) if so_names else {}
+        subproductos = self.get_subproductos_odf(odf_id) if so_names else {}
+        
+        # 3. Reconciliar en memoria
+        resultado, vals = self._calcular_reconciliacion(odf, productos_so, subproductos)
+        
+        # 4. Escribir a Odoo (si no es dry_run)
+        if vals and not dry_run:
+            escritos, _ = self._escribir_agrupado({odf_id: vals})
+            if odf_id in escritos:
+                self._marcar_escrito(resultado)
+        
+        return resultado
     
     # ========================================
     # RECONCILIACIÓN MASIVA
     # ========================================
     
+    def _leer_odfs_rango(self, fecha_inicio: str, fecha_fin: str) -> List[Dict]:
+        """ODFs del rango paginando por id (keyset)."""
+        domain = [
+            ['date_start', '>=', fecha_inicio],
+            ['date_start', '<=', fecha_fin]
+        ]
+        odfs = []
+        last_id = 0
+        while True:
+            page = self.odoo.search_read(
+                'mrp.production',
+                domain + [['id', '>', last_id]],
+                CAMPOS_ODF,
+                limit=TAMANO_LOTE,
+                order='id asc'
+            )
+            odfs.extend(page)
+            if len(page) < TAMANO_LOTE:
+                return odfs
+            last_id = page[-1]['id']
+    
+    def _consultar(self, consulta: Dict) -> List[Dict]:
+        return self.odoo.search_read(consulta['model'], consulta['domain'], consulta['fields'])
+    
+    def _prefetch_rango(
+        self,
+        odf_ids: List[int],
+        so_names: List[str]
+    ) -> Tuple[Dict[int, List[Dict]], Dict[int, Dict], Dict[str, List[int]], List[Dict]]:
+        """
+        Lee en pocas consultas por conjunto (por lotes) los moves terminados de
+        todas las ODFs, las SOs referenciadas y sus líneas. Las consultas van una
+        tras otra: comparten el cliente Odoo y xmlrpc no es thread-safe.
+        
+        Returns:
+            (moves por ODF, SOs por id, ids de SO por nombre, líneas de SO en el
+            orden en que las entrega Odoo)
+        """
+        lotes_odf = [odf_ids[i:i + TAMANO_LOTE] for i in range(0, len(odf_ids), TAMANO_LOTE)]
+        lotes_so = [so_names[i:i + TAMANO_LOTE] for i in range(0, len(so_names), TAMANO_LOTE)]
+        
+        consultas = [
+            {
+                'model': 'stock.move',
+                'domain': [
+                    ['production_id', 'in', lote],
+                    ['location_dest_id.usage', '=', 'internal']
+                ],
+                'fields': CAMPOS_MOVE + ['production_id']
+            }
+            for lote in lotes_odf
+        ] + [
+            {
+                'model': 'sale.order',
+                'domain': [['name', 'in', lote]],
+                'fields': ['id', 'name', 'partner_id', 'state']
+            }
+            for lote in lotes_so
+        ]
+        respuestas = [self._consultar(q) for q in consultas]
+        
+        moves_por_odf: Dict[int, List[Dict]] = {}
+        for moves in respuestas[:len(lotes_odf)]:
+            for move in moves:
+                production = move.get('production_id')
+                pid = production[0] if isinstance(production, (list, tuple)) else production
+                moves_por_odf.setdefault(pid, []).append(move)
+        
+        so_by_id: Dict[int, Dict] = {}
+        so_ids_por_nombre: Dict[str, List[int]] = {}
+        for sale_orders in respuestas[len(lotes_odf):]:
+            for so in sale_orders:
+                so_by_id[so['id']] = so
+                so_ids_por_nombre.setdefault(so['name'], []).append(so['id'])
+        
+        so_ids = sorted(so_by_id)
+        consultas_lineas = [
+            {
+                'model': 'sale.order.line',
+                'domain': [['order_id', 'in', so_ids[i:i + TAMANO_LOTE]]],
+                'fields': CAMPOS_SO_LINE
+            }
+            for i in range(0, len(so_ids), TAMANO_LOTE)
+        ]
+        so_lines = []
+        for q in consultas_lineas:
+            so_lines.extend(self._consultar(q))
+        
+        return moves_por_odf, so_by_id, so_ids_por_nombre, so_lines
+    
     def reconciliar_odfs_por_fecha(
         self, 
         fecha_inicio: str, 
@@ -375,6 +502,12 @@ class ODFReconciliationService:
         """
         Reconcilia todas las ODFs en un rango de fechas.
         
+        En vez de llamar a reconciliar_odf por cada ODF (4 consultas por ODF), lee
+        de una vez las ODFs, sus subproductos y las líneas de todas las SOs del
+        rango, calcula cada reconciliación en memoria con la misma lógica y
+        escribe agrupando las ODFs con valores iguales. Con dry_run=True los
+        resultados son los mismos, solo que sin escribir.
+        
         Args:
             fecha_inicio: Formato 'YYYY-MM-DD'
             fecha_fin: Formato 'YYYY-MM-DD'
@@ -386,36 +519,55 @@ class ODFReconciliationService:
                 'odfs_reconciliadas': int,
                 'odfs_sin_po': int,
                 'odfs_error': int,
-                'resultados': [...]
+                'resultados': [...],
+                'escrituras': int,
+                'duracion_segundos': float,
+                'odfs_por_segundo': float
             }
         """
-        # Buscar ODFs en el rango de fechas
-        odfs = self.odoo.search_read(
-            'mrp.production',
-            [
-                ['date_start', '>=', fecha_inicio],
-                ['date_start', '<=', fecha_fin]
-            ],
-            ['id', 'name', 'x_studio_po_asociada']
-        )
+        inicio = time.time()
         
-        total = len(odfs)
-        reconciliadas = 0
-        sin_po = 0
-        con_error = 0
+        # 1. ODFs del rango
+        odfs = self._leer_odfs_rango(fecha_inicio, fecha_fin)
+        
+        # 2. Subproductos, SOs y líneas de todo el rango
+        so_names_por_odf = {
+            odf['id']: self.parse_pos_asociadas(odf.get('x_studio_po_asociada'))
+            for odf in odfs
+        }
+        todas_so = sorted({name for names in so_names_por_odf.values() for name in names})
+        con_so = [odf_id for odf_id, names in so_names_por_odf.items() if names]
+        moves_por_odf, so_by_id, so_ids_por_nombre, so_lines = self._prefetch_rango(con_so, todas_so)
+        
+        lineas_por_so: Dict[int, List[Tuple[int, Dict]]] = {}
+        for posicion, line in enumerate(so_lines):
+            so_id = line['order_id'][0] if line.get('order_id') else None
+            lineas_por_so.setdefault(so_id, []).append((posicion, line))
+        
+        # 3. Calcular en memoria
         resultados = []
+        escrituras = {}
+        con_error = 0
         
         for odf in odfs:
             try:
-                resultado = self.reconciliar_odf(odf['id'], dry_run=dry_run)
-                
-                if resultado.get('actualizado'):
-                    reconciliadas += 1
-                elif not resultado.get('pos_asociadas'):
-                    sin_po += 1
-                
+                so_ids = {
+                    so_id
+                    for name in so_names_por_odf[odf['id']]
+                    for so_id in so_ids_por_nombre.get(name, [])
+                }
+                lineas = sorted(
+                    (item for so_id in so_ids for item in lineas_por_so.get(so_id, [])),
+                    key=lambda item: item[0]
+                )
+                resultado, vals = self._calcular_reconciliacion(
+                    odf,
+                    self._agrupar_lineas_so([line for _, line in lineas], so_by_id),
+                    self._agrupar_subproductos(moves_por_odf.get(odf['id'], []))
+                )
+                if vals:
+                    escrituras[odf['id']] = vals
                 resultados.append(resultado)
-                
             except Exception as e:
                 con_error += 1
                 resultados.append({
@@ -424,13 +576,34 @@ class ODFReconciliationService:
                     'error': str(e)
                 })
         
+        # 4. Escribir agrupado (si no es dry_run)
+        llamadas = 0
+        if escrituras and not dry_run:
+            escritos, llamadas = self._escribir_agrupado(escrituras)
+            for resultado in resultados:
+                if resultado.get('odf_id') in escritos and 'error' not in resultado:
+                    self._marcar_escrito(resultado)
+        
+        reconciliadas = sum(1 for r in resultados if r.get('actualizado'))
+        sin_po = sum(
+            1 for r in resultados
+            if 'error' not in r and not r.get('actualizado') and not r.get('pos_asociadas')
+        )
+        
+        duracion = time.time() - inicio
+        print(f"[ODFReconciliation] {len(odfs)} ODFs en {duracion:.1f}s "
+              f"({llamadas} writes, dry_run={dry_run})")
+        
         return {
-            'total_odfs': total,
+            'total_odfs': len(odfs),
             'odfs_reconciliadas': reconciliadas,
             'odfs_sin_po': sin_po,
             'odfs_error': con_error,
             'fecha_inicio': fecha_inicio,
             'fecha_fin': fecha_fin,
             'resultados': resultados,
+            'escrituras': llamadas,
+            'duracion_segundos': round(duracion, 2),
+            'odfs_por_segundo': round(len(odfs) / duracion, 1) if duracion > 0 else None,
             'timestamp': datetime.now()
         }
@@ -1,10 +1,22 @@
-"""Servicio de permisos para dashboards."""
+"""
+Servicio de permisos para dashboards.
+
+Las consultas de autorización (is_admin, get_allowed_dashboards, get_allowed_pages,
+is_maintenance_mode, ...) se resuelven sobre un snapshot inmutable en memoria con
+índices por email. Cada mutación incrementa un contador de versión en la BD; el
+snapshot solo se reconstruye cuando esa versión cambia (se verifica a lo más cada
+SNAPSHOT_CHECK_SECONDS, así los otros workers ven los cambios sin I/O por request).
+"""
 from __future__ import annotations
 
+import copy
 import json
 import sqlite3
+import time
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, List, Mapping, Optional, Tuple
 from threading import Lock
 
 from backend.config import settings
@@ -191,6 +203,12 @@ def _init_schema(conn: sqlite3.Connection) -> None:
             enabled INTEGER NOT NULL DEFAULT 0,
             message TEXT NOT NULL DEFAULT 'El sistema está siendo ajustado en este momento.'
         );
+
+        -- Versión de los permisos (se incrementa en cada mutación)
+        CREATE TABLE IF NOT EXISTS permission_version (
+            id INTEGER PRIMARY KEY CHECK(id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        );
         
         -- Overrides de origen para recepciones
         CREATE TABLE IF NOT EXISTS override_origen (
@@ -219,6 +237,7 @@ def _init_schema(conn: sqlite3.Connection) -> None:
         "INSERT OR IGNORE INTO permission_maintenance (id, enabled, message) VALUES (1, 0, ?)",
         (DEFAULT_PERMISSIONS["maintenance"]["message"],)
     )
+    conn.execute("INSERT OR IGNORE INTO permission_version (id, version) VALUES (1, 0)")
 
 
 def _is_db_empty(conn: sqlite3.Connection) -> bool:
@@ -286,41 +305,39 @@ def _ensure_db() -> None:
         _DB_READY = True
 
 
-def _build_permissions_payload() -> Dict[str, Any]:
-    _ensure_db()
-    with _get_connection() as conn:
-        dashboards: Dict[str, List[str]] = {slug: [] for slug in ALL_DASHBOARDS}
-        for slug, email in conn.execute(
-            "SELECT slug, email FROM permission_dashboards ORDER BY slug, email"
-        ).fetchall():
-            dashboards.setdefault(slug, []).append(email)
-
-        pages: Dict[str, List[str]] = {}
-        for module_slug, pages_data in MODULE_PAGES.items():
-            for page in pages_data:
-                pages[f"{module_slug}.{page['slug']}"] = []
-
-        for module_slug, page_slug, email in conn.execute(
-            "SELECT module_slug, page_slug, email FROM permission_pages ORDER BY module_slug, page_slug, email"
-        ).fetchall():
-            page_key = f"{module_slug}.{page_slug}"
-            pages.setdefault(page_key, []).append(email)
-
-        admins = [
-            row[0]
-            for row in conn.execute("SELECT email FROM permission_admins ORDER BY email").fetchall()
-        ]
-
-        maintenance_row = conn.execute(
-            "SELECT enabled, message FROM permission_maintenance WHERE id = 1"
-        ).fetchone()
-        if maintenance_row:
-            maintenance = {
-                "enabled": bool(maintenance_row[0]),
-                "message": maintenance_row[1],
-            }
-        else:
-            maintenance = DEFAULT_PERMISSIONS["maintenance"].copy()
+def _build_permissions_payload(conn: sqlite3.Connection) -> Dict[str, Any]:
+    dashboards: Dict[str, List[str]] = {slug: [] for slug in ALL_DASHBOARDS}
+    for slug, email in conn.execute(
+        "SELECT slug, email FROM permission_dashboards ORDER BY slug, email"
+    ).fetchall():
+        dashboards.setdefault(slug, []).append(email)
+
+    pages: Dict[str, List[str]] = {}
+    for module_slug, pages_data in MODULE_PAGES.items():
+        for page in pages_data:
+            pages[f"{module_slug}.{page['slug']}"] = []
+
+    for module_slug, page_slug, email in conn.execute(
+        "SELECT module_slug, page_slug, email FROM permission_pages ORDER BY module_slug, page_slug, email"
+    ).fetchall():
+        page_key = f"{module_slug}.{page_slug}"
+        pages.setdefault(page_key, []).append(email)
+
+    admins = [
+        row[0]
+        for row in conn.execute("SELECT email FROM permission_admins ORDER BY email").fetchall()
+    ]
+
+    maintenance_row = conn.execute(
+        "SELECT enabled, message FROM permission_maintenance WHERE id = 1"
+    ).fetchone()
+    if maintenance_row:
+        maintenance = {
+            "enabled": bool(maintenance_row[0]),
+            "message": maintenance_row[1],
+        }
+    else:
+        maintenance = DEFAULT_PERMISSIONS["maintenance"].copy()
 
     return {
         "dashboards": dashboards,
@@ -330,44 +347,161 @@ def _build_permissions_payload() -> Dict[str, Any]:
     }
 
 
+
+SNAPSHOT_CHECK_SECONDS = 2.0
+
+
+@dataclass(frozen=True)
+class PermissionSnapshot:
+    """Snapshot inmutable de permisos con índices precalculados por email."""
+    version: int
+    payload: Mapping[str, Any]
+    admins: FrozenSet[str]
+    public_dashboards: Tuple[str, ...]
+    dashboards_by_email: Mapping[str, Tuple[str, ...]]
+    public_pages: Mapping[str, Tuple[str, ...]]
+    pages_by_email: Mapping[str, Mapping[str, Tuple[str, ...]]]
+    restricted: Mapping[str, Tuple[str, ...]]
+    maintenance: Mapping[str, Any]
+
+
+_SNAPSHOT_LOCK = Lock()
+_snapshot: Optional[PermissionSnapshot] = None
+_snapshot_checked_at = 0.0
+# Generación local: cada mutación de este proceso la incrementa; el snapshot
+# solo se da por verificado para la generación con que se leyó la versión.
+_generation = 0
+_snapshot_generation = -1
+
+
+def _read_version(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT version FROM permission_version WHERE id = 1").fetchone()
+    return row[0] if row else 0
+
+
+def _bump_version(conn: sqlite3.Connection) -> None:
+    """Marca los permisos como modificados (llamar dentro de la transacción de la mutación)."""
+    conn.execute("UPDATE permission_version SET version = version + 1 WHERE id = 1")
+
+
+def _invalidate_snapshot() -> None:
+    """
+    Fuerza a verificar la versión en la próxima consulta. Toma el lock: una
+    reconstrucción en curso (que pudo leer la versión anterior) no puede
+    marcarse como verificada después de la mutación.
+    """
+    global _generation
+    with _SNAPSHOT_LOCK:
+        _generation += 1
+
+
+def _snapshot_vigente() -> Optional[PermissionSnapshot]:
+    snapshot = _snapshot
+    if snapshot is not None and _snapshot_generation == _generation \
+            and time.monotonic() - _snapshot_checked_at < SNAPSHOT_CHECK_SECONDS:
+        return snapshot
+    return None
+
+
+def _build_snapshot(payload: Dict[str, Any], version: int) -> PermissionSnapshot:
+    dashboards = payload["dashboards"]
+    dashboard_order = list(dashboards.keys())
+
+    admins = {_normalize_email(item) for item in settings.PERMISSION_ADMINS}
+    admins.update(_normalize_email(item) for item in payload["admins"])
+
+    # Dashboards: públicos (sin emails) + los restringidos asignados a cada email
+    public_dashboards = tuple(slug for slug in dashboard_order if not dashboards[slug])
+    assigned: Dict[str, set] = {}
+    for slug, emails in dashboards.items():
+        for email in emails:
+            assigned.setdefault(_normalize_email(email), set()).add(slug)
+    dashboards_by_email = {
+        email: tuple(slug for slug in dashboard_order if not dashboards[slug] or slug in slugs)
+        for email, slugs in assigned.items()
+    }
+
+    # Páginas: por módulo, públicas + restringidas asignadas a cada email
+    pages = payload["pages"]
+    public_pages: Dict[str, Tuple[str, ...]] = {}
+    assigned_pages: Dict[str, set] = {}
+    for module_key, module_pages in MODULE_PAGES.items():
+        public_pages[module_key] = tuple(
+            p["slug"] for p in module_pages if not pages.get(f"{module_key}.{p['slug']}")
+        )
+    for page_key, emails in pages.items():
+        for email in emails:
+            assigned_pages.setdefault(_normalize_email(email), set()).add(page_key)
+    pages_by_email = {
+        email: MappingProxyType({
+            module_key: tuple(
+                p["slug"] for p in module_pages
+                if not pages.get(f"{module_key}.{p['slug']}") or f"{module_key}.{p['slug']}" in page_keys
+            )
+            for module_key, module_pages in MODULE_PAGES.items()
+        })
+        for email, page_keys in assigned_pages.items()
+    }
+
+    return PermissionSnapshot(
+        version=version,
+        payload=MappingProxyType(payload),
+        admins=frozenset(admins),
+        public_dashboards=public_dashboards,
+        dashboards_by_email=MappingProxyType(dashboards_by_email),
+        public_pages=MappingProxyType(public_pages),
+        pages_by_email=MappingProxyType(pages_by_email),
+        restricted=MappingProxyType({slug: tuple(emails) for slug, emails in dashboards.items() if emails}),
+        maintenance=MappingProxyType(dict(payload["maintenance"])),
+    )
+
+
+def _get_snapshot() -> PermissionSnapshot:
+    """Snapshot vigente; solo consulta la versión en la BD cada SNAPSHOT_CHECK_SECONDS."""
+    global _snapshot, _snapshot_checked_at, _snapshot_generation
+    snapshot = _snapshot_vigente()
+    if snapshot is not None:
+        return snapshot
+
+    with _SNAPSHOT_LOCK:
+        snapshot = _snapshot_vigente()
+        if snapshot is not None:
+            return snapshot
+        generation = _generation
+        _ensure_db()
+        with _get_connection() as conn:
+            version = _read_version(conn)
+            if _snapshot is None or _snapshot.version != version:
+                _snapshot = _build_snapshot(_build_permissions_payload(conn), version)
+        _snapshot_checked_at = time.monotonic()
+        _snapshot_generation = generation
+        return _snapshot
+
+
 def get_permissions_map() -> Dict[str, List[str]]:
-    return _build_permissions_payload()["dashboards"]
+    return copy.deepcopy(_get_snapshot().payload["dashboards"])
 
 
 def get_admins() -> List[str]:
-    return _build_permissions_payload().get("admins", [])
+    return list(_get_snapshot().payload.get("admins", []))
 
 
 def is_admin(email: str) -> bool:
-    normalized = _normalize_email(email)
-    allowed = { _normalize_email(item) for item in settings.PERMISSION_ADMINS }
-    allowed.update(_normalize_email(item) for item in get_admins())
-    return normalized in allowed
+    return _normalize_email(email) in _get_snapshot().admins
 
 
 def get_allowed_dashboards(email: str) -> List[str]:
+    snapshot = _get_snapshot()
     normalized = _normalize_email(email)
-    dashboards = get_permissions_map()
     
-    if is_admin(email):
-        return list(dashboards.keys())
+    if normalized in snapshot.admins:
+        return list(snapshot.payload["dashboards"].keys())
     
-    allowed: List[str] = []
-    for slug, emails in dashboards.items():
-        if not emails:
-            allowed.append(slug)
-        elif normalized in {_normalize_email(addr) for addr in emails}:
-            allowed.append(slug)
-    return allowed
+    return list(snapshot.dashboards_by_email.get(normalized, snapshot.public_dashboards))
 
 
 def get_restricted_modules() -> Dict[str, List[str]]:
-    dashboards = get_permissions_map()
-    restricted: Dict[str, List[str]] = {}
-    for slug, emails in dashboards.items():
-        if emails:
-            restricted[slug] = emails
-    return restricted
+    return {slug: list(emails) for slug, emails in _get_snapshot().restricted.items()}
 
 
 def assign_dashboard(slug: str, email: str) -> Dict[str, List[str]]:
@@ -377,6 +511,8 @@ def assign_dashboard(slug: str, email: str) -> Dict[str, List[str]]:
             "INSERT OR IGNORE INTO permission_dashboards (slug, email) VALUES (?, ?)",
             (_normalize_dashboard(slug), _normalize_email(email)),
         )
+        _bump_version(conn)
+    _invalidate_snapshot()
     return get_permissions_map()
 
 
@@ -387,11 +523,13 @@ def remove_dashboard(slug: str, email: str) -> Dict[str, List[str]]:
             "DELETE FROM permission_dashboards WHERE slug = ? AND email = ?",
             (_normalize_dashboard(slug), _normalize_email(email)),
         )
+        _bump_version(conn)
+    _invalidate_snapshot()
     return get_permissions_map()
 
 
 def get_full_permissions() -> Dict[str, Any]:
-    return _build_permissions_payload()
+    return copy.deepcopy(dict(_get_snapshot().payload))
 
 
 def get_dashboard_name(slug: str) -> str:
@@ -413,30 +551,19 @@ def get_all_module_pages() -> Dict[str, List[Dict[str, str]]]:
 
 
 def get_page_permissions() -> Dict[str, List[str]]:
-    return _build_permissions_payload().get("pages", {})
+    return copy.deepcopy(_get_snapshot().payload.get("pages", {}))
 
 
 def get_allowed_pages(email: str, module: str) -> List[str]:
+    snapshot = _get_snapshot()
     normalized = _normalize_email(email)
     module_key = _normalize_dashboard(module)
     
-    if is_admin(email):
+    if normalized in snapshot.admins:
         return [p["slug"] for p in MODULE_PAGES.get(module_key, [])]
     
-    # We read once here
-    pages_perms = get_page_permissions()
-    allowed: List[str] = []
-    
-    for page in MODULE_PAGES.get(module_key, []):
-        page_key = f"{module_key}.{page['slug']}"
-        emails_list = pages_perms.get(page_key, [])
-        
-        if not emails_list:
-            allowed.append(page["slug"])
-        elif normalized in {_normalize_email(addr) for addr in emails_list}:
-            allowed.append(page["slug"])
-    
-    return allowed
+    by_module = snapshot.pages_by_email.get(normalized, snapshot.public_pages)
+    return list(by_module.get(module_key, ()))
 
 
 def assign_page(module: str, page: str, email: str) -> Dict[str, List[str]]:
@@ -446,6 +573,8 @@ def assign_page(module: str, page: str, email: str) -> Dict[str, List[str]]:
             "INSERT OR IGNORE INTO permission_pages (module_slug, page_slug, email) VALUES (?, ?, ?)",
             (_normalize_dashboard(module), page.strip().lower(), _normalize_email(email)),
         )
+        _bump_version(conn)
+    _invalidate_snapshot()
     return get_page_permissions()
 
 
@@ -456,6 +585,8 @@ def remove_page(module: str, page: str, email: str) -> Dict[str, List[str]]:
             "DELETE FROM permission_pages WHERE module_slug = ? AND page_slug = ? AND email = ?",
             (_normalize_dashboard(module), page.strip().lower(), _normalize_email(email)),
         )
+        _bump_version(conn)
+    _invalidate_snapshot()
     return get_page_permissions()
 
 
@@ -466,6 +597,8 @@ def clear_page_restriction(module: str, page: str) -> Dict[str, List[str]]:
             "DELETE FROM permission_pages WHERE module_slug = ? AND page_slug = ?",
             (_normalize_dashboard(module), page.strip().lower()),
         )
+        _bump_version(conn)
+    _invalidate_snapshot()
     return get_page_permissions()
 
 
@@ -479,6 +612,8 @@ def assign_admin(email: str) -> List[str]:
             "INSERT OR IGNORE INTO permission_admins (email) VALUES (?)",
             (_normalize_email(email),),
         )
+        _bump_version(conn)
+    _invalidate_snapshot()
     return get_admins()
 
 
@@ -490,20 +625,15 @@ def remove_admin(email: str) -> List[str]:
             "DELETE FROM permission_admins WHERE email = ?",
             (_normalize_email(email),),
         )
+        _bump_version(conn)
+    _invalidate_snapshot()
     return get_admins()
 
 
 # ============ BANNER DE MANTENIMIENTO ============
 
 def get_maintenance_config() -> Dict[str, Any]:
-    _ensure_db()
-    with _get_connection() as conn:
-        row = conn.execute(
-            "SELECT enabled, message FROM permission_maintenance WHERE id = 1"
-        ).fetchone()
-        if not row:
-            return DEFAULT_PERMISSIONS["maintenance"].copy()
-        return {"enabled": bool(row[0]), "message": row[1]}
+    return dict(_get_snapshot().maintenance)
 
 
 def set_maintenance_mode(enabled: bool, message: Optional[str] = None) -> Dict[str, Any]:
@@ -519,12 +649,13 @@ def set_maintenance_mode(enabled: bool, message: Optional[str] = None) -> Dict[s
             "UPDATE permission_maintenance SET enabled = ?, message = ? WHERE id = 1",
             (1 if enabled else 0, final_message),
         )
+        _bump_version(conn)
+    _invalidate_snapshot()
     return get_maintenance_config()
 
 
 def is_maintenance_mode() -> bool:
-    config = get_maintenance_config()
-    return config.get("enabled", False)
+    return bool(_get_snapshot().maintenance.get("enabled", False))
 
 
 # ============ OVERRIDE DE ORIGEN DE RECEPCIONES ============
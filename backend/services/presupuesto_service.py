@@ -7,6 +7,8 @@ import traceback
 
 import pandas as pd
 
+from backend.services.excel_compilado import compilar
+
 BASE_DIR = Path(__file__).resolve().parents[2]
 DATA_DIR = BASE_DIR / "data"
 DATA_DIR.mkdir(parents=True, exist_ok=True)
@@ -15,246 +17,271 @@ PPTO_2025_PATH = DATA_DIR / "BD_PPTO_2025.xlsx"
 PPTO_2026_PATH = DATA_DIR / "BD_PPTO_2026.xlsx"
 
 
-def _leer_excel(path: Path, sheet: Optional[str] = None) -> pd.DataFrame:
-    kwargs = {"sheet_name": sheet} if sheet else {}
-    return pd.read_excel(path, **kwargs)
+CATEGORIAS_PRINCIPALES = [
+    "1 - INGRESOS", "2 - COSTOS", "4 - GASTOS DIRECTOS",
+    "6 - GAV", "8 - INTERESES", "10 - INGRESOS NO OPERACIONALES",
+    "11 - GASTOS NO OPERACIONALES"
+]
+
+# Mapeo de Áreas del Excel a Categorías EERR
+AREA_TO_CATEGORIA = {
+    # 1 - INGRESOS
+    "INGRESOS": "1 - INGRESOS",
+
+    # 2 - COSTOS (Producción directa)
+    "COSTO VENTA": "2 - COSTOS",
+    "COSTO DE VENTA": "2 - COSTOS",
+    "ABASTECIMIENTO": "2 - COSTOS",
+
+    # 4 - GASTOS DIRECTOS (Operación de planta)
+    "PRODUCCION": "4 - GASTOS DIRECTOS",
+    "FRIGORIFICO": "4 - GASTOS DIRECTOS",
+    "RECEPCION": "4 - GASTOS DIRECTOS",
+    "ENERGÍA ELÉCTRICA": "4 - GASTOS DIRECTOS",
+    "BOD. INSUMOS": "4 - GASTOS DIRECTOS",
+    "BODEGA DE INSUMOS": "4 - GASTOS DIRECTOS",
+    "MANTENCIÓN PREV. OPERACIONES": "4 - GASTOS DIRECTOS",
+    "MANTENCIÓN PREV. SADEMA": "4 - GASTOS DIRECTOS",
+    "HIGIENIZACIÓN": "4 - GASTOS DIRECTOS",
+    "CONTROL DE CALIDAD": "4 - GASTOS DIRECTOS",
+    "ASEGURAMIENTO DE CALIDAD": "4 - GASTOS DIRECTOS",
+
+    # 6 - GAV (Gastos Admin. y Ventas)
+    "ADM. Y FIN.": "6 - GAV",
+    "RRHH": "6 - GAV",
+    "GERENCIA GENERAL": "6 - GAV",
+    "MARKETING": "6 - GAV",
+    "COMERCIALIZACIÓN": "6 - GAV",
+    "COMEX": "6 - GAV",
+    "SSOMA": "6 - GAV",
+}
+
+COLUMNAS_2025 = {
+    "Nuero de fila": "numero_fila",
+    "Area": "area",
+    "Sala": "sala",
+    "Cargo": "cargo",
+    "Centro de costo": "centro_costo",
+    "Detalle": "detalle",
+    "Ppto": "ppto_tipo",
+    "N° Cuenta": "cuenta_codigo",
+    "Cuenta": "cuenta_nombre",
+    "Un. Med": "unidad_medida",
+    "Moneda": "moneda",
+    "Nombre Completo": "nombre_completo",
+    "Cat 1 IFRS": "cat_ifrs_1",
+    "Cat IFRS 2 vf": "cat_ifrs_2",
+    "Cat IFRS 3": "cat_ifrs_3",
+    "Cat IFRS 4": "cat_ifrs_4",
+    "Fecha EERR": "fecha_eerr",
+    "Fecha Fujo": "fecha_flujo",
+    "Cantidad": "cantidad",
+    "Monto con Signo": "monto",
+    # Formatos alternativos que pueden venir del Excel
+    "FECHA EERR": "fecha_eerr",
+    "MONTO": "monto",
+    "MONTO CON SIGNO": "monto",
+    "CAT 1 IFRS": "cat_ifrs_1",
+    "CAT IFRS 1": "cat_ifrs_1"
+}
+
+COLUMNAS_2026 = {
+    "EMPRESA": "empresa",
+    "CENTRO DE COSTO": "centro_costo",
+    "ÁREA": "area",
+    "PPTO": "ppto_tipo",
+    "CARGO": "cargo",
+    "DETALLE": "detalle",
+    "SKU": "sku",
+    "N° CUENTA": "cuenta_codigo",
+    "NOMBRE CUENTA CONTABLE": "cuenta_nombre",
+    "UND": "unidad_medida",
+    "MONEDA": "moneda",
+    "PRECIO": "precio",
+    "Fecha EERR": "fecha_eerr",
+    "UNIDADES": "unidades",
+    "MONTO": "monto"
+}
+
+# Subir al cambiar la clasificación o las columnas derivadas (fuerza recompilar)
+VERSION_COMPILADO = 1
+
+
+def _clasificar_categoria(cat_ifrs_1: Optional[str]) -> Optional[str]:
+    """Categoría EERR desde Cat 1 IFRS (cuando el Excel no trae columna de área)."""
+    if not cat_ifrs_1:
+        return None
+    valor = str(cat_ifrs_1).upper().strip()
+    for cat in CATEGORIAS_PRINCIPALES:
+        if cat in valor or valor.startswith(cat.split(" ")[0]):
+            return cat
+    if valor.startswith("1"):
+        return "1 - INGRESOS"
+    if valor.startswith("2"):
+        return "2 - COSTOS"
+    if valor.startswith("4"):
+        return "4 - GASTOS DIRECTOS"
+    if valor.startswith("6"):
+        return "6 - GAV"
+    if valor.startswith("8"):
+        return "8 - INTERESES"
+    if valor.startswith("10"):
+        return "10 - INGRESOS NO OPERACIONALES"
+    if valor.startswith("11"):
+        return "11 - GASTOS NO OPERACIONALES"
+    return None
+
+
+def _categorias(df: pd.DataFrame) -> pd.Series:
+    """Categoría principal por fila (por área o, si no hay, por Cat 1 IFRS), una vez por valor distinto."""
+    col_area = "area" if "area" in df.columns else "Area"
+    if col_area in df.columns:
+        area = df[col_area].where(df[col_area].notna() & (df[col_area].astype(str) != ""))
+        return area.astype(str).str.upper().str.strip().map(AREA_TO_CATEGORIA).where(area.notna())
+    col_cat1 = "cat_ifrs_1" if "cat_ifrs_1" in df.columns else "Cat 1 IFRS"
+    valores = df[col_cat1]
+    return valores.map({v: _clasificar_categoria(v) for v in valores.dropna().unique()})
+
+
+def _preparar(df: pd.DataFrame) -> pd.DataFrame:
+    """Agrega fecha_eerr tipada, mes, categoria_principal y monto_ok."""
+    df = df.copy()
+    fecha = pd.to_datetime(df["fecha_eerr"], format="%d/%m/%Y", errors="coerce")
+    if fecha.isna().all():
+        fecha = pd.to_datetime(df["fecha_eerr"], errors="coerce")
+    df["fecha_eerr"] = fecha
+    df["mes"] = fecha.dt.strftime("%Y-%m")
+    df["categoria_principal"] = _categorias(df)
+    # Los montos del Excel ya tienen signo correcto (positivo=ingreso, negativo=gasto)
+    df["monto_ok"] = pd.to_numeric(df["monto"], errors="coerce").fillna(0) if "monto" in df.columns else 0.0
+    return df
+
+
+def _vista_mensual(df: pd.DataFrame) -> pd.DataFrame:
+    """Montos y cantidad de registros por centro de costo / mes / categoría."""
+    claves = pd.DataFrame({
+        "centro_costo": df["centro_costo"] if "centro_costo" in df.columns else None,
+        "mes": df["mes"],
+        "categoria_principal": df["categoria_principal"],
+        "monto": df["monto_ok"],
+    })
+    return (
+        claves.groupby(["centro_costo", "mes", "categoria_principal"], dropna=False)
+        .agg(monto=("monto", "sum"), registros=("monto", "size"))
+        .reset_index()
+    )
+
+
+def _compilar(df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    if "fecha_eerr" not in df.columns:
+        return {"base": df}
+    base = _preparar(df)
+    return {"base": base, "mensual": _vista_mensual(base)}
 
 
-def cargar_presupuesto_2025(filepath: Optional[Path] = None) -> pd.DataFrame | Dict[str, str]:
-    path = filepath or PPTO_2025_PATH
-    try:
-        # Intentar diferentes nombres de hojas
-        hojas_posibles = ["PPTO En uso", "BD_transformada", "BD", "PBI"]
-        
-        excel_file = pd.ExcelFile(path)
+def _compilar_2025(path: Path) -> Dict[str, pd.DataFrame]:
+    # Intentar diferentes nombres de hojas
+    hojas_posibles = ["PPTO En uso", "BD_transformada", "BD", "PBI"]
+    with pd.ExcelFile(path) as excel_file:
         hojas_disponibles = excel_file.sheet_names
-        
-        # Buscar la primera hoja que coincida
-        hoja_usar = None
-        for hoja in hojas_posibles:
-            if hoja in hojas_disponibles:
-                hoja_usar = hoja
-                break
-        
-        # Si no encuentra ninguna, usar la primera hoja
-        if hoja_usar is None:
-            hoja_usar = hojas_disponibles[0] if hojas_disponibles else 0
-        
-        df = pd.read_excel(path, sheet_name=hoja_usar, header=0)
-
-        columnas_rename = {
-            "Nuero de fila": "numero_fila",
-            "Area": "area",
-            "Sala": "sala",
-            "Cargo": "cargo",
-            "Centro de costo": "centro_costo",
-            "Detalle": "detalle",
-            "Ppto": "ppto_tipo",
-            "N° Cuenta": "cuenta_codigo",
-            "Cuenta": "cuenta_nombre",
-            "Un. Med": "unidad_medida",
-            "Moneda": "moneda",
-            "Nombre Completo": "nombre_completo",
-            "Cat 1 IFRS": "cat_ifrs_1",
-            "Cat IFRS 2 vf": "cat_ifrs_2",
-            "Cat IFRS 3": "cat_ifrs_3",
-            "Cat IFRS 4": "cat_ifrs_4",
-            "Fecha EERR": "fecha_eerr",
-            "Fecha Fujo": "fecha_flujo",
-            "Cantidad": "cantidad",
-            "Monto con Signo": "monto",
-            # Formatos alternativos que pueden venir del Excel
-            "FECHA EERR": "fecha_eerr",
-            "MONTO": "monto",
-            "MONTO CON SIGNO": "monto",
-            "CAT 1 IFRS": "cat_ifrs_1",
-            "CAT IFRS 1": "cat_ifrs_1"
-        }
-        df = df.rename(columns=columnas_rename)
-        return df
+        # Buscar la primera hoja que coincida; si no encuentra ninguna, usar la primera hoja
+        hoja_usar = next((h for h in hojas_posibles if h in hojas_disponibles),
+                         hojas_disponibles[0] if hojas_disponibles else 0)
+        # Se parsea desde el mismo libro abierto (antes se abría dos veces)
+        df = excel_file.parse(sheet_name=hoja_usar, header=0)
+    return _compilar(df.rename(columns=COLUMNAS_2025))
+
+
+def _compilar_2026(path: Path) -> Dict[str, pd.DataFrame]:
+    df = pd.read_excel(path, sheet_name="BD", header=0)
+    return _compilar(df.rename(columns=COLUMNAS_2026))
+
+
+def _tablas_presupuesto(año: int, filepath: Optional[Path] = None) -> Dict[str, pd.DataFrame] | Dict[str, str]:
+    if año == 2025:
+        path, compilador = filepath or PPTO_2025_PATH, _compilar_2025
+    elif año == 2026:
+        path, compilador = filepath or PPTO_2026_PATH, _compilar_2026
+    else:
+        return {"error": f"Año {año} no disponible"}
+    try:
+        return compilar(f"presupuesto_{año}", path, compilador, version=VERSION_COMPILADO)
     except FileNotFoundError:
         return {"error": f"Archivo no encontrado: {path}"}
     except Exception as exc:
-        import traceback
         return {"error": f"{str(exc)}\n{traceback.format_exc()}"}
 
 
+def cargar_presupuesto_2025(filepath: Optional[Path] = None) -> pd.DataFrame | Dict[str, str]:
+    tablas = _tablas_presupuesto(2025, filepath)
+    return tablas if "error" in tablas else tablas["base"].copy()
+
+
 def cargar_presupuesto_2026(filepath: Optional[Path] = None) -> pd.DataFrame | Dict[str, str]:
-    path = filepath or PPTO_2026_PATH
-    try:
-        df = pd.read_excel(path, sheet_name="BD", header=0)
-        columnas_rename = {
-            "EMPRESA": "empresa",
-            "CENTRO DE COSTO": "centro_costo",
-            "ÁREA": "area",
-            "PPTO": "ppto_tipo",
-            "CARGO": "cargo",
-            "DETALLE": "detalle",
-            "SKU": "sku",
-            "N° CUENTA": "cuenta_codigo",
-            "NOMBRE CUENTA CONTABLE": "cuenta_nombre",
-            "UND": "unidad_medida",
-            "MONEDA": "moneda",
-            "PRECIO": "precio",
-            "Fecha EERR": "fecha_eerr",
-            "UNIDADES": "unidades",
-            "MONTO": "monto"
-        }
-        df = df.rename(columns=columnas_rename)
-        return df
-    except FileNotFoundError:
-        return {"error": f"Archivo no encontrado: {path}"}
-    except Exception as exc:
-        return {"error": str(exc)}
+    tablas = _tablas_presupuesto(2026, filepath)
+    return tablas if "error" in tablas else tablas["base"].copy()
+
+
+def _resumen_mensual(vista: pd.DataFrame, año: int) -> Dict[str, Any]:
+    """{"mensual": {mes: {categoria: monto}}, "ytd": {categoria: monto}} desde la vista mensual."""
+    vista = vista[vista["mes"].notna() & (vista["mes"].astype(str).str[:4] == str(año))]
+    datos_mensuales: Dict[str, Dict[str, float]] = {}
+    for mes, grupo in vista.groupby("mes"):
+        por_categoria = grupo.groupby("categoria_principal")["monto"].sum()
+        datos_mensuales[mes] = {cat: float(por_categoria.get(cat, 0.0)) for cat in CATEGORIAS_PRINCIPALES}
+
+    ytd = {cat: 0.0 for cat in CATEGORIAS_PRINCIPALES}
+    for mes_data in datos_mensuales.values():
+        for cat, valor in mes_data.items():
+            ytd[cat] += valor
+    return {"mensual": datos_mensuales, "ytd": ytd}
 
 
 def procesar_presupuesto_mensual(df_ppto: pd.DataFrame, año: int = 2025) -> Dict[str, Dict[str, float]] | Dict[str, str]:
-    df = df_ppto.copy()
-    if "fecha_eerr" not in df.columns:
+    if "fecha_eerr" not in df_ppto.columns:
         return {"error": "Columna fecha_eerr no encontrada"}
-
     try:
-        df["fecha_eerr"] = pd.to_datetime(df["fecha_eerr"], format="%d/%m/%Y", errors="coerce")
-        if df["fecha_eerr"].isna().all():
-            df["fecha_eerr"] = pd.to_datetime(df["fecha_eerr"], errors="coerce")
-        df = df[df["fecha_eerr"].dt.year == año]
-        df["mes"] = df["fecha_eerr"].dt.strftime("%Y-%m")
-
-        categorias_principales = [
-            "1 - INGRESOS", "2 - COSTOS", "4 - GASTOS DIRECTOS",
-            "6 - GAV", "8 - INTERESES", "10 - INGRESOS NO OPERACIONALES",
-            "11 - GASTOS NO OPERACIONALES"
-        ]
-
-        # Mapeo de Áreas del Excel a Categorías EERR
-        AREA_TO_CATEGORIA = {
-            # 1 - INGRESOS
-            "INGRESOS": "1 - INGRESOS",
-            
-            # 2 - COSTOS (Producción directa)
-            "COSTO VENTA": "2 - COSTOS",
-            "COSTO DE VENTA": "2 - COSTOS",
-            "ABASTECIMIENTO": "2 - COSTOS",
-            
-            # 4 - GASTOS DIRECTOS (Operación de planta)
-            "PRODUCCION": "4 - GASTOS DIRECTOS",
-            "FRIGORIFICO": "4 - GASTOS DIRECTOS",
-            "RECEPCION": "4 - GASTOS DIRECTOS",
-            "ENERGÍA ELÉCTRICA": "4 - GASTOS DIRECTOS",
-            "BOD. INSUMOS": "4 - GASTOS DIRECTOS",
-            "BODEGA DE INSUMOS": "4 - GASTOS DIRECTOS",
-            "MANTENCIÓN PREV. OPERACIONES": "4 - GASTOS DIRECTOS",
-            "MANTENCIÓN PREV. SADEMA": "4 - GASTOS DIRECTOS",
-            "HIGIENIZACIÓN": "4 - GASTOS DIRECTOS",
-            "CONTROL DE CALIDAD": "4 - GASTOS DIRECTOS",
-            "ASEGURAMIENTO DE CALIDAD": "4 - GASTOS DIRECTOS",
-            
-            # 6 - GAV (Gastos Admin. y Ventas)
-            "ADM. Y FIN.": "6 - GAV",
-            "RRHH": "6 - GAV",
-            "GERENCIA GENERAL": "6 - GAV",
-            "MARKETING": "6 - GAV",
-            "COMERCIALIZACIÓN": "6 - GAV",
-            "COMEX": "6 - GAV",
-            "SSOMA": "6 - GAV",
-        }
-
-        def clasificar_por_area(area: Optional[str]) -> Optional[str]:
-            """Clasifica el área del Excel a una categoría EERR."""
-            if not area:
-                return None
-            area_upper = str(area).upper().strip()
-            return AREA_TO_CATEGORIA.get(area_upper)
-
-        # Usar columna 'area' para clasificar
-        col_area = "area" if "area" in df.columns else "Area"
-        
-        if col_area not in df.columns:
-            # Fallback a cat_ifrs_1 si no hay columna area
-            col_cat1 = "cat_ifrs_1" if "cat_ifrs_1" in df.columns else "Cat 1 IFRS"
-            def clasificar_categoria(cat_ifrs_1: Optional[str]) -> Optional[str]:
-                if not cat_ifrs_1:
-                    return None
-                valor = str(cat_ifrs_1).upper().strip()
-                for cat in categorias_principales:
-                    if cat in valor or valor.startswith(cat.split(" ")[0]):
-                        return cat
-                if valor.startswith("1"):
-                    return "1 - INGRESOS"
-                if valor.startswith("2"):
-                    return "2 - COSTOS"
-                if valor.startswith("4"):
-                    return "4 - GASTOS DIRECTOS"
-                if valor.startswith("6"):
-                    return "6 - GAV"
-                if valor.startswith("8"):
-                    return "8 - INTERESES"
-                if valor.startswith("10"):
-                    return "10 - INGRESOS NO OPERACIONALES"
-                if valor.startswith("11"):
-                    return "11 - GASTOS NO OPERACIONALES"
-                return None
-            df["categoria_principal"] = df[col_cat1].apply(clasificar_categoria)
-        else:
-            # Usar mapeo por área
-            df["categoria_principal"] = df[col_area].apply(clasificar_por_area)
-
-        # Los montos del Excel ya tienen signo correcto (positivo=ingreso, negativo=gasto)
-        # Solo necesitamos tomarlos tal cual
-        df["monto_ok"] = df["monto"].fillna(0)
-
-        datos_mensuales: Dict[str, Dict[str, float]] = {}
-        for mes, grupo in df.groupby("mes"):
-            datos_mensuales[mes] = {cat: 0.0 for cat in categorias_principales}
-            for cat in categorias_principales:
-                datos_mensuales[mes][cat] = float(grupo[grupo["categoria_principal"] == cat]["monto_ok"].sum())
-
-        ytd = {cat: 0.0 for cat in categorias_principales}
-        for mes_data in datos_mensuales.values():
-            for cat, valor in mes_data.items():
-                ytd[cat] += valor
-
-        return {"mensual": datos_mensuales, "ytd": ytd}
+        # Los DataFrames compilados ya vienen clasificados
+        df = df_ppto if "categoria_principal" in df_ppto.columns and "monto_ok" in df_ppto.columns \
+            else _preparar(df_ppto)
+        return _resumen_mensual(_vista_mensual(df), año)
     except Exception as exc:
         return {"error": f"{exc}\n{traceback.format_exc()}"}
 
 
 def get_presupuesto(año: int = 2025, mes: Optional[str] = None, centro_costo: Optional[str] = None) -> Dict[str, Any]:
-    if año == 2025:
-        df = cargar_presupuesto_2025()
-    elif año == 2026:
-        df = cargar_presupuesto_2026()
-    else:
-        return {"error": f"Año {año} no disponible"}
-
-    if isinstance(df, dict) and "error" in df:
-        return df
+    tablas = _tablas_presupuesto(año)
+    if "error" in tablas:
+        return tablas
+    if "mensual" not in tablas:
+        return {"error": "Columna fecha_eerr no encontrada"}
 
-    if centro_costo and "centro_costo" in df.columns:
-        df = df[df["centro_costo"] == centro_costo]
+    # Se responde desde la vista pre-agregada; el xlsx solo se lee si cambió
+    vista = tablas["mensual"]
+    if centro_costo and "centro_costo" in tablas["base"].columns:
+        vista = vista[vista["centro_costo"] == centro_costo]
+    if mes:
+        vista = vista[vista["mes"] == mes]
 
-    if mes and "fecha_eerr" in df.columns:
-        df = df.copy()
-        df["fecha_eerr"] = pd.to_datetime(df["fecha_eerr"], errors="coerce")
-        df = df[df["fecha_eerr"].dt.strftime("%Y-%m") == mes]
+    try:
+        resultado = _resumen_mensual(vista, año)
+    except Exception as exc:
+        return {"error": f"{exc}\n{traceback.format_exc()}"}
+    resultado["total_registros"] = int(vista["registros"].sum())
+    return resultado
 
-    resultado = procesar_presupuesto_mensual(df, año)
-    if isinstance(resultado, dict) and "error" in resultado:
-        return resultado
 
-    resultado["total_registros"] = len(df)
-    return resultado
+def compilar_presupuesto(año: int) -> Dict[str, Any]:
+    """Compila el Excel del año (p.ej. justo después de subirlo) y retorna un resumen."""
+    tablas = _tablas_presupuesto(año)
+    if "error" in tablas:
+        return tablas
+    return {nombre: len(df) for nombre, df in tablas.items()}
 
 
 def comparar_real_vs_ppto(datos_reales: Dict[str, float], datos_ppto: Dict[str, float]) -> Dict[str, Dict[str, float]]:
-    categorias = [
-        "1 - INGRESOS", "2 - COSTOS", "4 - GASTOS DIRECTOS",
-        "6 - GAV", "8 - INTERESES", "10 - INGRESOS NO OPERACIONALES",
-        "11 - GASTOS NO OPERACIONALES"
-    ]
-
     comparacion: Dict[str, Dict[str, float]] = {}
-    for cat in categorias:
+    for cat in CATEGORIAS_PRINCIPALES:
         real = datos_reales.get(cat, 0.0)
         ppto = datos_ppto.get(cat, 0.0)
         diferencia = real - ppto
@@ -27,6 +27,9 @@ from collections import defaultdict
 import statistics
 
 
+TAMANO_LOTE = 1000
+
+
 class ProduccionReconciliador:
     """
     Reconcilia la producción continua con pedidos comerciales discretos.
@@ -41,6 +44,9 @@ class ProduccionReconciliador:
             odoo_client: Cliente configurado de Odoo (shared.odoo_client)
         """
         self.odoo = odoo_client
+        # Memo sale.order.line → SO de esta corrida ({so_line_id: order_id o None}).
+        # Se comparte entre las ODFs reconciliadas con el mismo reconciliador.
+        self._so_por_linea: Dict[int, Any] = {}
     
     # ========================================
     # LECTURA DE DATOS ATÓMICOS DESDE ODOO
@@ -84,6 +90,11 @@ class ProduccionReconciliador:
         
         # Si hay stock.move.line, usarlos (tienen x_studio_so_linea)
         if moves_line:
+            # Resolver todas las líneas de SO referenciadas en una sola consulta
+            self._resolver_so_lines(
+                self._so_line_id(move.get('x_studio_so_linea')) for move in moves_line
+            )
+            
             consumos = []
             for move in moves_line:
                 # Extraer SO de x_studio_so_linea
@@ -140,54 +151,59 @@ class ProduccionReconciliador:
             
             return sorted(consumos, key=lambda x: x['timestamp'] or '')
     
+    @staticmethod
+    def _so_line_id(so_line_field: Any) -> Optional[int]:
+        """ID de sale.order.line desde x_studio_so_linea (tupla (id, display_name) o int)."""
+        if isinstance(so_line_field, (list, tuple)) and len(so_line_field) >= 2:
+            return so_line_field[0]
+        if isinstance(so_line_field, int) and not isinstance(so_line_field, bool):
+            return so_line_field
+        return None
+    
+    def _resolver_so_lines(self, so_line_ids) -> None:
+        """
+        Carga en el memo el order_id de las líneas de SO que aún no se conocen,
+        con un search_read por lote de TAMANO_LOTE ids (normalmente uno).
+        """
+        faltantes = sorted({i for i in so_line_ids if i and i not in self._so_por_linea})
+        for i in range(0, len(faltantes), TAMANO_LOTE):
+            lote = faltantes[i:i + TAMANO_LOTE]
+            so_lines = self.odoo.search_read(
+                'sale.order.line',
+                [['id', 'in', lote]],
+                ['order_id']
+            )
+            for line_id in lote:
+                self._so_por_linea[line_id] = None
+            for line in so_lines:
+                self._so_por_linea[line['id']] = line.get('order_id') or None
+    
     def _extract_so_from_move(self, move: Dict) -> Dict[str, Any]:
         """
         Extrae información de SO desde x_studio_so_linea.
         
         x_studio_so_linea es Many2one a sale_order_line.
-        Necesitamos obtener el sale_order padre.
+        Necesitamos obtener el sale_order padre (desde el memo de líneas de SO;
+        si la línea no está resuelta se consulta en ese momento).
         """
         so_line_field = move.get('x_studio_so_linea')
         
         if not so_line_field:
             return {'id': None, 'nombre': 'Sin SO'}
         
-        # x_studio_so_linea viene como tupla (id, display_name)
-        if isinstance(so_line_field, (list, tuple)) and len(so_line_field) >= 2:
-            so_line_id = so_line_field[0]
+        so_line_id = self._so_line_id(so_line_field)
+        if so_line_id:
+            self._resolver_so_lines([so_line_id])
+            order_info = self._so_por_linea.get(so_line_id)
             
-            # Buscar la sale_order_line para obtener su order_id
-            so_line = self.odoo.search_read(
-                'sale.order.line',
-                [['id', '=', so_line_id]],
-                ['order_id']
-            )
-            
-            if so_line and so_line[0].get('order_id'):
+            if order_info:
                 # order_id viene como (id, name)
-                order_info = so_line[0]['order_id']
                 return {
                     'id': order_info[0] if isinstance(order_info, (list, tuple)) else order_info,
                     'nombre': order_info[1] if isinstance(order_info, (list, tuple)) else f'SO#{order_info}',
                     'so_line_id': so_line_id
                 }
         
-        elif isinstance(so_line_field, int):
-            # Si viene solo el ID
-            so_line = self.odoo.search_read(
-                'sale.order.line',
-                [['id', '=', so_line_field]],
-                ['order_id']
-            )
-            
-            if so_line and so_line[0].get('order_id'):
-                order_info = so_line[0]['order_id']
-                return {
-                    'id': order_info[0] if isinstance(order_info, (list, tuple)) else order_info,
-                    'nombre': order_info[1] if isinstance(order_info, (list, tuple)) else f'SO#{order_info}',
-                    'so_line_id': so_line_field
-                }
-        
         return {'id': None, 'nombre': 'Sin SO asignada'}
     
     # ========================================
@@ -0,0 +1,307 @@
+"""
+Dimensión de productos compartida.
+
+Un único caché process-wide de product.product indexado por ID, con los
+atributos de product.template (especie, manejo, variedad, categoría, tags,
+temporada) y las clasificaciones derivadas que usan los distintos servicios
+ya precalculadas:
+
+- recepcion_service: especie / manejo / variedad
+- RendimientoService: especie / manejo / categoría / es_fruta
+- ComercialService: especie / manejo / variedad / programa (comercial)
+- AnalisisStockTeoricoService: especie / manejo / nombre / categoría
+- StockService: tipo de fruta y manejo de stock
+
+Los productos faltantes se cargan en bloque; los ya cargados se refrescan
+por write_date (de product.product y product.template) cada REFRESCO_SEGUNDOS.
+Las lecturas a Odoo se hacen fuera del lock; solo se toma para incorporar
+lo leído.
+
+Uso:
+    from backend.services.producto_dimension_service import get_productos
+    productos = get_productos(self.odoo, product_ids)
+    especie = productos[pid]['especie']
+"""
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from backend.services.rendimiento.helpers import is_excluded_consumo
+from backend.services.stock.helpers import detect_fruit_type, detect_manejo
+
+
+REFRESCO_SEGUNDOS = 300
+TAMANO_LOTE = 1000
+
+CAMPOS_BASE = [
+    'id', 'name', 'display_name', 'default_code', 'product_tmpl_id', 'categ_id',
+    'product_tag_ids', 'write_date',
+]
+CAMPOS_OPCIONALES = [
+    'x_studio_sub_categora', 'x_studio_categora_tipo_de_manejo', 'x_studio_selection_field_7qfiv',
+]
+CAMPOS_VARIEDAD = ('x_studio_categora_variedad', 'x_studio_variedad')
+
+_productos: Dict[int, Dict] = {}
+_variedades: Dict[int, str] = {}
+_estado: Dict[str, Any] = {'campos': None, 'campo_variedad': None, 'write_date': '', 'verificado': 0.0}
+_lock = threading.RLock()
+
+
+# ==================== PARSEO Y CLASIFICACIÓN ====================
+
+def producto_texto(valor: Any) -> str:
+    """Texto legible de un many2one/selection ([id, nombre] -> nombre)."""
+    if not valor:
+        return ''
+    if isinstance(valor, (list, tuple)):
+        if len(valor) > 1:
+            return str(valor[1] or '')
+        return str(valor[0]) if valor else ''
+    return str(valor)
+
+
+def _ids(valor: Any) -> List[int]:
+    """IDs de un many2many o many2one."""
+    if not valor or not isinstance(valor, (list, tuple)):
+        return []
+    if len(valor) == 2 and isinstance(valor[0], int) and isinstance(valor[1], str):
+        return [valor[0]]
+    return [v for v in valor if isinstance(v, int)]
+
+
+def clasificar_comercial(nombre: str, sub_categoria: str, categ: str, manejo_raw: Any,
+                         tag_ids: List[int]) -> Dict[str, str]:
+    """
+    Especie, manejo y programa según las reglas del dashboard comercial
+    (palabras clave en nombre/subcategoría y tags de producto).
+    """
+    search_text = f"{str(nombre).upper()} {str(sub_categoria).upper()}"
+
+    # 1. Especie: por defecto la última parte de la categoría de Odoo
+    especie = categ.split(' / ')[-1] if ' / ' in categ else (categ or "Sin Categoría")
+    if any(x in search_text for x in ["AR ", "AR-", " AR", "ARÁNDANO", "BLUEBERRY", "BLUEBERRIES"]):
+        especie = "Arándano"
+    elif any(x in search_text for x in ["FB ", "FB-", " FB", "FRAMBUESA", "RASPBERRY", "RASPBERRIES"]):
+        especie = "Frambuesa"
+    elif any(x in search_text for x in ["CE ", "CE-", " CE", "CEREZA", "CHERRY", "CHERRIES"]):
+        especie = "Cereza"
+    elif any(x in search_text for x in ["MORA", "BLACKBERRY", "BLACKBERRIES"]):
+        especie = "Mora"
+    elif any(x in search_text for x in ["FRUTILLA", "STRAWBERRY", "STRAWBERRIES"]):
+        especie = "Frutilla"
+    elif any(x in search_text for x in ["MIX", "BERRIES"]):
+        especie = "Mix"
+
+    # 2. Manejo
+    manejo = manejo_raw or "Convencional"
+    if any(x in search_text for x in ["ORG", "ORGANIC", "ORGÁNICO"]):
+        manejo = "Orgánico"
+    elif any(x in search_text for x in ["CONV", "CONVENCIONAL"]):
+        manejo = "Convencional"
+
+    # 3. Programa: Tag 18, 19, 20 = Granel | 25 = Retail | 21 = Subproducto | 41 = Servicio
+    if 21 in tag_ids:
+        programa = "Subproducto"
+    elif 25 in tag_ids:
+        programa = "Retail"
+    elif any(t in tag_ids for t in [18, 19, 20]):
+        programa = "Granel"
+    elif 41 in tag_ids:
+        programa = "SERVICIOS"
+    else:
+        full_search = f"{search_text} {categ.upper()}"
+        if "RETAIL" in full_search:
+            programa = "Retail"
+        elif any(x in full_search for x in ["SUBPROD", "MERMA", "Desecho"]):
+            programa = "Subproducto"
+        else:
+            programa = "Granel"
+
+    return {'especie': especie, 'manejo': manejo, 'programa': programa}
+
+
+def _construir_registro(p: Dict, campo_variedad: Optional[str], variedades: Dict[int, str]) -> Dict:
+    """Registro de la dimensión: campos crudos de Odoo + clasificaciones derivadas."""
+    tmpl = p.get('product_tmpl_id')
+    categ = producto_texto(p.get('categ_id'))
+    especie = producto_texto(p.get('x_studio_sub_categora'))
+    manejo_raw = p.get('x_studio_categora_tipo_de_manejo')
+    manejo = producto_texto(manejo_raw)
+    variedad_raw = p.get(campo_variedad) if campo_variedad else None
+    variedad_ids = _ids(variedad_raw)
+    if variedad_ids and not (isinstance(variedad_raw, (list, tuple)) and len(variedad_raw) == 2
+                             and isinstance(variedad_raw[1], str)):
+        variedad = ", ".join(variedades[v] for v in variedad_ids if variedades.get(v))
+    else:
+        variedad = producto_texto(variedad_raw)
+    nombre = p.get('name') or ''
+    display_name = p.get('display_name') or nombre
+    tag_ids = p.get('product_tag_ids') or []
+
+    return {
+        # Campos crudos (mismos nombres que en Odoo)
+        'id': p['id'],
+        'name': nombre,
+        'display_name': display_name,
+        'default_code': p.get('default_code') or '',
+        'product_tmpl_id': tmpl,
+        'categ_id': p.get('categ_id') or [0, ''],
+        'product_tag_ids': tag_ids,
+        'x_studio_sub_categora': p.get('x_studio_sub_categora') or '',
+        'x_studio_categora_tipo_de_manejo': manejo_raw or '',
+        'x_studio_categora_variedad': variedad_ids,
+        'x_studio_selection_field_7qfiv': p.get('x_studio_selection_field_7qfiv') or '',
+        'write_date': p.get('write_date') or '',
+        # Derivados
+        'tmpl_id': tmpl[0] if isinstance(tmpl, (list, tuple)) and tmpl else tmpl or None,
+        'categ': categ,
+        'especie': especie,
+        'manejo': manejo,
+        'variedad': variedad,
+        'variedad_principal': variedades.get(variedad_ids[0], '') if variedad_ids else '',
+        'es_fruta': not is_excluded_consumo(display_name, especie=especie or 'Otro', manejo=manejo or 'Otro'),
+        'stock_tipo_fruta': detect_fruit_type(nombre, categ),
+        'stock_manejo': detect_manejo(manejo_raw),
+        'comercial': clasificar_comercial(display_name, producto_texto(p.get('x_studio_sub_categora')) or '',
+                                          categ, manejo_raw, tag_ids),
+    }
+
+
+# ==================== CARGA ====================
+
+def _resolver_campos(odoo) -> List[str]:
+    """Campos disponibles en product.product (una sola vez por proceso)."""
+    if _estado['campos'] is not None:
+        return _estado['campos']
+    campos = list(CAMPOS_BASE)
+    try:
+        disponibles = odoo.execute('product.product', 'fields_get', [], {'attributes': ['type']}) or {}
+    except Exception as e:
+        print(f"[ProductoDimension] No se pudo leer fields_get: {e}")
+        disponibles = {}
+    campos += [c for c in CAMPOS_OPCIONALES if not disponibles or c in disponibles]
+    campo_variedad = next((c for c in CAMPOS_VARIEDAD if c in disponibles), None) \
+        if disponibles else CAMPOS_VARIEDAD[0]
+    if campo_variedad:
+        campos.append(campo_variedad)
+    with _lock:
+        if _estado['campos'] is None:
+            _estado['campo_variedad'] = campo_variedad
+            _estado['campos'] = campos
+        return _estado['campos']
+
+
+def _leer(odoo, product_ids: List[int]) -> List[Dict]:
+    """
+    Lee en bloque product.product (incluye campos del template) y arma los
+    registros. Las lecturas se hacen sin el lock tomado.
+    """
+    campos = _resolver_campos(odoo)
+    campo_variedad = _estado['campo_variedad']
+
+    leidos = []
+    for i in range(0, len(product_ids), TAMANO_LOTE):
+        leidos.extend(odoo.read('product.product', product_ids[i:i + TAMANO_LOTE], campos) or [])
+
+    if campo_variedad:
+        variedad_ids = set()
+        for p in leidos:
+            raw = p.get(campo_variedad)
+            if isinstance(raw, list) and raw and all(isinstance(v, int) for v in raw):
+                variedad_ids.update(v for v in raw if v not in _variedades)
+        if variedad_ids:
+            try:
+                nuevas = {v['id']: v.get('display_name', '')
+                          for v in odoo.read('x_variedad', list(variedad_ids), ['id', 'display_name'])}
+                with _lock:
+                    _variedades.update(nuevas)
+            except Exception as e:
+                print(f"[ProductoDimension] No se pudo leer x_variedad: {e}")
+
+    with _lock:
+        variedades = dict(_variedades)
+    return [_construir_registro(p, campo_variedad, variedades) for p in leidos]
+
+
+def _incorporar(registros: List[Dict]) -> None:
+    """Reemplaza en la dimensión los registros leídos (con el lock tomado)."""
+    for registro in registros:
+        _productos[registro['id']] = registro
+        if registro['write_date'] > _estado['write_date']:
+            _estado['write_date'] = registro['write_date']
+
+
+def _refrescar(odoo) -> None:
+    """Recarga los productos cacheados cuyo producto o template cambió desde el último write_date."""
+    with _lock:
+        ahora = time.time()
+        if ahora - _estado['verificado'] < REFRESCO_SEGUNDOS:
+            return
+        # Se marca antes de consultar: los demás hilos no repiten la verificación
+        _estado['verificado'] = ahora
+        marca = _estado['write_date']
+        if not marca or not _productos:
+            return
+    try:
+        contexto = {'context': {'active_test': False}}
+        tmpl_ids = odoo.execute('product.template', 'search', [('write_date', '>', marca)], **contexto)
+        dominio = [('write_date', '>', marca)]
+        if tmpl_ids:
+            dominio = ['|', ('write_date', '>', marca), ('product_tmpl_id', 'in', tmpl_ids)]
+        cambiados = odoo.execute('product.product', 'search', dominio, **contexto)
+    except Exception as e:
+        print(f"[ProductoDimension] Error verificando cambios: {e}")
+        return
+    with _lock:
+        recargar = [pid for pid in cambiados if pid in _productos]
+    if recargar:
+        print(f"[ProductoDimension] Refrescando {len(recargar)} productos modificados")
+        registros = _leer(odoo, recargar)
+        with _lock:
+            _incorporar(registros)
+
+
+def get_productos(odoo, product_ids: Iterable[int]) -> Dict[int, Dict]:
+    """
+    Retorna los registros de la dimensión para los IDs pedidos.
+
+    Args:
+        odoo: OdooClient con el que cargar faltantes/refrescos
+        product_ids: IDs de product.product
+
+    Returns:
+        Dict {product_id: registro}. IDs inexistentes en Odoo no aparecen.
+    """
+    ids = {pid for pid in product_ids if pid}
+    if not ids:
+        return {}
+    _refrescar(odoo)
+    with _lock:
+        faltantes = sorted(pid for pid in ids if pid not in _productos)
+    if faltantes:
+        registros = _leer(odoo, faltantes)
+        with _lock:
+            _incorporar(registros)
+    with _lock:
+        return {pid: _productos[pid] for pid in ids if pid in _productos}
+
+
+def invalidar_productos(product_ids: Optional[Iterable[int]] = None) -> None:
+    """Descarta productos de la dimensión (todos si no se indican IDs)."""
+    with _lock:
+        if product_ids is None:
+            _productos.clear()
+            _estado['write_date'] = ''
+        else:
+            for pid in product_ids:
+                _productos.pop(pid, None)
+
+
+def get_stats() -> Dict:
+    """Estadísticas de la dimensión."""
+    return {
+        'productos': len(_productos),
+        'variedades': len(_variedades),
+        'write_date': _estado['write_date'],
+    }
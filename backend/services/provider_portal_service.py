@@ -7,11 +7,17 @@ import hmac
 import json
 import os
 import secrets
+import sqlite3
+import threading
+import time
+from dataclasses import replace
 from datetime import date, datetime, timedelta
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
 from backend.config.settings import settings
+from backend.services import provider_portal_snapshot_service as portal_snapshots
+from backend.services.blob_cache_service import BlobRef, get_or_fetch
 from backend.services.recepcion_service import get_recepciones_mp
 from backend.services.session_service import SessionService
 from shared.odoo_client import OdooClient
@@ -19,6 +25,8 @@ from shared.odoo_client import OdooClient
 
 PROVIDER_USERS_FILE = Path(__file__).parent.parent / "data" / "provider_portal_users.json"
 PROVIDER_SESSIONS_FILE = Path(__file__).parent.parent / "data" / "provider_portal_sessions.json"
+PROVIDER_PORTAL_DB = Path(__file__).parent.parent / "data" / "provider_portal.db"
+PROVIDER_SESSION_CACHE_SECONDS = 5
 PROVIDER_SESSION_HOURS = 12
 PROVIDER_INACTIVITY_MINUTES = 60
 PROVIDER_SECRET_KEY = os.getenv(
@@ -31,23 +39,169 @@ def _is_development() -> bool:
     return os.getenv("ENV", "production") == "development"
 
 
-def _ensure_json_file(path: Path, default_content: Any) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    if not path.exists():
-        path.write_text(json.dumps(default_content, indent=2), encoding="utf-8")
-
-
 def _load_json(path: Path, default_content: Any) -> Any:
-    _ensure_json_file(path, default_content)
+    if not path.exists():
+        return default_content
     try:
         return json.loads(path.read_text(encoding="utf-8"))
     except Exception:
         return default_content
 
 
-def _save_json(path: Path, data: Any) -> None:
-    _ensure_json_file(path, data)
-    path.write_text(json.dumps(data, indent=2, ensure_ascii=True), encoding="utf-8")
+# ============ STORE SQLITE (usuarios y sesiones del portal) ============
+
+_USER_COLUMNS = (
+    "partner_id", "rut", "rut_normalized", "display_name", "email", "phone", "city",
+    "active", "password_salt", "password_hash", "created_at", "updated_at",
+)
+_SESSION_COLUMNS = (
+    "session_id", "partner_id", "rut", "display_name", "created_at", "last_activity",
+    "expires_at", "internal_session_token",
+)
+
+_db_lock = threading.Lock()
+_schema_initialized = False
+# session_id -> (sesión, timestamp de lectura)
+_session_cache: Dict[str, Tuple[Dict[str, Any], float]] = {}
+_session_cache_lock = threading.Lock()
+
+
+def _get_connection() -> sqlite3.Connection:
+    conn = sqlite3.connect(PROVIDER_PORTAL_DB, timeout=15)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _init_schema(conn: sqlite3.Connection) -> None:
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS provider_users (
+            partner_id INTEGER PRIMARY KEY,
+            rut TEXT NOT NULL,
+            rut_normalized TEXT NOT NULL,
+            display_name TEXT,
+            email TEXT,
+            phone TEXT,
+            city TEXT,
+            active INTEGER NOT NULL DEFAULT 0,
+            password_salt TEXT,
+            password_hash TEXT,
+            created_at TEXT,
+            updated_at TEXT
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_provider_users_rut ON provider_users(rut_normalized);
+
+        CREATE TABLE IF NOT EXISTS provider_sessions (
+            session_id TEXT PRIMARY KEY,
+            partner_id INTEGER NOT NULL,
+            rut TEXT,
+            display_name TEXT,
+            created_at TEXT NOT NULL,
+            last_activity TEXT NOT NULL,
+            expires_at TEXT NOT NULL,
+            internal_session_token TEXT
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_provider_sessions_partner ON provider_sessions(partner_id);
+        CREATE INDEX IF NOT EXISTS idx_provider_sessions_expires ON provider_sessions(expires_at);
+
+        CREATE TABLE IF NOT EXISTS provider_portal_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        """
+    )
+    _migrate_json_to_db(conn)
+
+
+def _migrate_json_to_db(conn: sqlite3.Connection) -> None:
+    """Importa una sola vez los JSON anteriores (usuarios y sesiones)."""
+    if conn.execute("SELECT value FROM provider_portal_meta WHERE key = 'json_migrated'").fetchone():
+        return
+
+    users = _load_json(PROVIDER_USERS_FILE, [])
+    if isinstance(users, list) and users:
+        _upsert_user_rows(conn, [u for u in users if isinstance(u, dict) and "partner_id" in u])
+        print(f"[ProviderPortal] Migrados {len(users)} usuarios desde {PROVIDER_USERS_FILE.name}")
+
+    sessions = _load_json(PROVIDER_SESSIONS_FILE, {})
+    if isinstance(sessions, dict) and sessions:
+        conn.executemany(
+            f"INSERT OR IGNORE INTO provider_sessions ({', '.join(_SESSION_COLUMNS)}) "
+            f"VALUES ({', '.join('?' for _ in _SESSION_COLUMNS)})",
+            [
+                tuple(session.get(col, "" if col == "internal_session_token" else None)
+                      for col in _SESSION_COLUMNS)
+                for session in sessions.values()
+                if isinstance(session, dict) and session.get("session_id") and session.get("expires_at")
+            ],
+        )
+
+    conn.execute(
+        "INSERT OR REPLACE INTO provider_portal_meta (key, value) VALUES ('json_migrated', ?)",
+        (datetime.now().isoformat(),),
+    )
+
+
+def _ensure_db() -> None:
+    global _schema_initialized
+    if _schema_initialized:
+        return
+    with _db_lock:
+        if _schema_initialized:
+            return
+        PROVIDER_PORTAL_DB.parent.mkdir(parents=True, exist_ok=True)
+        conn = _get_connection()
+        try:
+            with conn:
+                _init_schema(conn)
+        finally:
+            conn.close()
+        _schema_initialized = True
+
+
+def _user_from_row(row: sqlite3.Row) -> Dict[str, Any]:
+    user = dict(row)
+    user.pop("rut_normalized", None)
+    user["active"] = bool(user.get("active"))
+    return user
+
+
+def _session_from_row(row: sqlite3.Row) -> Dict[str, Any]:
+    session = dict(row)
+    if not session.get("internal_session_token"):
+        session.pop("internal_session_token", None)
+    return session
+
+
+def _upsert_user_rows(conn: sqlite3.Connection, users: List[Dict[str, Any]]) -> None:
+    """Upsert por partner_id en una sola sentencia (atómico dentro de la transacción)."""
+    updatable = [col for col in _USER_COLUMNS if col not in ("partner_id", "created_at")]
+    conn.executemany(
+        f"INSERT INTO provider_users ({', '.join(_USER_COLUMNS)}) "
+        f"VALUES ({', '.join('?' for _ in _USER_COLUMNS)}) "
+        f"ON CONFLICT(partner_id) DO UPDATE SET "
+        + ", ".join(f"{col} = excluded.{col}" for col in updatable),
+        [
+            (
+                int(user["partner_id"]),
+                user.get("rut") or "",
+                _normalize_rut(user.get("rut") or ""),
+                user.get("display_name") or user.get("name") or "",
+                user.get("email") or "",
+                user.get("phone") or "",
+                user.get("city") or "",
+                1 if user.get("active") else 0,
+                user.get("password_salt") or "",
+                user.get("password_hash") or "",
+                user.get("created_at") or datetime.now().isoformat(),
+                user.get("updated_at") or datetime.now().isoformat(),
+            )
+            for user in users
+        ],
+    )
 
 
 def _normalize_rut(rut: str) -> str:
@@ -69,16 +223,6 @@ def _date_bounds(fecha_inicio: str, fecha_fin: str) -> Tuple[str, str, date, dat
     )
 
 
-def _date_chunks(start_date: date, end_date: date, days: int = 21) -> List[Tuple[str, str]]:
-    chunks: List[Tuple[str, str]] = []
-    cur = start_date
-    while cur <= end_date:
-        chunk_end = min(cur + timedelta(days=days - 1), end_date)
-        chunks.append((f"{cur.isoformat()} 00:00:00", f"{chunk_end.isoformat()} 23:59:59"))
-        cur = chunk_end + timedelta(days=1)
-    return chunks
-
-
 def _chunk_list(values: List[int], size: int = 200) -> List[List[int]]:
     return [values[i : i + size] for i in range(0, len(values), size)]
 
@@ -138,36 +282,101 @@ class ProviderPortalAuthService:
 
     @staticmethod
     def _load_users() -> List[Dict[str, Any]]:
-        users = _load_json(PROVIDER_USERS_FILE, [])
-        return users if isinstance(users, list) else []
+        _ensure_db()
+        conn = _get_connection()
+        try:
+            rows = conn.execute(
+                "SELECT * FROM provider_users ORDER BY UPPER(display_name), partner_id"
+            ).fetchall()
+        finally:
+            conn.close()
+        return [_user_from_row(row) for row in rows]
 
     @staticmethod
     def _save_users(users: List[Dict[str, Any]]) -> None:
-        _save_json(PROVIDER_USERS_FILE, users)
-
-    @staticmethod
-    def _load_sessions() -> Dict[str, Any]:
-        sessions = _load_json(PROVIDER_SESSIONS_FILE, {})
-        return sessions if isinstance(sessions, dict) else {}
+        """Upsert de los usuarios indicados (no reescribe el resto)."""
+        if not users:
+            return
+        _ensure_db()
+        conn = _get_connection()
+        try:
+            with conn:
+                _upsert_user_rows(conn, users)
+        finally:
+            conn.close()
 
     @staticmethod
-    def _save_sessions(sessions: Dict[str, Any]) -> None:
-        _save_json(PROVIDER_SESSIONS_FILE, sessions)
+    def _find_user(where: str, params: Tuple[Any, ...]) -> Optional[Dict[str, Any]]:
+        """
+        Primer usuario que cumple el filtro. El RUT no es único en Odoo (varios
+        partners pueden compartirlo): se prefiere el activo con clave configurada
+        y, a igualdad, el partner_id menor.
+        """
+        _ensure_db()
+        conn = _get_connection()
+        try:
+            row = conn.execute(
+                f"SELECT * FROM provider_users WHERE {where} "
+                "ORDER BY active DESC, COALESCE(password_hash, '') = '', partner_id LIMIT 1",
+                params,
+            ).fetchone()
+        finally:
+            conn.close()
+        return _user_from_row(row) if row else None
 
     @staticmethod
     def _find_user_by_rut(rut: str) -> Optional[Dict[str, Any]]:
-        rut_normalized = _normalize_rut(rut)
-        for user in ProviderPortalAuthService._load_users():
-            if _normalize_rut(user.get("rut", "")) == rut_normalized:
-                return user
-        return None
+        return ProviderPortalAuthService._find_user("rut_normalized = ?", (_normalize_rut(rut),))
 
     @staticmethod
     def _find_user_by_partner_id(partner_id: int) -> Optional[Dict[str, Any]]:
-        for user in ProviderPortalAuthService._load_users():
-            if int(user.get("partner_id", 0) or 0) == int(partner_id):
-                return user
-        return None
+        return ProviderPortalAuthService._find_user("partner_id = ?", (int(partner_id),))
+
+    @staticmethod
+    def _get_session(session_id: str) -> Optional[Dict[str, Any]]:
+        """Lee una sesión con caché en memoria de TTL corto."""
+        now = time.time()
+        with _session_cache_lock:
+            cached = _session_cache.get(session_id)
+            if cached and now - cached[1] < PROVIDER_SESSION_CACHE_SECONDS:
+                return dict(cached[0])
+
+        _ensure_db()
+        conn = _get_connection()
+        try:
+            row = conn.execute(
+                "SELECT * FROM provider_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+
+        with _session_cache_lock:
+            if row is None:
+                _session_cache.pop(session_id, None)
+                return None
+            session = _session_from_row(row)
+            _session_cache[session_id] = (session, now)
+            return dict(session)
+
+    @staticmethod
+    def _delete_sessions(where: str, params: Tuple[Any, ...]) -> int:
+        _ensure_db()
+        conn = _get_connection()
+        try:
+            with conn:
+                deleted = [
+                    row["session_id"]
+                    for row in conn.execute(f"SELECT session_id FROM provider_sessions WHERE {where}", params)
+                ]
+                conn.executemany(
+                    "DELETE FROM provider_sessions WHERE session_id = ?", [(sid,) for sid in deleted]
+                )
+        finally:
+            conn.close()
+        with _session_cache_lock:
+            for session_id in deleted:
+                _session_cache.pop(session_id, None)
+        return len(deleted)
 
     @staticmethod
     def _issue_session(user: Dict[str, Any], internal_session_token: str = "") -> Dict[str, Any]:
@@ -184,9 +393,19 @@ class ProviderPortalAuthService:
         }
         if internal_session_token and _is_development():
             session["internal_session_token"] = internal_session_token
-        sessions = ProviderPortalAuthService._load_sessions()
-        sessions[session_id] = session
-        ProviderPortalAuthService._save_sessions(sessions)
+        _ensure_db()
+        conn = _get_connection()
+        try:
+            with conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO provider_sessions ({', '.join(_SESSION_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' for _ in _SESSION_COLUMNS)})",
+                    tuple(session.get(col, "") for col in _SESSION_COLUMNS),
+                )
+        finally:
+            conn.close()
+        with _session_cache_lock:
+            _session_cache[session_id] = (dict(session), time.time())
 
         token = _build_token(
             {
@@ -278,7 +497,7 @@ class ProviderPortalAuthService:
         if not selected.get("active"):
             selected["active"] = True
             selected["updated_at"] = datetime.now().isoformat()
-            ProviderPortalAuthService._save_users(users)
+            ProviderPortalAuthService._save_users([selected])
 
         return ProviderPortalAuthService._issue_session(
             selected,
@@ -291,8 +510,7 @@ class ProviderPortalAuthService:
         if not payload:
             return None
         session_id = payload.get("session_id")
-        sessions = ProviderPortalAuthService._load_sessions()
-        session = sessions.get(session_id)
+        session = ProviderPortalAuthService._get_session(session_id) if session_id else None
         if not session:
             return None
 
@@ -300,8 +518,7 @@ class ProviderPortalAuthService:
         expires_at = datetime.fromisoformat(session["expires_at"])
         last_activity = datetime.fromisoformat(session["last_activity"])
         if now > expires_at or now > last_activity + timedelta(minutes=PROVIDER_INACTIVITY_MINUTES):
-            sessions.pop(session_id, None)
-            ProviderPortalAuthService._save_sessions(sessions)
+            ProviderPortalAuthService._delete_sessions("session_id = ?", (session_id,))
             return None
         return session
 
@@ -310,11 +527,19 @@ class ProviderPortalAuthService:
         session = ProviderPortalAuthService.validate_session(token)
         if not session:
             return None
-        sessions = ProviderPortalAuthService._load_sessions()
-        session_id = session["session_id"]
-        sessions[session_id]["last_activity"] = datetime.now().isoformat()
-        ProviderPortalAuthService._save_sessions(sessions)
-        return sessions[session_id]
+        session["last_activity"] = datetime.now().isoformat()
+        conn = _get_connection()
+        try:
+            with conn:
+                conn.execute(
+                    "UPDATE provider_sessions SET last_activity = ? WHERE session_id = ?",
+                    (session["last_activity"], session["session_id"]),
+                )
+        finally:
+            conn.close()
+        with _session_cache_lock:
+            _session_cache[session["session_id"]] = (dict(session), time.time())
+        return session
 
     @staticmethod
     def logout(token: str) -> bool:
@@ -322,28 +547,29 @@ class ProviderPortalAuthService:
         if not payload:
             return False
         session_id = payload.get("session_id")
-        sessions = ProviderPortalAuthService._load_sessions()
-        if session_id in sessions:
-            sessions.pop(session_id, None)
-            ProviderPortalAuthService._save_sessions(sessions)
-            return True
-        return False
+        return ProviderPortalAuthService._delete_sessions("session_id = ?", (session_id,)) > 0
+
+    @staticmethod
+    def cleanup_expired_sessions() -> int:
+        """Elimina sesiones vencidas por expiración o inactividad."""
+        now = datetime.now()
+        inactivity_cutoff = (now - timedelta(minutes=PROVIDER_INACTIVITY_MINUTES)).isoformat()
+        return ProviderPortalAuthService._delete_sessions(
+            "expires_at < ? OR last_activity < ?", (now.isoformat(), inactivity_cutoff)
+        )
 
     @staticmethod
     def set_password(rut: str, password: str, activate: bool = True) -> Dict[str, Any]:
-        users = ProviderPortalAuthService._load_users()
-        normalized = _normalize_rut(rut)
+        user = ProviderPortalAuthService._find_user_by_rut(rut)
+        if not user:
+            raise ValueError("RUT no encontrado en usuarios portal")
         salt = secrets.token_hex(16)
-        password_hash = _password_hash(password, salt)
-        for user in users:
-            if _normalize_rut(user.get("rut", "")) == normalized:
-                user["password_salt"] = salt
-                user["password_hash"] = password_hash
-                user["active"] = activate
-                user["updated_at"] = datetime.now().isoformat()
-                ProviderPortalAuthService._save_users(users)
-                return user
-        raise ValueError("RUT no encontrado en usuarios portal")
+        user["password_salt"] = salt
+        user["password_hash"] = _password_hash(password, salt)
+        user["active"] = activate
+        user["updated_at"] = datetime.now().isoformat()
+        ProviderPortalAuthService._save_users([user])
+        return user
 
     @staticmethod
     def sync_users_from_odoo(
@@ -378,44 +604,61 @@ class ProviderPortalAuthService:
             partner_ids,
             ["id", "name", "vat", "email", "phone", "mobile", "city"],
         )
-        users = ProviderPortalAuthService._load_users()
-        users_by_partner = {int(user.get("partner_id", 0)): user for user in users}
+        _ensure_db()
+        conn = _get_connection()
+        try:
+            with conn:
+                existing = {
+                    row["partner_id"]: row
+                    for chunk in _chunk_list(partner_ids, 500)
+                    for row in conn.execute(
+                        f"SELECT partner_id, active, password_salt, password_hash, created_at "
+                        f"FROM provider_users WHERE partner_id IN ({', '.join('?' for _ in chunk)})",
+                        chunk,
+                    )
+                }
 
-        created = 0
-        updated = 0
-        for partner in partners:
-            rut = _normalize_rut(partner.get("vat") or "")
-            if not rut:
-                continue
-            existing = users_by_partner.get(partner["id"])
-            base_record = {
-                "partner_id": partner["id"],
-                "rut": rut,
-                "display_name": partner.get("name") or "Proveedor",
-                "email": partner.get("email") or "",
-                "phone": partner.get("phone") or partner.get("mobile") or "",
-                "city": partner.get("city") or "",
-                "updated_at": datetime.now().isoformat(),
-            }
-            if existing:
-                existing.update(base_record)
-                existing.setdefault("active", False)
-                updated += 1
-            else:
-                users.append(
-                    {
-                        **base_record,
-                        "active": False,
-                        "password_salt": "",
-                        "password_hash": "",
-                        "created_at": datetime.now().isoformat(),
+                created = 0
+                updated = 0
+                records: List[Dict[str, Any]] = []
+                for partner in partners:
+                    rut = _normalize_rut(partner.get("vat") or "")
+                    if not rut:
+                        continue
+                    current = existing.get(partner["id"])
+                    record = {
+                        "partner_id": partner["id"],
+                        "rut": rut,
+                        "display_name": partner.get("name") or "Proveedor",
+                        "email": partner.get("email") or "",
+                        "phone": partner.get("phone") or partner.get("mobile") or "",
+                        "city": partner.get("city") or "",
+                        "updated_at": datetime.now().isoformat(),
                     }
-                )
-                created += 1
+                    if current:
+                        # Conserva estado y credenciales del usuario existente
+                        record.update(
+                            active=bool(current["active"]),
+                            password_salt=current["password_salt"],
+                            password_hash=current["password_hash"],
+                            created_at=current["created_at"],
+                        )
+                        updated += 1
+                    else:
+                        record.update(
+                            active=False,
+                            password_salt="",
+                            password_hash="",
+                            created_at=datetime.now().isoformat(),
+                        )
+                        created += 1
+                    records.append(record)
 
-        users.sort(key=lambda item: (item.get("display_name") or "").upper())
-        ProviderPortalAuthService._save_users(users)
-        return {"created": created, "updated": updated, "total": len(users)}
+                _upsert_user_rows(conn, records)
+                total = conn.execute("SELECT COUNT(*) FROM provider_users").fetchone()[0]
+        finally:
+            conn.close()
+        return {"created": created, "updated": updated, "total": total}
 
     @staticmethod
     def list_users() -> List[Dict[str, Any]]:
@@ -484,58 +727,29 @@ class ProviderPortalDataService:
         }
 
     def get_recepciones(self, partner_id: int, fecha_inicio: str, fecha_fin: str) -> List[Dict[str, Any]]:
+        """Recepciones del proveedor desde los snapshots materializados (se completan solo los tramos faltantes)."""
         if self.demo_mode:
             return []
-        fecha_inicio_dt, fecha_fin_dt, start_date, end_date = _date_bounds(fecha_inicio, fecha_fin)
-        try:
-            recepciones = get_recepciones_mp(
-                self.odoo_username,
-                self.odoo_password,
-                fecha_inicio_dt,
-                fecha_fin_dt,
-                productor_id=partner_id,
-                solo_hechas=True,
+        _, _, start_date, end_date = _date_bounds(fecha_inicio, fecha_fin)
+        recepciones = portal_snapshots.leer_recepciones(partner_id, start_date, end_date)
+        if recepciones is None:
+            portal_snapshots.asegurar_cobertura(
+                self.odoo, self._fetch_recepciones_rango, partner_id, start_date, end_date
             )
-        except Exception as exc:
-            # En rangos largos algunos proveedores generan respuestas XML-RPC grandes.
-            # Fallback: consultar por tramos y unificar por id.
-            if "IncompleteRead" not in str(exc):
-                raise
-            recepciones = []
-            seen_ids = set()
-            for chunk_start, chunk_end in _date_chunks(start_date, end_date, days=14):
-                try:
-                    partial = get_recepciones_mp(
-                        self.odoo_username,
-                        self.odoo_password,
-                        chunk_start,
-                        chunk_end,
-                        productor_id=partner_id,
-                        solo_hechas=True,
-                    )
-                except Exception as sub_exc:
-                    if "IncompleteRead" not in str(sub_exc):
-                        raise
-                    # Último fallback: consulta diaria para minimizar payload.
-                    partial = []
-                    day_start = date.fromisoformat(chunk_start[:10])
-                    day_end = date.fromisoformat(chunk_end[:10])
-                    for daily_start, daily_end in _date_chunks(day_start, day_end, days=1):
-                        daily = get_recepciones_mp(
-                            self.odoo_username,
-                            self.odoo_password,
-                            daily_start,
-                            daily_end,
-                            productor_id=partner_id,
-                            solo_hechas=True,
-                        )
-                        partial.extend(daily or [])
-                for item in partial or []:
-                    rec_id = item.get("id")
-                    if rec_id in seen_ids:
-                        continue
-                    seen_ids.add(rec_id)
-                    recepciones.append(item)
+            recepciones = portal_snapshots.leer_recepciones(partner_id, start_date, end_date) or []
+        return recepciones
+
+    def _fetch_recepciones_rango(self, partner_id: int, fecha_inicio: str, fecha_fin: str) -> List[Dict[str, Any]]:
+        """Recepciones validadas de una ventana, enriquecidas con QC, fotos y documentos (consulta a Odoo)."""
+        fecha_inicio_dt, fecha_fin_dt, start_date, end_date = _date_bounds(fecha_inicio, fecha_fin)
+        recepciones = get_recepciones_mp(
+            self.odoo_username,
+            self.odoo_password,
+            fecha_inicio_dt,
+            fecha_fin_dt,
+            productor_id=partner_id,
+            solo_hechas=True,
+        )
         if not recepciones:
             return []
 
@@ -569,15 +783,20 @@ class ProviderPortalDataService:
                 "x_studio_mp",
                 "x_studio_one2many_field_mZmK2",
                 "x_studio_one2many_field_rgA7I",
+                "write_date",
                 *self.QC_BINARY_FIELDS,
             ]
+            # bin_size: los campos binarios vienen como tamaño ("35.2 Kb"), no como base64.
+            # Las fotos se descargan bajo demanda por get_quality_check_binary.
             for ids_chunk in _chunk_list([int(x) for x in picking_ids], size=250):
                 quality_checks.extend(
-                    self.odoo.search_read(
+                    self.odoo.execute(
                         "quality.check",
+                        "search_read",
                         [("picking_id", "in", ids_chunk)],
-                        qc_fields,
+                        fields=qc_fields,
                         limit=10000,
+                        context={"bin_size": True},
                     )
                 )
         qc_by_picking: Dict[int, List[Dict[str, Any]]] = {}
@@ -609,6 +828,8 @@ class ProviderPortalDataService:
                             "field": field_name,
                             "name": field_name,
                             "mimetype": "image/jpeg",
+                            "file_size": qc.get(field_name),
+                            "write_date": qc.get("write_date") or "",
                         }
                     )
 
@@ -783,24 +1004,38 @@ class ProviderPortalDataService:
             **financial,
         }
 
-    def get_attachment_content(self, partner_id: int, attachment_id: int) -> Tuple[bytes, Dict[str, Any]]:
+    def get_attachment_content(self, partner_id: int, attachment_id: int) -> BlobRef:
+        """
+        Adjunto en el caché local de binarios (solo se descarga `datas` si no está cacheado).
+        Los bytes se comparten por checksum entre adjuntos idénticos, pero el nombre y el
+        mimetype son siempre los de este adjunto.
+        """
         if self.demo_mode:
             raise ValueError("Adjuntos no disponibles en modo dev sin Odoo")
         attachment_data = self.odoo.read(
             "ir.attachment",
             [attachment_id],
-            ["id", "name", "datas", "mimetype", "res_model", "res_id"],
+            ["id", "name", "mimetype", "res_model", "res_id", "checksum"],
         )
         if not attachment_data:
             raise ValueError("Adjunto no encontrado")
         attachment = attachment_data[0]
         self._assert_attachment_access(partner_id, attachment)
-        raw = base64.b64decode((attachment.get("datas") or "").encode("utf-8"))
-        return raw, {
+
+        meta = {
             "name": attachment.get("name") or f"attachment_{attachment_id}",
             "mimetype": attachment.get("mimetype") or "application/octet-stream",
         }
 
+        def _fetch() -> Tuple[bytes, Dict[str, Any]]:
+            datas = self.odoo.read("ir.attachment", [attachment_id], ["datas"])
+            raw = base64.b64decode(((datas[0].get("datas") if datas else "") or "").encode("utf-8"))
+            return raw, meta
+
+        checksum = attachment.get("checksum")
+        source_key = f"ir.attachment:{checksum}" if checksum else f"ir.attachment:{attachment_id}"
+        return replace(get_or_fetch(source_key, _fetch), **meta)
+
     def _get_attachments_for_recepciones(
         self,
         picking_ids: List[int],
@@ -816,7 +1051,7 @@ class ProviderPortalDataService:
                     self.odoo.search_read(
                         "ir.attachment",
                         [("res_model", "=", "stock.picking"), ("res_id", "in", ids_chunk)],
-                        ["id", "name", "mimetype", "res_model", "res_id", "create_date"],
+                        ["id", "name", "mimetype", "res_model", "res_id", "create_date", "checksum", "file_size"],
                         limit=10000,
                         order="create_date desc",
                     )
@@ -827,7 +1062,7 @@ class ProviderPortalDataService:
                     self.odoo.search_read(
                         "ir.attachment",
                         [("res_model", "=", "quality.check"), ("res_id", "in", ids_chunk)],
-                        ["id", "name", "mimetype", "res_model", "res_id", "create_date"],
+                        ["id", "name", "mimetype", "res_model", "res_id", "create_date", "checksum", "file_size"],
                         limit=10000,
                         order="create_date desc",
                     )
@@ -842,7 +1077,7 @@ class ProviderPortalDataService:
                     self.odoo.search_read(
                         "ir.attachment",
                         [("res_model", "=", model_name), ("res_id", "in", ids_chunk)],
-                        ["id", "name", "mimetype", "res_model", "res_id", "create_date"],
+                        ["id", "name", "mimetype", "res_model", "res_id", "create_date", "checksum", "file_size"],
                         limit=10000,
                         order="create_date desc",
                     )
@@ -875,6 +1110,8 @@ class ProviderPortalDataService:
                     "res_model": res_model,
                     "res_id": res_id,
                     "create_date": attachment.get("create_date") or "",
+                    "checksum": attachment.get("checksum") or "",
+                    "file_size": attachment.get("file_size") or 0,
                     "recepcion_id": recepcion_id,
                 }
             )
@@ -886,7 +1123,7 @@ class ProviderPortalDataService:
         attachments = self.odoo.search_read(
             "ir.attachment",
             [("res_model", "=", "account.move"), ("res_id", "in", invoice_ids)],
-            ["id", "name", "mimetype", "res_id", "create_date"],
+            ["id", "name", "mimetype", "res_id", "create_date", "checksum", "file_size"],
             limit=10000,
             order="create_date desc",
         )
@@ -899,6 +1136,8 @@ class ProviderPortalDataService:
                     "name": attachment.get("name") or "Documento",
                     "mimetype": attachment.get("mimetype") or "application/octet-stream",
                     "create_date": attachment.get("create_date") or "",
+                    "checksum": attachment.get("checksum") or "",
+                    "file_size": attachment.get("file_size") or 0,
                 }
             )
         return result
@@ -908,13 +1147,16 @@ class ProviderPortalDataService:
         partner_id: int,
         qc_id: int,
         field_name: str,
-    ) -> Tuple[bytes, Dict[str, Any]]:
+    ) -> BlobRef:
+        """Foto de un control de calidad desde el caché local (clave: qc, campo y write_date)."""
         if field_name not in self.QC_BINARY_FIELDS:
             raise ValueError("Campo de foto no permitido")
-        checks = self.odoo.read(
+        checks = self.odoo.execute(
             "quality.check",
+            "read",
             [qc_id],
-            ["id", "picking_id", field_name],
+            fields=["id", "picking_id", "write_date", field_name],
+            context={"bin_size": True},
         )
         if not checks:
             raise ValueError("Control de calidad no encontrado")
@@ -930,22 +1172,29 @@ class ProviderPortalDataService:
         if access_partner_id != partner_id:
             raise ValueError("Sin acceso a la foto")
 
-        payload = qc.get(field_name)
-        if not payload:
+        if not qc.get(field_name):
             raise ValueError("Foto no disponible")
 
-        raw = base64.b64decode(payload.encode("utf-8"))
         picking_name = (pickings[0].get("name") if pickings else "recepcion") or "recepcion"
-        return raw, {
-            "name": f"{picking_name}_{field_name}.jpg",
-            "mimetype": "image/jpeg",
-        }
 
-    def get_document_pdf(self, partner_id: int, move_id: int) -> Tuple[bytes, Dict[str, Any]]:
+        def _fetch() -> Tuple[bytes, Dict[str, Any]]:
+            data = self.odoo.read("quality.check", [qc_id], [field_name])
+            payload = (data[0].get(field_name) if data else "") or ""
+            if not payload:
+                raise ValueError("Foto no disponible")
+            return base64.b64decode(payload.encode("utf-8")), {
+                "name": f"{picking_name}_{field_name}.jpg",
+                "mimetype": "image/jpeg",
+            }
+
+        return get_or_fetch(f"quality.check:{qc_id}:{field_name}:{qc.get('write_date') or ''}", _fetch)
+
+    def get_document_pdf(self, partner_id: int, move_id: int) -> BlobRef:
+        """PDF del documento desde el caché local (clave: move y write_date)."""
         moves = self.odoo.read(
             "account.move",
             [move_id],
-            ["id", "name", "partner_id", "sii_file_pdf"],
+            ["id", "name", "partner_id", "write_date"],
         )
         if not moves:
             raise ValueError("Documento no encontrado")
@@ -955,32 +1204,36 @@ class ProviderPortalDataService:
         if move_partner_id != partner_id:
             raise ValueError("Sin acceso al documento")
 
-        sii_pdf = move.get("sii_file_pdf")
-        if sii_pdf:
-            return base64.b64decode(sii_pdf.encode("utf-8")), {
-                "name": f"{move.get('name') or 'documento'}.pdf",
-                "mimetype": "application/pdf",
-            }
+        def _fetch() -> Tuple[bytes, Dict[str, Any]]:
+            sii_data = self.odoo.read("account.move", [move_id], ["sii_file_pdf"])
+            sii_pdf = sii_data[0].get("sii_file_pdf") if sii_data else None
+            if sii_pdf:
+                return base64.b64decode(sii_pdf.encode("utf-8")), {
+                    "name": f"{move.get('name') or 'documento'}.pdf",
+                    "mimetype": "application/pdf",
+                }
 
-        pdf_attachments = self.odoo.search_read(
-            "ir.attachment",
-            [
-                ("res_model", "=", "account.move"),
-                ("res_id", "=", move_id),
-                ("mimetype", "=", "application/pdf"),
-            ],
-            ["id", "name", "datas", "mimetype"],
-            limit=1,
-            order="create_date desc",
-        )
-        if pdf_attachments and pdf_attachments[0].get("datas"):
-            att = pdf_attachments[0]
-            return base64.b64decode(att["datas"].encode("utf-8")), {
-                "name": att.get("name") or f"{move.get('name') or 'documento'}.pdf",
-                "mimetype": att.get("mimetype") or "application/pdf",
-            }
+            pdf_attachments = self.odoo.search_read(
+                "ir.attachment",
+                [
+                    ("res_model", "=", "account.move"),
+                    ("res_id", "=", move_id),
+                    ("mimetype", "=", "application/pdf"),
+                ],
+                ["id", "name", "datas", "mimetype"],
+                limit=1,
+                order="create_date desc",
+            )
+            if pdf_attachments and pdf_attachments[0].get("datas"):
+                att = pdf_attachments[0]
+                return base64.b64decode(att["datas"].encode("utf-8")), {
+                    "name": att.get("name") or f"{move.get('name') or 'documento'}.pdf",
+                    "mimetype": att.get("mimetype") or "application/pdf",
+                }
 
-        raise ValueError("Documento sin PDF disponible")
+            raise ValueError("Documento sin PDF disponible")
+
+        return get_or_fetch(f"account.move:{move_id}:pdf:{move.get('write_date') or ''}", _fetch)
 
     def _assert_attachment_access(self, partner_id: int, attachment: Dict[str, Any]) -> None:
         res_model = attachment.get("res_model")
@@ -1014,3 +1267,67 @@ class ProviderPortalDataService:
                 raise ValueError("Sin acceso al adjunto")
             return
         raise ValueError("Modelo de adjunto no permitido")
+
+
+# ============ MATERIALIZADOR DE SNAPSHOTS (HILO DE FONDO) ============
+
+SNAPSHOT_PREWARM_DAYS = 365
+
+_materializer_stop = threading.Event()
+_materializer_thread: Optional[threading.Thread] = None
+
+
+def _materializer_loop() -> None:
+    """Refresca los snapshots de proveedores activos cada SYNC_INTERVAL_SECONDS."""
+    while True:
+        try:
+            service = ProviderPortalDataService()
+            if not service.demo_mode:
+                activos = {
+                    int(u["partner_id"])
+                    for u in ProviderPortalAuthService._load_users()
+                    if u.get("active") and u.get("partner_id")
+                }
+                a_sincronizar = set(portal_snapshots.proveedores_a_refrescar())
+                # Sin acceso reciente: solo los que tienen pickings modificados
+                try:
+                    a_sincronizar.update(
+                        portal_snapshots.proveedores_modificados(service.odoo, excluir=a_sincronizar)
+                    )
+                except Exception as exc:
+                    print(f"[PortalSnapshots] Error verificando cambios de proveedores: {exc}")
+                hoy = date.today()
+                for partner_id in sorted(activos | a_sincronizar):
+                    if _materializer_stop.is_set():
+                        return
+                    try:
+                        if partner_id in a_sincronizar:
+                            portal_snapshots.sincronizar_proveedor(
+                                service.odoo, service._fetch_recepciones_rango, partner_id
+                            )
+                        else:
+                            # Pre-carga: el primer login del proveedor ya encuentra su historial
+                            portal_snapshots.asegurar_cobertura(
+                                service.odoo, service._fetch_recepciones_rango, partner_id,
+                                hoy - timedelta(days=SNAPSHOT_PREWARM_DAYS), hoy,
+                            )
+                    except Exception as exc:
+                        print(f"[PortalSnapshots] Error sincronizando proveedor {partner_id}: {exc}")
+        except Exception as exc:
+            print(f"[PortalSnapshots] Materializador sin conexión a Odoo: {exc}")
+        if _materializer_stop.wait(portal_snapshots.SYNC_INTERVAL_SECONDS):
+            return
+
+
+def start_snapshot_materializer() -> None:
+    """Inicia el hilo que mantiene los snapshots de recepciones por proveedor."""
+    global _materializer_thread
+    if _materializer_thread and _materializer_thread.is_alive():
+        return
+    _materializer_stop.clear()
+    _materializer_thread = threading.Thread(target=_materializer_loop, name="portal-snapshots", daemon=True)
+    _materializer_thread.start()
+
+
+def stop_snapshot_materializer() -> None:
+    _materializer_stop.set()
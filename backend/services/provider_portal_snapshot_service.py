@@ -0,0 +1,344 @@
+"""
+Snapshots materializados de recepciones por proveedor (portal de proveedores).
+
+Las recepciones validadas de un proveedor casi no cambian, pero armarlas con
+get_recepciones_mp + QC + adjuntos es una consulta pesada. Este módulo guarda
+en SQLite una fila por recepción (ya enriquecida con QC, fotos y documentos) y
+mantiene por proveedor:
+
+- cobertura: rango de fechas [desde, hasta] ya materializado
+- marca: último write_date de stock.picking visto
+
+El portal lee siempre del store local. La primera vez que un proveedor pide un
+rango no cubierto se materializa por ventanas de WINDOW_DAYS (una consulta por
+ventana, sin la cascada de reintentos por tramos). Un hilo de fondo extiende la
+cobertura hasta hoy y re-materializa solo los días de pickings modificados.
+Los proveedores sin acceso reciente no se refrescan en cada ciclo, pero un
+read_group por ciclo compara el último write_date de todos contra su marca y
+sincroniza los que cambiaron, así ningún snapshot queda desactualizado.
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+SNAPSHOT_DB = Path(__file__).parent.parent / "data" / "provider_portal_snapshots.db"
+WINDOW_DAYS = 31
+SYNC_INTERVAL_SECONDS = 300
+ACCESS_WINDOW_DAYS = 30  # Proveedores que se siguen refrescando tras su último acceso
+
+# Pickings de recepción MP (mismo criterio que recepcion_service.get_recepciones_mp)
+RECEPCION_PICKING_TYPE_IDS = [1, 217, 164, 62]
+
+# fetch(partner_id, "YYYY-MM-DD", "YYYY-MM-DD") -> filas enriquecidas de la ventana
+FetchRango = Callable[[int, str, str], List[Dict[str, Any]]]
+
+_db_lock = threading.Lock()
+_schema_initialized = False
+_partner_locks: Dict[int, threading.Lock] = {}
+_partner_locks_guard = threading.Lock()
+
+
+def _get_connection() -> sqlite3.Connection:
+    conn = sqlite3.connect(SNAPSHOT_DB, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _ensure_db() -> None:
+    global _schema_initialized
+    if _schema_initialized:
+        return
+    with _db_lock:
+        if _schema_initialized:
+            return
+        SNAPSHOT_DB.parent.mkdir(parents=True, exist_ok=True)
+        conn = _get_connection()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS portal_recepciones (
+                    picking_id INTEGER PRIMARY KEY,
+                    partner_id INTEGER NOT NULL,
+                    fecha TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                );
+
+                CREATE INDEX IF NOT EXISTS idx_portal_recepciones_partner_fecha
+                    ON portal_recepciones(partner_id, fecha);
+
+                CREATE TABLE IF NOT EXISTS portal_partner_sync (
+                    partner_id INTEGER PRIMARY KEY,
+                    desde TEXT NOT NULL,
+                    hasta TEXT NOT NULL,
+                    write_date_mark TEXT NOT NULL DEFAULT '',
+                    last_sync_at TEXT,
+                    last_access_at TEXT
+                );
+                """
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        _schema_initialized = True
+
+
+def _partner_lock(partner_id: int) -> threading.Lock:
+    with _partner_locks_guard:
+        return _partner_locks.setdefault(int(partner_id), threading.Lock())
+
+
+def _get_state(partner_id: int) -> Optional[Dict[str, Any]]:
+    _ensure_db()
+    conn = _get_connection()
+    try:
+        row = conn.execute("SELECT * FROM portal_partner_sync WHERE partner_id = ?", (int(partner_id),)).fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row else None
+
+
+def _save_state(partner_id: int, desde: date, hasta: date, mark: str) -> None:
+    conn = _get_connection()
+    try:
+        with conn:
+            conn.execute(
+                """
+                INSERT INTO portal_partner_sync (partner_id, desde, hasta, write_date_mark, last_sync_at, last_access_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(partner_id) DO UPDATE SET
+                    desde = excluded.desde, hasta = excluded.hasta,
+                    write_date_mark = excluded.write_date_mark, last_sync_at = excluded.last_sync_at
+                """,
+                (int(partner_id), desde.isoformat(), hasta.isoformat(), mark,
+                 datetime.now().isoformat(), datetime.now().isoformat()),
+            )
+    finally:
+        conn.close()
+
+
+def _windows(desde: date, hasta: date) -> Iterable[Tuple[date, date]]:
+    cur = desde
+    while cur <= hasta:
+        fin = min(cur + timedelta(days=WINDOW_DAYS - 1), hasta)
+        yield cur, fin
+        cur = fin + timedelta(days=1)
+
+
+def _dias_a_ventanas(dias: Iterable[date]) -> List[Tuple[date, date]]:
+    """Agrupa días sueltos en tramos contiguos (acotados a WINDOW_DAYS)."""
+    ventanas: List[Tuple[date, date]] = []
+    for dia in sorted(set(dias)):
+        if ventanas and dia == ventanas[-1][1] + timedelta(days=1) \
+                and (dia - ventanas[-1][0]).days < WINDOW_DAYS:
+            ventanas[-1] = (ventanas[-1][0], dia)
+        else:
+            ventanas.append((dia, dia))
+    return ventanas
+
+
+def _materializar(fetch: FetchRango, partner_id: int, desde: date, hasta: date) -> int:
+    """Reemplaza las filas del proveedor en [desde, hasta] por lo que retorna Odoo, ventana por ventana."""
+    total = 0
+    for ini, fin in _windows(desde, hasta):
+        filas = fetch(int(partner_id), ini.isoformat(), fin.isoformat())
+        ahora = datetime.now().isoformat()
+        conn = _get_connection()
+        try:
+            with conn:
+                conn.execute(
+                    "DELETE FROM portal_recepciones WHERE partner_id = ? AND substr(fecha, 1, 10) BETWEEN ? AND ?",
+                    (int(partner_id), ini.isoformat(), fin.isoformat()),
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO portal_recepciones (picking_id, partner_id, fecha, payload, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (int(fila["id"]), int(partner_id), str(fila.get("fecha") or ""),
+                         json.dumps(fila, default=str), ahora)
+                        for fila in filas if fila.get("id")
+                    ],
+                )
+        finally:
+            conn.close()
+        total += len(filas)
+    return total
+
+
+def _max_write_date(odoo, partner_id: int) -> str:
+    ultimos = odoo.search_read(
+        "stock.picking",
+        [
+            ("partner_id", "=", int(partner_id)),
+            ("picking_type_id", "in", RECEPCION_PICKING_TYPE_IDS),
+            ("x_studio_categora_de_producto", "=", "MP"),
+        ],
+        ["write_date"],
+        limit=1,
+        order="write_date desc",
+    )
+    return (ultimos[0].get("write_date") or "") if ultimos else ""
+
+
+def _dias_modificados(odoo, partner_id: int, mark: str) -> Tuple[List[date], str]:
+    """Días de recepciones modificadas desde la marca y nueva marca."""
+    cambiados = odoo.search_read(
+        "stock.picking",
+        [
+            ("partner_id", "=", int(partner_id)),
+            ("picking_type_id", "in", RECEPCION_PICKING_TYPE_IDS),
+            ("x_studio_categora_de_producto", "=", "MP"),
+            ("write_date", ">", mark),
+        ],
+        ["date_done", "scheduled_date", "write_date"],
+        limit=10000,
+        order="write_date asc",
+    )
+    dias: List[date] = []
+    nueva_marca = mark
+    for picking in cambiados:
+        for campo in ("date_done", "scheduled_date"):
+            valor = str(picking.get(campo) or "")[:10]
+            if valor:
+                try:
+                    dias.append(date.fromisoformat(valor))
+                except ValueError:
+                    pass
+        nueva_marca = max(nueva_marca, picking.get("write_date") or "")
+    return dias, nueva_marca
+
+
+def asegurar_cobertura(odoo, fetch: FetchRango, partner_id: int, desde: date, hasta: date) -> None:
+    """
+    Garantiza que [desde, min(hasta, hoy)] esté materializado para el proveedor.
+    Solo consulta Odoo por los tramos que faltan.
+    """
+    hasta = min(hasta, date.today())
+    with _partner_lock(partner_id):
+        state = _get_state(partner_id)
+        if state is None:
+            mark = _max_write_date(odoo, partner_id)
+            print(f"[PortalSnapshots] Materializando proveedor {partner_id}: {desde} a {hasta}")
+            _materializar(fetch, partner_id, desde, hasta)
+            _save_state(partner_id, desde, hasta, mark)
+            return
+
+        cub_desde = date.fromisoformat(state["desde"])
+        cub_hasta = date.fromisoformat(state["hasta"])
+        if desde < cub_desde:
+            _materializar(fetch, partner_id, desde, cub_desde - timedelta(days=1))
+            cub_desde = desde
+        if hasta > cub_hasta:
+            _materializar(fetch, partner_id, cub_hasta + timedelta(days=1), hasta)
+            cub_hasta = hasta
+        if (cub_desde, cub_hasta) != (date.fromisoformat(state["desde"]), date.fromisoformat(state["hasta"])):
+            _save_state(partner_id, cub_desde, cub_hasta, state["write_date_mark"])
+
+
+def sincronizar_proveedor(odoo, fetch: FetchRango, partner_id: int) -> int:
+    """
+    Refresco incremental: extiende la cobertura hasta hoy y re-materializa solo
+    los días con pickings modificados desde la última marca.
+    """
+    with _partner_lock(partner_id):
+        state = _get_state(partner_id)
+        if state is None:
+            return 0
+        cub_desde = date.fromisoformat(state["desde"])
+        cub_hasta = date.fromisoformat(state["hasta"])
+        hoy = date.today()
+
+        dias, mark = _dias_modificados(odoo, partner_id, state["write_date_mark"])
+        dias = [d for d in dias if cub_desde <= d <= cub_hasta]
+        total = 0
+        for ini, fin in _dias_a_ventanas(dias):
+            total += _materializar(fetch, partner_id, ini, fin)
+        if hoy > cub_hasta:
+            total += _materializar(fetch, partner_id, cub_hasta + timedelta(days=1), hoy)
+        _save_state(partner_id, cub_desde, max(cub_hasta, hoy), mark)
+        return total
+
+
+def leer_recepciones(partner_id: int, desde: date, hasta: date) -> Optional[List[Dict[str, Any]]]:
+    """
+    Recepciones materializadas del proveedor en el rango (más recientes primero).
+    None si el rango no está cubierto todavía.
+    """
+    state = _get_state(partner_id)
+    if state is None:
+        return None
+    if desde < date.fromisoformat(state["desde"]) or min(hasta, date.today()) > date.fromisoformat(state["hasta"]):
+        return None
+    conn = _get_connection()
+    try:
+        rows = conn.execute(
+            "SELECT payload FROM portal_recepciones "
+            "WHERE partner_id = ? AND substr(fecha, 1, 10) BETWEEN ? AND ? "
+            "ORDER BY fecha DESC, picking_id DESC",
+            (int(partner_id), desde.isoformat(), hasta.isoformat()),
+        ).fetchall()
+        with conn:
+            conn.execute(
+                "UPDATE portal_partner_sync SET last_access_at = ? WHERE partner_id = ?",
+                (datetime.now().isoformat(), int(partner_id)),
+            )
+    finally:
+        conn.close()
+    return [json.loads(row["payload"]) for row in rows]
+
+
+def proveedores_modificados(odoo, excluir: Iterable[int] = ()) -> List[int]:
+    """
+    Proveedores materializados cuyo último write_date de recepciones supera su
+    marca. Una sola consulta agrupada por partner para todos los proveedores.
+    """
+    _ensure_db()
+    excluidos = {int(pid) for pid in excluir}
+    conn = _get_connection()
+    try:
+        rows = conn.execute("SELECT partner_id, write_date_mark FROM portal_partner_sync").fetchall()
+    finally:
+        conn.close()
+    marcas = {row["partner_id"]: row["write_date_mark"] or "" for row in rows
+              if row["partner_id"] not in excluidos}
+    if not marcas:
+        return []
+
+    dominio = [
+        ("partner_id", "in", sorted(marcas)),
+        ("picking_type_id", "in", RECEPCION_PICKING_TYPE_IDS),
+        ("x_studio_categora_de_producto", "=", "MP"),
+    ]
+    marca_minima = min(marcas.values())
+    if marca_minima:
+        dominio.append(("write_date", ">", marca_minima))
+    grupos = odoo.execute("stock.picking", "read_group", dominio, ["write_date:max"], ["partner_id"], lazy=False)
+
+    modificados = []
+    for grupo in grupos:
+        partner = grupo.get("partner_id")
+        partner_id = partner[0] if isinstance(partner, (list, tuple)) and partner else partner
+        if partner_id in marcas and (grupo.get("write_date") or "") > marcas[partner_id]:
+            modificados.append(int(partner_id))
+    return sorted(modificados)
+
+
+def proveedores_a_refrescar() -> List[int]:
+    """Proveedores materializados con acceso reciente."""
+    _ensure_db()
+    limite = (datetime.now() - timedelta(days=ACCESS_WINDOW_DAYS)).isoformat()
+    conn = _get_connection()
+    try:
+        rows = conn.execute(
+            "SELECT partner_id FROM portal_partner_sync WHERE last_access_at >= ?", (limite,)
+        ).fetchall()
+    finally:
+        conn.close()
+    return [row["partner_id"] for row in rows]
@@ -0,0 +1,213 @@
+"""
+Base común de los read models incrementales sincronizados desde Odoo.
+
+comercial_hechos_store, bandejas_ledger_store y containers/progress_store
+mantienen tablas crudas en memoria (id -> fila normalizada) con el mismo ciclo:
+
+- carga inicial completa paginando por id (keyset: id > último id, sin offset)
+- como máximo cada refresco_segundos, deltas: solo los registros con
+  write_date >= la marca de cada modelo (inclusiva: releer es idempotente)
+- cada reconciliacion_segundos, comparación de IDs vigentes para descartar
+  registros borrados (unlink no deja write_date) o que dejaron de ser elegibles
+- opcionalmente, persistencia de tablas y marcas en Parquet + estado.json,
+  recargadas al reiniciar
+
+ReadModelIncremental implementa ese ciclo, la paginación, los lotes, las marcas
+y la persistencia. Cada store define solo lo propio de su modelo: cómo
+normalizar, qué leer en la carga inicial, los deltas y la reconciliación, y
+cómo armar sus vistas sobre las tablas.
+
+Uso:
+    _store = ReadModelIncremental('BandejasLedger', ['movimientos', 'pickings'],
+                                  ['stock.move', 'stock.picking'], store_dir=STORE_DIR)
+    _store.refrescar(odoo, _carga_inicial, _aplicar_deltas, _reconciliar)
+"""
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+
+class ReadModelIncremental:
+    """Tablas crudas por id + marcas write_date por modelo, con refresco, reconciliación y persistencia."""
+
+    def __init__(self, nombre: str, tablas: Iterable[str], modelos: Iterable[str],
+                 store_dir: Optional[Path] = None, refresco_segundos: int = 60,
+                 reconciliacion_segundos: int = 3600, tamano_pagina: int = 5000, tamano_lote: int = 1000):
+        self.nombre = nombre  # prefijo de los logs
+        self.store_dir = store_dir  # None: solo en memoria
+        self.refresco_segundos = refresco_segundos
+        self.reconciliacion_segundos = reconciliacion_segundos
+        self.tamano_pagina = tamano_pagina
+        self.tamano_lote = tamano_lote
+        self.tablas: Dict[str, Dict[int, Any]] = {t: {} for t in tablas}
+        self.estado: Dict[str, Any] = {
+            'cargado': False,
+            'verificado': 0.0,
+            'reconciliado': 0.0,
+            'version': 0,  # sube con cada cambio; nunca retrocede (las vistas ensambladas la comparan)
+            'marcas': {m: '' for m in modelos},
+        }
+        self.lock = threading.RLock()
+
+    @property
+    def version(self) -> int:
+        return self.estado['version']
+
+    @property
+    def marcas(self) -> Dict[str, str]:
+        return self.estado['marcas']
+
+    # ==================== LECTURA DESDE ODOO ====================
+
+    def paginar(self, odoo, model: str, domain: List, fields: List[str]) -> List[Dict]:
+        """search_read completo paginando por id (keyset)."""
+        registros = []
+        last_id = 0
+        while True:
+            page = odoo.search_read(model, domain + [('id', '>', last_id)], fields,
+                                    limit=self.tamano_pagina, order='id asc')
+            registros.extend(page)
+            if len(page) < self.tamano_pagina:
+                return registros
+            last_id = page[-1]['id']
+
+    def por_lotes(self, ids: Iterable[Any]) -> Iterable[List[Any]]:
+        ids = sorted(ids)
+        for i in range(0, len(ids), self.tamano_lote):
+            yield ids[i:i + self.tamano_lote]
+
+    def marcar(self, model: str, registros: Iterable[Dict]) -> None:
+        """Avanza la marca del modelo al mayor write_date leído."""
+        marcas = self.estado['marcas']
+        for r in registros:
+            if (r.get('write_date') or '') > marcas[model]:
+                marcas[model] = r['write_date']
+
+    def cambiados(self, odoo, model: str, domain: List) -> List[int]:
+        """IDs modificados desde la marca del modelo (la marca avanza aunque dejen de ser elegibles)."""
+        registros = self.paginar(odoo, model, domain + [('write_date', '>=', self.marcas[model])], ['write_date'])
+        self.marcar(model, registros)
+        return [r['id'] for r in registros]
+
+    def conocidos_cambiados(self, odoo, model: str, ids: Iterable[int]) -> List[int]:
+        """
+        De los IDs ya cargados, los modificados desde la marca del modelo. La
+        marca la avanza quien los relea.
+        """
+        cambiados = []
+        for lote in self.por_lotes(ids):
+            cambiados += odoo.search(model, [('id', 'in', lote), ('write_date', '>=', self.marcas[model])])
+        return cambiados
+
+    def descartar_ausentes(self, tabla: str, vigentes: Iterable[int]) -> set:
+        """Quita de la tabla los IDs que ya no están vigentes en Odoo y los retorna."""
+        filas = self.tablas[tabla]
+        sobrantes = set(filas) - set(vigentes)
+        for registro_id in sobrantes:
+            filas.pop(registro_id, None)
+        return sobrantes
+
+    # ==================== CICLO ====================
+
+    def refrescar(self, odoo, carga_inicial: Callable, aplicar_deltas: Callable,
+                  reconciliar: Callable, forzar: bool = False) -> None:
+        """
+        Carga el store (de disco o, si no hay, desde Odoo) y luego aplica deltas
+        como máximo cada refresco_segundos; reconcilia cada reconciliacion_segundos.
+
+        aplicar_deltas y reconciliar retornan True si cambiaron las tablas.
+        """
+        with self.lock:
+            ahora = time.time()
+            if not self.estado['cargado']:
+                if not self.cargar_disco():
+                    for tabla in self.tablas.values():
+                        tabla.clear()
+                    carga_inicial(odoo)
+                    self.estado['cargado'] = True
+                    self.estado['verificado'] = self.estado['reconciliado'] = time.time()
+                    self.estado['version'] += 1
+                    self.guardar()
+                    return
+                forzar = True
+            if not forzar and ahora - self.estado['verificado'] < self.refresco_segundos:
+                return
+            self.estado['verificado'] = ahora
+            try:
+                cambios = aplicar_deltas(odoo)
+                if ahora - self.estado['reconciliado'] >= self.reconciliacion_segundos:
+                    self.estado['reconciliado'] = ahora
+                    cambios = reconciliar(odoo) or cambios
+                if cambios:
+                    self.estado['version'] += 1
+                    self.guardar()
+            except Exception as e:
+                print(f"[{self.nombre}] Error aplicando deltas: {e}")
+
+    def invalidar(self) -> None:
+        """Descarta el store en memoria y en disco; la próxima consulta recarga desde Odoo."""
+        with self.lock:
+            for tabla in self.tablas.values():
+                tabla.clear()
+            self.estado['cargado'] = False
+            self.estado['marcas'] = {m: '' for m in self.estado['marcas']}
+            self.estado['version'] += 1
+            if self.store_dir is not None:
+                (self.store_dir / "estado.json").unlink(missing_ok=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'cargado': self.estado['cargado'],
+                'version': self.estado['version'],
+                'marcas': dict(self.estado['marcas']),
+                **{nombre: len(tabla) for nombre, tabla in self.tablas.items()},
+            }
+
+    # ==================== PERSISTENCIA ====================
+
+    def guardar(self) -> None:
+        if self.store_dir is None:
+            return
+        try:
+            self.store_dir.mkdir(parents=True, exist_ok=True)
+            for nombre, tabla in self.tablas.items():
+                df = pd.DataFrame.from_dict(tabla, orient='index')
+                df.index.name = 'id'
+                df.to_parquet(self.store_dir / f"{nombre}.parquet")
+            with open(self.store_dir / "estado.json", "w", encoding="utf-8") as f:
+                json.dump({'marcas': self.estado['marcas'], 'reconciliado': self.estado['reconciliado']}, f)
+        except Exception as e:
+            print(f"[{self.nombre}] No se pudo persistir el store: {e}")
+
+    def cargar_disco(self) -> bool:
+        if self.store_dir is None:
+            return False
+        estado_path = self.store_dir / "estado.json"
+        if not estado_path.exists():
+            return False
+        try:
+            with open(estado_path, "r", encoding="utf-8") as f:
+                estado = json.load(f)
+            tablas = {}
+            for nombre in self.tablas:
+                df = pd.read_parquet(self.store_dir / f"{nombre}.parquet")
+                tablas[nombre] = {int(i): fila for i, fila in zip(df.index, df.to_dict('records'))}
+        except Exception as e:
+            print(f"[{self.nombre}] Store en disco inválido, se recarga desde Odoo: {e}")
+            return False
+        for nombre, filas in tablas.items():
+            # En el mismo dict: los stores pueden tener referencias a sus tablas
+            self.tablas[nombre].clear()
+            self.tablas[nombre].update(filas)
+        self.estado['marcas'].update(estado.get('marcas') or {})
+        self.estado['reconciliado'] = float(estado.get('reconciliado') or 0)
+        self.estado['cargado'] = True
+        self.estado['version'] += 1
+        resumen = ", ".join(f"{len(t)} {n}" for n, t in self.tablas.items())
+        print(f"[{self.nombre}] Store recuperado de disco: {resumen}")
+        return True
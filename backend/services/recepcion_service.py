@@ -5,7 +5,8 @@ Migrado desde recepcion/backend/recepcion_service.py
 """
 from typing import List, Dict, Any, Optional
 from shared.odoo_client import OdooClient
-from backend.cache import get_cache, OdooCache
+from backend.cache import get_cache
+from backend.services.producto_dimension_service import get_productos
 
 # =============================================================================
 # OVERRIDE DE ORIGEN: Pickings que deben aparecer con origen diferente al de Odoo
@@ -73,29 +74,6 @@ def _normalize_categoria(cat: str) -> str:
     return c
 
 
-def _resolve_variedad_field(client: OdooClient) -> Optional[str]:
-    try:
-        fields = client.execute("product.template", "fields_get", [], {"attributes": ["type"]}) or {}
-        for candidate in ("x_studio_categora_variedad", "x_studio_variedad"):
-            if candidate in fields:
-                return candidate
-    except Exception as e:
-        print(f"[WARNING] No se pudo resolver campo de variedad: {e}")
-    return None
-
-
-def _extract_variedad_text(raw: Any, variedad_map: Dict[int, str]) -> str:
-    if not raw:
-        return ""
-    if isinstance(raw, (list, tuple)):
-        if len(raw) > 1 and isinstance(raw[0], int):
-            return str(raw[1] or "")
-        if all(isinstance(v, int) for v in raw):
-            names = [variedad_map.get(v, "") for v in raw if variedad_map.get(v)]
-            return ", ".join(names)
-    return str(raw)
-
-
 def get_recepciones_mp(username: str, password: str, fecha_inicio: str, fecha_fin: str, productor_id: Optional[int] = None, solo_hechas: bool = True, origen: Optional[List[str]] = None, estados: Optional[List[str]] = None) -> List[Dict[str, Any]]:
     """
     Obtiene recepciones de materia prima con datos de calidad.
@@ -314,112 +292,19 @@ def get_recepciones_mp(username: str, password: str, fecha_inicio: str, fecha_fi
                 prod_id = prod[0] if isinstance(prod, (list, tuple)) else prod
                 all_product_ids.add(prod_id)
     
-    # ============ PASO 3: Obtener TODOS los productos en UNA llamada ============
+    # ============ PASO 3: Productos desde la dimensión compartida ============
     product_info_map = {}
-    template_ids = set()
     
     if all_product_ids:
-        # Intentar obtener del caché
-        cache_key = f"products_mp_v2:{hash(tuple(sorted(all_product_ids)))}"
-        cached = cache.get(cache_key)
-        
-        # VALIDACIÓN CRÍTICA: Verificar que el caché devuelve un diccionario
-        if cached:
-            if isinstance(cached, dict):
-                product_info_map = cached
-            else:
-                print(f"[ERROR CRÍTICO] Caché de productos corrupto: se esperaba dict, se recibió {type(cached)}")
-                print(f"[ERROR] Limpiando caché corrupto para key: {cache_key}")
-                cache.invalidate(cache_key)  # Método correcto es invalidate(), no delete()
-                cached = None  # Forzar recarga desde Odoo
-        
-        if not cached:
-            product_infos = client.read(
-                "product.product", 
-                list(all_product_ids), 
-                ["id", "product_tmpl_id", "categ_id"]
-            )
-            
-            for p in product_infos:
-                tmpl = p.get("product_tmpl_id")
-                if tmpl:
-                    tmpl_id = tmpl[0] if isinstance(tmpl, (list, tuple)) else tmpl
-                    template_ids.add(tmpl_id)
-            
-            # Obtener templates con campo de manejo, tipo de fruta y variedad
-            template_map = {}
-            if template_ids:
-                variedad_field = _resolve_variedad_field(client)
-                template_fields = ["id", "name", "default_code", "x_studio_categora_tipo_de_manejo", "x_studio_sub_categora"]
-                if variedad_field:
-                    template_fields.append(variedad_field)
-
-                templates = client.read(
-                    "product.template", 
-                    list(template_ids), 
-                    template_fields
-                )
-
-                variedad_ids = set()
-                if variedad_field:
-                    for t in templates:
-                        raw_variedad = t.get(variedad_field)
-                        if isinstance(raw_variedad, list) and raw_variedad and all(isinstance(v, int) for v in raw_variedad):
-                            variedad_ids.update(raw_variedad)
-
-                variedad_map: Dict[int, str] = {}
-                if variedad_ids:
-                    try:
-                        for v in client.read("x_variedad", list(variedad_ids), ["id", "display_name"]):
-                            variedad_map[v["id"]] = v.get("display_name", "")
-                    except Exception as e:
-                        print(f"[WARNING] No se pudo leer x_variedad en get_recepciones_mp: {e}")
-
-                for t in templates:
-                    manejo = t.get("x_studio_categora_tipo_de_manejo", "")
-                    # Si es tupla/lista (selection), tomar el valor legible
-                    if isinstance(manejo, (list, tuple)) and len(manejo) > 1:
-                        manejo = manejo[1]
-                    
-                    # Tipo de fruta del producto (x_studio_sub_categora = "Categoría Tipo de Fruta")
-                    tipo_fruta_prod = t.get("x_studio_sub_categora", "")
-                    if isinstance(tipo_fruta_prod, (list, tuple)) and len(tipo_fruta_prod) > 1:
-                        tipo_fruta_prod = tipo_fruta_prod[1]
-                    
-                    template_map[t["id"]] = {
-                        "name": t.get("name", ""),
-                        "default_code": t.get("default_code", "") or "",
-                        "manejo": manejo or "",
-                        "tipo_fruta": tipo_fruta_prod or "",
-                        "variedad": _extract_variedad_text(t.get(variedad_field), variedad_map) if variedad_field else ""
-                    }
-
-            
-            # Mapear producto -> info completa
-            for info in product_infos:
-                pid = info.get("id")
-                tmpl = info.get("product_tmpl_id")
-                tmpl_id = tmpl[0] if isinstance(tmpl, (list, tuple)) else tmpl if tmpl else None
-                categ = info.get("categ_id", [None, ""])
-                categ_name = categ[1] if isinstance(categ, (list, tuple)) else ""
-                tmpl_data = template_map.get(tmpl_id, {})
-                
-                product_info_map[pid] = {
-                    "categ": categ_name, 
-                    "name": tmpl_data.get("name", ""),
-                    "default_code": tmpl_data.get("default_code", ""),
-                    "manejo": tmpl_data.get("manejo", ""),
-                    "tipo_fruta": tmpl_data.get("tipo_fruta", ""),
-                    "variedad": tmpl_data.get("variedad", "")
-                }
-            
-            # VALIDACIÓN: Asegurar que product_info_map es un diccionario antes de cachear
-            if not isinstance(product_info_map, dict):
-                print(f"[ERROR CRÍTICO] product_info_map no es diccionario antes de cachear: {type(product_info_map)}")
-                product_info_map = {}  # Resetear a diccionario vacío
-            else:
-                # Cachear productos por 30 minutos
-                cache.set(cache_key, product_info_map, ttl=OdooCache.TTL_PRODUCTOS)
+        for pid, prod in get_productos(client, all_product_ids).items():
+            product_info_map[pid] = {
+                "categ": prod["categ"],
+                "name": prod["name"],
+                "default_code": prod["default_code"],
+                "manejo": prod["manejo"],
+                "tipo_fruta": prod["especie"],
+                "variedad": prod["variedad"]
+            }
     
     checks_map = {}
     checks_by_picking = {}
@@ -1323,49 +1208,12 @@ def get_recepciones_pallets(username: str, password: str, fecha_inicio: str, fec
     product_info = {}
     
     if all_product_ids:
-        products = client.read("product.product", all_product_ids, ["id", "product_tmpl_id"])
-        template_ids = list(set(p["product_tmpl_id"][0] for p in products if p.get("product_tmpl_id")))
-        variedad_field = _resolve_variedad_field(client)
-        template_fields = ["id", "x_studio_categora_tipo_de_manejo", "x_studio_sub_categora"]
-        if variedad_field:
-            template_fields.append(variedad_field)
-        
-        templates = client.read("product.template", template_ids, template_fields)
-
-        variedad_ids = set()
-        if variedad_field:
-            for t in templates:
-                raw_variedad = t.get(variedad_field)
-                if isinstance(raw_variedad, list) and raw_variedad and all(isinstance(v, int) for v in raw_variedad):
-                    variedad_ids.update(raw_variedad)
-
-        variedad_map: Dict[int, str] = {}
-        if variedad_ids:
-            try:
-                for v in client.read("x_variedad", list(variedad_ids), ["id", "display_name"]):
-                    variedad_map[v["id"]] = v.get("display_name", "")
-            except Exception as e:
-                print(f"[WARNING] No se pudo leer x_variedad en get_recepciones_pallets: {e}")
-        
-        template_map = {}
-        for t in templates:
-            manejo = t.get("x_studio_categora_tipo_de_manejo", "")
-            if isinstance(manejo, (list, tuple)) and len(manejo) > 1:
-                manejo = manejo[1]
-            
-            tipo_fruta = t.get("x_studio_sub_categora", "")
-            if isinstance(tipo_fruta, (list, tuple)) and len(tipo_fruta) > 1:
-                tipo_fruta = tipo_fruta[1]
-                
-            template_map[t["id"]] = {
-                "manejo": manejo or "N/A",
-                "tipo_fruta": tipo_fruta or "N/A",
-                "variedad": _extract_variedad_text(t.get(variedad_field), variedad_map) if variedad_field else "N/A"
+        for pid, prod in get_productos(client, all_product_ids).items():
+            product_info[pid] = {
+                "manejo": prod["manejo"] or "N/A",
+                "tipo_fruta": prod["especie"] or "N/A",
+                "variedad": prod["variedad"] or "N/A"
             }
-            
-        for p in products:
-            tmpl_id = p["product_tmpl_id"][0] if p.get("product_tmpl_id") else None
-            product_info[p["id"]] = template_map.get(tmpl_id, {"manejo": "N/A", "tipo_fruta": "N/A", "variedad": "N/A"})
 
     # 4. Agrupar y filtrar
     ml_by_picking = {}
@@ -1576,50 +1424,13 @@ def get_recepciones_pallets_detailed(username: str, password: str, fecha_inicio:
     product_info = {}
     
     if all_product_ids:
-        products = client.read("product.product", all_product_ids, ["id", "product_tmpl_id", "display_name"])
-        template_ids = list(set(p["product_tmpl_id"][0] for p in products if p.get("product_tmpl_id")))
-        variedad_field = _resolve_variedad_field(client)
-        template_fields = ["id", "x_studio_categora_tipo_de_manejo", "x_studio_sub_categora"]
-        if variedad_field:
-            template_fields.append(variedad_field)
-
-        templates = client.read("product.template", template_ids, template_fields)
-
-        variedad_ids = set()
-        if variedad_field:
-            for t in templates:
-                raw_variedad = t.get(variedad_field)
-                if isinstance(raw_variedad, list) and raw_variedad and all(isinstance(v, int) for v in raw_variedad):
-                    variedad_ids.update(raw_variedad)
-
-        variedad_map: Dict[int, str] = {}
-        if variedad_ids:
-            try:
-                for v in client.read("x_variedad", list(variedad_ids), ["id", "display_name"]):
-                    variedad_map[v["id"]] = v.get("display_name", "")
-            except Exception as e:
-                print(f"[WARNING] No se pudo leer x_variedad en get_recepciones_pallets_detailed: {e}")
-        
-        template_map = {}
-        for t in templates:
-            manejo = t.get("x_studio_categora_tipo_de_manejo", "")
-            if isinstance(manejo, (list, tuple)) and len(manejo) > 1:
-                manejo = manejo[1]
-            tipo_fruta = t.get("x_studio_sub_categora", "")
-            if isinstance(tipo_fruta, (list, tuple)) and len(tipo_fruta) > 1:
-                tipo_fruta = tipo_fruta[1]
-            
-            template_map[t["id"]] = {
-                "manejo": manejo or "N/A",
-                "tipo_fruta": tipo_fruta or "N/A",
-                "variedad": _extract_variedad_text(t.get(variedad_field), variedad_map) if variedad_field else "N/A"
+        for pid, prod in get_productos(client, all_product_ids).items():
+            product_info[pid] = {
+                "manejo": prod["manejo"] or "N/A",
+                "tipo_fruta": prod["especie"] or "N/A",
+                "variedad": prod["variedad"] or "N/A",
+                "display_name": prod["display_name"]
             }
-            
-        for p in products:
-            tmpl_id = p["product_tmpl_id"][0] if p.get("product_tmpl_id") else None
-            info = template_map.get(tmpl_id, {"manejo": "N/A", "tipo_fruta": "N/A", "variedad": "N/A"})
-            info["display_name"] = p.get("display_name", "")
-            product_info[p["id"]] = info
 
     resultado = []
     
@@ -0,0 +1,352 @@
+"""
+Motor batch del dashboard de rendimiento (get_dashboard_completo).
+
+Carga consumos, producción y costos en DataFrames y calcula overview,
+consolidado por fruta/manejo, salas y detalle de MOs con operaciones
+agrupadas. Las clasificaciones por texto (sala, tipo de fruta) se evalúan
+una vez por valor distinto, no por línea.
+
+La salida es idéntica a la del loop por MO original (ver test golden en
+backend/tests/test_dashboard_rendimiento.py).
+"""
+from itertools import chain
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from .helpers import classify_sala, extract_fruit_type
+
+
+COLS_CONSUMO = ['mo_id', 'product_name', 'lot_id', 'qty_done', 'especie', 'manejo', 'proveedor']
+COLS_PRODUCCION = ['mo_id', 'qty_done', 'is_merma', 'is_proceso']
+
+
+def _num(valor) -> float:
+    """Campos numéricos de Odoo: False/None/strings cuentan como 0."""
+    valor = valor or 0
+    return valor if isinstance(valor, (int, float)) else 0
+
+
+def _ratio(num: float, den: float, factor: float = 1.0) -> float:
+    return num / den * factor if den > 0 else 0
+
+
+def _aplanar(por_mo: Dict[int, List[Dict]], columnas: List[str]) -> pd.DataFrame:
+    """{mo_id: [dicts]} -> DataFrame con columna mo_id (conversión en bloque, sin loop por línea)."""
+    filas = list(chain.from_iterable(por_mo.values()))
+    df = pd.DataFrame.from_records(filas, columns=columnas) if filas else pd.DataFrame(columns=columnas)
+    df.insert(0, 'mo_id', np.repeat(list(por_mo.keys()), [len(v) for v in por_mo.values()]))
+    return df
+
+
+def _frame_consumos(consumos_by_mo: Dict[int, List[Dict]]) -> pd.DataFrame:
+    df = _aplanar(consumos_by_mo, COLS_CONSUMO[1:])
+    df['qty_done'] = df['qty_done'].fillna(0).astype(float)
+    df['lot_id'] = df['lot_id'].where(df['lot_id'].astype(bool), None)
+    for col in ('especie', 'manejo'):
+        df[col] = df[col].where(df[col].astype(bool) & df[col].notna(), 'Otro')
+    df['proveedor'] = df['proveedor'].where(df['proveedor'].notna() & df['proveedor'].astype(bool), None)
+    return df
+
+
+def _frame_produccion(produccion_by_mo: Dict[int, List[Dict]]) -> pd.DataFrame:
+    df = _aplanar(produccion_by_mo, COLS_PRODUCCION[1:])
+    df['qty_done'] = df['qty_done'].fillna(0).astype(float)
+    for col in ('is_merma', 'is_proceso'):
+        df[col] = df[col].fillna(False).astype(bool)
+    return df
+
+
+def _frame_mos(mos: List[Dict], costos_op_by_mo: Dict[int, Dict]) -> pd.DataFrame:
+    filas = []
+    for mo in mos:
+        prod = mo.get('product_id')
+        filas.append({
+            'mo_id': mo.get('id'),
+            'mo_name': mo.get('name', ''),
+            'product_name': prod[1] if isinstance(prod, (list, tuple)) and len(prod) > 1 else '',
+            'sala_raw': mo.get('x_studio_sala_de_proceso') or '',
+            'hh': _num(mo.get('x_studio_hh')),
+            'hh_efectiva': _num(mo.get('x_studio_hh_efectiva')),
+            'kg_hora_efectiva': _num(mo.get('x_studio_kghora_efectiva')),
+            'kg_hh_efectiva': _num(mo.get('x_studio_kghh_efectiva')),
+            'detenciones': _num(mo.get('x_studio_horas_detencion_totales')),
+            'dotacion': _num(mo.get('x_studio_dotacin')),
+            'inicio': mo.get('x_studio_inicio_de_proceso') or mo.get('date_start') or None,
+            'fin': mo.get('x_studio_termino_de_proceso') or mo.get('date_finished') or None,
+            'fecha_inicio_raw': mo.get('x_studio_inicio_de_proceso', '') or '',
+            'fecha_termino_raw': mo.get('x_studio_termino_de_proceso', '') or '',
+            'costo_elec': costos_op_by_mo.get(mo.get('id'), {'costo_electricidad': 0}).get('costo_electricidad', 0),
+        })
+    return pd.DataFrame(filas)
+
+
+def _duracion_horas(df: pd.DataFrame) -> pd.Series:
+    """Horas entre inicio y fin de proceso (0 si falta alguna o no parsea)."""
+    d0 = pd.to_datetime(df['inicio'].where(df['fin'].notna()), format="%Y-%m-%d %H:%M:%S", errors='coerce')
+    d1 = pd.to_datetime(df['fin'].where(df['inicio'].notna()), format="%Y-%m-%d %H:%M:%S", errors='coerce')
+    horas = ((d1 - d0).dt.total_seconds() / 3600).fillna(0)
+    return pd.Series([round(h, 2) for h in horas], index=df.index, dtype=float)
+
+
+def _por_mo_consumos(cons: pd.DataFrame) -> pd.DataFrame:
+    """kg_mp, lotes, tipo de fruta y manejo por MO."""
+    if cons.empty:
+        return pd.DataFrame(columns=['kg_mp', 'num_lotes', 'tipo_fruta', 'manejo'])
+    g = cons.groupby('mo_id', sort=False)
+    res = pd.DataFrame({
+        'kg_mp': g['qty_done'].sum(),
+        'num_lotes': g['lot_id'].nunique(),
+    })
+
+    # Tipo de fruta: especie única, 'Mix' si hay varias, o por nombre del primer consumo
+    especies = cons[cons['especie'] != 'Otro']
+    n_especies = especies.groupby('mo_id', sort=False)['especie'].nunique()
+    especie_unica = especies.groupby('mo_id', sort=False)['especie'].first()
+    primer_producto = g['product_name'].first()
+    fruta_por_nombre = {n: extract_fruit_type(n) for n in primer_producto.unique()}
+    tipo_fruta = primer_producto.map(fruta_por_nombre)
+    tipo_fruta.loc[especie_unica.index] = especie_unica
+    tipo_fruta.loc[n_especies[n_especies > 1].index] = 'Mix'
+    res['tipo_fruta'] = tipo_fruta
+
+    # Manejo: Orgánico > Convencional > primero encontrado
+    manejo = g['manejo'].first()
+    for valor in ('Convencional', 'Orgánico'):
+        presente = (cons['manejo'] == valor).groupby(cons['mo_id'], sort=False).any()
+        manejo[presente[presente].index] = valor
+    res['manejo'] = manejo
+    return res
+
+
+def _por_mo_produccion(prod: pd.DataFrame) -> pd.DataFrame:
+    """kg_pt / kg_merma / kg_proceso por MO según flags de categoría."""
+    if prod.empty:
+        return pd.DataFrame(columns=['kg_pt', 'kg_merma', 'kg_proceso'], dtype=float)
+    tipo = np.where(prod['is_merma'], 'kg_merma', np.where(prod['is_proceso'], 'kg_proceso', 'kg_pt'))
+    res = prod.groupby(['mo_id', tipo])['qty_done'].sum().unstack(fill_value=0.0)
+    # Columnas ausentes (p. ej. sin merma por categoría) deben quedar float para el fallback
+    return res.reindex(columns=['kg_pt', 'kg_merma', 'kg_proceso'], fill_value=0.0).astype(float)
+
+
+def calcular_dashboard(mos: List[Dict], consumos_by_mo: Dict[int, List[Dict]],
+                       produccion_by_mo: Dict[int, List[Dict]],
+                       costos_op_by_mo: Dict[int, Dict]) -> Dict:
+    """
+    Calcula overview, consolidado, salas y MOs del dashboard.
+
+    Args:
+        mos: Resultado de get_mos_por_periodo()
+        consumos_by_mo: Resultado de get_consumos_batch()
+        produccion_by_mo: Resultado de get_produccion_batch()
+        costos_op_by_mo: Resultado de get_costos_operacionales_batch()
+
+    Returns:
+        Dict con overview, consolidado, salas y mos
+    """
+    df = _frame_mos(mos, costos_op_by_mo)
+    cons = _frame_consumos(consumos_by_mo)
+    prod = _frame_produccion(produccion_by_mo)
+
+    df = df.join(_por_mo_consumos(cons), on='mo_id').join(_por_mo_produccion(prod), on='mo_id')
+    for col in ('kg_mp', 'num_lotes', 'kg_pt', 'kg_merma', 'kg_proceso'):
+        df[col] = df[col].fillna(0)
+
+    # MOs sin consumo MP no cuentan
+    df = df[df['kg_mp'] != 0].copy()
+
+    # Fallback de merma: diferencia MP - PT - proceso si no hay merma por categoría
+    sin_merma = (df['kg_merma'] == 0) & (df['kg_pt'] < df['kg_mp'])
+    df.loc[sin_merma, 'kg_merma'] = (df['kg_mp'] - df['kg_pt'] - df['kg_proceso']).clip(lower=0)
+    df['rendimiento'] = df['kg_pt'] / df['kg_mp'] * 100
+
+    # Sala: una clasificación por combinación distinta sala/producto
+    claves_sala = list(zip(df['sala_raw'], df['product_name']))
+    salas_clasificadas = {k: classify_sala(*k) for k in set(claves_sala)}
+    df['sala_tipo'] = [salas_clasificadas[k][0] for k in claves_sala]
+    df['sala'] = [salas_clasificadas[k][1] for k in claves_sala]
+    df['duracion_horas'] = _duracion_horas(df)
+
+    proceso = df[df['sala_tipo'] == 'PROCESO']
+    congelado = df[df['sala_tipo'] == 'CONGELADO']
+
+    cons_validos = cons[cons['mo_id'].isin(df['mo_id'])]
+    cons_congelado = cons_validos[cons_validos['mo_id'].isin(congelado['mo_id'])]
+
+    return {
+        'overview': _overview(df, proceso, congelado, cons_validos, cons_congelado, len(mos)),
+        'consolidado': _consolidado(proceso),
+        'salas': _salas(df),
+        'mos': _mos_resultado(df),
+    }
+
+
+def _overview(df: pd.DataFrame, proceso: pd.DataFrame, congelado: pd.DataFrame,
+              cons_validos: pd.DataFrame, cons_congelado: pd.DataFrame, total_mos: int) -> Dict:
+    total_kg_mp = float(df['kg_mp'].sum())
+    total_kg_pt = float(df['kg_pt'].sum())
+    total_kg_merma = float(df['kg_merma'].sum())
+    total_hh = float(df['hh'].sum())
+
+    proceso_kg_mp = float(proceso['kg_mp'].sum())
+    proceso_kg_pt = float(proceso['kg_pt'].sum())
+    proceso_kg_merma = float(proceso['kg_merma'].sum())
+    proceso_hh = float(proceso['hh'].sum())
+
+    congelado_kg_mp = float(congelado['kg_mp'].sum())
+    congelado_kg_pt = float(congelado['kg_pt'].sum())
+    congelado_kg_merma = float(congelado['kg_merma'].sum())
+
+    return {
+        'total_kg_mp': round(total_kg_mp, 2),
+        'total_kg_pt': round(total_kg_pt, 2),
+        'total_kg_merma': round(total_kg_merma, 2),
+        'rendimiento_promedio': round(_ratio(total_kg_pt, total_kg_mp, 100), 2),
+        'merma_total_kg': round(total_kg_merma, 2),
+        'merma_pct': round(_ratio(total_kg_merma, total_kg_mp, 100), 2),
+        'mos_procesadas': total_mos,
+        'lotes_unicos': int(cons_validos['lot_id'].nunique()),
+        'total_hh': round(total_hh, 2),
+        'kg_por_hh': round(_ratio(total_kg_pt, total_hh), 2),
+        # Proceso
+        'proceso_kg_mp': round(proceso_kg_mp, 2),
+        'proceso_kg_pt': round(proceso_kg_pt, 2),
+        'proceso_kg_merma': round(proceso_kg_merma, 2),
+        'proceso_rendimiento': round(_ratio(proceso_kg_pt, proceso_kg_mp, 100), 2),
+        'proceso_merma_kg': round(proceso_kg_merma, 2),
+        'proceso_merma_pct': round(_ratio(proceso_kg_merma, proceso_kg_mp, 100), 2),
+        'proceso_mos': len(proceso),
+        'proceso_hh': round(proceso_hh, 2),
+        'proceso_kg_por_hh': round(_ratio(proceso_kg_pt, proceso_hh), 2),
+        # Congelado
+        'congelado_kg_mp': round(congelado_kg_mp, 2),
+        'congelado_kg_pt': round(congelado_kg_pt, 2),
+        'congelado_kg_merma': round(congelado_kg_merma, 2),
+        'congelado_rendimiento': round(_ratio(congelado_kg_pt, congelado_kg_mp, 100), 2),
+        'congelado_merma_pct': round(_ratio(congelado_kg_merma, congelado_kg_mp, 100), 2),
+        'congelado_mos': len(congelado),
+        'congelado_lotes': int(cons_congelado['lot_id'].nunique()),
+        'congelado_proveedores': int(cons_congelado['proveedor'].nunique()),
+        # Costos
+        'total_costo_electricidad': round(float(df['costo_elec'].sum()), 2)
+    }
+
+
+def _consolidado(proceso: pd.DataFrame) -> Dict:
+    """Consolidado por fruta y fruta/manejo (solo salas de proceso)."""
+    por_fruta = []
+    for tipo_fruta, g in proceso.groupby('tipo_fruta', sort=False):
+        kg_mp, kg_pt = float(g['kg_mp'].sum()), float(g['kg_pt'].sum())
+        por_fruta.append({
+            'tipo_fruta': tipo_fruta, 'kg_mp': kg_mp, 'kg_pt': kg_pt,
+            'num_lotes': int(g['num_lotes'].sum()),
+            'rendimiento': round(_ratio(kg_pt, kg_mp, 100), 2),
+            'merma': round(kg_mp - kg_pt, 2)
+        })
+    por_fruta.sort(key=lambda x: x['kg_pt'], reverse=True)
+
+    por_fruta_manejo = []
+    for (tipo_fruta, manejo), g in proceso.groupby(['tipo_fruta', 'manejo'], sort=False):
+        kg_mp, kg_pt = float(g['kg_mp'].sum()), float(g['kg_pt'].sum())
+        por_fruta_manejo.append({
+            'tipo_fruta': tipo_fruta, 'manejo': manejo, 'kg_mp': kg_mp, 'kg_pt': kg_pt,
+            'rendimiento': round(_ratio(kg_pt, kg_mp, 100), 2),
+            'merma': round(kg_mp - kg_pt, 2)
+        })
+    por_fruta_manejo.sort(key=lambda x: (x['tipo_fruta'], -x['kg_pt']))
+
+    return {'por_fruta': por_fruta, 'por_fruta_manejo': por_fruta_manejo}
+
+
+def _salas(df: pd.DataFrame) -> List[Dict]:
+    """Productividad por sala."""
+    agregado = df.groupby('sala', sort=False).agg(
+        kg_mp=('kg_mp', 'sum'), kg_pt=('kg_pt', 'sum'), hh=('hh', 'sum'),
+        hh_efectiva=('hh_efectiva', 'sum'), detenciones=('detenciones', 'sum'),
+        dotacion_sum=('dotacion', 'sum'), duracion=('duracion_horas', 'sum'),
+        num_mos=('mo_id', 'size'), costo_elec=('costo_elec', 'sum'),
+        kg_hora_efectiva_sum=('kg_hora_efectiva', 'sum'), kg_hh_efectiva_sum=('kg_hh_efectiva', 'sum'),
+    )
+
+    resultado = []
+    for sala, s in agregado.iterrows():
+        kg_mp, kg_pt, hh, hh_efectiva = s['kg_mp'], s['kg_pt'], s['hh'], s['hh_efectiva']
+        num_mos = int(s['num_mos'])
+        dotacion_prom = s['dotacion_sum'] / num_mos
+
+        # Promedios de Odoo (x_studio_kghora_efectiva, x_studio_kghh_efectiva); si no hay, se calcula
+        kg_hora_efectiva_odoo = s['kg_hora_efectiva_sum'] / num_mos
+        kg_hh_efectiva_odoo = s['kg_hh_efectiva_sum'] / num_mos
+        kg_por_hora_efectiva = kg_hora_efectiva_odoo if kg_hora_efectiva_odoo > 0 else _ratio(kg_pt, hh_efectiva)
+        kg_por_hh_efectiva = kg_hh_efectiva_odoo if kg_hh_efectiva_odoo > 0 else _ratio(kg_pt, hh_efectiva)
+
+        # Electricidad: kWh = mismo valor que el costo por ahora
+        costo_elec = float(s['costo_elec'])
+
+        resultado.append({
+            'sala': sala,
+            'kg_mp': round(kg_mp, 2),
+            'kg_pt': round(kg_pt, 2),
+            'rendimiento': round(_ratio(kg_pt, kg_mp, 100), 2),
+            'merma': round(kg_mp - kg_pt, 2),
+            'kg_por_hh': round(_ratio(kg_pt, hh), 2),
+            'kg_por_hora': round(_ratio(kg_pt, s['duracion']), 2),
+            'kg_por_operario': round(_ratio(kg_pt, dotacion_prom), 2),
+            'hh_total': round(hh, 2),
+            'hh_promedio': round(hh / num_mos, 2),
+            'hh_efectiva_total': round(hh_efectiva, 2),
+            'hh_efectiva_promedio': round(hh_efectiva / num_mos, 2),
+            'kg_por_hora_efectiva': round(kg_por_hora_efectiva, 2),
+            'kg_por_hh_efectiva': round(kg_por_hh_efectiva, 2),
+            'detenciones_total': round(s['detenciones'], 2),
+            'detenciones_promedio': round(s['detenciones'] / num_mos, 2),
+            'dotacion_promedio': round(dotacion_prom, 1),
+            'num_mos': num_mos,
+            'costo_electricidad': round(costo_elec, 2),
+            'total_electricidad': round(costo_elec, 2),
+            'kwh_por_kg': round(_ratio(costo_elec, kg_pt), 4)
+        })
+    resultado.sort(key=lambda x: x['kg_pt'], reverse=True)
+    return [{k: float(v) if isinstance(v, np.floating) else v for k, v in s.items()} for s in resultado]
+
+
+def _mos_resultado(df: pd.DataFrame) -> List[Dict]:
+    """Detalle por MO, ordenado por fecha de inicio descendente."""
+    columnas = ['mo_id', 'mo_name', 'product_name', 'tipo_fruta', 'manejo', 'kg_mp', 'kg_pt', 'kg_merma',
+                'rendimiento', 'costo_elec', 'duracion_horas', 'hh', 'hh_efectiva', 'detenciones',
+                'kg_hora_efectiva', 'kg_hh_efectiva', 'dotacion', 'sala', 'sala_raw', 'sala_tipo',
+                'fecha_inicio_raw', 'fecha_termino_raw']
+    resultado = []
+    for (mo_id, mo_name, product_name, tipo_fruta, manejo, kg_mp, kg_pt, kg_merma, rendimiento, costo_elec,
+         duracion, hh, hh_efectiva, detenciones, kg_hora_efectiva, kg_hh_efectiva, dotacion, sala, sala_raw,
+         sala_tipo, fecha_inicio_raw, fecha_termino_raw) in zip(*(df[c].tolist() for c in columnas)):
+        resultado.append({
+            'mo_id': mo_id or 0,
+            'mo_name': mo_name,
+            'product_name': product_name,
+            'especie': tipo_fruta,
+            'manejo': manejo,
+            'kg_mp': round(kg_mp, 2),
+            'kg_pt': round(kg_pt, 2),
+            'kg_merma': round(kg_merma, 2),
+            'rendimiento': round(rendimiento, 2),
+            'merma_pct': round(_ratio(kg_merma, kg_mp, 100), 2),
+            'costo_electricidad': costo_elec,
+            'duracion_horas': duracion,
+            'hh': hh,
+            'hh_efectiva': hh_efectiva,
+            'detenciones': detenciones,
+            'kg_por_hora': kg_hora_efectiva,
+            'kg_hora_efectiva': kg_hora_efectiva,
+            'kg_hh_efectiva': kg_hh_efectiva,
+            'dotacion': dotacion,
+            'sala': sala,
+            'sala_original': sala_raw,
+            'sala_tipo': sala_tipo,
+            'fecha': str(fecha_inicio_raw)[:10] if fecha_inicio_raw else '',
+            'fecha_inicio': str(fecha_inicio_raw)[:16] if fecha_inicio_raw else '',
+            'fecha_termino': str(fecha_termino_raw)[:16] if fecha_termino_raw else ''
+        })
+    resultado.sort(key=lambda x: x['fecha'], reverse=True)
+    return resultado
@@ -0,0 +1,175 @@
+"""
+Cubos pre-agregados de productividad por sala (KG/Línea).
+
+Reemplaza los loops que el tab KG por Línea reconstruía en cada rerun de
+Streamlit (día×sala, turno, semana, KG/hora). El cubo se arma una sola vez
+por rango desde las MOs de get_dashboard_completo() y luego se filtra,
+re-agrupa y pagina por dimensiones.
+
+Dimensiones: periodo (día o semana), sala, turno, especie, planta, sala_tipo,
+producto (tipo de proceso).
+Medidas: kg_pt, kg_mp, ordenes, horas, kg_con_duracion, detenciones, hh,
+hh_efectiva, dotacion_sum, dotacion_count, hechas, no_hechas.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+
+DIMENSIONES = ('periodo', 'sala', 'turno', 'especie', 'planta', 'sala_tipo', 'producto')
+
+MEDIDAS = (
+    'kg_pt', 'kg_mp', 'ordenes', 'horas', 'kg_con_duracion', 'detenciones',
+    'hh', 'hh_efectiva', 'dotacion_sum', 'dotacion_count', 'hechas', 'no_hechas'
+)
+
+# Odoo guarda en UTC; los turnos se evalúan en hora Chile (UTC-3)
+OFFSET_HORAS_CHILE = 3
+
+
+def parsear_fecha_chile(fecha_str: str) -> Optional[datetime]:
+    """Parsea 'YYYY-MM-DD HH:MM[:SS]' (UTC) y lo ajusta a hora Chile."""
+    if not fecha_str:
+        return None
+    s = str(fecha_str).strip()
+    for fmt, largo in (('%Y-%m-%d %H:%M:%S', 19), ('%Y-%m-%d %H:%M', 16), ('%Y-%m-%d', 10)):
+        if len(s) >= largo:
+            try:
+                return datetime.strptime(s[:largo], fmt) - timedelta(hours=OFFSET_HORAS_CHILE)
+            except ValueError:
+                continue
+    return None
+
+
+def clasificar_turno(dt: Optional[datetime], dt_fin: Optional[datetime] = None) -> str:
+    """
+    Clasifica en turno Día o Tarde según el punto medio del proceso.
+
+    Día: L-J 8:00-17:30, V 8:00-16:30, S 8:00-13:00
+    Tarde: L-J 17:30-23:30, V 16:30-22:30, S 14:00-22:00
+    """
+    if dt is None:
+        return 'Día'
+    medio = dt + (dt_fin - dt) / 2 if dt_fin is not None and dt_fin > dt else dt
+    hora = medio.hour + medio.minute / 60.0
+    dow = medio.weekday()
+    if dow <= 3:
+        return 'Día' if hora < 17.5 else 'Tarde'
+    if dow == 4:
+        return 'Día' if hora < 16.5 else 'Tarde'
+    if dow == 5:
+        return 'Día' if hora < 13 else 'Tarde'
+    return 'Día'
+
+
+def detectar_planta(mo: Dict) -> str:
+    """Detecta la planta a partir del nombre de la MO o sala."""
+    mo_name = (mo.get('mo_name') or '').upper()
+    sala = (mo.get('sala') or mo.get('sala_original') or '').lower()
+    if 'VLK' in mo_name or 'vilkun' in sala:
+        return 'Vilkun'
+    return 'Rio Futuro'
+
+
+def clave_periodo(dt: datetime, grano: str) -> str:
+    """Clave ordenable de período: 'YYYY-MM-DD' (día) o 'YYYY-Www' (semana ISO)."""
+    if grano == 'semana':
+        iso_y, iso_w, _ = dt.isocalendar()
+        return f"{iso_y}-W{iso_w:02d}"
+    return dt.strftime('%Y-%m-%d')
+
+
+def dimensiones_mo(mo: Dict, grano: str) -> Optional[Tuple]:
+    """Retorna la tupla de dimensiones de una MO (None si no tiene fecha de inicio)."""
+    inicio = parsear_fecha_chile(mo.get('fecha_inicio'))
+    if inicio is None:
+        return None
+    fin = parsear_fecha_chile(mo.get('fecha_termino'))
+    return (
+        clave_periodo(inicio, grano),
+        mo.get('sala') or 'Sin Sala',
+        clasificar_turno(inicio, fin),
+        mo.get('especie') or 'Otro',
+        detectar_planta(mo),
+        mo.get('sala_tipo') or 'PROCESO',
+        mo.get('product_name') or '',
+    )
+
+
+def construir_cubo(mos: List[Dict], grano: str = 'dia') -> List[Dict]:
+    """
+    Agrega las MOs al grano más fino (periodo × sala × turno × especie × planta ×
+    sala_tipo × producto).
+
+    Las horas/detenciones solo suman MOs con duración > 0, igual que el cálculo
+    de KG/Hora del frontend (promedio ponderado real).
+    """
+    celdas: Dict[Tuple, Dict[str, float]] = defaultdict(lambda: dict.fromkeys(MEDIDAS, 0))
+    for mo in mos:
+        clave = dimensiones_mo(mo, grano)
+        if clave is None:
+            continue
+        c = celdas[clave]
+        kg = mo.get('kg_pt', 0) or 0
+        dur = mo.get('duracion_horas', 0) or 0
+        dotacion = mo.get('dotacion', 0) or 0
+        c['kg_pt'] += kg
+        c['kg_mp'] += mo.get('kg_mp', 0) or 0
+        c['ordenes'] += 1
+        c['hh'] += mo.get('hh', 0) or 0
+        c['hh_efectiva'] += mo.get('hh_efectiva', 0) or 0
+        if dur > 0:
+            c['horas'] += dur
+            c['kg_con_duracion'] += kg
+            c['detenciones'] += mo.get('detenciones', 0) or 0
+        if dotacion > 0:
+            c['dotacion_sum'] += dotacion
+            c['dotacion_count'] += 1
+        if mo.get('fecha_termino'):
+            c['hechas'] += 1
+        else:
+            c['no_hechas'] += 1
+
+    return [dict(zip(DIMENSIONES, clave), **medidas) for clave, medidas in celdas.items()]
+
+
+def _con_kpis(fila: Dict) -> Dict:
+    horas = fila.get('horas', 0)
+    horas_efectivas = max(horas - fila.get('detenciones', 0), 0)
+    fila['kg_hora'] = round(fila['kg_con_duracion'] / horas, 1) if horas > 0 else 0
+    fila['kg_hora_efectiva'] = round(fila['kg_con_duracion'] / horas_efectivas, 1) if horas_efectivas > 0 else 0
+    fila['dotacion_promedio'] = round(fila['dotacion_sum'] / fila['dotacion_count'], 1) if fila['dotacion_count'] else 0
+    for medida in ('kg_pt', 'kg_mp', 'horas', 'kg_con_duracion', 'detenciones', 'hh', 'hh_efectiva'):
+        fila[medida] = round(fila[medida], 2)
+    return fila
+
+
+def agrupar_cubo(cubo: List[Dict], agrupar_por: List[str],
+                 filtros: Optional[Dict[str, List[str]]] = None) -> Tuple[List[Dict], Dict]:
+    """
+    Filtra el cubo y lo re-agrupa por las dimensiones pedidas.
+
+    Args:
+        cubo: Resultado de construir_cubo()
+        agrupar_por: Subconjunto de DIMENSIONES (vacío = solo totales)
+        filtros: {dimension: [valores permitidos]}
+
+    Returns:
+        Tuple (filas ordenadas por dimensiones, totales)
+    """
+    filtros = {d: set(v) for d, v in (filtros or {}).items() if v and d in DIMENSIONES}
+    agrupar_por = [d for d in agrupar_por if d in DIMENSIONES]
+
+    grupos: Dict[Tuple, Dict[str, float]] = defaultdict(lambda: dict.fromkeys(MEDIDAS, 0))
+    totales = dict.fromkeys(MEDIDAS, 0)
+    for celda in cubo:
+        if any(celda[d] not in valores for d, valores in filtros.items()):
+            continue
+        g = grupos[tuple(celda[d] for d in agrupar_por)]
+        for medida in MEDIDAS:
+            g[medida] += celda[medida]
+            totales[medida] += celda[medida]
+
+    filas = [_con_kpis(dict(zip(agrupar_por, clave), **medidas)) for clave, medidas in grupos.items()]
+    filas.sort(key=lambda f: tuple(f[d] for d in agrupar_por))
+    return filas, _con_kpis(totales)
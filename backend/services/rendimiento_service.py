@@ -7,6 +7,7 @@ from typing import Optional, Dict, List
 from datetime import datetime
 from shared.odoo_client import OdooClient
 from backend.cache import get_cache
+from backend.services.producto_dimension_service import get_productos
 from .rendimiento.helpers import (
     is_operational_cost,
     is_excluded_consumo,
@@ -14,6 +15,8 @@ from .rendimiento.helpers import (
     extract_handling,
     classify_sala
 )
+from .rendimiento.rollup import construir_cubo, agrupar_cubo, dimensiones_mo, DIMENSIONES
+from .rendimiento.dashboard import calcular_dashboard
 
 
 class RendimientoService:
@@ -113,60 +116,17 @@ class RendimientoService:
             limit=50000
         )
         
-        # Obtener info de productos (especie y manejo desde product.template)
+        # Especie y manejo desde la dimensión compartida de productos
         product_ids_set = set()
         for ml in move_lines or []:
             prod = ml.get('product_id')
             if prod:
-                pid = prod[0] if isinstance(prod, (list, tuple)) else prod
-                product_ids_set.add(pid)
-        
-        # Obtener product.product para sacar product_tmpl_id
-        product_info_map = {}
-        if product_ids_set:
-            products = self.odoo.search_read(
-                'product.product',
-                [['id', 'in', list(product_ids_set)]],
-                ['id', 'product_tmpl_id'],
-                limit=20000
-            )
-            
-            # Obtener templates con manejo y tipo de fruta
-            template_ids = set()
-            for p in products:
-                tmpl = p.get('product_tmpl_id')
-                if tmpl:
-                    tmpl_id = tmpl[0] if isinstance(tmpl, (list, tuple)) else tmpl
-                    template_ids.add(tmpl_id)
-            
-            template_map = {}
-            if template_ids:
-                templates = self.odoo.read(
-                    'product.template',
-                    list(template_ids),
-                    ['id', 'x_studio_categora_tipo_de_manejo', 'x_studio_sub_categora']
-                )
-                for t in templates:
-                    manejo = t.get('x_studio_categora_tipo_de_manejo', '')
-                    if isinstance(manejo, (list, tuple)) and len(manejo) > 1:
-                        manejo = manejo[1]
-                    
-                    tipo_fruta = t.get('x_studio_sub_categora', '')
-                    if isinstance(tipo_fruta, (list, tuple)) and len(tipo_fruta) > 1:
-                        tipo_fruta = tipo_fruta[1]
-                    
-                    template_map[t['id']] = {
-                        'manejo': manejo or 'Otro',
-                        'tipo_fruta': tipo_fruta or 'Otro'
-                    }
-            
-            # Mapear product_id -> especie/manejo
-            for p in products:
-                pid = p.get('id')
-                tmpl = p.get('product_tmpl_id')
-                tmpl_id = tmpl[0] if isinstance(tmpl, (list, tuple)) else tmpl if tmpl else None
-                tmpl_data = template_map.get(tmpl_id, {'manejo': 'Otro', 'tipo_fruta': 'Otro'})
-                product_info_map[pid] = tmpl_data
+                product_ids_set.add(prod[0] if isinstance(prod, (list, tuple)) else prod)
+        
+        product_info_map = {
+            pid: {'manejo': p['manejo'] or 'Otro', 'tipo_fruta': p['especie'] or 'Otro'}
+            for pid, p in get_productos(self.odoo, product_ids_set).items()
+        }
         
         # Crear mapa move_id -> mo_id
         move_to_mo = {}
@@ -177,6 +137,8 @@ class RendimientoService:
         
         # Agrupar por MO
         result = {mo.get('id'): [] for mo in mos}
+        # Exclusión evaluada una vez por producto distinto
+        excluidos = {}
         
         for ml in move_lines or []:
             move_id_info = ml.get('move_id')
@@ -197,7 +159,10 @@ class RendimientoService:
                 manejo = prod_info['manejo']
                 
                 # Excluir si no tiene especie Y manejo (es insumo)
-                if is_excluded_consumo(prod_name, especie=especie, manejo=manejo):
+                clave = (prod_id, prod_name)
+                if clave not in excluidos:
+                    excluidos[clave] = is_excluded_consumo(prod_name, especie=especie, manejo=manejo)
+                if excluidos[clave]:
                     continue
                 
                 lot = ml.get('lot_id')
@@ -236,65 +201,17 @@ class RendimientoService:
             limit=50000
         )
         
-        # Obtener info de productos (especie y manejo desde product.template)
+        # Especie, manejo y categoría desde la dimensión compartida de productos
         product_ids_set = set()
         for ml in move_lines or []:
             prod = ml.get('product_id')
             if prod:
-                pid = prod[0] if isinstance(prod, (list, tuple)) else prod
-                product_ids_set.add(pid)
-        
-        # Obtener product.product para sacar product_tmpl_id
-        product_info_map = {}
-        if product_ids_set:
-            products = self.odoo.search_read(
-                'product.product',
-                [['id', 'in', list(product_ids_set)]],
-                ['id', 'product_tmpl_id'],
-                limit=20000
-            )
-            
-            # Obtener templates con manejo y tipo de fruta
-            template_ids = set()
-            for p in products:
-                tmpl = p.get('product_tmpl_id')
-                if tmpl:
-                    tmpl_id = tmpl[0] if isinstance(tmpl, (list, tuple)) else tmpl
-                    template_ids.add(tmpl_id)
-            
-            template_map = {}
-            if template_ids:
-                templates = self.odoo.read(
-                    'product.template',
-                    list(template_ids),
-                    ['id', 'x_studio_categora_tipo_de_manejo', 'x_studio_sub_categora', 'categ_id']
-                )
-                for t in templates:
-                    manejo = t.get('x_studio_categora_tipo_de_manejo', '')
-                    if isinstance(manejo, (list, tuple)) and len(manejo) > 1:
-                        manejo = manejo[1]
-                    
-                    tipo_fruta = t.get('x_studio_sub_categora', '')
-                    if isinstance(tipo_fruta, (list, tuple)) and len(tipo_fruta) > 1:
-                        tipo_fruta = tipo_fruta[1]
-                    
-                    # Obtener categoría para identificar merma
-                    categ = t.get('categ_id')
-                    categ_name = categ[1] if isinstance(categ, (list, tuple)) and len(categ) > 1 else ''
-                    
-                    template_map[t['id']] = {
-                        'manejo': manejo or 'Otro',
-                        'tipo_fruta': tipo_fruta or 'Otro',
-                        'categ_name': categ_name
-                    }
-            
-            # Mapear product_id -> especie/manejo
-            for p in products:
-                pid = p.get('id')
-                tmpl = p.get('product_tmpl_id')
-                tmpl_id = tmpl[0] if isinstance(tmpl, (list, tuple)) else tmpl if tmpl else None
-                tmpl_data = template_map.get(tmpl_id, {'manejo': 'Otro', 'tipo_fruta': 'Otro'})
-                product_info_map[pid] = tmpl_data
+                product_ids_set.add(prod[0] if isinstance(prod, (list, tuple)) else prod)
+        
+        product_info_map = {
+            pid: {'manejo': p['manejo'] or 'Otro', 'tipo_fruta': p['especie'] or 'Otro', 'categ_name': p['categ']}
+            for pid, p in get_productos(self.odoo, product_ids_set).items()
+        }
         
         # Crear mapa move_id -> mo_id
         move_to_mo = {}
@@ -305,6 +222,7 @@ class RendimientoService:
         
         # Agrupar por MO
         result = {mo.get('id'): [] for mo in mos}
+        flags_producto = {}
         
         for ml in move_lines or []:
             move_id_info = ml.get('move_id')
@@ -324,26 +242,11 @@ class RendimientoService:
                 prod_info = product_info_map.get(prod_id, {'manejo': 'Otro', 'tipo_fruta': 'Otro', 'categ_name': ''})
                 categ_name = prod_info.get('categ_name', '')
                 
-                # Identificar si es merma (categoría contiene "MERMA")
-                is_merma = 'MERMA' in categ_name.upper() if categ_name else False
-                
-                # Identificar si es proceso intermedio:
-                # - Solo productos con nombre exacto "[X] PROCESO..." o "[X.Y] PROCESO..."  
-                # - NO productos terminados con código de producto (ejemplo: [401274000])
-                is_proceso = False
-                if prod_name:
-                    # Productos intermedios específicos: [3] Proceso de Vaciado, [1.x] PROCESO, etc.
-                    if prod_name.startswith('[3]') and 'PROCESO' in prod_name.upper():
-                        is_proceso = True
-                    elif prod_name.startswith('[1.') and 'PROCESO' in prod_name.upper():
-                        is_proceso = True
-                    elif prod_name.startswith('[2.') and 'PROCESO' in prod_name.upper():
-                        is_proceso = True
-                    elif prod_name.startswith('[4]') and 'PROCESO' in prod_name.upper():
-                        is_proceso = True
-                    # Solo categoría PROCESO (sin código de producto largo)
-                    elif 'PROCESOS' in categ_name.upper() and not any(c.isdigit() for c in prod_name[1:7]):
-                        is_proceso = True
+                # Flags merma/proceso evaluados una vez por producto distinto
+                clave = (prod_id, prod_name)
+                if clave not in flags_producto:
+                    flags_producto[clave] = self._clasificar_produccion(prod_name, categ_name)
+                is_merma, is_proceso = flags_producto[clave]
                 
                 result[mo_id].append({
                     'product_id': prod_id,
@@ -360,6 +263,31 @@ class RendimientoService:
         
         return result
     
+    @staticmethod
+    def _clasificar_produccion(prod_name: str, categ_name: str) -> tuple:
+        """Retorna (is_merma, is_proceso) de un producto producido."""
+        # Identificar si es merma (categoría contiene "MERMA")
+        is_merma = 'MERMA' in categ_name.upper() if categ_name else False
+        
+        # Identificar si es proceso intermedio:
+        # - Solo productos con nombre exacto "[X] PROCESO..." o "[X.Y] PROCESO..."  
+        # - NO productos terminados con código de producto (ejemplo: [401274000])
+        is_proceso = False
+        if prod_name:
+            # Productos intermedios específicos: [3] Proceso de Vaciado, [1.x] PROCESO, etc.
+            if prod_name.startswith('[3]') and 'PROCESO' in prod_name.upper():
+                is_proceso = True
+            elif prod_name.startswith('[1.') and 'PROCESO' in prod_name.upper():
+                is_proceso = True
+            elif prod_name.startswith('[2.') and 'PROCESO' in prod_name.upper():
+                is_proceso = True
+            elif prod_name.startswith('[4]') and 'PROCESO' in prod_name.upper():
+                is_proceso = True
+            # Solo categoría PROCESO (sin código de producto largo)
+            elif 'PROCESOS' in categ_name.upper() and not any(c.isdigit() for c in prod_name[1:7]):
+                is_proceso = True
+        return is_merma, is_proceso
+    
     def get_costos_operacionales_batch(self, mos: List[Dict]) -> Dict[int, Dict]:
         """Obtiene costos operacionales (electricidad) de todas las MOs."""
         all_raw_ids = []
@@ -865,427 +793,91 @@ class RendimientoService:
                 'mos': []
             }
         
-        # Acumuladores
-        total_kg_mp = 0.0
-        total_kg_pt = 0.0
-        total_kg_merma = 0.0  # Nueva: Total de merma
-        total_hh = 0.0
-        total_costo_elec = 0.0
-        lotes_set = set()
-        
-        # Por tipo (proceso vs congelado)
-        proceso_kg_mp = 0.0
-        proceso_kg_pt = 0.0
-        proceso_kg_merma = 0.0  # Nueva: Merma en proceso
-        proceso_hh = 0.0
-        proceso_mos = 0
-        
-        congelado_kg_mp = 0.0
-        congelado_kg_pt = 0.0
-        congelado_kg_merma = 0.0  # Nueva: Merma en congelado
-        congelado_mos = 0
-        congelado_lotes = set()
-        congelado_proveedores = set()
-        
-        # Por fruta
-        por_fruta = {}
-        por_fruta_manejo = {}
-        
-        # Por sala
-        salas_data = {}
-        
-        # Lista de MOs procesadas
-        mos_resultado = []
-        
         # Batch fetch
         consumos_by_mo = self.get_consumos_batch(mos)
         produccion_by_mo = self.get_produccion_batch(mos)
         costos_op_by_mo = self.get_costos_operacionales_batch(mos)
         
-        # Procesar cada MO
-        for mo in mos:
-            try:
-                mo_id = mo.get('id')
-                
-                consumos = consumos_by_mo.get(mo_id, [])
-                produccion = produccion_by_mo.get(mo_id, [])
-                costos_op = costos_op_by_mo.get(mo_id, {'costo_electricidad': 0})
-                
-                kg_mp = sum(c.get('qty_done', 0) or 0 for c in consumos)
-                
-                # FILTRAR kg_pt: Usar is_merma e is_proceso de categ_id
-                # - is_merma: Categoría contiene "MERMA" (PRODUCTOS / MERMA DE PROCESOS)
-                # - is_proceso: Producto [3] o categoría PROCESO (productos intermedios)
-                kg_pt = 0.0
-                kg_merma = 0.0
-                kg_proceso = 0.0
-                for p in produccion:
-                    product_name = p.get('product_name', '')
-                    qty = p.get('qty_done', 0) or 0
-                    
-                    # Usar flags de categoría
-                    is_merma = p.get('is_merma', False)
-                    is_proceso = p.get('is_proceso', False)
-                    
-                    if is_merma:
-                        kg_merma += qty
-                    elif is_proceso:
-                        kg_proceso += qty
-                    else:
-                        # PT válido
-                        kg_pt += qty
-                
-                
-                costo_elec = costos_op.get('costo_electricidad', 0)
-                
-                if kg_mp == 0:
-                    continue
-                
-                # Fallback: si no hay merma identificada por categ_id Y kg_pt < kg_mp, usar diferencia
-                # Si kg_pt >= kg_mp (rendimiento >= 100%), NO agregar merma calculada
-                if kg_merma == 0 and kg_pt < kg_mp:
-                    merma_calculada = kg_mp - kg_pt - kg_proceso
-                    kg_merma = max(0, merma_calculada)  # Solo si es positiva
-                
-                rendimiento = (kg_pt / kg_mp * 100)
-                
-                # Clasificar sala
-                product_name = ''
-                prod = mo.get('product_id')
-                if isinstance(prod, (list, tuple)) and len(prod) > 1:
-                    product_name = prod[1]
-                
-                sala_raw = mo.get('x_studio_sala_de_proceso') or ''
-                sala, sala_tipo = self._classify_sala(sala_raw, product_name)
-                
-                # HH
-                hh = mo.get('x_studio_hh') or 0
-                if isinstance(hh, (int, float)):
-                    total_hh += hh
-                
-                # Totales
-                total_kg_mp += kg_mp
-                total_kg_pt += kg_pt
-                total_kg_merma += kg_merma  # Nueva: acumular merma
-                total_costo_elec += costo_elec
-                
-                # Lotes únicos
-                for c in consumos:
-                    if c.get('lot_id'):
-                        lotes_set.add(c['lot_id'])
-                
-                # Por tipo
-                if sala_tipo == 'PROCESO':
-                    proceso_kg_mp += kg_mp
-                    proceso_kg_pt += kg_pt
-                    proceso_kg_merma += kg_merma  # Nueva: merma en proceso
-                    proceso_hh += hh if isinstance(hh, (int, float)) else 0
-                    proceso_mos += 1
-                elif sala_tipo == 'CONGELADO':
-                    congelado_kg_mp += kg_mp
-                    congelado_kg_pt += kg_pt
-                    congelado_kg_merma += kg_merma  # Nueva: merma en congelado
-                    congelado_mos += 1
-                    # Agregar lotes únicos para congelado
-                    for c in consumos:
-                        if c.get('lot_id'):
-                            congelado_lotes.add(c['lot_id'])
-                        # Agregar proveedores únicos
-                        if c.get('proveedor'):
-                            congelado_proveedores.add(c['proveedor'])
-                
-                # Especie y manejo para consolidado
-                especies_en_mo = set()
-                manejos_en_mo = set()
-                
-                for c in consumos:
-                    esp = c.get('especie', '') or 'Otro'
-                    man = c.get('manejo', '') or 'Otro'
-                    if esp and esp != 'Otro':
-                        especies_en_mo.add(esp)
-                    manejos_en_mo.add(man)
-                
-                if len(especies_en_mo) > 1:
-                    tipo_fruta = 'Mix'
-                elif len(especies_en_mo) == 1:
-                    tipo_fruta = list(especies_en_mo)[0]
-                else:
-                    tipo_fruta = self._extract_fruit_type(consumos[0].get('product_name', '')) if consumos else 'Otro'
-                
-                if 'Orgánico' in manejos_en_mo:
-                    manejo = 'Orgánico'
-                elif 'Convencional' in manejos_en_mo:
-                    manejo = 'Convencional'
-                else:
-                    manejo = list(manejos_en_mo)[0] if manejos_en_mo else 'Otro'
-                
-                # Solo proceso para consolidado (no congelado)
-                if sala_tipo == 'PROCESO':
-                    if tipo_fruta not in por_fruta:
-                        por_fruta[tipo_fruta] = {'tipo_fruta': tipo_fruta, 'kg_mp': 0, 'kg_pt': 0, 'num_lotes': 0}
-                    por_fruta[tipo_fruta]['kg_mp'] += kg_mp
-                    por_fruta[tipo_fruta]['kg_pt'] += kg_pt
-                    por_fruta[tipo_fruta]['num_lotes'] += len(set(c.get('lot_id') for c in consumos if c.get('lot_id')))
-                    
-                    key_fm = f"{tipo_fruta}|{manejo}"
-                    if key_fm not in por_fruta_manejo:
-                        por_fruta_manejo[key_fm] = {'tipo_fruta': tipo_fruta, 'manejo': manejo, 'kg_mp': 0, 'kg_pt': 0}
-                    por_fruta_manejo[key_fm]['kg_mp'] += kg_mp
-                    por_fruta_manejo[key_fm]['kg_pt'] += kg_pt
-                
-                # Salas
-                if sala not in salas_data:
-                    salas_data[sala] = {
-                        'sala': sala, 
-                        'kg_mp': 0, 
-                        'kg_pt': 0, 
-                        'hh_total': 0,
-                        'hh_efectiva_total': 0,
-                        'detenciones_total': 0,
-                        'dotacion_sum': 0, 
-                        'duracion_total': 0, 
-                        'num_mos': 0,
-                        'costo_electricidad': 0,  # Costo eléctrico acumulado
-                        'total_electricidad': 0,  # Total kWh
-                        'kg_hora_efectiva_sum': 0,  # Suma de KG/Hora Efectiva de Odoo
-                        'kg_hh_efectiva_sum': 0     # Suma de KG/HH Efectiva de Odoo
-                    }
-                
-                salas_data[sala]['kg_mp'] += kg_mp
-                salas_data[sala]['kg_pt'] += kg_pt
-                salas_data[sala]['hh_total'] += hh if isinstance(hh, (int, float)) else 0
-                
-                # Acumular electricidad por sala
-                salas_data[sala]['costo_electricidad'] += costo_elec
-                salas_data[sala]['total_electricidad'] += costo_elec  # kWh = mismo valor por ahora
-                
-                # HH Efectiva
-                hh_efectiva = mo.get('x_studio_hh_efectiva') or 0
-                salas_data[sala]['hh_efectiva_total'] += hh_efectiva if isinstance(hh_efectiva, (int, float)) else 0
-                
-                # KG/Hora Efectiva y KG/HH Efectiva desde Odoo
-                kg_hora_efectiva_odoo = mo.get('x_studio_kghora_efectiva') or 0
-                kg_hh_efectiva_odoo = mo.get('x_studio_kghh_efectiva') or 0
-                salas_data[sala]['kg_hora_efectiva_sum'] += kg_hora_efectiva_odoo if isinstance(kg_hora_efectiva_odoo, (int, float)) else 0
-                salas_data[sala]['kg_hh_efectiva_sum'] += kg_hh_efectiva_odoo if isinstance(kg_hh_efectiva_odoo, (int, float)) else 0
-                
-                # Detenciones
-                detenciones = mo.get('x_studio_horas_detencion_totales') or 0
-                salas_data[sala]['detenciones_total'] += detenciones if isinstance(detenciones, (int, float)) else 0
-                
-                dotacion = mo.get('x_studio_dotacin') or 0
-                salas_data[sala]['dotacion_sum'] += dotacion if isinstance(dotacion, (int, float)) else 0
-                
-                # Duración
-                duracion_horas = 0
-                inicio = mo.get('x_studio_inicio_de_proceso') or mo.get('date_start')
-                fin = mo.get('x_studio_termino_de_proceso') or mo.get('date_finished')
-                if inicio and fin:
-                    try:
-                        if isinstance(inicio, str):
-                            d0 = datetime.strptime(inicio, "%Y-%m-%d %H:%M:%S")
-                        else:
-                            d0 = inicio
-                        if isinstance(fin, str):
-                            d1 = datetime.strptime(fin, "%Y-%m-%d %H:%M:%S")
-                        else:
-                            d1 = fin
-                        duracion_horas = round((d1 - d0).total_seconds() / 3600, 2)
-                    except Exception:
-                        pass
-                
-                salas_data[sala]['duracion_total'] += duracion_horas
-                salas_data[sala]['num_mos'] += 1
-                
-                # MO resultado - solo usar campos reales de proceso
-                fecha_inicio_raw = mo.get('x_studio_inicio_de_proceso', '') or ''
-                fecha_termino_raw = mo.get('x_studio_termino_de_proceso', '') or ''
-                fecha = str(fecha_inicio_raw)[:10] if fecha_inicio_raw else ''
-                
-                # Campos de Odoo directos
-                kg_hora_efectiva = mo.get('x_studio_kghora_efectiva') or 0
-                kg_hh_efectiva = mo.get('x_studio_kghh_efectiva') or 0
-                hh_efectiva = mo.get('x_studio_hh_efectiva') or 0
-                
-                # Detenciones de esta MO
-                detenciones_mo = mo.get('x_studio_horas_detencion_totales') or 0
-                
-                mos_resultado.append({
-                    'mo_id': mo.get('id', 0),
-                    'mo_name': mo.get('name', ''),
-                    'product_name': product_name,
-                    'especie': tipo_fruta,
-                    'manejo': manejo,
-                    'kg_mp': round(kg_mp, 2),
-                    'kg_pt': round(kg_pt, 2),
-                    'kg_merma': round(kg_merma, 2),
-                    'rendimiento': round(rendimiento, 2),
-                    'merma_pct': round((kg_merma / kg_mp * 100) if kg_mp > 0 else 0, 2),
-                    'costo_electricidad': costo_elec,
-                    'duracion_horas': duracion_horas,
-                    'hh': hh if isinstance(hh, (int, float)) else 0,
-                    'hh_efectiva': hh_efectiva if isinstance(hh_efectiva, (int, float)) else 0,
-                    'detenciones': detenciones_mo if isinstance(detenciones_mo, (int, float)) else 0,
-                    'kg_por_hora': kg_hora_efectiva if isinstance(kg_hora_efectiva, (int, float)) else 0,
-                    'kg_hora_efectiva': kg_hora_efectiva if isinstance(kg_hora_efectiva, (int, float)) else 0,
-                    'kg_hh_efectiva': kg_hh_efectiva if isinstance(kg_hh_efectiva, (int, float)) else 0,
-                    'dotacion': dotacion if isinstance(dotacion, (int, float)) else 0,
-                    'sala': sala,
-                    'sala_original': mo.get('x_studio_sala_de_proceso', '') or '',
-                    'sala_tipo': sala_tipo,
-                    'fecha': fecha,
-                    'fecha_inicio': str(fecha_inicio_raw)[:16] if fecha_inicio_raw else '',
-                    'fecha_termino': str(fecha_termino_raw)[:16] if fecha_termino_raw else ''
-                })
-                
-            except Exception:
-                continue
-        
-        # Calcular KPIs finales
-        rendimiento_promedio = (total_kg_pt / total_kg_mp * 100) if total_kg_mp > 0 else 0
-        # Usar merma REAL identificada por categ_id (no diferencia calculada)
-        merma_pct = (total_kg_merma / total_kg_mp * 100) if total_kg_mp > 0 else 0
-        kg_por_hh = (total_kg_pt / total_hh) if total_hh > 0 else 0
-        
-        proceso_rendimiento = (proceso_kg_pt / proceso_kg_mp * 100) if proceso_kg_mp > 0 else 0
-        proceso_merma_pct = (proceso_kg_merma / proceso_kg_mp * 100) if proceso_kg_mp > 0 else 0
-        proceso_kg_por_hh = (proceso_kg_pt / proceso_hh) if proceso_hh > 0 else 0
-        
-        congelado_rendimiento = (congelado_kg_pt / congelado_kg_mp * 100) if congelado_kg_mp > 0 else 0
-        congelado_merma_pct = (congelado_kg_merma / congelado_kg_mp * 100) if congelado_kg_mp > 0 else 0
-        
-        # Overview
-        overview = {
-            'total_kg_mp': round(total_kg_mp, 2),
-            'total_kg_pt': round(total_kg_pt, 2),
-            'total_kg_merma': round(total_kg_merma, 2),  # Nueva: Merma real
-            'rendimiento_promedio': round(rendimiento_promedio, 2),
-            'merma_total_kg': round(total_kg_merma, 2),  # Usa merma real
-            'merma_pct': round(merma_pct, 2),
-            'mos_procesadas': len(mos),
-            'lotes_unicos': len(lotes_set),
-            'total_hh': round(total_hh, 2),
-            'kg_por_hh': round(kg_por_hh, 2),
-            # Proceso
-            'proceso_kg_mp': round(proceso_kg_mp, 2),
-            'proceso_kg_pt': round(proceso_kg_pt, 2),
-            'proceso_kg_merma': round(proceso_kg_merma, 2),  # Nueva: Merma proceso
-            'proceso_rendimiento': round(proceso_rendimiento, 2),
-            'proceso_merma_kg': round(proceso_kg_merma, 2),  # Usa merma real
-            'proceso_merma_pct': round(proceso_merma_pct, 2),
-            'proceso_mos': proceso_mos,
-            'proceso_hh': round(proceso_hh, 2),
-            'proceso_kg_por_hh': round(proceso_kg_por_hh, 2),
-            # Congelado
-            'congelado_kg_mp': round(congelado_kg_mp, 2),
-            'congelado_kg_pt': round(congelado_kg_pt, 2),
-            'congelado_kg_merma': round(congelado_kg_merma, 2),  # Nueva: Merma congelado
-            'congelado_rendimiento': round(congelado_rendimiento, 2),
-            'congelado_merma_pct': round(congelado_merma_pct, 2),  # Nueva: % merma congelado
-            'congelado_mos': congelado_mos,
-            'congelado_lotes': len(congelado_lotes),
-            'congelado_proveedores': len(congelado_proveedores),
-            # Costos
-            'total_costo_electricidad': round(total_costo_elec, 2)
-        }
+        # Overview, consolidado, salas y MOs con operaciones agrupadas (ver rendimiento/dashboard.py)
+        result = calcular_dashboard(mos, consumos_by_mo, produccion_by_mo, costos_op_by_mo)
         
-        # Consolidado por fruta
-        resultado_fruta = []
-        for _, data in por_fruta.items():
-            kg_mp = data['kg_mp']
-            kg_pt = data['kg_pt']
-            resultado_fruta.append({
-                **data,
-                'rendimiento': round((kg_pt / kg_mp * 100) if kg_mp > 0 else 0, 2),
-                'merma': round(kg_mp - kg_pt, 2)
-            })
-        resultado_fruta.sort(key=lambda x: x['kg_pt'], reverse=True)
-        
-        resultado_fruta_manejo = []
-        for _, data in por_fruta_manejo.items():
-            kg_mp = data['kg_mp']
-            kg_pt = data['kg_pt']
-            resultado_fruta_manejo.append({
-                **data,
-                'rendimiento': round((kg_pt / kg_mp * 100) if kg_mp > 0 else 0, 2),
-                'merma': round(kg_mp - kg_pt, 2)
-            })
-        resultado_fruta_manejo.sort(key=lambda x: (x['tipo_fruta'], -x['kg_pt']))
+        # Guardar en caché con TTL de 180 segundos (3 minutos)
+        self._cache.set(cache_key, result, ttl=180)
         
-        consolidado = {
-            'por_fruta': resultado_fruta,
-            'por_fruta_manejo': resultado_fruta_manejo
-        }
+        return result
+
+    def _get_cubo_kg_linea(self, fecha_inicio: str, fecha_fin: str, grano: str) -> Dict:
+        """Cubo KG/Línea del rango (cacheado 3 min, igual que el dashboard)."""
+        cache_key = self._cache._make_key("rendimiento_rollup", fecha_inicio, fecha_fin, grano)
+        cubo = self._cache.get(cache_key)
+        if cubo is None:
+            dashboard = self.get_dashboard_completo(fecha_inicio, fecha_fin, solo_terminadas=False)
+            mos = dashboard.get('mos', [])
+            cubo = {'celdas': construir_cubo(mos, grano), 'mos': mos}
+            self._cache.set(cache_key, cubo, ttl=180)
+        return cubo
+
+    def get_rollup_kg_linea(self, fecha_inicio: str, fecha_fin: str, grano: str = 'dia',
+                            agrupar_por: List[str] = None, filtros: Dict[str, List[str]] = None,
+                            page: int = 1, page_size: int = 500) -> Dict:
+        """
+        Cubo pre-agregado de productividad (periodo × sala × turno × especie × planta).
         
-        # Salas
-        resultado_salas = []
-        for sala, data in salas_data.items():
-            kg_pt = data['kg_pt']
-            kg_mp = data['kg_mp']
-            hh = data['hh_total']
-            hh_efectiva = data['hh_efectiva_total']
-            detenciones = data['detenciones_total']
-            duracion = data['duracion_total']
-            num_mos = data['num_mos']
-            dotacion_prom = data['dotacion_sum'] / num_mos if num_mos > 0 else 0
-            
-            # USAR PROMEDIOS DE ODOO (x_studio_kghora_efectiva, x_studio_kghh_efectiva)
-            kg_hora_efectiva_odoo = data.get('kg_hora_efectiva_sum', 0) / num_mos if num_mos > 0 else 0
-            kg_hh_efectiva_odoo = data.get('kg_hh_efectiva_sum', 0) / num_mos if num_mos > 0 else 0
-            
-            # Fallback: calcular si Odoo no tiene el dato
-            kg_por_hora_efectiva = kg_hora_efectiva_odoo if kg_hora_efectiva_odoo > 0 else (kg_pt / hh_efectiva if hh_efectiva > 0 else 0)
-            kg_por_hh_efectiva = kg_hh_efectiva_odoo if kg_hh_efectiva_odoo > 0 else (kg_pt / hh_efectiva if hh_efectiva > 0 else 0)
-            
-            detenciones_promedio = detenciones / num_mos if num_mos > 0 else 0
-            hh_promedio = hh / num_mos if num_mos > 0 else 0
-            hh_efectiva_promedio = hh_efectiva / num_mos if num_mos > 0 else 0
-            
-            # Electricidad
-            costo_elec = data.get('costo_electricidad', 0)
-            total_elec = data.get('total_electricidad', 0)
-            kwh_por_kg = total_elec / kg_pt if kg_pt > 0 else 0
+        Args:
+            grano: 'dia' o 'semana'
+            agrupar_por: Dimensiones del resultado (default: periodo, sala)
+            filtros: {dimension: [valores]} para el drill-down visible
+            page, page_size: Paginación de filas
             
-            resultado_salas.append({
-                'sala': sala,
-                'kg_mp': round(kg_mp, 2),
-                'kg_pt': round(kg_pt, 2),
-                'rendimiento': round((kg_pt / kg_mp * 100) if kg_mp > 0 else 0, 2),
-                'merma': round(kg_mp - kg_pt, 2),
-                'kg_por_hh': round(kg_pt / hh if hh > 0 else 0, 2),
-                'kg_por_hora': round(kg_pt / duracion if duracion > 0 else 0, 2),
-                'kg_por_operario': round(kg_pt / dotacion_prom if dotacion_prom > 0 else 0, 2),
-                'hh_total': round(hh, 2),
-                'hh_promedio': round(hh_promedio, 2),
-                'hh_efectiva_total': round(hh_efectiva, 2),
-                'hh_efectiva_promedio': round(hh_efectiva_promedio, 2),
-                'kg_por_hora_efectiva': round(kg_por_hora_efectiva, 2),  # Desde Odoo
-                'kg_por_hh_efectiva': round(kg_por_hh_efectiva, 2),      # Desde Odoo
-                'detenciones_total': round(detenciones, 2),
-                'detenciones_promedio': round(detenciones_promedio, 2),
-                'dotacion_promedio': round(dotacion_prom, 1),
-                'num_mos': num_mos,
-                # Electricidad (para túneles)
-                'costo_electricidad': round(costo_elec, 2),
-                'total_electricidad': round(total_elec, 2),
-                'kwh_por_kg': round(kwh_por_kg, 4)
-            })
-        resultado_salas.sort(key=lambda x: x['kg_pt'], reverse=True)
-        
-        # MOs ordenadas
-        mos_resultado.sort(key=lambda x: x['fecha'], reverse=True)
-        
-        result = {
-            'overview': overview,
-            'consolidado': consolidado,
-            'salas': resultado_salas,
-            'mos': mos_resultado
+        Returns:
+            {'filas': [...], 'totales': {...}, 'dimensiones': {dim: [valores]}, 'total_filas', 'page', ...}
+        """
+        if agrupar_por is None:
+            agrupar_por = ['periodo', 'sala']
+        cubo = self._get_cubo_kg_linea(fecha_inicio, fecha_fin, grano)
+        celdas = cubo['celdas']
+        filas, totales = agrupar_cubo(celdas, agrupar_por, filtros)
+        
+        page_size = max(1, min(page_size, 5000))
+        start = (max(page, 1) - 1) * page_size
+        return {
+            'grano': grano,
+            'agrupar_por': agrupar_por,
+            'filas': filas[start:start + page_size],
+            'totales': totales,
+            # Valores disponibles por dimensión (para poblar filtros sin bajar MOs)
+            'dimensiones': {d: sorted({c[d] for c in celdas}) for d in DIMENSIONES},
+            'total_filas': len(filas),
+            'page': max(page, 1),
+            'page_size': page_size,
+            'total_pages': (len(filas) + page_size - 1) // page_size
         }
+
+    def get_rollup_mos(self, fecha_inicio: str, fecha_fin: str, grano: str = 'dia',
+                       filtros: Dict[str, List[str]] = None,
+                       page: int = 1, page_size: int = 100) -> Dict:
+        """MOs de una celda del cubo (drill-down), paginadas."""
+        cubo = self._get_cubo_kg_linea(fecha_inicio, fecha_fin, grano)
+        filtros = {d: set(v) for d, v in (filtros or {}).items() if v and d in DIMENSIONES}
+        
+        seleccion = []
+        for mo in cubo['mos']:
+            dims = dimensiones_mo(mo, grano)
+            if dims is None:
+                continue
+            valores = dict(zip(DIMENSIONES, dims))
+            if all(valores[d] in permitidos for d, permitidos in filtros.items()):
+                seleccion.append({**mo, **valores})
         
-        # Guardar en caché con TTL de 180 segundos (3 minutos)
-        self._cache.set(cache_key, result, ttl=180)
-        
-        return result
+        page_size = max(1, min(page_size, 1000))
+        start = (max(page, 1) - 1) * page_size
+        return {
+            'mos': seleccion[start:start + page_size],
+            'total': len(seleccion),
+            'page': max(page, 1),
+            'page_size': page_size,
+            'total_pages': (len(seleccion) + page_size - 1) // page_size
+        }
 
     def get_inventario_trazabilidad(self, fecha_desde: str, fecha_hasta: str) -> dict:
         """
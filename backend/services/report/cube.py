@@ -0,0 +1,284 @@
+"""
+Cubo de recepciones para los reportes (PDF, Excel, cola de reportes).
+
+Antes cada vista (envases, por fruta, fruta → manejo, fruta → productor →
+manejo, manejo → especie → productor) recorría de nuevo la lista completa de
+recepciones, normalizando categorías y bajando a `productos` en cada pasada.
+Aquí las recepciones se aplanan una sola vez en dos tablas columnares:
+
+- lineas: un registro por producto recepcionado, con tipo de fruta, manejo,
+  productor y categoría ya normalizados
+- recepciones: un registro por recepción (tipo de fruta del QC, % IQF/Block)
+
+Las líneas se agrupan en una sola pasada al grano más fino que usan las
+vistas; cada vista es un roll-up de esa tabla chica, se calcula al pedirla y
+queda memorizada en el cubo. get_cubo() guarda el cubo en el caché por clave
+de dataset, así el PDF, el Excel y los reintentos de la cola lo reutilizan.
+
+Uso:
+    cubo = get_cubo(recepciones, clave_dataset(fecha_inicio, fecha_fin, solo_hechas))
+    cubo.por_fruta()
+    cubo.envases()
+
+Las vistas retornadas son compartidas: no modificarlas.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from backend.cache import get_cache
+
+
+TTL_CUBO = 300  # igual que el caché de get_recepciones_mp
+
+COLUMNAS_RECEPCIONES = ['rec', 'admin', 'tipo_qc', 'productor_raw', 'kg_recepcionados', 'iqf', 'block']
+COLUMNAS_LINEAS = [
+    'rec', 'admin', 'productor', 'tipo_qc', 'tipo', 'manejo', 'manejo_raw', 'manejo_base',
+    'producto', 'bandeja', 'kg_pos', 'kg', 'costo',
+]
+# Grano de la agrupación base (todas las vistas de líneas salen de aquí)
+GRANO = ['tipo_qc', 'tipo', 'manejo', 'manejo_base', 'productor', 'producto', 'admin', 'bandeja', 'kg_pos']
+ORDEN_MANEJO_BASE = ['Orgánico', 'Convencional']
+
+
+def normalize_categoria(cat: str) -> str:
+    """Normaliza nombres de categorías."""
+    if not cat:
+        return ''
+    c = cat.strip().upper()
+    if 'BANDEJ' in c:
+        return 'BANDEJAS'
+    return c
+
+
+def _manejo_base(manejo_raw: str) -> str:
+    """Orgánico / Convencional / Sin Manejo."""
+    if 'org' in manejo_raw.lower():
+        return 'Orgánico'
+    return 'Convencional' if manejo_raw else 'Sin Manejo'
+
+
+def _prom_costo(costo: float, kg: float) -> Optional[float]:
+    return float(costo / kg) if kg > 0 else None
+
+
+class RecepcionesCubo:
+    """Tablas aplanadas de un conjunto de recepciones y sus vistas agregadas."""
+
+    def __init__(self, recepciones: List[Dict[str, Any]]):
+        filas_rec, filas_lin = [], []
+        for i, r in enumerate(recepciones):
+            productor_raw = r.get('productor') or ''
+            productor = productor_raw.strip()
+            admin = productor.upper() == 'ADMINISTRADOR'
+            tipo_qc = (r.get('tipo_fruta') or '').strip()
+            filas_rec.append((
+                i, admin, tipo_qc, productor_raw, float(r.get('kg_recepcionados') or 0),
+                float(r.get('total_iqf', 0) or 0), float(r.get('total_block', 0) or 0),
+            ))
+            for p in r.get('productos', []) or []:
+                bandeja = normalize_categoria(p.get('Categoria', '')) == 'BANDEJAS'
+                kg = p.get('Kg Hechos', 0) or 0
+                manejo_raw = (p.get('Manejo') or '').strip()
+                filas_lin.append((
+                    i, admin, productor or 'Sin Productor', tipo_qc,
+                    # TipoFruta del producto, con fallback al tipo_fruta del QC
+                    (p.get('TipoFruta') or tipo_qc or '').strip(),
+                    manejo_raw or 'Sin Manejo', manejo_raw, _manejo_base(manejo_raw),
+                    (p.get('Producto') or 'Sin nombre') if bandeja else '',
+                    bandeja, kg > 0, float(kg), float(p.get('Costo Total', 0) or 0),
+                ))
+
+        tipos = {'admin': bool, 'kg_recepcionados': float, 'iqf': float, 'block': float}
+        self.recepciones = pd.DataFrame(filas_rec, columns=COLUMNAS_RECEPCIONES).astype(tipos)
+        tipos = {'admin': bool, 'bandeja': bool, 'kg_pos': bool, 'kg': float, 'costo': float}
+        self.lineas = pd.DataFrame(filas_lin, columns=COLUMNAS_LINEAS).astype(tipos)
+        # Única pasada agrupada sobre las líneas (sort=False: orden de primera aparición)
+        self.base = self.lineas.groupby(GRANO, sort=False)[['kg', 'costo']].sum().reset_index()
+        self._vistas: Dict[Any, Any] = {}
+
+    def _memo(self, clave, calcular):
+        if clave not in self._vistas:
+            self._vistas[clave] = calcular()
+        return self._vistas[clave]
+
+    def _fruta(self) -> pd.DataFrame:
+        """Líneas de fruta: sin bandejas, con kg, con tipo y sin el productor ADMINISTRADOR."""
+        b = self.base
+        return b[~b['admin'] & ~b['bandeja'] & b['kg_pos'] & (b['tipo'] != '')]
+
+    # ==================== VISTAS ====================
+
+    def envases(self) -> Dict[str, float]:
+        """Envases (bandejas) por nombre de producto, en unidades."""
+        def calcular():
+            b = self.base[self.base['bandeja']]
+            return {nombre: float(kg) for nombre, kg in b.groupby('producto', sort=False)['kg'].sum().items()}
+        return self._memo('envases', calcular)
+
+    def total_bandejas(self) -> float:
+        """Bandejas recepcionadas (unidades); en los movimientos la cantidad queda en 'Kg Hechos'."""
+        return sum(self.envases().values())
+
+    def por_fruta(self) -> List[Dict[str, Any]]:
+        """Métricas por tipo_fruta del QC (kg y costo sin bandejas, % IQF/Block, top productores)."""
+        return self._memo('por_fruta', self._calcular_por_fruta)
+
+    def _calcular_por_fruta(self) -> List[Dict[str, Any]]:
+        rec = self.recepciones[~self.recepciones['admin'] & (self.recepciones['tipo_qc'] != '')]
+        if rec.empty:
+            return []
+        g = rec.groupby('tipo_qc', sort=False)
+        b = self.base
+        montos = b[~b['admin'] & ~b['bandeja'] & (b['tipo_qc'] != '')].groupby('tipo_qc', sort=False)[['kg', 'costo']].sum()
+        resumen = pd.DataFrame({
+            'n_recepciones': g.size(), 'prom_iqf': g['iqf'].mean(), 'prom_block': g['block'].mean(),
+        }).join(montos).fillna({'kg': 0.0, 'costo': 0.0})
+
+        productores: Dict[str, List[Tuple[str, float]]] = {}
+        kg_productor = rec[rec['productor_raw'] != ''].groupby(['tipo_qc', 'productor_raw'], sort=False)['kg_recepcionados'].sum()
+        for (tipo, productor), kg in kg_productor.items():
+            productores.setdefault(tipo, []).append((productor, float(kg)))
+
+        out = []
+        for tipo, v in resumen.iterrows():
+            out.append({
+                'tipo_fruta': tipo,
+                'kg': float(v['kg']),
+                'costo': float(v['costo']),
+                'costo_prom': _prom_costo(v['costo'], v['kg']),
+                'prom_iqf': float(v['prom_iqf']),
+                'prom_block': float(v['prom_block']),
+                'n_recepciones': int(v['n_recepciones']),
+                'top_productores': sorted(productores.get(tipo, []), key=lambda x: x[1], reverse=True)[:5]
+            })
+        out.sort(key=lambda x: x['kg'], reverse=True)
+        return out
+
+    def por_fruta_manejo(self) -> List[Dict[str, Any]]:
+        """Jerarquía Tipo de fruta (del producto) → Manejo, con % IQF/Block del QC."""
+        return self._memo('por_fruta_manejo', self._calcular_por_fruta_manejo)
+
+    def _calcular_por_fruta_manejo(self) -> List[Dict[str, Any]]:
+        montos = self._fruta().groupby(['tipo', 'manejo'], sort=False)[['kg', 'costo']].sum()
+        if montos.empty:
+            return []
+        # IQF/Block son mediciones del tipo_fruta del QC: solo cuentan para los
+        # manejos de ese tipo dentro de cada recepción (un valor por recepción)
+        l = self.lineas
+        pares = l[~l['admin'] & ~l['bandeja'] & l['kg_pos'] & (l['tipo'] != '') & (l['tipo'] == l['tipo_qc'])]
+        pares = pares[['rec', 'tipo', 'manejo']].drop_duplicates()
+        calidad = pares.merge(self.recepciones[['rec', 'iqf', 'block']], on='rec').groupby(['tipo', 'manejo'])[['iqf', 'block']].mean()
+        montos = montos.join(calidad).fillna({'iqf': 0.0, 'block': 0.0})
+
+        agrup: Dict[str, List[Dict[str, Any]]] = {}
+        for (tipo, manejo), v in montos.iterrows():
+            agrup.setdefault(tipo, []).append({
+                'manejo': manejo,
+                'kg': float(v['kg']),
+                'costo': float(v['costo']),
+                'costo_prom': _prom_costo(v['costo'], v['kg']),
+                'prom_iqf': float(v['iqf']),
+                'prom_block': float(v['block'])
+            })
+
+        out = []
+        for tipo, manejos in agrup.items():
+            # Alfabético y luego por kg descendente (los empates quedan alfabéticos)
+            manejos.sort(key=lambda x: x['manejo'])
+            manejos.sort(key=lambda x: x['kg'], reverse=True)
+            out.append({
+                'tipo_fruta': tipo,
+                'kg_total': sum(m['kg'] for m in manejos),
+                'costo_total': sum(m['costo'] for m in manejos),
+                'manejos': manejos
+            })
+        out.sort(key=lambda x: x['kg_total'], reverse=True)
+        return out
+
+    def por_fruta_productor_manejo(self) -> List[Dict[str, Any]]:
+        """Jerarquía Tipo de fruta → Productor → Manejo (kg, costo y costo promedio por nivel)."""
+        return self._memo('por_fruta_productor_manejo', lambda: self._tres_niveles(
+            ['tipo', 'productor', 'manejo'], ('tipo_fruta', 'productor', 'manejo'), ('productores', 'manejos')
+        ))
+
+    def por_manejo_especie_productor(self) -> List[Dict[str, Any]]:
+        """Jerarquía Manejo (Orgánico primero, luego Convencional) → Especie → Productor."""
+        def calcular():
+            out = self._tres_niveles(
+                ['manejo_base', 'tipo', 'productor'], ('manejo', 'especie', 'productor'), ('especies', 'productores')
+            )
+            out.sort(key=lambda x: (ORDEN_MANEJO_BASE.index(x['manejo']) if x['manejo'] in ORDEN_MANEJO_BASE else 99, x['manejo']))
+            return out
+        return self._memo('por_manejo_especie_productor', calcular)
+
+    def _tres_niveles(self, columnas: List[str], nombres: Tuple[str, str, str],
+                      hijos: Tuple[str, str]) -> List[Dict[str, Any]]:
+        """Roll-up de las líneas de fruta en tres niveles, cada nivel ordenado por kg descendente."""
+        montos = self._fruta().groupby(columnas, sort=False)[['kg', 'costo']].sum()
+        arbol: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+        for (n1, n2, n3), v in montos.iterrows():
+            arbol.setdefault(n1, {}).setdefault(n2, []).append({
+                nombres[2]: n3,
+                'kg': float(v['kg']),
+                'costo': float(v['costo']),
+                'costo_prom': _prom_costo(v['costo'], v['kg'])
+            })
+
+        out = []
+        for n1, segundos in arbol.items():
+            lista = []
+            for n2, terceros in segundos.items():
+                terceros.sort(key=lambda x: x['kg'], reverse=True)
+                kg = sum(t['kg'] for t in terceros)
+                costo = sum(t['costo'] for t in terceros)
+                lista.append({nombres[1]: n2, 'kg': kg, 'costo': costo,
+                              'costo_prom': _prom_costo(costo, kg), hijos[1]: terceros})
+            lista.sort(key=lambda x: x['kg'], reverse=True)
+            kg = sum(s['kg'] for s in lista)
+            costo = sum(s['costo'] for s in lista)
+            out.append({nombres[0]: n1, 'kg': kg, 'costo': costo,
+                        'costo_prom': _prom_costo(costo, kg), hijos[0]: lista})
+        out.sort(key=lambda x: x['kg'], reverse=True)
+        return out
+
+    def resumen_por_tipo(self, filter_tipo_fruta: Optional[List[str]] = None,
+                         filter_manejo: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Resumen del Excel: kg, costo y # de recepciones por tipo de fruta del producto
+        (sin bandejas, incluye ADMINISTRADOR), con los filtros de tipo y manejo por línea.
+        """
+        clave = ('resumen_por_tipo', tuple(filter_tipo_fruta or ()), tuple(filter_manejo or ()))
+
+        def calcular():
+            l = self.lineas[~self.lineas['bandeja'] & self.lineas['kg_pos']]
+            if filter_tipo_fruta:
+                l = l[l['tipo'].isin(filter_tipo_fruta)]
+            if filter_manejo:
+                l = l[l['manejo_raw'].isin(filter_manejo)]
+            l = l.assign(tipo=l['tipo'].where(l['tipo'] != '', 'SIN_TIPO'))
+            g = l.groupby('tipo').agg(kg=('kg', 'sum'), costo=('costo', 'sum'), n_recepciones=('rec', 'nunique'))
+            return [
+                {'tipo_fruta': tipo, 'kg': float(v['kg']), 'costo': float(v['costo']),
+                 'costo_prom': _prom_costo(v['costo'], v['kg']), 'n_recepciones': int(v['n_recepciones'])}
+                for tipo, v in g.iterrows()
+            ]
+        return self._memo(clave, calcular)
+
+
+def clave_dataset(fecha_inicio: str, fecha_fin: str, solo_hechas: bool = True, **filtros) -> tuple:
+    """Clave del conjunto de recepciones (rango, estado y filtros a nivel de recepción)."""
+    return (fecha_inicio, fecha_fin, bool(solo_hechas)) + tuple(
+        (nombre, tuple(sorted(valores)) if valores else ()) for nombre, valores in sorted(filtros.items())
+    )
+
+
+def get_cubo(recepciones: List[Dict[str, Any]], clave: tuple) -> RecepcionesCubo:
+    """Cubo de las recepciones, reutilizado desde el caché mientras viva la clave (TTL_CUBO)."""
+    cache = get_cache()
+    key = cache._make_key('recepciones_cubo', *clave)
+    cubo = cache.get(key)
+    if cubo is None:
+        cubo = RecepcionesCubo(recepciones)
+        cache.set(key, cubo, ttl=TTL_CUBO)
+    return cubo
@@ -0,0 +1,402 @@
+"""
+Cola de trabajos de reportes (PDF / Excel / trazabilidad) en segundo plano.
+
+Los reportes pesados se generaban dentro del request y se reconstruían desde
+Odoo en cada clic, así que los más grandes superaban el timeout de 120 s del
+cliente y dejaban un worker bloqueado. Aquí se encolan:
+
+- enviar(): registra el trabajo y lo deja en un pool acotado de hilos
+  (REPORT_WORKERS). Parámetros idénticos (mismo tipo, credenciales y filtros)
+  comparten el mismo job_id, así un doble clic no genera dos veces.
+- estado() / esperar(): progreso (0-100 y mensaje) para sondear desde las
+  páginas de Streamlit.
+- artefacto(): el archivo generado, guardado en disco con TTL por tipo; si se
+  vuelve a pedir dentro del TTL se entrega sin consultar Odoo.
+
+Cada tipo de reporte se registra en GENERADORES con una función
+(username, password, params, progreso) -> (contenido, filename, media_type).
+"""
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+REPORT_JOBS_DIR = Path(__file__).parent.parent / "data" / "report_jobs"
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+# Trabajos en cola o en proceso a la vez; sobre esto enviar() rechaza
+MAX_PENDIENTES = 20
+# Trabajos terminados que se mantienen en memoria para consultar su estado
+MAX_TERMINADOS = 200
+PURGA_SEGUNDOS = 600
+# Clave del HMAC del job_id (nombre del artefacto y permiso de descarga). Sin
+# variable de entorno es aleatoria por proceso y la caché en disco no sobrevive
+# a un reinicio.
+REPORT_JOBS_SECRET_KEY = os.getenv(
+    "REPORT_JOBS_SECRET_KEY",
+    os.getenv("SESSION_SECRET_KEY", secrets.token_hex(32)),
+)
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+Progreso = Callable[[int, str], None]
+Generador = Callable[[str, str, Dict[str, Any], Progreso], Tuple[bytes, str, str]]
+
+
+class ColaLlenaError(Exception):
+    """Hay demasiados reportes en cola; el cliente debe reintentar más tarde."""
+
+
+# ============ GENERADORES ============
+
+def _logo_path() -> str:
+    raiz = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    return os.path.join(raiz, 'docs', 'LOGO.png')
+
+
+def _recepciones_pdf(username: str, password: str, params: Dict[str, Any], progreso: Progreso):
+    from backend.services.report_service import generate_recepcion_report_pdf
+    progreso(10, "Consultando recepciones en Odoo")
+    contenido = generate_recepcion_report_pdf(
+        username, password, params['fecha_inicio'], params['fecha_fin'],
+        bool(params.get('include_prev_week')), bool(params.get('include_month_accum')),
+        logo_path=_logo_path(), solo_hechas=params.get('solo_hechas', True)
+    )
+    filename = f"informe_recepciones_{params['fecha_inicio']}_a_{params['fecha_fin']}.pdf"
+    return contenido, filename, "application/pdf"
+
+
+def _recepciones_xlsx(username: str, password: str, params: Dict[str, Any], progreso: Progreso):
+    from backend.services.excel_service import generate_recepciones_excel
+    progreso(10, "Consultando recepciones en Odoo")
+    contenido = generate_recepciones_excel(
+        username, password, params['fecha_inicio'], params['fecha_fin'],
+        bool(params.get('include_prev_week')), bool(params.get('include_month_accum')),
+        solo_hechas=params.get('solo_hechas', True),
+        filter_tipo_fruta=params.get('tipo_fruta'), filter_clasificacion=params.get('clasificacion'),
+        filter_manejo=params.get('manejo'), filter_productor=params.get('productor'),
+        filter_origen=params.get('origen')
+    )
+    filename = f"informe_recepciones_{params['fecha_inicio']}_a_{params['fecha_fin']}.xlsx"
+    return contenido, filename, XLSX_MEDIA_TYPE
+
+
+def _recepciones_defectos_xlsx(username: str, password: str, params: Dict[str, Any], progreso: Progreso):
+    from backend.services.recepcion_defectos_service import generar_reporte_defectos_excel
+    progreso(10, "Consultando controles de calidad en Odoo")
+    contenido = generar_reporte_defectos_excel(
+        username=username, password=password,
+        fecha_inicio=params['fecha_inicio'], fecha_fin=params['fecha_fin'],
+        origenes=params.get('origen'), solo_hechas=params.get('solo_hechas', True)
+    )
+    filename = f"recepciones_defectos_{params['fecha_inicio']}_a_{params['fecha_fin']}.xlsx"
+    return contenido, filename, XLSX_MEDIA_TYPE
+
+
+def _monitor_pdf(username: str, password: str, params: Dict[str, Any], progreso: Progreso):
+    from backend.services.monitor_produccion_service import MonitorProduccionService
+    from backend.services.monitor_report_service import generate_monitor_report_pdf
+    progreso(10, "Armando datos del monitor")
+    service = MonitorProduccionService(username=username, password=password)
+    datos = service.get_datos_reporte(
+        params.get('fecha_inicio', ''), params.get('fecha_fin', ''),
+        params.get('planta'), params.get('sala'), params.get('producto')
+    )
+    progreso(70, "Generando PDF")
+    contenido = generate_monitor_report_pdf(**datos)
+    filename = f"Monitor_Produccion_{params.get('fecha_fin', '')}.pdf"
+    return contenido, filename, "application/pdf"
+
+
+def _bandejas_pdf(username: str, password: str, params: Dict[str, Any], progreso: Progreso):
+    from backend.services.report_service import generate_bandejas_report_pdf
+    progreso(10, "Generando PDF")
+    contenido = generate_bandejas_report_pdf(
+        kpis=params.get('kpis') or {},
+        df_gestion=params.get('gestion') or [],
+        df_productores=params.get('productores') or [],
+        filtros=params.get('filtros') or {}
+    )
+    return contenido, params.get('filename') or "informe_bandejas.pdf", "application/pdf"
+
+
+def _trazabilidad_pallets(username: str, password: str, params: Dict[str, Any], progreso: Progreso):
+    from backend.services.trazabilidad_pallet_service import TrazabilidadPalletService
+    pallets = [p for p in (params.get('pallets') or []) if p]
+    service = TrazabilidadPalletService(username=username, password=password)
+    resultados = {}
+    for i, pallet in enumerate(pallets):
+        progreso(int(100 * i / max(len(pallets), 1)), f"Trazando {pallet} ({i + 1}/{len(pallets)})")
+        resultados[pallet] = service.trazar_pallet(pallet)
+    contenido = json.dumps(resultados, ensure_ascii=False, default=str).encode("utf-8")
+    return contenido, "trazabilidad_pallets.json", "application/json"
+
+
+# tipo -> (generador, TTL del artefacto en segundos)
+GENERADORES: Dict[str, Tuple[Generador, int]] = {
+    "recepciones_pdf": (_recepciones_pdf, 1800),
+    "recepciones_xlsx": (_recepciones_xlsx, 1800),
+    "recepciones_defectos_xlsx": (_recepciones_defectos_xlsx, 1800),
+    "monitor_pdf": (_monitor_pdf, 300),
+    "bandejas_pdf": (_bandejas_pdf, 3600),
+    "trazabilidad_pallets": (_trazabilidad_pallets, 3600),
+}
+
+
+# ============ ESTADO ============
+
+_lock = threading.RLock()
+_jobs: Dict[str, Dict[str, Any]] = {}
+_eventos: Dict[str, threading.Event] = {}
+_executor: Optional[ThreadPoolExecutor] = None
+_ultima_purga = 0.0
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix="report-job")
+        return _executor
+
+
+def _job_id(tipo: str, username: str, password: str, params: Dict[str, Any]) -> str:
+    """
+    Clave estable de (tipo, credenciales, parámetros). Es un HMAC con clave del
+    servidor: conocer el job_id o el directorio de artefactos no permite probar
+    claves offline.
+    """
+    canonico = json.dumps(
+        {"tipo": tipo, "usuario": username, "clave": password, "params": params},
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hmac.new(REPORT_JOBS_SECRET_KEY.encode("utf-8"), canonico.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def _rutas(job_id: str) -> Tuple[Path, Path]:
+    return REPORT_JOBS_DIR / f"{job_id}.bin", REPORT_JOBS_DIR / f"{job_id}.json"
+
+
+def _leer_meta(job_id: str) -> Optional[Dict[str, Any]]:
+    if len(job_id) != 64 or any(c not in "0123456789abcdef" for c in job_id):
+        return None
+    datos, meta_path = _rutas(job_id)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("expira", 0) < time.time() or not datos.exists():
+        return None
+    return meta
+
+
+def _escribir_artefacto(job_id: str, contenido: bytes, meta: Dict[str, Any]) -> None:
+    REPORT_JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    datos, meta_path = _rutas(job_id)
+    for destino, data in ((datos, contenido),
+                          (meta_path, json.dumps(meta, ensure_ascii=False).encode("utf-8"))):
+        fd, tmp = tempfile.mkstemp(dir=REPORT_JOBS_DIR, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, destino)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+
+def _publico(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in job.items() if not k.startswith("_")}
+
+
+def _actualizar(job_id: str, **cambios) -> None:
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            job.update(cambios, actualizado=datetime.now().isoformat())
+
+
+def _ejecutar(job_id: str) -> None:
+    with _lock:
+        job = _jobs[job_id]
+        tipo, username, password, params = job["tipo"], job["_username"], job["_password"], job["_params"]
+    generador, ttl = GENERADORES[tipo]
+    _actualizar(job_id, estado="procesando", progreso=0, mensaje="Iniciando")
+    inicio = time.time()
+
+    def progreso(pct: int, mensaje: str) -> None:
+        _actualizar(job_id, progreso=max(0, min(int(pct), 99)), mensaje=mensaje)
+
+    try:
+        contenido, filename, media_type = generador(username, password, params, progreso)
+        meta = {
+            "tipo": tipo,
+            "filename": filename,
+            "media_type": media_type,
+            "tamano": len(contenido),
+            "creado": datetime.now().isoformat(),
+            "expira": time.time() + ttl,
+        }
+        _escribir_artefacto(job_id, contenido, meta)
+        _actualizar(job_id, estado="listo", progreso=100, mensaje="Listo", filename=filename,
+                    media_type=media_type, tamano=len(contenido), _password=None)
+        print(f"[ReportJobs] {tipo} {job_id[:12]} listo en {time.time() - inicio:.1f}s ({len(contenido)} bytes)")
+    except Exception as e:
+        _actualizar(job_id, estado="error", mensaje="Error", error=str(e), _password=None)
+        print(f"[ReportJobs] {tipo} {job_id[:12]} falló: {e}")
+    finally:
+        with _lock:
+            evento = _eventos.pop(job_id, None)
+        if evento:
+            evento.set()
+
+
+def _podar_terminados() -> None:
+    terminados = [j for j in _jobs.values() if j["estado"] in ("listo", "error")]
+    if len(terminados) <= MAX_TERMINADOS:
+        return
+    terminados.sort(key=lambda j: j["actualizado"])
+    for job in terminados[:len(terminados) - MAX_TERMINADOS]:
+        _jobs.pop(job["job_id"], None)
+
+
+def purgar_expirados() -> int:
+    """Elimina del disco los artefactos con TTL vencido."""
+    global _ultima_purga
+    _ultima_purga = time.time()
+    if not REPORT_JOBS_DIR.is_dir():
+        return 0
+    eliminados = 0
+    for meta_path in REPORT_JOBS_DIR.glob("*.json"):
+        job_id = meta_path.stem
+        if _leer_meta(job_id) is None:
+            for path in _rutas(job_id):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+            eliminados += 1
+    if eliminados:
+        print(f"[ReportJobs] {eliminados} artefactos expirados eliminados")
+    return eliminados
+
+
+# ============ API ============
+
+def enviar(tipo: str, username: str, password: str, params: Optional[Dict[str, Any]] = None,
+           forzar: bool = False) -> Dict[str, Any]:
+    """
+    Encola un reporte y retorna su estado. Si ya hay un trabajo idéntico en
+    curso, o su artefacto sigue vigente en disco, se reutiliza (salvo forzar).
+    """
+    if tipo not in GENERADORES:
+        raise ValueError(f"Tipo de reporte desconocido: {tipo}. Opciones: {sorted(GENERADORES)}")
+    # Las credenciales nunca viajan dentro de params (ni quedan en memoria con ellos)
+    params = {k: v for k, v in (params or {}).items() if k not in ('username', 'password')}
+    job_id = _job_id(tipo, username, password, params)
+    if time.time() - _ultima_purga > PURGA_SEGUNDOS:
+        purgar_expirados()
+
+    with _lock:
+        job = _jobs.get(job_id)
+        if job and job["estado"] in ("en_cola", "procesando"):
+            return _publico(job)
+        if not forzar:
+            meta = _leer_meta(job_id)
+            if meta is not None:
+                job = {
+                    "job_id": job_id, "tipo": tipo, "estado": "listo", "progreso": 100,
+                    "mensaje": "Listo (caché)", "error": None,
+                    "creado": meta["creado"], "actualizado": meta["creado"],
+                    "filename": meta["filename"], "media_type": meta["media_type"], "tamano": meta["tamano"],
+                }
+                _jobs[job_id] = job
+                return _publico(job)
+
+        pendientes = sum(1 for j in _jobs.values() if j["estado"] in ("en_cola", "procesando"))
+        if pendientes >= MAX_PENDIENTES:
+            raise ColaLlenaError(f"Hay {pendientes} reportes en cola, intenta nuevamente en unos minutos")
+
+        ahora = datetime.now().isoformat()
+        job = {
+            "job_id": job_id, "tipo": tipo, "estado": "en_cola", "progreso": 0,
+            "mensaje": "En cola", "error": None, "creado": ahora, "actualizado": ahora,
+            "filename": None, "media_type": None, "tamano": None,
+            "_username": username, "_password": password, "_params": params,
+        }
+        _jobs[job_id] = job
+        _eventos[job_id] = threading.Event()
+        _podar_terminados()
+        _get_executor().submit(_ejecutar, job_id)
+        return _publico(job)
+
+
+def estado(job_id: str) -> Optional[Dict[str, Any]]:
+    """Estado del trabajo; tras un reinicio se reconstruye desde el artefacto en disco."""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            return _publico(job)
+    meta = _leer_meta(job_id)
+    if meta is None:
+        return None
+    return {
+        "job_id": job_id, "tipo": meta["tipo"], "estado": "listo", "progreso": 100,
+        "mensaje": "Listo (caché)", "error": None,
+        "creado": meta["creado"], "actualizado": meta["creado"],
+        "filename": meta["filename"], "media_type": meta["media_type"], "tamano": meta["tamano"],
+    }
+
+
+def esperar(job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+    """Como estado(), pero bloquea hasta timeout segundos mientras el trabajo no termine."""
+    with _lock:
+        evento = _eventos.get(job_id)
+    if evento is not None and timeout > 0:
+        evento.wait(timeout)
+    return estado(job_id)
+
+
+def artefacto(job_id: str) -> Optional[Tuple[Path, str, str]]:
+    """(ruta, filename, media_type) del archivo generado, o None si no está listo o expiró."""
+    meta = _leer_meta(job_id)
+    if meta is None:
+        return None
+    return _rutas(job_id)[0], meta["filename"], meta["media_type"]
+
+
+def start_report_workers() -> None:
+    """Crea el pool de trabajos y limpia artefactos vencidos de ejecuciones anteriores."""
+    _get_executor()
+    try:
+        purgar_expirados()
+    except Exception as e:
+        print(f"[ReportJobs] Error purgando artefactos: {e}")
+
+
+def stop_report_workers() -> None:
+    """Detiene el pool; los trabajos en cola se descartan (los artefactos quedan en disco)."""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+        for job in _jobs.values():
+            if job["estado"] == "en_cola":
+                job.update(estado="error", error="Servidor reiniciado", _password=None)
+        eventos = list(_eventos.values())
+        _eventos.clear()
+    for evento in eventos:
+        evento.set()
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -13,14 +13,7 @@ import matplotlib.pyplot as plt
 from backend.services.recepcion_service import get_recepciones_mp
 from .report.constants import MAX_DAYS_FETCH
 from .report.formatters import fmt_fecha, fmt_numero, fmt_dinero
-from .report.aggregators import (
-    normalize_categoria as _normalize_categoria,
-    aggregate_envases as _aggregate_envases,
-    aggregate_by_fruta as _aggregate_by_fruta,
-    aggregate_by_fruta_manejo as _aggregate_by_fruta_manejo,
-    aggregate_by_fruta_productor_manejo as _aggregate_by_fruta_productor_manejo,
-    aggregate_by_manejo_especie_productor as _aggregate_by_manejo_especie_productor
-)
+from .report.cube import get_cubo, clave_dataset, normalize_categoria as _normalize_categoria
 
 
 def generate_recepcion_report_pdf(username: str, password: str, fecha_inicio: str, fecha_fin: str,
@@ -72,29 +65,27 @@ def generate_recepcion_report_pdf(username: str, password: str, fecha_inicio: st
         return start_date <= rd <= end_date
 
     # filtrar recepciones para el rango principal
-    recepciones_main = [r for r in recepciones_all if _in_range(r, f_inicio, f_fin)]
-    main_agg = _aggregate_by_fruta(recepciones_main)
+    def _cubo(start_date: date, end_date: date):
+        # Un cubo por rango: todas las vistas del PDF salen de él (y del caché si ya se armó)
+        clave = clave_dataset(start_date.isoformat(), end_date.isoformat(), solo_hechas)
+        return get_cubo([r for r in recepciones_all if _in_range(r, start_date, end_date)], clave)
+
+    cubo_main = _cubo(f_inicio, f_fin)
+    main_agg = cubo_main.por_fruta()
 
     # Calcular totales y KPIs globales para mostrar arriba
     total_kg = sum(r['kg'] for r in main_agg)
     total_costo = sum(r['costo'] for r in main_agg)
-    # calcular bandejas (unidades) sumando la cantidad reportada para productos categorizados como BANDEJAS
-    # Nota: en los movimientos la cantidad queda en 'Kg Hechos' pero para bandejas representa unidades.
-    total_bandejas = 0.0
-    for r in recepciones_main:
-        for p in r.get('productos', []) or []:
-            if (p.get('Categoria') or '').upper() == 'BANDEJAS':
-                total_bandejas += p.get('Kg Hechos', 0) or 0
+    # bandejas (unidades): en los movimientos la cantidad queda en 'Kg Hechos' pero para bandejas representa unidades.
+    total_bandejas = cubo_main.total_bandejas()
 
     prev_agg = None
     if include_prev_week:
-        recepciones_prev = [r for r in recepciones_all if _in_range(r, prev_start, prev_end)]
-        prev_agg = _aggregate_by_fruta(recepciones_prev)
+        prev_agg = _cubo(prev_start, prev_end).por_fruta()
 
     month_agg = None
     if include_month_accum:
-        recepciones_month = [r for r in recepciones_all if _in_range(r, month_start, f_fin)]
-        month_agg = _aggregate_by_fruta(recepciones_month)
+        month_agg = _cubo(month_start, f_fin).por_fruta()
 
     # Generar PDF
     buffer = BytesIO()
@@ -188,7 +179,7 @@ def generate_recepcion_report_pdf(username: str, password: str, fecha_inicio: st
     elements.append(Spacer(1, 8))
     
     # Desglose de envases por tipo
-    envases_por_tipo = _aggregate_envases(recepciones_main)
+    envases_por_tipo = cubo_main.envases()
     if envases_por_tipo:
         elements.append(Paragraph("Detalle Envases Recepcionados por Tipo", styles['Heading3']))
         envases_tbl = [["Tipo de Envase", "Cantidad (unidades)"]]
@@ -212,7 +203,7 @@ def generate_recepcion_report_pdf(username: str, password: str, fecha_inicio: st
         elements.append(Spacer(1, 12))
 
     # Tabla principal con jerarquía Tipo Fruta → Manejo
-    main_agg_manejo = _aggregate_by_fruta_manejo(recepciones_main)
+    main_agg_manejo = cubo_main.por_fruta_manejo()
     
     # Obtener precios proyectados del servicio de abastecimiento
     precios_proyectados = {}
@@ -394,7 +385,7 @@ def generate_recepcion_report_pdf(username: str, password: str, fecha_inicio: st
     # Detalle por Manejo → Especie → Productor
     titulo_detalle = Paragraph("Detalle por Manejo", styles['Heading2'])
     
-    manejo_agg = _aggregate_by_manejo_especie_productor(recepciones_main)
+    manejo_agg = cubo_main.por_manejo_especie_productor()
     
     # Crear estilo para celdas con texto largo que necesita wrap
     from reportlab.lib.styles import ParagraphStyle
@@ -1,11 +1,19 @@
 """
 Servicio de gestión de sesiones con tokens JWT.
 Maneja expiración, inactividad y persistencia de sesiones.
+
+Las sesiones se guardan en SQLite (modo WAL, seguro entre workers) con
+búsqueda indexada por session_id. Encima hay un caché en memoria de TTL corto,
+las actualizaciones de actividad se agrupan (debounce) y las sesiones vencidas
+se barren en un hilo de fondo, fuera del camino de los requests.
 """
 import os
 import json
+import time
+import sqlite3
 import hashlib
 import secrets
+import threading
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from pathlib import Path
@@ -19,29 +27,175 @@ import base64
 SESSION_MAX_AGE_HOURS = 8  # Expiración máxima de sesión
 INACTIVITY_TIMEOUT_MINUTES = 30  # Timeout por inactividad
 SECRET_KEY = os.getenv("SESSION_SECRET_KEY", secrets.token_hex(32))
-SESSIONS_FILE = Path(__file__).parent.parent / "data" / "sessions.json"
+SESSIONS_FILE = Path(__file__).parent.parent / "data" / "sessions.json"  # Formato anterior (se migra)
+SESSIONS_DB = Path(__file__).parent.parent / "data" / "sessions.db"
+
+CACHE_TTL_SECONDS = 5  # Caché en memoria de sesiones leídas
+ACTIVITY_FLUSH_SECONDS = 60  # Máximo retraso al persistir last_activity
+SWEEP_INTERVAL_SECONDS = 300  # Frecuencia del barrido de sesiones vencidas
+
+_SESSION_COLUMNS = ("session_id", "username", "uid", "created_at", "last_activity",
+                    "expires_at", "encrypted_password")
+
+_db_lock = threading.Lock()
+_schema_initialized = False
+
+# session_id -> (sesión, timestamp de lectura)
+_cache: Dict[str, tuple] = {}
+# session_id -> last_activity aún no persistido
+_pending_activity: Dict[str, str] = {}
+_state_lock = threading.Lock()
+
+_sweep_stop = threading.Event()
+_sweep_thread: Optional[threading.Thread] = None
+
+
+def _get_connection() -> sqlite3.Connection:
+    """Obtiene conexión a la base de sesiones."""
+    conn = sqlite3.connect(SESSIONS_DB, timeout=15)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _init_schema(conn: sqlite3.Connection) -> None:
+    """Crea la tabla de sesiones (WAL) y migra sessions.json si existe."""
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            username TEXT NOT NULL,
+            uid INTEGER,
+            created_at TEXT NOT NULL,
+            last_activity TEXT NOT NULL,
+            expires_at TEXT NOT NULL,
+            encrypted_password TEXT NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions(expires_at);
+        CREATE INDEX IF NOT EXISTS idx_sessions_last_activity ON sessions(last_activity);
+
+        CREATE TABLE IF NOT EXISTS sessions_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        """
+    )
+    migrated = conn.execute("SELECT value FROM sessions_meta WHERE key = 'json_migrated'").fetchone()
+    if not migrated and SESSIONS_FILE.exists():
+        try:
+            legacy = json.loads(SESSIONS_FILE.read_text() or "{}")
+        except Exception:
+            legacy = {}
+        rows = [tuple(s.get(c) for c in _SESSION_COLUMNS) for s in legacy.values()
+                if all(s.get(c) is not None for c in _SESSION_COLUMNS)]
+        conn.executemany(
+            f"INSERT OR IGNORE INTO sessions ({', '.join(_SESSION_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        print(f"[SessionService] Migradas {len(rows)} sesiones desde sessions.json")
+    if not migrated:
+        conn.execute("INSERT OR REPLACE INTO sessions_meta (key, value) VALUES ('json_migrated', ?)",
+                     (datetime.now().isoformat(),))
+    conn.commit()
 
 
-def _ensure_sessions_file():
-    """Asegura que el archivo de sesiones existe."""
-    SESSIONS_FILE.parent.mkdir(parents=True, exist_ok=True)
-    if not SESSIONS_FILE.exists():
-        SESSIONS_FILE.write_text("{}")
+def _ensure_schema() -> None:
+    """Inicializa el schema una sola vez por proceso."""
+    global _schema_initialized
+    if _schema_initialized:
+        return
+    with _db_lock:
+        if _schema_initialized:
+            return
+        SESSIONS_DB.parent.mkdir(parents=True, exist_ok=True)
+        conn = _get_connection()
+        try:
+            _init_schema(conn)
+        finally:
+            conn.close()
+        _schema_initialized = True
+
 
+def _get_session(session_id: str) -> Optional[Dict[str, Any]]:
+    """Lee una sesión (read-through con caché de TTL corto)."""
+    now = time.time()
+    with _state_lock:
+        cached = _cache.get(session_id)
+        if cached and now - cached[1] < CACHE_TTL_SECONDS:
+            session = dict(cached[0])
+            pending = _pending_activity.get(session_id)
+            if pending and pending > session["last_activity"]:
+                session["last_activity"] = pending
+            return session
 
-def _load_sessions() -> Dict[str, Any]:
-    """Carga sesiones desde archivo."""
-    _ensure_sessions_file()
+    _ensure_schema()
+    conn = _get_connection()
     try:
-        return json.loads(SESSIONS_FILE.read_text())
-    except:
-        return {}
+        row = conn.execute("SELECT * FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+    finally:
+        conn.close()
+
+    with _state_lock:
+        if row is None:
+            _cache.pop(session_id, None)
+            _pending_activity.pop(session_id, None)
+            return None
+        session = dict(row)
+        _cache[session_id] = (session, now)
+        session = dict(session)
+        pending = _pending_activity.get(session_id)
+        if pending and pending > session["last_activity"]:
+            session["last_activity"] = pending
+        return session
+
+
+def _is_expired(session: Dict[str, Any], now: datetime) -> bool:
+    """True si la sesión superó su expiración máxima o el timeout de inactividad."""
+    if now > datetime.fromisoformat(session["expires_at"]):
+        return True
+    inactivity_limit = datetime.fromisoformat(session["last_activity"]) + timedelta(minutes=INACTIVITY_TIMEOUT_MINUTES)
+    return now > inactivity_limit
+
+
+def _flush_activity() -> int:
+    """Persiste en bloque los last_activity pendientes."""
+    with _state_lock:
+        pending = list(_pending_activity.items())
+        _pending_activity.clear()
+    if not pending:
+        return 0
+    _ensure_schema()
+    conn = _get_connection()
+    try:
+        conn.executemany(
+            "UPDATE sessions SET last_activity = ? WHERE session_id = ? AND last_activity < ?",
+            [(ts, sid, ts) for sid, ts in pending]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    with _state_lock:
+        for sid, ts in pending:
+            cached = _cache.get(sid)
+            if cached and ts > cached[0]["last_activity"]:
+                cached[0]["last_activity"] = ts
+    return len(pending)
 
 
-def _save_sessions(sessions: Dict[str, Any]):
-    """Guarda sesiones en archivo."""
-    _ensure_sessions_file()
-    SESSIONS_FILE.write_text(json.dumps(sessions, indent=2, default=str))
+def _sweep_loop() -> None:
+    """Hilo de fondo: persiste actividad pendiente y barre sesiones vencidas."""
+    last_sweep = 0.0
+    while not _sweep_stop.wait(ACTIVITY_FLUSH_SECONDS):
+        try:
+            _flush_activity()
+            if time.time() - last_sweep >= SWEEP_INTERVAL_SECONDS:
+                last_sweep = time.time()
+                count = SessionService.cleanup_expired_sessions()
+                if count:
+                    print(f"[SessionService] Barrido: {count} sesiones vencidas eliminadas")
+        except Exception as e:
+            print(f"[SessionService] Error en barrido de sesiones: {e}")
 
 
 def _generate_token(data: Dict[str, Any]) -> str:
@@ -100,9 +254,18 @@ class SessionService:
         }
         
         # Guardar sesión
-        sessions = _load_sessions()
-        sessions[session_id] = session_data
-        _save_sessions(sessions)
+        _ensure_schema()
+        conn = _get_connection()
+        try:
+            conn.execute(
+                f"INSERT OR REPLACE INTO sessions ({', '.join(_SESSION_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                tuple(session_data[c] for c in _SESSION_COLUMNS)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        with _state_lock:
+            _cache[session_id] = (session_data, time.time())
         
         # Generar token para el cliente
         token_payload = {
@@ -118,7 +281,7 @@ class SessionService:
     def validate_session(token: str) -> Optional[Dict[str, Any]]:
         """
         Valida un token y retorna los datos de sesión si es válido.
-        También verifica expiración e inactividad.
+        También verifica expiración e inactividad (las vencidas las elimina el barrido de fondo).
         """
         payload = _verify_token(token)
         if not payload:
@@ -128,25 +291,8 @@ class SessionService:
         if not session_id:
             return None
         
-        sessions = _load_sessions()
-        session = sessions.get(session_id)
-        
-        if not session:
-            return None
-        
-        now = datetime.now()
-        
-        # Verificar expiración máxima
-        expires_at = datetime.fromisoformat(session["expires_at"])
-        if now > expires_at:
-            SessionService.invalidate_session(token)
-            return None
-        
-        # Verificar inactividad
-        last_activity = datetime.fromisoformat(session["last_activity"])
-        inactivity_limit = last_activity + timedelta(minutes=INACTIVITY_TIMEOUT_MINUTES)
-        if now > inactivity_limit:
-            SessionService.invalidate_session(token)
+        session = _get_session(session_id)
+        if not session or _is_expired(session, datetime.now()):
             return None
         
         return {
@@ -160,19 +306,28 @@ class SessionService:
     
     @staticmethod
     def refresh_activity(token: str) -> bool:
-        """Actualiza el timestamp de última actividad."""
+        """
+        Actualiza el timestamp de última actividad.
+        Se persiste en bloque a lo más cada ACTIVITY_FLUSH_SECONDS.
+        """
         payload = _verify_token(token)
         if not payload:
             return False
         
         session_id = payload.get("session_id")
-        sessions = _load_sessions()
-        
-        if session_id not in sessions:
+        session = _get_session(session_id) if session_id else None
+        if not session:
             return False
         
-        sessions[session_id]["last_activity"] = datetime.now().isoformat()
-        _save_sessions(sessions)
+        now = datetime.now()
+        with _state_lock:
+            _pending_activity[session_id] = now.isoformat()
+            cached = _cache.get(session_id)
+            persisted = cached[0]["last_activity"] if cached else session["last_activity"]
+        
+        # Si el valor persistido quedó muy atrás (p.ej. sin hilo de barrido), persistir ya
+        if (now - datetime.fromisoformat(persisted)).total_seconds() >= ACTIVITY_FLUSH_SECONDS * 2:
+            _flush_activity()
         return True
     
     @staticmethod
@@ -186,8 +341,7 @@ class SessionService:
             return None
         
         session_id = payload.get("session_id")
-        sessions = _load_sessions()
-        session = sessions.get(session_id)
+        session = _get_session(session_id) if session_id else None
         
         if not session:
             return None
@@ -209,37 +363,63 @@ class SessionService:
             return False
         
         session_id = payload.get("session_id")
-        sessions = _load_sessions()
-        
-        if session_id in sessions:
-            del sessions[session_id]
-            _save_sessions(sessions)
-            return True
+        with _state_lock:
+            _cache.pop(session_id, None)
+            _pending_activity.pop(session_id, None)
         
-        return False
+        _ensure_schema()
+        conn = _get_connection()
+        try:
+            deleted = conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        return deleted > 0
     
     @staticmethod
     def cleanup_expired_sessions():
         """Limpia sesiones expiradas del almacenamiento."""
-        sessions = _load_sessions()
+        _flush_activity()
         now = datetime.now()
+        inactivity_cutoff = (now - timedelta(minutes=INACTIVITY_TIMEOUT_MINUTES)).isoformat()
         
-        to_delete = []
-        for session_id, session in sessions.items():
-            expires_at = datetime.fromisoformat(session["expires_at"])
-            last_activity = datetime.fromisoformat(session["last_activity"])
-            inactivity_limit = last_activity + timedelta(minutes=INACTIVITY_TIMEOUT_MINUTES)
-            
-            if now > expires_at or now > inactivity_limit:
-                to_delete.append(session_id)
-        
-        for session_id in to_delete:
-            del sessions[session_id]
+        _ensure_schema()
+        conn = _get_connection()
+        try:
+            expired = [r["session_id"] for r in conn.execute(
+                "SELECT session_id FROM sessions WHERE expires_at < ? OR last_activity < ?",
+                (now.isoformat(), inactivity_cutoff)
+            )]
+            conn.executemany("DELETE FROM sessions WHERE session_id = ?", [(sid,) for sid in expired])
+            conn.commit()
+        finally:
+            conn.close()
         
-        if to_delete:
-            _save_sessions(sessions)
+        with _state_lock:
+            for session_id in expired:
+                _cache.pop(session_id, None)
+                _pending_activity.pop(session_id, None)
         
-        return len(to_delete)
+        return len(expired)
+    
+    @staticmethod
+    def start_background_sweep() -> None:
+        """Inicia el hilo que persiste actividad y barre sesiones vencidas."""
+        global _sweep_thread
+        if _sweep_thread and _sweep_thread.is_alive():
+            return
+        _ensure_schema()
+        _sweep_stop.clear()
+        _sweep_thread = threading.Thread(target=_sweep_loop, name="session-sweep", daemon=True)
+        _sweep_thread.start()
+    
+    @staticmethod
+    def stop_background_sweep() -> None:
+        """Detiene el hilo de barrido persistiendo la actividad pendiente."""
+        _sweep_stop.set()
+        if _sweep_thread:
+            _sweep_thread.join(timeout=5)
+        _flush_activity()
     
     @staticmethod
     def get_session_info(token: str) -> Optional[Dict[str, Any]]:
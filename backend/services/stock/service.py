@@ -12,7 +12,7 @@ from shared.odoo_client import OdooClient
 from backend.utils import clean_record
 from backend.cache import get_cache, OdooCache
 
-from .constants import UBICACIONES_ESPECIFICAS, VLK_PATRONES, CACHE_TTL_PRODUCTOS, CACHE_TTL_UBICACIONES
+from .constants import UBICACIONES_ESPECIFICAS, VLK_PATRONES, CACHE_TTL_UBICACIONES
 from .helpers import detect_fruit_type, detect_manejo, is_excluded_category
 
 
@@ -164,22 +164,17 @@ class StockService:
     
     def _get_products_cached(self, product_ids: List[int]) -> Dict[int, Dict]:
         """
-        Obtiene información de productos usando caché.
-        TTL: 30 minutos (productos cambian poco).
+        Obtiene información de productos desde la dimensión de productos compartida
+        (caché por ID, refrescada por write_date).
         """
+        # Import diferido: la dimensión usa stock.helpers y este paquete importa StockService
+        from backend.services.producto_dimension_service import get_productos
+        
         if not product_ids:
             return {}
         
-        cache_key = f"products:{hash(tuple(sorted(product_ids)))}"
-        cached = self._cache.get(cache_key)
-        if cached is not None:
-            return cached
-        
         try:
-            p_data = self.odoo.read("product.product", list(product_ids), ["categ_id", "name", "x_studio_categora_tipo_de_manejo"])
-            products_map = {p["id"]: p for p in p_data}
-            self._cache.set(cache_key, products_map, ttl=CACHE_TTL_PRODUCTOS)
-            return products_map
+            return get_productos(self.odoo, product_ids)
         except Exception as e:
             print(f"Error fetching products: {e}")
             return {}
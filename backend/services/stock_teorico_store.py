@@ -0,0 +1,131 @@
+"""
+Store de agregados del análisis de stock teórico.
+
+El análisis multi-anual bajaba, temporada por temporada y en cada vista, hasta
+100k líneas de factura de compra y de venta para agruparlas por tipo de fruta y
+manejo. Las temporadas cerradas no cambian, así que aquí se guardan los
+agregados ya calculados (lista de {tipo_fruta, manejo, kg, monto} de compras y
+de ventas) por partición de fechas en una tabla SQLite:
+
+- una temporada cerrada es una sola partición y se calcula una vez
+- la temporada en curso se parte por mes: los meses ya cerrados se guardan y
+  solo el tramo abierto se recalcula (con caché de corta duración en memoria)
+
+Un mes (o temporada) se considera cerrado cuando su último día quedó más de
+DIAS_GRACIA atrás, para dar margen a las facturas que se contabilizan tarde.
+VERSION_AGREGADOS invalida lo guardado si cambia la lógica de agrupación.
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+STORE_DB = Path(__file__).parent.parent / "data" / "stock_teorico.db"
+
+DIAS_GRACIA = 45
+VERSION_AGREGADOS = 1
+
+_db_lock = threading.Lock()
+_schema_initialized = False
+
+
+def _get_connection() -> sqlite3.Connection:
+    return sqlite3.connect(STORE_DB, timeout=30)
+
+
+def _ensure_db() -> None:
+    global _schema_initialized
+    if _schema_initialized:
+        return
+    with _db_lock:
+        if _schema_initialized:
+            return
+        STORE_DB.parent.mkdir(parents=True, exist_ok=True)
+        conn = _get_connection()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS agregados_stock_teorico (
+                    fecha_desde TEXT NOT NULL,
+                    fecha_hasta TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    compras TEXT NOT NULL,
+                    ventas TEXT NOT NULL,
+                    calculado TEXT NOT NULL,
+                    PRIMARY KEY (fecha_desde, fecha_hasta, version)
+                )
+                """
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        _schema_initialized = True
+
+
+def es_cerrado(fecha_hasta: str, hoy: Optional[date] = None) -> bool:
+    """True si el rango termina antes del límite de cierre (hoy - DIAS_GRACIA)."""
+    hoy = hoy or date.today()
+    return fecha_hasta < (hoy - timedelta(days=DIAS_GRACIA)).isoformat()
+
+
+def obtener(fecha_desde: str, fecha_hasta: str) -> Optional[Dict[str, List[Dict]]]:
+    """Agregados guardados de la partición ({'compras': [...], 'ventas': [...]}) o None."""
+    _ensure_db()
+    conn = _get_connection()
+    try:
+        fila = conn.execute(
+            "SELECT compras, ventas FROM agregados_stock_teorico "
+            "WHERE fecha_desde = ? AND fecha_hasta = ? AND version = ?",
+            (fecha_desde, fecha_hasta, VERSION_AGREGADOS),
+        ).fetchone()
+    finally:
+        conn.close()
+    if fila is None:
+        return None
+    return {'compras': json.loads(fila[0]), 'ventas': json.loads(fila[1])}
+
+
+def guardar(fecha_desde: str, fecha_hasta: str, compras: List[Dict], ventas: List[Dict]) -> None:
+    """Guarda (o reemplaza) los agregados de una partición cerrada."""
+    _ensure_db()
+    with _db_lock:
+        conn = _get_connection()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO agregados_stock_teorico "
+                "(fecha_desde, fecha_hasta, version, compras, ventas, calculado) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    fecha_desde, fecha_hasta, VERSION_AGREGADOS,
+                    json.dumps(compras, ensure_ascii=False, separators=(",", ":")),
+                    json.dumps(ventas, ensure_ascii=False, separators=(",", ":")),
+                    datetime.now().isoformat(),
+                ),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def invalidar(anio: Optional[int] = None) -> int:
+    """Borra las particiones guardadas (todas o las que tocan la temporada indicada)."""
+    _ensure_db()
+    with _db_lock:
+        conn = _get_connection()
+        try:
+            if anio is None:
+                cur = conn.execute("DELETE FROM agregados_stock_teorico")
+            else:
+                cur = conn.execute(
+                    "DELETE FROM agregados_stock_teorico WHERE fecha_hasta >= ? AND fecha_desde <= ?",
+                    (f"{anio - 1}-11-01", f"{anio}-10-31"),
+                )
+            conn.commit()
+            return cur.rowcount
+        finally:
+            conn.close()
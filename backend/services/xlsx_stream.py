@@ -0,0 +1,289 @@
+"""
+Escritor de .xlsx en streaming para exportaciones grandes.
+
+El Workbook normal de openpyxl mantiene todas las celdas en memoria y después
+hay que recorrerlas de nuevo para dar formato y ancho a cada columna. Aquí las
+filas se serializan a SpreadsheetML a medida que se producen y se comprimen en
+un zip escrito sobre un sumidero no seekable, así el archivo se puede enviar
+al cliente (StreamingResponse) mientras se generan las filas:
+
+- los estilos se definen por columna (un xf por formato numérico), no por celda
+- el ancho de cada columna se estima con una muestra de las primeras filas
+- los textos van como inlineStr, sin tabla de sharedStrings en memoria
+
+Uso:
+    hojas = [Hoja('Detalle', [Columna('Kg', '#,##0.00')], filas_generator)]
+    return StreamingResponse(stream_xlsx(hojas), media_type=XLSX_MEDIA_TYPE)
+"""
+from __future__ import annotations
+
+import re
+import zipfile
+from dataclasses import dataclass
+from datetime import date, datetime
+from itertools import chain, islice
+from typing import Any, Iterable, Iterator, List, Optional, Sequence
+from xml.sax.saxutils import escape
+
+from openpyxl.utils import get_column_letter
+
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Filas que se miran para estimar el ancho de columnas
+MUESTRA_ANCHO = 200
+ANCHO_MAXIMO = 60
+# Bytes comprimidos acumulados antes de entregar un trozo al cliente
+CHUNK_BYTES = 64 * 1024
+# Filas serializadas que se escriben juntas al zip
+FILAS_POR_ESCRITURA = 500
+
+# Caracteres de control que no se permiten en XML 1.0
+_ILEGALES_XML = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_NS = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+_NS_R = 'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+_REL_BASE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+
+@dataclass
+class Columna:
+    titulo: str
+    formato: Optional[str] = None  # number_format de Excel, aplicado a toda la columna
+
+
+@dataclass
+class Hoja:
+    nombre: str
+    columnas: List[Columna]
+    filas: Iterable[Sequence[Any]]
+    autofiltro: bool = True
+    congelar_encabezado: bool = True
+
+
+class _Sumidero:
+    """Destino del zip: acumula bytes hasta que el generador los entrega (sin seek)."""
+
+    def __init__(self):
+        self._partes: List[bytes] = []
+        self._pendientes = 0
+        self._posicion = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._partes.append(data)
+        self._pendientes += len(data)
+        self._posicion += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._posicion
+
+    def flush(self) -> None:
+        pass
+
+    @property
+    def pendientes(self) -> int:
+        return self._pendientes
+
+    def tomar(self) -> bytes:
+        data = b"".join(self._partes)
+        self._partes = []
+        self._pendientes = 0
+        return data
+
+
+def _atributo(texto: str) -> str:
+    return escape(texto, {'"': "&quot;"})
+
+
+def _texto_ancho(valor: Any, formato: Optional[str]) -> int:
+    if valor is None or valor == "":
+        return 0
+    if isinstance(valor, bool):
+        return 5
+    if isinstance(valor, (int, float)):
+        decimales = 2 if formato and ".00" in formato else 0
+        return len(f"{valor:,.{decimales}f}") + (1 if formato and "$" in formato else 0)
+    return len(str(valor))
+
+
+def _estimar_anchos(columnas: List[Columna], muestra: List[Sequence[Any]]) -> List[float]:
+    anchos = []
+    for i, col in enumerate(columnas):
+        largo = len(col.titulo)
+        for fila in muestra:
+            if i < len(fila):
+                largo = max(largo, _texto_ancho(fila[i], col.formato))
+        anchos.append(min(largo + 2, ANCHO_MAXIMO))
+    return anchos
+
+
+def _celda(ref: str, valor: Any, estilo: int) -> str:
+    s = f' s="{estilo}"' if estilo else ""
+    if valor is None or valor == "":
+        return ""
+    if isinstance(valor, bool):
+        return f'<c r="{ref}" t="b"{s}><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float)):
+        if valor != valor or valor in (float("inf"), float("-inf")):
+            return ""
+        return f'<c r="{ref}"{s}><v>{valor!r}</v></c>'
+    if isinstance(valor, (datetime, date)):
+        valor = valor.isoformat()
+    texto = escape(_ILEGALES_XML.sub("", str(valor)))
+    return f'<c r="{ref}" t="inlineStr"{s}><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _fila_xml(num: int, valores: Sequence[Any], letras: List[str], estilos: List[int]) -> str:
+    celdas = "".join(
+        _celda(f"{letras[i]}{num}", v, estilos[i])
+        for i, v in enumerate(valores[:len(letras)])
+    )
+    return f'<row r="{num}">{celdas}</row>'
+
+
+def _styles_xml(formatos: List[str]) -> str:
+    """xf 0 = default, xf 1 = encabezado en negrita, xf 2.. = un formato por columna."""
+    num_fmts = "".join(
+        f'<numFmt numFmtId="{164 + i}" formatCode="{_atributo(fmt)}"/>'
+        for i, fmt in enumerate(formatos)
+    )
+    xfs = "".join(
+        f'<xf numFmtId="{164 + i}" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        for i in range(len(formatos))
+    )
+    return (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<styleSheet {_NS}>'
+        f'<numFmts count="{len(formatos)}">{num_fmts}</numFmts>'
+        '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+        '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        f'<cellXfs count="{2 + len(formatos)}">'
+        '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1" applyAlignment="1">'
+        '<alignment horizontal="center" vertical="center"/></xf>'
+        f'{xfs}</cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    )
+
+
+def _escribir_hoja(zf: zipfile.ZipFile, sumidero: _Sumidero, path: str, hoja: Hoja,
+                   estilos_formato: dict) -> Iterator[bytes]:
+    columnas = hoja.columnas
+    letras = [get_column_letter(i + 1) for i in range(len(columnas))]
+    estilos = [estilos_formato[c.formato] if c.formato else 0 for c in columnas]
+
+    filas = iter(hoja.filas)
+    muestra = list(islice(filas, MUESTRA_ANCHO))
+    anchos = _estimar_anchos(columnas, muestra)
+
+    with zf.open(path, "w") as f:
+        vista = (
+            '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+            '<selection pane="bottomLeft" activeCell="A2" sqref="A2"/>'
+            if hoja.congelar_encabezado else ""
+        )
+        cols = "".join(
+            f'<col min="{i + 1}" max="{i + 1}" width="{ancho}" customWidth="1"'
+            + (f' style="{estilos[i]}"' if estilos[i] else "") + '/>'
+            for i, ancho in enumerate(anchos)
+        )
+        encabezado = "".join(
+            f'<c r="{letras[i]}1" t="inlineStr" s="1"><is><t>{escape(c.titulo)}</t></is></c>'
+            for i, c in enumerate(columnas)
+        )
+        f.write((
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<worksheet {_NS} {_NS_R}>'
+            f'<sheetViews><sheetView workbookViewId="0">{vista}</sheetView></sheetViews>'
+            f'<sheetFormatPr defaultRowHeight="15"/><cols>{cols}</cols>'
+            f'<sheetData><row r="1">{encabezado}</row>'
+        ).encode("utf-8"))
+
+        num = 1
+        lote: List[str] = []
+        for valores in chain(muestra, filas):
+            num += 1
+            lote.append(_fila_xml(num, valores, letras, estilos))
+            if len(lote) >= FILAS_POR_ESCRITURA:
+                f.write("".join(lote).encode("utf-8"))
+                lote = []
+                if sumidero.pendientes >= CHUNK_BYTES:
+                    yield sumidero.tomar()
+        if lote:
+            f.write("".join(lote).encode("utf-8"))
+
+        filtro = f'<autoFilter ref="A1:{letras[-1]}{num}"/>' if hoja.autofiltro and columnas else ""
+        f.write(f'</sheetData>{filtro}</worksheet>'.encode("utf-8"))
+
+    if sumidero.pendientes >= CHUNK_BYTES:
+        yield sumidero.tomar()
+
+
+def stream_xlsx(hojas: Iterable[Hoja]) -> Iterator[bytes]:
+    """
+    Genera el .xlsx en trozos de bytes. Las hojas se escriben en orden y sus
+    filas se consumen de forma perezosa, así una hoja de resumen puede usar
+    acumulados calculados mientras se escribía la hoja anterior.
+    """
+    hojas = list(hojas)
+    formatos: List[str] = []
+    for hoja in hojas:
+        for col in hoja.columnas:
+            if col.formato and col.formato not in formatos:
+                formatos.append(col.formato)
+    estilos_formato = {f: 2 + i for i, f in enumerate(formatos)}
+
+    sumidero = _Sumidero()
+    with zipfile.ZipFile(sumidero, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+        for i, hoja in enumerate(hojas, start=1):
+            yield from _escribir_hoja(zf, sumidero, f"xl/worksheets/sheet{i}.xml", hoja, estilos_formato)
+
+        n = len(hojas)
+        zf.writestr("[Content_Types].xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/styles.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            + "".join(
+                f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+                'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                for i in range(1, n + 1)
+            )
+            + '</Types>'
+        ))
+        zf.writestr("_rels/.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'<Relationship Id="rId1" Type="{_REL_BASE}/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'
+        ))
+        zf.writestr("xl/workbook.xml", (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<workbook {_NS} {_NS_R}><sheets>'
+            + "".join(
+                f'<sheet name="{_atributo(h.nombre[:31])}" sheetId="{i}" r:id="rId{i}"/>'
+                for i, h in enumerate(hojas, start=1)
+            )
+            + '</sheets></workbook>'
+        ))
+        zf.writestr("xl/_rels/workbook.xml.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + "".join(
+                f'<Relationship Id="rId{i}" Type="{_REL_BASE}/worksheet" Target="worksheets/sheet{i}.xml"/>'
+                for i in range(1, n + 1)
+            )
+            + f'<Relationship Id="rId{n + 1}" Type="{_REL_BASE}/styles" Target="styles.xml"/>'
+            '</Relationships>'
+        ))
+        zf.writestr("xl/styles.xml", _styles_xml(formatos))
+
+    yield sumidero.tomar()
@@ -18,6 +18,8 @@ os.environ["ODOO_URL"] = "http://localhost:8069"
 os.environ["ODOO_DB"] = "test_db"
 os.environ["ODOO_API_USER"] = "test@test.com"
 os.environ["ODOO_API_KEY"] = "test_api_key"
+# Sin hilos de fondo en el lifespan (mindicador.cl, snapshots, barrido de sesiones)
+os.environ["BACKGROUND_TASKS"] = "false"
 
 from fastapi.testclient import TestClient
 from httpx import AsyncClient, ASGITransport
@@ -76,6 +78,21 @@ def mock_odoo_service():
 # Configuración
 # ============================================
 
+@pytest.fixture(scope="session", autouse=True)
+def sessions_store_temporal(tmp_path_factory):
+    """Store de sesiones en un directorio temporal (no toca ni migra backend/data)."""
+    from backend.services import session_service
+
+    directorio = tmp_path_factory.mktemp("sessions")
+    originales = (session_service.SESSIONS_DB, session_service.SESSIONS_FILE)
+    session_service.SESSIONS_DB = directorio / "sessions.db"
+    session_service.SESSIONS_FILE = directorio / "sessions.json"
+    session_service._schema_initialized = False
+    yield directorio
+    session_service.SESSIONS_DB, session_service.SESSIONS_FILE = originales
+    session_service._schema_initialized = False
+
+
 @pytest.fixture(autouse=True)
 def reset_app_state():
     """Limpiar estado de la app entre tests."""
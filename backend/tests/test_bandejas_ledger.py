@@ -0,0 +1,113 @@
+"""Tests del ledger de bandejas (Odoo falso en memoria, store en tmp_path)."""
+import operator
+
+import pytest
+
+from backend.services import bandejas_ledger_store as ledger_store
+from backend.services.bandejas_service import BandejasService
+
+
+pytestmark = pytest.mark.unit
+
+OPERADORES = {
+    '=': operator.eq, '>': operator.gt, '>=': operator.ge,
+    'in': lambda a, b: a in b,
+}
+
+
+class OdooFalso:
+    def __init__(self):
+        self.llamadas = []
+        self.datos = {
+            'product.product': [
+                {'id': 1, 'categ_id': 107, 'display_name': 'Bandeja Verde', 'default_code': 'BV', 'write_date': '2024-01-01'},
+            ],
+            'stock.picking': [
+                {'id': 10, 'name': 'RF/IN/1', 'origin': 'OC001', 'partner_id': [5, 'Agrícola Sur'], 'write_date': '2024-01-01'},
+                {'id': 11, 'name': 'RF/OUT/1', 'origin': 'S001', 'partner_id': [5, 'Agrícola Sur'], 'write_date': '2024-01-01'},
+            ],
+            'stock.move': [
+                {'id': 100, 'date': '2024-03-01 10:00:00', 'picking_id': [11, 'RF/OUT/1'], 'picking_type_id': [2, 'Exp'],
+                 'product_id': [1, 'Bandeja Verde'], 'product_uom_qty': 500, 'quantity_done': 500, 'state': 'done',
+                 'write_date': '2024-03-01'},
+                {'id': 101, 'date': '2025-02-01 10:00:00', 'picking_id': [10, 'RF/IN/1'], 'picking_type_id': [1, 'Rec'],
+                 'product_id': [1, 'Bandeja Verde'], 'product_uom_qty': 200, 'quantity_done': 0, 'state': 'done',
+                 'write_date': '2025-02-01'},
+            ],
+        }
+
+    def _filtrar(self, model, domain):
+        filas = []
+        for r in self.datos[model]:
+            ok = True
+            for campo, op, valor in domain:
+                actual = r.get(campo)
+                if isinstance(actual, list):
+                    actual = actual[0]
+                if not OPERADORES[op](actual, valor):
+                    ok = False
+            if ok:
+                filas.append(r)
+        return sorted(filas, key=lambda r: r['id'])
+
+    def search_read(self, model, domain, fields=None, limit=None, order=None):
+        self.llamadas.append(model)
+        return [dict(r) for r in self._filtrar(model, domain)][:limit]
+
+    def search(self, model, domain, limit=None, order=None):
+        return [r['id'] for r in self._filtrar(model, domain)]
+
+    def read(self, model, ids, fields=None):
+        return [dict(r) for r in self.datos[model] if r['id'] in ids]
+
+
+@pytest.fixture
+def servicio(monkeypatch, tmp_path):
+    monkeypatch.setattr(ledger_store._store, "store_dir", tmp_path)
+    ledger_store._store.invalidar()
+    service = BandejasService.__new__(BandejasService)
+    service.odoo = OdooFalso()
+    yield service
+    ledger_store._store.invalidar()
+
+
+def test_historia_completa_y_saldos(servicio):
+    entrada = servicio.get_movimientos_entrada()
+    assert list(entrada['qty_received']) == [200.0]  # hecho sin quantity_done: usa la demanda
+    salida = servicio.get_movimientos_salida(fecha_desde='2024-01-01')
+    assert list(salida['qty_sent']) == [500.0]
+
+    resumen = servicio.get_resumen_por_productor()
+    assert resumen.iloc[0]['en_productor'] == 300.0
+    assert servicio.get_resumen_por_productor(anio=2024).iloc[0]['en_productor'] == 500.0
+
+    saldos = servicio.get_saldos_productor(periodo='anio')
+    assert list(saldos['periodo']) == ['2024', '2025']
+    assert list(saldos['saldo']) == [500.0, 300.0]
+    # El saldo inicial considera los movimientos anteriores al rango
+    assert list(servicio.get_saldos_productor(periodo='anio', fecha_desde='2025-01-01')['saldo']) == [300.0]
+
+
+def test_deltas_por_write_date(servicio, tmp_path):
+    servicio.get_movimientos_entrada()
+    odoo = servicio.odoo
+    odoo.datos['stock.move'][0].update({'state': 'cancel', 'write_date': '2025-06-01'})
+    ledger_store.refrescar(odoo, forzar=True)
+
+    assert servicio.get_movimientos_salida().empty
+    assert ledger_store.get_stats()['movimientos'] == 1
+    assert (tmp_path / "movimientos.parquet").exists()
+
+
+def test_reconciliacion_descarta_movimientos_borrados(servicio):
+    servicio.get_movimientos_entrada()
+    odoo = servicio.odoo
+    odoo.datos['stock.move'] = [m for m in odoo.datos['stock.move'] if m['id'] != 101]
+
+    ledger_store.refrescar(odoo, forzar=True)
+    assert ledger_store.get_stats()['movimientos'] == 2  # unlink no deja write_date
+
+    ledger_store._store.estado['reconciliado'] = 0.0
+    ledger_store.refrescar(odoo, forzar=True)
+    assert servicio.get_movimientos_entrada().empty
+    assert ledger_store.get_stats()['movimientos'] == 1
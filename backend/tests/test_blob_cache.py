@@ -0,0 +1,153 @@
+"""Tests del caché de binarios y de su entrega en el portal (ETag, Range, miniaturas) en tmp_path."""
+import base64
+import io
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from backend.routers import provider_portal as portal_router
+from backend.services import blob_cache_service as blob_cache
+from backend.services.provider_portal_service import ProviderPortalDataService
+
+
+pytestmark = pytest.mark.unit
+
+CONTENIDO = bytes(range(256)) * 4  # 1024 bytes
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(blob_cache, "BLOB_CACHE_DIR", tmp_path / "blob_cache")
+    monkeypatch.setattr(blob_cache, "_schema_initialized", False)
+    return tmp_path / "blob_cache"
+
+
+def _fetcher(llamadas, contenido=CONTENIDO, name="guia.pdf", mimetype="application/pdf"):
+    def fetch():
+        llamadas.append(name)
+        return contenido, {"name": name, "mimetype": mimetype}
+    return fetch
+
+
+def _png(lado=800):
+    Image = pytest.importorskip("PIL.Image")
+    buffer = io.BytesIO()
+    Image.new("RGB", (lado, lado // 2), (200, 30, 30)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def test_get_or_fetch_descarga_una_vez_y_deduplica(cache_dir):
+    llamadas = []
+    ref = blob_cache.get_or_fetch("ir.attachment:abc", _fetcher(llamadas))
+    assert ref.path.read_bytes() == CONTENIDO and ref.size == len(CONTENIDO)
+    assert blob_cache.get_or_fetch("ir.attachment:abc", _fetcher(llamadas)) == ref
+    assert llamadas == ["guia.pdf"]
+
+    # Otra clave con los mismos bytes reutiliza el objeto en disco
+    otro = blob_cache.get_or_fetch("quality.check:1:foto:2026", _fetcher(llamadas, name="otro.pdf"))
+    assert otro.path == ref.path and otro.name == "otro.pdf"
+    assert len(list((cache_dir / "objects").rglob("*"))) == 2  # carpeta ab/ + objeto
+
+    # Si el objeto se borró del disco, se vuelve a descargar
+    ref.path.unlink()
+    blob_cache.get_or_fetch("ir.attachment:abc", _fetcher(llamadas))
+    assert llamadas == ["guia.pdf", "otro.pdf", "guia.pdf"]
+
+
+def test_miniatura_se_genera_una_vez_por_tamano():
+    ref = blob_cache.get_or_fetch("qc:1", _fetcher([], contenido=_png(), name="foto.png", mimetype="image/png"))
+
+    thumb = blob_cache.thumbnail(ref, 300)
+    assert thumb.mimetype == "image/jpeg" and thumb.name == "foto_thumb.jpg"
+    assert thumb.sha256 == f"{ref.sha256}_320" and thumb.size < ref.size
+    mtime = thumb.path.stat().st_mtime_ns
+    assert blob_cache.thumbnail(ref, 320).path.stat().st_mtime_ns == mtime
+
+    # Los binarios que no son imagen se entregan tal cual
+    pdf = blob_cache.get_or_fetch("doc:1", _fetcher([]))
+    assert blob_cache.thumbnail(pdf, 160) == pdf
+
+
+def test_adjuntos_identicos_conservan_nombre_y_mimetype_propios(monkeypatch):
+    adjuntos = {
+        1: {"id": 1, "name": "guia.pdf", "mimetype": "application/pdf", "checksum": "c1"},
+        2: {"id": 2, "name": "respaldo.bin", "mimetype": "application/octet-stream", "checksum": "c1"},
+    }
+    lecturas = []
+
+    class OdooFalso:
+        def read(self, model, ids, fields):
+            if fields == ["datas"]:
+                lecturas.append(ids[0])
+                return [{"datas": base64.b64encode(CONTENIDO).decode()}]
+            return [dict(adjuntos[ids[0]])]
+
+    service = ProviderPortalDataService.__new__(ProviderPortalDataService)
+    service.odoo = OdooFalso()
+    service.demo_mode = False
+    monkeypatch.setattr(service, "_assert_attachment_access", lambda partner_id, attachment: None)
+
+    primero = service.get_attachment_content(10, 1)
+    segundo = service.get_attachment_content(10, 2)
+
+    assert (primero.name, primero.mimetype) == ("guia.pdf", "application/pdf")
+    assert (segundo.name, segundo.mimetype) == ("respaldo.bin", "application/octet-stream")
+    assert segundo.path == primero.path and lecturas == [1]
+
+
+@pytest.mark.parametrize("header,esperado", [
+    (None, None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=1000-", (1000, 1023)),
+    ("bytes=-24", (1000, 1023)),
+    ("bytes=-5000", (0, 1023)),
+    ("bytes=1000-5000", (1000, 1023)),
+    ("bytes=2000-", (None, None)),
+    ("bytes=50-10", (None, None)),
+    ("bytes=0-1,5-9", None),
+    ("items=0-10", None),
+    ("bytes=a-b", None),
+])
+def test_parse_range(header, esperado):
+    assert portal_router._parse_range(header, 1024) == esperado
+
+
+@pytest.fixture
+def cliente():
+    ref = blob_cache.get_or_fetch("ir.attachment:abc", _fetcher([]))
+    foto = blob_cache.get_or_fetch("qc:1", _fetcher([], contenido=_png(), name="foto.png", mimetype="image/png"))
+    app = FastAPI()
+
+    @app.get("/blob/{clave}")
+    def blob(clave: str, request: Request, thumb: int = None):
+        return portal_router._blob_response(request, ref if clave == "pdf" else foto, thumb)
+
+    return TestClient(app), ref
+
+
+def test_blob_response_etag_y_rangos(cliente):
+    client, ref = cliente
+
+    completo = client.get("/blob/pdf")
+    assert completo.status_code == 200 and completo.content == CONTENIDO
+    assert completo.headers["etag"] == ref.etag and completo.headers["accept-ranges"] == "bytes"
+
+    assert client.get("/blob/pdf", headers={"If-None-Match": ref.etag}).status_code == 304
+
+    parcial = client.get("/blob/pdf", headers={"Range": "bytes=10-19"})
+    assert parcial.status_code == 206 and parcial.content == CONTENIDO[10:20]
+    assert parcial.headers["content-range"] == "bytes 10-19/1024"
+
+    assert client.get("/blob/pdf", headers={"Range": "bytes=-4"}).content == CONTENIDO[-4:]
+    assert client.get("/blob/pdf", headers={"Range": "bytes=1020-"}).content == CONTENIDO[1020:]
+
+    fuera = client.get("/blob/pdf", headers={"Range": "bytes=4096-"})
+    assert fuera.status_code == 416 and fuera.headers["content-range"] == "bytes */1024"
+
+
+def test_blob_response_miniatura(cliente):
+    client, _ = cliente
+    respuesta = client.get("/blob/foto", params={"thumb": 160})
+    assert respuesta.status_code == 200 and respuesta.headers["content-type"] == "image/jpeg"
+    assert respuesta.content[:2] == b"\xff\xd8"
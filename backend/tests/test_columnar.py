@@ -0,0 +1,26 @@
+"""Tests del transporte Arrow IPC (ida y vuelta registros -> stream -> DataFrame)."""
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from shared.columnar import from_arrow_ipc, to_arrow_ipc
+
+
+pytestmark = pytest.mark.unit
+
+
+def test_roundtrip_columnas_json_con_nulos():
+    registros = [
+        {"id": 1, "product_id": [10, "[1.1] Arándano"], "tags": {"sala": "Sala 1"}, "kg": 12.5},
+        {"id": 2, "product_id": None, "tags": None, "kg": None},
+        {"id": 3, "product_id": False, "tags": {"sala": None}, "kg": 3.0},
+    ]
+
+    df, extra = from_arrow_ipc(to_arrow_ipc(registros, {"overview": {"total": 3}}))
+
+    assert extra == {"overview": {"total": 3}}
+    # Las columnas JSON vuelven con los mismos valores que en JSON; los nulos como None
+    assert df["product_id"].tolist() == [[10, "[1.1] Arándano"], None, False]
+    assert df["tags"].tolist() == [{"sala": "Sala 1"}, None, {"sala": None}]
+    assert df["id"].tolist() == [1, 2, 3]
+    assert df["kg"].isna().tolist() == [False, True, False]
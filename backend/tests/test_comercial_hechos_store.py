@@ -0,0 +1,173 @@
+"""Tests de deltas y reconciliación del store de hechos comerciales (Odoo falso, store en tmp_path)."""
+import pytest
+
+from backend.services import comercial_hechos_store as hechos_store
+
+
+pytestmark = pytest.mark.unit
+
+RELACIONES = {'move_id': 'account.move', 'product_id': 'product.product', 'order_id': 'sale.order'}
+
+
+def _en(actual, valor):
+    if isinstance(actual, list):
+        return bool(set(actual) & set(valor))
+    return actual in valor
+
+
+OPERADORES = {
+    '=': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    'in': _en,
+    'not in': lambda a, b: not _en(a, b),
+}
+
+
+class OdooFalso:
+    def __init__(self):
+        self.llamadas = []
+        self.datos = {
+            'account.move': [
+                {'id': 1, 'name': 'FAC 001', 'move_type': 'out_invoice', 'payment_state': 'paid',
+                 'invoice_incoterm_id': False, 'sii_pais_destino_id': False, 'write_date': '2025-01-01'},
+                {'id': 2, 'name': 'FAC 002', 'move_type': 'out_invoice', 'payment_state': 'paid',
+                 'invoice_incoterm_id': [1, 'FOB'], 'sii_pais_destino_id': False, 'write_date': '2025-01-01'},
+            ],
+            'account.move.line': [
+                self._linea(10, 1, 100.0),
+                self._linea(11, 2, 50.0),
+            ],
+            'product.product': [{'id': 1, 'product_tag_ids': [18]}],
+            'res.partner': [
+                {'id': 5, 'country_id': [1, 'Chile'], 'x_studio_categora_de_contacto': 'Retail',
+                 'write_date': '2025-01-01'},
+            ],
+            'sale.order': [
+                {'id': 20, 'date_order': '2025-02-01 10:00:00', 'incoterm': False, 'currency_id': [2, 'USD'],
+                 'write_date': '2025-01-01'},
+            ],
+            'sale.order.line': [
+                {'id': 30, 'order_id': [20, 'S001'], 'state': 'sale', 'display_type': False,
+                 'product_id': [1, 'AR Conv'], 'order_partner_id': [5, 'Cliente A'], 'price_subtotal': 900.0,
+                 'product_uom_qty': 90.0, 'qty_invoiced': 0.0, 'write_date': '2025-01-01'},
+            ],
+            'l10n_cl.account.invoice.reference': [],
+        }
+
+    @staticmethod
+    def _linea(line_id, move_id, qty, write_date='2025-01-01'):
+        return {'id': line_id, 'move_id': [move_id, f'FAC 00{move_id}'], 'account_id': [132, 'Ventas'],
+                'parent_state': 'posted', 'display_type': 'product', 'product_id': [1, 'AR Conv'],
+                'partner_id': [5, 'Cliente A'], 'date': '2025-01-10', 'quantity': qty, 'balance': -qty * 10,
+                'credit': qty * 10, 'move_name': f'FAC 00{move_id}', 'name': 'AR Conv', 'write_date': write_date}
+
+    def _valor(self, registro, campo):
+        actual = registro
+        for i, parte in enumerate(campo.split('.')):
+            actual = actual.get(parte)
+            if isinstance(actual, list) and parte in RELACIONES and i < campo.count('.'):
+                actual = next(r for r in self.datos[RELACIONES[parte]] if r['id'] == actual[0])
+            elif isinstance(actual, list) and parte in ('move_id', 'product_id', 'order_id', 'account_id',
+                                                        'partner_id', 'order_partner_id'):
+                actual = actual[0]
+        return actual
+
+    def _filtrar(self, model, domain):
+        return sorted(
+            (r for r in self.datos[model]
+             if all(OPERADORES[op](self._valor(r, campo), valor) for campo, op, valor in domain)),
+            key=lambda r: r['id']
+        )
+
+    def search_read(self, model, domain, fields=None, limit=None, order=None):
+        self.llamadas.append((model, domain))
+        return [dict(r) for r in self._filtrar(model, domain)][:limit]
+
+    def search(self, model, domain, limit=None, order=None):
+        return [r['id'] for r in self._filtrar(model, domain)]
+
+    def read(self, model, ids, fields=None):
+        return [dict(r) for r in self.datos[model] if r['id'] in ids]
+
+    def registro(self, model, registro_id):
+        return next(r for r in self.datos[model] if r['id'] == registro_id)
+
+
+@pytest.fixture
+def odoo(monkeypatch, tmp_path):
+    monkeypatch.setattr(hechos_store._store, "store_dir", tmp_path)
+    hechos_store.invalidar()
+    odoo = OdooFalso()
+    hechos_store.refrescar(odoo)
+    yield odoo
+    hechos_store.invalidar()
+
+
+def test_carga_inicial_y_persistencia(odoo, tmp_path):
+    stats = hechos_store.get_stats()
+    assert (stats['facturas'], stats['movimientos'], stats['pedido_lineas'], stats['pedidos']) == (2, 2, 1, 1)
+    assert (tmp_path / "facturas.parquet").exists()
+
+    # Reinicio: las tablas se recuperan de disco y solo se piden deltas
+    hechos_store._store.estado['cargado'] = False
+    for tabla in hechos_store._tablas.values():
+        tabla.clear()
+    odoo.llamadas.clear()
+    hechos_store.refrescar(odoo)
+
+    assert hechos_store.get_stats()['facturas'] == 2
+    carga_completa = hechos_store.DOMAIN_FACTURAS + [('id', '>', 0)]
+    assert ('account.move.line', carga_completa) not in odoo.llamadas
+
+
+def test_deltas_actualizan_y_descartan_por_elegibilidad(odoo):
+    version = hechos_store._store.version
+    # Línea modificada
+    odoo.registro('account.move.line', 10).update(quantity=120.0, write_date='2025-03-01')
+    # Factura revertida: sus líneas no cambian de write_date pero dejan de ser elegibles
+    odoo.registro('account.move', 2).update(payment_state='reversed', write_date='2025-03-01')
+    # Pedido parcialmente facturado y partner con otro país
+    odoo.registro('sale.order.line', 30).update(qty_invoiced=40.0, write_date='2025-03-01')
+    odoo.registro('res.partner', 5).update(country_id=[2, 'Perú'], write_date='2025-03-01')
+
+    hechos_store.refrescar(odoo, forzar=True)
+
+    tablas = hechos_store._tablas
+    assert tablas['facturas'][10]['quantity'] == 120.0
+    assert 11 not in tablas['facturas']
+    assert tablas['pedido_lineas'][30]['qty_invoiced'] == 40.0
+    assert tablas['partners'][5]['pais'] == 'Perú'
+    assert hechos_store._store.version == version + 1
+    assert hechos_store.get_stats()['marcas']['account.move'] == '2025-03-01'
+
+    # Sin cambios en Odoo: la marca inclusiva relee lo último sin perder datos
+    hechos_store.refrescar(odoo, forzar=True)
+    assert tablas['facturas'][10]['quantity'] == 120.0
+
+
+def test_reconciliacion_descarta_borrados_e_incorpora_faltantes(odoo):
+    # Las marcas avanzan más allá de los registros iniciales
+    for model, registro_id in (('account.move', 2), ('account.move.line', 11), ('sale.order', 20)):
+        odoo.registro(model, registro_id)['write_date'] = '2025-03-01'
+    hechos_store.refrescar(odoo, forzar=True)
+
+    # Borrada en Odoo (unlink no deja write_date) y una nueva con write_date anterior a la marca
+    odoo.datos['account.move.line'] = [r for r in odoo.datos['account.move.line'] if r['id'] != 10]
+    odoo.datos['account.move'].append({'id': 3, 'name': 'FAC 003', 'move_type': 'out_invoice',
+                                       'payment_state': 'paid', 'invoice_incoterm_id': False,
+                                       'sii_pais_destino_id': False, 'write_date': '2024-06-01'})
+    odoo.datos['account.move.line'].append(OdooFalso._linea(12, 3, 10.0, write_date='2024-06-01'))
+    odoo.datos['sale.order.line'].clear()
+
+    hechos_store.refrescar(odoo, forzar=True)
+    assert 10 in hechos_store._tablas['facturas']  # los deltas no ven borrados
+
+    hechos_store._store.estado['reconciliado'] = 0.0
+    hechos_store.refrescar(odoo, forzar=True)
+
+    tablas = hechos_store._tablas
+    assert sorted(tablas['facturas']) == [11, 12]
+    assert 3 in tablas['movimientos']
+    assert tablas['pedido_lineas'] == {}
@@ -0,0 +1,107 @@
+"""Tests del índice de aprobaciones de Compras (Odoo falso, store en tmp_path)."""
+import pytest
+
+from backend.services.compras import aprobaciones
+
+
+pytestmark = pytest.mark.unit
+
+
+class OdooFalso:
+    """Devuelve los mensajes de aprobación ya filtrados, paginando por id."""
+
+    def __init__(self, mensajes):
+        self.mensajes = mensajes
+        self.consultas = []
+
+    def search_read(self, model, domain, fields=None, limit=None, order=None):
+        assert model == 'mail.message' and 'body' not in fields
+        res_ids = next(d[2] for d in domain if isinstance(d, list) and d[0] == 'res_id')
+        last_id = next(d[2] for d in domain if isinstance(d, list) and d[0] == 'id')
+        self.consultas.append(list(res_ids))
+        filas = [m for m in self.mensajes if m['res_id'] in res_ids and m['id'] > last_id]
+        return sorted(filas, key=lambda m: m['id'])[:limit]
+
+
+@pytest.fixture(autouse=True)
+def store(monkeypatch, tmp_path):
+    monkeypatch.setattr(aprobaciones, "STORE_DB", tmp_path / "compras_aprobaciones.db")
+    monkeypatch.setattr(aprobaciones, "_schema_initialized", False)
+    monkeypatch.setattr(aprobaciones, "TAMANO_PAGINA", 2)
+
+
+def test_pagina_completo_y_reutiliza_por_firma():
+    mensajes = [{'id': i, 'res_id': 1, 'author_id': [i, f'Usuario {i}']} for i in range(1, 6)]
+    odoo = OdooFalso(mensajes)
+    pos = [{'id': 1, 'write_date': '2026-01-01 10:00:00', 'message_ids': [1, 2, 3, 4, 5]},
+           {'id': 2, 'write_date': '2026-01-01 10:00:00', 'message_ids': []}]
+
+    aprobados = aprobaciones.get_aprobadores(odoo, pos)
+    # Con páginas de 2 igual se leen los 5 mensajes
+    assert len(aprobados[1]) == 5 and aprobados[2] == set()
+
+    odoo.consultas.clear()
+    assert aprobaciones.get_aprobadores(odoo, pos) == aprobados
+    assert odoo.consultas == []
+
+    # Un mensaje nuevo cambia la firma: solo se relee esa PO
+    odoo.mensajes.append({'id': 9, 'res_id': 2, 'author_id': [9, 'Gerente']})
+    pos[1]['message_ids'] = [9]
+    assert aprobaciones.get_aprobadores(odoo, pos)[2] == {'Gerente'}
+    assert odoo.consultas == [[2]]
+
+
+class OdooConTracking:
+    """Evalúa el dominio de mail.message (notación prefija) sobre mensajes con body y tracking."""
+
+    def __init__(self, mensajes):
+        self.mensajes = mensajes
+
+    @staticmethod
+    def _hoja(m, campo, op, valor):
+        if campo.startswith('tracking_value_ids.'):
+            subcampo = campo.split('.', 1)[1]
+            if op == 'not ilike':
+                return not any(valor in (t.get(subcampo) or '').lower() for t in m['tracking'])
+            return any(OdooConTracking._hoja(t, subcampo, op, valor) for t in m['tracking'])
+        actual = m.get(campo)
+        if op == 'ilike':
+            return valor in (actual or '').lower()
+        if op == 'in':
+            return actual in valor
+        return actual == valor if op == '=' else actual > valor
+
+    def _evaluar(self, m, domain):
+        def paso(i):
+            termino = domain[i]
+            if termino in ('|', '&'):
+                a, i = paso(i + 1)
+                b, i = paso(i)
+                return (a or b) if termino == '|' else (a and b), i
+            return self._hoja(m, *termino), i + 1
+        resultado, i = True, 0
+        while i < len(domain):
+            valor, i = paso(i)
+            resultado = resultado and valor
+        return resultado
+
+    def search_read(self, model, domain, fields=None, limit=None, order=None):
+        return [{k: m[k] for k in fields} for m in self.mensajes if self._evaluar(m, domain)][:limit]
+
+
+def _estado(id_, autor, anterior, nuevo, body=''):
+    return {'id': id_, 'model': 'purchase.order', 'res_id': 1, 'author_id': [id_, autor], 'body': body,
+            'tracking': [{'field.name': 'state', 'old_value_char': anterior, 'new_value_char': nuevo}]}
+
+
+def test_solicitar_aprobacion_no_cuenta_como_aprobacion():
+    odoo = OdooConTracking([
+        _estado(1, 'Comprador', 'Petición de presupuesto', 'Para aprobar'),
+        _estado(2, 'Gerente', 'Para aprobar', 'Orden de compra'),
+        _estado(3, 'Jefe', 'Para aprobar', 'Cancelado'),
+        {'id': 4, 'model': 'purchase.order', 'res_id': 1, 'author_id': [4, 'Finanzas'],
+         'body': '<p>Aprobado por presupuesto</p>', 'tracking': []},
+    ])
+    pos = [{'id': 1, 'write_date': '2026-01-01 10:00:00', 'message_ids': [1, 2, 3, 4]}]
+
+    assert aprobaciones.get_aprobadores(odoo, pos)[1] == {'Gerente', 'Finanzas'}
@@ -0,0 +1,168 @@
+"""Tests de deltas y reconciliación del read model de avance de containers (Odoo falso en memoria)."""
+import pytest
+
+from backend.services.containers import progress_store
+
+
+pytestmark = pytest.mark.unit
+
+
+def _en(actual, valor):
+    return actual in valor
+
+
+OPERADORES = {
+    '=': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    'in': _en,
+}
+
+
+def _produccion(prod_id, sale_name, qty, write_date='2025-01-01', state='progress'):
+    return {'id': prod_id, 'name': f'MO/{prod_id}', 'product_id': [1, 'AR IQF'], 'product_qty': 1000,
+            'qty_produced': qty, 'state': state, 'date_planned_start': '2025-01-10 08:00:00',
+            'x_studio_po_asociada': sale_name, 'user_id': [2, 'Ana'], 'write_date': write_date}
+
+
+class OdooFalso:
+    def __init__(self):
+        self.datos = {
+            'mrp.production': [
+                _produccion(1, 'S001', 100.0),
+                _produccion(2, 'S001', 50.0),
+                _produccion(3, 'S002', 0.0),
+            ],
+            'sale.order': [
+                {'id': 10, 'name': 'S001', 'partner_id': [5, 'Cliente A'], 'state': 'sale',
+                 'order_line': [100, 101], 'write_date': '2025-01-01'},
+                {'id': 11, 'name': 'S002', 'partner_id': [6, 'Cliente B'], 'state': 'sale',
+                 'order_line': [110], 'write_date': '2025-01-01'},
+                {'id': 12, 'name': 'S003', 'partner_id': [6, 'Cliente B'], 'state': 'draft',
+                 'order_line': [120], 'write_date': '2025-01-01'},
+            ],
+            'sale.order.line': [
+                {'id': 100, 'order_id': [10, 'S001'], 'name': 'AR IQF', 'qty_delivered': 0.0, 'write_date': '2025-01-01'},
+                {'id': 101, 'order_id': [10, 'S001'], 'name': 'FB IQF', 'qty_delivered': 0.0, 'write_date': '2025-01-01'},
+                {'id': 110, 'order_id': [11, 'S002'], 'name': 'AR Block', 'qty_delivered': 0.0, 'write_date': '2025-01-01'},
+                {'id': 120, 'order_id': [12, 'S003'], 'name': 'MO Block', 'qty_delivered': 0.0, 'write_date': '2025-01-01'},
+            ],
+        }
+        self.llamadas = []
+
+    def _filtrar(self, model, domain):
+        filas = []
+        for r in self.datos[model]:
+            ok = True
+            for campo, op, valor in domain:
+                actual = r.get(campo)
+                if isinstance(actual, list):
+                    actual = actual[0]
+                if not OPERADORES[op](actual, valor):
+                    ok = False
+            if ok:
+                filas.append(r)
+        return sorted(filas, key=lambda r: r['id'])
+
+    def search_read(self, model, domain, fields=None, limit=None, order=None):
+        self.llamadas.append(model)
+        return [dict(r) for r in self._filtrar(model, domain)][:limit]
+
+    def search(self, model, domain, limit=None, order=None):
+        return [r['id'] for r in self._filtrar(model, domain)]
+
+    def registro(self, model, registro_id):
+        return next(r for r in self.datos[model] if r['id'] == registro_id)
+
+
+@pytest.fixture
+def odoo(monkeypatch):
+    monkeypatch.setitem(progress_store._campos, "prod_fields", None)
+    monkeypatch.setitem(progress_store._campos, "sale_fields", None)
+    progress_store.invalidar()
+    odoo = OdooFalso()
+    progress_store.refrescar(odoo)
+    yield odoo
+    progress_store.invalidar()
+
+
+def _mos(sale_name):
+    return {p['name']: p for p in progress_store.producciones_por_venta().get(sale_name, [])}
+
+
+def test_carga_inicial_agrupa_por_pedido(odoo):
+    assert set(_mos('S001')) == {'MO/1', 'MO/2'}
+    assert progress_store.get_venta_por_nombre('S002')['id'] == 11
+    assert [l['id'] for l in progress_store.get_lineas(10)] == [100, 101]
+    # S003 no tiene fabricaciones: no se carga hasta que se pida
+    assert progress_store.get_venta(12) is None
+
+
+def test_deltas_reflejan_fabricaciones_y_pedidos_modificados(odoo):
+    # Fabricación actualizada, otra cancelada y otra que pierde la PO asociada
+    odoo.registro('mrp.production', 1).update(qty_produced=400.0, write_date='2025-02-01')
+    odoo.registro('mrp.production', 2).update(state='cancel', write_date='2025-02-01')
+    odoo.registro('mrp.production', 3).update(x_studio_po_asociada=False, write_date='2025-02-01')
+    # Pedido cancelado que además pierde una línea, y línea de otro pedido despachada
+    odoo.registro('sale.order', 10).update(state='cancel', order_line=[100], write_date='2025-02-01')
+    odoo.datos['sale.order.line'] = [l for l in odoo.datos['sale.order.line'] if l['id'] != 101]
+    odoo.registro('sale.order.line', 110).update(qty_delivered=30.0, write_date='2025-02-01')
+
+    progress_store.refrescar(odoo, forzar=True)
+
+    mos = _mos('S001')
+    assert mos['MO/1']['kg_producidos'] == 400.0
+    assert mos['MO/2']['state'] == 'cancel'
+    assert _mos('S002') == {}
+    assert progress_store.get_venta(10)['state'] == 'cancel'
+    assert [l['id'] for l in progress_store.get_lineas(10)] == [100]
+    assert progress_store.get_lineas(11)[0]['qty_delivered'] == 30.0
+    assert progress_store.get_stats()['marcas']['mrp.production'] == '2025-02-01'
+
+
+def test_deltas_incorporan_pedido_nuevo_de_una_fabricacion(odoo):
+    odoo.datos['mrp.production'].append(_produccion(4, 'S003', 10.0, write_date='2025-02-01'))
+
+    progress_store.refrescar(odoo, forzar=True)
+
+    assert set(_mos('S003')) == {'MO/4'}
+    assert progress_store.get_venta_por_nombre('S003')['id'] == 12
+    assert [l['id'] for l in progress_store.get_lineas(12)] == [120]
+
+
+def test_reconciliacion_descarta_borrados(odoo):
+    odoo.registro('mrp.production', 1)['write_date'] = '2025-02-01'
+    odoo.registro('sale.order', 10)['write_date'] = '2025-02-01'
+    progress_store.refrescar(odoo, forzar=True)
+
+    # unlink no deja write_date: los deltas no lo ven
+    odoo.datos['mrp.production'] = [p for p in odoo.datos['mrp.production'] if p['id'] != 2]
+    odoo.datos['sale.order'] = [s for s in odoo.datos['sale.order'] if s['id'] != 11]
+    # Fabricación con PO asignada sin que su write_date supere la marca
+    odoo.datos['mrp.production'].append(_produccion(5, 'S003', 0.0, write_date='2024-12-01'))
+    progress_store.refrescar(odoo, forzar=True)
+    assert 'MO/2' in _mos('S001')
+
+    progress_store._store.estado['reconciliado'] = 0.0
+    progress_store.refrescar(odoo, forzar=True)
+
+    assert set(_mos('S001')) == {'MO/1'}
+    assert progress_store.get_venta(11) is None
+    assert progress_store.get_venta_por_nombre('S002') is None
+    assert progress_store.get_lineas(11) == []
+    assert set(_mos('S003')) == {'MO/5'}
+    assert progress_store.get_venta(12)['name'] == 'S003'
+
+
+def test_asegurar_ventas_solo_lee_las_faltantes(odoo):
+    odoo.llamadas.clear()
+    progress_store.asegurar_ventas(odoo, [10, 12])
+
+    assert progress_store.get_venta(12)['state'] == 'draft'
+    assert [l['id'] for l in progress_store.get_lineas(12)] == [120]
+    assert odoo.llamadas == ['sale.order', 'sale.order.line']
+
+    odoo.llamadas.clear()
+    progress_store.asegurar_ventas(odoo, [10, 12])
+    assert odoo.llamadas == []
@@ -0,0 +1,82 @@
+"""Tests de la tabla local de tipos de cambio (sin llamadas HTTP)."""
+import json
+import os
+from datetime import date
+
+import pytest
+
+from backend.services.currency_service import CurrencyService, parse_serie
+
+
+pytestmark = pytest.mark.unit
+
+# Series con el formato de mindicador.cl (/api/<indicador>/<año>)
+SERIES_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "mindicador_series.json")
+
+
+class FileRateSource:
+    """Reemplazo de MindicadorSource que lee las series desde un archivo."""
+
+    def __init__(self, path: str):
+        with open(path, encoding="utf-8") as f:
+            self.data = json.load(f)
+        self.llamadas = []
+
+    def __call__(self, indicador: str, anio: int):
+        self.llamadas.append((indicador, anio))
+        return parse_serie(self.data.get(indicador, {}).get(str(anio), []))
+
+
+@pytest.fixture
+def currency(tmp_path, monkeypatch):
+    source = FileRateSource(SERIES_PATH)
+    monkeypatch.setattr(CurrencyService, "DB_PATH", tmp_path / "currency_rates.db")
+    monkeypatch.setattr(CurrencyService, "_source", source)
+    # Sin hilo de fondo: las pruebas descargan explícitamente con prefetch()
+    monkeypatch.setattr(CurrencyService, "_request_prefetch", classmethod(lambda cls: None))
+    CurrencyService.clear_cache()
+    yield source
+    CurrencyService.clear_cache()
+
+
+def test_sin_datos_usa_fallback_sin_descargar(currency):
+    assert CurrencyService.get_usd_to_clp_rate("2025-03-14") == CurrencyService.FALLBACK_RATE
+    assert CurrencyService.get_uf_to_clp_rate() == CurrencyService.FALLBACK_UF_RATE
+    assert currency.llamadas == []
+
+
+def test_lookup_por_fecha_usa_ultimo_valor_publicado(currency):
+    CurrencyService.prefetch(years=[2025])
+
+    assert CurrencyService.get_rate("USD", "2025-03-14") == 931.42
+    assert CurrencyService.get_rate("USD", date(2025, 3, 13)) == 935.1
+    # Fin de semana / feriado: último dato anterior
+    assert CurrencyService.get_rate("USD", "2025-03-11 15:30:00") == 944.8
+    assert CurrencyService.get_rate("USD", "2025-03-16") == 931.42
+    assert CurrencyService.get_rate("CLF", "2025-03-12") == 38700.66
+    assert CurrencyService.get_rate("EUR", "2025-03-13") == 1025.41
+    assert CurrencyService.get_rate("CLP", "2025-03-13") == 1.0
+
+
+def test_tabla_persistida_se_recarga_sin_descargar(currency):
+    CurrencyService.prefetch(years=[2025])
+    llamadas = len(currency.llamadas)
+    CurrencyService.clear_cache()
+
+    assert CurrencyService.get_rate("UF", "2025-03-14") == 38713.74
+    assert len(currency.llamadas) == llamadas
+
+
+def test_conversion_vectorizada_por_fecha_de_documento(currency):
+    CurrencyService.prefetch(years=[2025])
+
+    montos = CurrencyService.convert_to_clp(
+        [100, 10, 1, 500],
+        ["USD", "UF", "EUR", "CLP"],
+        ["2025-03-14", "2025-03-10", "2025-03-13", "2025-03-14"],
+    )
+    assert montos.tolist() == pytest.approx([93142.0, 386875.8, 1025.41, 500.0])
+
+    solo_usd = CurrencyService.convert_to_clp([1, 2], "USD", ["2025-01-02", "2025-03-12"])
+    assert solo_usd.tolist() == pytest.approx([996.46, 1880.5])
+    assert CurrencyService.convert_usd_to_clp(2, "2025-03-12") == pytest.approx(1880.5)
@@ -0,0 +1,86 @@
+"""Tests de equivalencia (golden) del motor batch del dashboard de rendimiento."""
+import json
+import os
+
+import pytest
+
+from backend.cache import OdooCache
+from backend.services.rendimiento.dashboard import calcular_dashboard
+from backend.services.rendimiento_service import RendimientoService
+
+
+pytestmark = pytest.mark.unit
+
+# Entradas (MOs + batches de consumos/producción/costos) y salida esperada
+# generada con el loop por MO original de get_dashboard_completo()
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "dashboard_completo_golden.json")
+
+
+@pytest.fixture(scope="module")
+def golden() -> dict:
+    with open(GOLDEN_PATH, encoding="utf-8") as f:
+        data = json.load(f)
+    for clave in ("consumos", "produccion", "costos"):
+        data[clave] = {int(k): v for k, v in data[clave].items()}
+    return data
+
+
+def _assert_igual(actual, esperado, ruta="resultado"):
+    """Compara estructuras recursivamente (orden de claves y listas incluido)."""
+    if isinstance(esperado, dict):
+        assert list(actual) == list(esperado), ruta
+        for k in esperado:
+            _assert_igual(actual[k], esperado[k], f"{ruta}.{k}")
+    elif isinstance(esperado, list):
+        assert len(actual) == len(esperado), ruta
+        for i, (a, e) in enumerate(zip(actual, esperado)):
+            _assert_igual(a, e, f"{ruta}[{i}]")
+    elif isinstance(esperado, float):
+        assert actual == pytest.approx(esperado, abs=1e-9), ruta
+    else:
+        assert actual == esperado, ruta
+
+
+class TestDashboardGolden:
+    """El motor batch reproduce exactamente la salida del loop por MO."""
+
+    def test_calcular_dashboard_igual_a_golden(self, golden):
+        resultado = calcular_dashboard(golden["mos"], golden["consumos"], golden["produccion"], golden["costos"])
+        _assert_igual(json.loads(json.dumps(resultado)), golden["esperado"])
+
+    def test_get_dashboard_completo_usa_motor_batch(self, golden):
+        service = RendimientoService.__new__(RendimientoService)
+        service._cache = OdooCache()
+        service.get_mos_por_periodo = lambda *args, **kwargs: golden["mos"]
+        service.get_consumos_batch = lambda mos: golden["consumos"]
+        service.get_produccion_batch = lambda mos: golden["produccion"]
+        service.get_costos_operacionales_batch = lambda mos: golden["costos"]
+
+        resultado = service.get_dashboard_completo("2025-01-01", "2025-01-31")
+        _assert_igual(json.loads(json.dumps(resultado)), golden["esperado"])
+
+    def test_mos_sin_consumo_no_cuentan(self):
+        mo = {"id": 1, "name": "RF/MO/00001", "product_id": [9, "[1.1] PROCESO"]}
+        resultado = calcular_dashboard([mo], {1: []}, {1: []}, {})
+
+        assert resultado["overview"]["mos_procesadas"] == 1
+        assert resultado["overview"]["total_kg_mp"] == 0
+        assert resultado["mos"] == []
+        assert resultado["salas"] == []
+
+
+def test_merma_por_diferencia_sin_produccion_merma():
+    """Sin filas de merma por categoría, el fallback MP - PT asigna kg decimales."""
+    mo = {"id": 1, "name": "RF/MO/00001", "product_id": [904, "[3] Proceso de Vaciado"], "state": "done",
+          "x_studio_sala_de_proceso": "", "x_studio_inicio_de_proceso": "2025-01-20 08:00:00",
+          "x_studio_termino_de_proceso": "2025-01-20 10:00:00"}
+    consumos = {1: [{"product_id": 16, "product_name": "CZ Cereza Conv.", "lot_id": 98, "lot_name": "L98",
+                     "qty_done": 100.5, "especie": "Cereza", "manejo": "Convencional"}]}
+    produccion = {1: [{"product_id": 22, "product_name": "[401274001] Block Cereza", "lot_id": None,
+                       "lot_name": None, "qty_done": 90.0, "especie": "Cereza", "manejo": "Convencional",
+                       "categ_name": "", "is_merma": False, "is_proceso": False}]}
+
+    resultado = calcular_dashboard([mo], consumos, produccion, {})
+
+    assert resultado["mos"][0]["kg_merma"] == pytest.approx(10.5)
+    assert resultado["mos"][0]["kg_pt"] == pytest.approx(90.0)
@@ -0,0 +1,82 @@
+"""Tests de la compilación de fuentes Excel a Parquet (compilador falso, directorio en tmp_path)."""
+import os
+from datetime import date, datetime
+
+import pandas as pd
+import pytest
+
+from backend.services import excel_compilado
+
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def fuente(monkeypatch, tmp_path):
+    monkeypatch.setattr(excel_compilado, "COMPILADOS_DIR", tmp_path / "compilado")
+    monkeypatch.setattr(excel_compilado, "_memoria", {})
+    path = tmp_path / "plan.xlsx"
+    path.write_text("v1", encoding="utf-8")
+    llamadas = []
+
+    def compilador(p):
+        llamadas.append(p.read_text(encoding="utf-8"))
+        return {"base": pd.DataFrame({"version": [llamadas[-1]], "kg": [100.0]})}
+
+    return path, compilador, llamadas
+
+
+def test_recompila_solo_si_cambia_el_archivo(fuente):
+    path, compilador, llamadas = fuente
+
+    assert excel_compilado.compilar("plan", path, compilador)["base"]["version"].tolist() == ["v1"]
+    excel_compilado.compilar("plan", path, compilador)
+    assert llamadas == ["v1"]
+
+    # Reinicio: se lee el Parquet sin abrir el Excel
+    excel_compilado._memoria.clear()
+    assert excel_compilado.compilar("plan", path, compilador)["base"]["kg"].tolist() == [100.0]
+    assert llamadas == ["v1"]
+
+    # Mismo tamaño, otro mtime
+    path.write_text("v2", encoding="utf-8")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert excel_compilado.compilar("plan", path, compilador)["base"]["version"].tolist() == ["v2"]
+    assert llamadas == ["v1", "v2"]
+    # Solo queda la versión vigente en disco
+    assert len(list((excel_compilado.COMPILADOS_DIR / "plan").iterdir())) == 1
+
+
+def test_recompila_si_cambia_la_version_del_compilador(fuente):
+    path, compilador, llamadas = fuente
+
+    excel_compilado.compilar("plan", path, compilador, version=1)
+    excel_compilado.compilar("plan", path, compilador, version=2)
+    excel_compilado.compilar("plan", path, compilador, version=2)
+
+    assert llamadas == ["v1", "v1"]
+
+
+def test_tipar_convierte_antes_de_caer_a_texto(tmp_path):
+    df = pd.DataFrame({
+        "kg": [1, 2.5, None, "3"],
+        "fecha": [datetime(2025, 1, 1), "2025-02-01", None, date(2025, 3, 1)],
+        "codigo": [1, "A1", None, "002"],
+        "cuenta": [41010101, "41010102", None, 41010103],
+        5: ["x", "y", None, "z"],
+    })
+
+    tipado = excel_compilado._tipar(df)
+
+    assert tipado["kg"].tolist()[:2] == [1.0, 2.5] and tipado["kg"].tolist()[3] == 3.0
+    assert pd.api.types.is_numeric_dtype(tipado["kg"])
+    assert pd.api.types.is_datetime64_any_dtype(tipado["fecha"])
+    assert tipado["fecha"][1] == pd.Timestamp("2025-02-01")
+    assert tipado["codigo"].tolist()[:2] == ["1", "A1"] and tipado["codigo"][3] == "002"
+    assert pd.isna(tipado["codigo"][2])
+    assert tipado["cuenta"].astype(str).tolist()[:2] == ["41010101", "41010102"]
+    assert list(tipado.columns) == ["kg", "fecha", "codigo", "cuenta", "5"]
+
+    # Las columnas tipadas se pueden guardar como Parquet
+    tipado.to_parquet(tmp_path / "tipado.parquet", index=False)
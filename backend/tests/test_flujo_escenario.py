@@ -0,0 +1,179 @@
+"""Tests del what-if de distribución de OCs sobre un escenario de Flujo de Caja."""
+import copy
+
+import pytest
+
+from backend.routers import flujo_caja as flujo_router
+from backend.services import distribuciones_oc_service
+from backend.services.flujo_caja.real_proyectado import RealProyectadoCalculator
+
+
+pytestmark = pytest.mark.unit
+
+URL = "/api/v1/flujo-caja/what-if"
+MESES = ["2026-01", "2026-02", "2026-03"]
+
+OC = {
+    "id": 7, "name": "OC00007", "partner_id": [3, "Proveedor SA"], "monto_pendiente": 1000.0,
+    "categoria": "Insumos", "proveedor": "Proveedor SA",
+    "x_studio_fecha_de": "2026-02-10", "date_planned": "2026-01-05 10:00:00",
+}
+
+
+def _base(proyeccion_oc: dict) -> dict:
+    """Flujo mensualizado mínimo: 1.2.1 con facturas pagadas + la OC proyectada (si la hay)."""
+    pagadas = {"2026-01": -5000.0}
+    montos = {m: pagadas.get(m, 0) + proyeccion_oc.get(m, 0) for m in MESES}
+    proveedor = {"nombre": "Proveedor SA", "monto": sum(proyeccion_oc.values()),
+                 "montos_por_mes": dict(proyeccion_oc), "tipo": "proveedor", "nivel": 5}
+    categoria = {"nombre": "📁 Insumos", "monto": proveedor["monto"], "montos_por_mes": dict(proyeccion_oc),
+                 "tipo": "categoria", "nivel": 4, "sub_etiquetas": [proveedor]}
+    ifrs3 = {"nombre": "Sin IFRS 3", "monto": proveedor["monto"], "montos_por_mes": dict(proyeccion_oc),
+             "tipo": "ifrs3", "nivel": 3, "sub_etiquetas": [categoria]}
+    efectivo, acumulado = {}, 10000.0
+    for m in MESES:
+        efectivo[m] = {"inicial": acumulado, "variacion": montos[m], "final": acumulado + montos[m]}
+        acumulado += montos[m]
+    return {
+        "periodo": {"inicio": "2026-01-01", "fin": "2026-03-31"},
+        "meses": list(MESES),
+        "actividades": {
+            "OPERACION": {
+                "subtotal_por_mes": dict(montos), "subtotal": sum(montos.values()),
+                "conceptos": [{
+                    "id": "1.2.1", "montos_por_mes": dict(montos), "total": sum(montos.values()),
+                    "cuentas": [
+                        {"codigo": "pagadas", "monto": -5000.0, "montos_por_mes": dict(pagadas), "etiquetas": []},
+                        {"codigo": "proyectadas_compras", "monto": proveedor["monto"],
+                         "montos_por_mes": dict(proyeccion_oc), "etiquetas": [ifrs3] if proyeccion_oc else []},
+                    ],
+                }],
+            },
+            "INVERSION": {"subtotal_por_mes": {}, "subtotal": 0, "conceptos": []},
+            "FINANCIAMIENTO": {"subtotal_por_mes": {}, "subtotal": 0, "conceptos": []},
+        },
+        "efectivo_por_mes": efectivo,
+        "conciliacion": {"efectivo_inicial": 10000.0, "efectivo_final": acumulado},
+    }
+
+
+class _ServicioFake:
+    base = None
+    llamadas = []
+
+    def __init__(self, username=None, password=None):
+        self.real_proyectado_calc = RealProyectadoCalculator(odoo_client=None)
+        self.real_proyectado_calc.leer_oc = lambda oc_id: copy.deepcopy(OC) if oc_id == OC["id"] else None
+
+    def get_flujo_mensualizado(self, **kwargs):
+        _ServicioFake.llamadas.append(kwargs)
+        return copy.deepcopy(_ServicioFake.base)
+
+
+@pytest.fixture
+def escenario(client, monkeypatch):
+    """Inicia un escenario con la base y la distribución guardada dadas."""
+    monkeypatch.setattr(flujo_router, "FlujoCajaService", _ServicioFake)
+    _ServicioFake.llamadas = []
+
+    def iniciar(base: dict, guardada):
+        _ServicioFake.base = base
+        monkeypatch.setattr(
+            distribuciones_oc_service, "obtener_distribucion",
+            lambda oc_id: {"oc_id": oc_id, "distribuciones": guardada} if guardada is not None else None
+        )
+        resp = client.post(f"{URL}/iniciar", params={
+            "fecha_inicio": "2026-01-01", "fecha_fin": "2026-03-31", "username": "u", "password": "p",
+            "incluir_proyecciones": True
+        })
+        assert resp.status_code == 200, resp.text
+        return resp.json()["escenario_id"]
+
+    return iniciar
+
+
+def _distribuir(client, escenario_id: str, cuotas) -> dict:
+    resp = client.post(f"{URL}/{escenario_id}/distribucion", params={"username": "u", "password": "p"}, json={
+        "oc_id": OC["id"], "oc_name": OC["name"], "proveedor": OC["proveedor"], "monto_total": 1000,
+        "distribuciones": [{"fecha": f, "monto": m} for f, m in cuotas],
+    })
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+
+def _escenario(escenario_id: str):
+    return flujo_router.obtener_escenario(escenario_id)
+
+
+def _concepto(escenario_id: str) -> dict:
+    return _escenario(escenario_id).resultado["actividades"]["OPERACION"]["conceptos"][0]
+
+
+def _nodo(concepto: dict, *ruta: str) -> dict:
+    nodos = next(c for c in concepto["cuentas"] if c["codigo"] == "proyectadas_compras")["etiquetas"]
+    for nombre in ruta:
+        nodo = next(n for n in nodos if n["nombre"] == nombre)
+        nodos = nodo.get("sub_etiquetas", [])
+    return nodo
+
+
+def test_reaplicar_distribucion_no_duplica_la_oc(client, escenario):
+    guardada = [{"fecha": "2026-02-10", "monto": 600}, {"fecha": "2026-03-10", "monto": 400}]
+    escenario_id = escenario(_base({"2026-02": -600.0, "2026-03": -400.0}), guardada)
+    assert _escenario(escenario_id).incluir_proyecciones is True
+
+    data = _distribuir(client, escenario_id, [("2026-01-20", 1000)])
+    assert data["proyeccion"] == [{"fecha": "2026-01-20", "monto": 1000.0}]
+    # Segunda edición: lo previo es la simulación, no la distribución guardada
+    _distribuir(client, escenario_id, [("2026-01-20", 1000)])
+
+    concepto = _concepto(escenario_id)
+    assert concepto["montos_por_mes"] == {"2026-01": -6000, "2026-02": 0, "2026-03": 0}
+    assert _escenario(escenario_id).resultado["conciliacion"]["efectivo_final"] == 4000
+
+    # Los niveles anidados quedan consistentes con el estado
+    esperado = {"2026-01": -1000, "2026-02": 0, "2026-03": 0}
+    assert _nodo(concepto, "Sin IFRS 3")["montos_por_mes"] == esperado
+    assert _nodo(concepto, "Sin IFRS 3", "📁 Insumos")["montos_por_mes"] == esperado
+    assert _nodo(concepto, "Sin IFRS 3", "📁 Insumos", "Proveedor SA")["montos_por_mes"] == esperado
+    assert _nodo(concepto, "Sin IFRS 3", "📁 Insumos", "Proveedor SA")["monto"] == -1000
+
+
+def test_distribucion_desajustada_no_estaba_en_la_base(client, escenario):
+    # Guardada suma 500 y el pendiente es 1000 (> 1%): la base no proyectó la OC
+    escenario_id = escenario(_base({}), [{"fecha": "2026-01-15", "monto": 500}])
+
+    data = _distribuir(client, escenario_id, [("2026-02-15", 1000)])
+    assert _concepto(escenario_id)["montos_por_mes"] == {"2026-01": -5000.0, "2026-02": -1000, "2026-03": 0}
+    proveedor = _nodo(_concepto(escenario_id), "Sin IFRS 3", "📁 Insumos", "Proveedor SA")
+    assert proveedor["nivel"] == 5
+    assert proveedor["montos_por_mes"] == {"2026-02": -1000}
+    assert {c["tipo"] for c in data["celdas"]} >= {"concepto", "cuenta", "etiqueta", "subtotal", "efectivo"}
+
+    # Una distribución que no cuadra con el pendiente tampoco entra al flujo
+    data = _distribuir(client, escenario_id, [("2026-02-15", 800)])
+    assert data["proyeccion"] == []
+    assert _concepto(escenario_id)["montos_por_mes"]["2026-02"] == 0
+
+
+def test_oc_inexistente_retorna_404(client, escenario):
+    escenario_id = escenario(_base({}), None)
+    resp = client.post(f"{URL}/{escenario_id}/distribucion", params={"username": "u", "password": "p"}, json={
+        "oc_id": 99, "oc_name": "X", "proveedor": "X", "monto_total": 1, "distribuciones": [],
+    })
+    assert resp.status_code == 404
+
+
+def test_proyeccion_oc_sin_distribucion_usa_fecha_de_pago_o_planificada():
+    proyeccion = RealProyectadoCalculator.proyeccion_oc
+
+    assert proyeccion(OC, 1000, None, "2026-01-01", "2026-03-31") == [{"fecha": "2026-02-10", "monto": 1000}]
+    sin_fecha_pago = {**OC, "x_studio_fecha_de": False}
+    assert proyeccion(sin_fecha_pago, 1000, None, "2026-01-01", "2026-03-31") == [{"fecha": "2026-01-05", "monto": 1000}]
+    # Fuera de rango o ya facturada (pendiente < 100)
+    assert proyeccion(OC, 1000, None, "2026-03-01", "2026-03-31") == []
+    assert proyeccion(OC, 99, None, "2026-01-01", "2026-03-31") == []
+    # Dentro de la tolerancia de 1% la distribución guardada se respeta
+    assert proyeccion(OC, 1005, [{"fecha": "2026-03-01", "monto": 1000}], "2026-01-01", "2026-03-31") == [
+        {"fecha": "2026-03-01", "monto": 1000.0}
+    ]
@@ -0,0 +1,91 @@
+"""Tests del store SQLite de snapshots del monitor (base en tmp_path)."""
+import json
+
+import pytest
+
+from backend.services import monitor_snapshot_store as snapshot_store
+
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    monkeypatch.setattr(snapshot_store, "SNAPSHOT_DB", tmp_path / "monitor_snapshots.db")
+    monkeypatch.setattr(snapshot_store, "LEGACY_DIR", tmp_path / "monitor_snapshots")
+    monkeypatch.setattr(snapshot_store, "_schema_initialized", False)
+    return snapshot_store
+
+
+def _snapshot(timestamp, kg_producidos, planta="RIO FUTURO", activos=3):
+    return {
+        "fecha": timestamp[:10],
+        "planta": planta,
+        "timestamp": timestamp,
+        "procesos_activos": {"total_procesos": activos, "kg_programados": 1000.0,
+                             "kg_producidos": kg_producidos, "kg_pendientes": 1000.0 - kg_producidos,
+                             "avance_porcentaje": kg_producidos / 10},
+        "procesos_cerrados": {"total_procesos": 1, "kg_producidos": 50.0},
+        "detalle_activos": [{"name": "MO/1"}],
+        "detalle_cerrados": [],
+    }
+
+
+def _poblar(store):
+    store.guardar_lote([
+        _snapshot("2026-01-05T08:00:00", 100.0),
+        _snapshot("2026-01-05T08:30:00", 150.0),
+        _snapshot("2026-01-05T09:10:00", 200.0),
+        _snapshot("2026-01-06T08:00:00", 300.0),
+        _snapshot("2026-01-06T17:00:00", 450.0),
+        _snapshot("2026-01-07T08:00:00", 500.0),
+        _snapshot("2026-01-06T12:00:00", 999.0, planta="VILKUN"),
+    ])
+
+
+def test_consultar_filtra_rango_y_planta(store):
+    _poblar(store)
+
+    snapshots = store.consultar("2026-01-05", "2026-01-06", planta="RIO FUTURO")
+    assert [s["timestamp"] for s in snapshots] == [
+        "2026-01-06T17:00:00", "2026-01-06T08:00:00",
+        "2026-01-05T09:10:00", "2026-01-05T08:30:00", "2026-01-05T08:00:00",
+    ]
+    assert snapshots[0]["procesos_activos"]["kg_producidos"] == 450.0
+    assert snapshots[0]["detalle_activos"] == [{"name": "MO/1"}]
+    assert snapshots[0]["origen"] == "programado"
+
+    livianos = store.consultar("2026-01-06", "2026-01-06", limit=2, incluir_detalle=False)
+    assert [s["planta"] for s in livianos] == ["RIO FUTURO", "VILKUN"]
+    assert "detalle_activos" not in livianos[0]
+
+
+def test_evolucion_toma_el_ultimo_snapshot_de_cada_periodo(store):
+    _poblar(store)
+
+    por_dia = store.evolucion("2026-01-05", "2026-01-07", planta="RIO FUTURO", grano="dia")
+    assert [(f["periodo"], f["activos_kg_producidos"], f["snapshots"]) for f in por_dia] == [
+        ("2026-01-05", 200.0, 3), ("2026-01-06", 450.0, 2), ("2026-01-07", 500.0, 1),
+    ]
+    # Avance respecto al periodo anterior (el primero parte en 0)
+    assert [f["avance_kg"] for f in por_dia] == [0.0, 250.0, 50.0]
+
+    por_hora = store.evolucion("2026-01-05", "2026-01-05", planta="RIO FUTURO", grano="hora")
+    assert [(f["periodo"], f["activos_kg_producidos"]) for f in por_hora] == [
+        ("2026-01-05T08", 150.0), ("2026-01-05T09", 200.0),
+    ]
+
+    with pytest.raises(ValueError):
+        store.evolucion("2026-01-05", "2026-01-07", grano="semana")
+
+
+def test_importa_json_legacy_una_sola_vez(store):
+    store.LEGACY_DIR.mkdir()
+    with open(store.LEGACY_DIR / "snapshot_2026-01-04_RIO.json", "w", encoding="utf-8") as f:
+        json.dump(_snapshot("2026-01-04T10:00:00", 80.0), f)
+
+    assert store.get_stats()["total"] == 1
+    store.guardar(_snapshot("2026-01-05T10:00:00", 90.0))
+    store._schema_initialized = False  # reinicio del proceso: la tabla ya tiene datos
+    assert store.get_stats()["total"] == 2
+    assert [s["origen"] for s in store.consultar()] == ["manual", "legacy"]
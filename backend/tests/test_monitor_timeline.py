@@ -0,0 +1,147 @@
+"""Tests de la línea de tiempo del monitor de producción (Odoo falso con read_group en memoria)."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.cache import get_cache
+from backend.services import monitor_timeline
+from backend.services.monitor_produccion_service import MonitorProduccionService
+
+
+pytestmark = pytest.mark.unit
+
+PRODUCTO = [7, '[2.1] PROCESO PSP']
+OPERADORES = {
+    '=': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '>=': lambda a, b: a is not False and a >= b,
+    '<=': lambda a, b: a is not False and a <= b,
+    'in': lambda a, b: a in b,
+    'not in': lambda a, b: a not in b,
+}
+
+
+def _proceso(pid, sala, inicio, state='progress', finished=False, write_date='2026-01-05 20:00:00'):
+    return {'id': pid, 'name': f'MO/{pid}', 'product_id': PRODUCTO, 'product_qty': 100.0, 'qty_produced': 0.0,
+            'state': state, 'x_studio_sala_de_proceso': sala, 'x_studio_inicio_de_proceso': inicio,
+            'date_planned_start': inicio, 'date_finished': finished, 'write_date': write_date}
+
+
+class OdooFalso:
+    def __init__(self):
+        self.procesos = [
+            _proceso(1, 'Sala 1', '2026-01-05 10:00:00'),
+            _proceso(2, 'Sala 10', '2026-01-05 11:00:00'),
+            _proceso(3, 'Sala 1', '2026-01-06 10:00:00', state='done', finished='2026-01-06 15:00:00'),
+        ]
+        self.consultas = []  # (tipo, día desde) de las lecturas de datos
+
+    def _filtrar(self, domain):
+        def valor(p, campo):
+            v = p.get(campo, False)
+            return v[0] if isinstance(v, list) and campo != 'product_id' else v
+        return [p for p in self.procesos
+                if all(OPERADORES[op](valor(p, campo), v) for campo, op, v in domain)]
+
+    def search_read(self, model, domain, fields=None, order=None, limit=None):
+        self.consultas.append(('cerrados', domain[2][2]))
+        return [dict(p) for p in self._filtrar(domain)]
+
+    @staticmethod
+    def _dia(valor, context):
+        """Día del grupo ':day' como Odoo: en la zona del contexto (America/Santiago si no se indica)."""
+        if (context or {}).get('tz') == 'UTC':
+            return valor[:10]
+        return (datetime.fromisoformat(valor) - timedelta(hours=3)).date().isoformat()
+
+    def execute(self, model, method, domain, fields, groupby, lazy=True, context=None):
+        assert method == 'read_group'
+        campo = groupby[0].split(':')[0]
+        if fields == ['product_qty:sum']:
+            self.consultas.append(('creados', domain[-2][2]))
+        grupos = {}
+        for p in self._filtrar(domain):
+            dia = self._dia(p[campo], context)
+            clave = (dia,) + tuple(str(p.get(k)) for k in groupby[1:])
+            g = grupos.setdefault(clave, {
+                '__range': {groupby[0]: {'from': dia}}, '__count': 0, 'product_qty': 0.0, 'write_date': '',
+                **{k: p.get(k) for k in groupby[1:]},
+            })
+            g['__count'] += 1
+            g['product_qty'] += p['product_qty']
+            g['write_date'] = max(g['write_date'], p['write_date'])
+        return list(grupos.values())
+
+    def proceso(self, pid):
+        return next(p for p in self.procesos if p['id'] == pid)
+
+
+@pytest.fixture
+def servicio():
+    monitor_timeline.invalidar()
+    service = MonitorProduccionService.__new__(MonitorProduccionService)
+    service.odoo = OdooFalso()
+    yield service
+    monitor_timeline.invalidar()
+
+
+def _vencer_firmas():
+    get_cache().invalidate_prefix('monitor_timeline_firmas')
+
+
+def test_dia_pasado_se_sirve_de_cache_mientras_no_cambie(servicio):
+    primero = monitor_timeline.get_timeline(servicio.odoo, '2026-01-05', '2026-01-06', [])
+    assert [sum(g['procesos'] for g in d['creados']) for d in primero] == [2, 1]
+    servicio.odoo.consultas.clear()
+
+    _vencer_firmas()
+    assert monitor_timeline.get_timeline(servicio.odoo, '2026-01-05', '2026-01-06', []) == primero
+    assert servicio.odoo.consultas == []
+
+
+def test_cambio_en_dia_pasado_invalida_solo_ese_dia(servicio):
+    monitor_timeline.get_timeline(servicio.odoo, '2026-01-05', '2026-01-06', [])
+    servicio.odoo.consultas.clear()
+
+    # Un proceso creado el 5 se cierra después: cambia su estado en los grupos de creados
+    servicio.odoo.proceso(1).update(state='done', finished='2026-01-07 09:00:00', write_date='2026-01-07 09:00:00')
+    _vencer_firmas()
+    timeline = monitor_timeline.get_timeline(servicio.odoo, '2026-01-05', '2026-01-06', [])
+
+    estados = {g['state']: g['procesos'] for g in timeline[0]['creados'] if g['x_studio_sala_de_proceso'] == 'Sala 1'}
+    assert estados == {'done': 1}
+    assert servicio.odoo.consultas == [('creados', '2026-01-05'), ('creados', '2026-01-05'),
+                                       ('cerrados', '2026-01-05')]
+    # Cancelar un proceso también cambia la firma (baja la cantidad)
+    servicio.odoo.proceso(2)['state'] = 'cancel'
+    _vencer_firmas()
+    timeline = monitor_timeline.get_timeline(servicio.odoo, '2026-01-05', '2026-01-06', [])
+    assert sum(g['procesos'] for g in timeline[0]['creados']) == 1
+
+
+def test_filtro_de_sala_y_producto_es_exacto(servicio):
+    evolucion = servicio.get_evolucion_rango('2026-01-05', '2026-01-06', sala='Sala 1')
+    assert [d['procesos_creados'] for d in evolucion['evolucion']] == [1, 1]
+
+    procesos = [{'x_studio_sala_de_proceso': s, 'product_id': PRODUCTO} for s in ('Sala 1', 'Sala 10', ' sala 1 ')]
+    assert len(servicio._aplicar_filtros(procesos, sala='Sala 1')) == 2
+    assert len(servicio._aplicar_filtros(procesos, producto='[2.1] PROCESO PSP')) == 3
+    assert len(servicio._aplicar_filtros(procesos, producto='7')) == 3
+    assert servicio._aplicar_filtros(procesos, producto='PSP') == []
+
+
+def test_dias_en_utc_en_las_primeras_horas(servicio):
+    # 01:00 UTC del día 6 es el 5 en hora local: igual debe caer en el día 6 (UTC)
+    servicio.odoo.procesos.append(_proceso(4, 'Sala 2', '2026-01-06 01:00:00'))
+    servicio.odoo.procesos.append(_proceso(5, 'Sala 2', '2026-01-05 01:00:00', state='done',
+                                           finished='2026-01-05 01:30:00'))
+
+    timeline = monitor_timeline.get_timeline(servicio.odoo, '2026-01-05', '2026-01-06', [])
+    assert [sum(g['procesos'] for g in d['creados']) for d in timeline] == [3, 2]
+    assert [len(d['cerrados']) for d in timeline] == [1, 1]
+
+    # Las firmas usan los mismos días: sin cambios, todo sale de caché
+    servicio.odoo.consultas.clear()
+    _vencer_firmas()
+    assert monitor_timeline.get_timeline(servicio.odoo, '2026-01-05', '2026-01-06', []) == timeline
+    assert servicio.odoo.consultas == []
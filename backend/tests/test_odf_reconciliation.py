@@ -0,0 +1,122 @@
+"""Tests de la reconciliación masiva de ODFs (Odoo falso en memoria)."""
+import operator
+import threading
+import time
+
+import pytest
+
+from backend.services.odf_reconciliation_service import ODFReconciliationService
+
+
+pytestmark = pytest.mark.unit
+
+OPERADORES = {
+    '=': operator.eq, '>': operator.gt, '>=': operator.ge, '<=': operator.le,
+    'in': lambda a, b: a in b,
+}
+
+
+class OdooFalso:
+    def __init__(self):
+        self.consultas = 0
+        self.en_curso = 0
+        self.lock = threading.Lock()
+        self.writes = []
+        self.datos = {
+            'mrp.production': [
+                {'id': 1, 'name': 'OF/1', 'date_start': '2026-03-02', 'x_studio_po_asociada': 'S001, S002'},
+                {'id': 2, 'name': 'OF/2', 'date_start': '2026-03-03', 'x_studio_po_asociada': 'S002'},
+                {'id': 3, 'name': 'OF/3', 'date_start': '2026-03-04', 'x_studio_po_asociada': False,
+                 'x_studio_kg_totales_po': 50},
+                {'id': 4, 'name': 'OF/4', 'date_start': '2026-03-05', 'x_studio_po_asociada': False},
+                {'id': 5, 'name': 'OF/5', 'date_start': '2026-03-05', 'x_studio_po_asociada': 'S002'},
+            ],
+            'sale.order': [
+                {'id': 10, 'name': 'S001'},
+                {'id': 11, 'name': 'S002'},
+            ],
+            'sale.order.line': [
+                {'id': 100, 'order_id': [10, 'S001'], 'product_id': [7, 'IQF'], 'product_uom_qty': 1000, 'qty_delivered': 0},
+                {'id': 101, 'order_id': [11, 'S002'], 'product_id': [7, 'IQF'], 'product_uom_qty': 500, 'qty_delivered': 0},
+                {'id': 102, 'order_id': [11, 'S002'], 'product_id': [8, 'Block'], 'product_uom_qty': 300, 'qty_delivered': 0},
+            ],
+            'stock.move': [
+                {'id': 200, 'production_id': [1, 'OF/1'], 'location_dest_id.usage': 'internal',
+                 'product_id': [7, 'IQF'], 'product_uom_qty': 900, 'quantity_done': 800, 'state': 'done'},
+                {'id': 201, 'production_id': [1, 'OF/1'], 'location_dest_id.usage': 'production',
+                 'product_id': [7, 'IQF'], 'product_uom_qty': 50, 'quantity_done': 50, 'state': 'done'},
+                {'id': 202, 'production_id': [2, 'OF/2'], 'location_dest_id.usage': 'internal',
+                 'product_id': [8, 'Block'], 'product_uom_qty': 300, 'quantity_done': 300, 'state': 'done'},
+                {'id': 203, 'production_id': [5, 'OF/5'], 'location_dest_id.usage': 'internal',
+                 'product_id': [8, 'Block'], 'product_uom_qty': 300, 'quantity_done': 300, 'state': 'done'},
+            ],
+        }
+
+    def search_read(self, model, domain, fields=None, limit=None, order=None):
+        # Como el ServerProxy de xmlrpc: falla si dos llamadas se solapan
+        with self.lock:
+            self.en_curso += 1
+            solapada = self.en_curso > 1
+        time.sleep(0.001)
+        with self.lock:
+            self.en_curso -= 1
+        if solapada:
+            raise RuntimeError("CannotSendRequest: Request-sent")
+        self.consultas += 1
+        filas = []
+        for r in self.datos[model]:
+            ok = True
+            for campo, op, valor in domain:
+                actual = r.get(campo)
+                if isinstance(actual, list):
+                    actual = actual[0]
+                if not OPERADORES[op](actual, valor):
+                    ok = False
+            if ok:
+                filas.append(dict(r))
+        return filas[:limit]
+
+    def parallel_search_read(self, queries, max_workers=5):
+        # Igual que OdooClient: varios hilos sobre el mismo cliente
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(self.search_read, q['model'], q['domain'], q.get('fields'))
+                       for q in queries]
+            return [f.result() for f in futures]
+
+    def write(self, model, ids, vals):
+        self.writes.append((list(ids), dict(vals)))
+        return True
+
+
+def _sin_timestamp(resultado):
+    return {k: v for k, v in resultado.items() if k != 'timestamp'}
+
+
+def test_lote_coincide_con_reconciliacion_individual():
+    odoo = OdooFalso()
+    service = ODFReconciliationService(odoo)
+
+    lote = service.reconciliar_odfs_por_fecha('2026-03-01', '2026-03-31', dry_run=True)
+    assert lote['total_odfs'] == 5 and odoo.writes == []
+    for resultado in lote['resultados']:
+        individual = service.reconciliar_odf(resultado['odf_id'], dry_run=True)
+        assert _sin_timestamp(resultado) == _sin_timestamp(individual)
+
+    por_id = {r['odf_id']: r for r in lote['resultados']}
+    assert por_id[1]['kg_totales_po'] == 1800 and por_id[1]['kg_consumidos_po'] == 800
+    assert por_id[3]['accion'] == 'limpieza_inconsistencia'
+
+
+def test_escrituras_agrupadas():
+    odoo = OdooFalso()
+    service = ODFReconciliationService(odoo)
+    odoo.consultas = 0
+
+    resultado = service.reconciliar_odfs_por_fecha('2026-03-01', '2026-03-31')
+    # ODFs, moves, SOs y líneas de SO (sin solaparse): sin consultas por ODF
+    assert odoo.consultas == 4
+    # OF/2 y OF/5 tienen los mismos valores: un solo write
+    assert sorted(len(ids) for ids, _ in odoo.writes) == [1, 1, 2]
+    assert resultado['odfs_reconciliadas'] == 4 and resultado['odfs_sin_po'] == 1
+    assert resultado['escrituras'] == 3
@@ -0,0 +1,74 @@
+"""Tests del snapshot versionado de permisos (base SQLite en tmp_path)."""
+import sqlite3
+import threading
+
+import pytest
+
+from backend.services import permissions_service as permisos
+
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    monkeypatch.setattr(permisos, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(permisos, "PERMISSIONS_FILE", tmp_path / "permissions.json")
+    monkeypatch.setattr(permisos, "PERMISSIONS_DB_FILE", tmp_path / "permissions.db")
+    monkeypatch.setattr(permisos, "_DB_READY", False)
+    monkeypatch.setattr(permisos, "_snapshot", None)
+    # Sin expiración por tiempo: solo la invalidación o la versión hacen releer
+    monkeypatch.setattr(permisos, "SNAPSHOT_CHECK_SECONDS", 3600)
+    return tmp_path
+
+
+def test_mutacion_visible_de_inmediato(store):
+    assert not permisos.is_admin("ana@riofuturo.cl")
+
+    permisos.assign_admin("Ana@RioFuturo.cl ")
+    assert permisos.is_admin("ana@riofuturo.cl")
+
+    permisos.assign_dashboard("recepciones", "luis@riofuturo.cl")
+    assert "luis@riofuturo.cl" in permisos.get_permissions_map()["recepciones"]
+    permisos.remove_admin("ana@riofuturo.cl")
+    assert not permisos.is_admin("ana@riofuturo.cl")
+
+
+def test_otro_worker_se_ve_al_verificar_la_version(store, monkeypatch):
+    assert not permisos.is_admin("eva@riofuturo.cl")
+
+    # Otro proceso escribe directo en la BD y sube la versión
+    with sqlite3.connect(store / "permissions.db") as conn:
+        conn.execute("INSERT INTO permission_admins (email) VALUES ('eva@riofuturo.cl')")
+        permisos._bump_version(conn)
+    assert not permisos.is_admin("eva@riofuturo.cl")  # aún dentro del intervalo
+
+    monkeypatch.setattr(permisos, "SNAPSHOT_CHECK_SECONDS", 0)
+    assert permisos.is_admin("eva@riofuturo.cl")
+
+
+def test_reconstruccion_concurrente_no_oculta_la_mutacion(store, monkeypatch):
+    permisos.get_admins()
+    permisos._invalidate_snapshot()
+    leer_version = permisos._read_version
+    mutador = []
+
+    def leer_version_y_mutar(conn):
+        version = leer_version(conn)
+        if not mutador:
+            # Mientras este hilo reconstruye con la versión anterior, otro muta e invalida
+            with sqlite3.connect(store / "permissions.db") as otra:
+                otra.execute("INSERT INTO permission_admins (email) VALUES ('ana@riofuturo.cl')")
+                permisos._bump_version(otra)
+            hilo = threading.Thread(target=permisos._invalidate_snapshot)
+            hilo.start()
+            hilo.join(timeout=0.2)
+            mutador.append(hilo)
+        return version
+
+    monkeypatch.setattr(permisos, "_read_version", leer_version_y_mutar)
+    assert "ana@riofuturo.cl" not in permisos.get_admins()
+    mutador[0].join()
+
+    # El mutador ya retornó: su siguiente lectura debe ver el cambio
+    assert permisos.is_admin("ana@riofuturo.cl")
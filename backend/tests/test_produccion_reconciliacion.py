@@ -0,0 +1,52 @@
+"""Tests de la resolución de líneas de SO en la reconciliación de producción."""
+import pytest
+
+from backend.services.produccion_reconciliacion_service import ProduccionReconciliador
+
+
+pytestmark = pytest.mark.unit
+
+
+class OdooFalso:
+    def __init__(self):
+        self.consultas = []
+        self.move_lines = {
+            1: [
+                {'id': 11, 'date': '2026-03-02 08:00:00', 'product_id': [7, 'Arándano'], 'qty_done': 100,
+                 'product_uom_qty': 100, 'lot_id': False, 'x_studio_so_linea': [500, 'S001 - IQF'], 'state': 'done'},
+                {'id': 12, 'date': '2026-03-02 09:00:00', 'product_id': [7, 'Arándano'], 'qty_done': 80,
+                 'product_uom_qty': 80, 'lot_id': False, 'x_studio_so_linea': [501, 'S002 - IQF'], 'state': 'done'},
+                {'id': 13, 'date': '2026-03-02 10:00:00', 'product_id': [7, 'Arándano'], 'qty_done': 50,
+                 'product_uom_qty': 50, 'lot_id': False, 'x_studio_so_linea': [999, 'Borrada'], 'state': 'done'},
+                {'id': 14, 'date': '2026-03-02 11:00:00', 'product_id': [7, 'Arándano'], 'qty_done': 20,
+                 'product_uom_qty': 20, 'lot_id': False, 'x_studio_so_linea': False, 'state': 'done'},
+            ],
+            2: [
+                {'id': 21, 'date': '2026-03-03 08:00:00', 'product_id': [7, 'Arándano'], 'qty_done': 60,
+                 'product_uom_qty': 60, 'lot_id': False, 'x_studio_so_linea': [500, 'S001 - IQF'], 'state': 'done'},
+            ],
+        }
+        self.so_lines = {500: [10, 'S001'], 501: [11, 'S002']}
+
+    def search_read(self, model, domain, fields=None, limit=None, order=None):
+        self.consultas.append(model)
+        if model == 'stock.move.line':
+            return [dict(m) for m in self.move_lines.get(domain[0][2], [])]
+        if model == 'sale.order.line':
+            ids = domain[0][2]
+            return [{'id': i, 'order_id': self.so_lines[i]} for i in ids if i in self.so_lines]
+        return []
+
+
+def test_lineas_de_so_en_una_consulta_y_memo_entre_odfs():
+    odoo = OdooFalso()
+    reconciliador = ProduccionReconciliador(odoo)
+
+    consumos = reconciliador.get_consumos_odf(1)
+    assert [c['so_nombre'] for c in consumos] == ['S001', 'S002', 'Sin SO asignada', 'Sin SO']
+    assert consumos[0]['so_id'] == 10
+    assert odoo.consultas.count('sale.order.line') == 1
+
+    # La segunda ODF reutiliza las líneas ya resueltas
+    assert reconciliador.get_consumos_odf(2)[0]['so_nombre'] == 'S001'
+    assert odoo.consultas.count('sale.order.line') == 1
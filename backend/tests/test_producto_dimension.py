@@ -0,0 +1,88 @@
+"""Tests de la dimensión de productos (Odoo falso que verifica que el lock esté libre al leer)."""
+import threading
+
+import pytest
+
+from backend.services import producto_dimension_service as dimension
+
+
+pytestmark = pytest.mark.unit
+
+
+def _lock_libre() -> bool:
+    """True si otro hilo puede tomar el lock del módulo (nadie lo tiene tomado)."""
+    resultado = []
+
+    def intentar():
+        tomado = dimension._lock.acquire(blocking=False)
+        if tomado:
+            dimension._lock.release()
+        resultado.append(tomado)
+
+    hilo = threading.Thread(target=intentar)
+    hilo.start()
+    hilo.join()
+    return resultado[0]
+
+
+class OdooFalso:
+    def __init__(self):
+        self.productos = {
+            1: {'id': 1, 'name': 'AR Conv', 'display_name': '[1] AR Conv', 'product_tmpl_id': [10, 'AR Conv'],
+                'categ_id': [3, 'PRODUCTOS / MP'], 'product_tag_ids': [], 'x_studio_categora_variedad': [50],
+                'write_date': '2025-01-01 00:00:00'},
+            2: {'id': 2, 'name': 'FB Org', 'display_name': '[2] FB Org', 'product_tmpl_id': [11, 'FB Org'],
+                'categ_id': [3, 'PRODUCTOS / MP'], 'product_tag_ids': [], 'x_studio_categora_variedad': [],
+                'write_date': '2025-01-01 00:00:00'},
+        }
+        self.lecturas = []
+
+    def execute(self, model, method, *args, **kwargs):
+        assert _lock_libre()
+        if method == 'fields_get':
+            campos = dimension.CAMPOS_BASE + dimension.CAMPOS_OPCIONALES + ['x_studio_categora_variedad']
+            return {c: {} for c in campos}
+        if model == 'product.template':
+            return []
+        marca = args[0][0][2]
+        return [p['id'] for p in self.productos.values() if p['write_date'] > marca]
+
+    def read(self, model, ids, fields=None):
+        assert _lock_libre()
+        self.lecturas.append((model, sorted(ids)))
+        if model == 'x_variedad':
+            return [{'id': 50, 'display_name': 'Duke'}]
+        return [dict(self.productos[i]) for i in ids if i in self.productos]
+
+
+@pytest.fixture
+def odoo(monkeypatch):
+    monkeypatch.setitem(dimension._estado, 'campos', None)
+    monkeypatch.setitem(dimension._estado, 'verificado', 0.0)
+    dimension.invalidar_productos()
+    dimension._variedades.clear()
+    yield OdooFalso()
+    dimension.invalidar_productos()
+    dimension._variedades.clear()
+
+
+def test_carga_faltantes_y_refresca_fuera_del_lock(odoo):
+    productos = dimension.get_productos(odoo, [1, 2, 99])
+
+    assert set(productos) == {1, 2}
+    assert productos[1]['variedad'] == 'Duke'
+    assert odoo.lecturas == [('product.product', [1, 2, 99]), ('x_variedad', [50])]
+
+    # Ya cargados: no se vuelve a leer
+    odoo.lecturas.clear()
+    dimension.get_productos(odoo, [1])
+    assert odoo.lecturas == []
+
+    # Producto modificado en Odoo: se relee al vencer la verificación
+    odoo.productos[2].update(name='FB Conv', display_name='[2] FB Conv', write_date='2025-02-01 00:00:00')
+    dimension._estado['verificado'] = 0.0
+    productos = dimension.get_productos(odoo, [2])
+
+    assert productos[2]['name'] == 'FB Conv'
+    assert odoo.lecturas == [('product.product', [2])]
+    assert dimension.get_stats()['write_date'] == '2025-02-01 00:00:00'
@@ -0,0 +1,74 @@
+"""Tests de los snapshots de recepciones del portal de proveedores (Odoo falso, base en tmp_path)."""
+from datetime import date
+
+import pytest
+
+from backend.services import provider_portal_snapshot_service as snapshots
+
+
+pytestmark = pytest.mark.unit
+
+OPERADORES = {
+    '=': lambda a, b: a == b,
+    '>': lambda a, b: a > b,
+    'in': lambda a, b: a in b,
+}
+
+
+class OdooFalso:
+    def __init__(self):
+        self.pickings = [
+            {'id': 1, 'partner_id': [10, 'Agrícola A'], 'picking_type_id': [1, 'Recepciones'],
+             'x_studio_categora_de_producto': 'MP', 'date_done': '2026-01-05 10:00:00',
+             'scheduled_date': '2026-01-05 10:00:00', 'kg': 100.0, 'write_date': '2026-01-05 12:00:00'},
+            {'id': 2, 'partner_id': [20, 'Agrícola B'], 'picking_type_id': [1, 'Recepciones'],
+             'x_studio_categora_de_producto': 'MP', 'date_done': '2026-01-06 10:00:00',
+             'scheduled_date': '2026-01-06 10:00:00', 'kg': 200.0, 'write_date': '2026-01-06 12:00:00'},
+        ]
+
+    def _filtrar(self, domain):
+        def valor(p, campo):
+            v = p.get(campo)
+            return v[0] if isinstance(v, list) else v
+        return [p for p in self.pickings if all(OPERADORES[op](valor(p, c), v) for c, op, v in domain)]
+
+    def search_read(self, model, domain, fields=None, limit=None, order=None):
+        filas = sorted(self._filtrar(domain), key=lambda p: p['write_date'], reverse='desc' in (order or ''))
+        return [dict(p) for p in filas][:limit]
+
+    def execute(self, model, method, domain, fields, groupby, lazy=True):
+        assert (method, fields, groupby) == ('read_group', ['write_date:max'], ['partner_id'])
+        grupos = {}
+        for p in self._filtrar(domain):
+            g = grupos.setdefault(p['partner_id'][0], {'partner_id': p['partner_id'], 'write_date': ''})
+            g['write_date'] = max(g['write_date'], p['write_date'])
+        return list(grupos.values())
+
+    def fetch(self, partner_id, desde, hasta):
+        return [{'id': p['id'], 'fecha': p['date_done'], 'kg': p['kg']} for p in self.pickings
+                if p['partner_id'][0] == partner_id and desde <= p['date_done'][:10] <= hasta]
+
+
+@pytest.fixture
+def odoo(monkeypatch, tmp_path):
+    monkeypatch.setattr(snapshots, "SNAPSHOT_DB", tmp_path / "provider_portal_snapshots.db")
+    monkeypatch.setattr(snapshots, "_schema_initialized", False)
+    odoo = OdooFalso()
+    for partner_id in (10, 20):
+        snapshots.asegurar_cobertura(odoo, odoo.fetch, partner_id, date(2026, 1, 1), date(2026, 1, 31))
+    return odoo
+
+
+def test_detecta_cambios_de_proveedores_sin_acceso_reciente(odoo):
+    assert snapshots.proveedores_modificados(odoo) == []
+
+    # Recepción corregida en Odoo de un proveedor que no entra al portal
+    odoo.pickings[1].update(kg=250.0, write_date='2026-02-10 08:00:00')
+    assert snapshots.proveedores_modificados(odoo) == [20]
+    assert snapshots.proveedores_modificados(odoo, excluir=[20]) == []
+
+    snapshots.sincronizar_proveedor(odoo, odoo.fetch, 20)
+
+    assert snapshots.proveedores_modificados(odoo) == []
+    filas = snapshots.leer_recepciones(20, date(2026, 1, 1), date(2026, 1, 31))
+    assert [f['kg'] for f in filas] == [250.0]
@@ -0,0 +1,37 @@
+"""Tests del store SQLite de usuarios del portal de proveedores (base en tmp_path)."""
+import pytest
+
+from backend.services import provider_portal_service as portal
+from backend.services.provider_portal_service import ProviderPortalAuthService
+
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    monkeypatch.setattr(portal, "PROVIDER_PORTAL_DB", tmp_path / "provider_portal.db")
+    monkeypatch.setattr(portal, "PROVIDER_USERS_FILE", tmp_path / "provider_portal_users.json")
+    monkeypatch.setattr(portal, "PROVIDER_SESSIONS_FILE", tmp_path / "provider_portal_sessions.json")
+    monkeypatch.setattr(portal, "_schema_initialized", False)
+    return ProviderPortalAuthService
+
+
+def _usuario(partner_id, active=True, password_hash=""):
+    return {"partner_id": partner_id, "rut": "76.123.456-7", "display_name": f"Proveedor {partner_id}",
+            "active": active, "password_salt": "00" if password_hash else "", "password_hash": password_hash}
+
+
+def test_rut_compartido_resuelve_siempre_el_mismo_usuario(store):
+    store._save_users([_usuario(30, active=False, password_hash="abc"), _usuario(20), _usuario(10, active=False)])
+    # Sin clave configurada en ningún activo: el partner activo
+    assert store._find_user_by_rut("761234567")["partner_id"] == 20
+
+    # Otro activo con clave tiene prioridad, sin importar el orden de inserción
+    store._save_users([_usuario(40, password_hash="def")])
+    assert store._find_user_by_rut("76123456-7")["partner_id"] == 40
+
+    # A igualdad de condiciones, el partner_id menor
+    store._save_users([_usuario(5, password_hash="ghi")])
+    assert store._find_user_by_rut("76.123.456-7")["partner_id"] == 5
+    assert store._find_user_by_partner_id(30)["active"] is False
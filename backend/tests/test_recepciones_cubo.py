@@ -0,0 +1,58 @@
+"""Tests del cubo de recepciones de los reportes."""
+import pytest
+
+from backend.services.report.cube import RecepcionesCubo, clave_dataset, get_cubo
+
+
+pytestmark = pytest.mark.unit
+
+
+RECEPCIONES = [
+    {'productor': 'Agrícola Sur', 'tipo_fruta': 'Arándano', 'total_iqf': 80, 'total_block': 20,
+     'kg_recepcionados': 1000, 'productos': [
+         {'Categoria': 'Productos', 'TipoFruta': 'Arándano', 'Manejo': 'Orgánico', 'Kg Hechos': 600, 'Costo Total': 1200},
+         {'Categoria': 'Productos', 'TipoFruta': 'Arándano', 'Manejo': 'Convencional', 'Kg Hechos': 400, 'Costo Total': 600},
+         {'Categoria': 'Bandejas', 'Producto': 'Bandeja verde', 'Kg Hechos': 50},
+     ]},
+    {'productor': 'ADMINISTRADOR', 'tipo_fruta': 'Arándano', 'total_iqf': 0, 'total_block': 0,
+     'kg_recepcionados': 300, 'productos': [
+         {'Categoria': 'Productos', 'TipoFruta': 'Arándano', 'Manejo': 'Orgánico', 'Kg Hechos': 300, 'Costo Total': 300},
+         {'Categoria': 'BANDEJA', 'Producto': 'Bandeja verde', 'Kg Hechos': 10},
+     ]},
+    {'productor': 'Frutos del Maule', 'tipo_fruta': 'Frambuesa', 'total_iqf': 60, 'total_block': 40,
+     'kg_recepcionados': 200, 'productos': [
+         {'Categoria': 'Productos', 'TipoFruta': '', 'Manejo': '', 'Kg Hechos': 200, 'Costo Total': 800},
+     ]},
+]
+
+
+def test_vistas_del_cubo():
+    cubo = RecepcionesCubo(RECEPCIONES)
+
+    assert cubo.envases() == {'Bandeja verde': 60.0}
+    assert cubo.total_bandejas() == 60.0
+
+    por_fruta = cubo.por_fruta()
+    assert [f['tipo_fruta'] for f in por_fruta] == ['Arándano', 'Frambuesa']
+    assert por_fruta[0]['kg'] == 1000.0 and por_fruta[0]['n_recepciones'] == 1
+    assert por_fruta[0]['top_productores'] == [('Agrícola Sur', 1000.0)]
+
+    arandano = cubo.por_fruta_manejo()[0]
+    assert [m['manejo'] for m in arandano['manejos']] == ['Orgánico', 'Convencional']
+    assert arandano['manejos'][0]['prom_iqf'] == 80.0
+
+    manejos = cubo.por_manejo_especie_productor()
+    assert [m['manejo'] for m in manejos] == ['Orgánico', 'Convencional', 'Sin Manejo']
+    assert manejos[2]['especies'][0]['especie'] == 'Frambuesa'
+
+    # El resumen del Excel incluye ADMINISTRADOR y cuenta recepciones distintas
+    resumen = {f['tipo_fruta']: f for f in cubo.resumen_por_tipo()}
+    assert resumen['Arándano']['kg'] == 1300.0
+    assert resumen['Arándano']['n_recepciones'] == 2
+
+
+def test_get_cubo_reutiliza_por_clave():
+    clave = clave_dataset('2026-01-01', '2026-01-07', True, origen=['RFP'])
+    cubo = get_cubo(RECEPCIONES, clave)
+    assert get_cubo([], clave) is cubo
+    assert get_cubo([], clave_dataset('2026-01-01', '2026-01-07', False)) is not cubo
@@ -0,0 +1,121 @@
+"""Tests de los endpoints del cubo KG/Línea (/rendimiento/rollup y /rollup/mos)."""
+import pytest
+
+from backend.cache import OdooCache
+from backend.routers import rendimiento as rendimiento_router
+from backend.services.rendimiento_service import RendimientoService
+
+
+pytestmark = pytest.mark.unit
+
+URL = "/api/v1/rendimiento/rollup"
+RANGO = {"username": "u", "password": "p", "fecha_inicio": "2026-01-05", "fecha_fin": "2026-01-06"}
+
+# Fechas en UTC (Odoo); en hora Chile quedan 3 horas antes
+MOS = [
+    {'mo_name': 'MO/1', 'sala': 'Sala 1', 'especie': 'Arándano', 'product_name': 'Proceso, IQF',
+     'fecha_inicio': '2026-01-05 12:00', 'fecha_termino': '2026-01-05 14:00',
+     'kg_pt': 1000, 'kg_mp': 1100, 'duracion_horas': 2, 'detenciones': 0.5, 'dotacion': 10, 'hh': 20},
+    {'mo_name': 'MO/2', 'sala': 'Sala 1', 'especie': 'Arándano', 'product_name': 'Proceso, IQF',
+     'fecha_inicio': '2026-01-05 22:00', 'fecha_termino': '2026-01-06 00:00',
+     'kg_pt': 500, 'kg_mp': 550, 'duracion_horas': 2, 'detenciones': 0, 'dotacion': 6, 'hh': 12},
+    {'mo_name': 'MO/3', 'sala': 'Sala 10', 'especie': 'Frambuesa', 'product_name': 'Proceso Block',
+     'fecha_inicio': '2026-01-06 12:00', 'fecha_termino': '',
+     'kg_pt': 800, 'kg_mp': 900, 'duracion_horas': 0, 'detenciones': 0, 'dotacion': 0, 'hh': 0},
+    {'mo_name': 'VLK/MO/4', 'sala': 'Sala Vilkun', 'especie': 'Arándano', 'product_name': 'Proceso Block',
+     'fecha_inicio': '2026-01-06 12:00', 'fecha_termino': '2026-01-06 13:00',
+     'kg_pt': 300, 'kg_mp': 320, 'duracion_horas': 1, 'detenciones': 0, 'dotacion': 4, 'hh': 4},
+    # Sin fecha de inicio: no entra al cubo
+    {'mo_name': 'MO/5', 'sala': 'Sala 1', 'especie': 'Arándano', 'product_name': 'Proceso, IQF',
+     'fecha_inicio': '', 'fecha_termino': '', 'kg_pt': 999, 'duracion_horas': 1},
+]
+
+
+@pytest.fixture
+def servicio(monkeypatch):
+    service = RendimientoService.__new__(RendimientoService)
+    service._cache = OdooCache()
+    service.llamadas = []
+
+    def get_dashboard_completo(fecha_inicio, fecha_fin, solo_terminadas=True):
+        service.llamadas.append((fecha_inicio, fecha_fin, solo_terminadas))
+        return {'mos': [dict(mo) for mo in MOS]}
+
+    service.get_dashboard_completo = get_dashboard_completo
+    monkeypatch.setattr(rendimiento_router, "RendimientoService", lambda **kwargs: service)
+    return service
+
+
+def _get(client, ruta="", **params):
+    resp = client.get(URL + ruta, params={**RANGO, **params})
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+
+def test_agrupa_por_sala_con_totales(client, servicio):
+    data = _get(client, agrupar_por="sala")
+
+    filas = {f['sala']: f for f in data['filas']}
+    assert list(filas) == ['Sala 1', 'Sala 10', 'Sala Vilkun']
+    assert filas['Sala 1']['kg_pt'] == 1500
+    assert filas['Sala 1']['ordenes'] == 2
+    assert filas['Sala 1']['kg_hora'] == 375
+    assert filas['Sala 1']['kg_hora_efectiva'] == pytest.approx(1500 / 3.5, abs=0.1)
+    assert filas['Sala 1']['dotacion_promedio'] == 8
+    assert filas['Sala 1']['hh'] == 32
+    # Sin duración: suma kg pero no horas ni KG/hora
+    assert filas['Sala 10']['kg_hora'] == 0
+    assert filas['Sala 10']['no_hechas'] == 1
+
+    assert data['totales']['ordenes'] == 4
+    assert data['totales']['kg_pt'] == 2600
+    assert data['dimensiones']['planta'] == ['Rio Futuro', 'Vilkun']
+    assert servicio.llamadas == [("2026-01-05", "2026-01-06", False)]
+
+
+def test_filtro_sala_es_exacto_y_turno_por_hora_chile(client, servicio):
+    data = _get(client, agrupar_por="periodo,turno", sala="Sala 1")
+
+    assert [(f['periodo'], f['turno']) for f in data['filas']] == [
+        ('2026-01-05', 'Día'), ('2026-01-05', 'Tarde')
+    ]
+    assert data['totales']['kg_pt'] == 1500
+
+
+def test_filtro_producto_repetible_con_comas(client, servicio):
+    uno = _get(client, agrupar_por="sala", producto="Proceso, IQF")
+    assert uno['totales']['ordenes'] == 2
+
+    ambos = _get(client, agrupar_por="sala", producto=["Proceso, IQF", "Proceso Block"], planta="Rio Futuro")
+    assert [f['sala'] for f in ambos['filas']] == ['Sala 1', 'Sala 10']
+
+
+def test_paginacion_de_filas(client, servicio):
+    data = _get(client, agrupar_por="sala", page=2, page_size=1)
+
+    assert [f['sala'] for f in data['filas']] == ['Sala 10']
+    assert data['total_filas'] == 3
+    assert data['total_pages'] == 3
+    # Los totales no dependen de la página
+    assert data['totales']['ordenes'] == 4
+
+
+def test_cubo_se_arma_una_vez_por_rango(client, servicio):
+    _get(client, agrupar_por="sala")
+    _get(client, agrupar_por="turno")
+    _get(client, "/mos")
+
+    assert len(servicio.llamadas) == 1
+
+
+def test_drill_down_mos_filtra_y_pagina(client, servicio):
+    tarde = _get(client, "/mos", turno="Tarde")
+    assert [m['mo_name'] for m in tarde['mos']] == ['MO/2']
+
+    pagina = _get(client, "/mos", page=2, page_size=3)
+    assert pagina['total'] == 4
+    assert pagina['total_pages'] == 2
+    assert [m['mo_name'] for m in pagina['mos']] == ['VLK/MO/4']
+    # Cada MO trae las dimensiones de su celda
+    assert pagina['mos'][0]['planta'] == 'Vilkun'
+    assert pagina['mos'][0]['periodo'] == '2026-01-06'
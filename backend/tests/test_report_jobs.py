@@ -0,0 +1,100 @@
+"""Tests de la cola de reportes (generador falso, artefactos en tmp_path)."""
+import hashlib
+import json
+import threading
+
+import pytest
+
+from backend.services import report_jobs
+
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def cola(monkeypatch, tmp_path):
+    report_jobs.stop_report_workers()
+    monkeypatch.setattr(report_jobs, "REPORT_JOBS_DIR", tmp_path)
+    monkeypatch.setattr(report_jobs, "_jobs", {})
+    monkeypatch.setattr(report_jobs, "_eventos", {})
+    liberar = threading.Event()
+    llamadas = []
+
+    def generador(username, password, params, progreso):
+        llamadas.append(params)
+        progreso(50, "Mitad")
+        liberar.wait(5)
+        if params.get("fallar"):
+            raise RuntimeError("Odoo no responde")
+        return f"{username}:{params['n']}".encode(), f"r{params['n']}.txt", "text/plain"
+
+    monkeypatch.setitem(report_jobs.GENERADORES, "prueba", (generador, 60))
+    report_jobs.start_report_workers()
+    yield liberar, llamadas
+    liberar.set()
+    report_jobs.stop_report_workers()
+
+
+def test_deduplica_y_entrega_desde_disco(cola):
+    liberar, llamadas = cola
+    job = report_jobs.enviar("prueba", "ana", "clave", {"n": 1, "password": "clave"})
+    otro = report_jobs.enviar("prueba", "ana", "clave", {"n": 1})
+    assert otro["job_id"] == job["job_id"]
+    assert "_password" not in job and "_params" not in job
+
+    en_curso = report_jobs.esperar(job["job_id"], 0.2)
+    assert en_curso["estado"] == "procesando" and en_curso["progreso"] == 50
+
+    liberar.set()
+    listo = report_jobs.esperar(job["job_id"], 5)
+    assert listo["estado"] == "listo" and listo["filename"] == "r1.txt"
+    path, filename, media_type = report_jobs.artefacto(job["job_id"])
+    assert path.read_bytes() == b"ana:1" and media_type == "text/plain"
+
+    # Tras un reinicio el estado se reconstruye desde el artefacto y no se regenera
+    report_jobs._jobs.clear()
+    assert report_jobs.estado(job["job_id"])["estado"] == "listo"
+    assert report_jobs.enviar("prueba", "ana", "clave", {"n": 1})["estado"] == "listo"
+    assert len(llamadas) == 1
+    # Credenciales distintas no comparten el archivo
+    assert report_jobs.enviar("prueba", "luis", "otra", {"n": 1})["job_id"] != job["job_id"]
+
+
+def test_error_y_cola_llena(cola, monkeypatch):
+    liberar, _ = cola
+    liberar.set()
+    job = report_jobs.enviar("prueba", "ana", "clave", {"n": 2, "fallar": True})
+    fallido = report_jobs.esperar(job["job_id"], 5)
+    assert fallido["estado"] == "error" and "Odoo no responde" in fallido["error"]
+    assert report_jobs.artefacto(job["job_id"]) is None
+
+    with pytest.raises(ValueError):
+        report_jobs.enviar("no_existe", "ana", "clave", {})
+    monkeypatch.setattr(report_jobs, "MAX_PENDIENTES", 0)
+    with pytest.raises(report_jobs.ColaLlenaError):
+        report_jobs.enviar("prueba", "ana", "clave", {"n": 3})
+
+
+def test_forzar_regenera_el_artefacto_vigente(cola):
+    liberar, llamadas = cola
+    liberar.set()
+    job = report_jobs.enviar("prueba", "ana", "clave", {"n": 4})
+    report_jobs.esperar(job["job_id"], 5)
+    assert report_jobs.enviar("prueba", "ana", "clave", {"n": 4})["mensaje"] == "Listo (caché)"
+
+    forzado = report_jobs.enviar("prueba", "ana", "clave", {"n": 4}, forzar=True)
+    assert forzado["job_id"] == job["job_id"] and forzado["estado"] in ("en_cola", "procesando")
+    assert report_jobs.esperar(job["job_id"], 5)["estado"] == "listo"
+    assert len(llamadas) == 2
+
+
+def test_job_id_depende_de_la_clave_del_servidor(monkeypatch):
+    canonico = json.dumps({"tipo": "prueba", "usuario": "ana", "clave": "clave", "params": {"n": 1}},
+                          sort_keys=True, ensure_ascii=False, default=str)
+    job_id = report_jobs._job_id("prueba", "ana", "clave", {"n": 1})
+    # Sin la clave del servidor no se puede reproducir el id desde las credenciales
+    assert job_id != hashlib.sha256(canonico.encode("utf-8")).hexdigest()
+    assert len(job_id) == 64
+
+    monkeypatch.setattr(report_jobs, "REPORT_JOBS_SECRET_KEY", "otra-clave")
+    assert report_jobs._job_id("prueba", "ana", "clave", {"n": 1}) != job_id
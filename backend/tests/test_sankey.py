@@ -0,0 +1,104 @@
+"""Tests del motor Sankey: presupuesto de nodos por grano y drill-down con expand."""
+import pytest
+
+from backend.services.containers.sankey import GRAINS, MAX_MAX_NODES, build_sankey
+
+
+pytestmark = pytest.mark.unit
+
+
+def _base_cadena(procesos=200, proveedores=30, clientes=30):
+    """Proveedores → pallet → proceso → pallet → ... → cliente, con salas y lotes."""
+    edges = {}
+    base = {"edges": edges, "proveedores": {}, "clientes": {}, "pallets": {}, "lotes": {},
+            "procesos": {}, "move_lines": 0}
+
+    def link(a, b, q):
+        edges[(a, b)] = edges.get((a, b), 0) + q
+
+    pkg = 0
+    for s in range(proveedores):
+        base["proveedores"][s] = f"Prov {s}"
+        pkg += 1
+        base["pallets"][pkg] = {"name": f"PK{pkg}", "products": {"Arándano": 100.0 + s}}
+        link(("SUPP", s), ("PKG", pkg, pkg % 7), 100.0 + s)
+        link(("PKG", pkg, pkg % 7), ("PROC", "MO/0"), 100.0 + s)
+    for r in range(procesos):
+        ref = f"MO/{r}"
+        base["procesos"][ref] = {"date": "2026-01-01", "sala": f"Sala {r % 5}"}
+        pkg += 1
+        base["pallets"][pkg] = {"name": f"PK{pkg}", "products": {"Arándano": 90.0}}
+        link(("PROC", ref), ("PKG", pkg, pkg % 7), 90.0)
+        # Cada proceso manda la mayor parte al siguiente y otra parte a un cliente
+        if r + 1 < procesos:
+            link(("PKG", pkg, pkg % 7), ("PROC", f"MO/{r + 1}"), 60.0)
+        c = r % clientes
+        base["clientes"][c] = f"Cliente {c}"
+        link(("PKG", pkg, pkg % 7), ("CUST", c), 30.0)
+    for lot in range(7):
+        base["lotes"][lot] = f"LOTE-{lot}"
+    return base
+
+
+def _drills(resultado, tipo):
+    return [n["detail"]["drill"] for n in resultado["nodes"]
+            if n["detail"]["type"] == tipo and "drill" in n["detail"]]
+
+
+@pytest.mark.parametrize("grain", list(GRAINS))
+@pytest.mark.parametrize("max_nodes", [10, 20, 80])
+def test_cadena_larga_respeta_max_nodes_en_todos_los_granos(grain, max_nodes):
+    resultado = build_sankey(_base_cadena(), grain, max_nodes)
+
+    assert len(resultado["nodes"]) <= max_nodes
+    # Los "Otros" cuentan contra el presupuesto y cada tipo tiene pocos
+    otros = [n["detail"] for n in resultado["nodes"] if n["detail"]["type"] == "otros"]
+    for tipo in {d["tipo"] for d in otros}:
+        assert sum(1 for d in otros if d["tipo"] == tipo) <= 2
+    indices = range(len(resultado["nodes"]))
+    assert all(l["source"] in indices and l["target"] in indices for l in resultado["links"])
+
+
+def test_grafo_chico_no_colapsa():
+    base = _base_cadena(procesos=3, proveedores=2, clientes=2)
+
+    resultado = build_sankey(base, "pallet", MAX_MAX_NODES)
+
+    assert resultado["meta"]["nodos_colapsados"] == 0
+    assert len(resultado["nodes"]) == resultado["meta"]["nodos_sin_colapsar"]
+
+
+def test_expand_otros_muestra_mas_nodos_de_ese_tipo_con_tope():
+    base = _base_cadena()
+    inicial = build_sankey(base, "process", 20)
+    drill = next(d for d in _drills(inicial, "otros") if d == "OTROS:PROC")
+
+    abierto = build_sankey(base, "process", 20, expand=[drill])
+
+    procesos = lambda r: sum(1 for n in r["nodes"] if n["detail"]["type"] == "process")
+    assert procesos(abierto) > procesos(inicial)
+    assert len(abierto["nodes"]) <= 20 + 20 // 2
+    assert abierto["meta"]["expand"] == ["OTROS:PROC"]
+
+
+def test_expand_sala_abre_sus_procesos():
+    base = _base_cadena(procesos=10, proveedores=3, clientes=3)
+    inicial = build_sankey(base, "sala", 80)
+    assert not any(n["detail"]["type"] == "process" for n in inicial["nodes"])
+
+    abierto = build_sankey(base, "sala", 80, expand=["SALA:Sala 0"])
+
+    refs = {n["detail"]["ref"] for n in abierto["nodes"] if n["detail"]["type"] == "process"}
+    assert refs == {"MO/0", "MO/5"}
+    assert "SALA:Sala 0" not in _drills(abierto, "sala")
+
+
+def test_expand_proceso_muestra_sus_pallets():
+    base = _base_cadena(procesos=10, proveedores=3, clientes=3)
+
+    abierto = build_sankey(base, "process", 80, expand=["PROC:MO/4"])
+
+    pallets = {n["label"] for n in abierto["nodes"] if n["detail"]["type"] == "pallet"}
+    # Pallet de entrada (salida de MO/3) y pallet de salida de MO/4
+    assert len(pallets) == 2
+    assert len(abierto["nodes"]) <= 80
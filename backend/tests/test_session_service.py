@@ -0,0 +1,162 @@
+"""Tests del store SQLite de sesiones: caché, actividad diferida, expiración y barrido (base en tmp_path)."""
+import json
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.services import session_service
+from backend.services.session_service import SessionService
+
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    monkeypatch.setattr(session_service, "SESSIONS_DB", tmp_path / "sessions.db")
+    monkeypatch.setattr(session_service, "SESSIONS_FILE", tmp_path / "sessions.json")
+    monkeypatch.setattr(session_service, "_schema_initialized", False)
+    session_service._cache.clear()
+    session_service._pending_activity.clear()
+    yield tmp_path
+    SessionService.stop_background_sweep()
+    session_service._cache.clear()
+    session_service._pending_activity.clear()
+
+
+def _fila(session_id):
+    session_service._ensure_schema()
+    conn = session_service._get_connection()
+    try:
+        row = conn.execute("SELECT * FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row else None
+
+
+def _actualizar(session_id, **valores):
+    """Modifica la fila directo en SQLite (sin pasar por el caché)."""
+    conn = session_service._get_connection()
+    try:
+        conn.execute(
+            f"UPDATE sessions SET {', '.join(f'{k} = ?' for k in valores)} WHERE session_id = ?",
+            (*valores.values(), session_id),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _session_id(token):
+    return session_service._verify_token(token)["session_id"]
+
+
+def test_crea_valida_y_recupera_credenciales(store):
+    token = SessionService.create_session("ana@riofuturo.cl", 7, "api-key-secreta")
+
+    sesion = SessionService.validate_session(token)
+    assert sesion["username"] == "ana@riofuturo.cl" and sesion["uid"] == 7
+    assert SessionService.get_odoo_credentials(token) == ("ana@riofuturo.cl", "api-key-secreta")
+    assert _fila(_session_id(token))["encrypted_password"] != "api-key-secreta"
+    assert SessionService.validate_session(token + "x") is None
+
+
+def test_cache_de_ttl_corto_y_logout_inmediato(store, monkeypatch):
+    token = SessionService.create_session("ana", 1, "clave")
+    session_id = _session_id(token)
+    vencida = (datetime.now() - timedelta(minutes=1)).isoformat()
+
+    # Dentro del TTL se responde desde el caché aunque la fila cambie
+    _actualizar(session_id, expires_at=vencida)
+    assert SessionService.validate_session(token) is not None
+
+    # Al vencer el TTL se relee SQLite y la expiración se aplica
+    monkeypatch.setattr(session_service, "CACHE_TTL_SECONDS", 0)
+    assert SessionService.validate_session(token) is None
+
+    # El logout invalida el caché en el acto, sin esperar el TTL
+    monkeypatch.setattr(session_service, "CACHE_TTL_SECONDS", 60)
+    otro = SessionService.create_session("luis", 2, "clave")
+    assert SessionService.validate_session(otro) is not None
+    assert SessionService.invalidate_session(otro) is True
+    assert SessionService.validate_session(otro) is None
+    assert _fila(_session_id(otro)) is None
+
+
+def test_actividad_se_persiste_diferida(store, monkeypatch):
+    token = SessionService.create_session("ana", 1, "clave")
+    session_id = _session_id(token)
+    antigua = (datetime.now() - timedelta(seconds=30)).isoformat()
+    _actualizar(session_id, last_activity=antigua)
+    session_service._cache.clear()
+
+    assert SessionService.refresh_activity(token) is True
+    # Visible al validar, pero todavía no escrita en SQLite
+    assert SessionService.validate_session(token)["last_activity"] > antigua
+    assert _fila(session_id)["last_activity"] == antigua
+
+    assert session_service._flush_activity() == 1
+    assert _fila(session_id)["last_activity"] > antigua
+    assert session_service._pending_activity == {}
+
+    # Si lo persistido quedó muy atrás (sin hilo de barrido) se escribe en el acto
+    muy_antigua = (datetime.now() - timedelta(minutes=10)).isoformat()
+    _actualizar(session_id, last_activity=muy_antigua)
+    session_service._cache.clear()
+    SessionService.refresh_activity(token)
+    assert _fila(session_id)["last_activity"] > muy_antigua
+
+
+def test_inactividad_y_barrido(store):
+    activa = SessionService.create_session("ana", 1, "clave")
+    inactiva = SessionService.create_session("luis", 2, "clave")
+    vencida = SessionService.create_session("eva", 3, "clave")
+    hace_una_hora = (datetime.now() - timedelta(hours=1)).isoformat()
+    _actualizar(_session_id(inactiva), last_activity=hace_una_hora)
+    _actualizar(_session_id(vencida), expires_at=hace_una_hora)
+    session_service._cache.clear()
+
+    assert SessionService.validate_session(inactiva) is None
+    assert SessionService.cleanup_expired_sessions() == 2
+    assert _fila(_session_id(activa)) is not None
+    assert _fila(_session_id(inactiva)) is None and _fila(_session_id(vencida)) is None
+    assert _session_id(inactiva) not in session_service._cache
+
+
+def test_hilo_de_barrido_persiste_y_elimina(store, monkeypatch):
+    monkeypatch.setattr(session_service, "ACTIVITY_FLUSH_SECONDS", 0.05)
+    monkeypatch.setattr(session_service, "SWEEP_INTERVAL_SECONDS", 0)
+    token = SessionService.create_session("ana", 1, "clave")
+    vencida = SessionService.create_session("eva", 3, "clave")
+    _actualizar(_session_id(vencida), expires_at=(datetime.now() - timedelta(minutes=1)).isoformat())
+    SessionService.refresh_activity(token)
+
+    SessionService.start_background_sweep()
+    limite = time.monotonic() + 5
+    while _fila(_session_id(vencida)) is not None and time.monotonic() < limite:
+        time.sleep(0.05)
+    SessionService.stop_background_sweep()
+
+    assert _fila(_session_id(vencida)) is None
+    assert session_service._pending_activity == {}
+    assert SessionService.validate_session(token) is not None
+
+
+def test_migra_sessions_json_una_sola_vez(store):
+    ahora = datetime.now()
+    legado = {
+        "abc": {"session_id": "abc", "username": "ana", "uid": 1, "created_at": ahora.isoformat(),
+                "last_activity": ahora.isoformat(), "expires_at": (ahora + timedelta(hours=1)).isoformat(),
+                "encrypted_password": "x"},
+        "incompleta": {"session_id": "incompleta", "username": "luis"},
+    }
+    (store / "sessions.json").write_text(json.dumps(legado))
+
+    # La primera conexión crea el schema y migra las sesiones completas
+    assert _fila("abc")["username"] == "ana" and _fila("incompleta") is None
+
+    SessionService.invalidate_session(session_service._generate_token({"session_id": "abc"}))
+    session_service._schema_initialized = False  # reinicio: no se vuelve a importar
+    session_service._ensure_schema()
+    assert _fila("abc") is None
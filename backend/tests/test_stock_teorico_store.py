@@ -0,0 +1,74 @@
+"""Tests de las particiones del análisis de stock teórico (Odoo falso, store en tmp_path)."""
+import threading
+from datetime import date
+
+import pytest
+
+from backend.cache import get_cache
+from backend.services import analisis_stock_teorico_service as modulo
+from backend.services import stock_teorico_store
+
+
+pytestmark = pytest.mark.unit
+
+
+class OdooFalso:
+    username = "ana"
+    password = "clave"
+    url = "http://odoo"
+    db = "test"
+
+    def __init__(self, **kwargs):
+        pass
+
+
+@pytest.fixture
+def servicio(monkeypatch, tmp_path):
+    monkeypatch.setattr(stock_teorico_store, "STORE_DB", tmp_path / "stock_teorico.db")
+    monkeypatch.setattr(stock_teorico_store, "_schema_initialized", False)
+    monkeypatch.setattr(modulo, "OdooClient", OdooFalso)
+    get_cache().invalidate_prefix("stock_teorico_particion")
+    consultas = []
+    lock = threading.Lock()
+
+    def compras(self, desde, hasta):
+        with lock:
+            consultas.append((desde, hasta))
+        return [{'tipo_fruta': 'Arándano', 'manejo': 'Orgánico', 'kg': 100.0, 'monto': 1000.0}]
+
+    def ventas(self, desde, hasta):
+        return [{'tipo_fruta': 'Arándano', 'manejo': 'Orgánico', 'kg': 60.0, 'monto': 900.0}]
+
+    monkeypatch.setattr(modulo.AnalisisStockTeoricoService, "_get_compras_por_tipo_manejo", compras)
+    monkeypatch.setattr(modulo.AnalisisStockTeoricoService, "_get_ventas_por_tipo_manejo", ventas)
+    return modulo.AnalisisStockTeoricoService(OdooFalso()), consultas
+
+
+def test_temporadas_cerradas_se_calculan_una_vez(servicio):
+    service, consultas = servicio
+    anio = date.today().year
+    anios = [anio - 3, anio - 2]
+
+    primero = service.get_analisis_multi_anual(anios)
+    assert sorted(consultas) == [(f"{a - 1}-11-01", f"{a}-10-31") for a in anios]
+    assert primero['por_anio'][anio - 2]['datos'][0]['merma_kg'] == 40.0
+
+    consultas.clear()
+    segundo = service.get_analisis_multi_anual(anios)
+    assert consultas == []
+    assert segundo['resumen_general'] == primero['resumen_general']
+
+
+def test_temporada_abierta_se_parte_por_mes(servicio):
+    service, consultas = servicio
+    hoy = date.today()
+    particiones = service._particiones(f"{hoy.year - 1}-{hoy.month:02d}-01", hoy.isoformat())
+    assert particiones[-1] == (f"{hoy.year}-{hoy.month:02d}-01", hoy.isoformat())
+    assert all(desde[:7] == hasta[:7] for desde, hasta in particiones)
+
+    agregados = service._get_agregados_rangos([(particiones[0][0], hoy.isoformat())])
+    compras, _ = agregados[(particiones[0][0], hoy.isoformat())]
+    assert len(compras) == len(particiones)
+    # Los meses ya cerrados quedaron en el store
+    assert stock_teorico_store.obtener(*particiones[0]) is not None
+    assert stock_teorico_store.obtener(*particiones[-1]) is None
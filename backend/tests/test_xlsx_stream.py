@@ -0,0 +1,46 @@
+"""Tests del escritor .xlsx en streaming (se relee el archivo con openpyxl)."""
+import io
+
+import openpyxl
+import pytest
+
+from backend.services import xlsx_stream
+from backend.services.xlsx_stream import Columna, Hoja, stream_xlsx
+
+
+pytestmark = pytest.mark.unit
+
+
+def test_stream_xlsx_roundtrip_con_formatos_por_columna(monkeypatch):
+    monkeypatch.setattr(xlsx_stream, "CHUNK_BYTES", 1024)
+    monkeypatch.setattr(xlsx_stream, "FILAS_POR_ESCRITURA", 50)
+    producidas = []
+
+    def filas():
+        for i in range(2000):
+            producidas.append(i)
+            yield [f"RF/IN/{i:05d}", "Agrícola <Sur> & \"Cía\"\x01", i * 1.5, "" if i % 2 else 3]
+
+    columnas = [Columna("Albarán"), Columna("Productor"), Columna("Kg", "#,##0.00"), Columna("Bandejas", "#,##0")]
+    resumen = Hoja("Resumen", [Columna("Filas", "#,##0")], ([len(producidas)] for _ in range(1)),
+                   autofiltro=False, congelar_encabezado=False)
+
+    gen = stream_xlsx([Hoja("Detalle", columnas, filas()), resumen])
+    primero = next(gen)
+    # El primer trozo sale antes de haber producido todas las filas
+    assert primero and len(producidas) < 2000
+    data = primero + b"".join(gen)
+
+    wb = openpyxl.load_workbook(io.BytesIO(data))
+    ws = wb["Detalle"]
+    assert ws.max_row == 2001
+    assert ws.freeze_panes == "A2"
+    assert ws.auto_filter.ref == "A1:D2001"
+    assert ws["A1"].font.b
+    assert ws["B2"].value == "Agrícola <Sur> & \"Cía\""
+    assert ws["C3"].value == 1.5 and ws["C3"].number_format == "#,##0.00"
+    assert ws["D2"].value == 3 and ws["D2"].number_format == "#,##0"
+    assert ws["D3"].value is None
+    assert ws.column_dimensions["A"].width == len("RF/IN/00000") + 2
+    # La hoja de resumen se escribe después y ve el total acumulado
+    assert wb["Resumen"]["A2"].value == 2000
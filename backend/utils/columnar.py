@@ -0,0 +1,57 @@
+"""
+Negociación de contenido JSON / Arrow IPC para endpoints con payloads grandes.
+
+El cliente pide Arrow con `Accept: application/vnd.apache.arrow.stream`
+(o `?format=arrow`); si no, o si pyarrow no está instalado, se responde JSON
+igual que antes.
+"""
+from typing import Any, Dict, List, Optional, Union
+
+import pandas as pd
+from fastapi import Request
+from fastapi.responses import Response
+
+from shared.columnar import ARROW_DISPONIBLE, ARROW_STREAM_MEDIA_TYPE, to_arrow_ipc
+
+
+def wants_arrow(request: Optional[Request]) -> bool:
+    """True si el cliente acepta Arrow IPC."""
+    if request is None or not ARROW_DISPONIBLE:
+        return False
+    if request.query_params.get("format") == "arrow":
+        return True
+    return ARROW_STREAM_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def arrow_or_json(request: Optional[Request], data: Any, tabla: Optional[str] = None) -> Any:
+    """
+    Responde Arrow IPC si el cliente lo pide; si no, retorna `data` tal cual (JSON).
+
+    Args:
+        request: Request de FastAPI
+        data: Lista de registros, DataFrame, o dict que contiene la tabla
+        tabla: Clave de `data` con la lista de registros (si `data` es dict).
+            El resto del dict viaja en la metadata del stream.
+    """
+    if not wants_arrow(request):
+        if isinstance(data, pd.DataFrame):
+            return data.to_dict(orient='records')
+        if tabla is not None and isinstance(data.get(tabla), pd.DataFrame):
+            return {**data, tabla: data[tabla].to_dict(orient='records')}
+        return data
+
+    extra: Dict = {}
+    registros: Union[List[Dict], pd.DataFrame] = data
+    if tabla is not None:
+        extra = {k: v for k, v in data.items() if k != tabla}
+        registros = data.get(tabla)
+        if registros is None:
+            registros = []
+
+    return Response(
+        content=to_arrow_ipc(registros, extra),
+        media_type=ARROW_STREAM_MEDIA_TYPE,
+        # El stream ya va comprimido (LZ4); Content-Encoding evita que
+        # GZipMiddleware lo vuelva a comprimir
+        headers={"Vary": "Accept", "Content-Encoding": "identity"},
+    )
@@ -117,11 +117,14 @@ def _load_dev_providers() -> list:
         return []
 
 
-def _provider_download(attachment_id: int) -> tuple[bytes, str, str]:
+def _provider_download(attachment_id: int, thumb: int | None = None) -> tuple[bytes, str, str]:
     token = st.session_state.get("prod_provider_token")
+    params = {"token": token}
+    if thumb:
+        params["thumb"] = thumb
     response = httpx.get(
         f"{API_URL}/api/v1/provider-portal/attachments/{attachment_id}",
-        params={"token": token},
+        params=params,
         timeout=120.0,
     )
     response.raise_for_status()
@@ -130,11 +133,14 @@ def _provider_download(attachment_id: int) -> tuple[bytes, str, str]:
     return response.content, filename.strip('"'), response.headers.get("Content-Type", "application/octet-stream")
 
 
-def _provider_download_qc_photo(qc_id: int, field_name: str) -> tuple[bytes, str, str]:
+def _provider_download_qc_photo(qc_id: int, field_name: str, thumb: int | None = None) -> tuple[bytes, str, str]:
     token = st.session_state.get("prod_provider_token")
+    params = {"token": token}
+    if thumb:
+        params["thumb"] = thumb
     response = httpx.get(
         f"{API_URL}/api/v1/provider-portal/qc-photo/{qc_id}/{field_name}",
-        params={"token": token},
+        params=params,
         timeout=120.0,
     )
     response.raise_for_status()
@@ -491,10 +497,13 @@ with tab2:
                 for idx, foto in enumerate(fotos[:12]):
                     with cols[idx % 2]:
                         try:
+                            # Miniaturas: el original se descarga solo al abrir el adjunto
                             if foto.get("source") == "quality_check_binary":
-                                content, filename, _ = _provider_download_qc_photo(int(foto["qc_id"]), str(foto["field"]))
+                                content, filename, _ = _provider_download_qc_photo(
+                                    int(foto["qc_id"]), str(foto["field"]), thumb=640
+                                )
                             else:
-                                content, filename, _ = _provider_download(foto["id"])
+                                content, filename, _ = _provider_download(foto["id"], thumb=640)
                             st.image(content, caption=filename, use_container_width=True)
                         except Exception as exc:
                             st.warning(f"No se pudo cargar foto: {exc}")
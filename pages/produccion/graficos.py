@@ -6,6 +6,8 @@ import pandas as pd
 import altair as alt
 from datetime import datetime, timedelta
 
+from .shared import columna_texto
+
 
 def fmt_numero(valor, decimales=0):
     """Formatea número con separador de miles."""
@@ -352,7 +354,62 @@ def grafico_tuneles_consolidado(mos_data: list, agrupacion: str = "Semana"):
         st.dataframe(resumen, hide_index=True, use_container_width=True)
 
 
-def grafico_congelado_semanal(mos_data: list, agrupacion: str = "Semana", salas_data: list = None):
+def _parsear_fecha_mo(fecha_str):
+    """Fecha de una MO: ISO 8601 (con 'Z') o al menos 'YYYY-MM-DD'. None si no se puede leer."""
+    if not fecha_str:
+        return None
+    try:
+        return datetime.fromisoformat(fecha_str.replace('Z', '+00:00'))
+    except:
+        try:
+            return datetime.strptime(fecha_str[:10], '%Y-%m-%d')
+        except:
+            return None
+
+
+def _preparar_mos_graficos(df_mos: pd.DataFrame, agrupacion: str) -> pd.DataFrame:
+    """
+    Columnas normalizadas de las MOs para los gráficos por sala/túnel:
+    sala, sala_tipo, product_name (texto), fecha (datetime o None), kg_pt,
+    rendimiento y el período (Periodo, sort_year, sort_value).
+    """
+    df = pd.DataFrame({
+        'sala': columna_texto(df_mos, 'sala').astype(str).str.strip(),
+        'sala_tipo': columna_texto(df_mos, 'sala_tipo').astype(str).str.strip(),
+        'product_name': columna_texto(df_mos, 'product_name').astype(str).str.strip(),
+        'fecha': columna_texto(df_mos, 'fecha', 'fecha_inicio', 'fecha_fin').map(_parsear_fecha_mo),
+    }, index=df_mos.index)
+    for medida in ('kg_pt', 'rendimiento'):
+        df[medida] = (pd.to_numeric(df_mos[medida], errors='coerce').fillna(0)
+                      if medida in df_mos.columns else 0.0)
+    df['es_tunel_continuo'] = (df['product_name'].str.contains('[1.4]', regex=False)
+                               & df['product_name'].str.upper().str.contains('TÚNEL CONTÍNUO', regex=False))
+    sala_lower = df['sala'].str.lower()
+    df['tiene_tunel'] = sala_lower.str.contains('tunel', regex=False) | sala_lower.str.contains('túnel', regex=False)
+    
+    periodos = df['fecha'].map(lambda f: None if pd.isna(f) else _agrupar_por_periodo(f, agrupacion))
+    for i, columna in enumerate(('Periodo', 'sort_year', 'sort_value')):
+        df[columna] = periodos.map(lambda p: None if p is None else p[i])
+    return df
+
+
+def _debug_mos(mos_data: pd.DataFrame, df: pd.DataFrame):
+    """Expander con las salas encontradas cuando un gráfico no tiene datos."""
+    with st.expander("🔍 Debug: Ver datos disponibles"):
+        st.write(f"**Total de MOs recibidos:** {len(mos_data)}")
+        salas_unicas = sorted(set(df['sala'] + ' (' + df['sala_tipo'] + ')'))
+        st.write(f"**Total de salas diferentes:** {len(salas_unicas)}")
+        st.write("**Salas encontradas:**")
+        for sala in salas_unicas:
+            st.write(f"- '{sala}'")
+        
+        if not mos_data.empty:
+            st.write("---")
+            st.write("**Primer MO de ejemplo:**")
+            st.json(mos_data.iloc[0].to_json(default_handler=str))
+
+
+def grafico_congelado_semanal(mos_data: pd.DataFrame, agrupacion: str = "Semana", salas_data: list = None):
 
     """
     Gráficos de barras separados por túnel de congelado.
@@ -360,118 +417,48 @@ def grafico_congelado_semanal(mos_data: list, agrupacion: str = "Semana", salas_
     Crea un gráfico independiente por cada túnel con sus KPIs.
     
     Args:
-        mos_data: Lista de órdenes de fabricación (MOs)
+        mos_data: DataFrame de órdenes de fabricación (MOs)
         agrupacion: "Día", "Semana" o "Mes"
         salas_data: Lista con datos agregados de KPIs por sala/túnel
     """
-    if not mos_data:
+    if mos_data is None or mos_data.empty:
         st.info("No hay datos de congelado disponibles")
         return
     
     periodo_label = {"Día": "Diario", "Semana": "Semana ISO", "Mes": "Mes"}.get(agrupacion, "Semana ISO")
     
-    # Preparar datos por túnel
-    datos_por_tunel = {}
-    salas_encontradas = set()
+    df_mos = _preparar_mos_graficos(mos_data, agrupacion)
+    
+    # SOLO túneles de congelado - filtro estricto (o Túnel Continuo por nombre de producto)
+    es_tunel_estatico = (df_mos['sala_tipo'] == 'CONGELADO') & df_mos['tiene_tunel']
+    df_tuneles = df_mos[
+        (es_tunel_estatico | df_mos['es_tunel_continuo'])
+        & df_mos['fecha'].notna()
+        & (df_mos['kg_pt'] > 0)
+    ].assign(
+        tunel=lambda d: d['sala'].where(~d['es_tunel_continuo'], 'Tunel Continuo'),
+        Kg=lambda d: d['kg_pt'],
+    )
     
-    for mo in mos_data:
-        sala = mo.get('sala', '').strip()
-        sala_tipo = mo.get('sala_tipo', '').strip()
-        product_name = mo.get('product_name', '').strip()
-        salas_encontradas.add(f"{sala} ({sala_tipo})")
-        
-        # CASO ESPECIAL: Túnel Continuo por nombre de producto
-        es_tunel_continuo = '[1.4]' in product_name and 'TÚNEL CONTÍNUO' in product_name.upper()
-        
-        # SOLO túneles de congelado - filtro estricto
-        sala_lower = sala.lower()
-        es_tunel_estatico = sala_tipo == 'CONGELADO' and ('tunel' in sala_lower or 'túnel' in sala_lower)
-        
-        if not (es_tunel_estatico or es_tunel_continuo):
-            continue
-        
-        # Usar nombre específico para túnel continuo
-        if es_tunel_continuo:
-            tunel_nombre = 'Tunel Continuo'
-        else:
-            tunel_nombre = sala
-        
-        # Obtener fecha
-        fecha_str = mo.get('fecha') or mo.get('fecha_inicio') or mo.get('fecha_fin')
-        if not fecha_str:
-            continue
-        
-        try:
-            fecha = datetime.fromisoformat(fecha_str.replace('Z', '+00:00'))
-        except:
-            try:
-                fecha = datetime.strptime(fecha_str[:10], '%Y-%m-%d')
-            except:
-                continue
-        
-        # Obtener período de agrupación
-        periodo_label_str, sort_year, sort_value = _agrupar_por_periodo(fecha, agrupacion)
-        
-        # Obtener kg procesados (salida)
-        kg_pt = mo.get('kg_pt', 0) or 0
-        
-        if kg_pt > 0:
-            if tunel_nombre not in datos_por_tunel:
-                datos_por_tunel[tunel_nombre] = []
-            
-            datos_por_tunel[tunel_nombre].append({
-                'Periodo': periodo_label_str,
-                'Kg': kg_pt,
-                'sort_year': sort_year,
-                'sort_value': sort_value
-            })
-    
-    if not datos_por_tunel:
+    if df_tuneles.empty:
         st.warning(f"No se encontraron datos de túneles de congelado en el período seleccionado")
-        with st.expander("🔍 Debug: Ver datos disponibles"):
-            st.write(f"**Total de MOs recibidos:** {len(mos_data)}")
-            salas_unicas = sorted(list(salas_encontradas))
-            st.write(f"**Total de salas diferentes:** {len(salas_unicas)}")
-            st.write("**Salas encontradas:**")
-            for sala in salas_unicas:
-                st.write(f"- '{sala}'")
-            
-            if mos_data:
-                st.write("---")
-                st.write("**Primer MO de ejemplo:**")
-                primer_mo = mos_data[0]
-                st.json(primer_mo)
+        _debug_mos(mos_data, df_mos)
         return
     
+    # Rango de fechas del dataset
+    fechas_mo = df_mos['fecha'].dropna()
+    
     # Crear un gráfico por cada túnel
-    for tunel_nombre in sorted(datos_por_tunel.keys()):
+    for tunel_nombre, df in sorted(df_tuneles.groupby('tunel')):
         st.markdown(f"#### ❄️ {tunel_nombre}")
         
-        datos_tunel = datos_por_tunel[tunel_nombre]
-        df = pd.DataFrame(datos_tunel)
-        
         # Agrupar por período
         df_grouped = df.groupby(['Periodo', 'sort_year', 'sort_value'], as_index=False).agg({'Kg': 'sum'})
         
-        # Obtener rango de fechas del dataset
-        fechas_mo = []
-        for mo in mos_data:
-            fecha_str = mo.get('fecha') or mo.get('fecha_inicio') or mo.get('fecha_fin')
-            if fecha_str:
-                try:
-                    fecha = datetime.fromisoformat(fecha_str.replace('Z', '+00:00'))
-                    fechas_mo.append(fecha)
-                except:
-                    try:
-                        fecha = datetime.strptime(fecha_str[:10], '%Y-%m-%d')
-                        fechas_mo.append(fecha)
-                    except:
-                        pass
-        
         # Generar todos los períodos (incluyendo los que no tienen datos)
-        if fechas_mo:
-            fecha_min = min(fechas_mo)
-            fecha_max = max(fechas_mo)
+        if not fechas_mo.empty:
+            fecha_min = fechas_mo.min()
+            fecha_max = fechas_mo.max()
             todos_periodos = _generar_todos_los_periodos(fecha_min, fecha_max, agrupacion)
             
             # Crear DataFrame con todos los períodos
@@ -544,137 +531,70 @@ def grafico_congelado_semanal(mos_data: list, agrupacion: str = "Semana", salas_
         st.markdown("---")  # Separador entre túneles
 
 
-def grafico_vaciado_por_sala(mos_data: list, agrupacion: str = "Semana", salas_data: list = None):
+def grafico_vaciado_por_sala(mos_data: pd.DataFrame, agrupacion: str = "Semana", salas_data: list = None):
     """
     Gráficos de barras separados por sala con desglose de líneas.
     Muestra rendimiento individual de cada línea dentro de su sala con sus KPIs.
     Crea un gráfico independiente por cada sala.
     
     Args:
-        mos_data: Lista de órdenes de fabricación (MOs)
+        mos_data: DataFrame de órdenes de fabricación (MOs)
         agrupacion: "Día", "Semana" o "Mes"
         salas_data: Lista con datos agregados de KPIs por sala
     """
-    if not mos_data:
+    if mos_data is None or mos_data.empty:
         st.info("No hay datos de proceso disponibles")
         return
     
     periodo_label = {"Día": "Día", "Semana": "Semana ISO", "Mes": "Mes"}.get(agrupacion, "Semana ISO")
     
-    # Preparar datos
-    datos_por_sala = {}
-    salas_encontradas = set()
+    df_mos = _preparar_mos_graficos(mos_data, agrupacion)
     
-    for mo in mos_data:
-        sala_completa = mo.get('sala', '').strip()
-        sala_tipo = mo.get('sala_tipo', '').strip()
-        product_name = mo.get('product_name', '').strip()
-        salas_encontradas.add(f"{sala_completa} ({sala_tipo})")
-        
-        # EXCLUIR túnel continuo (ya está en congelado)
-        es_tunel_continuo = '[1.4]' in product_name and 'TÚNEL CONTÍNUO' in product_name.upper()
-        if es_tunel_continuo:
-            continue
-        
-        # SOLO salas de proceso - filtro estricto
-        sala_lower = sala_completa.lower()
-        tiene_tunel = 'tunel' in sala_lower or 'túnel' in sala_lower
-        
-        if sala_tipo != 'PROCESO' or tiene_tunel or not sala_completa or sala_completa == 'SIN SALA':
-            continue
-        
-        # Extraer sala y línea
-        if ' - ' in sala_completa:
-            partes = sala_completa.split(' - ', 1)
-            sala = partes[0].strip()
-            linea = partes[1].strip()
-        else:
-            sala = sala_completa
-            linea = 'Principal'
-        
-        # Obtener fecha
-        fecha_str = mo.get('fecha') or mo.get('fecha_inicio') or mo.get('fecha_fin')
-        if not fecha_str:
-            continue
-        
-        try:
-            fecha = datetime.fromisoformat(fecha_str.replace('Z', '+00:00'))
-        except:
-            try:
-                fecha = datetime.strptime(fecha_str[:10], '%Y-%m-%d')
-            except:
-                continue
-        
-        # Obtener período de agrupación
-        periodo_label_str, sort_year, sort_value = _agrupar_por_periodo(fecha, agrupacion)
-        
-        # Obtener kg procesados y rendimiento
-        kg_pt = mo.get('kg_pt', 0) or 0
-        rendimiento = mo.get('rendimiento', 0) or 0
-        
-        if kg_pt > 0:
-            if sala not in datos_por_sala:
-                datos_por_sala[sala] = []
-            
-            datos_por_sala[sala].append({
-                'Periodo': periodo_label_str,
-                'Línea': linea,
-                'Sala-Línea': f"{sala} - {linea}",
-                'Kg PT': kg_pt,
-                'Rendimiento': rendimiento,
-                'sort_year': sort_year,
-                'sort_value': sort_value
-            })
-    
-    if not datos_por_sala:
+    # SOLO salas de proceso - filtro estricto; EXCLUIR túnel continuo (ya está en congelado)
+    df_salas = df_mos[
+        ~df_mos['es_tunel_continuo']
+        & (df_mos['sala_tipo'] == 'PROCESO')
+        & ~df_mos['tiene_tunel']
+        & (df_mos['sala'] != '')
+        & (df_mos['sala'] != 'SIN SALA')
+        & df_mos['fecha'].notna()
+        & (df_mos['kg_pt'] > 0)
+    ]
+    
+    if df_salas.empty:
         st.warning(f"No se encontraron datos de proceso/vaciado en el período seleccionado")
-        with st.expander("🔍 Debug: Ver datos disponibles"):
-            st.write(f"**Total de MOs recibidos:** {len(mos_data)}")
-            salas_unicas = sorted(list(salas_encontradas))
-            st.write(f"**Total de salas diferentes:** {len(salas_unicas)}")
-            st.write("**Salas encontradas:**")
-            for sala in salas_unicas:
-                st.write(f"- '{sala}'")
-            
-            if mos_data:
-                st.write("---")
-                st.write("**Primer MO de ejemplo:**")
-                primer_mo = mos_data[0]
-                st.json(primer_mo)
+        _debug_mos(mos_data, df_mos)
         return
     
+    # Extraer sala y línea
+    partes = df_salas['sala'].str.split(' - ', n=1, expand=True).reindex(columns=[0, 1])
+    df_salas = df_salas.assign(
+        sala_base=partes[0].str.strip(),
+        **{
+            'Línea': partes[1].fillna('Principal').str.strip(),
+            'Kg PT': df_salas['kg_pt'],
+            'Rendimiento': df_salas['rendimiento'],
+        }
+    )
+    df_salas['Sala-Línea'] = df_salas['sala_base'] + ' - ' + df_salas['Línea']
+    
+    # Rango de fechas del dataset
+    fechas_mo = df_mos['fecha'].dropna()
+    
     # Crear un gráfico por cada sala
-    for sala_nombre in sorted(datos_por_sala.keys()):
+    for sala_nombre, df in sorted(df_salas.groupby('sala_base')):
         st.markdown(f"#### 🏭 {sala_nombre}")
         
-        datos_sala = datos_por_sala[sala_nombre]
-        df = pd.DataFrame(datos_sala)
-        
         # Agrupar por período y línea
         df_grouped = df.groupby(['Periodo', 'Línea', 'Sala-Línea', 'sort_year', 'sort_value'], as_index=False).agg({
             'Kg PT': 'sum',
             'Rendimiento': 'mean'
         })
         
-        # Obtener rango de fechas del dataset
-        fechas_mo = []
-        for mo in mos_data:
-            fecha_str = mo.get('fecha') or mo.get('fecha_inicio') or mo.get('fecha_fin')
-            if fecha_str:
-                try:
-                    fecha = datetime.fromisoformat(fecha_str.replace('Z', '+00:00'))
-                    fechas_mo.append(fecha)
-                except:
-                    try:
-                        fecha = datetime.strptime(fecha_str[:10], '%Y-%m-%d')
-                        fechas_mo.append(fecha)
-                    except:
-                        pass
-        
         # Generar todos los períodos y líneas (incluyendo combinaciones con 0)
-        if fechas_mo:
-            fecha_min = min(fechas_mo)
-            fecha_max = max(fechas_mo)
+        if not fechas_mo.empty:
+            fecha_min = fechas_mo.min()
+            fecha_max = fechas_mo.max()
             todos_periodos = _generar_todos_los_periodos(fecha_min, fecha_max, agrupacion)
             lineas_unicas = df_grouped['Línea'].unique()
             
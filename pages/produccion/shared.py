@@ -11,6 +11,8 @@ import os
 from datetime import datetime
 from typing import List, Dict, Optional
 
+from shared.columnar import accept_header, read_response
+
 # Determinar API_URL basado en ENV
 ENV = os.getenv("ENV", "prod")
 if ENV == "development":
@@ -225,27 +227,31 @@ def detectar_planta(mo_name, sala_name=None):
     return "RIO FUTURO"
 
 
-def filtrar_mos_por_planta(lista_mos, filtro_rfp, filtro_vilkun):
-    """Filtra una lista de MOs por planta basándose en el nombre de la MO y la sala.
+def columna_texto(df: pd.DataFrame, *nombres) -> pd.Series:
+    """Primera columna no vacía entre `nombres` (como `mo.get(a) or mo.get(b) or ''`)."""
+    col = pd.Series('', index=df.index, dtype=object)
+    for nombre in reversed(nombres):
+        if nombre in df.columns:
+            col = df[nombre].where(df[nombre].notna() & (df[nombre] != ''), col)
+    return col.fillna('')
+
+
+def filtrar_mos_por_planta(df_mos: pd.DataFrame, filtro_rfp, filtro_vilkun) -> pd.DataFrame:
+    """Filtra el DataFrame de MOs por planta basándose en el nombre de la MO y la sala.
     
     Ahora considera tanto el nombre de la MO como la sala para determinar la planta.
     """
     if filtro_rfp and filtro_vilkun:
-        return lista_mos
-    if not filtro_rfp and not filtro_vilkun:
-        return []
+        return df_mos
+    if (not filtro_rfp and not filtro_vilkun) or df_mos.empty:
+        return df_mos.iloc[0:0]
     
-    resultado = []
-    for item in lista_mos:
-        mo_name = item.get('mo_name') or item.get('name') or ''
-        sala = item.get('sala') or item.get('sala_name') or ''
-        planta = detectar_planta(mo_name, sala)
-        
-        if planta == "RIO FUTURO" and filtro_rfp:
-            resultado.append(item)
-        elif planta == "VILKUN" and filtro_vilkun:
-            resultado.append(item)
-    return resultado
+    plantas = pd.Series(
+        [detectar_planta(mo_name, sala) for mo_name, sala in
+         zip(columna_texto(df_mos, 'mo_name', 'name'), columna_texto(df_mos, 'sala', 'sala_name'))],
+        index=df_mos.index
+    )
+    return df_mos[plantas == ("RIO FUTURO" if filtro_rfp else "VILKUN")]
 
 
 # --------------------- Funciones de gráficos ---------------------
@@ -332,16 +338,20 @@ def fetch_dashboard_completo(username: str, password: str, fecha_inicio: str, fe
     """
     OPTIMIZADO: Obtiene TODOS los datos del dashboard en UNA sola llamada.
     Retorna: overview, consolidado, salas, mos - todo junto.
+    Las MOs se piden en Arrow IPC (JSON si el backend no lo soporta) y se
+    entregan como DataFrame en data["mos"].
     """
     try:
         resp = requests.get(f"{API_URL}/api/v1/rendimiento/dashboard", params={
             "username": username, "password": password,
             "fecha_inicio": fecha_inicio, "fecha_fin": fecha_fin,
             "solo_terminadas": solo_terminadas
-        }, timeout=180)
+        }, headers=accept_header(), timeout=180)
         
         if resp.status_code == 200:
-            return resp.json()
+            df_mos, data = read_response(resp, tabla="mos")
+            data["mos"] = df_mos
+            return data
         elif resp.status_code == 401:
             st.error(f"❌ Error de autenticación (401). Verifica tus credenciales.")
         elif resp.status_code == 500:
@@ -357,6 +367,50 @@ def fetch_dashboard_completo(username: str, password: str, fecha_inicio: str, fe
     return None
 
 
+@st.cache_data(ttl=120, show_spinner=False)
+def fetch_rollup_kg_linea(username: str, password: str, fecha_inicio: str, fecha_fin: str,
+                          grano: str = "dia", agrupar_por: str = "periodo,sala",
+                          filtros: Optional[Dict[str, str]] = None, page: int = 1, page_size: int = 500):
+    """
+    Cubo pre-agregado KG/Línea (periodo × sala × turno × especie × planta).
+    filtros: {"sala": "Sala 1,Sala 2", "turno": "Día", ...}
+    """
+    try:
+        resp = requests.get(f"{API_URL}/api/v1/rendimiento/rollup", params={
+            "username": username, "password": password,
+            "fecha_inicio": fecha_inicio, "fecha_fin": fecha_fin,
+            "grano": grano, "agrupar_por": agrupar_por,
+            "page": page, "page_size": page_size,
+            **(filtros or {})
+        }, timeout=180)
+        if resp.status_code == 200:
+            return resp.json()
+        st.error(f"❌ Error HTTP {resp.status_code}: {resp.text[:200]}")
+    except Exception as e:
+        st.error(f"❌ Error inesperado: {type(e).__name__}: {str(e)}")
+    return None
+
+
+@st.cache_data(ttl=120, show_spinner=False)
+def fetch_rollup_mos(username: str, password: str, fecha_inicio: str, fecha_fin: str,
+                     grano: str = "dia", filtros: Optional[Dict[str, str]] = None,
+                     page: int = 1, page_size: int = 100):
+    """MOs de la celda visible del cubo KG/Línea (drill-down paginado)."""
+    try:
+        resp = requests.get(f"{API_URL}/api/v1/rendimiento/rollup/mos", params={
+            "username": username, "password": password,
+            "fecha_inicio": fecha_inicio, "fecha_fin": fecha_fin,
+            "grano": grano, "page": page, "page_size": page_size,
+            **(filtros or {})
+        }, timeout=180)
+        if resp.status_code == 200:
+            return resp.json()
+        st.error(f"❌ Error HTTP {resp.status_code}: {resp.text[:200]}")
+    except Exception as e:
+        st.error(f"❌ Error inesperado: {type(e).__name__}: {str(e)}")
+    return None
+
+
 @st.cache_data(ttl=120, show_spinner=False)
 def fetch_rendimiento_overview(username: str, password: str, fecha_inicio: str, fecha_fin: str):
     """Obtiene KPIs consolidados de rendimiento"""
@@ -1,38 +1,24 @@
 """
 Tab Rendimiento en Salas: Productividad por sala de proceso.
 Muestra KG/Hora, órdenes, KG totales desglosado por sala con filtros de especie y planta.
+
+Los agregados (día × sala, turno, KG/Hora) vienen del cubo KG/Línea del backend
+(/api/v1/rendimiento/rollup); las MOs individuales solo se piden al abrir el
+detalle de una sala o al generar el informe (/rollup/mos).
 """
 import streamlit as st
-import httpx
 import os
 import io
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
-from collections import defaultdict
+from typing import Dict, List, Optional
 from streamlit_echarts import st_echarts, JsCode
-from .shared import API_URL
+from .shared import fetch_rollup_kg_linea, fetch_rollup_mos
 
 # Ruta al logo
 _LOGO_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
                           'data', 'RFP - LOGO OFICIAL.png')
 
 
-def fetch_datos_produccion(username: str, password: str, fecha_inicio: str,
-                           fecha_fin: str) -> Dict[str, Any]:
-    """Obtiene datos de producción."""
-    params = {
-        "username": username,
-        "password": password,
-        "fecha_inicio": fecha_inicio,
-        "fecha_fin": fecha_fin,
-        "solo_terminadas": False
-    }
-    response = httpx.get(f"{API_URL}/api/v1/rendimiento/dashboard",
-                         params=params, timeout=120.0)
-    response.raise_for_status()
-    return response.json()
-
-
 def parsear_fecha(fecha_str: str) -> Optional[datetime]:
     """Parsea fecha y ajusta de UTC a hora Chile (UTC-3)."""
     if not fecha_str:
@@ -56,18 +42,6 @@ def parsear_fecha(fecha_str: str) -> Optional[datetime]:
     return None
 
 
-def detectar_planta(mo: Dict) -> str:
-    """Detecta la planta a partir del nombre de la MO o sala."""
-    mo_name = (mo.get('mo_name') or mo.get('name') or '').upper()
-    sala = (mo.get('sala') or mo.get('sala_original') or '').lower()
-
-    if 'VLK' in mo_name or 'vilkun' in sala:
-        return 'Vilkun'
-    if 'RF' in mo_name:
-        return 'Rio Futuro'
-    return 'Rio Futuro'
-
-
 def emoji_kg_hora(kg: float) -> str:
     if kg >= 2000: return '🟢'
     if kg >= 1500: return '🟡'
@@ -121,11 +95,98 @@ def estado_label(state: str) -> str:
     return estados.get(state, state)
 
 
-def _build_chart_kg_dia_sala(mos_list: List[Dict], title: str = "⚖️ KG Producidos por Día / Sala",
-                             subtitle: str = "Kilogramos de producto terminado desglosados por día y sala",
-                             agrupacion: str = "📅 Día") -> Optional[dict]:
-    """Construye opciones ECharts para gráfico KG por día/sala. Retorna None si no hay datos."""
-    if not mos_list:
+# --------------------- Datos (cubo KG/Línea) ---------------------
+
+SALAS_ESTATICAS = ('estatico', 'estático')
+
+
+def _es_linea_proceso(sala: str) -> bool:
+    """Los túneles estáticos no son líneas de proceso."""
+    return not any(t in (sala or '').lower() for t in SALAS_ESTATICAS)
+
+
+def _consulta(username: str, password: str, fecha_inicio, fecha_fin,
+              planta_sel: str, especie_sel: str, sala_sel: str, tipo_proceso_sel: str,
+              salas_proceso: List[str]) -> Dict:
+    """Credenciales, rango y filtros del cubo con los mismos filtros de la pantalla."""
+    filtros = {"sala": sala_sel if sala_sel != "Todos" else ",".join(salas_proceso)}
+    if planta_sel != "Todos":
+        filtros["planta"] = planta_sel
+    if especie_sel != "Todos":
+        filtros["especie"] = especie_sel
+    if tipo_proceso_sel != "Todos":
+        filtros["producto"] = tipo_proceso_sel
+    return {
+        "username": username, "password": password,
+        "fecha_inicio": fecha_inicio.isoformat(), "fecha_fin": fecha_fin.isoformat(),
+        "filtros": filtros,
+    }
+
+
+def _rollup(consulta: Dict, agrupar_por: str, grano: str = "dia", **filtros_extra) -> Dict:
+    """Cubo agrupado por `agrupar_por`: {'filas': [...], 'totales': {...}} (vacío si falla)."""
+    data = fetch_rollup_kg_linea(
+        consulta["username"], consulta["password"], consulta["fecha_inicio"], consulta["fecha_fin"],
+        grano=grano, agrupar_por=agrupar_por, filtros={**consulta["filtros"], **filtros_extra},
+        page_size=5000
+    )
+    return data or {"filas": [], "totales": {}}
+
+
+def _ordenes(consulta: Dict, **filtros_extra) -> List[Dict]:
+    """MOs de la consulta (drill-down del cubo, todas las páginas), con _inicio_dt/_fin_dt."""
+    ordenes = []
+    page = 1
+    while True:
+        data = fetch_rollup_mos(
+            consulta["username"], consulta["password"], consulta["fecha_inicio"], consulta["fecha_fin"],
+            filtros={**consulta["filtros"], **filtros_extra}, page=page, page_size=1000
+        )
+        if not data:
+            break
+        ordenes.extend(data["mos"])
+        if page >= data["total_pages"]:
+            break
+        page += 1
+    for mo in ordenes:
+        mo['_inicio_dt'] = parsear_fecha(mo.get('fecha_inicio'))
+        mo['_fin_dt'] = parsear_fecha(mo.get('fecha_termino'))
+    return ordenes
+
+
+def _etiqueta_periodo(periodo: str) -> str:
+    """'2026-01-05' -> '05/01/26'; '2026-W02' (semana ISO) -> 'S02/2026'."""
+    if '-W' in periodo:
+        anio, semana = periodo.split('-W')
+        return f"S{semana}/{anio}"
+    return datetime.strptime(periodo, '%Y-%m-%d').strftime('%d/%m/%y')
+
+
+def _grano(agrupacion: str) -> str:
+    return "semana" if agrupacion == "📆 Semana" else "dia"
+
+
+def _kg_hora_sala(sd: Dict) -> float:
+    return sd.get('kg_hora', 0) or 0
+
+
+# Fila del cubo para un turno sin órdenes
+_TURNO_VACIO = {'kg_pt': 0, 'horas': 0, 'detenciones': 0, 'ordenes': 0,
+                'kg_hora': 0, 'kg_hora_efectiva': 0, 'dotacion_promedio': 0}
+
+
+def _build_chart_kg_dia_sala(filas_sala: List[Dict], filas_periodo: List[Dict], totales: Dict,
+                             title: str = "⚖️ KG Producidos por Día / Sala",
+                             subtitle: str = "Kilogramos de producto terminado desglosados por día y sala") -> Optional[dict]:
+    """
+    Construye opciones ECharts para gráfico KG por día/sala. Retorna None si no hay datos.
+
+    Args:
+        filas_sala: Cubo agrupado por periodo, sala
+        filas_periodo: Cubo agrupado por periodo (totales y KG/Hora de cada barra)
+        totales: Totales del cubo (línea de promedio KG/Hora)
+    """
+    if not filas_periodo:
         return None
 
     colores_paleta = [
@@ -134,56 +195,19 @@ def _build_chart_kg_dia_sala(mos_list: List[Dict], title: str = "⚖️ KG Produ
         '#FF5722', '#009688', '#03A9F4', '#FFC107', '#00ACC1',
     ]
 
-    dia_sala_kg: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
-    dia_sala_ordenes: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
-    dia_horas: Dict[str, float] = defaultdict(float)
-    todas_salas_set = set()
-
-    for mo in mos_list:
-        sala = mo.get('sala') or 'Sin Sala'
-        todas_salas_set.add(sala)
-        dt = mo.get('_inicio_dt')
-        if not dt:
-            continue
-        if agrupacion == "📆 Semana":
-            iso_y, iso_w, _ = dt.isocalendar()
-            dia_key = f"S{iso_w:02d}/{iso_y}"
-        else:
-            dia_key = dt.strftime('%d/%m/%y')
-        kg = mo.get('kg_pt', 0) or 0
-        dia_sala_kg[dia_key][sala] += kg
-        dia_sala_ordenes[dia_key][sala] += 1
-
-        duracion = mo.get('duracion_horas', 0) or 0
-        if duracion > 0:
-            dia_horas[dia_key] += duracion
-
-    if not dia_sala_kg:
-        return None
-
-    if agrupacion == "📆 Semana":
-        dias_sorted = sorted(dia_sala_kg.keys(), key=lambda d: (int(d.split('/')[1]), int(d.split('/')[0][1:])))
-    else:
-        dias_sorted = sorted(dia_sala_kg.keys(), key=lambda d: datetime.strptime(d, '%d/%m/%y'))
-    salas_sorted = sorted(todas_salas_set)
+    periodos = [f['periodo'] for f in filas_periodo]
+    dias_sorted = [_etiqueta_periodo(p) for p in periodos]
+    kg_sala = {(f['periodo'], f['sala']): f['kg_pt'] for f in filas_sala}
+    salas_sorted = sorted({f['sala'] for f in filas_sala})
     color_map = {sala: colores_paleta[i % len(colores_paleta)] for i, sala in enumerate(salas_sorted)}
 
     # Totales y KG/H por día
-    total_kg_por_dia = []
-    kg_hora_por_dia = []
-    ordenes_por_dia = []
-    for dia in dias_sorted:
-        t_kg = sum(dia_sala_kg[dia].get(s, 0) for s in salas_sorted)
-        t_ord = sum(dia_sala_ordenes[dia].get(s, 0) for s in salas_sorted)
-        total_kg_por_dia.append(round(t_kg))
-        ordenes_por_dia.append(t_ord)
-        horas = dia_horas.get(dia, 0)
-        kg_hora_por_dia.append(round(t_kg / horas) if horas > 0 else 0)
+    total_kg_por_dia = [round(f['kg_pt']) for f in filas_periodo]
+    ordenes_por_dia = [f['ordenes'] for f in filas_periodo]
+    kg_hora_por_dia = [round(f['kg_hora']) for f in filas_periodo]
 
     # Promedio KG/H para línea de referencia
-    total_kg_all = sum(total_kg_por_dia)
-    total_horas_all = sum(dia_horas.values())
-    prom_kgh = round(total_kg_all / total_horas_all) if total_horas_all > 0 else 0
+    prom_kgh = round(totales.get('kg_hora', 0))
 
     # Umbral para labels dentro de barras
     umbral_label = 1000
@@ -193,7 +217,7 @@ def _build_chart_kg_dia_sala(mos_list: List[Dict], title: str = "⚖️ KG Produ
 
     series = []
     for sala in salas_sorted:
-        data_vals = [round(dia_sala_kg[dia].get(sala, 0)) for dia in dias_sorted]
+        data_vals = [round(kg_sala.get((periodo, sala), 0)) for periodo in periodos]
         c = color_map[sala]
         series.append({
             "name": sala,
@@ -386,44 +410,24 @@ def _build_chart_kg_dia_sala(mos_list: List[Dict], title: str = "⚖️ KG Produ
     return options, salas_sorted
 
 
-def _render_grafico_salas(mos_filtradas: List[Dict], salas_data: Dict[str, Dict], agrupacion: str = "📅 Día"):
+def _render_grafico_salas(consulta: Dict, salas_data: Dict[str, Dict], totales: Dict, agrupacion: str = "📅 Día"):
     """Gráfico de KG desglosado por día y sala con KPIs y ranking."""
-    if not mos_filtradas:
+    grano = _grano(agrupacion)
+    filas_periodo = _rollup(consulta, "periodo", grano)["filas"]
+    if not filas_periodo:
         return
+    filas_sala = _rollup(consulta, "periodo,sala", grano)["filas"]
 
     # ── Calcular métricas para KPIs ──
-    total_kg = sum(mo.get('kg_pt', 0) or 0 for mo in mos_filtradas)
-    total_ordenes = len(mos_filtradas)
-    total_horas = sum(mo.get('duracion_horas', 0) or 0 for mo in mos_filtradas)
-    prom_kg_h = total_kg / total_horas if total_horas > 0 else 0
-
-    # Agrupar KG por día para encontrar mejor/peor día
-    dia_kg_total: Dict[str, float] = defaultdict(float)
-    dia_ordenes: Dict[str, int] = defaultdict(int)
-    sala_kg_total: Dict[str, float] = defaultdict(float)
-    sala_horas_total: Dict[str, float] = defaultdict(float)
-
-    for mo in mos_filtradas:
-        dt = mo.get('_inicio_dt')
-        sala = mo.get('sala') or 'Sin Sala'
-        kg = mo.get('kg_pt', 0) or 0
-        horas = mo.get('duracion_horas', 0) or 0
-        sala_kg_total[sala] += kg
-        if horas > 0:
-            sala_horas_total[sala] += horas
-        if dt:
-            if agrupacion == "📆 Semana":
-                iso_y, iso_w, _ = dt.isocalendar()
-                dia_key = f"S{iso_w:02d}/{iso_y}"
-            else:
-                dia_key = dt.strftime('%d/%m/%y')
-            dia_kg_total[dia_key] += kg
-            dia_ordenes[dia_key] += 1
-
-    dias_con_datos = len(dia_kg_total)
+    total_kg = totales.get('kg_pt', 0)
+    total_ordenes = totales.get('ordenes', 0)
+
+    dias_con_datos = len(filas_periodo)
     prom_diario = total_kg / dias_con_datos if dias_con_datos > 0 else 0
-    mejor_dia = max(dia_kg_total.items(), key=lambda x: x[1]) if dia_kg_total else ("—", 0)
-    mejor_sala = max(sala_kg_total.items(), key=lambda x: x[1]) if sala_kg_total else ("—", 0)
+    fila_mejor_dia = max(filas_periodo, key=lambda f: f['kg_pt'])
+    mejor_dia = (_etiqueta_periodo(fila_mejor_dia['periodo']), fila_mejor_dia['kg_pt'])
+    mejor_sala = max(((sala, sd['kg_pt']) for sala, sd in salas_data.items()),
+                     key=lambda x: x[1], default=("—", 0))
 
     # ── KPI Cards ──
     st.markdown(f"""
@@ -450,13 +454,13 @@ def _render_grafico_salas(mos_filtradas: List[Dict], salas_data: Dict[str, Dict]
                     border:1px solid #e8eaed;box-shadow:0 2px 8px rgba(0,0,0,0.04);">
             <div style="font-size:11px;color:#90A4AE;font-weight:600;text-transform:uppercase;letter-spacing:0.5px;">Sala Top</div>
             <div style="font-size:22px;font-weight:800;color:#5C6BC0;margin:6px 0 2px;">{mejor_sala[0]}</div>
-            <div style="font-size:11px;color:#999;">{mejor_sala[1]:,.0f} KG  ·  {mejor_sala[1]/total_kg*100:.0f}% del total</div>
+            <div style="font-size:11px;color:#999;">{mejor_sala[1]:,.0f} KG  ·  {(mejor_sala[1] / total_kg * 100 if total_kg else 0):.0f}% del total</div>
         </div>
     </div>
     """, unsafe_allow_html=True)
 
     # ── Gráfico principal de barras apiladas + línea KG/Hora ──
-    result = _build_chart_kg_dia_sala(mos_filtradas, agrupacion=agrupacion)
+    result = _build_chart_kg_dia_sala(filas_sala, filas_periodo, totales)
     if not result:
         return
     options, salas_sorted = result
@@ -464,10 +468,11 @@ def _render_grafico_salas(mos_filtradas: List[Dict], salas_data: Dict[str, Dict]
     st_echarts(options=options, height=f"{altura}px")
 
 
-def _render_graficos_kg_hora(mos_filtradas: List[Dict], salas_data: Dict[str, Dict], agrupacion: str = "📅 Día"):
+def _render_graficos_kg_hora(consulta: Dict, salas_data: Dict[str, Dict], agrupacion: str = "📅 Día"):
     """Renderiza gráficos dedicados de KG/H: uno general por día y uno por cada sala."""
-    if not mos_filtradas:
+    if not salas_data:
         return
+    grano = _grano(agrupacion)
     
     st.markdown("---")
     st.markdown("""
@@ -481,79 +486,31 @@ def _render_graficos_kg_hora(mos_filtradas: List[Dict], salas_data: Dict[str, Di
     """, unsafe_allow_html=True)
     
     # === GRÁFICO GENERAL: KG/Hora y KG/Hora Efectiva POR TURNO ===
-    turnos_data = {}
-    for t_name in ["Día", "Tarde"]:
-        turnos_data[t_name] = {
-            'dia_kg': defaultdict(float),
-            'dia_horas': defaultdict(float),
-            'dia_detenciones': defaultdict(float),
-        }
-    
-    for mo in mos_filtradas:
-        dt = mo.get('_inicio_dt')
-        if not dt:
-            continue
-        if agrupacion == "📆 Semana":
-            iso_y, iso_w, _ = dt.isocalendar()
-            dia_key = f"S{iso_w:02d}/{iso_y}"
-        else:
-            dia_key = dt.strftime('%d/%m/%y')
-        turno = _clasificar_turno(dt, mo.get('_fin_dt'))
-        kg = mo.get('kg_pt', 0) or 0
-        horas = mo.get('duracion_horas', 0) or 0
-        detenciones = mo.get('detenciones', 0) or 0
-        td = turnos_data[turno]
-        td['dia_kg'][dia_key] += kg
-        td['dia_detenciones'][dia_key] += detenciones
-        if horas > 0:
-            td['dia_horas'][dia_key] += horas
+    filas_turno_periodo = _rollup(consulta, "turno,periodo", grano)["filas"]
+    totales_turno = {f['turno']: f for f in _rollup(consulta, "turno", grano)["filas"]}
     
     tab_dia, tab_tarde = st.tabs(["☀️ Turno Día", "🌙 Turno Tarde"])
     
     for turno_tab, turno_name, turno_key in [(tab_dia, "Día", "dia"), (tab_tarde, "Tarde", "tarde")]:
         with turno_tab:
-            td = turnos_data[turno_name]
-            if not td['dia_kg']:
+            filas = [f for f in filas_turno_periodo if f['turno'] == turno_name]
+            if not filas:
                 st.info(f"No hay datos para Turno {turno_name}")
                 continue
             
-            if agrupacion == "📆 Semana":
-                dias_sorted = sorted(td['dia_kg'].keys(), key=lambda d: (int(d.split('/')[1]), int(d.split('/')[0][1:])))
-            else:
-                dias_sorted = sorted(td['dia_kg'].keys(), key=lambda d: datetime.strptime(d, '%d/%m/%y'))
-            kg_hora_vals = []
-            kg_hora_ef_vals = []
-            detenciones_vals = []
+            dias_sorted = [_etiqueta_periodo(f['periodo']) for f in filas]
+            # KG/Hora (duración total) y KG/Hora Efectiva (descontando detenciones)
+            kg_hora_vals = [round(f['kg_hora'], 0) for f in filas]
+            kg_hora_ef_vals = [round(f['kg_hora_efectiva'], 0) for f in filas]
+            detenciones_vals = [round(f['detenciones'], 1) for f in filas]
             
-            for dia in dias_sorted:
-                horas = td['dia_horas'].get(dia, 0)
-                kg_total = td['dia_kg'][dia]
-                detenciones = td['dia_detenciones'].get(dia, 0)
-                detenciones_vals.append(round(detenciones, 1))
-                
-                # KG/Hora (basado en duración total)
-                if horas > 0:
-                    kg_hora_vals.append(round(kg_total / horas, 0))
-                else:
-                    kg_hora_vals.append(0)
-                
-                # KG/Hora Efectiva (descontando detenciones)
-                horas_ef = max(horas - detenciones, 0)
-                if horas_ef > 0:
-                    kg_hora_ef_vals.append(round(kg_total / horas_ef, 0))
-                else:
-                    kg_hora_ef_vals.append(0)
-            
-            total_det = sum(td['dia_detenciones'].values())
+            total_turno = totales_turno[turno_name]
+            total_det = total_turno['detenciones']
             icono = "☀️" if turno_name == "Día" else "🌙"
             
             # Promedios
-            total_kg_turno = sum(td['dia_kg'].values())
-            total_horas_turno = sum(td['dia_horas'].values())
-            total_det_turno = sum(td['dia_detenciones'].values())
-            prom_kg_hora = total_kg_turno / total_horas_turno if total_horas_turno > 0 else 0
-            horas_ef_turno = max(total_horas_turno - total_det_turno, 0)
-            prom_kg_hora_ef = total_kg_turno / horas_ef_turno if horas_ef_turno > 0 else 0
+            prom_kg_hora = total_turno['kg_hora']
+            prom_kg_hora_ef = total_turno['kg_hora_efectiva']
             
             subtexto = (f"KG/Hora: {prom_kg_hora:,.0f}  ·  KG/Hora Efectiva: {prom_kg_hora_ef:,.0f}"
                         f"  ·  Detenciones: {total_det:,.1f} hrs  ·  {len(dias_sorted)} días")
@@ -756,132 +713,41 @@ def _render_graficos_kg_hora(mos_filtradas: List[Dict], salas_data: Dict[str, Di
         '#FF5722', '#03A9F4', '#8BC34A', '#00ACC1', '#FFEB3B',
     ]
     
+    # Cubo por sala y día, con el filtro de turno si aplica
+    filtro_turno = {"☀️ Día": {"turno": "Día"}, "🌙 Tarde": {"turno": "Tarde"}}.get(filtro_turno_sala, {})
+    filas_sala_periodo = _rollup(consulta, "sala,periodo", grano, **filtro_turno)["filas"]
+    totales_sala = {f['sala']: f for f in _rollup(consulta, "sala", grano, **filtro_turno)["filas"]}
+    
     # Ordenar salas por KG/Hora promedio
-    salas_ordenadas = sorted(
-        salas_data.items(),
-        key=lambda x: (x[1]['kg_con_duracion'] / x[1]['duracion_total'])
-        if x[1]['duracion_total'] > 0 else 0,
-        reverse=True
-    )
+    salas_ordenadas = sorted(salas_data.items(), key=lambda x: _kg_hora_sala(x[1]), reverse=True)
     
     for idx, (sala, sd) in enumerate(salas_ordenadas):
-        # Filtrar órdenes por turno si aplica
-        if filtro_turno_sala == "☀️ Día":
-            ordenes_filtradas = [o for o in sd['ordenes'] if _clasificar_turno(o.get('_inicio_dt'), o.get('_fin_dt')) == "Día"]
-        elif filtro_turno_sala == "🌙 Tarde":
-            ordenes_filtradas = [o for o in sd['ordenes'] if _clasificar_turno(o.get('_inicio_dt'), o.get('_fin_dt')) == "Tarde"]
-        else:
-            ordenes_filtradas = sd['ordenes']
-        
-        if not ordenes_filtradas:
-            continue
-        
-        # Agrupar por día para esta sala
-        sala_dia_kg = defaultdict(float)
-        sala_dia_horas = defaultdict(float)
-        sala_dia_hh = defaultdict(float)
-        sala_dia_hh_efectiva = defaultdict(float)
-        sala_dia_detenciones = defaultdict(float)
-        sala_dia_dotacion = defaultdict(float)
-        sala_dia_count = defaultdict(int)
-        
-        for orden in ordenes_filtradas:
-            dt = orden.get('_inicio_dt')
-            if not dt:
-                continue
-            if agrupacion == "📆 Semana":
-                iso_y, iso_w, _ = dt.isocalendar()
-                dia_key = f"S{iso_w:02d}/{iso_y}"
-            else:
-                dia_key = dt.strftime('%d/%m/%y')
-            kg = orden.get('kg_pt', 0) or 0
-            horas = orden.get('duracion_horas', 0) or 0
-            hh = orden.get('hh', 0) or 0
-            hh_ef = orden.get('hh_efectiva', 0) or 0
-            detenciones = orden.get('detenciones', 0) or 0
-            dotacion = orden.get('dotacion', 0) or 0
-            sala_dia_kg[dia_key] += kg
-            sala_dia_hh[dia_key] += hh
-            sala_dia_hh_efectiva[dia_key] += hh_ef
-            sala_dia_detenciones[dia_key] += detenciones
-            sala_dia_dotacion[dia_key] += dotacion
-            sala_dia_count[dia_key] += 1
-            if horas > 0:
-                sala_dia_horas[dia_key] += horas
-        
-        if not sala_dia_kg:
+        total_sala = totales_sala.get(sala)
+        if not total_sala:
             continue
         
-        if agrupacion == "📆 Semana":
-            dias_sala_sorted = sorted(sala_dia_kg.keys(), key=lambda d: (int(d.split('/')[1]), int(d.split('/')[0][1:])))
-        else:
-            dias_sala_sorted = sorted(sala_dia_kg.keys(), key=lambda d: datetime.strptime(d, '%d/%m/%y'))
-        kg_hora_sala_vals = []       # kg_pt / duracion_horas
-        kg_hora_ef_sala_vals = []    # kg_pt / (duracion - detenciones)
-        kg_hh_sala_vals = []         # KG/Hora / dotacion_promedio
-        kg_hh_ef_sala_vals = []      # KG/Hora Efectiva / dotacion_promedio
-        kg_out_sala_vals = []        # kg_pt totales por día (barras)
-        horas_proceso_sala_vals = [] # horas totales por día (tooltip)
-        detenciones_sala_vals = []   # detenciones por día (tooltip)
-        dotacion_sala_vals = []      # dotación promedio por día (tooltip)
-        
-        for dia in dias_sala_sorted:
-            horas = sala_dia_horas.get(dia, 0)
-            hh = sala_dia_hh.get(dia, 0)
-            hh_ef = sala_dia_hh_efectiva.get(dia, 0)
-            kg_total = sala_dia_kg[dia]
-            detenciones = sala_dia_detenciones.get(dia, 0)
-            dot_total = sala_dia_dotacion.get(dia, 0)
-            n_ordenes = sala_dia_count.get(dia, 1)
-            dot_prom = dot_total / n_ordenes if n_ordenes > 0 else 0
-            detenciones_sala_vals.append(round(detenciones, 1))
-            kg_out_sala_vals.append(round(kg_total, 0))
-            horas_proceso_sala_vals.append(round(horas, 1))
-            dotacion_sala_vals.append(round(dot_prom, 0))
-            
-            # KG/Hora
-            kg_hora = 0
-            if horas > 0:
-                kg_hora = kg_total / horas
-                kg_hora_sala_vals.append(round(kg_hora, 0))
-            else:
-                kg_hora_sala_vals.append(0)
-            
-            # KG/Hora Efectiva (descontando detenciones)
-            kg_hora_ef = 0
-            horas_efectivas = max(horas - detenciones, 0)
-            if horas_efectivas > 0:
-                kg_hora_ef = kg_total / horas_efectivas
-                kg_hora_ef_sala_vals.append(round(kg_hora_ef, 0))
-            else:
-                kg_hora_ef_sala_vals.append(0)
-            
-            # KG/HH = KG/Hora ÷ Dotación
-            if dot_prom > 0 and kg_hora > 0:
-                kg_hh_sala_vals.append(round(kg_hora / dot_prom, 1))
-            else:
-                kg_hh_sala_vals.append(0)
-            
-            # KG/HH Efectivo = KG/Hora Efectiva ÷ Dotación
-            if dot_prom > 0 and kg_hora_ef > 0:
-                kg_hh_ef_sala_vals.append(round(kg_hora_ef / dot_prom, 1))
-            else:
-                kg_hh_ef_sala_vals.append(0)
+        filas = [f for f in filas_sala_periodo if f['sala'] == sala]
+        dias_sala_sorted = [_etiqueta_periodo(f['periodo']) for f in filas]
+        kg_hora_sala_vals = [round(f['kg_hora'], 0) for f in filas]               # kg / horas
+        kg_hora_ef_sala_vals = [round(f['kg_hora_efectiva'], 0) for f in filas]  # kg / (horas - detenciones)
+        # KG/HH = KG/Hora ÷ dotación promedio
+        kg_hh_sala_vals = [
+            round(f['kg_hora'] / f['dotacion_promedio'], 1) if f['dotacion_promedio'] > 0 else 0
+            for f in filas
+        ]
+        kg_hh_ef_sala_vals = [
+            round(f['kg_hora_efectiva'] / f['dotacion_promedio'], 1) if f['dotacion_promedio'] > 0 else 0
+            for f in filas
+        ]
+        kg_out_sala_vals = [round(f['kg_pt'], 0) for f in filas]          # barras
+        horas_proceso_sala_vals = [round(f['horas'], 1) for f in filas]   # tooltip
+        detenciones_sala_vals = [round(f['detenciones'], 1) for f in filas]
+        dotacion_sala_vals = [round(f['dotacion_promedio'], 0) for f in filas]
         
-        # Promedios basados en órdenes filtradas
-        total_kg_sala = sum(sala_dia_kg.values())
-        total_horas_sala = sum(sala_dia_horas.values())
-        total_hh_sala = sum(sala_dia_hh.values())
-        total_hh_ef_sala = sum(sala_dia_hh_efectiva.values())
-        total_det_sala = sum(sala_dia_detenciones.values())
-        prom_sala = total_kg_sala / total_horas_sala if total_horas_sala > 0 else 0
-        horas_ef_sala = max(total_horas_sala - total_det_sala, 0)
-        prom_sala_efectiva = total_kg_sala / horas_ef_sala if horas_ef_sala > 0 else 0
-        total_dot_sala = sum(sala_dia_dotacion.values())
-        total_count_sala = sum(sala_dia_count.values())
-        dot_prom_global = total_dot_sala / total_count_sala if total_count_sala > 0 else 0
-        prom_kg_hh = prom_sala / dot_prom_global if dot_prom_global > 0 else 0
-        prom_kg_hh_ef = prom_sala_efectiva / dot_prom_global if dot_prom_global > 0 else 0
+        # Promedios de la sala (mismo filtro de turno)
+        prom_sala = total_sala['kg_hora']
+        prom_sala_efectiva = total_sala['kg_hora_efectiva']
+        total_det_sala = total_sala['detenciones']
         turno_label = f" ({filtro_turno_sala})" if filtro_turno_sala != "Todos" else ""
         color_sala = colores_sala[idx % len(colores_sala)]
         
@@ -922,7 +788,7 @@ def _render_graficos_kg_hora(mos_filtradas: List[Dict], salas_data: Dict[str, Di
             "backgroundColor": "#ffffff",
             "title": {
                 "text": f"🏭 {sala}{turno_label}",
-                "subtext": f"KG/Hora: {prom_sala:,.0f}  ·  KG/Hora Efectiva: {prom_sala_efectiva:,.0f}  ·  Det: {total_det_sala:,.1f}h  ·  {len(ordenes_filtradas)} órdenes",
+                "subtext": f"KG/Hora: {prom_sala:,.0f}  ·  KG/Hora Efectiva: {prom_sala_efectiva:,.0f}  ·  Det: {total_det_sala:,.1f}h  ·  {total_sala['ordenes']} órdenes",
                 "left": "center",
                 "textStyle": {"color": "#7FA8C9", "fontSize": 14, "fontWeight": "600"},
                 "subtextStyle": {"color": "#888", "fontSize": 11}
@@ -1163,75 +1029,24 @@ def _render_graficos_kg_hora(mos_filtradas: List[Dict], salas_data: Dict[str, Di
         st_echarts(options=opts_sala, height="450px", key=f"kg_hora_sala_{idx}")
 
 
-def _clasificar_turno(dt, dt_fin=None):
-    """Clasifica en turno Día o Tarde basado en el punto medio del proceso.
-    Si solo hay hora de inicio, usa esa. Si hay inicio y fin, usa el punto medio.
-    Día: L-J 8:00-17:30, V 8:00-16:30, S 8:00-13:00
-    Tarde: L-J 17:30-23:30, V 16:30-22:30, S 14:00-22:00
-    """
-    if dt is None:
-        return "Día"
-    # Usar punto medio si hay fecha de fin
-    if dt_fin is not None and dt_fin > dt:
-        medio = dt + (dt_fin - dt) / 2
-    else:
-        medio = dt
-    hora = medio.hour + medio.minute / 60.0
-    dow = medio.weekday()  # 0=Lun, 4=Vie, 5=Sáb
-    if dow <= 3:  # Lunes a Jueves
-        return "Día" if hora < 17.5 else "Tarde"
-    elif dow == 4:  # Viernes
-        return "Día" if hora < 16.5 else "Tarde"
-    elif dow == 5:  # Sábado
-        return "Día" if hora < 13 else "Tarde"
-    return "Día"
-
-
-def _render_comparacion_turnos(mos_filtradas: List[Dict]):
+def _render_comparacion_turnos(consulta: Dict, salas_data: Dict[str, Dict]):
     """Renderiza comparación detallada de Turno Día vs Turno Tarde por sala."""
-    if not mos_filtradas:
+    if not salas_data:
         return
 
     st.markdown("---")
 
-    # ── Agrupar por sala y turno ──
-    sala_turno = {}  # {sala: {turno: {kg, horas, detenciones, ordenes, dotacion_sum}}}
-
-    for mo in mos_filtradas:
-        dt = mo.get('_inicio_dt')
-        if not dt:
-            continue
-        sala = mo.get('sala') or 'Sin Sala'
-        turno = _clasificar_turno(dt, mo.get('_fin_dt'))
-        kg = mo.get('kg_pt', 0) or 0
-        horas = mo.get('duracion_horas', 0) or 0
-        detenciones = mo.get('detenciones', 0) or 0
-        dotacion = mo.get('dotacion', 0) or 0
-
-        if sala not in sala_turno:
-            sala_turno[sala] = {}
-        if turno not in sala_turno[sala]:
-            sala_turno[sala][turno] = {'kg': 0, 'horas': 0, 'detenciones': 0, 'ordenes': 0, 'dotacion_sum': 0, 'dotacion_count': 0}
-
-        st_data = sala_turno[sala][turno]
-        st_data['kg'] += kg
-        st_data['ordenes'] += 1
-        if horas > 0:
-            st_data['horas'] += horas
-            st_data['detenciones'] += detenciones
-        if dotacion > 0:
-            st_data['dotacion_sum'] += dotacion
-            st_data['dotacion_count'] += 1
+    # ── Cubo por sala y turno ──
+    sala_turno: Dict[str, Dict[str, Dict]] = {}  # {sala: {turno: fila del cubo}}
+    for fila in _rollup(consulta, "sala,turno")["filas"]:
+        sala_turno.setdefault(fila['sala'], {})[fila['turno']] = fila
 
     if not sala_turno:
         return
+    totales_turno = {f['turno']: f for f in _rollup(consulta, "turno")["filas"]}
 
     # Ordenar salas por KG/Hora total descendente
-    salas_sorted = sorted(sala_turno.keys(), key=lambda s: (
-        sala_turno[s].get('Día', {}).get('kg', 0) + sala_turno[s].get('Tarde', {}).get('kg', 0)
-    ) / max(
-        sala_turno[s].get('Día', {}).get('horas', 0) + sala_turno[s].get('Tarde', {}).get('horas', 0), 1
-    ), reverse=True)
+    salas_sorted = sorted(sala_turno, key=lambda s: _kg_hora_sala(salas_data.get(s, {})), reverse=True)
 
     # ── Calcular métricas por sala ──
     kg_hora_dia = []
@@ -1250,47 +1065,34 @@ def _render_comparacion_turnos(mos_filtradas: List[Dict]):
     dot_tarde_list = []
 
     for sala in salas_sorted:
-        d = sala_turno[sala].get('Día', {'kg': 0, 'horas': 0, 'detenciones': 0, 'ordenes': 0, 'dotacion_sum': 0, 'dotacion_count': 0})
-        t = sala_turno[sala].get('Tarde', {'kg': 0, 'horas': 0, 'detenciones': 0, 'ordenes': 0, 'dotacion_sum': 0, 'dotacion_count': 0})
-
-        kh_d = round(d['kg'] / d['horas']) if d['horas'] > 0 else 0
-        horas_ef_d = max(d['horas'] - d['detenciones'], 0)
-        kh_ef_d = round(d['kg'] / horas_ef_d) if horas_ef_d > 0 else 0
-
-        kh_t = round(t['kg'] / t['horas']) if t['horas'] > 0 else 0
-        horas_ef_t = max(t['horas'] - t['detenciones'], 0)
-        kh_ef_t = round(t['kg'] / horas_ef_t) if horas_ef_t > 0 else 0
-
-        kg_hora_dia.append(kh_d)
-        kg_hora_tarde.append(kh_t)
-        kg_hora_ef_dia.append(kh_ef_d)
-        kg_hora_ef_tarde.append(kh_ef_t)
-        kg_dia_list.append(d['kg'])
-        kg_tarde_list.append(t['kg'])
+        d = sala_turno[sala].get('Día', _TURNO_VACIO)
+        t = sala_turno[sala].get('Tarde', _TURNO_VACIO)
+
+        kg_hora_dia.append(round(d['kg_hora']))
+        kg_hora_tarde.append(round(t['kg_hora']))
+        kg_hora_ef_dia.append(round(d['kg_hora_efectiva']))
+        kg_hora_ef_tarde.append(round(t['kg_hora_efectiva']))
+        kg_dia_list.append(d['kg_pt'])
+        kg_tarde_list.append(t['kg_pt'])
         horas_dia_list.append(d['horas'])
         horas_tarde_list.append(t['horas'])
         det_dia_list.append(d['detenciones'])
         det_tarde_list.append(t['detenciones'])
         ord_dia_list.append(d['ordenes'])
         ord_tarde_list.append(t['ordenes'])
-        dot_dia_list.append(round(d['dotacion_sum'] / d['dotacion_count']) if d.get('dotacion_count', 0) > 0 else 0)
-        dot_tarde_list.append(round(t['dotacion_sum'] / t['dotacion_count']) if t.get('dotacion_count', 0) > 0 else 0)
+        dot_dia_list.append(round(d['dotacion_promedio']))
+        dot_tarde_list.append(round(t['dotacion_promedio']))
 
     # ── Totales generales ──
-    total_d = {'kg': 0, 'horas': 0, 'det': 0, 'ord': 0}
-    total_t = {'kg': 0, 'horas': 0, 'det': 0, 'ord': 0}
-    for sala in sala_turno:
-        dd = sala_turno[sala].get('Día', {'kg': 0, 'horas': 0, 'detenciones': 0, 'ordenes': 0})
-        tt = sala_turno[sala].get('Tarde', {'kg': 0, 'horas': 0, 'detenciones': 0, 'ordenes': 0})
-        total_d['kg'] += dd['kg']; total_d['horas'] += dd['horas']; total_d['det'] += dd['detenciones']; total_d['ord'] += dd['ordenes']
-        total_t['kg'] += tt['kg']; total_t['horas'] += tt['horas']; total_t['det'] += tt['detenciones']; total_t['ord'] += tt['ordenes']
-
-    prom_d = round(total_d['kg'] / total_d['horas']) if total_d['horas'] > 0 else 0
-    prom_t = round(total_t['kg'] / total_t['horas']) if total_t['horas'] > 0 else 0
-    ef_h_d = max(total_d['horas'] - total_d['det'], 0)
-    ef_h_t = max(total_t['horas'] - total_t['det'], 0)
-    prom_ef_d = round(total_d['kg'] / ef_h_d) if ef_h_d > 0 else 0
-    prom_ef_t = round(total_t['kg'] / ef_h_t) if ef_h_t > 0 else 0
+    tot_d = totales_turno.get('Día', _TURNO_VACIO)
+    tot_t = totales_turno.get('Tarde', _TURNO_VACIO)
+    total_d = {'kg': tot_d['kg_pt'], 'horas': tot_d['horas'], 'det': tot_d['detenciones'], 'ord': tot_d['ordenes']}
+    total_t = {'kg': tot_t['kg_pt'], 'horas': tot_t['horas'], 'det': tot_t['detenciones'], 'ord': tot_t['ordenes']}
+
+    prom_d = round(tot_d['kg_hora'])
+    prom_t = round(tot_t['kg_hora'])
+    prom_ef_d = round(tot_d['kg_hora_efectiva'])
+    prom_ef_t = round(tot_t['kg_hora_efectiva'])
 
     # Diferencia porcentual día vs tarde
     diff_pct = round((prom_d - prom_t) / prom_t * 100, 1) if prom_t > 0 else 0
@@ -1640,15 +1442,14 @@ def _render_comparacion_turnos(mos_filtradas: List[Dict]):
     # Construir HTML de la tabla
     table_rows = ""
     for i, sala in enumerate(salas_sorted):
-        d = sala_turno[sala].get('Día', {'kg': 0, 'horas': 0, 'detenciones': 0, 'ordenes': 0, 'dotacion_sum': 0, 'dotacion_count': 0})
-        t = sala_turno[sala].get('Tarde', {'kg': 0, 'horas': 0, 'detenciones': 0, 'ordenes': 0, 'dotacion_sum': 0, 'dotacion_count': 0})
+        d = sala_turno[sala].get('Día', _TURNO_VACIO)
+        t = sala_turno[sala].get('Tarde', _TURNO_VACIO)
         bg = "#fafafa" if i % 2 == 0 else "#ffffff"
 
         for turno_name, td, color, icon in [("Día", d, "#FF9800", "☀️"), ("Tarde", t, "#7E57C2", "🌙")]:
-            kh = round(td['kg'] / td['horas']) if td['horas'] > 0 else 0
-            hef = max(td['horas'] - td['detenciones'], 0)
-            kh_ef = round(td['kg'] / hef) if hef > 0 else 0
-            dot_prom = round(td.get('dotacion_sum', 0) / td.get('dotacion_count', 1)) if td.get('dotacion_count', 0) > 0 else "-"
+            kh = round(td['kg_hora'])
+            kh_ef = round(td['kg_hora_efectiva'])
+            dot_prom = round(td['dotacion_promedio']) if td['dotacion_promedio'] > 0 else "-"
             pct_det = round(td['detenciones'] / td['horas'] * 100, 1) if td['horas'] > 0 else 0
             border_style = "border-bottom:2px solid #e0e0e0;" if turno_name == "Tarde" else ""
 
@@ -1659,7 +1460,7 @@ def _render_comparacion_turnos(mos_filtradas: List[Dict]):
                     <span style="background:{color}18;color:{color};padding:3px 10px;border-radius:20px;font-size:11px;font-weight:600;">{icon} {turno_name}</span>
                 </td>
                 <td style="padding:8px 10px;text-align:right;font-weight:600;color:#37474F;font-size:13px;">{td['ordenes']}</td>
-                <td style="padding:8px 10px;text-align:right;font-weight:600;color:#37474F;font-size:13px;">{td['kg']:,.0f}</td>
+                <td style="padding:8px 10px;text-align:right;font-weight:600;color:#37474F;font-size:13px;">{td['kg_pt']:,.0f}</td>
                 <td style="padding:8px 10px;text-align:right;color:#546E7A;font-size:12px;">{td['horas']:,.1f}h</td>
                 <td style="padding:8px 10px;text-align:right;color:{'#C62828' if pct_det > 15 else '#EF6C00' if pct_det > 8 else '#546E7A'};font-size:12px;">{td['detenciones']:,.1f}h <span style="font-size:10px;color:#999;">({pct_det}%)</span></td>
                 <td style="padding:8px 10px;text-align:center;color:#546E7A;font-size:12px;">{dot_prom}</td>
@@ -1800,71 +1601,33 @@ def render(username: str = None, password: str = None):
         st.info("👆 Selecciona el rango de fechas y presiona **Buscar**")
         return
 
-    # === CARGAR DATOS ===
-    try:
-        with st.spinner("Cargando datos de producción..."):
-            data = fetch_datos_produccion(
-                username, password,
-                fecha_inicio.isoformat(),
-                fecha_fin.isoformat()
-            )
-    except Exception as e:
-        st.error(f"Error al cargar datos: {str(e)}")
-        return
-
-    mos_raw = data.get('mos', [])
+    # === CARGAR OPCIONES (cubo sala × especie × tipo de proceso) ===
+    with st.spinner("Cargando datos de producción..."):
+        opciones = fetch_rollup_kg_linea(
+            username, password, fecha_inicio.isoformat(), fecha_fin.isoformat(),
+            agrupar_por="sala,especie,producto",
+            filtros={"planta": planta_sel} if planta_sel != "Todos" else None,
+            page_size=5000
+        )
 
-    if not mos_raw:
-        st.warning("No hay órdenes de producción en el período seleccionado")
+    if opciones is None:
         return
 
-    # === ENRIQUECER MOs ===
-    for mo in mos_raw:
-        mo['_planta'] = detectar_planta(mo)
-        # Determinar estado: si no viene explícito, inferir
-        if not mo.get('_estado'):
-            mo['_estado'] = 'done' if mo.get('fecha_termino') else 'progress'
-
-        mo['_inicio_dt'] = parsear_fecha(mo.get('fecha_inicio'))
-        mo['_fin_dt'] = parsear_fecha(mo.get('fecha_termino'))
-
-    # Excluir canceladas
-    mos_all = [mo for mo in mos_raw if mo.get('_estado') != 'cancel']
-
-    # === FILTRO PLANTA ===
-    if planta_sel != "Todos":
-        mos_all = [mo for mo in mos_all if mo['_planta'] == planta_sel]
-
-    if not mos_all:
-        st.warning("No hay órdenes con los filtros seleccionados")
+    if not opciones.get('filas'):
+        st.warning("No hay órdenes de producción en el período seleccionado")
         return
 
     # Excluir túneles estáticos (no son líneas de proceso)
-    mos_all = [mo for mo in mos_all
-               if not any(t in (mo.get('sala') or '').lower()
-                          for t in ['estatico', 'estático'])]
+    filas_proceso = [f for f in opciones['filas'] if _es_linea_proceso(f['sala'])]
 
-    if not mos_all:
+    if not filas_proceso:
         st.warning("No hay órdenes de líneas de proceso en el período")
         return
 
-    # === EXTRAER ESPECIES, SALAS Y TIPOS DE PROCESO DISPONIBLES ===
-    especies_set = set()
-    salas_set = set()
-    tipos_proceso_set = set()
-    for mo in mos_all:
-        esp = mo.get('especie', '') or 'Otro'
-        if esp and esp != 'Otro':
-            especies_set.add(esp)
-        sala = mo.get('sala') or 'Sin Sala'
-        salas_set.add(sala)
-        tipo_proc = mo.get('product_name', '') or ''
-        if tipo_proc:
-            tipos_proceso_set.add(tipo_proc)
-
-    especies_list = sorted(especies_set)
-    salas_list = sorted(salas_set)
-    tipos_proceso_list = sorted(tipos_proceso_set)
+    # === ESPECIES, SALAS Y TIPOS DE PROCESO DISPONIBLES ===
+    especies_list = sorted({f['especie'] for f in filas_proceso if f['especie'] != 'Otro'})
+    salas_list = sorted({f['sala'] for f in filas_proceso})
+    tipos_proceso_list = sorted({f['producto'] for f in filas_proceso if f['producto']})
 
     # === FILTROS SECUNDARIOS (especie + sala + tipo de proceso) ===
     col_e, col_s, col_tp = st.columns(3)
@@ -1880,32 +1643,28 @@ def render(username: str = None, password: str = None):
 
     st.markdown("---")
 
-    # === APLICAR FILTROS SECUNDARIOS ===
-    mos_filtradas = mos_all
-    if especie_sel != "Todos":
-        mos_filtradas = [mo for mo in mos_filtradas if mo.get('especie') == especie_sel]
-    if sala_sel != "Todos":
-        mos_filtradas = [mo for mo in mos_filtradas
-                         if (mo.get('sala') or 'Sin Sala') == sala_sel]
-    if tipo_proceso_sel != "Todos":
-        mos_filtradas = [mo for mo in mos_filtradas
-                         if mo.get('product_name', '') == tipo_proceso_sel]
+    consulta = _consulta(username, password, fecha_inicio, fecha_fin,
+                         planta_sel, especie_sel, sala_sel, tipo_proceso_sel, salas_list)
+
+    # === AGRUPAR POR SALA (cubo) ===
+    rollup_salas = _rollup(consulta, "sala")
+    salas_data = {f['sala']: f for f in rollup_salas['filas']}
+    totales = rollup_salas['totales']
 
-    if not mos_filtradas:
+    if not salas_data:
         st.warning("No hay órdenes con los filtros seleccionados")
         return
 
-    # === AGRUPAR POR SALA ===
-    salas_data = _procesar_mos_a_salas(mos_filtradas)
+    filas_periodo = _rollup(consulta, "periodo")["filas"]
 
     # === KPIs GENERALES ===
-    total_ordenes = len(mos_filtradas)
-    total_kg = sum(s['total_kg'] for s in salas_data.values())
-    prom_kg_hora = _calcular_kg_hora(mos_filtradas)
-    hechas_total = sum(s['hechas'] for s in salas_data.values())
-    no_hechas_total = sum(s['no_hechas'] for s in salas_data.values())
+    total_ordenes = totales['ordenes']
+    total_kg = totales['kg_pt']
+    prom_kg_hora = totales['kg_hora']
+    hechas_total = totales['hechas']
+    no_hechas_total = totales['no_hechas']
 
-    total_horas_prom = sum(mo.get('duracion_horas', 0) or 0 for mo in mos_filtradas)
+    total_horas_prom = totales['horas']
     pct_completadas = round(hechas_total / total_ordenes * 100) if total_ordenes > 0 else 0
     st.markdown(f"""
     <div style="display:grid;grid-template-columns:repeat(5,1fr);gap:14px;margin-bottom:20px;">
@@ -1936,25 +1695,38 @@ def render(username: str = None, password: str = None):
         <div style="background:#fff;border-radius:12px;padding:18px 14px;text-align:center;
                     border:1px solid #e8eaed;box-shadow:0 2px 8px rgba(0,0,0,0.04);">
             <div style="font-size:11px;color:#90A4AE;font-weight:600;text-transform:uppercase;letter-spacing:0.5px;">Prom Diario</div>
-            <div style="font-size:28px;font-weight:800;color:#00838F;margin:6px 0 2px;">{total_kg / max(len(set(mo.get('_inicio_dt', datetime.min).date() for mo in mos_filtradas if mo.get('_inicio_dt'))), 1):,.0f}</div>
+            <div style="font-size:28px;font-weight:800;color:#00838F;margin:6px 0 2px;">{total_kg / max(len(filas_periodo), 1):,.0f}</div>
             <div style="font-size:11px;color:#999;">KG / día</div>
         </div>
     </div>
     """, unsafe_allow_html=True)
 
     # === BOTÓN DESCARGAR INFORME ===
-    pdf_bytes = _generar_informe_pdf(
-        fecha_inicio, fecha_fin, planta_sel, especie_sel, sala_sel, tipo_proceso_sel,
-        total_ordenes, total_kg, prom_kg_hora, hechas_total, no_hechas_total,
-        salas_data, mos_filtradas
-    )
-    st.download_button(
-        label="📥 Descargar Informe PDF",
-        data=pdf_bytes,
-        file_name=f"Informe_Rendimiento_{fecha_inicio}_{fecha_fin}.pdf",
-        mime="application/pdf",
-        use_container_width=True
-    )
+    # Se genera a pedido: es lo único que necesita el detalle de todas las órdenes
+    clave_pdf = (fecha_inicio.isoformat(), fecha_fin.isoformat(), planta_sel, especie_sel, sala_sel, tipo_proceso_sel)
+    if st.session_state.get('rend_sala_pdf_clave') != clave_pdf:
+        st.session_state.pop('rend_sala_pdf', None)
+
+    if st.button("📄 Generar Informe PDF", use_container_width=True, key="rend_sala_generar_pdf"):
+        with st.spinner("Generando informe..."):
+            ordenes_por_sala: Dict[str, List[Dict]] = {}
+            for orden in _ordenes(consulta):
+                ordenes_por_sala.setdefault(orden.get('sala') or 'Sin Sala', []).append(orden)
+            st.session_state['rend_sala_pdf'] = _generar_informe_pdf(
+                fecha_inicio, fecha_fin, planta_sel, especie_sel, sala_sel, tipo_proceso_sel,
+                totales, salas_data, filas_periodo, _rollup(consulta, "sala,periodo")["filas"],
+                ordenes_por_sala
+            )
+            st.session_state['rend_sala_pdf_clave'] = clave_pdf
+
+    if st.session_state.get('rend_sala_pdf'):
+        st.download_button(
+            label="📥 Descargar Informe PDF",
+            data=st.session_state['rend_sala_pdf'],
+            file_name=f"Informe_Rendimiento_{fecha_inicio}_{fecha_fin}.pdf",
+            mime="application/pdf",
+            use_container_width=True
+        )
 
     st.markdown("---")
 
@@ -1968,13 +1740,13 @@ def render(username: str = None, password: str = None):
     )
 
     # === GRÁFICO KG POR DÍA/SALA ===
-    _render_grafico_salas(mos_filtradas, salas_data, agrupacion=agrupacion)
+    _render_grafico_salas(consulta, salas_data, totales, agrupacion=agrupacion)
     
     # === GRÁFICOS DE KG/HORA ===
-    _render_graficos_kg_hora(mos_filtradas, salas_data, agrupacion=agrupacion)
+    _render_graficos_kg_hora(consulta, salas_data, agrupacion=agrupacion)
 
     # === COMPARACIÓN TURNO DÍA VS TURNO TARDE (BARRAS) ===
-    _render_comparacion_turnos(mos_filtradas)
+    _render_comparacion_turnos(consulta, salas_data)
 
     st.markdown("---")
 
@@ -1995,18 +1767,13 @@ def render(username: str = None, password: str = None):
     ]
 
     # Ordenar salas por KG/Hora (kg_con_duracion/duracion) descendente
-    salas_ordenadas = sorted(
-        salas_data.items(),
-        key=lambda x: (x[1]['kg_con_duracion'] / x[1]['duracion_total'])
-        if x[1]['duracion_total'] > 0 else 0,
-        reverse=True
-    )
+    salas_ordenadas = sorted(salas_data.items(), key=lambda x: _kg_hora_sala(x[1]), reverse=True)
 
     for idx, (sala, sd) in enumerate(salas_ordenadas):
-        prom = sd['kg_con_duracion'] / sd['duracion_total'] if sd['duracion_total'] > 0 else 0
+        prom = _kg_hora_sala(sd)
         em = emoji_kg_hora(prom)
         c = colores_sala[idx % len(colores_sala)]
-        total = sd['hechas'] + sd['no_hechas']
+        total = sd['ordenes']
 
         pct_hechas = (sd['hechas'] / total * 100) if total > 0 else 0
 
@@ -2034,7 +1801,7 @@ def render(username: str = None, password: str = None):
                 </div>
                 <div style="text-align:center;">
                     <div style="font-size:10px;color:#90A4AE;font-weight:600;text-transform:uppercase;">KG Procesados</div>
-                    <div style="font-size:22px;font-weight:800;color:#2E7D32;">{sd['total_kg']:,.0f}</div>
+                    <div style="font-size:22px;font-weight:800;color:#2E7D32;">{sd['kg_pt']:,.0f}</div>
                 </div>
                 <div style="text-align:center;">
                     <div style="font-size:10px;color:#90A4AE;font-weight:600;text-transform:uppercase;">KG/Hora Prom</div>
@@ -2050,8 +1817,12 @@ def render(username: str = None, password: str = None):
 
         # Desplegable con detalle de órdenes
         with st.expander(f"📋 Ver {total} órdenes de {sala}", expanded=False):
+            # El detalle se pide al drill-down del cubo solo si se activa
+            ver_ordenes = st.toggle("Cargar órdenes", key=f"rend_sala_ordenes_{sala}")
+            if not ver_ordenes:
+                st.caption("Activa para consultar el detalle de órdenes de la sala")
             ordenes_sorted = sorted(
-                sd['ordenes'],
+                _ordenes(consulta, sala=sala) if ver_ordenes else [],
                 key=lambda o: o.get('_inicio_dt') or datetime.min,
                 reverse=True
             )
@@ -2130,61 +1901,24 @@ def render(username: str = None, password: str = None):
 
     # === SECCIÓN COMPARACIÓN ===
     _render_comparacion(
-        username, password,
+        consulta,
         fecha_inicio, fecha_fin,
         planta_sel, especie_sel, sala_sel, tipo_proceso_sel,
-        salas_data, mos_filtradas
+        salas_data, totales
     )
 
 
-def _calcular_kg_hora(mos_list: List[Dict]) -> float:
-    """Calcula KG/Hora solo con MOs que tienen duración > 0 (promedio ponderado real)."""
-    mos_con_dur = [mo for mo in mos_list if (mo.get('duracion_horas', 0) or 0) > 0]
-    if not mos_con_dur:
-        return 0
-    total_kg = sum(mo.get('kg_pt', 0) or 0 for mo in mos_con_dur)
-    total_horas = sum(mo.get('duracion_horas', 0) or 0 for mo in mos_con_dur)
-    return round(total_kg / total_horas, 1) if total_horas > 0 else 0
-
-
-def _procesar_mos_a_salas(mos_list: List[Dict]) -> Dict[str, Dict]:
-    """Agrupa MOs en datos por sala (reutilizable para principal y comparación)."""
-    salas: Dict[str, Dict] = {}
-    for mo in mos_list:
-        sala = mo.get('sala') or 'Sin Sala'
-        if sala not in salas:
-            salas[sala] = {
-                'ordenes': [],
-                'total_kg': 0.0,
-                'kg_con_duracion': 0.0,
-                'duracion_total': 0.0,
-                'detenciones_total': 0.0,
-                'hechas': 0,
-                'no_hechas': 0,
-            }
-        sd = salas[sala]
-        sd['ordenes'].append(mo)
-        kg = mo.get('kg_pt', 0) or 0
-        dur = mo.get('duracion_horas', 0) or 0
-        det = mo.get('detenciones', 0) or 0
-        sd['total_kg'] += kg
-        if dur > 0:
-            sd['kg_con_duracion'] += kg
-            sd['duracion_total'] += dur
-            sd['detenciones_total'] += det
-        if mo.get('fecha_termino'):
-            sd['hechas'] += 1
-        else:
-            sd['no_hechas'] += 1
-    return salas
-
-
 def _generar_informe_pdf(
     fecha_inicio, fecha_fin, planta_sel, especie_sel, sala_sel, tipo_proceso_sel,
-    total_ordenes, total_kg, prom_kg_hora, hechas_total, no_hechas_total,
-    salas_data, mos_filtradas
+    totales: Dict, salas_data: Dict[str, Dict], filas_periodo: List[Dict],
+    filas_sala_periodo: List[Dict], ordenes_por_sala: Dict[str, List[Dict]]
 ) -> bytes:
-    """Genera un informe PDF con los datos filtrados del tab Rendimiento en Salas."""
+    """
+    Genera un informe PDF con los datos filtrados del tab Rendimiento en Salas.
+
+    Los totales, días y salas vienen del cubo; ordenes_por_sala (drill-down) solo
+    alimenta las tablas de órdenes.
+    """
     from reportlab.lib.pagesizes import LETTER
     from reportlab.lib.units import mm, cm
     from reportlab.lib.colors import HexColor, white, black
@@ -2272,6 +2006,12 @@ def _generar_informe_pdf(
     # === KPIs GENERALES ===
     story.append(Paragraph("Resumen General", seccion_style))
 
+    total_ordenes = totales.get('ordenes', 0)
+    total_kg = totales.get('kg_pt', 0)
+    prom_kg_hora = totales.get('kg_hora', 0)
+    hechas_total = totales.get('hechas', 0)
+    no_hechas_total = totales.get('no_hechas', 0)
+
     kpi_data = [
         ['Órdenes Totales', 'KG Procesados', 'KG/Hora Prom', 'Completadas', 'En Proceso', 'Salas'],
         [f'{total_ordenes:,}', f'{total_kg:,.0f}', f'{prom_kg_hora:,.0f}',
@@ -2302,17 +2042,8 @@ def _generar_informe_pdf(
     DIAS_ES = {'Mon': 'Lun', 'Tue': 'Mar', 'Wed': 'Mié', 'Thu': 'Jue',
                'Fri': 'Vie', 'Sat': 'Sáb', 'Sun': 'Dom'}
 
-    dia_kg = defaultdict(float)
-    dia_ordenes = defaultdict(int)
-    for mo in mos_filtradas:
-        dt = mo.get('_inicio_dt')
-        if not dt:
-            continue
-        dia_key = dt.strftime('%Y-%m-%d')
-        dia_kg[dia_key] += mo.get('kg_pt', 0) or 0
-        dia_ordenes[dia_key] += 1
-
-    dias_sorted = sorted(dia_kg.items())
+    dia_ordenes = {f['periodo']: f['ordenes'] for f in filas_periodo}
+    dias_sorted = [(f['periodo'], f['kg_pt']) for f in filas_periodo]
 
     if dias_sorted:
         dia_rows = [['Día', 'Fecha', 'Órdenes', 'KG Producidos', '% del Total']]
@@ -2424,47 +2155,21 @@ def _generar_informe_pdf(
     # === RENDIMIENTO KG/HORA POR DÍA ===
     story.append(Paragraph("Rendimiento KG/Hora por Día", seccion_style))
     
-    dia_kg_hora_data = defaultdict(float)
-    dia_horas_data = defaultdict(float)
-    dia_hh_efectiva_data = defaultdict(float)
-    dia_detenciones_data = defaultdict(float)
-    
-    for mo in mos_filtradas:
-        dt = mo.get('_inicio_dt')
-        if not dt:
-            continue
-        dia_key = dt.strftime('%Y-%m-%d')
-        kg = mo.get('kg_pt', 0) or 0
-        horas = mo.get('duracion_horas', 0) or 0
-        hh_ef = mo.get('hh_efectiva', 0) or 0
-        det = mo.get('detenciones', 0) or 0
-        
-        dia_kg_hora_data[dia_key] += kg
-        dia_hh_efectiva_data[dia_key] += hh_ef
-        dia_detenciones_data[dia_key] += det
-        if horas > 0:
-            dia_horas_data[dia_key] += horas
-    
-    if dia_kg_hora_data:
+    if filas_periodo:
         kgh_rows = [['Día', 'Fecha', 'KG Producidos', 'Horas', 'KG/Hora', 'HH Efectiva', 'Detenciones']]
-        for fecha in sorted(dia_kg_hora_data.keys()):
-            dt = datetime.strptime(fecha, '%Y-%m-%d')
+        for f in filas_periodo:
+            dt = datetime.strptime(f['periodo'], '%Y-%m-%d')
             dia_en = dt.strftime('%a')
             dia_esp = DIAS_ES.get(dia_en, dia_en)
-            kg = dia_kg_hora_data[fecha]
-            horas = dia_horas_data.get(fecha, 0)
-            hh_ef = dia_hh_efectiva_data.get(fecha, 0)
-            det = dia_detenciones_data.get(fecha, 0)
-            kg_h = (kg / horas) if horas > 0 else 0
-            
+
             kgh_rows.append([
                 dia_esp,
                 dt.strftime('%d/%m/%Y'),
-                f'{kg:,.0f}',
-                f'{horas:.1f}',
-                f'{kg_h:,.0f}',
-                f'{hh_ef:.1f}',
-                f'{det:.1f}'
+                f"{f['kg_pt']:,.0f}",
+                f"{f['horas']:.1f}",
+                f"{f['kg_hora']:,.0f}",
+                f"{f['hh_efectiva']:.1f}",
+                f"{f['detenciones']:.1f}"
             ])
         
         kgh_table = Table(kgh_rows, colWidths=[1.5*cm, 2.3*cm, 2.8*cm, 1.8*cm, 2.3*cm, 2.3*cm, 2.3*cm])
@@ -2484,29 +2189,12 @@ def _generar_informe_pdf(
         
         # === GRÁFICO KG/HORA EFECTIVA ===
         # Preparar datos para el gráfico
-        fechas_graf = sorted(dia_kg_hora_data.keys())
+        fechas_graf = [f['periodo'] for f in filas_periodo]
         dias_labels = [datetime.strptime(f, '%Y-%m-%d').strftime('%d/%m/%y') for f in fechas_graf]
-        kg_hora_vals = []
-        kg_hh_vals = []
-        
-        for fecha in fechas_graf:
-            kg = dia_kg_hora_data[fecha]
-            horas = dia_horas_data.get(fecha, 0)
-            det = dia_detenciones_data.get(fecha, 0)
-            
-            # KG/Hora (duración total)
-            if horas > 0:
-                kg_hora_vals.append(kg / horas)
-            else:
-                kg_hora_vals.append(0)
-            
-            # KG/Hora Efectiva (descontando detenciones)
-            horas_efectivas = max(horas - det, 0)
-            if horas_efectivas > 0:
-                kg_hh_vals.append(kg / horas_efectivas)
-            else:
-                kg_hh_vals.append(0)
-        
+        # KG/Hora (duración total) y KG/Hora Efectiva (descontando detenciones)
+        kg_hora_vals = [f['kg_hora'] for f in filas_periodo]
+        kg_hh_vals = [f['kg_hora_efectiva'] for f in filas_periodo]
+
         # Generar gráfico con matplotlib
         fig, ax = plt.subplots(figsize=(7.5, 3.8))
         fig.patch.set_facecolor('white')
@@ -2606,26 +2294,17 @@ def _generar_informe_pdf(
     # === DETALLE POR SALA ===
     story.append(Paragraph("Detalle por Sala", seccion_style))
 
-    salas_ordenadas = sorted(
-        salas_data.items(),
-        key=lambda x: (x[1]['kg_con_duracion'] / x[1]['duracion_total'])
-        if x[1]['duracion_total'] > 0 else 0,
-        reverse=True
-    )
+    salas_ordenadas = sorted(salas_data.items(), key=lambda x: _kg_hora_sala(x[1]), reverse=True)
 
     # Tabla resumen de salas
     sala_rows = [['Sala', 'Órds', 'KG Totales', 'KG/Hora', 'HH Efec.', 'Comp.', 'Proceso']]
     for sala, sd in salas_ordenadas:
-        kh = sd['kg_con_duracion'] / sd['duracion_total'] if sd['duracion_total'] > 0 else 0
-        total_s = sd['hechas'] + sd['no_hechas']
-        # Calcular HH efectiva total de la sala
-        hh_ef_sala = sum(o.get('hh_efectiva', 0) or 0 for o in sd['ordenes'])
         sala_rows.append([
             Paragraph(sala, celda_style),
-            str(total_s),
-            f"{sd['total_kg']:,.0f}",
-            f"{kh:,.0f}",
-            f"{hh_ef_sala:.1f}",
+            str(sd['ordenes']),
+            f"{sd['kg_pt']:,.0f}",
+            f"{sd['kg_hora']:,.0f}",
+            f"{sd['hh_efectiva']:.1f}",
             str(sd['hechas']),
             str(sd['no_hechas'])
         ])
@@ -2649,11 +2328,8 @@ def _generar_informe_pdf(
     # === GRÁFICO COMPARATIVO DE SALAS ===
     if len(salas_ordenadas) > 0:
         nombres_salas = [sala for sala, sd in salas_ordenadas[:10]]  # Top 10 salas
-        kg_hora_salas = [
-            (sd['kg_con_duracion'] / sd['duracion_total']) if sd['duracion_total'] > 0 else 0 
-            for sala, sd in salas_ordenadas[:10]
-        ]
-        kg_totales_salas = [sd['total_kg'] for sala, sd in salas_ordenadas[:10]]
+        kg_hora_salas = [_kg_hora_sala(sd) for sala, sd in salas_ordenadas[:10]]
+        kg_totales_salas = [sd['kg_pt'] for sala, sd in salas_ordenadas[:10]]
         
         fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(7.5, max(3.5, len(nombres_salas) * 0.45)))
         fig.patch.set_facecolor('white')
@@ -2740,47 +2416,27 @@ def _generar_informe_pdf(
     story.append(Paragraph("Detalle de Órdenes por Sala", seccion_style))
     story.append(Spacer(1, 3*mm))
     
+    # Mini gráficos por sala desde el cubo sala × día
+    sala_dia_data: Dict[str, List[Dict]] = {}
+    for f in filas_sala_periodo:
+        sala_dia_data.setdefault(f['sala'], []).append(f)
+
     for sala, sd in salas_ordenadas:
-        kh_sala = sd['kg_con_duracion'] / sd['duracion_total'] if sd['duracion_total'] > 0 else 0
         story.append(Paragraph(
-            f"{sala} — {len(sd['ordenes'])} órdenes — {sd['total_kg']:,.0f} KG — {kh_sala:,.0f} KG/h",
+            f"{sala} — {sd['ordenes']} órdenes — {sd['kg_pt']:,.0f} KG — {_kg_hora_sala(sd):,.0f} KG/h",
             ParagraphStyle('SalaTitulo', parent=styles['Heading3'],
                            fontSize=10, textColor=azul_corp, spaceBefore=8, spaceAfter=4)
         ))
         
         # === MINI GRÁFICO DE KG/HORA PARA LA SALA ===
-        # Agrupar datos de la sala por día
-        sala_dia_data = defaultdict(lambda: {'kg': 0, 'horas': 0, 'det': 0, 'hh_ef': 0})
-        for orden in sd['ordenes']:
-            dt = orden.get('_inicio_dt')
-            if not dt:
-                continue
-            dia_key = dt.strftime('%d/%m/%y')
-            sala_dia_data[dia_key]['kg'] += orden.get('kg_pt', 0) or 0
-            sala_dia_data[dia_key]['horas'] += orden.get('duracion_horas', 0) or 0
-            sala_dia_data[dia_key]['det'] += orden.get('detenciones', 0) or 0
-            sala_dia_data[dia_key]['hh_ef'] += orden.get('hh_efectiva', 0) or 0
-        
-        if len(sala_dia_data) > 1:  # Solo mostrar si hay más de un día
-            dias_sala = sorted(sala_dia_data.keys(), key=lambda d: datetime.strptime(d, '%d/%m/%y'))
-            kg_hora_sala_vals = []
-            kg_hh_sala_vals = []
-            
-            for dia in dias_sala:
-                data = sala_dia_data[dia]
-                # KG/Hora (duración total)
-                if data['horas'] > 0:
-                    kg_hora_sala_vals.append(data['kg'] / data['horas'])
-                else:
-                    kg_hora_sala_vals.append(0)
-                
-                # KG/Hora Efectiva (descontando detenciones)
-                horas_ef = max(data['horas'] - data['det'], 0)
-                if horas_ef > 0:
-                    kg_hh_sala_vals.append(data['kg'] / horas_ef)
-                else:
-                    kg_hh_sala_vals.append(0)
-            
+        dias_sala_filas = sala_dia_data.get(sala, [])
+
+        if len(dias_sala_filas) > 1:  # Solo mostrar si hay más de un día
+            dias_sala = [_etiqueta_periodo(f['periodo']) for f in dias_sala_filas]
+            # KG/Hora (duración total) y KG/Hora Efectiva (descontando detenciones)
+            kg_hora_sala_vals = [f['kg_hora'] for f in dias_sala_filas]
+            kg_hh_sala_vals = [f['kg_hora_efectiva'] for f in dias_sala_filas]
+
             # Crear mini gráfico
             fig_sala, ax_sala = plt.subplots(figsize=(6, 2.2))
             fig_sala.patch.set_facecolor('white')
@@ -2845,7 +2501,7 @@ def _generar_informe_pdf(
 
         orden_rows = [['Orden', 'Estado', 'Especie', 'KG Total', 'KG/Hora', 'Dot.', 'HH', 'HH Ef.', 'Det.(h)', 'Inicio', 'Fin', 'Rend.']]
         ordenes_sorted = sorted(
-            sd['ordenes'],
+            ordenes_por_sala.get(sala, []),
             key=lambda o: o.get('_inicio_dt') or datetime.min,
             reverse=True
         )
@@ -2910,10 +2566,10 @@ def _generar_informe_pdf(
 
 
 def _render_comparacion(
-    username, password,
+    consulta: Dict,
     fecha_inicio_principal, fecha_fin_principal,
     planta_sel, especie_sel, sala_sel, tipo_proceso_sel,
-    salas_principal, mos_principal
+    salas_principal: Dict[str, Dict], totales_principal: Dict
 ):
     """Sección de Comparación: comparación día a día real entre dos períodos."""
 
@@ -2961,53 +2617,29 @@ def _render_comparacion(
         st.info("👆 Selecciona el rango de fechas a comparar y presiona **Comparar**")
         return
 
-    # Cargar datos del período comparación
-    try:
-        with st.spinner("Cargando datos del período de comparación..."):
-            data_comp = fetch_datos_produccion(
-                username, password,
-                comp_inicio.isoformat(),
-                comp_fin.isoformat()
-            )
-    except Exception as e:
-        st.error(f"Error al cargar datos de comparación: {str(e)}")
-        return
-
-    mos_comp_raw = data_comp.get('mos', [])
-    if not mos_comp_raw:
-        st.warning("No hay órdenes en el período de comparación")
-        return
-
-    # Enriquecer y filtrar igual que el principal
-    for mo in mos_comp_raw:
-        mo['_planta'] = detectar_planta(mo)
-        if not mo.get('_estado'):
-            mo['_estado'] = 'done' if mo.get('fecha_termino') else 'progress'
-        mo['_inicio_dt'] = parsear_fecha(mo.get('fecha_inicio'))
-        mo['_fin_dt'] = parsear_fecha(mo.get('fecha_termino'))
-
-    mos_comp = [mo for mo in mos_comp_raw if mo.get('_estado') != 'cancel']
-    mos_comp = [mo for mo in mos_comp
-                if not any(t in (mo.get('sala') or '').lower()
-                           for t in ['estatico', 'estático'])]
-
-    if planta_sel != "Todos":
-        mos_comp = [mo for mo in mos_comp if mo['_planta'] == planta_sel]
-    if especie_sel != "Todos":
-        mos_comp = [mo for mo in mos_comp if mo.get('especie') == especie_sel]
-    if sala_sel != "Todos":
-        mos_comp = [mo for mo in mos_comp
-                     if (mo.get('sala') or 'Sin Sala') == sala_sel]
-    if tipo_proceso_sel != "Todos":
-        mos_comp = [mo for mo in mos_comp
-                     if mo.get('product_name', '') == tipo_proceso_sel]
-
-    if not mos_comp:
+    # Mismos filtros sobre el período de comparación
+    consulta_comp = {**consulta, "fecha_inicio": comp_inicio.isoformat(), "fecha_fin": comp_fin.isoformat()}
+    with st.spinner("Cargando datos del período de comparación..."):
+        if sala_sel == "Todos":
+            # Las líneas de proceso activas pueden no ser las mismas del período principal
+            sin_sala = {k: v for k, v in consulta["filtros"].items() if k != "sala"}
+            salas_proceso_comp = [f['sala'] for f in _rollup({**consulta_comp, "filtros": sin_sala}, "sala")["filas"]
+                                  if _es_linea_proceso(f['sala'])]
+            consulta_comp["filtros"] = {**sin_sala, "sala": ",".join(salas_proceso_comp)}
+            if not salas_proceso_comp:
+                st.warning("No hay órdenes en el período de comparación")
+                return
+
+        filas_dia_a = _rollup(consulta, "periodo")["filas"]
+        rollup_comp = _rollup(consulta_comp, "periodo")
+        filas_dia_b = rollup_comp["filas"]
+        totales_comp = rollup_comp["totales"]
+        salas_comp = {f['sala']: f for f in _rollup(consulta_comp, "sala")["filas"]}
+
+    if not filas_dia_b:
         st.warning("No hay órdenes con los mismos filtros en el período de comparación")
         return
 
-    salas_comp = _procesar_mos_a_salas(mos_comp)
-
     # === LABELS ===
     lbl_a = f"{fecha_inicio_principal.strftime('%d/%m/%y')} - {fecha_fin_principal.strftime('%d/%m/%y')}"
     lbl_b = f"{comp_inicio.strftime('%d/%m/%y')} - {comp_fin.strftime('%d/%m/%y')}"
@@ -3023,39 +2655,21 @@ def _render_comparacion(
         dia_esp = DIAS_ES.get(dia_en, dia_en)
         return f"{dia_esp} {dt.strftime('%d/%m/%y')}"
 
-    # === AGRUPAR KG POR DÍA ===
-    def _kg_por_dia(mos_list):
-        dia_kg = defaultdict(float)
-        dia_ordenes = defaultdict(int)
-        dia_horas = defaultdict(float)
-        for mo in mos_list:
-            dt = mo.get('_inicio_dt')
-            if not dt:
-                continue
-            dia_key = dt.strftime('%Y-%m-%d')
-            dia_kg[dia_key] += mo.get('kg_pt', 0) or 0
-            dia_ordenes[dia_key] += 1
-            # Acumular horas del día
-            duracion = mo.get('duracion_horas', 0) or 0
-            if duracion > 0:
-                dia_horas[dia_key] += duracion
-        return dict(sorted(dia_kg.items())), dict(sorted(dia_ordenes.items())), dict(sorted(dia_horas.items()))
-
-    dias_kg_a, dias_ord_a, dias_horas_a = _kg_por_dia(mos_principal)
-    dias_kg_b, dias_ord_b, dias_horas_b = _kg_por_dia(mos_comp)
-
-    dias_a_list = sorted(dias_kg_a.items())
-    dias_b_list = sorted(dias_kg_b.items())
+    # === KG POR DÍA (cubo) ===
+    dias_a_list = [(f['periodo'], f['kg_pt']) for f in filas_dia_a]
+    dias_b_list = [(f['periodo'], f['kg_pt']) for f in filas_dia_b]
+    dias_ord_a = {f['periodo']: f['ordenes'] for f in filas_dia_a}
+    dias_ord_b = {f['periodo']: f['ordenes'] for f in filas_dia_b}
 
     if not dias_a_list and not dias_b_list:
         st.warning("No hay datos diarios para comparar")
         return
 
     # === TOTALES ===
-    kg_a_total = sum(kg for _, kg in dias_a_list)
-    kg_b_total = sum(kg for _, kg in dias_b_list)
-    ord_a_total = len(mos_principal)
-    ord_b_total = len(mos_comp)
+    kg_a_total = totales_principal.get('kg_pt', 0)
+    kg_b_total = totales_comp.get('kg_pt', 0)
+    ord_a_total = totales_principal.get('ordenes', 0)
+    ord_b_total = totales_comp.get('ordenes', 0)
     dias_a_count = len(dias_a_list)
     dias_b_count = len(dias_b_list)
     prom_dia_a = kg_a_total / dias_a_count if dias_a_count > 0 else 0
@@ -3068,8 +2682,8 @@ def _render_comparacion(
         return pct
 
     # KG/Hora promedio por período
-    kgh_a = _calcular_kg_hora(mos_principal)
-    kgh_b = _calcular_kg_hora(mos_comp)
+    kgh_a = totales_principal.get('kg_hora', 0)
+    kgh_b = totales_comp.get('kg_hora', 0)
 
     # === HEADER V/S ===
     st.markdown(f"""
@@ -3137,21 +2751,8 @@ def _render_comparacion(
     vals_b = [round(kg) for _, kg in dias_b_list]
     
     # Calcular KG/H por día para cada período
-    kg_hora_a = []
-    for fecha, kg in dias_a_list:
-        horas = dias_horas_a.get(fecha, 0)
-        if horas > 0:
-            kg_hora_a.append({"value": round(kg), "kg_hora": round(kg / horas, 0)})
-        else:
-            kg_hora_a.append({"value": round(kg), "kg_hora": 0})
-    
-    kg_hora_b = []
-    for fecha, kg in dias_b_list:
-        horas = dias_horas_b.get(fecha, 0)
-        if horas > 0:
-            kg_hora_b.append({"value": round(kg), "kg_hora": round(kg / horas, 0)})
-        else:
-            kg_hora_b.append({"value": round(kg), "kg_hora": 0})
+    kg_hora_a = [{"value": round(f['kg_pt']), "kg_hora": round(f['kg_hora'])} for f in filas_dia_a]
+    kg_hora_b = [{"value": round(f['kg_pt']), "kg_hora": round(f['kg_hora'])} for f in filas_dia_b]
 
     # Gráficos uno debajo del otro para mayor visibilidad
     opts_a = {
@@ -3389,8 +2990,8 @@ def _render_comparacion(
             nombres_sala.append(sala)
             sa = salas_principal.get(sala)
             sc = salas_comp.get(sala)
-            kg_sala_a.append(round(sa['total_kg']) if sa else 0)
-            kg_sala_b.append(round(sc['total_kg']) if sc else 0)
+            kg_sala_a.append(round(sa['kg_pt']) if sa else 0)
+            kg_sala_b.append(round(sc['kg_pt']) if sc else 0)
 
         options_sala = {
             "backgroundColor": "#ffffff",
@@ -3502,8 +3103,8 @@ def _render_comparacion(
             sc = salas_comp.get(sala)
             
             # Calcular KG/H promedio de cada sala
-            kgh_a = (sa['kg_con_duracion'] / sa['duracion_total']) if sa and sa['duracion_total'] > 0 else 0
-            kgh_b = (sc['kg_con_duracion'] / sc['duracion_total']) if sc and sc['duracion_total'] > 0 else 0
+            kgh_a = _kg_hora_sala(sa) if sa else 0
+            kgh_b = _kg_hora_sala(sc) if sc else 0
             
             # Solo incluir salas que tengan datos en al menos uno de los períodos
             if kgh_a > 0 or kgh_b > 0:
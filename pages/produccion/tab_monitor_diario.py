@@ -8,6 +8,8 @@ import httpx
 from datetime import date, timedelta
 from streamlit_echarts import st_echarts
 
+from shared.report_jobs import generar_reporte, opcion_regenerar
+
 from .shared import (
     clean_name, get_state_label, format_fecha, format_num, fmt_numero,
     detectar_planta, API_URL, ESTADOS_MAP
@@ -124,12 +126,14 @@ def guardar_snapshot(username: str, password: str, fecha: str, planta: str = Non
     return response.json()
 
 
-def descargar_reporte_pdf(data: dict):
-    """Descarga el reporte PDF."""
-    response = httpx.post(f"{API_URL}/api/v1/produccion/monitor/report_pdf",
-                          json=data, timeout=120.0)
-    response.raise_for_status()
-    return response.content
+def descargar_reporte_pdf(data: dict, forzar: bool = False):
+    """Genera el reporte PDF en la cola de reportes del backend (con progreso) y lo retorna."""
+    params = {k: v for k, v in data.items() if k not in ("username", "password")}
+    pdf_bytes, _, _ = generar_reporte(
+        API_URL, "monitor_pdf", data["username"], data["password"], params,
+        titulo="Generando reporte PDF...", forzar=forzar
+    )
+    return pdf_bytes
 
 
 # ===================== UTILIDADES =====================
@@ -1028,6 +1032,7 @@ def render(username: str, password: str):
     
     with btn_col4:
         btn_pdf = st.button("📄 Descargar PDF", key="btn_monitor_pdf")
+        forzar_pdf = opcion_regenerar("monitor_regenerar_pdf")
     
     if btn_refresh:
         # Limpiar datos cargados para forzar recarga
@@ -1093,7 +1098,7 @@ def render(username: str, password: str):
                 fecha_fin.isoformat(),
                 planta_sel
             )
-            st.success(f"✅ Snapshot guardado: {result.get('filename', '')}")
+            st.success(f"✅ Snapshot guardado: #{result.get('id', '')}")
         except Exception as e:
             st.error(f"Error al guardar snapshot: {str(e)}")
     
@@ -1103,22 +1108,18 @@ def render(username: str, password: str):
             st.warning("⚠️ Primero debes cargar los datos con el botón 'Buscar'")
         else:
             try:
-                activos = st.session_state.get("monitor_activos", {})
-                cerrados = st.session_state.get("monitor_cerrados", {})
-                evolucion = st.session_state.get("monitor_evolucion", {})
-                
+                # El backend arma el reporte desde la misma línea de tiempo (cacheada)
                 pdf_data = {
+                    "username": username,
+                    "password": password,
                     "fecha_inicio": fecha_inicio.isoformat(),
                     "fecha_fin": fecha_fin.isoformat(),
                     "planta": planta_sel,
                     "sala": sala_sel,
-                    "procesos_pendientes": activos.get("procesos", []),
-                    "procesos_cerrados": cerrados.get("procesos", []),
-                    "evolucion": evolucion.get("evolucion", []),
-                    "totales": evolucion.get("totales", {})
+                    "producto": producto_sel
                 }
                 
-                pdf_bytes = descargar_reporte_pdf(pdf_data)
+                pdf_bytes = descargar_reporte_pdf(pdf_data, forzar=forzar_pdf)
                 
                 st.download_button(
                     label="⬇️ Descargar Reporte PDF",
@@ -12,7 +12,7 @@ from datetime import datetime, timedelta
 
 from .shared import (
     API_URL, fmt_numero, fmt_porcentaje, get_alert_color,
-    filtrar_mos_por_planta, fetch_dashboard_completo, skeleton_loader
+    filtrar_mos_por_planta, fetch_dashboard_completo, skeleton_loader, columna_texto
 )
 from .graficos import grafico_congelado_semanal, grafico_vaciado_por_sala, grafico_salas_consolidado, grafico_tuneles_consolidado
 
@@ -160,8 +160,8 @@ def render(username: str, password: str):
     salas = dashboard.get('salas') if dashboard else None
     mos_original = dashboard.get('mos') if dashboard else None
     
-    # Aplicar filtro de planta
-    if mos_original:
+    # Aplicar filtro de planta (las MOs llegan como DataFrame)
+    if mos_original is not None and not mos_original.empty:
         mos = filtrar_mos_por_planta(mos_original, filtro_rfp_prod, filtro_vilkun_prod)
         if len(mos) != len(mos_original):
             plantas_activas = []
@@ -176,7 +176,7 @@ def render(username: str, password: str):
     if data:
         st.markdown("---")
         # Renderizar resumen de volumen de masa primero (destacado)
-        if mos:
+        if mos is not None and not mos.empty:
             _render_volumen_masa(mos, data, agrupacion, filtro_rfp_prod, filtro_vilkun_prod)
         _render_kpis_tabs(data, mos, consolidado, salas, fecha_inicio_rep, fecha_fin_rep, username, password, agrupacion)
         st.markdown("---")
@@ -205,17 +205,16 @@ def _render_volumen_masa(mos, data, agrupacion, filtro_rfp, filtro_vilkun):
     st.caption(f"Volumen total de producción agrupado por {agrupacion.lower()} | Plantas: **{planta_label}**")
     
     # KPIs destacados de volumen
-    total_kg_mp = sum(mo.get('kg_mp', 0) or 0 for mo in mos)
-    total_kg_pt = sum(mo.get('kg_pt', 0) or 0 for mo in mos)
+    kg_pt_mos = pd.to_numeric(mos.get('kg_pt', pd.Series(0, index=mos.index)), errors='coerce').fillna(0)
+    total_kg_mp = pd.to_numeric(mos.get('kg_mp', pd.Series(0, index=mos.index)), errors='coerce').fillna(0).sum()
+    total_kg_pt = kg_pt_mos.sum()
     total_mos = len(mos)
     rendimiento_promedio = (total_kg_pt / total_kg_mp * 100) if total_kg_mp > 0 else 0
     
     # Separar por tipo de sala
-    mos_proceso = [mo for mo in mos if mo.get('sala_tipo') == 'PROCESO']
-    mos_congelado = [mo for mo in mos if mo.get('sala_tipo') == 'CONGELADO']
-    
-    kg_proceso = sum(mo.get('kg_pt', 0) or 0 for mo in mos_proceso)
-    kg_congelado = sum(mo.get('kg_pt', 0) or 0 for mo in mos_congelado)
+    sala_tipo_mos = mos['sala_tipo'] if 'sala_tipo' in mos.columns else pd.Series(None, index=mos.index)
+    kg_proceso = kg_pt_mos[sala_tipo_mos == 'PROCESO'].sum()
+    kg_congelado = kg_pt_mos[sala_tipo_mos == 'CONGELADO'].sum()
     
     # Métricas principales en cards grandes
     st.markdown("""
@@ -250,7 +249,7 @@ def _render_volumen_masa(mos, data, agrupacion, filtro_rfp, filtro_vilkun):
         st.metric("❄️ Kg Congelado", fmt_numero(kg_congelado, 0))
     
     # Preparar datos para gráfico ampliado
-    df_mos = pd.DataFrame(mos)
+    df_mos = mos.copy()
     
     if df_mos.empty or 'fecha' not in df_mos.columns:
         st.warning("No hay datos de fabricaciones para mostrar en el gráfico.")
@@ -375,40 +374,42 @@ def _render_volumen_masa(mos, data, agrupacion, filtro_rfp, filtro_vilkun):
         st.caption(f"Período: {periodo}")
         
         # Filtrar ODFs del período y sala
-        mos_filtradas = [
-            mo for mo in mos
-            if (
-                (agrupacion == "Día" and pd.to_datetime(mo['fecha']).strftime('%Y-%m-%d') == periodo) or
-                (agrupacion == "Semana" and pd.to_datetime(mo['fecha']).strftime('S%W-%Y') == periodo) or
-                (agrupacion == "Mes" and pd.to_datetime(mo['fecha']).strftime('%b-%Y') == periodo)
-            )
-            and clasificar_tunel(mo.get('sala', ''), mo.get('product_name', '')) == sala
-        ]
+        formato_periodo = {"Día": '%Y-%m-%d', "Semana": 'S%W-%Y', "Mes": '%b-%Y'}.get(agrupacion)
+        fechas = pd.to_datetime(mos['fecha'], errors='coerce')
+        salas_mos = pd.Series(
+            [clasificar_tunel(s, p) for s, p in zip(columna_texto(mos, 'sala'), columna_texto(mos, 'product_name'))],
+            index=mos.index
+        )
+        mascara = (fechas.dt.strftime(formato_periodo) == periodo) & (salas_mos == sala)
+        df_filtradas = mos[mascara]
         
-        if not mos_filtradas:
+        if df_filtradas.empty:
             st.warning("No se encontraron órdenes para este período y sala.")
             return
         
-        st.info(f"🔢 Total: **{len(mos_filtradas)}** órdenes de fabricación")
+        st.info(f"🔢 Total: **{len(df_filtradas)}** órdenes de fabricación")
+        
+        def _col(nombre, defecto):
+            return df_filtradas[nombre] if nombre in df_filtradas.columns else pd.Series(defecto, index=df_filtradas.index)
         
         # Preparar datos para tabla con todos los campos disponibles
-        df_odfs = pd.DataFrame([{
-            'ODF': mo['mo_name'],
-            'Fecha': pd.to_datetime(mo['fecha']).strftime('%Y-%m-%d'),
-            'Producto': mo.get('producto', ''),
-            'Especie': mo.get('especie', ''),
-            'Manejo': mo.get('manejo', ''),
-            'Kg PT': mo.get('kg_pt', 0),
-            'Kg MP': mo.get('kg_mp', 0),
-            'Rendimiento': mo.get('rendimiento', 0),
-            'Sala': mo.get('sala_original') or mo.get('sala', ''),
-            'Dotación': mo.get('dotacion', 0),
-            'HH Efectiva': mo.get('hh_efectiva', 0),
-            'Kg/HH': mo.get('kg_hh', 0),
-            'Estado': mo.get('estado', ''),
-            'Planta': mo.get('planta', ''),
-            'ID': mo['mo_id']
-        } for mo in mos_filtradas])
+        df_odfs = pd.DataFrame({
+            'ODF': df_filtradas['mo_name'],
+            'Fecha': fechas[mascara].dt.strftime('%Y-%m-%d'),
+            'Producto': _col('producto', ''),
+            'Especie': _col('especie', ''),
+            'Manejo': _col('manejo', ''),
+            'Kg PT': _col('kg_pt', 0),
+            'Kg MP': _col('kg_mp', 0),
+            'Rendimiento': _col('rendimiento', 0),
+            'Sala': columna_texto(df_filtradas, 'sala_original', 'sala'),
+            'Dotación': _col('dotacion', 0),
+            'HH Efectiva': _col('hh_efectiva', 0),
+            'Kg/HH': _col('kg_hh', 0),
+            'Estado': _col('estado', ''),
+            'Planta': _col('planta', ''),
+            'ID': df_filtradas['mo_id']
+        })
         
         # Determinar qué columnas mostrar (solo las que tienen datos no vacíos)
         columnas_mostrar = ['ODF', 'Fecha']
@@ -688,8 +689,10 @@ def _render_kpis_tabs(data, mos=None, consolidado=None, salas=None, fecha_inicio
         
         # NOTA: El gráfico acumulado por línea está en Volumen de Masa arriba
         
+        hay_mos = mos is not None and not mos.empty
+        
         # === GRÁFICO TEMPORAL DE PROCESO/VACIADO POR SALA (DETALLE POR LÍNEA) ===
-        if mos:
+        if hay_mos:
             st.markdown("---")
             titulo_agrupacion = {"Día": "Diario", "Semana": "Semanal", "Mes": "Mensual"}.get(agrupacion, "Semanal")
             st.markdown(f"### 📊 Análisis {titulo_agrupacion} por Sala y Línea (Detalle)")
@@ -697,10 +700,10 @@ def _render_kpis_tabs(data, mos=None, consolidado=None, salas=None, fecha_inicio
 
         
         # === DETALLE DE FABRICACIONES - PROCESO ===
-        if mos:
+        if hay_mos and 'sala_tipo' in mos.columns:
             # Filtrar solo MOs de proceso
-            mos_proceso = [mo for mo in mos if mo.get('sala_tipo') == 'PROCESO']
-            if mos_proceso:
+            mos_proceso = mos[mos['sala_tipo'] == 'PROCESO']
+            if not mos_proceso.empty:
                 _render_detalle_fabricaciones(mos_proceso, fecha_inicio_rep, fecha_fin_rep, username, password, tipo_filtro='PROCESO')
     
     with vista_tabs[1]:
@@ -727,22 +730,22 @@ def _render_kpis_tabs(data, mos=None, consolidado=None, salas=None, fecha_inicio
         
         _fragment_kpis_congelado()
         
-        # Función para detectar MOs de congelado (incluyendo Túnel Continuo)
-        def es_mo_congelado(mo):
-            """Determina si una MO es de congelado (túnel estático o continuo)."""
-            if mo.get('sala_tipo') == 'CONGELADO':
-                return True
-            product_name = mo.get('product_name', '')
-            if product_name:
-                product_upper = str(product_name).upper()
-                return ('[1.4]' in product_name and 
-                       ('TÚNEL CONTINUO' in product_upper or 'TÚNEL CONTÍNUO' in product_upper))
-            return False
+        hay_mos = mos is not None and not mos.empty
+        
+        # MOs de congelado (túnel estático o continuo, este último por nombre de producto)
+        if hay_mos:
+            product_names = columna_texto(mos, 'product_name').astype(str)
+            product_upper = product_names.str.upper()
+            es_continuo = product_names.str.contains('[1.4]', regex=False) & (
+                product_upper.str.contains('TÚNEL CONTINUO', regex=False) |
+                product_upper.str.contains('TÚNEL CONTÍNUO', regex=False)
+            )
+            sala_tipo_mos = mos['sala_tipo'] if 'sala_tipo' in mos.columns else pd.Series(None, index=mos.index)
+            mos_congelado = mos[(sala_tipo_mos == 'CONGELADO') | es_continuo]
         
         # === KPIs POR TÚNEL INDIVIDUAL ===
-        if mos:
-            mos_congelado = [mo for mo in mos if es_mo_congelado(mo)]
-            if mos_congelado:
+        if hay_mos:
+            if not mos_congelado.empty:
                 st.markdown("---")
                 st.markdown("### 🧊 KPIs por Túnel Individual")
                 # DEBUG TEMPORAL (eliminar luego)
@@ -750,32 +753,30 @@ def _render_kpis_tabs(data, mos=None, consolidado=None, salas=None, fecha_inicio
                 st.caption("Rendimiento y producción de cada túnel (incluyendo Túnel Continuo)")
                 
                 # Agrupar por sala/túnel
-                from collections import defaultdict
-                tuneles_data = defaultdict(lambda: {'kg_mp': 0, 'kg_pt': 0, 'mos': 0, 'kg_merma': 0})
+                def _nombre_tunel(sala_mo, product_name):
+                    """Nombre del túnel (Túnel Continuo por product_name)."""
+                    if product_name and '[1.4]' in product_name and 'TÚNEL CONTÍNUO' in product_name.upper():
+                        if sala_mo and 'tunel' not in str(sala_mo).lower() and 'túnel' not in str(sala_mo).lower():
+                            return f'{sala_mo} - Túnel Continuo'
+                        return 'Túnel Continuo'
+                    return sala_mo
                 
-                for mo in mos_congelado:
-                    # Determinar nombre del túnel (Túnel Continuo por product_name)
-                    product_name = mo.get('product_name', '')
-                    sala_mo = mo.get('sala', 'Sin Sala')
-                    if product_name:
-                        product_upper = str(product_name).upper()
-                        if '[1.4]' in product_name and 'TÚNEL CONTÍNUO' in product_upper:
-                            if sala_mo and 'tunel' not in str(sala_mo).lower() and 'túnel' not in str(sala_mo).lower():
-                                sala = f'{sala_mo} - Túnel Continuo'
-                            else:
-                                sala = 'Túnel Continuo'
-                        else:
-                            sala = sala_mo
-                    else:
-                        sala = sala_mo
-                    
-                    tuneles_data[sala]['kg_mp'] += mo.get('kg_mp', 0) or 0
-                    tuneles_data[sala]['kg_pt'] += mo.get('kg_pt', 0) or 0
-                    tuneles_data[sala]['kg_merma'] += mo.get('kg_merma', 0) or 0
-                    tuneles_data[sala]['mos'] += 1
+                salas_cong = (mos_congelado['sala'] if 'sala' in mos_congelado.columns
+                              else pd.Series('Sin Sala', index=mos_congelado.index))
+                df_tuneles = pd.DataFrame({
+                    'tunel': [_nombre_tunel(s, p) for s, p in
+                              zip(salas_cong, columna_texto(mos_congelado, 'product_name').astype(str))],
+                    **{
+                        medida: pd.to_numeric(mos_congelado[medida], errors='coerce').fillna(0)
+                        if medida in mos_congelado.columns else 0.0
+                        for medida in ('kg_mp', 'kg_pt', 'kg_merma')
+                    }
+                }, index=mos_congelado.index)
+                df_tuneles['mos'] = 1
+                tuneles_agg = df_tuneles.groupby('tunel', dropna=False).sum().sort_values('kg_pt', ascending=False)
                 
                 # Ordenar por volumen
-                tuneles_sorted = sorted(tuneles_data.items(), key=lambda x: x[1]['kg_pt'], reverse=True)
+                tuneles_sorted = list(tuneles_agg.to_dict('index').items())
                 
                 # Mostrar cada túnel
                 for tunel_name, tunel_stats in tuneles_sorted:
@@ -802,7 +803,7 @@ def _render_kpis_tabs(data, mos=None, consolidado=None, salas=None, fecha_inicio
         # NOTA: El gráfico acumulado por túnel está en Volumen de Masa arriba
         
         # === GRÁFICO TEMPORAL DE CONGELADO (DETALLE POR TÚNEL) ===
-        if mos:
+        if hay_mos:
             st.markdown("---")
             titulo_agrupacion = {"Día": "Diario", "Semana": "Semanal", "Mes": "Mensual"}.get(agrupacion, "Semanal")
             st.markdown(f"### 📊 Análisis {titulo_agrupacion} de Congelado (Detalle)")
@@ -810,11 +811,10 @@ def _render_kpis_tabs(data, mos=None, consolidado=None, salas=None, fecha_inicio
 
         
         # === DETALLE DE FABRICACIONES - CONGELADO ===
-        if mos:
-            # Filtrar MOs de congelado (incluyendo Túnel Continuo)
-            mos_congelado_detalle = [mo for mo in mos if es_mo_congelado(mo)]
-            if mos_congelado_detalle:
-                _render_detalle_fabricaciones(mos_congelado_detalle, fecha_inicio_rep, fecha_fin_rep, username, password, tipo_filtro='CONGELADO')
+        if hay_mos:
+            # MOs de congelado (incluyendo Túnel Continuo)
+            if not mos_congelado.empty:
+                _render_detalle_fabricaciones(mos_congelado, fecha_inicio_rep, fecha_fin_rep, username, password, tipo_filtro='CONGELADO')
 
 
 def _render_resumen_fruta_manejo(consolidado):
@@ -975,7 +975,7 @@ def _render_detalle_fabricaciones(mos, fecha_inicio_rep, fecha_fin_rep, username
     else:
         st.subheader("📋 Detalle de Fabricaciones - Todas")
     
-    df_mos_original = pd.DataFrame(mos)
+    df_mos_original = mos.reset_index(drop=True)
     
     # Crear sufijo único para las claves según el tipo de filtro
     key_suffix = f"_{tipo_filtro}" if tipo_filtro else "_global"
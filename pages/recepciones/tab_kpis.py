@@ -10,6 +10,8 @@ import io
 import os
 from datetime import datetime, timedelta
 from .shared import fmt_numero, fmt_dinero, fmt_fecha, API_URL, fetch_recepciones_mp_facturacion
+from shared.columnar import accept_header, read_response
+from shared.report_jobs import generar_reporte, opcion_regenerar
 
 
 @st.fragment
@@ -105,10 +107,9 @@ def render(username: str, password: str):
                     query_string += f"&origen={orig}"
                 
                 full_url = f"{api_url}?{query_string}"
-                resp = requests.get(full_url, timeout=60)
+                resp = requests.get(full_url, headers=accept_header(), timeout=60)
                 if resp.status_code == 200:
-                    data = resp.json()
-                    df = pd.DataFrame(data)
+                    df, _ = read_response(resp)
                     if not df.empty:
                         st.session_state.df_recepcion = df
                         st.session_state.idx_recepcion = None
@@ -662,20 +663,19 @@ def render(username: str, password: str):
                     'solo_hechas': solo_hechas
                 }
         
+            forzar_informe = opcion_regenerar("kpis_regenerar_informe")
             informe_cols = st.columns([1,1,1])
             # Botón 1: semana seleccionada
             with informe_cols[0]:
                 if st.button("Descargar informe (Semana seleccionada)"):
                     try:
-                        with st.spinner("Generando informe PDF..."):
-                            resp = requests.get(f"{API_URL}/api/v1/recepciones-mp/report", params={**params, 'include_prev_week': False, 'include_month_accum': False}, timeout=120)
-                        if resp.status_code == 200:
-                            pdf_bytes = resp.content
-                            # sanitizar filename
-                            fname = f"informe_{params['fecha_inicio']}_a_{params['fecha_fin']}.pdf".replace('/', '-')
-                            st.download_button("Descargar PDF (Semana)", data=pdf_bytes, file_name=fname, mime='application/pdf')
-                        else:
-                            st.error(f"Error al generar informe: {resp.status_code} - {resp.text}")
+                        pdf_bytes, _, _ = generar_reporte(
+                            API_URL, "recepciones_pdf", params['username'], params['password'],
+                            {**params, 'include_prev_week': False, 'include_month_accum': False},
+                            titulo="Generando informe PDF...", forzar=forzar_informe
+                        )
+                        fname = f"informe_{params['fecha_inicio']}_a_{params['fecha_fin']}.pdf".replace('/', '-')
+                        st.download_button("Descargar PDF (Semana)", data=pdf_bytes, file_name=fname, mime='application/pdf')
                     except Exception as e:
                         st.error(f"Error al solicitar informe: {e}")
 
@@ -683,14 +683,13 @@ def render(username: str, password: str):
             with informe_cols[1]:
                 if st.button("Descargar informe (Semana + resumen)"):
                     try:
-                        with st.spinner("Generando informe PDF con resumen..."):
-                            resp = requests.get(f"{API_URL}/api/v1/recepciones-mp/report", params={**params, 'include_prev_week': True, 'include_month_accum': True}, timeout=180)
-                        if resp.status_code == 200:
-                            pdf_bytes = resp.content
-                            fname = f"informe_{params['fecha_inicio']}_a_{params['fecha_fin']}_resumen.pdf".replace('/', '-')
-                            st.download_button("Descargar PDF (Semana+Resumen)", data=pdf_bytes, file_name=fname, mime='application/pdf')
-                        else:
-                            st.error(f"Error al generar informe: {resp.status_code} - {resp.text}")
+                        pdf_bytes, _, _ = generar_reporte(
+                            API_URL, "recepciones_pdf", params['username'], params['password'],
+                            {**params, 'include_prev_week': True, 'include_month_accum': True},
+                            titulo="Generando informe PDF con resumen...", forzar=forzar_informe
+                        )
+                        fname = f"informe_{params['fecha_inicio']}_a_{params['fecha_fin']}_resumen.pdf".replace('/', '-')
+                        st.download_button("Descargar PDF (Semana+Resumen)", data=pdf_bytes, file_name=fname, mime='application/pdf')
                     except Exception as e:
                         st.error(f"Error al solicitar informe: {e}")
 
@@ -698,14 +697,13 @@ def render(username: str, password: str):
             with informe_cols[2]:
                 if st.button("Descargar informe (Período completo)"):
                     try:
-                        with st.spinner("Generando informe PDF del período..."):
-                            resp = requests.get(f"{API_URL}/api/v1/recepciones-mp/report", params={**params, 'include_prev_week': False, 'include_month_accum': False}, timeout=120)
-                        if resp.status_code == 200:
-                            pdf_bytes = resp.content
-                            fname = f"informe_periodo_{params['fecha_inicio']}_a_{params['fecha_fin']}.pdf".replace('/', '-')
-                            st.download_button("Descargar PDF (Período)", data=pdf_bytes, file_name=fname, mime='application/pdf')
-                        else:
-                            st.error(f"Error al generar informe: {resp.status_code} - {resp.text}")
+                        pdf_bytes, _, _ = generar_reporte(
+                            API_URL, "recepciones_pdf", params['username'], params['password'],
+                            {**params, 'include_prev_week': False, 'include_month_accum': False},
+                            titulo="Generando informe PDF del período...", forzar=forzar_informe
+                        )
+                        fname = f"informe_periodo_{params['fecha_inicio']}_a_{params['fecha_fin']}.pdf".replace('/', '-')
+                        st.download_button("Descargar PDF (Período)", data=pdf_bytes, file_name=fname, mime='application/pdf')
                     except Exception as e:
                         st.error(f"Error al solicitar informe: {e}")
 
@@ -1018,37 +1016,34 @@ def render(username: str, password: str):
                     if 'excel_detallado_data' not in st.session_state:
                         st.session_state.excel_detallado_data = None
                 
+                    forzar_excel = opcion_regenerar("kpis_regenerar_excel_det")
                     if st.button("📊 Generar Excel Detallado", type="primary", key="btn_generar_excel_det"):
                         try:
-                            with st.spinner("Generando Excel detallado en el servidor..."):
-                                # Construir parámetros pasando las listas de filtros
-                                params_excel = {**params, 'include_prev_week': False, 'include_month_accum': False}
-
-                                # Pasar listas directamente para que requests envíe múltiples query params
-                                if tipo_fruta_filtro:
-                                    params_excel['tipo_fruta'] = tipo_fruta_filtro if isinstance(tipo_fruta_filtro, list) else [tipo_fruta_filtro]
-                                if clasif_filtro:
-                                    params_excel['clasificacion'] = clasif_filtro if isinstance(clasif_filtro, list) else [clasif_filtro]
-                                if manejo_filtro:
-                                    params_excel['manejo'] = manejo_filtro if isinstance(manejo_filtro, list) else [manejo_filtro]
-                                if productor_filtro:
-                                    params_excel['productor'] = productor_filtro if isinstance(productor_filtro, list) else [productor_filtro]
-
-                                # Pasar filtro de origen (planta) al Excel
-                                origen_filtro_usado = st.session_state.get('origen_filtro_usado', [])
-                                if origen_filtro_usado:
-                                    params_excel['origen'] = origen_filtro_usado
-
-                                resp = requests.get(f"{API_URL}/api/v1/recepciones-mp/report.xlsx", params=params_excel, timeout=180)
-
-                            if resp.status_code == 200:
-                                xlsx_bytes = resp.content
-                                fname = f"recepciones_detalle_{params['fecha_inicio']}_a_{params['fecha_fin']}.xlsx".replace('/', '-')
-                                # Guardar en session_state
-                                st.session_state.excel_detallado_data = (xlsx_bytes, fname)
-                                st.success("✅ Excel generado correctamente. Haz clic en 'Descargar' para obtenerlo.")
-                            else:
-                                st.error(f"Error al generar Excel detallado: {resp.status_code} - {resp.text}")
+                            # Construir parámetros pasando las listas de filtros
+                            params_excel = {**params, 'include_prev_week': False, 'include_month_accum': False}
+
+                            if tipo_fruta_filtro:
+                                params_excel['tipo_fruta'] = tipo_fruta_filtro if isinstance(tipo_fruta_filtro, list) else [tipo_fruta_filtro]
+                            if clasif_filtro:
+                                params_excel['clasificacion'] = clasif_filtro if isinstance(clasif_filtro, list) else [clasif_filtro]
+                            if manejo_filtro:
+                                params_excel['manejo'] = manejo_filtro if isinstance(manejo_filtro, list) else [manejo_filtro]
+                            if productor_filtro:
+                                params_excel['productor'] = productor_filtro if isinstance(productor_filtro, list) else [productor_filtro]
+
+                            # Pasar filtro de origen (planta) al Excel
+                            origen_filtro_usado = st.session_state.get('origen_filtro_usado', [])
+                            if origen_filtro_usado:
+                                params_excel['origen'] = origen_filtro_usado
+
+                            xlsx_bytes, _, _ = generar_reporte(
+                                API_URL, "recepciones_xlsx", username, password, params_excel,
+                                titulo="Generando Excel detallado en el servidor...", forzar=forzar_excel
+                            )
+                            fname = f"recepciones_detalle_{params['fecha_inicio']}_a_{params['fecha_fin']}.xlsx".replace('/', '-')
+                            # Guardar en session_state
+                            st.session_state.excel_detallado_data = (xlsx_bytes, fname)
+                            st.success("✅ Excel generado correctamente. Haz clic en 'Descargar' para obtenerlo.")
                         except Exception as e:
                             st.error(f"Error al solicitar Excel detallado: {e}")
             
@@ -1084,44 +1079,33 @@ def render(username: str, password: str):
                     if 'excel_defectos_data' not in st.session_state:
                         st.session_state.excel_defectos_data = None
                 
+                    forzar_defectos = opcion_regenerar("kpis_regenerar_excel_defectos")
                     if st.button("� Generar Reporte de Calidad Detallado", type="primary", key="btn_generar_excel_defectos"):
                         try:
-                            with st.spinner("Generando reporte de calidad detallado en el servidor..."):
-                                # Obtener origen filtro desde session_state
-                                origen_filtro_usado = st.session_state.get('origen_filtro_usado', [])
-                                
-                                # Si no hay origen guardado, usar todos por defecto
-                                if not origen_filtro_usado:
-                                    origen_filtro_usado = ["RFP", "VILKUN", "SAN JOSE"]
-                                
-                                # Usar los mismos parámetros de filtro
-                                params_defectos = {
-                                    'username': username,
-                                    'password': password,
-                                    'fecha_inicio': params['fecha_inicio'],
-                                    'fecha_fin': params['fecha_fin'],
-                                    'solo_hechas': params.get('solo_hechas', True),
-                                }
-                                
-                                # Pasar origen como lista (múltiples parámetros origen=X&origen=Y)
-                                if origen_filtro_usado:
-                                    # requests maneja listas creando múltiples query params
-                                    params_defectos['origen'] = origen_filtro_usado
-                            
-                                resp = requests.get(
-                                    f"{API_URL}/api/v1/recepciones-mp/report-defectos.xlsx",
-                                    params=params_defectos,
-                                    timeout=180
-                                )
-                        
-                            if resp.status_code == 200:
-                                xlsx_bytes = resp.content
-                                fname = f"recepciones_calidad_detallado_{params['fecha_inicio']}_a_{params['fecha_fin']}.xlsx".replace('/', '-')
-                                # Guardar en session_state
-                                st.session_state.excel_defectos_data = (xlsx_bytes, fname)
-                                st.success("✅ Reporte de calidad detallado generado correctamente. Haz clic en 'Descargar' para obtenerlo.")
-                            else:
-                                st.error(f"Error al generar reporte de calidad detallado: {resp.status_code} - {resp.text}")
+                            # Obtener origen filtro desde session_state
+                            origen_filtro_usado = st.session_state.get('origen_filtro_usado', [])
+
+                            # Si no hay origen guardado, usar todos por defecto
+                            if not origen_filtro_usado:
+                                origen_filtro_usado = ["RFP", "VILKUN", "SAN JOSE"]
+
+                            # Usar los mismos parámetros de filtro
+                            params_defectos = {
+                                'fecha_inicio': params['fecha_inicio'],
+                                'fecha_fin': params['fecha_fin'],
+                                'solo_hechas': params.get('solo_hechas', True),
+                                'origen': origen_filtro_usado,
+                            }
+
+                            xlsx_bytes, _, _ = generar_reporte(
+                                API_URL, "recepciones_defectos_xlsx", username, password, params_defectos,
+                                titulo="Generando reporte de calidad detallado en el servidor...",
+                                forzar=forzar_defectos
+                            )
+                            fname = f"recepciones_calidad_detallado_{params['fecha_inicio']}_a_{params['fecha_fin']}.xlsx".replace('/', '-')
+                            # Guardar en session_state
+                            st.session_state.excel_defectos_data = (xlsx_bytes, fname)
+                            st.success("✅ Reporte de calidad detallado generado correctamente. Haz clic en 'Descargar' para obtenerlo.")
                         except Exception as e:
                             st.error(f"Error al solicitar reporte de calidad detallado: {e}")
             
@@ -0,0 +1,144 @@
+"""
+Transporte columnar (Arrow IPC stream) para payloads grandes de dashboards.
+
+Lo usan ambos lados:
+- backend: serializa listas de registros / DataFrames a Arrow IPC
+- frontend: lee la respuesta directo a DataFrame sin pasar por JSON
+
+Formato: un stream IPC con una tabla. El resto del payload (KPIs, overview, etc.)
+viaja como JSON en la metadata del schema (clave b"payload"). Columnas que Arrow
+no puede tipar (listas de Odoo [id, nombre], estructuras anidadas, tipos mezclados)
+se envían como texto JSON y se listan en b"json_columns" para decodificarlas.
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    ARROW_DISPONIBLE = True
+except ImportError:  # pyarrow no instalado: todo sigue por JSON
+    pa = None
+    ARROW_DISPONIBLE = False
+
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def _columna_arrow(valores: List[Any]) -> Tuple[Any, bool]:
+    """Convierte una columna a pa.Array; si no se puede tipar, la codifica como JSON."""
+    try:
+        array = pa.array(valores)
+        # Listas/structs se leerían como numpy arrays de dicts: van como JSON
+        # para que el cliente reciba exactamente las mismas listas que en JSON
+        if not pa.types.is_nested(array.type):
+            return array, False
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError, OverflowError):
+        pass
+    return pa.array([None if v is None else json.dumps(v, default=str) for v in valores], type=pa.string()), True
+
+
+def to_arrow_ipc(registros: Union[List[Dict], pd.DataFrame], extra: Optional[Dict] = None) -> bytes:
+    """
+    Serializa registros a un stream Arrow IPC.
+
+    Args:
+        registros: Lista de dicts o DataFrame
+        extra: Resto del payload (se envía como JSON en la metadata)
+
+    Returns:
+        Bytes del stream IPC
+    """
+    json_columns: List[str] = []
+    if isinstance(registros, pd.DataFrame):
+        try:
+            tabla = pa.Table.from_pandas(registros, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError):
+            tabla = None
+        if tabla is None or any(pa.types.is_nested(t) for t in tabla.schema.types):
+            return to_arrow_ipc(registros.to_dict('records'), extra)
+    else:
+        nombres: Dict[str, None] = {}
+        for registro in registros:
+            for k in registro:
+                nombres.setdefault(k, None)
+        arrays = []
+        for nombre in nombres:
+            array, es_json = _columna_arrow([r.get(nombre) for r in registros])
+            arrays.append(array)
+            if es_json:
+                json_columns.append(nombre)
+        tabla = pa.table(arrays, names=list(nombres)) if nombres else pa.table({})
+
+    metadata = dict(tabla.schema.metadata or {})
+    metadata[b"payload"] = json.dumps(extra or {}, default=str).encode()
+    metadata[b"json_columns"] = json.dumps(json_columns).encode()
+    tabla = tabla.replace_schema_metadata(metadata)
+
+    # Buffers comprimidos con LZ4 dentro del stream: mucho más barato que gzip
+    # sobre JSON y el lector los descomprime de forma transparente
+    opciones = pa.ipc.IpcWriteOptions(
+        compression="lz4" if pa.Codec.is_available("lz4_frame") else None
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, tabla.schema, options=opciones) as writer:
+        writer.write_table(tabla)
+    return sink.getvalue().to_pybytes()
+
+
+def from_arrow_ipc(data: bytes) -> Tuple[pd.DataFrame, Dict]:
+    """
+    Lee un stream Arrow IPC.
+
+    Returns:
+        Tuple (DataFrame, resto del payload)
+    """
+    tabla = pa.ipc.open_stream(pa.py_buffer(data)).read_all()
+    metadata = tabla.schema.metadata or {}
+    extra = json.loads(metadata.get(b"payload", b"{}"))
+    json_columns = json.loads(metadata.get(b"json_columns", b"[]"))
+
+    # Las columnas JSON se decodifican desde Arrow (nulos = None): en pandas
+    # los nulos de texto pueden llegar como NaN según la versión
+    decodificadas = {
+        nombre: [None if v is None else json.loads(v) for v in tabla.column(nombre).to_pylist()]
+        for nombre in json_columns
+    }
+
+    # split_blocks/self_destruct: las columnas numéricas quedan como vistas
+    # sobre los buffers Arrow (sin copia ni consolidación de bloques)
+    df = tabla.to_pandas(split_blocks=True, self_destruct=True, integer_object_nulls=True)
+    for nombre, valores in decodificadas.items():
+        df[nombre] = pd.Series(valores, index=df.index, dtype=object)
+    return df, extra
+
+
+def accept_header() -> Dict[str, str]:
+    """Header Accept para pedir Arrow (JSON como fallback si el servidor no lo soporta)."""
+    if not ARROW_DISPONIBLE:
+        return {"Accept": "application/json"}
+    return {"Accept": f"{ARROW_STREAM_MEDIA_TYPE}, application/json;q=0.5"}
+
+
+def read_response(resp, tabla: Optional[str] = None) -> Tuple[pd.DataFrame, Dict]:
+    """
+    Lee una respuesta HTTP (requests/httpx) en Arrow o JSON.
+
+    Args:
+        resp: Respuesta HTTP
+        tabla: Clave del payload JSON que contiene la lista de registros
+            (None si la respuesta JSON es directamente la lista)
+
+    Returns:
+        Tuple (DataFrame de la tabla, resto del payload)
+    """
+    content_type = resp.headers.get("content-type", "")
+    if ARROW_DISPONIBLE and content_type.startswith(ARROW_STREAM_MEDIA_TYPE):
+        return from_arrow_ipc(resp.content)
+
+    data = resp.json()
+    if tabla is None:
+        return pd.DataFrame(data), {}
+    data = dict(data)
+    return pd.DataFrame(data.pop(tabla, []) or []), data
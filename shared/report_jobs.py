@@ -0,0 +1,70 @@
+"""
+Cliente de la cola de reportes del backend (/api/v1/reportes) para las páginas.
+
+En vez de esperar el PDF/Excel en un solo request (que con reportes grandes
+superaba el timeout), la página encola el trabajo, muestra una barra de
+progreso mientras sondea con long polling y descarga el archivo al terminar.
+El backend reutiliza un archivo ya generado con los mismos parámetros mientras
+siga vigente; opcion_regenerar muestra la casilla para pedir uno nuevo.
+
+Uso:
+    from shared.report_jobs import generar_reporte, opcion_regenerar
+    forzar = opcion_regenerar("regenerar_informe")
+    contenido, filename, mime = generar_reporte(API_URL, "recepciones_pdf", username, password,
+                                                {"fecha_inicio": ..., "fecha_fin": ...}, forzar=forzar)
+"""
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+import streamlit as st
+
+
+ESPERA_POLL = 10        # segundos de long polling por consulta
+TIMEOUT_TOTAL = 1800    # segundos antes de abandonar la espera
+
+
+def opcion_regenerar(key: str) -> bool:
+    """Casilla para ignorar el archivo ya generado y volver a consultar Odoo (forzar)."""
+    return st.checkbox(
+        "🔄 Regenerar", key=key,
+        help="Los reportes ya generados con los mismos filtros se reutilizan por un tiempo. "
+             "Marca esta opción para generarlo de nuevo con los datos actuales de Odoo."
+    )
+
+
+def generar_reporte(api_url: str, tipo: str, username: str, password: str,
+                    params: Optional[Dict[str, Any]] = None,
+                    titulo: str = "Generando reporte...",
+                    forzar: bool = False) -> Tuple[bytes, str, str]:
+    """Encola el reporte, muestra el progreso y retorna (contenido, filename, media_type)."""
+    base = f"{api_url}/api/v1/reportes/jobs"
+    resp = httpx.post(base, json={
+        "tipo": tipo, "username": username, "password": password,
+        "params": params or {}, "forzar": forzar
+    }, timeout=30.0)
+    if resp.status_code != 200:
+        raise RuntimeError(f"{resp.status_code} - {resp.text}")
+    job = resp.json()
+
+    barra = st.progress(0, text=titulo)
+    limite = time.monotonic() + TIMEOUT_TOTAL
+    try:
+        while job["estado"] in ("en_cola", "procesando"):
+            barra.progress(int(job.get("progreso") or 0), text=f"{titulo} {job.get('mensaje') or ''}")
+            if time.monotonic() > limite:
+                raise RuntimeError("El reporte sigue en proceso; intenta descargarlo nuevamente en unos minutos")
+            resp = httpx.get(f"{base}/{job['job_id']}", params={"esperar": ESPERA_POLL},
+                             timeout=ESPERA_POLL + 30.0)
+            resp.raise_for_status()
+            job = resp.json()
+
+        if job["estado"] == "error":
+            raise RuntimeError(job.get("error") or "Error generando el reporte")
+
+        barra.progress(100, text=f"{titulo} Descargando")
+        resp = httpx.get(f"{base}/{job['job_id']}/descarga", timeout=120.0)
+        resp.raise_for_status()
+        return resp.content, job["filename"], job["media_type"]
+    finally:
+        barra.empty()